@@ -0,0 +1,86 @@
+"""
+AsyncVedis latency benchmark.
+
+A number of coroutines run concurrently against a file-based AsyncVedis
+database, each storing a record and reading it back in a loop. The latency of
+every request is recorded and the 50th and 99th percentiles are reported,
+with group commit (requests queued while the worker is busy share one commit)
+and with a batch size of one (every write is committed on its own).
+
+Usage::
+
+    python benchmarks/async_latency.py [--coroutines N] [--ops N]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from vedis import AsyncVedis
+
+
+async def client(db, cid, nops, payload, latencies):
+    for i in range(nops):
+        key = 'k%d-%d' % (cid, i)
+        start = time.perf_counter()
+        await db.store(key, payload)
+        latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await db.fetch(key)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(filename, ncoroutines, nops, max_batch, max_pending, payload):
+    db = AsyncVedis(filename, max_pending=max_pending, max_batch=max_batch)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(db, cid, nops, payload, latencies)
+                           for cid in range(ncoroutines)])
+    duration = time.perf_counter() - start
+    batches = db.batches
+    await db.close()
+    return latencies, duration, batches
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100.))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--coroutines', type=int, default=1000,
+                        help='number of concurrent coroutines')
+    parser.add_argument('--ops', type=int, default=10,
+                        help='store/fetch pairs per coroutine')
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help='maximum requests per group commit')
+    parser.add_argument('--max-pending', type=int, default=1024,
+                        help='maximum requests in flight')
+    parser.add_argument('--value-size', type=int, default=256,
+                        help='size of the stored values in bytes')
+    args = parser.parse_args()
+
+    payload = 'x' * args.value_size
+    print('%12s %10s %10s %10s %10s' % ('mode', 'p50 ms', 'p99 ms',
+                                       'req/sec', 'batches'))
+    for mode, max_batch in (('group', args.max_batch), ('single', 1)):
+        dirname = tempfile.mkdtemp()
+        try:
+            latencies, duration, batches = asyncio.run(run(
+                os.path.join(dirname, 'bench.db'), args.coroutines,
+                args.ops, max_batch, args.max_pending, payload))
+        finally:
+            shutil.rmtree(dirname)
+        latencies.sort()
+        print('%12s %10.2f %10.2f %10.0f %10d' % (
+            mode,
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 99) * 1000,
+            len(latencies) / duration,
+            batches))
+
+
+if __name__ == '__main__':
+    main()
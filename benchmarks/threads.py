@@ -0,0 +1,91 @@
+"""
+Threaded throughput benchmark.
+
+Each worker thread shares a single file-based Vedis handle, serializing a
+small record with ``json`` before storing it and deserializing it after
+fetching it back. Commits are issued periodically so that the workers spend
+time waiting on disk. Because the GIL is released while the engine is doing
+work, the Python-side work of one thread can overlap with the I/O of another.
+
+With ``--separate``, each thread uses its own handle and database file
+instead, so engine work is no longer serialized by the per-handle mutex.
+
+Usage::
+
+    python benchmarks/threads.py [--ops N] [--threads 1,2,4,8] [--separate]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from vedis import Vedis
+
+
+def worker(db, tid, nops, commit_every, value_size, lock):
+    payload = 'x' * value_size
+    for i in range(nops):
+        key = 'k%d-%d' % (tid, i)
+        db.store(key, json.dumps({'id': i, 'thread': tid, 'data': payload}))
+        json.loads(db.fetch(key))
+        if commit_every and (i + 1) % commit_every == 0:
+            # Transactions are per-handle, so only one thread commits at once.
+            with lock:
+                db.commit()
+
+
+def run(nthreads, nops, commit_every, value_size, separate=False):
+    dirname = tempfile.mkdtemp()
+    if separate:
+        dbs = [Vedis(os.path.join(dirname, 'bench-%d.db' % i))
+               for i in range(nthreads)]
+    else:
+        dbs = [Vedis(os.path.join(dirname, 'bench.db'))] * nthreads
+    locks = dict((id(db), threading.Lock()) for db in dbs)
+    threads = [
+        threading.Thread(target=worker, args=(db, tid, nops, commit_every,
+                                              value_size, locks[id(db)]))
+        for tid, db in enumerate(dbs)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for db in set(dbs):
+        db.commit()
+    duration = time.time() - start
+    for db in set(dbs):
+        db.close()
+    shutil.rmtree(dirname)
+    return (nthreads * nops) / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ops', type=int, default=5000,
+                        help='operations per thread')
+    parser.add_argument('--threads', default='1,2,4,8',
+                        help='comma-separated list of thread counts')
+    parser.add_argument('--commit-every', type=int, default=500,
+                        help='commit after every N operations (0 to disable)')
+    parser.add_argument('--value-size', type=int, default=4096,
+                        help='size of the stored payload in bytes')
+    parser.add_argument('--separate', action='store_true',
+                        help='use one handle and database file per thread')
+    args = parser.parse_args()
+
+    baseline = None
+    print('%8s %14s %8s' % ('threads', 'ops/sec', 'scaling'))
+    for nthreads in [int(n) for n in args.threads.split(',')]:
+        ops = run(nthreads, args.ops, args.commit_every, args.value_size,
+                  args.separate)
+        if baseline is None:
+            baseline = ops
+        print('%8d %14.0f %7.2fx' % (nthreads, ops, ops / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Benchmark suite for vedis-python.
+
+Benchmarks are plain functions registered with the :py:func:`benchmark`
+decorator, along with the parameters to run them with. Each function is
+called once per combination of parameters and receives a :py:class:`Timer`,
+which it uses to time the work being measured, excluding any setup. The
+function returns the number of operations that were performed.
+
+Run the suite with ``python -m vedis_bench`` from the ``benchmarks``
+directory.
+"""
+import itertools
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import vedis
+
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    def __init__(self, fn, name, params):
+        self.fn = fn
+        self.name = name
+        self.params = params
+
+    @property
+    def suite(self):
+        return self.name.split('.', 1)[0]
+
+    def parameter_sets(self):
+        names = sorted(self.params)
+        for values in itertools.product(*[self.params[n] for n in names]):
+            yield dict(zip(names, values))
+
+
+def benchmark(name, **params):
+    """
+    Register a benchmark. Each keyword argument gives the list of values
+    to run the benchmark with.
+    """
+    def decorator(fn):
+        BENCHMARKS.append(Benchmark(fn, name, params))
+        return fn
+    return decorator
+
+
+class Timer(object):
+    """
+    Accumulates the time spent in ``with timer:`` blocks, so that
+    benchmarks can exclude their setup from the measurement.
+    """
+    def __init__(self):
+        self.elapsed = 0.
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed += time.perf_counter() - self._start
+
+
+class Workspace(object):
+    """
+    Creates databases for a benchmark run, and removes any files created
+    once the run is over.
+    """
+    def __init__(self):
+        self.dirname = None
+        self.databases = []
+        self.sharded = []
+
+    def open(self, storage=':mem:', **kwargs):
+        if storage == ':mem:':
+            filename = ':mem:'
+        else:
+            if self.dirname is None:
+                self.dirname = tempfile.mkdtemp(prefix='vedis-bench-')
+            filename = os.path.join(self.dirname,
+                                    'bench-%d.db' % len(self.databases))
+        db = vedis.Vedis(filename, **kwargs)
+        self.databases.append(db)
+        return db
+
+    def open_sharded(self, shards, **kwargs):
+        if self.dirname is None:
+            self.dirname = tempfile.mkdtemp(prefix='vedis-bench-')
+        directory = os.path.join(self.dirname,
+                                 'shards-%d' % len(self.sharded))
+        db = vedis.ShardedVedis(directory, shards=shards, **kwargs)
+        self.sharded.append(db)
+        return db
+
+    def reopen(self, db, **kwargs):
+        """Close a file database and open it again with the given options."""
+        db.close()
+        db = vedis.Vedis(db.filename, **kwargs)
+        self.databases.append(db)
+        return db
+
+    def close(self):
+        for db in self.databases:
+            if db.is_open:
+                db.close()
+        for db in self.sharded:
+            db.close()
+        self.databases = []
+        self.sharded = []
+        if self.dirname is not None:
+            shutil.rmtree(self.dirname)
+            self.dirname = None
+
+
+def select(pattern=None):
+    """
+    Return the registered benchmarks whose name starts with one of the
+    comma-separated prefixes in `pattern`.
+    """
+    # Importing the suites registers their benchmarks.
+    from vedis_bench import suites
+    if not pattern:
+        return list(BENCHMARKS)
+    prefixes = [p.strip() for p in pattern.split(',') if p.strip()]
+    return [b for b in BENCHMARKS
+            if any(b.name.startswith(prefix) for prefix in prefixes)]
+
+
+def run_benchmark(bench, params, repeat=3, scale=1.):
+    """
+    Run a benchmark `repeat` times with the given parameters, returning a
+    result dictionary. The fastest run is used to compute the throughput.
+    """
+    runs = []
+    ops = 0
+    for _ in range(repeat):
+        timer = Timer()
+        workspace = Workspace()
+        try:
+            ops = bench.fn(timer, workspace, scale=scale, **params)
+        finally:
+            workspace.close()
+        runs.append(timer.elapsed)
+    best = min(runs)
+    return {
+        'name': bench.name,
+        'params': params,
+        'ops': ops,
+        'seconds': best,
+        'ops_per_sec': ops / best if best > 0 else 0.,
+        'runs': runs,
+    }
+
+
+def environment():
+    return {
+        'vedis_python': getattr(vedis, '__version__', None),
+        'vedis': vedis.Vedis(':mem:').lib_version().decode('utf-8'),
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def result_key(result):
+    params = ','.join('%s=%s' % (k, result['params'][k])
+                      for k in sorted(result['params']))
+    return '%s[%s]' % (result['name'], params)
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare two sets of results, returning a list of
+    ``(key, baseline ops/sec, current ops/sec, change)`` tuples and the
+    keys of the benchmarks that regressed by more than `threshold`.
+    """
+    base = dict((result_key(r), r) for r in baseline['results'])
+    rows = []
+    regressions = []
+    for result in current['results']:
+        key = result_key(result)
+        if key not in base:
+            continue
+        old = base[key]['ops_per_sec']
+        new = result['ops_per_sec']
+        change = (new - old) / old if old else 0.
+        rows.append((key, old, new, change))
+        if change < -threshold:
+            regressions.append(key)
+    return rows, regressions
@@ -0,0 +1,118 @@
+"""
+Command-line interface for the vedis-python benchmark suite.
+
+Usage::
+
+    python -m vedis_bench run [--suite kv,command] [--quick] [--output FILE]
+    python -m vedis_bench compare BASELINE.json CURRENT.json [--threshold 0.1]
+    python -m vedis_bench list
+"""
+import argparse
+import json
+import sys
+
+from vedis_bench import compare
+from vedis_bench import environment
+from vedis_bench import run_benchmark
+from vedis_bench import select
+
+
+def format_params(params):
+    return ' '.join('%s=%s' % (k, params[k]) for k in sorted(params))
+
+
+def cmd_list(args):
+    for bench in select(args.suite):
+        print('%-22s %s' % (bench.name, ' '.join(
+            '%s=%s' % (k, ','.join(map(str, v)))
+            for k, v in sorted(bench.params.items()))))
+    return 0
+
+
+def cmd_run(args):
+    scale = args.scale
+    if args.quick:
+        scale = min(scale, 0.1)
+    results = []
+    for bench in select(args.suite):
+        for params in bench.parameter_sets():
+            result = run_benchmark(bench, params, args.repeat, scale)
+            results.append(result)
+            sys.stderr.write('%-22s %-42s %12.0f ops/sec\n' % (
+                bench.name, format_params(params), result['ops_per_sec']))
+
+    data = {
+        'environment': environment(),
+        'config': {'repeat': args.repeat, 'scale': scale},
+        'results': results}
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    with open(args.current) as fh:
+        current = json.load(fh)
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    print('%-64s %12s %12s %8s' % ('benchmark', 'baseline', 'current',
+                                   'change'))
+    for key, old, new, change in rows:
+        flag = ' *' if key in regressions else ''
+        print('%-64s %12.0f %12.0f %+7.1f%%%s' % (key, old, new,
+                                                  change * 100, flag))
+    if regressions:
+        print('\n%d benchmark(s) regressed by more than %.0f%%.' % (
+            len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='vedis_bench',
+        description='Benchmark suite for vedis-python.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    list_parser = subparsers.add_parser('list', help='list the benchmarks')
+    list_parser.add_argument('-s', '--suite',
+                             help='comma-separated benchmark name prefixes')
+    list_parser.set_defaults(fn=cmd_list)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-s', '--suite',
+                            help='comma-separated benchmark name prefixes')
+    run_parser.add_argument('-r', '--repeat', type=int, default=3,
+                            help='runs per benchmark, the fastest is kept')
+    run_parser.add_argument('--scale', type=float, default=1.,
+                            help='multiplier applied to operation counts')
+    run_parser.add_argument('-q', '--quick', action='store_true',
+                            help='run a tenth of the operations')
+    run_parser.add_argument('-o', '--output',
+                            help='write the JSON results to this file')
+    run_parser.set_defaults(fn=cmd_run)
+
+    compare_parser = subparsers.add_parser(
+        'compare', help='compare the results of two runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                                help='fractional slowdown that counts as a '
+                                'regression')
+    compare_parser.set_defaults(fn=cmd_compare)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    return args.fn(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,608 @@
+"""
+The benchmarks run by ``python -m vedis_bench``.
+
+Every benchmark accepts the timer, the workspace and a `scale` factor, which
+is applied to the number of operations so that ``--quick`` runs finish in a
+few seconds.
+"""
+import io
+import random
+import time
+
+import vedis
+from vedis_bench import benchmark
+
+
+STORAGE = [':mem:', 'file']
+VALUE_SIZES = [16, 1024, 16384]
+
+
+def scaled(n, scale):
+    return max(1, int(n * scale))
+
+
+def make_value(size):
+    # Use a value that needs escaping when formatted into a command string.
+    return ('x"' * size)[:size]
+
+
+@benchmark('kv.store', storage=STORAGE, value_size=VALUE_SIZES,
+           keys=[1000, 10000])
+def kv_store(timer, workspace, storage, value_size, keys, scale):
+    db = workspace.open(storage)
+    value = make_value(value_size)
+    n = scaled(keys, scale)
+    with timer:
+        for i in range(n):
+            db.store('k%d' % i, value)
+        db.commit()
+    return n
+
+
+@benchmark('kv.fetch', storage=STORAGE, value_size=VALUE_SIZES,
+           keys=[1000, 10000])
+def kv_fetch(timer, workspace, storage, value_size, keys, scale):
+    db = workspace.open(storage)
+    value = make_value(value_size)
+    n = scaled(keys, scale)
+    for i in range(n):
+        db.store('k%d' % i, value)
+    db.commit()
+    with timer:
+        for i in range(n):
+            db.fetch('k%d' % i)
+    return n
+
+
+@benchmark('kv.fetch_mode', mode=['readwrite', 'readonly', 'mmap'],
+           value_size=[16, 1024], keys=[10000])
+def kv_fetch_mode(timer, workspace, mode, value_size, keys, scale):
+    # Read throughput of a file database opened read-write, read-only, and
+    # read-only with the whole file memory-mapped.
+    db = workspace.open('file')
+    value = make_value(value_size)
+    n = scaled(keys, scale)
+    for i in range(n):
+        db.store('k%d' % i, value)
+    db.commit()
+    if mode != 'readwrite':
+        db = workspace.reopen(db, readonly=True, mmap=mode == 'mmap')
+    with timer:
+        for _ in range(3):
+            for i in range(n):
+                db.fetch('k%d' % i)
+    return n * 3
+
+
+@benchmark('kv.journal', journal=[True, False], batch_size=[100])
+def kv_journal(timer, workspace, journal, batch_size, scale):
+    # Cost of the rollback journal when rewriting existing records.
+    db = workspace.open('file', journal=journal)
+    n = scaled(5000, scale)
+    for i in range(n):
+        db.store('k%d' % i, 'v%d' % i)
+    db.commit()
+    with timer:
+        for start in range(0, n, batch_size):
+            for i in range(start, min(start + batch_size, n)):
+                db.store('k%d' % i, 'x%d' % i)
+            db.commit()
+    return n
+
+
+@benchmark('kv.transaction', batch_size=[1, 100, 1000], value_size=[128])
+def kv_transaction(timer, workspace, batch_size, value_size, scale):
+    # Each batch of stores is committed to disk as one transaction.
+    db = workspace.open('file')
+    value = make_value(value_size)
+    n = scaled(2000, scale)
+    if batch_size == 1:
+        n = scaled(200, scale)
+    with timer:
+        for start in range(0, n, batch_size):
+            with db.transaction():
+                for i in range(start, min(start + batch_size, n)):
+                    db.store('k%d' % i, value)
+    return n
+
+
+@benchmark('commit.latency', storage=STORAGE, dirty_keys=[1, 100])
+def commit_latency(timer, workspace, storage, dirty_keys, scale):
+    db = workspace.open(storage)
+    n = scaled(100, scale)
+    for i in range(n):
+        for j in range(dirty_keys):
+            db.store('k%d' % j, 'v%d' % i)
+        with timer:
+            db.commit()
+    return n
+
+
+@benchmark('commit.tables', tables=[10, 1000, 10000])
+def commit_tables(timer, workspace, tables, scale):
+    # Commits that change a single hash, in a database with many hashes
+    # loaded in memory.
+    db = workspace.open('file')
+    for i in range(tables):
+        db.hset('h%d' % i, 'k', 'v')
+    db.commit()
+    n = scaled(200, scale)
+    for i in range(n):
+        db.hset('h0', 'k%d' % i, 'v')
+        with timer:
+            db.commit()
+    return n
+
+
+def _families(value):
+    # Each family maps to a pair of (execute, call) functions accepting the
+    # database and the iteration number.
+    return {
+        'strings': (
+            lambda db, i: db.execute('SET %s %s', ('k%d' % i, value)),
+            lambda db, i: db.call('SET', 'k%d' % i, value)),
+        'counters': (
+            lambda db, i: db.execute('INCRBY %%s %d' % i, ('counter',)),
+            lambda db, i: db.call('INCRBY', 'counter', i)),
+        'hashes': (
+            lambda db, i: db.execute('HSET %s %s %s', ('h', 'k%d' % i, value)),
+            lambda db, i: db.call('HSET', 'h', 'k%d' % i, value)),
+        'sets': (
+            lambda db, i: db.execute('SADD %s %s', ('s', 'k%d' % i)),
+            lambda db, i: db.call('SADD', 's', 'k%d' % i)),
+        'lists': (
+            lambda db, i: db.execute('LPUSH %s %s', ('l', value)),
+            lambda db, i: db.call('LPUSH', 'l', value)),
+    }
+
+
+@benchmark('command.execute',
+           family=['strings', 'counters', 'hashes', 'sets', 'lists'],
+           value_size=[64])
+def command_execute(timer, workspace, family, value_size, scale):
+    db = workspace.open()
+    fn = _families(make_value(value_size))[family][0]
+    n = scaled(20000, scale)
+    with timer:
+        for i in range(n):
+            fn(db, i)
+    return n
+
+
+@benchmark('command.call',
+           family=['strings', 'counters', 'hashes', 'sets', 'lists'],
+           value_size=[64])
+def command_call(timer, workspace, family, value_size, scale):
+    db = workspace.open()
+    fn = _families(make_value(value_size))[family][1]
+    n = scaled(20000, scale)
+    with timer:
+        for i in range(n):
+            fn(db, i)
+    return n
+
+
+@benchmark('command.pipeline', batch_size=[10, 100, 1000], value_size=[64])
+def command_pipeline(timer, workspace, batch_size, value_size, scale):
+    db = workspace.open()
+    value = make_value(value_size)
+    n = scaled(20000, scale)
+    with timer:
+        for start in range(0, n, batch_size):
+            with db.pipeline() as pipe:
+                for i in range(start, min(start + batch_size, n)):
+                    pipe.set('k%d' % i, value)
+    return n
+
+
+@benchmark('wrapper.hash', operation=['set', 'get', 'iterate'],
+           value_size=[64])
+def wrapper_hash(timer, workspace, operation, value_size, scale):
+    db = workspace.open()
+    h = db.Hash('h')
+    value = make_value(value_size)
+    n = scaled(10000, scale)
+    if operation != 'set':
+        h.update(**dict(('k%d' % i, value) for i in range(n)))
+    with timer:
+        if operation == 'set':
+            for i in range(n):
+                h['k%d' % i] = value
+        elif operation == 'get':
+            for i in range(n):
+                h['k%d' % i]
+        else:
+            for _ in h.iteritems():
+                pass
+    return n
+
+
+@benchmark('wrapper.set', operation=['add', 'contains', 'iterate'])
+def wrapper_set(timer, workspace, operation, scale):
+    db = workspace.open()
+    s = db.Set('s')
+    n = scaled(10000, scale)
+    if operation != 'add':
+        s.add(*['m%d' % i for i in range(n)])
+    with timer:
+        if operation == 'add':
+            for i in range(n):
+                s.add('m%d' % i)
+        elif operation == 'contains':
+            for i in range(n):
+                'm%d' % i in s
+        else:
+            for _ in s:
+                pass
+    return n
+
+
+@benchmark('wrapper.list', operation=['append', 'index', 'iterate'],
+           value_size=[64])
+def wrapper_list(timer, workspace, operation, value_size, scale):
+    db = workspace.open()
+    l = db.List('l')
+    value = make_value(value_size)
+    n = scaled(10000, scale)
+    if operation != 'append':
+        l.extend([value] * n)
+    with timer:
+        if operation == 'append':
+            for i in range(n):
+                l.append(value)
+        elif operation == 'index':
+            # Random access is linear in the distance from the nearest end,
+            # so sample a bounded number of positions.
+            n = min(n, 1000)
+            for i in range(n):
+                l[i]
+        else:
+            for _ in l:
+                pass
+    return n
+
+
+@benchmark('wrapper.zset', method=['zset', 'hash_sort'],
+           operation=['add', 'top', 'range'])
+def wrapper_zset(timer, workspace, method, operation, scale):
+    # A leaderboard kept in a sorted set, or in a hash of member to score
+    # that is sorted in Python for every query.
+    db = workspace.open()
+    n = scaled(20000, scale)
+    rng = random.Random(0)
+    scores = dict(('m%d' % i, rng.random() * 1000) for i in range(n))
+    if operation != 'add':
+        if method == 'zset':
+            db.zadd('z', scores)
+        else:
+            db.hmset('h', scores)
+    queries = 100
+    with timer:
+        if operation == 'add':
+            if method == 'zset':
+                for member, score in scores.items():
+                    db.zadd('z', {member: score})
+            else:
+                for member, score in scores.items():
+                    db.hset('h', member, score)
+            return n
+        for i in range(queries):
+            if method == 'zset':
+                if operation == 'top':
+                    db.zrevrange('z', 0, 9, withscores=True)
+                else:
+                    db.zrangebyscore('z', i * 10, i * 10 + 5)
+            else:
+                items = [(member, float(score)) for member, score in
+                         db.hgetall('h').items()]
+                if operation == 'top':
+                    sorted(items, key=lambda item: item[1],
+                           reverse=True)[:10]
+                else:
+                    low = i * 10
+                    sorted(member for member, score in items
+                           if low <= score <= low + 5)
+    return queries
+
+
+@benchmark('kv.expire', method=['index', 'hash_sweep'],
+           operation=['store', 'purge'])
+def kv_expire(timer, workspace, method, operation, scale):
+    # Keys with a deadline, stored with store(ttl=...) and purged with
+    # expire_step(), or stored along with a hash of key to deadline that is
+    # swept in Python. Half of the keys are due when they are purged.
+    db = workspace.open('file')
+    n = scaled(20000, scale)
+    value = make_value(100)
+
+    def populate():
+        deadline = time.time()
+        for i in range(n):
+            ttl = 0.001 if i % 2 else 3600
+            if method == 'index':
+                db.store('k%d' % i, value, ttl=ttl)
+            else:
+                db.store('k%d' % i, value)
+                db.hset('deadlines', 'k%d' % i, repr(deadline + ttl))
+        db.commit()
+
+    if operation == 'store':
+        with timer:
+            populate()
+        return n
+    populate()
+    time.sleep(0.01)
+    with timer:
+        if method == 'index':
+            while db.expire_step(1000):
+                pass
+        else:
+            now = time.time()
+            due = [key for key, deadline in db.hgetall('deadlines').items()
+                   if float(deadline) <= now]
+            for key in due:
+                db.delete(key)
+            db.hmdel('deadlines', due)
+        db.commit()
+    return n // 2
+
+
+@benchmark('kv.durability', mode=['none', 'batched', 'full'],
+           operation=['store', 'hset'])
+def kv_durability(timer, workspace, mode, operation, scale):
+    # Small writes to a file database under each durability mode. Every
+    # write is committed in full mode, so it runs fewer of them.
+    kwargs = {}
+    if mode == 'batched':
+        kwargs.update(commit_every=1000, commit_interval=0.1)
+    db = workspace.open('file', durability=mode, **kwargs)
+    n = scaled(500 if mode == 'full' else 20000, scale)
+    value = make_value(32)
+    with timer:
+        if operation == 'store':
+            for i in range(n):
+                db.store('k%d' % i, value)
+        else:
+            for i in range(n):
+                db.hset('h', 'f%d' % i, value)
+        db.flush()
+    return n
+
+
+@benchmark('commit.sync', sync_mode=['full', 'data', 'off'],
+           journal_buffer=[0, 65536])
+def commit_sync(timer, workspace, sync_mode, journal_buffer, scale):
+    # Small commits to an existing file database, each changing 50 keys
+    # spread over the database. The reported rate is commits per second.
+    db = workspace.open('file', sync_mode=sync_mode,
+                        journal_buffer=journal_buffer)
+    value = make_value(100)
+    db.store_many(('k%d' % i, value) for i in range(5000))
+    db.commit()
+    n = scaled(200, scale)
+    with timer:
+        for i in range(n):
+            for j in range(50):
+                db.store('k%d' % ((i * 50 + j) * 97 % 5000), value)
+            db.commit()
+    return n
+
+
+@benchmark('callback.registered', path=['execute', 'wrapper', 'lazy'],
+           nargs=[1, 8])
+def callback_registered(timer, workspace, path, nargs, scale):
+    # Measures the cost of dispatching from the engine into a Python
+    # callback registered with Vedis.register(). The lazy callback only
+    # reads its first argument.
+    db = workspace.open()
+
+    if path == 'lazy':
+        @db.register('NOOP', lazy=True)
+        def noop(context, args):
+            return args[0]
+    else:
+        @db.register('NOOP')
+        def noop(context, *args):
+            return len(args)
+
+    args = ['a%d' % i for i in range(nargs)]
+    command = 'NOOP ' + ' '.join(args)
+    n = scaled(20000, scale)
+    with timer:
+        if path == 'execute':
+            for _ in range(n):
+                db.execute(command, result=True)
+        else:
+            for _ in range(n):
+                noop(*args)
+    return n
+
+
+@benchmark('instrumentation', mode=['off', 'stats', 'trace'])
+def instrumentation(timer, workspace, mode, scale):
+    # Overhead of Vedis(instrument=True) and of a trace hook on a cheap
+    # operation.
+    db = workspace.open(instrument=mode == 'stats')
+    if mode == 'trace':
+        db.set_trace_hook(lambda kind, name, duration: None)
+    n = scaled(50000, scale)
+    with timer:
+        for i in range(n):
+            db.store('k', 'v')
+            db.call('GET', 'k')
+    return n * 2
+
+
+@benchmark('kv.page_cache', cache_pages=[0, 256, 4096], keys=[2000])
+def kv_page_cache(timer, workspace, cache_pages, keys, scale):
+    # Repeated reads of values stored in overflow pages, which are read from
+    # disk again whenever they are evicted from the page cache.
+    db = workspace.open('file')
+    value = make_value(4096)
+    n = scaled(keys, scale)
+    for i in range(n):
+        db.store('k%d' % i, value)
+    db.commit()
+    db = workspace.reopen(db, cache_pages=cache_pages)
+    with timer:
+        for _ in range(3):
+            for i in range(n):
+                db.fetch('k%d' % i)
+    return n * 3
+
+
+@benchmark('table.cold_lookup', lazy_tables=[0, 100],
+           fields=[1000, 10000, 100000])
+def table_cold_lookup(timer, workspace, lazy_tables, fields, scale):
+    # The first lookups in a large hash after the database is opened, which
+    # load the whole hash unless it is loaded lazily.
+    db = workspace.open('file', lazy_tables=lazy_tables)
+    n = scaled(fields, scale)
+    for i in range(n):
+        db.hset('h', 'k%d' % i, 'v')
+    db.commit()
+    rounds = scaled(10, scale)
+    for _ in range(rounds):
+        db = workspace.reopen(db, lazy_tables=lazy_tables)
+        with timer:
+            for i in range(0, n, max(1, n // 10)):
+                db.hget('h', 'k%d' % i)
+    return rounds
+
+
+@benchmark('kv.read_cache', source=['fetch', 'hget'],
+           read_cache_size=[0, 500])
+def kv_read_cache(timer, workspace, source, read_cache_size, scale):
+    # Skewed reads, where 2% of the keys receive 80% of the reads.
+    db = workspace.open('file', read_cache_size=read_cache_size or None)
+    keys = 10000
+    for i in range(keys):
+        db.store('k%d' % i, 'v%d' % i)
+        db.hset('h', 'k%d' % i, 'v%d' % i)
+    db.commit()
+    rng = random.Random(0)
+    hot = keys // 50
+    n = scaled(50000, scale)
+    names = ['k%d' % (rng.randrange(hot) if rng.random() < 0.8
+                      else rng.randrange(keys)) for _ in range(n)]
+    if source == 'fetch':
+        with timer:
+            for name in names:
+                db.fetch(name)
+    else:
+        with timer:
+            for name in names:
+                db.hget('h', name)
+    return n
+
+
+@benchmark('result.decode', source=['fetch', 'hvals', 'smembers'],
+           mode=['bytes', 'python', 'decode'])
+def result_decode(timer, workspace, source, mode, scale):
+    # "python" decodes the returned bytes in Python, "decode" has the
+    # database return text.
+    db = workspace.open(decode='utf-8' if mode == 'decode' else None)
+    members = ['m\xe9%d' % i for i in range(200)]
+    db.hmset('h', dict(zip(members, members)))
+    db.smadd('s', members)
+    db.store('k', 'v\xe9' * 16)
+    rounds = scaled(5000, scale) if source == 'fetch' else scaled(500, scale)
+    with timer:
+        for _ in range(rounds):
+            if source == 'fetch':
+                value = db.fetch('k')
+                if mode == 'python':
+                    value.decode('utf-8')
+            elif source == 'hvals':
+                values = db.hvals('h')
+                if mode == 'python':
+                    [value.decode('utf-8') for value in values]
+            else:
+                values = db.smembers('s')
+                if mode == 'python':
+                    set(value.decode('utf-8') for value in values)
+    return rounds
+
+
+@benchmark('load.bulk', method=['loop', 'bulk_load'], type=['kv', 'hash'],
+           journal=[True, False])
+def load_bulk(timer, workspace, method, type, journal, scale):
+    # Loading TSV records, either with a loop over the single record APIs or
+    # with bulk_load().
+    db = workspace.open('file', journal=journal)
+    n = scaled(50000, scale)
+    if type == 'kv':
+        lines = ['k%d\tv%d\n' % (i, i) for i in range(n)]
+    else:
+        lines = ['h%d\tf%d\tv%d\n' % (i // 100, i, i) for i in range(n)]
+    source = io.StringIO(''.join(lines))
+    with timer:
+        if method == 'bulk_load':
+            vedis.bulk_load(db, source, 'tsv', type=type)
+        else:
+            for line in source:
+                fields = line.rstrip('\n').split('\t')
+                if type == 'kv':
+                    db.store(*fields)
+                else:
+                    db.hset(*fields)
+            db.commit()
+    return n
+
+
+@benchmark('shard.load', layout=['single', 'sharded', 'pool'],
+           shards=[4])
+def shard_load(timer, workspace, layout, shards, scale):
+    # Bulk loading key/value pairs into a single file, into shards written
+    # one after the other, and into shards written by a process pool.
+    n = scaled(200000, scale)
+    records = [('k%d' % i, make_value(100)) for i in range(n)]
+    if layout == 'single':
+        db = workspace.open('file')
+    else:
+        db = workspace.open_sharded(
+            shards, processes=shards if layout == 'pool' else None)
+    with timer:
+        vedis.bulk_load(db, records, batch=50000)
+    return n
+
+
+@benchmark('shard.rebalance', shards=[4], target=[5, 3])
+def shard_rebalance(timer, workspace, shards, target, scale):
+    # Growing or shrinking a sharded database holding key/value pairs.
+    n = scaled(100000, scale)
+    db = workspace.open_sharded(shards)
+    db.store_many(('k%d' % i, make_value(100)) for i in range(n))
+    db.commit()
+    with timer:
+        stats = db.rebalance(target)
+    return stats['moved']
+
+
+@benchmark('snapshot.copy', method=['scan', 'dump', 'restore', 'backup'])
+def snapshot_copy(timer, workspace, method, scale):
+    # Copying a database holding keys and hashes: reading every record with
+    # scan() and hgetall(), writing a dump, restoring it into a new database
+    # and copying the file with backup().
+    db = workspace.open('file')
+    n = scaled(50000, scale)
+    db.store_many(('k%d' % i, make_value(100)) for i in range(n))
+    for i in range(n // 100):
+        db.hmset('h%d' % i, dict(('f%d' % j, 'v%d' % j) for j in range(100)))
+    db.commit()
+    fh = io.BytesIO()
+    if method == 'restore':
+        db.dump(fh)
+        fh.seek(0)
+        target = workspace.open('file')
+    with timer:
+        if method == 'scan':
+            data = dict(db.scan(prefix='k'))
+            tables = [db.hgetall('h%d' % i) for i in range(n // 100)]
+        elif method == 'dump':
+            db.dump(fh)
+        elif method == 'restore':
+            target.restore(fh)
+        else:
+            db.backup(db.filename + '.backup')
+    return 2 * n
@@ -19,8 +19,18 @@ else:
     cythonize = lambda obj: obj
 
 library_source = 'src/vedis.c'
+
+# Build the library with the per-handle mutex enabled, so that the Python
+# bindings can release the GIL while calling into the engine.
+define_macros = [('VEDIS_ENABLE_THREADS', '1')]
+libraries = []
+if os.name != 'nt':
+    libraries.append('pthread')
+
 vedis_extension = Extension(
     'vedis',
+    define_macros=define_macros,
+    libraries=libraries,
     sources=[python_source, library_source])
 
 setup(
@@ -32,4 +42,10 @@ setup(
     setup_requires=['cython'],
     install_requires=['cython'],
     ext_modules=cythonize([vedis_extension]),
+    entry_points={
+        'console_scripts': [
+            'vedis-load = vedis:bulk_load_main',
+            'vedis-rebalance = vedis:rebalance_main',
+        ],
+    },
 )
@@ -447,6 +447,68 @@ typedef sxi64 vedis_int64;
 #define VEDIS_CONFIG_DUP_EXEC_VALUE      7  /* ONE ARGUMENT: vedis_value **ppOut */
 #define VEDIS_CONFIG_RELEASE_DUP_VALUE   8  /* ONE ARGUMENT: vedis_value *pIn */
 #define VEDIS_CONFIG_OUTPUT_CONSUMER     9  /* TWO ARGUMENTS: int (*xConsumer)(vedis_value *pOut,void *pUserdata), void *pUserdata */
+#define VEDIS_CONFIG_PAGE_SIZE           10 /* ONE ARGUMENT: int iPageSize */
+#define VEDIS_CONFIG_PAGER_STATS         11 /* TWO ARGUMENTS: vedis_pager_stats *pStats, int bReset */
+#define VEDIS_CONFIG_TRACK_WORKING_SET   12 /* ONE ARGUMENT: int bEnable */
+#define VEDIS_CONFIG_TABLE_STATS         13 /* FOUR ARGUMENTS: int *pTables, int *pDirty, int *pLastCommit, vedis_int64 *pTotal */
+#define VEDIS_CONFIG_LAZY_TABLES         14 /* ONE ARGUMENT: int nMaxResident */
+#define VEDIS_CONFIG_LAZY_STATS          15 /* FOUR ARGUMENTS: int *pPartial, vedis_int64 *pResident, vedis_int64 *pLoaded, vedis_int64 *pEvicted */
+#define VEDIS_CONFIG_EXPIRE_STATS        16 /* TWO ARGUMENTS: vedis_int64 *pVolatile, vedis_int64 *pExpired */
+#define VEDIS_CONFIG_SYNC_MODE           17 /* ONE ARGUMENT: int iSyncMode */
+#define VEDIS_CONFIG_JOURNAL_BUFFER      18 /* ONE ARGUMENT: int nBytes */
+#define VEDIS_CONFIG_IO_STATS            19 /* TWO ARGUMENTS: vedis_io_stats *pStats, int bReset */
+#define VEDIS_CONFIG_IN_TRANSACTION      20 /* ONE ARGUMENT: int *pOpen */
+/*
+ * Sync modes set with the VEDIS_CONFIG_SYNC_MODE configuration verb.
+ */
+#define VEDIS_SYNC_MODE_FULL 1 /* fsync() the files */
+#define VEDIS_SYNC_MODE_DATA 2 /* fdatasync() the files, the default */
+#define VEDIS_SYNC_MODE_OFF  3 /* Leave it to the operating system */
+/*
+ * Page cache counters, filled in by [vedis_config()] with a configuration
+ * verb set to VEDIS_CONFIG_PAGER_STATS.
+ */
+typedef struct vedis_pager_stats vedis_pager_stats;
+struct vedis_pager_stats
+{
+	vedis_int64 nHit;        /* Page requests served from memory */
+	vedis_int64 nMiss;       /* Page requests that had to load the page */
+	vedis_int64 nEvict;      /* Unreferenced pages evicted from the cache */
+	vedis_int64 nWorkingSet; /* Distinct pages requested while tracking is enabled */
+	vedis_int64 nDbPage;     /* Size of the database in pages */
+	int nPage;               /* Pages held in memory */
+	int nCached;             /* Unreferenced pages held in the cache */
+	int nCacheMax;           /* Maximum number of unreferenced pages to cache */
+	int iPageSize;           /* Page size in bytes */
+};
+/*
+ * I/O counters of a database handle, filled in by [vedis_config()] with a
+ * configuration verb set to VEDIS_CONFIG_IO_STATS. Writes coalesced into a
+ * single write are counted once.
+ */
+typedef struct vedis_io_stats vedis_io_stats;
+struct vedis_io_stats
+{
+	vedis_int64 nRead;        /* Read calls */
+	vedis_int64 nWrite;       /* Write calls */
+	vedis_int64 nSync;        /* File and directory syncs */
+	vedis_int64 nByteRead;    /* Bytes read */
+	vedis_int64 nByteWritten; /* Bytes written */
+};
+/*
+ * Types of the records reported to the callback of [vedis_dump()].
+ */
+#define VEDIS_DUMP_KV     1 /* A key/value pair */
+#define VEDIS_DUMP_HASH   2 /* Start of a hash, the key is its name */
+#define VEDIS_DUMP_SET    3 /* Start of a set, the key is its name */
+#define VEDIS_DUMP_LIST   4 /* Start of a list, the key is its name */
+#define VEDIS_DUMP_ENTRY  5 /* Member of the last table: field and value, set member, list value or sorted set member and score */
+#define VEDIS_DUMP_ZSET   6 /* Start of a sorted set, the key is its name */
+#define VEDIS_DUMP_EXPIRE 7 /* Deadline of a key in milliseconds since the epoch, packed as a big-endian double */
+/*
+ * Online backup handle, see [vedis_backup_init()].
+ */
+typedef struct vedis_backup vedis_backup;
 /*
  * Storage engine configuration commands.
  *
@@ -727,6 +789,26 @@ struct vedis_kv_cursor
 #define VEDIS_CURSOR_MATCH_EXACT  1
 #define VEDIS_CURSOR_MATCH_LE     2
 #define VEDIS_CURSOR_MATCH_GE     3
+/*
+ * These bit values are intended for use in the 3rd parameter to the [vedis_open_v2()] interface
+ * and in the 4th parameter to the xOpen method of the [vedis_vfs] object.
+ */
+#define VEDIS_OPEN_READONLY         0x00000001  /* Read only mode. Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_READWRITE        0x00000002  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_CREATE           0x00000004  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_EXCLUSIVE        0x00000008  /* VFS only */
+#define VEDIS_OPEN_TEMP_DB          0x00000010  /* VFS only */
+#define VEDIS_OPEN_NOMUTEX          0x00000020  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_OMIT_JOURNALING  0x00000040  /* Omit journaling for this database. Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_IN_MEMORY        0x00000080  /* An in memory database. Ok for [vedis_open_v2]*/
+#define VEDIS_OPEN_MMAP             0x00000100  /* Obtain a memory view of the whole file. Ok for [vedis_open_v2] */
+/*
+ * Argument types understood by vedis_exec_argv().
+ */
+#define VEDIS_ARG_NULL    0 /* NIL, the argument data is ignored */
+#define VEDIS_ARG_STRING  1 /* Raw (binary-safe) string */
+#define VEDIS_ARG_INT     2 /* Decimal representation of a 64-bit integer */
+#define VEDIS_ARG_REAL    3 /* Decimal representation of a real number */
 /*
  * Key/Value Storage Engine.
  *
@@ -814,6 +896,7 @@ struct vedis_kv_methods
  */
 /* Vedis Datastore Handle */
 VEDIS_APIEXPORT int vedis_open(vedis **ppStore,const char *zStorage);
+VEDIS_APIEXPORT int vedis_open_v2(vedis **ppStore,const char *zStorage,unsigned int iFlags);
 VEDIS_APIEXPORT int vedis_config(vedis *pStore,int iOp,...);
 VEDIS_APIEXPORT int vedis_close(vedis *pStore);
 
@@ -821,6 +904,11 @@ VEDIS_APIEXPORT int vedis_close(vedis *pStore);
 VEDIS_APIEXPORT int vedis_exec(vedis *pStore,const char *zCmd,int nLen);
 VEDIS_APIEXPORT int vedis_exec_fmt(vedis *pStore,const char *zFmt,...);
 VEDIS_APIEXPORT int vedis_exec_result(vedis *pStore,vedis_value **ppOut);
+VEDIS_APIEXPORT int vedis_exec_argv(vedis *pStore,const char *zName,int nNameLen,int nArg,
+	const char **azArg,const int *anArgLen,const int *aiType);
+VEDIS_APIEXPORT int vedis_exec_argv_batch(vedis *pStore,int nCmd,const char **azName,const int *anNameLen,
+	const int *anArg,const char **azArg,const int *anArgLen,const int *aiType,
+	int (*xConsumer)(vedis_value *,void *),void *pUserData,int *pnDone);
 
 /* Foreign Command Registar */
 VEDIS_APIEXPORT int vedis_register_command(vedis *pStore,const char *zName,int (*xCmd)(vedis_context *,int,vedis_value **),void *pUserdata);
@@ -834,14 +922,42 @@ VEDIS_APIEXPORT int vedis_kv_append_fmt(vedis *pStore,const void *pKey,int nKeyL
 VEDIS_APIEXPORT int vedis_kv_fetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 /* in|out */*pBufLen);
 VEDIS_APIEXPORT int vedis_kv_fetch_callback(vedis *pStore,const void *pKey,
 	                    int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_fetch_sized_callback(vedis *pStore,const void *pKey,int nKeyLen,
+	                    int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
 VEDIS_APIEXPORT int vedis_kv_config(vedis *pStore,int iOp,...);
 VEDIS_APIEXPORT int vedis_kv_delete(vedis *pStore,const void *pKey,int nKeyLen);
+VEDIS_APIEXPORT int vedis_kv_expire(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 iDeadline);
+VEDIS_APIEXPORT int vedis_kv_deadline(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 *pDeadline);
+VEDIS_APIEXPORT int vedis_kv_expire_step(vedis *pStore,int nMax,int *pExpired);
+
+/* Key/Value Store Cursors */
+VEDIS_APIEXPORT int vedis_kv_cursor_init(vedis *pStore,vedis_kv_cursor **ppOut);
+VEDIS_APIEXPORT int vedis_kv_cursor_release(vedis *pStore,vedis_kv_cursor *pCur);
+VEDIS_APIEXPORT int vedis_kv_cursor_seek(vedis_kv_cursor *pCursor,const void *pKey,int nKeyLen,int iPos);
+VEDIS_APIEXPORT int vedis_kv_cursor_first_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_last_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_valid_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_next_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_prev_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_key(vedis_kv_cursor *pCursor,void *pBuf,int *pnByte);
+VEDIS_APIEXPORT int vedis_kv_cursor_key_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_cursor_data(vedis_kv_cursor *pCursor,void *pBuf,vedis_int64 *pnData);
+VEDIS_APIEXPORT int vedis_kv_cursor_data_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_cursor_hidden(vedis_kv_cursor *pCursor,int *pHidden);
+VEDIS_APIEXPORT int vedis_kv_cursor_delete_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_reset(vedis_kv_cursor *pCursor);
 
 /* Manual Transaction Manager */
 VEDIS_APIEXPORT int vedis_begin(vedis *pStore);
 VEDIS_APIEXPORT int vedis_commit(vedis *pStore);
 VEDIS_APIEXPORT int vedis_rollback(vedis *pStore);
 
+/* Dump and Online Backup Interfaces */
+VEDIS_APIEXPORT int vedis_dump(vedis *pStore,int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_backup_init(vedis *pStore,const char *zDest,vedis_backup **ppOut);
+VEDIS_APIEXPORT int vedis_backup_step(vedis_backup *pBackup,int nPage,vedis_int64 *pRemaining,vedis_int64 *pTotal);
+VEDIS_APIEXPORT int vedis_backup_finish(vedis_backup *pBackup);
+
 /* Utility interfaces */
 VEDIS_APIEXPORT int vedis_util_random_string(vedis *pStore,char *zBuf,unsigned int buf_size);
 VEDIS_APIEXPORT unsigned int vedis_util_random_num(vedis *pStore);
@@ -854,6 +970,8 @@ VEDIS_APIEXPORT int vedis_context_kv_append_fmt(vedis_context *pCtx,const void *
 VEDIS_APIEXPORT int vedis_context_kv_fetch(vedis_context *pCtx,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 /* in|out */*pBufLen);
 VEDIS_APIEXPORT int vedis_context_kv_fetch_callback(vedis_context *pCtx,const void *pKey,
 	                    int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_context_kv_fetch_sized_callback(vedis_context *pCtx,const void *pKey,int nKeyLen,
+	                    int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
 VEDIS_APIEXPORT int vedis_context_kv_delete(vedis_context *pCtx,const void *pKey,int nKeyLen);
 
 /* Command Execution Context Interfaces */
@@ -1551,6 +1669,9 @@ struct SHA1Context {
 /*
  * The default size of a disk sector in bytes.
  */
+#ifndef VEDIS_MAX_JOURNAL_BUFFER
+#define VEDIS_MAX_JOURNAL_BUFFER (16 << 20) /* Largest journal write buffer */
+#endif
 #ifndef VEDIS_DEFAULT_SECTOR_SIZE
 #define VEDIS_DEFAULT_SECTOR_SIZE 512
 #endif
@@ -1664,6 +1785,13 @@ struct vedis
 	sxu32 nTableSize;                /* apTable[] size */
 	sxu32 nTable;                    /* apTable[] length */
 	vedis_table *pTableList;         /* List of vedis tables loaded in memory */
+	sxu32 nTableCommit;              /* Tables serialized by the last commit */
+	sxi64 nTableCommitTotal;         /* Tables serialized since the handle was opened */
+	sxu32 nLazyMax;                  /* Maximum resident entries of lazily loaded tables, 0 to load eagerly */
+	sxi64 nLazyLoad;                 /* Entries of partial tables loaded from disk */
+	sxi64 nLazyEvict;                /* Entries of partial tables evicted from memory */
+	vedis_table *pExpire;            /* Deadlines of the keys that expire, NULL until used */
+	sxi64 nExpired;                  /* Keys expired since the handle was opened */
 #if defined(VEDIS_ENABLE_THREADS)
 	const SyMutexMethods *pMethods;  /* Mutex methods */
 	SyMutex *pMutex;                 /* Per-handle mutex */
@@ -1676,6 +1804,8 @@ struct vedis
 	sxu32 nMagic;                    /* Sanity check against misuse */
 };
 #define VEDIS_FL_DISABLE_AUTO_COMMIT   0x001 /* Disable auto-commit on close */
+#define VEDIS_FL_EXPIRE_LOOKUP         0x002 /* The deadline index was looked up */
+#define VEDIS_FL_IN_TRANSACTION        0x004 /* A transaction was opened by BEGIN or vedis_begin() */
 /*
  * Vedis Token
  * The following set of constants are the tokens recognized
@@ -1717,18 +1847,11 @@ struct vedis
 #endif
 # define VEDIS_DEFAULT_PAGE_SIZE 4096 /* 4K */
 /*
- * These bit values are intended for use in the 3rd parameter to the [vedis_open()] interface
- * and in the 4th parameter to the xOpen method of the [vedis_vfs] object.
+ * Default maximum number of unreferenced pages kept in memory by the pager.
  */
-#define VEDIS_OPEN_READONLY         0x00000001  /* Read only mode. Ok for [vedis_open] */
-#define VEDIS_OPEN_READWRITE        0x00000002  /* Ok for [vedis_open] */
-#define VEDIS_OPEN_CREATE           0x00000004  /* Ok for [vedis_open] */
-#define VEDIS_OPEN_EXCLUSIVE        0x00000008  /* VFS only */
-#define VEDIS_OPEN_TEMP_DB          0x00000010  /* VFS only */
-#define VEDIS_OPEN_NOMUTEX          0x00000020  /* Ok for [vedis_open] */
-#define VEDIS_OPEN_OMIT_JOURNALING  0x00000040  /* Omit journaling for this database. Ok for [vedis_open] */
-#define VEDIS_OPEN_IN_MEMORY        0x00000080  /* An in memory database. Ok for [vedis_open]*/
-#define VEDIS_OPEN_MMAP             0x00000100  /* Obtain a memory view of the whole file. Ok for [vedis_open] */
+#ifndef VEDIS_DEFAULT_CACHE_PAGES
+# define VEDIS_DEFAULT_CACHE_PAGES 256
+#endif
 /*
  * Each vedis table (i.e.: Hash, Set, List, etc.) is identified by an instance
  * of the following structure.
@@ -1757,6 +1880,43 @@ struct vedis_table_entry
 #define VEDIS_TABLE_HASH 1
 #define VEDIS_TABLE_SET  2
 #define VEDIS_TABLE_LIST 3
+#define VEDIS_TABLE_ZSET 4
+#define VEDIS_TABLE_EXPIRE 5 /* Deadline index, see [vedis_kv_expire()] */
+/*
+ * A sorted set is a table whose entries hold the score of each member,
+ * packed as a big-endian IEEE double, together with a skiplist ordering
+ * the members by score. The skiplist lives in memory only and is built
+ * the first time the sorted set is used.
+ */
+#define VEDIS_ZSET_MAXLEVEL 32
+typedef struct vedis_zset_node vedis_zset_node;
+typedef struct vedis_zset_range vedis_zset_range;
+typedef struct vedis_zset vedis_zset;
+struct vedis_zset_node
+{
+	vedis_table_entry *pEntry;  /* Member */
+	double rScore;              /* Score of the member */
+	vedis_zset_node *pBackward; /* Previous node on the bottom level */
+	int nLevel;                 /* aLevel[] length */
+	struct vedis_zset_level{
+		vedis_zset_node *pForward; /* Next node on this level */
+		sxu32 nSpan;               /* Nodes between this one and pForward */
+	}aLevel[1];
+};
+struct vedis_zset
+{
+	vedis_zset_node *pHeader; /* Sentinel with VEDIS_ZSET_MAXLEVEL levels */
+	vedis_zset_node *pTail;   /* Member with the highest score */
+	sxu32 nLength;            /* Total members */
+	int nLevel;               /* Highest level in use */
+	sxu32 iRandom;            /* State of the level generator */
+};
+/* Score range of ZRANGEBYSCORE and ZCOUNT */
+struct vedis_zset_range
+{
+	double rMin,rMax;   /* Bounds */
+	int bMinEx,bMaxEx;  /* True if the bound is excluded */
+};
 /* hashmap.c */
 VEDIS_PRIVATE sxu32 vedisHashmapCount(vedis_hashmap *pMap);
 VEDIS_PRIVATE sxi32 vedisHashmapWalk(
@@ -1799,6 +1959,26 @@ VEDIS_PRIVATE int vedisTableDeleteRecord(vedis_table *pTable,vedis_value *pKey);
 VEDIS_PRIVATE  vedis_table * vedisTableChain(vedis_table *pEntry);
 VEDIS_PRIVATE  SyString * vedisTableName(vedis_table *pEntry);
 VEDIS_PRIVATE int vedisOnCommit(void *pUserData);
+VEDIS_PRIVATE void vedisOnRollback(vedis *pStore);
+VEDIS_PRIVATE int vedisTableStats(vedis *pStore,int *pTables,int *pDirty,int *pLast,vedis_int64 *pTotal);
+VEDIS_PRIVATE int vedisLazyTableStats(vedis *pStore,int *pPartial,vedis_int64 *pResident,vedis_int64 *pLoaded,vedis_int64 *pEvicted);
+VEDIS_PRIVATE int vedisDump(vedis *pStore,int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *),void *pUserData);
+VEDIS_PRIVATE double vedisZsetEntryScore(vedis_table_entry *pEntry);
+VEDIS_PRIVATE int vedisZsetAdd(vedis_table *pTable,vedis_value *pMember,double rScore,int bIncr,double *pScore,int *pNew);
+VEDIS_PRIVATE int vedisZsetRemove(vedis_table *pTable,vedis_value *pMember);
+VEDIS_PRIVATE vedis_table_entry * vedisZsetLookup(vedis_table *pTable,vedis_value *pMember);
+VEDIS_PRIVATE sxu32 vedisZsetRank(vedis_table *pTable,vedis_table_entry *pEntry);
+VEDIS_PRIVATE vedis_zset_node * vedisZsetNodeByRank(vedis_table *pTable,sxu32 nRank);
+VEDIS_PRIVATE vedis_zset_node * vedisZsetFirstInRange(vedis_table *pTable,const vedis_zset_range *pRange,sxu32 *pRank);
+VEDIS_PRIVATE vedis_zset_node * vedisZsetLastInRange(vedis_table *pTable,const vedis_zset_range *pRange,sxu32 *pRank);
+VEDIS_PRIVATE vedis_int64 vedisExpireNow(void);
+VEDIS_PRIVATE int vedisExpireCheck(vedis *pStore,const void *pKey,int nKeyLen);
+VEDIS_PRIVATE int vedisExpireIsDue(vedis *pStore,const void *pKey,int nKeyLen);
+VEDIS_PRIVATE int vedisExpireClear(vedis *pStore,const void *pKey,int nKeyLen);
+VEDIS_PRIVATE int vedisExpireSet(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 iDeadline);
+VEDIS_PRIVATE int vedisExpireDeadline(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 *pDeadline);
+VEDIS_PRIVATE int vedisExpireStep(vedis *pStore,int nMax,int *pExpired);
+VEDIS_PRIVATE int vedisExpireStats(vedis *pStore,vedis_int64 *pVolatile,vedis_int64 *pExpired);
 /* cmd.c */
 VEDIS_PRIVATE int vedisRegisterBuiltinCommands(vedis *pVedis);
 VEDIS_PRIVATE int vedisDeleteBuiltinCommands(vedis *pVedis);
@@ -1823,6 +2003,7 @@ VEDIS_PRIVATE sxi32 vedisMemObjToNull(vedis_value *pObj);
 VEDIS_PRIVATE sxi32 vedisMemObjStore(vedis_value *pSrc, vedis_value *pDest);
 /* parse.c */
 VEDIS_PRIVATE int vedisProcessInput(vedis *pVedis,const char *zInput,sxu32 nByte);
+VEDIS_PRIVATE int vedisExecArgv(vedis *pStore,const SyString *pName,int nArg,const char **azArg,const int *anArgLen,const int *aiType);
 VEDIS_PRIVATE SyBlob * VedisContextResultBuffer(vedis_context *pCtx);
 VEDIS_PRIVATE SyBlob * VedisContextWorkingBuffer(vedis_context *pCtx);
 /* api.c */
@@ -1878,7 +2059,14 @@ VEDIS_PRIVATE void vedisBitvecDestroy(Bitvec *p);
 VEDIS_PRIVATE int vedisInitCursor(vedis *pDb,vedis_kv_cursor **ppOut);
 VEDIS_PRIVATE int vedisReleaseCursor(vedis *pDb,vedis_kv_cursor *pCur);
 VEDIS_PRIVATE int vedisPagerisMemStore(vedis *pStore);
+VEDIS_PRIVATE int vedisPagerisReadOnly(vedis *pStore);
 VEDIS_PRIVATE int vedisPagerSetCachesize(Pager *pPager,int mxPage);
+VEDIS_PRIVATE int vedisPagerSetPageSize(Pager *pPager,int iPageSize);
+VEDIS_PRIVATE int vedisPagerStats(Pager *pPager,vedis_pager_stats *pStats,int bReset);
+VEDIS_PRIVATE int vedisPagerTrackWorkingSet(Pager *pPager,int bEnable);
+VEDIS_PRIVATE int vedisPagerSetSyncMode(Pager *pPager,int iSyncMode);
+VEDIS_PRIVATE int vedisPagerSetJournalBuffer(Pager *pPager,int nBytes);
+VEDIS_PRIVATE int vedisPagerIoStats(Pager *pPager,vedis_io_stats *pStats,int bReset);
 VEDIS_PRIVATE int vedisPagerSetCommitCallback(Pager *pPager,int (*xCommit)(void *),void *pUserdata);
 VEDIS_PRIVATE int vedisPagerClose(Pager *pPager);
 VEDIS_PRIVATE int vedisPagerOpen(
@@ -1894,6 +2082,9 @@ VEDIS_PRIVATE int vedisPagerCommit(Pager *pPager);
 VEDIS_PRIVATE int vedisPagerRollback(Pager *pPager,int bResetKvEngine);
 VEDIS_PRIVATE void vedisPagerRandomString(Pager *pPager,char *zBuf,sxu32 nLen);
 VEDIS_PRIVATE sxu32 vedisPagerRandomNum(Pager *pPager);
+VEDIS_PRIVATE int vedisPagerBackupInit(Pager *pPager,const char *zDest,vedis_backup **ppOut);
+VEDIS_PRIVATE int vedisPagerBackupStep(vedis_backup *pBackup,int nPage,vedis_int64 *pRemaining,vedis_int64 *pTotal);
+VEDIS_PRIVATE int vedisPagerBackupFinish(vedis_backup *pBackup);
 /* lib.c */
 #ifdef VEDIS_ENABLE_HASH_CMD
 VEDIS_PRIVATE sxi32 SyBinToHexConsumer(const void *pIn, sxu32 nLen, ProcConsumer xConsumer, void *pConsumerData);
@@ -2010,6 +2201,7 @@ VEDIS_PRIVATE void SyDosTimeFormat(sxu32 nDosDate, Sytm *pOut);
  * Symisc Systems,S.U.A.R.L. Visit http://ph7.symisc.net/ for additional
  * information.
  */
+#define VEDIS_SCAN_SLOTS 4 /* Interleaved HSCAN/SSCAN iterations resumed in constant time */
 struct vedis_table
 {
 	vedis *pStore;  /* Store that own this instance */
@@ -2018,7 +2210,14 @@ struct vedis_table
 	vedis_table_entry *pFirst;     /* First inserted entry */
 	vedis_table_entry *pLast;      /* Last inserted entry */
 	vedis_table_entry *pCur;       /* Current entry */
+	vedis_table_entry *apScan[VEDIS_SCAN_SLOTS]; /* Entries to resume the last HSCAN/SSCAN iterations from */
+	sxi64 aScanCursor[VEDIS_SCAN_SLOTS];         /* Cursor values associated with apScan[] (0 if none) */
+	sxu32 iScanSlot;               /* Slot of apScan[] to reuse next */
+	vedis_table_entry *pRange;     /* Entry following the last LRANGE, NULL once an entry is removed */
+	sxi64 iRange;                  /* Index of pRange */
 	sxu32 nEntry;                  /* Total entries */
+	sxu32 nTotal;                  /* Entries of a partial table, resident or not */
+	sxu32 nMaxResident;            /* Maximum resident entries of a partial table */
 	sxu32 nSize;                   /* apBucket[] length */
 	sxu32 (*xIntHash)(sxi64);      /* Hash function for int_keys */
 	sxu32 (*xBlobHash)(const void *, sxu32); /* Hash function for blob_keys */
@@ -2026,11 +2225,17 @@ struct vedis_table
 	sxi64 iNextIdx;               /* Next available automatically assigned index */
 	sxi32 iTableType;          /* Table type [i.e. Hash, Set, ...] */
 	sxu32 nLastID;             /* Last assigned ID */
+	vedis_zset *pZset;         /* Score index of a sorted set, built on first use */
 	vedis_table *pNext,*pPrev; /* Link to other tables */
 	vedis_table *pNextCol,*pPrevCol; /* Collision chain */
 };
 /* Table control flags */
 #define VEDIS_TABLE_DISK_LOAD 0x001 /* Decoding table entries from diks */
+#define VEDIS_TABLE_DIRTY     0x002 /* Header must be serialized on the next commit */
+#define VEDIS_TABLE_PARTIAL   0x004 /* Entries are loaded from disk on demand */
+#define VEDIS_TABLE_INDEXED   0x008 /* Entries are indexed by key on disk */
+#define VEDIS_TABLE_MARKED    0x010 /* The index marker is stored on disk */
+#define VEDIS_TABLE_DUMPED    0x020 /* Already reported by the running dump */
 /*
  * Default hash function for int [i.e; 64-bit integer] keys.
  */
@@ -2122,6 +2327,11 @@ static vedis_table_entry * vedisTableNewBlobNode(vedis_table *pTable, const void
 }
 /* Forward declaration */
 static int vedisTableEntrySerialize(vedis_table *pTable,vedis_table_entry *pEntry);
+static int vedisTableIndexEntry(vedis_table *pTable,vedis_table_entry *pEntry,int bDelete);
+static void vedisExpireReload(vedis *pStore);
+static sxi32 vedisTableLoadEntry(vedis_table *pTable,const void *pKey,sxu32 nKeyLen,vedis_table_entry **ppNode);
+static void vedisTableEvictEntries(vedis_table *pTable);
+static int vedisTableMaterialize(vedis_table *pTable);
 /*
  * link a hashmap node to the given bucket index (last argument to this function).
  */
@@ -2144,8 +2354,19 @@ static int vedisTableNodeLink(vedis_table *pTable, vedis_table_entry *pNode, sxu
 	}
 	pNode->nId = pTable->nLastID++;
 	++pTable->nEntry;
-	if( !vedisPagerisMemStore(pTable->pStore) && !(pTable->iFlags & VEDIS_TABLE_DISK_LOAD)){
-		rc = vedisTableEntrySerialize(pTable,pNode);
+	if( !(pTable->iFlags & VEDIS_TABLE_DISK_LOAD) ){
+		/* The record count and last ID changed */
+		pTable->iFlags |= VEDIS_TABLE_DIRTY;
+		if( !vedisPagerisMemStore(pTable->pStore) ){
+			rc = vedisTableEntrySerialize(pTable,pNode);
+			if( pTable->iFlags & VEDIS_TABLE_INDEXED ){
+				vedisTableIndexEntry(pTable,pNode,FALSE);
+			}
+		}
+		if( pTable->iFlags & VEDIS_TABLE_PARTIAL ){
+			pTable->nTotal++;
+			vedisTableEvictEntries(pTable);
+		}
 	}
 	return rc;
 }
@@ -2156,6 +2377,9 @@ static int vedisTableNodeLink(vedis_table *pTable, vedis_table_entry *pNode, sxu
 static void vedisTableUnlinkNode(vedis_table_entry *pNode)
 {
 	vedis_table *pTable = pNode->pTable;	
+	int i;
+	/* Entries that follow are shifted */
+	pTable->pRange = 0;
 	/* Unlink from the corresponding bucket */
 	if( pNode->pPrevCollide == 0 ){
 		pTable->apBucket[pNode->nHash & (pTable->nSize - 1)] = pNode->pNextCollide;
@@ -2172,6 +2396,12 @@ static void vedisTableUnlinkNode(vedis_table_entry *pNode)
 		/* Advance the node cursor */
 		pTable->pCur = pTable->pCur->pPrev; /* Reverse link */
 	}
+	for( i = 0 ; i < VEDIS_SCAN_SLOTS ; ++i ){
+		if( pTable->apScan[i] == pNode ){
+			/* Advance the scan cursor, the cursor value handed out stays valid */
+			pTable->apScan[i] = pNode->pPrev; /* Reverse link */
+		}
+	}
 	/* Unlink from the map list */
 	MACRO_LD_REMOVE(pTable->pLast, pNode);
 	/* Release the value */
@@ -2181,12 +2411,21 @@ static void vedisTableUnlinkNode(vedis_table_entry *pNode)
 	SyBlobRelease(&pNode->sData);
 	SyMemBackendPoolFree(&pTable->pStore->sMem, pNode);
 	pTable->nEntry--;
+	if( !(pTable->iFlags & VEDIS_TABLE_DISK_LOAD) ){
+		/* Removed, not evicted from a partial table */
+		pTable->iFlags |= VEDIS_TABLE_DIRTY;
+		if( pTable->iFlags & VEDIS_TABLE_PARTIAL ){
+			pTable->nTotal--;
+		}
+	}
 	if( pTable->nEntry < 1 ){
 		/* Free the hash-bucket */
 		SyMemBackendFree(&pTable->pStore->sMem, pTable->apBucket);
 		pTable->apBucket = 0;
 		pTable->nSize = 0;
 		pTable->pFirst = pTable->pLast = pTable->pCur = 0;
+		SyZero(pTable->apScan,sizeof(pTable->apScan));
+		SyZero(pTable->aScanCursor,sizeof(pTable->aScanCursor));
 	}
 }
 #define VEDIS_TABLE_FILL_FACTOR 3
@@ -2359,9 +2598,10 @@ static sxi32 vedisTableLookupBlobKey(
 {
 	vedis_table_entry *pNode;
 	sxu32 nHash;
+	int bLazy = (pMap->iFlags & (VEDIS_TABLE_PARTIAL|VEDIS_TABLE_DISK_LOAD)) == VEDIS_TABLE_PARTIAL;
 	if( pMap->nEntry < 1 ){
-		/* Don't bother hashing, there is no entry anyway */
-		return SXERR_NOTFOUND;
+		/* Don't bother hashing, there is no entry in memory anyway */
+		return bLazy ? vedisTableLoadEntry(pMap,pKey,nKeyLen,ppNode) : SXERR_NOTFOUND;
 	}
 	/* Hash the key first */
 	nHash = pMap->xBlobHash(pKey, nKeyLen);
@@ -2374,9 +2614,18 @@ static sxi32 vedisTableLookupBlobKey(
 		}
 		if( pNode->iType == VEDIS_TABLE_ENTRY_BLOB_NODE 
 			&& pNode->nHash == nHash
-			&& SyBlobLength(&pNode->xKey.sKey) == nKeyLen 
+			&& SyBlobLength(&pNode->xKey.sKey) == nKeyLen
 			&& SyMemcmp(SyBlobData(&pNode->xKey.sKey), pKey, nKeyLen) == 0 ){
 				/* Node found */
+				if( bLazy && pMap->pLast != pNode ){
+					/* Most recently used entry of a partial table */
+					if( pMap->pFirst == pNode ){
+						pMap->pFirst = pNode->pPrev;
+					}
+					MACRO_LD_REMOVE(pMap->pLast, pNode);
+					pNode->pNext = pNode->pPrev = 0;
+					MACRO_LD_PUSH(pMap->pLast, pNode);
+				}
 				if( ppNode ){
 					*ppNode = pNode;
 				}
@@ -2385,6 +2634,10 @@ static sxi32 vedisTableLookupBlobKey(
 		/* Follow the collision link */
 		pNode = pNode->pNextCollide;
 	}
+	if( bLazy ){
+		/* Not resident, look it up on disk */
+		return vedisTableLoadEntry(pMap,pKey,nKeyLen,ppNode);
+	}
 	/* No such entry */
 	return SXERR_NOTFOUND;
 }
@@ -2536,6 +2789,11 @@ IntKey:
 VEDIS_PRIVATE int VedisRemoveTableEntry(vedis_table *pTable,vedis_table_entry *pEntry)
 {
 	int rc = VEDIS_OK;
+	if( vedisPagerisReadOnly(pTable->pStore) ){
+		/* Tables are serialized on commit, so refuse the change right away */
+		vedisGenError(pTable->pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
+	}
 	if( !vedisPagerisMemStore(pTable->pStore) ){
 		SyBlob sWorker;
 		/* Remove the entry from disk */
@@ -2546,6 +2804,9 @@ VEDIS_PRIVATE int VedisRemoveTableEntry(vedis_table *pTable,vedis_table_entry *p
 		rc = vedisKvDelete(pTable->pStore,SyBlobData(&sWorker),(int)SyBlobLength(&sWorker));
 		/* Cleanup */
 		SyBlobRelease(&sWorker);
+		if( pTable->iFlags & VEDIS_TABLE_INDEXED ){
+			vedisTableIndexEntry(pTable,pEntry,TRUE);
+		}
 	}
 	vedisTableUnlinkNode(pEntry);
 	return rc;
@@ -2597,6 +2858,10 @@ VEDIS_PRIVATE int vedisTableDeleteRecord(vedis_table *pTable,vedis_value *pKey)
 VEDIS_PRIVATE int vedisTableInsertRecord(vedis_table *pTable,vedis_value *pKey,vedis_value *pData)
 {
 	int rc;
+	if( vedisPagerisReadOnly(pTable->pStore) ){
+		vedisGenError(pTable->pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
+	}
 	rc = vedisTableInsert(pTable,pKey,pData);
 	return rc;
 }
@@ -2605,13 +2870,15 @@ VEDIS_PRIVATE int vedisTableInsertRecord(vedis_table *pTable,vedis_value *pKey,v
  */
 VEDIS_PRIVATE sxu32 vedisTableLength(vedis_table *pTable)
 {
-	return pTable->nEntry;
+	return (pTable->iFlags & VEDIS_TABLE_PARTIAL) ? pTable->nTotal : pTable->nEntry;
 }
 /*
  * Point to the first entry in a given table.
  */
 VEDIS_PRIVATE void vedisTableReset(vedis_table *pTable)
 {
+	/* Iterating requires every entry */
+	vedisTableMaterialize(pTable);
 	/* Reset the loop cursor */
 	pTable->pCur = pTable->pFirst;
 }
@@ -2635,6 +2902,7 @@ VEDIS_PRIVATE vedis_table_entry * vedisTableNextEntry(vedis_table *pTable)
  */
 VEDIS_PRIVATE vedis_table_entry * vedisTableLastEntry(vedis_table *pTable)
 {
+	vedisTableMaterialize(pTable);
 	return pTable->nEntry > 0 ? pTable->pLast : 0 /* Empty list*/;
 }
 /*
@@ -2642,6 +2910,7 @@ VEDIS_PRIVATE vedis_table_entry * vedisTableLastEntry(vedis_table *pTable)
  */
 VEDIS_PRIVATE vedis_table_entry * vedisTableFirstEntry(vedis_table *pTable)
 {
+	vedisTableMaterialize(pTable);
 	return pTable->nEntry > 0 ? pTable->pFirst : 0 /* Empty list*/;
 }
 /*
@@ -2753,12 +3022,26 @@ static int vedisTableSerialize(vedis_table *pTable)
 	/* table header */
 	SyBlobAppendBig16(&sWorker,VEDIS_TABLE_MAGIC); /* Magic number */
 	SyBlobAppendBig32(&sWorker,pTable->nLastID);   /* Last assigned ID */
-	SyBlobAppendBig32(&sWorker,pTable->nEntry);    /* Total number of records  */
+	SyBlobAppendBig32(&sWorker,vedisTableLength(pTable));    /* Total number of records  */
 	/* Write the header */
 	rc = pMethods->xReplace(pEngine,SyBlobData(&sWorker),(int)nOfft,SyBlobDataAt(&sWorker,nOfft),SyBlobLength(&sWorker)-nOfft);
 	if( rc != VEDIS_OK ){
+		SyBlobRelease(&sWorker);
 		return rc;
 	}
+	if( (pTable->iFlags & (VEDIS_TABLE_INDEXED|VEDIS_TABLE_MARKED)) == VEDIS_TABLE_INDEXED ){
+		/* Record that the entries of this table are indexed by key */
+		SyBlobReset(&sWorker);
+		SyBlobFormat(&sWorker,"vx%d%u:%z",pTable->iTableType,SyStringLength(&pTable->sName),&pTable->sName);
+		nOfft = SyBlobLength(&sWorker);
+		SyBlobAppendBig16(&sWorker,VEDIS_TABLE_MAGIC);
+		rc = pMethods->xReplace(pEngine,SyBlobData(&sWorker),(int)nOfft,SyBlobDataAt(&sWorker,nOfft),SyBlobLength(&sWorker)-nOfft);
+		if( rc != VEDIS_OK ){
+			SyBlobRelease(&sWorker);
+			return rc;
+		}
+		pTable->iFlags |= VEDIS_TABLE_MARKED;
+	}
 	/* All done, clean up and return */
 	SyBlobRelease(&sWorker);
 	return VEDIS_OK;
@@ -2810,6 +3093,7 @@ static int vedisTableEntrySerialize(vedis_table *pTable,vedis_table_entry *pEntr
 }
 /*
  * On commit callback.
+ * Only the headers of the tables changed since the last commit are written.
  */
 VEDIS_PRIVATE int vedisOnCommit(void *pUserData)
 {
@@ -2821,18 +3105,67 @@ VEDIS_PRIVATE int vedisOnCommit(void *pUserData)
 	if( vedisPagerisMemStore(pStore) ){
 		return VEDIS_OK;
 	}
+	pStore->nTableCommit = 0;
 	pTable = pStore->pTableList;
 	for( n = 0 ; n < pStore->nTable ; ++n ){
-		/* Serialize this table */
-		rc = vedisTableSerialize(pTable);
-		if( rc != VEDIS_OK ){
-			return rc;
+		if( pTable->iFlags & VEDIS_TABLE_DIRTY ){
+			/* Serialize this table */
+			rc = vedisTableSerialize(pTable);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			pTable->iFlags &= ~VEDIS_TABLE_DIRTY;
+			pStore->nTableCommit++;
+			pStore->nTableCommitTotal++;
 		}
 		/* Point to the next entry */
 		pTable = pTable->pNext;
 	}
 	return VEDIS_OK;
 }
+/*
+ * The last transaction was rolled back or failed to commit, so the table
+ * headers written by vedisOnCommit() may have been discarded. Serialize
+ * every table on the next commit, and read the committed deadlines back.
+ */
+VEDIS_PRIVATE void vedisOnRollback(vedis *pStore)
+{
+	vedis_table *pTable;
+	sxu32 n;
+	pTable = pStore->pTableList;
+	for( n = 0 ; n < pStore->nTable ; ++n ){
+		pTable->iFlags |= VEDIS_TABLE_DIRTY;
+		if( pTable->iFlags & VEDIS_TABLE_INDEXED ){
+			pTable->iFlags &= ~VEDIS_TABLE_MARKED;
+		}
+		pTable = pTable->pNext;
+	}
+	/* Deadlines set by the transaction are gone from disk */
+	vedisExpireReload(pStore);
+}
+/*
+ * Fill in the number of tables loaded in memory, the number of tables
+ * that will be serialized on the next commit and the number of tables
+ * serialized by the last commit and since the handle was opened.
+ */
+VEDIS_PRIVATE int vedisTableStats(vedis *pStore,int *pTables,int *pDirty,int *pLast,vedis_int64 *pTotal)
+{
+	vedis_table *pTable;
+	sxu32 n;
+	int nDirty = 0;
+	pTable = pStore->pTableList;
+	for( n = 0 ; n < pStore->nTable ; ++n ){
+		if( pTable->iFlags & VEDIS_TABLE_DIRTY ){
+			nDirty++;
+		}
+		pTable = pTable->pNext;
+	}
+	*pTables = (int)pStore->nTable;
+	*pDirty = nDirty;
+	*pLast = (int)pStore->nTableCommit;
+	*pTotal = pStore->nTableCommitTotal;
+	return VEDIS_OK;
+}
 /*
  * Unserialize an on-disk table.
  */
@@ -2917,45 +3250,21 @@ static int vedisUnserializeEntry(vedis_table *pTable,const unsigned char *zPtr,s
 	return VEDIS_OK;
 }
 /*
- * Fetch a table from disk and load its entries.
+ * Load the entries of a table from disk.
  */
-static vedis_table * vedisTableLoadFromDisk(vedis *pStore,SyString *pName,int iType,sxu32 nHash)
+static void vedisTableLoadEntries(vedis_table *pTable,sxu32 nEntry)
 {
-	vedis_table *pTable;
+	vedis *pStore = pTable->pStore;
 	SyBlob sWorker;
-	sxu32 nLastID;
-	sxu32 nEntry;
-	sxu32 nByte;
 	sxu32 nOfft;
 	sxu32 nId;
 	sxu32 n;
 	int rc;
-	/* Make sure we are dealing with an on-disk data store */
-	if( vedisPagerisMemStore(pStore) ){
-		return 0;
-	}
-	/* Go fetch */
 	SyBlobInit(&sWorker,&pStore->sMem);
-	SyBlobFormat(&sWorker,"vt%d%z",iType,pName);
-	nOfft = SyBlobLength(&sWorker);
-	rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)nOfft,vedisDataConsumer,&sWorker);
-	if( rc != VEDIS_OK ){
-		goto fail;
-	}
-	nByte = SyBlobLength(&sWorker) - nOfft;
-	/* Unserialize the table */
-	nEntry = 0;
-	pTable = vedisTableUnserialize(pStore,pName,iType,nHash,(const unsigned char *)SyBlobDataAt(&sWorker,nOfft),nByte,&nEntry,&nLastID);
-	if( pTable == 0 ){
-		/* No such table */
-		goto fail;
-	}
 	pTable->iFlags |= VEDIS_TABLE_DISK_LOAD;
-	pTable->nLastID = nLastID;
-	/* Unserialize table entries */
 	n = nId = 0;
 	for( ;; ){
-		if( n >= nEntry ){
+		if( n >= nEntry || nId >= pTable->nLastID ){
 			break;
 		}
 		SyBlobReset(&sWorker);
@@ -2974,1392 +3283,2955 @@ static vedis_table * vedisTableLoadFromDisk(vedis *pStore,SyString *pName,int iT
 	SyBlobRelease(&sWorker);
 	/* Remove stale flags */
 	pTable->iFlags &= ~VEDIS_TABLE_DISK_LOAD;
-	/* All done */
-	return pTable;
-fail:
-	SyBlobRelease(&sWorker);
-	/* No such table */
-	return 0;
 }
 /*
- * Fetch a table and load its entries.
+ * Write (or remove) the on-disk index record mapping the key of a table
+ * entry to its unique ID, which lets the entry be loaded on demand.
  */
-VEDIS_PRIVATE vedis_table * vedisFetchTable(vedis *pDb,vedis_value *pName,int create_new,int iType)
+static int vedisTableIndexEntry(vedis_table *pTable,vedis_table_entry *pEntry,int bDelete)
 {
-	vedis_table *pTable;
-	const char *zName;
-	SyString sName;
-	sxu32 nHash;
-	int nByte;
-	/* Extract table name */
-	zName = vedis_value_to_string(pName,&nByte);
-	if( nByte < 1 ){
-		/* Invalid table name */
-		vedisGenError(pDb,"Invalid table name");
-		return 0;
-	}
-	SyStringInitFromBuf(&sName,zName,nByte);
-	/* Fetch table */
-	nHash = SyBinHash(sName.zString,sName.nByte);
-	pTable = pDb->apTable[nHash & (pDb->nTableSize - 1)];
-	for(;;){
-		if( pTable == 0 ){
-			break;
-		}
-		if( pTable->iTableType == iType && SyStringCmp(&sName,&pTable->sName,SyMemcmp) == 0 ){
-			/* Table found */
-			return pTable;
-		}
-		/* Point to the next entry */
-		pTable = pTable->pNext;
+	vedis *pStore = pTable->pStore;
+	vedis_kv_methods *pMethods;
+	vedis_kv_engine *pEngine;
+	SyBlob sWorker;
+	sxu32 nOfft;
+	int rc;
+	if( pEntry->iType != VEDIS_TABLE_ENTRY_BLOB_NODE ){
+		return VEDIS_OK;
 	}
-	/* Try to load from disk */
-	pTable = vedisTableLoadFromDisk(pDb,&sName,iType,nHash);
-	if( pTable ){
-		return pTable;
+	SyBlobInit(&sWorker,&pStore->sMem);
+	SyBlobFormat(&sWorker,"vx%d%u:%z",pTable->iTableType,SyStringLength(&pTable->sName),&pTable->sName);
+	SyBlobDup(&pEntry->xKey.sKey,&sWorker);
+	nOfft = SyBlobLength(&sWorker);
+	if( bDelete ){
+		rc = vedisKvDelete(pStore,SyBlobData(&sWorker),(int)nOfft);
+	}else{
+		pEngine = vedisPagerGetKvEngine(pStore);
+		pMethods = pEngine->pIo->pMethods;
+		SyBlobAppendBig32(&sWorker,pEntry->nId);
+		rc = pMethods->xReplace(pEngine,SyBlobData(&sWorker),(int)nOfft,SyBlobDataAt(&sWorker,nOfft),SyBlobLength(&sWorker) - nOfft);
 	}
-	if( !create_new ){
-		/* No such table */
-		return 0;
+	SyBlobRelease(&sWorker);
+	return rc;
+}
+/*
+ * Index every entry of a table loaded in full. The index marker is written
+ * by the next commit.
+ */
+static void vedisTableIndexEntries(vedis_table *pTable)
+{
+	vedis_table_entry *pEntry;
+	sxu32 n;
+	pEntry = pTable->pFirst;
+	for( n = 0 ; n < pTable->nEntry ; ++n ){
+		if( vedisTableIndexEntry(pTable,pEntry,FALSE) != VEDIS_OK ){
+			return;
+		}
+		pEntry = pEntry->pPrev; /* Reverse link */
 	}
-	/* fall through, create a new table */
-	pTable = vedisNewTable(pDb,&sName,iType,nHash);
-	if( !pTable ){
-		vedisGenOutofMem(pDb);
-		return 0;
+	pTable->iFlags |= VEDIS_TABLE_INDEXED|VEDIS_TABLE_DIRTY;
+}
+/*
+ * Evict the least recently used entries of a partial table until no more
+ * than its maximum number of entries are resident. Entries are written to
+ * disk as soon as they change, so evicted entries are simply released.
+ */
+static void vedisTableEvictEntries(vedis_table *pTable)
+{
+	pTable->iFlags |= VEDIS_TABLE_DISK_LOAD;
+	while( pTable->nEntry > pTable->nMaxResident && pTable->pFirst != pTable->pLast ){
+		vedisTableUnlinkNode(pTable->pFirst);
+		pTable->pStore->nLazyEvict++;
 	}
-	return pTable;
+	pTable->iFlags &= ~VEDIS_TABLE_DISK_LOAD;
 }
 /*
- * Return the name of the given table.
+ * Load a single entry of a partial table from disk.
  */
-VEDIS_PRIVATE  SyString * vedisTableName(vedis_table *pEntry)
+static sxi32 vedisTableLoadEntry(vedis_table *pTable,const void *pKey,sxu32 nKeyLen,vedis_table_entry **ppNode)
 {
-	return &pEntry->sName;
+	vedis *pStore = pTable->pStore;
+	vedis_table_entry *pEntry;
+	SyBlob sWorker;
+	sxu32 nOfft;
+	sxu32 nId;
+	int rc;
+	SyBlobInit(&sWorker,&pStore->sMem);
+	/* Resolve the unique ID of the entry first */
+	SyBlobFormat(&sWorker,"vx%d%u:%z",pTable->iTableType,SyStringLength(&pTable->sName),&pTable->sName);
+	SyBlobAppend(&sWorker,pKey,nKeyLen);
+	nOfft = SyBlobLength(&sWorker);
+	rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)nOfft,vedisDataConsumer,&sWorker);
+	if( rc != VEDIS_OK || SyBlobLength(&sWorker) - nOfft != sizeof(sxu32) ){
+		SyBlobRelease(&sWorker);
+		return SXERR_NOTFOUND;
+	}
+	SyBigEndianUnpack32((const unsigned char *)SyBlobDataAt(&sWorker,nOfft),&nId);
+	/* Read the entry */
+	SyBlobReset(&sWorker);
+	SyBlobFormat(&sWorker,"vt%z%d%u",&pTable->sName,pTable->iTableType,nId);
+	nOfft = SyBlobLength(&sWorker);
+	rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)nOfft,vedisDataConsumer,&sWorker);
+	if( rc != VEDIS_OK ){
+		SyBlobRelease(&sWorker);
+		return SXERR_NOTFOUND;
+	}
+	pTable->iFlags |= VEDIS_TABLE_DISK_LOAD;
+	pEntry = pTable->pLast;
+	vedisUnserializeEntry(pTable,(const unsigned char *)SyBlobDataAt(&sWorker,nOfft),SyBlobLength(&sWorker) - nOfft);
+	pTable->iFlags &= ~VEDIS_TABLE_DISK_LOAD;
+	SyBlobRelease(&sWorker);
+	if( pTable->pLast == pEntry || pTable->pLast->nId != nId ){
+		/* Corrupt entry */
+		return SXERR_NOTFOUND;
+	}
+	pEntry = pTable->pLast;
+	pStore->nLazyLoad++;
+	vedisTableEvictEntries(pTable);
+	if( ppNode ){
+		*ppNode = pEntry;
+	}
+	return SXRET_OK;
 }
 /*
- * Return the next table on the chain.
+ * Load every entry of a partial table, which is needed before iterating
+ * over the table.
  */
-VEDIS_PRIVATE  vedis_table * vedisTableChain(vedis_table *pEntry)
+static int vedisTableMaterialize(vedis_table *pTable)
 {
-	return pEntry->pNext;
+	if( !(pTable->iFlags & VEDIS_TABLE_PARTIAL) ){
+		return VEDIS_OK;
+	}
+	/* Release the resident entries */
+	pTable->iFlags |= VEDIS_TABLE_DISK_LOAD;
+	while( pTable->nEntry > 0 ){
+		vedisTableUnlinkNode(pTable->pFirst);
+	}
+	pTable->iFlags &= ~(VEDIS_TABLE_PARTIAL|VEDIS_TABLE_DISK_LOAD);
+	vedisTableLoadEntries(pTable,pTable->nTotal);
+	pTable->nTotal = 0;
+	return VEDIS_OK;
 }
 /*
- * ----------------------------------------------------------
- * File: parse.c
- * MD5: 90f0b67cbdc5dc75d39c2ce4f9ba3edd
- * ----------------------------------------------------------
+ * Count the partial tables and their resident entries.
  */
+VEDIS_PRIVATE int vedisLazyTableStats(vedis *pStore,int *pPartial,vedis_int64 *pResident,vedis_int64 *pLoaded,vedis_int64 *pEvicted)
+{
+	vedis_table *pTable;
+	vedis_int64 nResident = 0;
+	int nPartial = 0;
+	sxu32 n;
+	pTable = pStore->pTableList;
+	for( n = 0 ; n < pStore->nTable ; ++n ){
+		if( pTable->iFlags & VEDIS_TABLE_PARTIAL ){
+			nPartial++;
+			nResident += pTable->nEntry;
+		}
+		pTable = pTable->pNext;
+	}
+	*pPartial = nPartial;
+	*pResident = nResident;
+	*pLoaded = pStore->nLazyLoad;
+	*pEvicted = pStore->nLazyEvict;
+	return VEDIS_OK;
+}
 /*
- * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
- * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
- * Version 1.2.6
- * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
- * please contact Symisc Systems via:
- *       legal@symisc.net
- *       licensing@symisc.net
- *       contact@symisc.net
- * or visit:
- *      http://vedis.symisc.net/
+ * State of a dump, see [vedis_dump()].
  */
-/* $SymiscID: parse.c v1.3 Win7 2013-07-08 05:42 stable <chm@symisc.net> $ */
-#ifndef VEDIS_AMALGAMATION
-#include "vedisInt.h"
-#endif
-/* Vedis command Lexer & parser */
+typedef struct vedis_dump_ctx vedis_dump_ctx;
+struct vedis_dump_ctx
+{
+	vedis *pStore;        /* Database being dumped */
+	int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *); /* Record callback */
+	void *pUserData;      /* Last argument to xRecord() */
+	int bStarted;         /* The start of the current table was reported */
+};
 /*
- * Tokenize a raw input.
- * Get a single low-level token from the input file. Update the stream pointer so that
- * it points to the first character beyond the extracted token.
+ * Look up a table held in memory, without loading it from disk.
  */
-static sxi32 vedisTokenizeInput(SyStream *pStream,SyToken *pToken,void *pUserData,void *pCtxData)
+static vedis_table * vedisResidentTable(vedis *pStore,SyString *pName,int iType)
 {
-	const unsigned char *zIn;
-	SyString *pStr;
-	sxi32 c;
-	/* Ignore leading white spaces */
-	while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisSpace(pStream->zText[0]) ){
-		/* Advance the stream cursor */
-		if( pStream->zText[0] == '\n' ){
-			/* Update line counter */
-			pStream->nLine++;
-		}
-		pStream->zText++;
-	}
-	if( pStream->zText >= pStream->zEnd ){
-		/* End of input reached */
-		return SXERR_EOF;
-	}
-	/* Record token starting position and line */
-	pToken->nLine = pStream->nLine;
-	pToken->pUserData = 0;
-	pStr = &pToken->sData;
-	SyStringInitFromBuf(pStr, pStream->zText, 0);
-	if( pStream->zText[0] == ';' ){
-		pStream->zText++;
-		/* A stream of semi-colons */
-		while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && pStream->zText[0] == ';' ){
-			pStream->zText++;
-		}
-		/* Mark the token */
-		pToken->nType = VEDIS_TK_SEMI;
-		/* Record token length */
-		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
-	}else if( SyisDigit(pStream->zText[0]) ){
-		pStream->zText++;
-		/* Decimal digit stream */
-		while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
-			pStream->zText++;
-		}
-		/* Mark the token as integer until we encounter a real number */
-		pToken->nType = VEDIS_TK_INTEGER;
-		if( pStream->zText < pStream->zEnd ){
-			c = pStream->zText[0];
-			if( c == '.' ){
-				/* Real number */
-				pStream->zText++;
-				while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
-					pStream->zText++;
-				}
-				if( pStream->zText < pStream->zEnd ){
-					c = pStream->zText[0];
-					if( c=='e' || c=='E' ){
-						pStream->zText++;
-						if( pStream->zText < pStream->zEnd ){
-							c = pStream->zText[0];
-							if( (c =='+' || c=='-') && &pStream->zText[1] < pStream->zEnd  &&
-								pStream->zText[1] < 0xc0 && SyisDigit(pStream->zText[1]) ){
-									pStream->zText++;
-							}
-							while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
-								pStream->zText++;
-							}
-						}
-					}
-				}
-				pToken->nType = VEDIS_TK_REAL;
-			}else if( c=='e' || c=='E' ){
-				SXUNUSED(pUserData); /* Prevent compiler warning */
-				SXUNUSED(pCtxData);
-				pStream->zText++;
-				if( pStream->zText < pStream->zEnd ){
-					c = pStream->zText[0];
-					if( (c =='+' || c=='-') && &pStream->zText[1] < pStream->zEnd  &&
-						pStream->zText[1] < 0xc0 && SyisDigit(pStream->zText[1]) ){
-							pStream->zText++;
-					}
-					while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
-						pStream->zText++;
-					}
-				}
-				pToken->nType = VEDIS_TK_REAL;
-			}else if( c == 'x' || c == 'X' ){
-				/* Hex digit stream */
-				pStream->zText++;
-				while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisHex(pStream->zText[0]) ){
-					pStream->zText++;
-				}
-			}else if(c  == 'b' || c == 'B' ){
-				/* Binary digit stream */
-				pStream->zText++;
-				while( pStream->zText < pStream->zEnd && (pStream->zText[0] == '0' || pStream->zText[0] == '1') ){
-					pStream->zText++;
-				}
-			}
-		}
-		/* Record token length */
-		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
-	}else if( pStream->zText[0] == '"' || pStream->zText[0] == '\'' ){
-		/* Quoted string */
-		c = pStream->zText[0];
-		pStream->zText++;
-		pStr->zString++;
-		while( pStream->zText < pStream->zEnd ){
-			if( pStream->zText[0] == c  ){
-				if( pStream->zText[-1] != '\\' ){
-					break;
-				}
-			}
-			if( pStream->zText[0] == '\n' ){
-				pStream->nLine++;
-			}
-			pStream->zText++;
-		}
-		/* Record token length and type */
-		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
-		pToken->nType = VEDIS_TK_STREAM;
-		/* Jump the trailing quote */
-		pStream->zText++;
-	}else{
-		/* The following code fragment is taken verbatim from the xPP source tree.
-		 * xPP is a modern embeddable macro processor with advanced features useful for
-		 * application seeking for a production quality, ready to use macro processor.
-		 * xPP is a widely used library developed and maintened by Symisc Systems.
-		 * You can reach the xPP home page by following this link:
-		 * http://symisc.net/
-		 */
-		/* Isolate UTF-8 or alphanumeric stream */
-		if( pStream->zText[0] < 0xc0 ){
-			pStream->zText++;
-		}
-		for(;;){
-			zIn = pStream->zText;
-			if( zIn[0] >= 0xc0 ){
-				zIn++;
-				/* UTF-8 stream */
-				while( zIn < pStream->zEnd && ((zIn[0] & 0xc0) == 0x80) ){
-					zIn++;
-				}
-			}
-			/* Delimit the stream */
-			while( zIn < pStream->zEnd && zIn[0] < 0xc0 && zIn[0] != ';' && !SyisSpace(zIn[0]) ){
-				zIn++;
-			}
-			if( zIn == pStream->zText ){
-				/* End of the stream */
-				break;
-			}
-			/* Synchronize pointers */
-			pStream->zText = zIn;
+	vedis_table *pTable;
+	pTable = pStore->apTable[SyBinHash(pName->zString,pName->nByte) & (pStore->nTableSize - 1)];
+	for(;;){
+		if( pTable == 0 || (pTable->iTableType == iType && SyStringCmp(pName,&pTable->sName,SyMemcmp) == 0) ){
+			return pTable;
 		}
-		/* Record token length */
-		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
-		/* A simple identifier */
-		pToken->nType = VEDIS_TK_STREAM;
+		pTable = pTable->pNextCol;
 	}
-	/* Tell the upper-layer to save the extracted token for later processing */
-	return SXRET_OK;
 }
 /*
- * Tokenize a raw input. 
+ * Fetch the raw value of a record of the KV store into a blob.
  */
-static sxi32 vedisTokenize(const char *zInput,sxu32 nLen,SySet *pOut)
+static int vedisTableFetchRecord(vedis *pStore,SyBlob *pWorker,sxu32 *pOfft)
 {
-	SyLex sLexer;
-	sxi32 rc;
-	/* Initialize the lexer */
-	rc = SyLexInit(&sLexer, &(*pOut),vedisTokenizeInput,0);
-	if( rc != SXRET_OK ){
-		return rc;
-	}
-	/* Tokenize input */
-	rc = SyLexTokenizeInput(&sLexer, zInput, nLen, 0, 0, 0);
-	/* Release the lexer */
-	SyLexRelease(&sLexer);
-	/* Tokenization result */
-	return rc;
+	*pOfft = SyBlobLength(pWorker);
+	return vedisKvFetchCallback(pStore,SyBlobData(pWorker),(int)*pOfft,vedisDataConsumer,pWorker);
 }
 /*
- * Vedis parser state is recorded in an instance of the following structure.
+ * Tell whether a table of the given type and name exists, either held in
+ * memory or as a header on disk.
  */
-typedef struct vedis_gen_state vedis_gen_state;
-struct vedis_gen_state
+static int vedisTableExists(vedis *pStore,const unsigned char *zName,sxu32 nName,int iType)
 {
-	SyToken *pIn;  /* Token stream */
-	SyToken *pEnd; /* End of the token stream */
-	vedis *pVedis;    /* Vedis handle  */
-};
-static int vedisInitContext(vedis_context *pCtx,vedis *pVedis,vedis_cmd *pCmd)
+	SyString sName;
+	SyBlob sWorker;
+	sxu16 iMagic;
+	sxu32 nOfft;
+	int bExists;
+	SyStringInitFromBuf(&sName,zName,nName);
+	if( vedisResidentTable(pStore,&sName,iType) ){
+		return TRUE;
+	}
+	SyBlobInit(&sWorker,&pStore->sMem);
+	SyBlobFormat(&sWorker,"vt%d%z",iType,&sName);
+	bExists = FALSE;
+	if( vedisTableFetchRecord(pStore,&sWorker,&nOfft) == VEDIS_OK && SyBlobLength(&sWorker) - nOfft == 10 ){
+		SyBigEndianUnpack16((const unsigned char *)SyBlobDataAt(&sWorker,nOfft),&iMagic);
+		bExists = iMagic == VEDIS_TABLE_MAGIC;
+	}
+	SyBlobRelease(&sWorker);
+	return bExists;
+}
+/*
+ * Tell whether the entry of a table with the given unique ID is stored on
+ * disk under the given key.
+ */
+static int vedisTableEntryHasKey(vedis *pStore,const unsigned char *zName,sxu32 nName,int iType,sxu32 nId,const unsigned char *zKey,sxu32 nKey)
 {
-	pCtx->pVedis = pVedis;
-	pCtx->pCmd = pCmd;
-	SyBlobInit(&pCtx->sWorker,&pVedis->sMem);
-	SySetInit(&pCtx->sVar, &pVedis->sMem, sizeof(vedis_value *));
-	pCtx->pRet = &pVedis->sResult;
-	/* Invalidate any prior representation */
-	vedisMemObjRelease(pCtx->pRet);
-	return VEDIS_OK;
+	const unsigned char *zPtr;
+	SyString sName;
+	SyBlob sWorker;
+	sxu32 nOfft,nByte,nKeyLen;
+	int bMatch;
+	SyStringInitFromBuf(&sName,zName,nName);
+	SyBlobInit(&sWorker,&pStore->sMem);
+	SyBlobFormat(&sWorker,"vt%z%d%u",&sName,iType,nId);
+	bMatch = FALSE;
+	if( vedisTableFetchRecord(pStore,&sWorker,&nOfft) == VEDIS_OK ){
+		/* Magic, unique ID, key type, key length, data length, key and data */
+		zPtr = (const unsigned char *)SyBlobDataAt(&sWorker,nOfft);
+		nByte = SyBlobLength(&sWorker) - nOfft;
+		if( nByte >= 15 ){
+			SyBigEndianUnpack32(&zPtr[7],&nKeyLen);
+			bMatch = nKeyLen == nKey && (sxu64)nKeyLen + 15 <= nByte && SyMemcmp(&zPtr[15],zKey,nKey) == 0;
+		}
+	}
+	SyBlobRelease(&sWorker);
+	return bMatch;
 }
-VEDIS_PRIVATE SyBlob * VedisContextResultBuffer(vedis_context *pCtx)
+/*
+ * Tell whether a record of the KV store holds the header, an entry or the
+ * index of a table, rather than a key/value pair stored by the user.
+ * Tables share the key space with the user, so the whole key layout is
+ * checked against the value and against a table that actually exists:
+ *
+ *   "vt<type><name>"            Table header.
+ *   "vt<name><type><id>"        Table entry, the ID is part of the value.
+ *   "vx<type><len>:<name>"      Index marker.
+ *   "vx<type><len>:<name><key>" Index record, holds the ID of the entry.
+ */
+static int vedisIsTableRecord(vedis *pStore,const unsigned char *zKey,sxu32 nKey,const unsigned char *zData,sxu32 nData)
 {
-	return &pCtx->pRet->sBlob;
+	const unsigned char *zName,*zEnd;
+	char zId[16];
+	sxu32 nName,nId,nDigit;
+	sxu16 iMagic = 0;
+	int iType;
+	if( nKey < 4 || zKey[0] != 'v' || (zKey[1] != 't' && zKey[1] != 'x') || vedisPagerisMemStore(pStore) ){
+		/* Tables of in-memory databases are never written to the KV store */
+		return FALSE;
+	}
+	if( nData >= sizeof(sxu16) ){
+		SyBigEndianUnpack16(zData,&iMagic);
+	}
+	if( zKey[1] == 't' ){
+		if( iMagic == VEDIS_TABLE_MAGIC && nData == 10 ){
+			/* Table header */
+			iType = zKey[2] - '0';
+			return iType >= VEDIS_TABLE_HASH && iType <= VEDIS_TABLE_EXPIRE && vedisTableExists(pStore,&zKey[3],nKey - 3,iType);
+		}
+		if( iMagic != VEDIS_TABLE_ENTRY_MAGIC || nData < 15 ){
+			return FALSE;
+		}
+		/* Table entry: the key must end with the type and the ID held by the value */
+		SyBigEndianUnpack32(&zData[2],&nId);
+		nDigit = 0;
+		do{
+			zId[sizeof(zId) - 1 - nDigit++] = (char)('0' + nId % 10);
+			nId /= 10;
+		}while( nId > 0 );
+		if( nKey < 4 + nDigit || SyMemcmp(&zKey[nKey - nDigit],&zId[sizeof(zId) - nDigit],nDigit) != 0 ){
+			return FALSE;
+		}
+		iType = zKey[nKey - nDigit - 1] - '0';
+		return iType >= VEDIS_TABLE_HASH && iType <= VEDIS_TABLE_EXPIRE && vedisTableExists(pStore,&zKey[2],nKey - nDigit - 3,iType);
+	}
+	/* Index marker or index record: parse the type and the length of the name */
+	iType = zKey[2] - '0';
+	if( iType != VEDIS_TABLE_HASH && iType != VEDIS_TABLE_SET ){
+		return FALSE;
+	}
+	zName = &zKey[3];
+	zEnd = &zKey[nKey];
+	nName = 0;
+	while( zName < zEnd && zName[0] >= '0' && zName[0] <= '9' && nName < nKey ){
+		nName = nName * 10 + (zName[0] - '0');
+		zName++;
+	}
+	if( zName == &zKey[3] || zName >= zEnd || zName[0] != ':' || nName < 1 || nName > (sxu32)(zEnd - &zName[1]) ){
+		return FALSE;
+	}
+	zName++;
+	if( &zName[nName] == zEnd ){
+		/* Index marker */
+		return iMagic == VEDIS_TABLE_MAGIC && nData == sizeof(sxu16) && vedisTableExists(pStore,zName,nName,iType);
+	}
+	if( nData != sizeof(sxu32) ){
+		return FALSE;
+	}
+	/* Index record: the entry it points to must be stored under the same key */
+	SyBigEndianUnpack32(zData,&nId);
+	return vedisTableEntryHasKey(pStore,zName,nName,iType,nId,&zName[nName],(sxu32)(zEnd - &zName[nName]));
 }
-VEDIS_PRIVATE SyBlob * VedisContextWorkingBuffer(vedis_context *pCtx)
+/*
+ * Report a single table entry, preceded by the start of its table if this
+ * is the first entry reported for the table.
+ */
+static int vedisDumpEntry(vedis_dump_ctx *pCtx,vedis_table *pTable,SyString *pName,int iTableType,
+	const void *pKey,sxu32 nKey,const void *pData,sxu32 nData)
 {
-	return &pCtx->sWorker;
+	int rc;
+	if( iTableType == VEDIS_TABLE_EXPIRE ){
+		/* Deadline of a key, reported without the start of a table */
+		rc = pCtx->xRecord(VEDIS_DUMP_EXPIRE,pKey,(int)nKey,pData,(vedis_int64)nData,pCtx->pUserData);
+		return rc == VEDIS_OK ? VEDIS_OK : VEDIS_ABORT;
+	}
+	if( !pCtx->bStarted ){
+		rc = pCtx->xRecord(iTableType == VEDIS_TABLE_HASH ? VEDIS_DUMP_HASH :
+			(iTableType == VEDIS_TABLE_SET ? VEDIS_DUMP_SET :
+			(iTableType == VEDIS_TABLE_ZSET ? VEDIS_DUMP_ZSET : VEDIS_DUMP_LIST)),
+			(const void *)pName->zString,(int)pName->nByte,0,0,pCtx->pUserData);
+		if( rc != VEDIS_OK ){
+			return VEDIS_ABORT;
+		}
+		pCtx->bStarted = TRUE;
+	}
+	if( iTableType == VEDIS_TABLE_LIST ){
+		/* Lists only hold values */
+		pKey = 0;
+		nKey = 0;
+	}else if( iTableType == VEDIS_TABLE_SET ){
+		/* Sets only hold members */
+		pData = 0;
+		nData = 0;
+	}
+	rc = pCtx->xRecord(VEDIS_DUMP_ENTRY,pKey,(int)nKey,pData,(vedis_int64)nData,pCtx->pUserData);
+	return rc == VEDIS_OK ? VEDIS_OK : VEDIS_ABORT;
+	(void)pTable;
 }
-static void vedisReleaseContext(vedis_context *pCtx)
+/*
+ * Report the entries of a table held in memory.
+ */
+static int vedisDumpResidentTable(vedis_dump_ctx *pCtx,vedis_table *pTable)
 {
+	vedis_table_entry *pEntry;
 	sxu32 n;
-	if( SySetUsed(&pCtx->sVar) > 0 ){
-		/* Context alloacated values */
-		vedis_value **apObj = (vedis_value **)SySetBasePtr(&pCtx->sVar);
-		for( n = 0 ; n < SySetUsed(&pCtx->sVar) ; ++n ){
-			if( apObj[n] == 0 ){
-				/* Already released */
-				continue;
+	int rc;
+	pCtx->bStarted = FALSE;
+	pEntry = pTable->pFirst;
+	for( n = 0 ; n < pTable->nEntry ; ++n ){
+		if( pTable->iTableType == VEDIS_TABLE_LIST || pEntry->iType == VEDIS_TABLE_ENTRY_BLOB_NODE ){
+			rc = vedisDumpEntry(pCtx,pTable,&pTable->sName,pTable->iTableType,
+				SyBlobData(&pEntry->xKey.sKey),pEntry->iType == VEDIS_TABLE_ENTRY_BLOB_NODE ? SyBlobLength(&pEntry->xKey.sKey) : 0,
+				SyBlobData(&pEntry->sData),SyBlobLength(&pEntry->sData));
+			if( rc != VEDIS_OK ){
+				return rc;
 			}
-			vedisMemObjRelease(apObj[n]);
-			SyMemBackendPoolFree(&pCtx->pVedis->sMem, apObj[n]);
 		}
-		SySetRelease(&pCtx->sVar);
+		pEntry = pEntry->pPrev; /* Reverse link */
 	}
-	SyBlobRelease(&pCtx->sWorker);
+	return VEDIS_OK;
 }
-static void vedisObjContainerDestroy(SySet *aValues,vedis *pVedis)
+/*
+ * Report the entries of a table by reading them from disk, in the order
+ * they were inserted, without loading the table in memory.
+ */
+static int vedisDumpDiskTable(vedis_dump_ctx *pCtx,SyString *pName,int iType,sxu32 nLastID)
 {
-	vedis_value **apValues = (vedis_value **)SySetBasePtr(aValues);
-	sxu32 n;
-	for( n = 0 ; n < SySetUsed(aValues) ; ++n ){
-		vedis_value *pValue = apValues[n];
-		/* Destroy the object */
-		vedisObjectValueDestroy(pVedis,pValue);
+	vedis *pStore = pCtx->pStore;
+	const unsigned char *zPtr;
+	SyBlob sWorker;
+	sxu32 nKey,nData;
+	sxu32 nOfft,nByte;
+	sxu32 nId;
+	int rc = VEDIS_OK;
+	SyBlobInit(&sWorker,&pStore->sMem);
+	pCtx->bStarted = FALSE;
+	for( nId = 0 ; nId < nLastID ; ++nId ){
+		SyBlobReset(&sWorker);
+		SyBlobFormat(&sWorker,"vt%z%d%u",pName,iType,nId);
+		nOfft = SyBlobLength(&sWorker);
+		rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)nOfft,vedisDataConsumer,&sWorker);
+		if( rc == VEDIS_NOTFOUND ){
+			/* Removed entry */
+			rc = VEDIS_OK;
+			continue;
+		}else if( rc != VEDIS_OK ){
+			break;
+		}
+		/* Magic, unique ID, key type, key length, data length, key and data */
+		zPtr = (const unsigned char *)SyBlobDataAt(&sWorker,nOfft);
+		nByte = SyBlobLength(&sWorker) - nOfft;
+		if( nByte < 15 ){
+			continue;
+		}
+		SyBigEndianUnpack32(&zPtr[7],&nKey);
+		SyBigEndianUnpack32(&zPtr[11],&nData);
+		if( (sxu64)nKey + nData + 15 > nByte ){
+			/* Corrupt entry */
+			continue;
+		}
+		if( zPtr[6] != VEDIS_TABLE_ENTRY_BLOB_NODE && iType != VEDIS_TABLE_LIST ){
+			continue;
+		}
+		rc = vedisDumpEntry(pCtx,0,pName,iType,&zPtr[15],nKey,&zPtr[15 + nKey],nData);
+		if( rc != VEDIS_OK ){
+			break;
+		}
 	}
-	SySetRelease(aValues);
+	SyBlobRelease(&sWorker);
+	return rc;
 }
-static int vedisExec(vedis_gen_state *pGen)
+/*
+ * Report every key/value pair stored by the user, then the entries of
+ * every table, whether it is held in memory or only on disk.
+ */
+VEDIS_PRIVATE int vedisDump(vedis *pStore,int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *),void *pUserData)
 {
-	vedis_value *pValue;
-	vedis_context sCtx;
-	vedis_cmd *pCmd;
-	vedis *pStore;
-	SySet sValue;
+	vedis_kv_methods *pMethods;
+	vedis_kv_cursor *pCur;
+	vedis_dump_ctx sCtx;
+	vedis_table *pTable;
+	SyBlob sKey,sData,sTables;
+	const unsigned char *zPtr,*zEnd;
+	SyString sName;
+	sxu32 nLastID,nByte;
+	sxu16 iMagic;
+	sxu32 n;
 	int rc;
-	/* Get the target command */
-	if( !(pGen->pIn->nType & VEDIS_TK_STREAM) ){
-		vedisGenError(pGen->pVedis,"Invalid Vedis command");
-		return SXERR_INVALID;
-	}
-	pStore = pGen->pVedis;
-	/* Extract it */
-	pCmd = vedisFetchCommand(pStore,&pGen->pIn->sData);
-	if( pCmd == 0 ){
-		vedisGenErrorFormat(pStore,"Unknown Vedis command: '%z'",&pGen->pIn->sData);
-		return SXERR_UNKNOWN;
+	sCtx.pStore = pStore;
+	sCtx.xRecord = xRecord;
+	sCtx.pUserData = pUserData;
+	sCtx.bStarted = FALSE;
+	pMethods = vedisPagerGetKvEngine(pStore)->pIo->pMethods;
+	rc = vedisInitCursor(pStore,&pCur);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	pGen->pIn++;
-	/* Collect command arguments */
-	SySetInit(&sValue,&pStore->sMem,sizeof(vedis_value *));
-	while( pGen->pIn < pGen->pEnd && (pGen->pIn->nType != VEDIS_TK_SEMI /*';'*/) ){
-		pValue = vedisNewObjectValue(pStore,pGen->pIn);
-		if( pValue ){
-			SySetPut(&sValue,(const void *)&pValue);
+	SyBlobInit(&sKey,&pStore->sMem);
+	SyBlobInit(&sData,&pStore->sMem);
+	/* Type, name length, name and last ID of the tables found on disk */
+	SyBlobInit(&sTables,&pStore->sMem);
+	/* Report the key/value pairs and collect the table headers */
+	rc = pMethods->xFirst(pCur);
+	while( rc == VEDIS_OK && pMethods->xValid(pCur) ){
+		SyBlobReset(&sKey);
+		SyBlobReset(&sData);
+		rc = pMethods->xKey(pCur,vedisDataConsumer,&sKey);
+		if( rc == VEDIS_OK ){
+			rc = pMethods->xData(pCur,vedisDataConsumer,&sData);
 		}
-		/* Point to the next token */
-		pGen->pIn++;
+		if( rc != VEDIS_OK ){
+			break;
+		}
+		zPtr = (const unsigned char *)SyBlobData(&sKey);
+		nByte = SyBlobLength(&sKey);
+		if( !vedisIsTableRecord(pStore,zPtr,nByte,(const unsigned char *)SyBlobData(&sData),SyBlobLength(&sData)) ){
+			rc = xRecord(VEDIS_DUMP_KV,zPtr,(int)nByte,SyBlobData(&sData),(vedis_int64)SyBlobLength(&sData),pUserData);
+			if( rc != VEDIS_OK ){
+				rc = VEDIS_ABORT;
+				break;
+			}
+		}else if( zPtr[1] == 't' && SyBlobLength(&sData) == 10 && zPtr[2] >= '1' && zPtr[2] <= '5' ){
+			SyBigEndianUnpack16((const unsigned char *)SyBlobData(&sData),&iMagic);
+			if( iMagic == VEDIS_TABLE_MAGIC ){
+				/* Table header: "vt" followed by the type and the name */
+				SyBlobAppend(&sTables,&zPtr[2],sizeof(char));
+				SyBlobAppendBig32(&sTables,nByte - 3);
+				SyBlobAppend(&sTables,&zPtr[3],nByte - 3);
+				SyBlobAppend(&sTables,SyBlobDataAt(&sData,2),sizeof(sxu32));
+			}
+		}
+		rc = pMethods->xNext(pCur);
 	}
-	/* Init the call context */
-	vedisInitContext(&sCtx,pStore,pCmd);
-	/* Invoke the command */
-	rc = pCmd->xCmd(&sCtx,(int)SySetUsed(&sValue),(vedis_value **)SySetBasePtr(&sValue));
-	if( rc == VEDIS_ABORT ){
-		vedisGenErrorFormat(pGen->pVedis,"Vedis command '%z' request an operation abort",&pCmd->sName);
-	}else{
+	if( rc == VEDIS_DONE || rc == VEDIS_NOTFOUND || rc == VEDIS_EOF ){
 		rc = VEDIS_OK;
 	}
-	/* Invoke any output consumer callback */
-	if( pStore->xResultConsumer && rc == VEDIS_OK ){
-		rc = pStore->xResultConsumer(sCtx.pRet,pStore->pUserData);
-		if( rc != VEDIS_ABORT ){
-			rc = VEDIS_OK;
+	vedisReleaseCursor(pStore,pCur);
+	/* Report the tables found on disk */
+	zPtr = (const unsigned char *)SyBlobData(&sTables);
+	zEnd = &zPtr[SyBlobLength(&sTables)];
+	while( rc == VEDIS_OK && zPtr < zEnd ){
+		int iType = zPtr[0] - '0';
+		SyBigEndianUnpack32(&zPtr[1],&nByte);
+		SyStringInitFromBuf(&sName,&zPtr[5],nByte);
+		SyBigEndianUnpack32(&zPtr[5 + nByte],&nLastID);
+		zPtr += 9 + nByte;
+		pTable = vedisResidentTable(pStore,&sName,iType);
+		if( pTable ){
+			pTable->iFlags |= VEDIS_TABLE_DUMPED;
+			if( !(pTable->iFlags & VEDIS_TABLE_PARTIAL) ){
+				rc = vedisDumpResidentTable(&sCtx,pTable);
+				continue;
+			}
+			/* Entries are loaded on demand, read them from disk */
+			nLastID = pTable->nLastID;
 		}
+		rc = vedisDumpDiskTable(&sCtx,&sName,iType,nLastID);
 	}
-	/* Cleanup */
-	vedisReleaseContext(&sCtx);
-	vedisObjContainerDestroy(&sValue,pGen->pVedis);
+	/* Report the tables that are only held in memory */
+	pTable = pStore->pTableList;
+	for( n = 0 ; n < pStore->nTable ; ++n ){
+		if( rc == VEDIS_OK && !(pTable->iFlags & VEDIS_TABLE_DUMPED) ){
+			rc = vedisDumpResidentTable(&sCtx,pTable);
+		}
+		pTable->iFlags &= ~VEDIS_TABLE_DUMPED;
+		pTable = pTable->pNext;
+	}
+	SyBlobRelease(&sKey);
+	SyBlobRelease(&sData);
+	SyBlobRelease(&sTables);
 	return rc;
 }
-
-VEDIS_PRIVATE int vedisProcessInput(vedis *pVedis,const char *zInput,sxu32 nByte)
+/*
+ * Fetch a table from disk and load its entries.
+ */
+static vedis_table * vedisTableLoadFromDisk(vedis *pStore,SyString *pName,int iType,sxu32 nHash)
 {
-	SySet sToken;
+	vedis_table *pTable;
+	SyBlob sWorker;
+	sxu32 nLastID;
+	sxu32 nEntry;
+	sxu32 nByte;
+	sxu32 nOfft;
 	int rc;
-	/* Prepare the tokenizer */
-	SySetInit(&sToken,&pVedis->sMem,sizeof(SyToken));
-	/* Tokenize the input */
-	rc = vedisTokenize(zInput,nByte,&sToken);
+	/* Make sure we are dealing with an on-disk data store */
+	if( vedisPagerisMemStore(pStore) ){
+		return 0;
+	}
+	/* Go fetch */
+	SyBlobInit(&sWorker,&pStore->sMem);
+	SyBlobFormat(&sWorker,"vt%d%z",iType,pName);
+	nOfft = SyBlobLength(&sWorker);
+	rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)nOfft,vedisDataConsumer,&sWorker);
 	if( rc != VEDIS_OK ){
 		goto fail;
 	}
-	rc = VEDIS_OK;
-	if( SySetUsed(&sToken) > 0 ){
-		vedis_gen_state sGen;
-		/* Init the parser state */
-		sGen.pIn = (SyToken *)SySetBasePtr(&sToken);
-		sGen.pEnd = &sGen.pIn[SySetUsed(&sToken)];
-		sGen.pVedis = pVedis;
-		/* Process the pipelined commands */
-		for(;;){
-			while( sGen.pIn < sGen.pEnd && sGen.pIn->nType == VEDIS_TK_SEMI ){
-				/* Discard leading and trailing semi-colons */
-				sGen.pIn++;
-			}
-			if( sGen.pIn >= sGen.pEnd ){
-				/* End of the vedis input */
-				break;
-			}
-			/* Execute the command if available */
-			rc = vedisExec(&sGen);
-			if( rc != VEDIS_OK ){
-				break;
-			}
+	nByte = SyBlobLength(&sWorker) - nOfft;
+	/* Unserialize the table */
+	nEntry = 0;
+	pTable = vedisTableUnserialize(pStore,pName,iType,nHash,(const unsigned char *)SyBlobDataAt(&sWorker,nOfft),nByte,&nEntry,&nLastID);
+	if( pTable == 0 ){
+		/* No such table */
+		goto fail;
+	}
+	pTable->nLastID = nLastID;
+	if( iType == VEDIS_TABLE_HASH || iType == VEDIS_TABLE_SET ){
+		/* Look for the index marker */
+		SyBlobReset(&sWorker);
+		SyBlobFormat(&sWorker,"vx%d%u:%z",iType,SyStringLength(pName),pName);
+		rc = vedisKvFetchCallback(pStore,SyBlobData(&sWorker),(int)SyBlobLength(&sWorker),vedisDataConsumer,&sWorker);
+		if( rc == VEDIS_OK ){
+			pTable->iFlags |= VEDIS_TABLE_INDEXED|VEDIS_TABLE_MARKED;
 		}
 	}
-	/* Fall through */
+	SyBlobRelease(&sWorker);
+	if( pStore->nLazyMax > 0 && (pTable->iFlags & VEDIS_TABLE_INDEXED) ){
+		/* Load entries on demand */
+		pTable->iFlags |= VEDIS_TABLE_PARTIAL;
+		pTable->nTotal = nEntry;
+		pTable->nMaxResident = pStore->nLazyMax;
+	}else{
+		/* Unserialize table entries */
+		vedisTableLoadEntries(pTable,nEntry);
+		if( pStore->nLazyMax > 0 && (iType == VEDIS_TABLE_HASH || iType == VEDIS_TABLE_SET)
+			&& !(pTable->iFlags & VEDIS_TABLE_INDEXED) && !vedisPagerisReadOnly(pStore) ){
+				/* Index the entries so that the table is loaded on demand next time */
+				vedisTableIndexEntries(pTable);
+		}
+	}
+	/* All done */
+	return pTable;
 fail:
-	/* Cleanup */
-	SySetRelease(&sToken);
-	return rc;
+	SyBlobRelease(&sWorker);
+	/* No such table */
+	return 0;
 }
 /*
- * ----------------------------------------------------------
- * File: pager.c
- * MD5: b4db2677f77d8b4f49a90287106a7de1
- * ----------------------------------------------------------
+ * Fetch a table and load its entries.
  */
+VEDIS_PRIVATE vedis_table * vedisFetchTable(vedis *pDb,vedis_value *pName,int create_new,int iType)
+{
+	vedis_table *pTable;
+	const char *zName;
+	SyString sName;
+	sxu32 nHash;
+	int nByte;
+	/* Extract table name */
+	zName = vedis_value_to_string(pName,&nByte);
+	if( nByte < 1 ){
+		/* Invalid table name */
+		vedisGenError(pDb,"Invalid table name");
+		return 0;
+	}
+	SyStringInitFromBuf(&sName,zName,nByte);
+	/* Fetch table */
+	nHash = SyBinHash(sName.zString,sName.nByte);
+	pTable = pDb->apTable[nHash & (pDb->nTableSize - 1)];
+	for(;;){
+		if( pTable == 0 ){
+			break;
+		}
+		if( pTable->iTableType == iType && SyStringCmp(&sName,&pTable->sName,SyMemcmp) == 0 ){
+			/* Table found */
+			return pTable;
+		}
+		/* Follow the collision link */
+		pTable = pTable->pNextCol;
+	}
+	/* Try to load from disk */
+	pTable = vedisTableLoadFromDisk(pDb,&sName,iType,nHash);
+	if( pTable ){
+		return pTable;
+	}
+	if( !create_new ){
+		/* No such table */
+		return 0;
+	}
+	/* fall through, create a new table */
+	pTable = vedisNewTable(pDb,&sName,iType,nHash);
+	if( !pTable ){
+		vedisGenOutofMem(pDb);
+		return 0;
+	}
+	if( pDb->nLazyMax > 0 && !vedisPagerisMemStore(pDb) && (iType == VEDIS_TABLE_HASH || iType == VEDIS_TABLE_SET) ){
+		/* Index entries by key so that they can be loaded on demand */
+		pTable->iFlags |= VEDIS_TABLE_INDEXED;
+	}
+	return pTable;
+}
 /*
- * Symisc Vedis: An Embeddable NoSQL (Post Modern) Database Engine.
- * Copyright (C) 2012-2013, Symisc Systems http://vedis.org/
- * Version 1.1.6
- * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
- * please contact Symisc Systems via:
- *       legal@symisc.net
- *       licensing@symisc.net
- *       contact@symisc.net
- * or visit:
- *      http://vedis.org/licensing.html
+ * Return the name of the given table.
  */
- /* $SymiscID: pager.c v1.1 Win7 2012-11-29 03:46 stable <chm@symisc.net> $ */
-#ifndef VEDIS_AMALGAMATION
-#include "vedisInt.h"
-#endif
+VEDIS_PRIVATE  SyString * vedisTableName(vedis_table *pEntry)
+{
+	return &pEntry->sName;
+}
 /*
-** This file implements the pager and the transaction manager for UnQLite (Mostly inspired from the SQLite3 Source tree).
-**
-** The Pager.eState variable stores the current 'state' of a pager. A
-** pager may be in any one of the seven states shown in the following
-** state diagram.
-**
-**                            OPEN <------+------+
-**                              |         |      |
-**                              V         |      |
-**               +---------> READER-------+      |
-**               |              |                |
-**               |              V                |
-**               |<-------WRITER_LOCKED--------->| 
-**               |              |                |  
-**               |              V                |
-**               |<------WRITER_CACHEMOD-------->|
-**               |              |                |
-**               |              V                |
-**               |<-------WRITER_DBMOD---------->|
-**               |              |                |
-**               |              V                |
-**               +<------WRITER_FINISHED-------->+
-** 
-**  OPEN:
-**
-**    The pager starts up in this state. Nothing is guaranteed in this
-**    state - the file may or may not be locked and the database size is
-**    unknown. The database may not be read or written.
-**
-**    * No read or write transaction is active.
-**    * Any lock, or no lock at all, may be held on the database file.
-**    * The dbSize and dbOrigSize variables may not be trusted.
-**
-**  READER:
-**
-**    In this state all the requirements for reading the database in 
-**    rollback mode are met. Unless the pager is (or recently
-**    was) in exclusive-locking mode, a user-level read transaction is 
-**    open. The database size is known in this state.
-** 
-**    * A read transaction may be active (but a write-transaction cannot).
-**    * A SHARED or greater lock is held on the database file.
-**    * The dbSize variable may be trusted (even if a user-level read 
-**      transaction is not active). The dbOrigSize variables
-**      may not be trusted at this point.
-**    * Even if a read-transaction is not open, it is guaranteed that 
-**      there is no hot-journal in the file-system.
-**
-**  WRITER_LOCKED:
-**
-**    The pager moves to this state from READER when a write-transaction
-**    is first opened on the database. In WRITER_LOCKED state, all locks 
-**    required to start a write-transaction are held, but no actual 
-**    modifications to the cache or database have taken place.
-**
-**    In rollback mode, a RESERVED or (if the transaction was opened with 
-**    EXCLUSIVE flag) EXCLUSIVE lock is obtained on the database file when
-**    moving to this state, but the journal file is not written to or opened 
-**    to in this state. If the transaction is committed or rolled back while 
-**    in WRITER_LOCKED state, all that is required is to unlock the database 
-**    file.
-**
-**    * A write transaction is active.
-**    * If the connection is open in rollback-mode, a RESERVED or greater 
-**      lock is held on the database file.
-**    * The dbSize and dbOrigSize variables are all valid.
-**    * The contents of the pager cache have not been modified.
-**    * The journal file may or may not be open.
-**    * Nothing (not even the first header) has been written to the journal.
-**
-**  WRITER_CACHEMOD:
-**
-**    A pager moves from WRITER_LOCKED state to this state when a page is
-**    first modified by the upper layer. In rollback mode the journal file
-**    is opened (if it is not already open) and a header written to the
-**    start of it. The database file on disk has not been modified.
-**
-**    * A write transaction is active.
-**    * A RESERVED or greater lock is held on the database file.
-**    * The journal file is open and the first header has been written 
-**      to it, but the header has not been synced to disk.
-**    * The contents of the page cache have been modified.
-**
-**  WRITER_DBMOD:
-**
-**    The pager transitions from WRITER_CACHEMOD into WRITER_DBMOD state
-**    when it modifies the contents of the database file.
-**
-**    * A write transaction is active.
-**    * An EXCLUSIVE or greater lock is held on the database file.
-**    * The journal file is open and the first header has been written 
-**      and synced to disk.
-**    * The contents of the page cache have been modified (and possibly
-**      written to disk).
-**
-**  WRITER_FINISHED:
-**
-**    A rollback-mode pager changes to WRITER_FINISHED state from WRITER_DBMOD
-**    state after the entire transaction has been successfully written into the
-**    database file. In this state the transaction may be committed simply
-**    by finalizing the journal file. Once in WRITER_FINISHED state, it is 
-**    not possible to modify the database further. At this point, the upper 
-**    layer must either commit or rollback the transaction.
-**
-**    * A write transaction is active.
-**    * An EXCLUSIVE or greater lock is held on the database file.
-**    * All writing and syncing of journal and database data has finished.
-**      If no error occured, all that remains is to finalize the journal to
-**      commit the transaction. If an error did occur, the caller will need
-**      to rollback the transaction. 
-**  
-**
-*/
-#define PAGER_OPEN                  0
-#define PAGER_READER                1
-#define PAGER_WRITER_LOCKED         2
-#define PAGER_WRITER_CACHEMOD       3
-#define PAGER_WRITER_DBMOD          4
-#define PAGER_WRITER_FINISHED       5
-/*
-** Journal files begin with the following magic string.  The data
-** was obtained from /dev/random.  It is used only as a sanity check.
-**
-** NOTE: These values must be different from the one used by SQLite3
-** to avoid journal file collision.
-**
-*/
-static const unsigned char aJournalMagic[] = {
-  0xc1, 0xd2, 0xfa, 0x77, 0x2b, 0x18, 0x27, 0x2a,
-};
-/*
-** The journal header size for this pager. This is usually the same 
-** size as a single disk sector. See also setSectorSize().
-*/
-#define JOURNAL_HDR_SZ(pPager) (pPager->iSectorSize)
+ * Return the next table on the chain.
+ */
+VEDIS_PRIVATE  vedis_table * vedisTableChain(vedis_table *pEntry)
+{
+	return pEntry->pNext;
+}
 /*
- * Database page handle.
- * Each raw disk page is represented in memory by an instance
- * of the following structure.
+ * Sorted sets.
+ * Members are stored in a regular table, so that they are persisted and
+ * looked up by name like the fields of a hash, with the score of each
+ * member packed in the entry data. Ordering by score is provided by a
+ * skiplist whose nodes record the number of members they skip, so that
+ * members are located by score or by rank in O(log N).
  */
-typedef struct Page Page;
-struct Page {
-  /* Must correspond to vedis_page */
-  unsigned char *zData;           /* Content of this page */
-  void *pUserData;                /* Extra content */
-  pgno pgno;                      /* Page number for this page */
-  /**********************************************************************
-  ** Elements above are public.  All that follows is private to pcache.c
-  ** and should not be accessed by other modules.
-  */
-  Pager *pPager;                 /* The pager this page is part of */
-  int flags;                     /* Page flags defined below */
-  int nRef;                      /* Number of users of this page */
-  Page *pNext, *pPrev;    /* A list of all pages */
-  Page *pDirtyNext;             /* Next element in list of dirty pages */
-  Page *pDirtyPrev;             /* Previous element in list of dirty pages */
-  Page *pNextCollide,*pPrevCollide; /* Collission chain */
-  Page *pNextHot,*pPrevHot;    /* Hot dirty pages chain */
-};
-/* Bit values for Page.flags */
-#define PAGE_DIRTY             0x002  /* Page has changed */
-#define PAGE_NEED_SYNC         0x004  /* fsync the rollback journal before
-                                       ** writing this page to the database */
-#define PAGE_DONT_WRITE        0x008  /* Dont write page content to disk */
-#define PAGE_NEED_READ         0x010  /* Content is unread */
-#define PAGE_IN_JOURNAL        0x020  /* Page written to the journal */
-#define PAGE_HOT_DIRTY         0x040  /* Hot dirty page */
-#define PAGE_DONT_MAKE_HOT     0x080  /* Dont make this page Hot. In other words,
-									   * do not link it to the hot dirty list.
-									   */
+#define VEDIS_ZSET_SCORE_SIZE 8 /* Size of a packed score */
 /*
- * Each active database pager is represented by an instance of
- * the following structure.
+ * Pack a score in the given 8-byte buffer.
  */
-struct Pager
+static void vedisZsetPackScore(unsigned char *zBuf,double rScore)
 {
-  SyMemBackend *pAllocator;      /* Memory backend */
-  vedis *pDb;                  /* DB handle that own this instance */
-  vedis_kv_engine *pEngine;    /* Underlying KV storage engine */
-  char *zFilename;               /* Name of the database file */
-  char *zJournal;                /* Name of the journal file */
-  vedis_vfs *pVfs;             /* Underlying virtual file system */
-  vedis_file *pfd,*pjfd;       /* File descriptors for database and journal */
-  pgno dbSize;                   /* Number of pages in the file */
-  pgno dbOrigSize;               /* dbSize before the current change */
-  sxi64 dbByteSize;              /* Database size in bytes */
-  void *pMmap;                   /* Read-only Memory view (mmap) of the whole file if requested (VEDIS_OPEN_MMAP). */
-  sxu32 nRec;                    /* Number of pages written to the journal */
-  SyPRNGCtx sPrng;               /* PRNG Context */
-  sxu32 cksumInit;               /* Quasi-random value added to every checksum */
-  sxu32 iOpenFlags;              /* Flag passed to vedis_open() after processing */
-  sxi64 iJournalOfft;            /* Journal offset we are reading from */
-  int (*xBusyHandler)(void *);   /* Busy handler */
-  void *pBusyHandlerArg;         /* First arg to xBusyHandler() */
-  void (*xPageUnpin)(void *);    /* Page Unpin callback */
-  void (*xPageReload)(void *);   /* Page Reload callback */
-  int (*xCommit)(void *);        /* On commit user callback */
-  void *pCommitData;             /* First arg to xCommit() */
-  Bitvec *pVec;                  /* Bitmap */
-  Page *pHeader;                 /* Page one of the database (Unqlite header) */
-  Sytm tmCreate;                 /* Database creation time */
-  SyString sKv;                  /* Underlying Key/Value storage engine name */
-  int iState;                    /* Pager state */
-  int iLock;                     /* Lock state */
-  sxi32 iFlags;                  /* Control flags (see below) */
-  int is_mem;                    /* True for an in-memory database */
-  int is_rdonly;                 /* True for a read-only database */
-  int no_jrnl;                   /* TRUE to omit journaling */
-  int iPageSize;                 /* Page size in bytes (default 4K) */
-  int iSectorSize;               /* Size of a single sector on disk */
-  unsigned char *zTmpPage;       /* Temporary page */
-  Page *pFirstDirty;             /* First dirty pages */
-  Page *pDirty;                  /* Transient list of dirty pages */
-  Page *pAll;                    /* List of all pages */
-  Page *pHotDirty;               /* List of hot dirty pages */
-  Page *pFirstHot;               /* First hot dirty page */
-  sxu32 nHot;                    /* Total number of hot dirty pages */
-  Page **apHash;                 /* Page table */
-  sxu32 nSize;                   /* apHash[] size: Must be a power of two  */
-  sxu32 nPage;                   /* Total number of page loaded in memory */
-  sxu32 nCacheMax;               /* Maximum page to cache*/
-};
-/* Control flags */
-#define PAGER_CTRL_COMMIT_ERR   0x001 /* Commit error */
-#define PAGER_CTRL_DIRTY_COMMIT 0x002 /* Dirty commit has been applied */ 
+	union { double r; sxu64 n; } uScore;
+	uScore.r = rScore;
+	SyBigEndianPack64(zBuf,uScore.n);
+}
 /*
-** Read a 32-bit integer from the given file descriptor. 
-** All values are stored on disk as big-endian.
-*/
-static int ReadInt32(vedis_file *pFd,sxu32 *pOut,sxi64 iOfft)
+ * Return the score of the given sorted set entry.
+ */
+VEDIS_PRIVATE double vedisZsetEntryScore(vedis_table_entry *pEntry)
 {
-	unsigned char zBuf[4];
-	int rc;
-	rc = vedisOsRead(pFd,zBuf,sizeof(zBuf),iOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	union { double r; sxu64 n; } uScore;
+	if( SyBlobLength(&pEntry->sData) != VEDIS_ZSET_SCORE_SIZE ){
+		/* Corrupt entry */
+		return 0.0;
 	}
-	SyBigEndianUnpack32(zBuf,pOut);
-	return VEDIS_OK;
+	SyBigEndianUnpack64((const unsigned char *)SyBlobData(&pEntry->sData),&uScore.n);
+	return uScore.r;
 }
 /*
-** Read a 64-bit integer from the given file descriptor. 
-** All values are stored on disk as big-endian.
-*/
-static int ReadInt64(vedis_file *pFd,sxu64 *pOut,sxi64 iOfft)
+ * Compare the (score, member) pair of a node with the given pair.
+ */
+static int vedisZsetCompare(vedis_zset_node *pNode,double rScore,vedis_table_entry *pEntry)
 {
-	unsigned char zBuf[8];
+	sxu32 nLeft,nRight;
 	int rc;
-	rc = vedisOsRead(pFd,zBuf,sizeof(zBuf),iOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	if( pNode->rScore != rScore ){
+		return pNode->rScore < rScore ? -1 : 1;
 	}
-	SyBigEndianUnpack64(zBuf,pOut);
-	return VEDIS_OK;
+	/* Same score, order by member */
+	nLeft = SyBlobLength(&pNode->pEntry->xKey.sKey);
+	nRight = SyBlobLength(&pEntry->xKey.sKey);
+	rc = SyMemcmp(SyBlobData(&pNode->pEntry->xKey.sKey),SyBlobData(&pEntry->xKey.sKey),SXMIN(nLeft,nRight));
+	if( rc == 0 && nLeft != nRight ){
+		rc = nLeft < nRight ? -1 : 1;
+	}
+	return rc;
 }
 /*
-** Write a 32-bit integer into the given file descriptor.
-*/
-static int WriteInt32(vedis_file *pFd,sxu32 iNum,sxi64 iOfft)
+ * Allocate a skiplist node with the given number of levels.
+ */
+static vedis_zset_node * vedisZsetNewNode(vedis *pStore,int nLevel,double rScore,vedis_table_entry *pEntry)
 {
-	unsigned char zBuf[4];
-	int rc;
-	SyBigEndianPack32(zBuf,iNum);
-	rc = vedisOsWrite(pFd,zBuf,sizeof(zBuf),iOfft);
-	return rc;
+	vedis_zset_node *pNode;
+	sxu32 nByte = sizeof(vedis_zset_node) + (nLevel - 1) * sizeof(struct vedis_zset_level);
+	pNode = (vedis_zset_node *)SyMemBackendAlloc(&pStore->sMem,nByte);
+	if( pNode == 0 ){
+		return 0;
+	}
+	SyZero(pNode,nByte);
+	pNode->pEntry = pEntry;
+	pNode->rScore = rScore;
+	pNode->nLevel = nLevel;
+	return pNode;
 }
 /*
-** Write a 64-bit integer into the given file descriptor.
-*/
-static int WriteInt64(vedis_file *pFd,sxu64 iNum,sxi64 iOfft)
+ * Pick the level of a new node: each level is used by a quarter of the
+ * nodes of the level below.
+ */
+static int vedisZsetRandomLevel(vedis_zset *pZset)
 {
-	unsigned char zBuf[8];
-	int rc;
-	SyBigEndianPack64(zBuf,iNum);
-	rc = vedisOsWrite(pFd,zBuf,sizeof(zBuf),iOfft);
-	return rc;
+	int nLevel = 1;
+	for(;;){
+		/* Xorshift generator */
+		pZset->iRandom ^= pZset->iRandom << 13;
+		pZset->iRandom ^= pZset->iRandom >> 17;
+		pZset->iRandom ^= pZset->iRandom << 5;
+		if( (pZset->iRandom & 3) != 0 || nLevel >= VEDIS_ZSET_MAXLEVEL ){
+			break;
+		}
+		nLevel++;
+	}
+	return nLevel;
 }
 /*
-** The maximum allowed sector size. 64KiB. If the xSectorsize() method 
-** returns a value larger than this, then MAX_SECTOR_SIZE is used instead.
-** This could conceivably cause corruption following a power failure on
-** such a system. This is currently an undocumented limit.
-*/
-#define MAX_SECTOR_SIZE 0x10000
-/*
-** Get the size of a single sector on disk.
-** The sector size will be used used  to determine the size
-** and alignment of journal header and within created journal files.
-**
-** The default sector size is set to 512.
-*/
-static int GetSectorSize(vedis_file *pFd)
+ * Index a member of the sorted set.
+ */
+static int vedisZsetLink(vedis *pStore,vedis_zset *pZset,vedis_table_entry *pEntry,double rScore)
 {
-	int iSectorSize = VEDIS_DEFAULT_SECTOR_SIZE;
-	if( pFd ){
-		iSectorSize = vedisOsSectorSize(pFd);
-		if( iSectorSize < 32 ){
-			iSectorSize = 512;
+	vedis_zset_node *apUpdate[VEDIS_ZSET_MAXLEVEL];
+	sxu32 aRank[VEDIS_ZSET_MAXLEVEL];
+	vedis_zset_node *pNode,*pX;
+	int i,nLevel;
+	/* Find the insertion point on each level */
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		aRank[i] = i == pZset->nLevel - 1 ? 0 : aRank[i + 1];
+		while( pX->aLevel[i].pForward && vedisZsetCompare(pX->aLevel[i].pForward,rScore,pEntry) < 0 ){
+			aRank[i] += pX->aLevel[i].nSpan;
+			pX = pX->aLevel[i].pForward;
 		}
-		if( iSectorSize > MAX_SECTOR_SIZE ){
-			iSectorSize = MAX_SECTOR_SIZE;
+		apUpdate[i] = pX;
+	}
+	nLevel = vedisZsetRandomLevel(pZset);
+	pNode = vedisZsetNewNode(pStore,nLevel,rScore,pEntry);
+	if( pNode == 0 ){
+		return VEDIS_NOMEM;
+	}
+	if( nLevel > pZset->nLevel ){
+		for( i = pZset->nLevel ; i < nLevel ; i++ ){
+			aRank[i] = 0;
+			apUpdate[i] = pZset->pHeader;
+			apUpdate[i]->aLevel[i].nSpan = pZset->nLength;
 		}
+		pZset->nLevel = nLevel;
 	}
-	return iSectorSize;
+	/* Link the node and adjust the spans */
+	for( i = 0 ; i < nLevel ; i++ ){
+		pNode->aLevel[i].pForward = apUpdate[i]->aLevel[i].pForward;
+		apUpdate[i]->aLevel[i].pForward = pNode;
+		pNode->aLevel[i].nSpan = apUpdate[i]->aLevel[i].nSpan - (aRank[0] - aRank[i]);
+		apUpdate[i]->aLevel[i].nSpan = (aRank[0] - aRank[i]) + 1;
+	}
+	for( i = nLevel ; i < pZset->nLevel ; i++ ){
+		apUpdate[i]->aLevel[i].nSpan++;
+	}
+	pNode->pBackward = apUpdate[0] == pZset->pHeader ? 0 : apUpdate[0];
+	if( pNode->aLevel[0].pForward ){
+		pNode->aLevel[0].pForward->pBackward = pNode;
+	}else{
+		pZset->pTail = pNode;
+	}
+	pZset->nLength++;
+	return VEDIS_OK;
 }
-/* Hash function for page number  */
-#define PAGE_HASH(PNUM) (PNUM)
 /*
- * Fetch a page from the cache.
+ * Remove a member from the index.
  */
-static Page * pager_fetch_page(Pager *pPager,pgno page_num)
+static void vedisZsetUnlink(vedis *pStore,vedis_zset *pZset,vedis_table_entry *pEntry,double rScore)
 {
-	Page *pEntry;
-	if( pPager->nPage < 1 ){
-		/* Don't bother hashing */
-		return 0;
-	}
-	/* Perform the lookup */
-	pEntry = pPager->apHash[PAGE_HASH(page_num) & (pPager->nSize - 1)];
-	for(;;){
-		if( pEntry == 0 ){
-			break;
+	vedis_zset_node *apUpdate[VEDIS_ZSET_MAXLEVEL];
+	vedis_zset_node *pX;
+	int i;
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		while( pX->aLevel[i].pForward && vedisZsetCompare(pX->aLevel[i].pForward,rScore,pEntry) < 0 ){
+			pX = pX->aLevel[i].pForward;
 		}
-		if( pEntry->pgno == page_num ){
-			return pEntry;
+		apUpdate[i] = pX;
+	}
+	pX = pX->aLevel[0].pForward;
+	if( pX == 0 || pX->pEntry != pEntry ){
+		/* Not indexed */
+		return;
+	}
+	for( i = 0 ; i < pZset->nLevel ; i++ ){
+		if( apUpdate[i]->aLevel[i].pForward == pX ){
+			apUpdate[i]->aLevel[i].nSpan += pX->aLevel[i].nSpan - 1;
+			apUpdate[i]->aLevel[i].pForward = pX->aLevel[i].pForward;
+		}else{
+			apUpdate[i]->aLevel[i].nSpan--;
 		}
-		/* Point to the next entry in the colission chain */
-		pEntry = pEntry->pNextCollide;
 	}
-	/* No such page */
-	return 0;
+	if( pX->aLevel[0].pForward ){
+		pX->aLevel[0].pForward->pBackward = pX->pBackward;
+	}else{
+		pZset->pTail = pX->pBackward;
+	}
+	while( pZset->nLevel > 1 && pZset->pHeader->aLevel[pZset->nLevel - 1].pForward == 0 ){
+		pZset->nLevel--;
+	}
+	pZset->nLength--;
+	SyMemBackendFree(&pStore->sMem,pX);
 }
 /*
- * Allocate and initialize a new page.
+ * Return the score index of a sorted set, building it from the table
+ * entries the first time.
  */
-static Page * pager_alloc_page(Pager *pPager,pgno num_page)
+static vedis_zset * vedisZsetIndex(vedis_table *pTable)
 {
-	Page *pNew;
-	
-	pNew = (Page *)SyMemBackendPoolAlloc(pPager->pAllocator,sizeof(Page)+pPager->iPageSize);
-	if( pNew == 0 ){
+	vedis *pStore = pTable->pStore;
+	vedis_table_entry *pEntry;
+	vedis_zset *pZset;
+	sxu32 n;
+	if( pTable->pZset ){
+		return pTable->pZset;
+	}
+	pZset = (vedis_zset *)SyMemBackendAlloc(&pStore->sMem,sizeof(vedis_zset));
+	if( pZset == 0 ){
 		return 0;
 	}
-	/* Zero the structure */
-	SyZero(pNew,sizeof(Page)+pPager->iPageSize);
-	/* Page data */
-	pNew->zData = (unsigned char *)&pNew[1];
-	/* Fill in the structure */
-	pNew->pPager = pPager;
-	pNew->nRef = 1;
-	pNew->pgno = num_page;
-	return pNew;
-}
-/*
- * Increment the reference count of a given page.
- */
-static void page_ref(Page *pPage)
-{
-	pPage->nRef++;
+	SyZero(pZset,sizeof(vedis_zset));
+	pZset->pHeader = vedisZsetNewNode(pStore,VEDIS_ZSET_MAXLEVEL,0.0,0);
+	if( pZset->pHeader == 0 ){
+		SyMemBackendFree(&pStore->sMem,pZset);
+		return 0;
+	}
+	pZset->nLevel = 1;
+	pZset->iRandom = 0x9E3779B9;
+	/* Index the members loaded from disk */
+	pEntry = pTable->pFirst;
+	for( n = 0 ; n < pTable->nEntry ; ++n ){
+		if( pEntry->iType == VEDIS_TABLE_ENTRY_BLOB_NODE ){
+			vedisZsetLink(pStore,pZset,pEntry,vedisZsetEntryScore(pEntry));
+		}
+		pEntry = pEntry->pPrev; /* Reverse link */
+	}
+	pTable->pZset = pZset;
+	return pZset;
 }
 /*
- * Release an in-memory page after its reference count reach zero.
+ * Set the score of a member, adding the member if it does not exist. When
+ * bIncr is true, the score is added to the current score of the member.
+ * The resulting score is stored in *pScore and *pNew is set to true if the
+ * member was added.
  */
-static int pager_release_page(Pager *pPager,Page *pPage)
+VEDIS_PRIVATE int vedisZsetAdd(vedis_table *pTable,vedis_value *pMember,double rScore,int bIncr,double *pScore,int *pNew)
 {
-	int rc = VEDIS_OK;
-	if( !(pPage->flags & PAGE_DIRTY)){
-		/* Invoke the unpin callback if available */
-		if( pPager->xPageUnpin && pPage->pUserData ){
-			pPager->xPageUnpin(pPage->pUserData);
+	unsigned char zScore[VEDIS_ZSET_SCORE_SIZE];
+	vedis *pStore = pTable->pStore;
+	vedis_table_entry *pEntry;
+	vedis_zset *pZset;
+	const char *zMember;
+	double rOld;
+	int nByte;
+	int rc;
+	*pNew = FALSE;
+	if( vedisPagerisReadOnly(pStore) ){
+		vedisGenError(pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
+	}
+	zMember = vedis_value_to_string(pMember,&nByte);
+	if( nByte < 1 ){
+		/* Members are never empty */
+		return VEDIS_INVALID;
+	}
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 ){
+		vedisGenOutofMem(pStore);
+		return VEDIS_NOMEM;
+	}
+	if( vedisTableLookupBlobKey(pTable,(const void *)zMember,(sxu32)nByte,&pEntry) == SXRET_OK ){
+		rOld = vedisZsetEntryScore(pEntry);
+		if( bIncr ){
+			rScore += rOld;
 		}
-		pPage->pUserData = 0;
-		SyMemBackendPoolFree(pPager->pAllocator,pPage);
+		if( rScore != rScore ){
+			/* NaN, such as the sum of infinities of opposite signs */
+			return VEDIS_INVALID;
+		}
+		*pScore = rScore;
+		if( rScore == rOld ){
+			/* Nothing to do */
+			return VEDIS_OK;
+		}
+		/* Update the score and move the member */
+		vedisZsetUnlink(pStore,pZset,pEntry,rOld);
+		vedisZsetPackScore(zScore,rScore);
+		SyBlobReset(&pEntry->sData);
+		SyBlobAppend(&pEntry->sData,(const void *)zScore,sizeof(zScore));
+		rc = VEDIS_OK;
+		if( !vedisPagerisMemStore(pStore) ){
+			rc = vedisTableEntrySerialize(pTable,pEntry);
+		}
+		if( vedisZsetLink(pStore,pZset,pEntry,rScore) != VEDIS_OK ){
+			rc = VEDIS_NOMEM;
+		}
+		return rc;
 	}else{
-		/* Dirty page, it will be released later when a dirty commit
-		 * or the final commit have been applied.
-		 */
-		rc = VEDIS_LOCKED;
+		vedis_value sData;
+		SyString sScore;
+		if( rScore != rScore ){
+			return VEDIS_INVALID;
+		}
+		*pScore = rScore;
+		vedisZsetPackScore(zScore,rScore);
+		SyStringInitFromBuf(&sScore,zScore,sizeof(zScore));
+		vedisMemObjInitFromString(pStore,&sData,&sScore);
+		rc = vedisTableInsertBlobKey(pTable,(const void *)zMember,(sxu32)nByte,&sData);
+		vedisMemObjRelease(&sData);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		/* The new entry is the last inserted one */
+		*pNew = TRUE;
+		return vedisZsetLink(pStore,pZset,pTable->pLast,rScore);
 	}
-	return rc;
 }
-/* Forward declaration */
-static int pager_unlink_page(Pager *pPager,Page *pPage);
 /*
- * Decrement the reference count of a given page.
+ * Look up a member of a sorted set.
  */
-static void page_unref(Page *pPage)
+VEDIS_PRIVATE vedis_table_entry * vedisZsetLookup(vedis_table *pTable,vedis_value *pMember)
 {
-	pPage->nRef--;
-	if( pPage->nRef < 1	){
-		Pager *pPager = pPage->pPager;
-		if( !(pPage->flags & PAGE_DIRTY)  ){
-			pager_unlink_page(pPager,pPage);
-			/* Release the page */
-			pager_release_page(pPager,pPage);
-		}else{
-			if( pPage->flags & PAGE_DONT_MAKE_HOT ){
-				/* Do not add this page to the hot dirty list */
-				return;
-			}
-			if( !(pPage->flags & PAGE_HOT_DIRTY) ){
-				/* Add to the hot dirty list */
-				pPage->pPrevHot = 0;
-				if( pPager->pFirstHot == 0 ){
-					pPager->pFirstHot = pPager->pHotDirty = pPage;
-				}else{
-					pPage->pNextHot = pPager->pHotDirty;
-					if( pPager->pHotDirty ){
-						pPager->pHotDirty->pPrevHot = pPage;
-					}
-					pPager->pHotDirty = pPage;
-				}
-				pPager->nHot++;
-				pPage->flags |= PAGE_HOT_DIRTY;
-			}
-		}
+	vedis_table_entry *pEntry;
+	const char *zMember;
+	int nByte;
+	zMember = vedis_value_to_string(pMember,&nByte);
+	if( nByte < 1 || vedisTableLookupBlobKey(pTable,(const void *)zMember,(sxu32)nByte,&pEntry) != SXRET_OK ){
+		return 0;
 	}
+	return pEntry;
 }
 /*
- * Link a freshly created page to the list of active page.
+ * Remove the given entry from a sorted set.
  */
-static int pager_link_page(Pager *pPager,Page *pPage)
+static int vedisZsetRemoveEntry(vedis_table *pTable,vedis_table_entry *pEntry)
 {
-	sxu32 nBucket;
-	/* Install in the corresponding bucket */
-	nBucket = PAGE_HASH(pPage->pgno) & (pPager->nSize - 1);
-	pPage->pNextCollide = pPager->apHash[nBucket];
-	if( pPager->apHash[nBucket] ){
-		pPager->apHash[nBucket]->pPrevCollide = pPage;
+	vedis *pStore = pTable->pStore;
+	vedis_zset *pZset;
+	if( vedisPagerisReadOnly(pStore) ){
+		vedisGenError(pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
 	}
-	pPager->apHash[nBucket] = pPage;
-	/* Link to the list of active pages */
-	MACRO_LD_PUSH(pPager->pAll,pPage);
-	pPager->nPage++;
-	if( (pPager->nPage >= pPager->nSize * 4)  && pPager->nPage < 100000 ){
-		/* Grow the hashtable */
-		sxu32 nNewSize = pPager->nSize << 1;
-		Page *pEntry,**apNew;
-		sxu32 n;
-		apNew = (Page **)SyMemBackendAlloc(pPager->pAllocator, nNewSize * sizeof(Page *));
-		if( apNew ){
-			sxu32 iBucket;
-			/* Zero the new table */
-			SyZero((void *)apNew, nNewSize * sizeof(Page *));
-			/* Rehash all entries */
-			n = 0;
-			pEntry = pPager->pAll;
-			for(;;){
-				/* Loop one */
-				if( n >= pPager->nPage ){
-					break;
-				}
-				pEntry->pNextCollide = pEntry->pPrevCollide = 0;
-				/* Install in the new bucket */
-				iBucket = PAGE_HASH(pEntry->pgno) & (nNewSize - 1);
-				pEntry->pNextCollide = apNew[iBucket];
-				if( apNew[iBucket] ){
-					apNew[iBucket]->pPrevCollide = pEntry;
-				}
-				apNew[iBucket] = pEntry;
-				/* Point to the next entry */
-				pEntry = pEntry->pNext;
-				n++;
-			}
-			/* Release the old table and reflect the change */
-			SyMemBackendFree(pPager->pAllocator,(void *)pPager->apHash);
-			pPager->apHash = apNew;
-			pPager->nSize  = nNewSize;
-		}
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 ){
+		vedisGenOutofMem(pStore);
+		return VEDIS_NOMEM;
 	}
-	return VEDIS_OK;
+	vedisZsetUnlink(pStore,pZset,pEntry,vedisZsetEntryScore(pEntry));
+	return VedisRemoveTableEntry(pTable,pEntry);
 }
 /*
- * Unlink a page from the list of active pages.
+ * Remove a member from a sorted set.
  */
-static int pager_unlink_page(Pager *pPager,Page *pPage)
+VEDIS_PRIVATE int vedisZsetRemove(vedis_table *pTable,vedis_value *pMember)
 {
-	if( pPage->pNextCollide ){
-		pPage->pNextCollide->pPrevCollide = pPage->pPrevCollide;
+	vedis_table_entry *pEntry;
+	if( vedisPagerisReadOnly(pTable->pStore) ){
+		vedisGenError(pTable->pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
 	}
-	if( pPage->pPrevCollide ){
-		pPage->pPrevCollide->pNextCollide = pPage->pNextCollide;
-	}else{
-		sxu32 nBucket = PAGE_HASH(pPage->pgno) & (pPager->nSize - 1);
-		pPager->apHash[nBucket] = pPage->pNextCollide;
+	pEntry = vedisZsetLookup(pTable,pMember);
+	if( pEntry == 0 ){
+		return VEDIS_NOTFOUND;
 	}
-	MACRO_LD_REMOVE(pPager->pAll,pPage);
-	pPager->nPage--;
-	return VEDIS_OK;
+	return vedisZsetRemoveEntry(pTable,pEntry);
 }
 /*
- * Update the content of a cached page.
+ * Return the one-based rank of a member, ordered by ascending score, or
+ * zero if the sorted set could not be indexed.
  */
-static int pager_fill_page(Pager *pPager,pgno iNum,void *pContents)
+VEDIS_PRIVATE sxu32 vedisZsetRank(vedis_table *pTable,vedis_table_entry *pEntry)
 {
-	Page *pPage;
-	/* Fetch the page from the catch */
-	pPage = pager_fetch_page(pPager,iNum);
-	if( pPage == 0 ){
-		return SXERR_NOTFOUND;
+	vedis_zset_node *pX;
+	vedis_zset *pZset;
+	double rScore;
+	sxu32 nRank = 0;
+	int i;
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 ){
+		return 0;
 	}
-	/* Reflect the change */
-	SyMemcpy(pContents,pPage->zData,pPager->iPageSize);
-
-	return VEDIS_OK;
+	rScore = vedisZsetEntryScore(pEntry);
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		while( pX->aLevel[i].pForward && vedisZsetCompare(pX->aLevel[i].pForward,rScore,pEntry) <= 0 ){
+			nRank += pX->aLevel[i].nSpan;
+			pX = pX->aLevel[i].pForward;
+		}
+		if( pX->pEntry == pEntry ){
+			return nRank;
+		}
+	}
+	return 0;
 }
 /*
- * Read the content of a page from disk.
+ * Return the node at the given one-based rank.
  */
-static int pager_get_page_contents(Pager *pPager,Page *pPage,int noContent)
+VEDIS_PRIVATE vedis_zset_node * vedisZsetNodeByRank(vedis_table *pTable,sxu32 nRank)
 {
-	int rc = VEDIS_OK;
-	if( pPager->is_mem || noContent || pPage->pgno >= pPager->dbSize ){
-		/* Do not bother reading, zero the page contents only */
-		SyZero(pPage->zData,pPager->iPageSize);
-		return VEDIS_OK;
+	vedis_zset_node *pX;
+	vedis_zset *pZset;
+	sxu32 nTraversed = 0;
+	int i;
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 || nRank < 1 || nRank > pZset->nLength ){
+		return 0;
 	}
-	if( (pPager->iOpenFlags & VEDIS_OPEN_MMAP) && (pPager->pMmap /* Paranoid edition */) ){
-		unsigned char *zMap = (unsigned char *)pPager->pMmap;
-		pPage->zData = &zMap[pPage->pgno * pPager->iPageSize];
-	}else{
-		/* Read content */
-		rc = vedisOsRead(pPager->pfd,pPage->zData,pPager->iPageSize,pPage->pgno * pPager->iPageSize);
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		while( pX->aLevel[i].pForward && nTraversed + pX->aLevel[i].nSpan <= nRank ){
+			nTraversed += pX->aLevel[i].nSpan;
+			pX = pX->aLevel[i].pForward;
+		}
+		if( nTraversed == nRank ){
+			return pX;
+		}
 	}
-	return rc;
+	return 0;
 }
 /*
- * Add a page to the dirty list.
+ * Tell whether a score is above the minimum or below the maximum of the
+ * given range.
  */
-static void pager_page_to_dirty_list(Pager *pPager,Page *pPage)
+static int vedisZsetAboveMin(const vedis_zset_range *pRange,double rScore)
 {
-	if( pPage->flags & PAGE_DIRTY ){
-		/* Already set */
-		return;
+	return pRange->bMinEx ? rScore > pRange->rMin : rScore >= pRange->rMin;
+}
+static int vedisZsetBelowMax(const vedis_zset_range *pRange,double rScore)
+{
+	return pRange->bMaxEx ? rScore < pRange->rMax : rScore <= pRange->rMax;
+}
+/*
+ * Return the member with the lowest score in the given range and store its
+ * one-based rank in *pRank, or return NULL if the range is empty.
+ */
+VEDIS_PRIVATE vedis_zset_node * vedisZsetFirstInRange(vedis_table *pTable,const vedis_zset_range *pRange,sxu32 *pRank)
+{
+	vedis_zset_node *pX;
+	vedis_zset *pZset;
+	sxu32 nRank = 0;
+	int i;
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 || pZset->pTail == 0 || pRange->rMin > pRange->rMax ||
+		(pRange->rMin == pRange->rMax && (pRange->bMinEx || pRange->bMaxEx)) ){
+		return 0;
 	}
-	/* Mark the page as dirty */
-	pPage->flags |= PAGE_DIRTY|PAGE_NEED_SYNC|PAGE_IN_JOURNAL;
-	/* Link to the list */
-	pPage->pDirtyPrev = 0;
-	pPage->pDirtyNext = pPager->pDirty;
-	if( pPager->pDirty ){
-		pPager->pDirty->pDirtyPrev = pPage;
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		while( pX->aLevel[i].pForward && !vedisZsetAboveMin(pRange,pX->aLevel[i].pForward->rScore) ){
+			nRank += pX->aLevel[i].nSpan;
+			pX = pX->aLevel[i].pForward;
+		}
 	}
-	pPager->pDirty = pPage;
-	if( pPager->pFirstDirty == 0 ){
-		pPager->pFirstDirty = pPage;
+	pX = pX->aLevel[0].pForward;
+	if( pX == 0 || !vedisZsetBelowMax(pRange,pX->rScore) ){
+		return 0;
 	}
+	*pRank = nRank + 1;
+	return pX;
 }
 /*
- * Merge sort.
- * The merge sort implementation is based on the one used by
- * the PH7 Embeddable PHP Engine (http://ph7.symisc.net/).
+ * Return the member with the highest score in the given range and store
+ * its one-based rank in *pRank, or return NULL if the range is empty.
  */
-/*
-** Inputs:
-**   a:       A sorted, null-terminated linked list.  (May be null).
-**   b:       A sorted, null-terminated linked list.  (May be null).
-**   cmp:     A pointer to the comparison function.
-**
-** Return Value:
-**   A pointer to the head of a sorted list containing the elements
-**   of both a and b.
-**
-** Side effects:
-**   The "next", "prev" pointers for elements in the lists a and b are
-**   changed.
-*/
-static Page * page_merge_dirty(Page *pA, Page *pB)
+VEDIS_PRIVATE vedis_zset_node * vedisZsetLastInRange(vedis_table *pTable,const vedis_zset_range *pRange,sxu32 *pRank)
 {
-	Page result, *pTail;
-    /* Prevent compiler warning */
-	result.pDirtyNext = result.pDirtyPrev = 0;
-	pTail = &result;
-	while( pA && pB ){
-		if( pA->pgno < pB->pgno ){
-			pTail->pDirtyPrev = pA;
-			pA->pDirtyNext = pTail;
-			pTail = pA;
-			pA = pA->pDirtyPrev;
-		}else{
-			pTail->pDirtyPrev = pB;
-			pB->pDirtyNext = pTail;
-			pTail = pB;
-			pB = pB->pDirtyPrev;
+	vedis_zset_node *pX;
+	vedis_zset *pZset;
+	sxu32 nRank = 0;
+	int i;
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 || pZset->pTail == 0 || pRange->rMin > pRange->rMax ||
+		(pRange->rMin == pRange->rMax && (pRange->bMinEx || pRange->bMaxEx)) ){
+		return 0;
+	}
+	pX = pZset->pHeader;
+	for( i = pZset->nLevel - 1 ; i >= 0 ; i-- ){
+		while( pX->aLevel[i].pForward && vedisZsetBelowMax(pRange,pX->aLevel[i].pForward->rScore) ){
+			nRank += pX->aLevel[i].nSpan;
+			pX = pX->aLevel[i].pForward;
 		}
 	}
-	if( pA ){
-		pTail->pDirtyPrev = pA;
-		pA->pDirtyNext = pTail;
-	}else if( pB ){
-		pTail->pDirtyPrev = pB;
-		pB->pDirtyNext = pTail;
-	}else{
-		pTail->pDirtyPrev = pTail->pDirtyNext = 0;
+	if( pX == pZset->pHeader || !vedisZsetAboveMin(pRange,pX->rScore) ){
+		return 0;
 	}
-	return result.pDirtyPrev;
+	*pRank = nRank;
+	return pX;
 }
 /*
-** Inputs:
-**   Map:       Input hashmap
-**   cmp:       A comparison function.
-**
-** Return Value:
-**   Sorted hashmap.
-**
-** Side effects:
-**   The "next" pointers for elements in list are changed.
-*/
-#define N_SORT_BUCKET  32
-static Page * pager_get_dirty_pages(Pager *pPager)
+ * Key expiry.
+ * The deadlines of the keys that expire are kept in a sorted set of a
+ * reserved table type, whose members are the keys and whose scores are
+ * their deadlines in milliseconds since the epoch. A key that is due is
+ * deleted when it is next read, while [vedis_kv_expire_step()] purges the
+ * keys that are due the soonest, a bounded number at a time.
+ * The name of the index starts with a control character, so that the keys
+ * of its records do not clash with those of the tables of the user.
+ */
+#define VEDIS_EXPIRE_TABLE "\001expire"
+#ifdef __WINNT__
+#include <Windows.h>
+#else
+#include <sys/time.h>
+#endif
+/*
+ * Return the current time in milliseconds since the epoch.
+ */
+VEDIS_PRIVATE vedis_int64 vedisExpireNow(void)
 {
-	Page *a[N_SORT_BUCKET], *p, *pIn;
-	sxu32 i;
-	if( pPager->pFirstDirty == 0 ){
-		/* Don't bother sorting, the list is already empty */
+#ifdef __WINNT__
+	ULARGE_INTEGER uTime;
+	FILETIME sFt;
+	GetSystemTimeAsFileTime(&sFt);
+	uTime.LowPart = sFt.dwLowDateTime;
+	uTime.HighPart = sFt.dwHighDateTime;
+	/* 100-nanosecond intervals since January 1, 1601 */
+	return (vedis_int64)(uTime.QuadPart / 10000) - (vedis_int64)11644473600 * 1000;
+#else
+	struct timeval sTv;
+	gettimeofday(&sTv,0);
+	return (vedis_int64)sTv.tv_sec * 1000 + sTv.tv_usec / 1000;
+#endif
+}
+/*
+ * Return the deadline index, or NULL if no key expires and bCreate is
+ * false. The index is only looked up on disk once.
+ */
+static vedis_table * vedisExpireTable(vedis *pStore,int bCreate)
+{
+	vedis_table *pTable;
+	vedis_value sName;
+	SyString sStr;
+	if( pStore->pExpire ){
+		return pStore->pExpire;
+	}
+	if( !bCreate && (pStore->iFlags & VEDIS_FL_EXPIRE_LOOKUP) ){
 		return 0;
 	}
-	SyZero(a, sizeof(a));
-	/* Point to the first inserted entry */
-	pIn = pPager->pFirstDirty;
-	while( pIn ){
-		p = pIn;
-		pIn = p->pDirtyPrev;
-		p->pDirtyPrev = 0;
-		for(i=0; i<N_SORT_BUCKET-1; i++){
-			if( a[i]==0 ){
-				a[i] = p;
-				break;
-			}else{
-				p = page_merge_dirty(a[i], p);
-				a[i] = 0;
-			}
-		}
-		if( i==N_SORT_BUCKET-1 ){
-			/* To get here, there need to be 2^(N_SORT_BUCKET) elements in he input list.
-			 * But that is impossible.
-			 */
-			a[i] = page_merge_dirty(a[i], p);
-		}
+	SyStringInitFromBuf(&sStr,VEDIS_EXPIRE_TABLE,sizeof(VEDIS_EXPIRE_TABLE) - 1);
+	vedisMemObjInitFromString(pStore,&sName,&sStr);
+	pTable = vedisFetchTable(pStore,&sName,bCreate,VEDIS_TABLE_EXPIRE);
+	vedisMemObjRelease(&sName);
+	pStore->iFlags |= VEDIS_FL_EXPIRE_LOOKUP;
+	pStore->pExpire = pTable;
+	return pTable;
+}
+/*
+ * Release the score index of a sorted set. It is built again on first use.
+ */
+static void vedisZsetRelease(vedis_table *pTable)
+{
+	vedis *pStore = pTable->pStore;
+	vedis_zset_node *pNode,*pNext;
+	if( pTable->pZset == 0 ){
+		return;
 	}
-	p = a[0];
-	for(i=1; i<N_SORT_BUCKET; i++){
-		p = page_merge_dirty(p,a[i]);
+	pNode = pTable->pZset->pHeader;
+	while( pNode ){
+		pNext = pNode->aLevel[0].pForward;
+		SyMemBackendFree(&pStore->sMem,pNode);
+		pNode = pNext;
 	}
-	p->pDirtyNext = 0;
-	return p;
+	SyMemBackendFree(&pStore->sMem,pTable->pZset);
+	pTable->pZset = 0;
 }
 /*
- * See block comment above.
+ * Discard the deadlines held in memory and load the committed ones from
+ * disk, after the transaction that may have changed them was rolled back.
  */
-static Page * page_merge_hot(Page *pA, Page *pB)
+static void vedisExpireReload(vedis *pStore)
 {
-	Page result, *pTail;
-    /* Prevent compiler warning */
-	result.pNextHot = result.pPrevHot = 0;
-	pTail = &result;
-	while( pA && pB ){
-		if( pA->pgno < pB->pgno ){
-			pTail->pPrevHot = pA;
-			pA->pNextHot = pTail;
-			pTail = pA;
-			pA = pA->pPrevHot;
-		}else{
-			pTail->pPrevHot = pB;
-			pB->pNextHot = pTail;
-			pTail = pB;
-			pB = pB->pPrevHot;
-		}
+	vedis_table *pTable = pStore->pExpire;
+	SyBlob sWorker;
+	sxu32 nEntry,nLastID;
+	sxu32 nOfft;
+	sxu16 iMagic;
+	if( pTable == 0 || vedisPagerisMemStore(pStore) ){
+		/* Nothing was written to disk */
+		return;
 	}
-	if( pA ){
-		pTail->pPrevHot = pA;
-		pA->pNextHot = pTail;
-	}else if( pB ){
-		pTail->pPrevHot = pB;
-		pB->pNextHot = pTail;
-	}else{
-		pTail->pPrevHot = pTail->pNextHot = 0;
+	pTable->iFlags |= VEDIS_TABLE_DISK_LOAD;
+	while( pTable->nEntry > 0 ){
+		vedisTableUnlinkNode(pTable->pFirst);
 	}
-	return result.pPrevHot;
+	pTable->iFlags &= ~VEDIS_TABLE_DISK_LOAD;
+	vedisZsetRelease(pTable);
+	/* Read the committed header, if any */
+	nEntry = nLastID = 0;
+	SyBlobInit(&sWorker,&pStore->sMem);
+	SyBlobFormat(&sWorker,"vt%d%z",VEDIS_TABLE_EXPIRE,&pTable->sName);
+	if( vedisTableFetchRecord(pStore,&sWorker,&nOfft) == VEDIS_OK && SyBlobLength(&sWorker) - nOfft == 10 ){
+		const unsigned char *zPtr = (const unsigned char *)SyBlobDataAt(&sWorker,nOfft);
+		SyBigEndianUnpack16(zPtr,&iMagic);
+		if( iMagic == VEDIS_TABLE_MAGIC ){
+			SyBigEndianUnpack32(&zPtr[2],&nLastID);
+			SyBigEndianUnpack32(&zPtr[6],&nEntry);
+		}
+	}
+	SyBlobRelease(&sWorker);
+	pTable->nLastID = nLastID;
+	vedisTableLoadEntries(pTable,nEntry);
 }
 /*
-** Inputs:
-**   Map:       Input hashmap
-**   cmp:       A comparison function.
-**
-** Return Value:
-**   Sorted hashmap.
-**
-** Side effects:
-**   The "next" pointers for elements in list are changed.
-*/
-#define N_SORT_BUCKET  32
-static Page * pager_get_hot_pages(Pager *pPager)
+ * Look up the entry holding the deadline of the given key.
+ */
+static vedis_table_entry * vedisExpireEntry(vedis *pStore,const void *pKey,int nKeyLen)
 {
-	Page *a[N_SORT_BUCKET], *p, *pIn;
-	sxu32 i;
-	if( pPager->pFirstHot == 0 ){
-		/* Don't bother sorting, the list is already empty */
+	vedis_table_entry *pEntry;
+	vedis_table *pTable;
+	pTable = vedisExpireTable(pStore,FALSE);
+	if( pTable == 0 || pTable->nEntry < 1 || nKeyLen == 0 ){
+		/* Don't bother, no key expires */
 		return 0;
 	}
-	SyZero(a, sizeof(a));
-	/* Point to the first inserted entry */
-	pIn = pPager->pFirstHot;
-	while( pIn ){
-		p = pIn;
-		pIn = p->pPrevHot;
-		p->pPrevHot = 0;
-		for(i=0; i<N_SORT_BUCKET-1; i++){
-			if( a[i]==0 ){
-				a[i] = p;
-				break;
-			}else{
-				p = page_merge_hot(a[i], p);
-				a[i] = 0;
-			}
-		}
-		if( i==N_SORT_BUCKET-1 ){
-			/* To get here, there need to be 2^(N_SORT_BUCKET) elements in he input list.
-			 * But that is impossible.
-			 */
-			a[i] = page_merge_hot(a[i], p);
-		}
+	if( nKeyLen < 0 ){
+		/* Assume a null terminated string and compute its length */
+		nKeyLen = SyStrlen((const char *)pKey);
 	}
-	p = a[0];
-	for(i=1; i<N_SORT_BUCKET; i++){
-		p = page_merge_hot(p,a[i]);
+	if( vedisTableLookupBlobKey(pTable,pKey,(sxu32)nKeyLen,&pEntry) != SXRET_OK ){
+		return 0;
 	}
-	p->pNextHot = 0;
-	return p;
+	return pEntry;
 }
 /*
-** The format for the journal header is as follows:
-** - 8 bytes: Magic identifying journal format.
-** - 4 bytes: Number of records in journal.
-** - 4 bytes: Random number used for page hash.
-** - 8 bytes: Initial database page count.
-** - 4 bytes: Sector size used by the process that wrote this journal.
-** - 4 bytes: Database page size.
-** 
-** Followed by (JOURNAL_HDR_SZ - 28) bytes of unused space.
-*/
+ * Delete the given key if it is due. Return VEDIS_NOTFOUND if it is, so
+ * that the key is reported as missing, or VEDIS_OK otherwise. Keys of a
+ * read-only database are reported as missing without being deleted.
+ */
+VEDIS_PRIVATE int vedisExpireCheck(vedis *pStore,const void *pKey,int nKeyLen)
+{
+	vedis_table_entry *pEntry;
+	pEntry = vedisExpireEntry(pStore,pKey,nKeyLen);
+	if( pEntry == 0 || vedisZsetEntryScore(pEntry) > (double)vedisExpireNow() ){
+		return VEDIS_OK;
+	}
+	if( !vedisPagerisReadOnly(pStore) ){
+		vedisKvDelete(pStore,pKey,nKeyLen);
+		vedisZsetRemoveEntry(pStore->pExpire,pEntry);
+		pStore->nExpired++;
+	}
+	return VEDIS_NOTFOUND;
+}
 /*
-** Open the journal file and extract its header information.
-**
-** If the header is read successfully, *pNRec is set to the number of
-** page records following this header and *pDbSize is set to the size of the
-** database before the transaction began, in pages. Also, pPager->cksumInit
-** is set to the value read from the journal header. VEDIS_OK is returned
-** in this case.
-**
-** If the journal header file appears to be corrupted, VEDIS_DONE is
-** returned and *pNRec and *PDbSize are undefined.  If JOURNAL_HDR_SZ bytes
-** cannot be read from the journal file an error code is returned.
-*/
-static int pager_read_journal_header(
-  Pager *pPager,               /* Pager object */
-  sxu32 *pNRec,                /* OUT: Value read from the nRec field */
-  pgno  *pDbSize               /* OUT: Value of original database size field */
-)
+ * Tell whether the given key is due, without deleting it.
+ */
+VEDIS_PRIVATE int vedisExpireIsDue(vedis *pStore,const void *pKey,int nKeyLen)
 {
-	sxu32 iPageSize,iSectorSize;
-	unsigned char zMagic[8];
-	sxi64 iHdrOfft;
-	sxi64 iSize;
-	int rc;
-	/* Offset to start reading from */
-	iHdrOfft = 0;
-	/* Get the size of the journal */
-	rc = vedisOsFileSize(pPager->pjfd,&iSize);
-	if( rc != VEDIS_OK ){
-		return VEDIS_DONE;
+	vedis_table_entry *pEntry;
+	pEntry = vedisExpireEntry(pStore,pKey,nKeyLen);
+	return pEntry != 0 && vedisZsetEntryScore(pEntry) <= (double)vedisExpireNow();
+}
+/*
+ * Remove the deadline of the given key, if any.
+ */
+VEDIS_PRIVATE int vedisExpireClear(vedis *pStore,const void *pKey,int nKeyLen)
+{
+	vedis_table_entry *pEntry;
+	pEntry = vedisExpireEntry(pStore,pKey,nKeyLen);
+	if( pEntry == 0 ){
+		return VEDIS_NOTFOUND;
 	}
-	/* If the journal file is too small, return VEDIS_DONE. */
-	if( 32 /* Minimum sector size */> iSize ){
-		return VEDIS_DONE;
+	return vedisZsetRemoveEntry(pStore->pExpire,pEntry);
+}
+/*
+ * Set the deadline of an existing key, deleting the key right away if the
+ * deadline has passed. Return VEDIS_NOTFOUND if the key does not exist.
+ */
+VEDIS_PRIVATE int vedisExpireSet(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 iDeadline)
+{
+	vedis_table *pTable;
+	vedis_value sKey;
+	SyString sStr;
+	double rScore;
+	int bNew;
+	int rc;
+	if( vedisPagerisReadOnly(pStore) ){
+		vedisGenError(pStore,"Read-only database");
+		return VEDIS_READ_ONLY;
 	}
-	/* Make sure we are dealing with a valid journal */
-	rc = vedisOsRead(pPager->pjfd,zMagic,sizeof(zMagic),iHdrOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	if( nKeyLen < 0 ){
+		/* Assume a null terminated string and compute its length */
+		nKeyLen = SyStrlen((const char *)pKey);
 	}
-	if( SyMemcmp(zMagic,aJournalMagic,sizeof(zMagic)) != 0 ){
-		return VEDIS_DONE;
+	rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		rc = vedisKvFetchCallback(pStore,pKey,nKeyLen,0,0);
 	}
-	iHdrOfft += sizeof(zMagic);
-	 /* Read the first three 32-bit fields of the journal header: The nRec
-      ** field, the checksum-initializer and the database size at the start
-      ** of the transaction. Return an error code if anything goes wrong.
-      */
-	rc = ReadInt32(pPager->pjfd,pNRec,iHdrOfft);
 	if( rc != VEDIS_OK ){
+		/* No such key */
 		return rc;
 	}
-	iHdrOfft += 4;
-	rc = ReadInt32(pPager->pjfd,&pPager->cksumInit,iHdrOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	if( iDeadline <= vedisExpireNow() ){
+		vedisExpireClear(pStore,pKey,nKeyLen);
+		return vedisKvDelete(pStore,pKey,nKeyLen);
 	}
-	iHdrOfft += 4;
-	rc = ReadInt64(pPager->pjfd,pDbSize,iHdrOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	pTable = vedisExpireTable(pStore,TRUE);
+	if( pTable == 0 ){
+		vedisGenOutofMem(pStore);
+		return VEDIS_NOMEM;
 	}
-	iHdrOfft += 8;
-	/* Read the page-size and sector-size journal header fields. */
-	rc = ReadInt32(pPager->pjfd,&iSectorSize,iHdrOfft);
-	if( rc != VEDIS_OK ){
-		return rc;
+	SyStringInitFromBuf(&sStr,pKey,nKeyLen);
+	vedisMemObjInitFromString(pStore,&sKey,&sStr);
+	rc = vedisZsetAdd(pTable,&sKey,(double)iDeadline,FALSE,&rScore,&bNew);
+	vedisMemObjRelease(&sKey);
+	return rc;
+}
+/*
+ * Store the deadline of the given key in *pDeadline, or -1 if the key
+ * does not expire. Return VEDIS_NOTFOUND if the key does not exist.
+ */
+VEDIS_PRIVATE int vedisExpireDeadline(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 *pDeadline)
+{
+	vedis_table_entry *pEntry;
+	int rc;
+	rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		rc = vedisKvFetchCallback(pStore,pKey,nKeyLen,0,0);
 	}
-	iHdrOfft += 4;
-	rc = ReadInt32(pPager->pjfd,&iPageSize,iHdrOfft);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Check that the values read from the page-size and sector-size fields
-    ** are within range. To be 'in range', both values need to be a power
-    ** of two greater than or equal to 512 or 32, and not greater than their 
-    ** respective compile time maximum limits.
-    */
-    if( iPageSize < VEDIS_MIN_PAGE_SIZE || iSectorSize<32
-     || iPageSize > VEDIS_MAX_PAGE_SIZE || iSectorSize>MAX_SECTOR_SIZE
-     || ((iPageSize-1)&iPageSize)!=0    || ((iSectorSize-1)&iSectorSize)!=0 
-    ){
-      /* If the either the page-size or sector-size in the journal-header is 
-      ** invalid, then the process that wrote the journal-header must have 
-      ** crashed before the header was synced. In this case stop reading 
-      ** the journal file here.
-      */
-      return VEDIS_DONE;
-    }
-    /* Update the assumed sector-size to match the value used by 
-    ** the process that created this journal. If this journal was
-    ** created by a process other than this one, then this routine
-    ** is being called from within pager_playback(). The local value
-    ** of Pager.sectorSize is restored at the end of that routine.
-    */
-    pPager->iSectorSize = iSectorSize;
-	pPager->iPageSize = iPageSize;
-	/* Ready to rollback */
-	pPager->iJournalOfft = JOURNAL_HDR_SZ(pPager);
-	/* All done */
+	pEntry = vedisExpireEntry(pStore,pKey,nKeyLen);
+	*pDeadline = pEntry ? (vedis_int64)vedisZsetEntryScore(pEntry) : -1;
 	return VEDIS_OK;
 }
 /*
- * Write the journal header in the given memory buffer.
- * The given buffer is big enough to hold the whole header.
+ * Delete at most nMax keys that are due, starting with the earliest
+ * deadline, and store the number of deleted keys in *pExpired.
  */
-static int pager_write_journal_header(Pager *pPager,unsigned char *zBuf)
+VEDIS_PRIVATE int vedisExpireStep(vedis *pStore,int nMax,int *pExpired)
 {
-	unsigned char *zPtr = zBuf;
-	/* 8 bytes magic number */
-	SyMemcpy(aJournalMagic,zPtr,sizeof(aJournalMagic));
-	zPtr += sizeof(aJournalMagic);
-	/* 4 bytes: Number of records in journal. */
-	SyBigEndianPack32(zPtr,0);
-	zPtr += 4;
-	/* 4 bytes: Random number used to compute page checksum. */
-	SyBigEndianPack32(zPtr,pPager->cksumInit);
-	zPtr += 4;
-	/* 8 bytes: Initial database page count. */
-	SyBigEndianPack64(zPtr,pPager->dbOrigSize);
-	zPtr += 8;
-	/* 4 bytes: Sector size used by the process that wrote this journal. */
-	SyBigEndianPack32(zPtr,(sxu32)pPager->iSectorSize);
-	zPtr += 4;
-	/* 4 bytes: Database page size. */
-	SyBigEndianPack32(zPtr,(sxu32)pPager->iPageSize);
-	return VEDIS_OK;
+	vedis_table_entry *pEntry;
+	vedis_zset_node *pNode;
+	vedis_table *pTable;
+	vedis_zset *pZset;
+	vedis_int64 iNow;
+	int rc = VEDIS_OK;
+	int n = 0;
+	*pExpired = 0;
+	pTable = vedisExpireTable(pStore,FALSE);
+	if( pTable == 0 || pTable->nEntry < 1 || vedisPagerisReadOnly(pStore) ){
+		return VEDIS_OK;
+	}
+	pZset = vedisZsetIndex(pTable);
+	if( pZset == 0 ){
+		vedisGenOutofMem(pStore);
+		return VEDIS_NOMEM;
+	}
+	iNow = vedisExpireNow();
+	while( n < nMax ){
+		pNode = pZset->pHeader->aLevel[0].pForward;
+		if( pNode == 0 || pNode->rScore > (double)iNow ){
+			/* Nothing else is due */
+			break;
+		}
+		pEntry = pNode->pEntry;
+		rc = vedisKvDelete(pStore,SyBlobData(&pEntry->xKey.sKey),(int)SyBlobLength(&pEntry->xKey.sKey));
+		if( rc != VEDIS_OK && rc != VEDIS_NOTFOUND ){
+			break;
+		}
+		rc = vedisZsetRemoveEntry(pTable,pEntry);
+		if( rc != VEDIS_OK ){
+			break;
+		}
+		n++;
+	}
+	pStore->nExpired += n;
+	*pExpired = n;
+	return rc;
 }
 /*
-** Parameter aData must point to a buffer of pPager->pageSize bytes
-** of data. Compute and return a checksum based ont the contents of the 
-** page of data and the current value of pPager->cksumInit.
-**
-** This is not a real checksum. It is really just the sum of the 
-** random initial value (pPager->cksumInit) and every 200th byte
-** of the page data, starting with byte offset (pPager->pageSize%200).
-** Each byte is interpreted as an 8-bit unsigned integer.
-**
-** Changing the formula used to compute this checksum results in an
-** incompatible journal file format.
-**
-** If journal corruption occurs due to a power failure, the most likely 
-** scenario is that one end or the other of the record will be changed. 
-** It is much less likely that the two ends of the journal record will be
-** correct and the middle be corrupt.  Thus, this "checksum" scheme,
-** though fast and simple, catches the mostly likely kind of corruption.
-*/
-static sxu32 pager_cksum(Pager *pPager,const unsigned char *zData)
+ * Fill in the number of keys that have a deadline and the number of keys
+ * expired since the handle was opened.
+ */
+VEDIS_PRIVATE int vedisExpireStats(vedis *pStore,vedis_int64 *pVolatile,vedis_int64 *pExpired)
 {
-  sxu32 cksum = pPager->cksumInit;         /* Checksum value to return */
-  int i = pPager->iPageSize-200;          /* Loop counter */
-  while( i>0 ){
-    cksum += zData[i];
-    i -= 200;
-  }
-  return cksum;
+	vedis_table *pTable;
+	pTable = vedisExpireTable(pStore,FALSE);
+	*pVolatile = pTable ? (vedis_int64)pTable->nEntry : 0;
+	*pExpired = pStore->nExpired;
+	return VEDIS_OK;
 }
 /*
-** Read a single page from the journal file opened on file descriptor
-** jfd. Playback this one page. Update the offset to read from.
-*/
-static int pager_play_back_one_page(Pager *pPager,sxi64 *pOfft,unsigned char *zTmp)
+ * ----------------------------------------------------------
+ * File: parse.c
+ * MD5: 90f0b67cbdc5dc75d39c2ce4f9ba3edd
+ * ----------------------------------------------------------
+ */
+/*
+ * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
+ * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
+ * Version 1.2.6
+ * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
+ * please contact Symisc Systems via:
+ *       legal@symisc.net
+ *       licensing@symisc.net
+ *       contact@symisc.net
+ * or visit:
+ *      http://vedis.symisc.net/
+ */
+/* $SymiscID: parse.c v1.3 Win7 2013-07-08 05:42 stable <chm@symisc.net> $ */
+#ifndef VEDIS_AMALGAMATION
+#include "vedisInt.h"
+#endif
+/* Vedis command Lexer & parser */
+/*
+ * Tokenize a raw input.
+ * Get a single low-level token from the input file. Update the stream pointer so that
+ * it points to the first character beyond the extracted token.
+ */
+static sxi32 vedisTokenizeInput(SyStream *pStream,SyToken *pToken,void *pUserData,void *pCtxData)
 {
-	unsigned char *zData = zTmp;
-	sxi64 iOfft; /* Offset to read from */
-	pgno iNum;   /* Pager number */
-	sxu32 ckSum; /* Sanity check */
-	int rc;
-	/* Offset to start reading from */
-	iOfft = *pOfft;
-	/* Database page number */
-	rc = ReadInt64(pPager->pjfd,&iNum,iOfft);
-	if( rc != VEDIS_OK ){ return rc; }
-	iOfft += 8;
-	/* Page data */
-	rc = vedisOsRead(pPager->pjfd,zData,pPager->iPageSize,iOfft);
-	if( rc != VEDIS_OK ){ return rc; }
-	iOfft += pPager->iPageSize;
-	/* Page cksum */
-	rc = ReadInt32(pPager->pjfd,&ckSum,iOfft);
-	if( rc != VEDIS_OK ){ return rc; }
-	iOfft += 4;
-	/* Synchronize pointers */
-	*pOfft = iOfft;
-	/* Make sure we are dealing with a valid page */
-	if( ckSum != pager_cksum(pPager,zData) ){
-		/* Ignore that page */
-		return SXERR_IGNORE;
+	const unsigned char *zIn;
+	SyString *pStr;
+	sxi32 c;
+	/* Ignore leading white spaces */
+	while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisSpace(pStream->zText[0]) ){
+		/* Advance the stream cursor */
+		if( pStream->zText[0] == '\n' ){
+			/* Update line counter */
+			pStream->nLine++;
+		}
+		pStream->zText++;
 	}
-	if( iNum >= pPager->dbSize ){
-		/* Ignore that page */
-		return VEDIS_OK;
+	if( pStream->zText >= pStream->zEnd ){
+		/* End of input reached */
+		return SXERR_EOF;
 	}
-	/* playback */
+	/* Record token starting position and line */
+	pToken->nLine = pStream->nLine;
+	pToken->pUserData = 0;
+	pStr = &pToken->sData;
+	SyStringInitFromBuf(pStr, pStream->zText, 0);
+	if( pStream->zText[0] == ';' ){
+		pStream->zText++;
+		/* A stream of semi-colons */
+		while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && pStream->zText[0] == ';' ){
+			pStream->zText++;
+		}
+		/* Mark the token */
+		pToken->nType = VEDIS_TK_SEMI;
+		/* Record token length */
+		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
+	}else if( SyisDigit(pStream->zText[0]) ){
+		pStream->zText++;
+		/* Decimal digit stream */
+		while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
+			pStream->zText++;
+		}
+		/* Mark the token as integer until we encounter a real number */
+		pToken->nType = VEDIS_TK_INTEGER;
+		if( pStream->zText < pStream->zEnd ){
+			c = pStream->zText[0];
+			if( c == '.' ){
+				/* Real number */
+				pStream->zText++;
+				while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
+					pStream->zText++;
+				}
+				if( pStream->zText < pStream->zEnd ){
+					c = pStream->zText[0];
+					if( c=='e' || c=='E' ){
+						pStream->zText++;
+						if( pStream->zText < pStream->zEnd ){
+							c = pStream->zText[0];
+							if( (c =='+' || c=='-') && &pStream->zText[1] < pStream->zEnd  &&
+								pStream->zText[1] < 0xc0 && SyisDigit(pStream->zText[1]) ){
+									pStream->zText++;
+							}
+							while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
+								pStream->zText++;
+							}
+						}
+					}
+				}
+				pToken->nType = VEDIS_TK_REAL;
+			}else if( c=='e' || c=='E' ){
+				SXUNUSED(pUserData); /* Prevent compiler warning */
+				SXUNUSED(pCtxData);
+				pStream->zText++;
+				if( pStream->zText < pStream->zEnd ){
+					c = pStream->zText[0];
+					if( (c =='+' || c=='-') && &pStream->zText[1] < pStream->zEnd  &&
+						pStream->zText[1] < 0xc0 && SyisDigit(pStream->zText[1]) ){
+							pStream->zText++;
+					}
+					while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisDigit(pStream->zText[0]) ){
+						pStream->zText++;
+					}
+				}
+				pToken->nType = VEDIS_TK_REAL;
+			}else if( c == 'x' || c == 'X' ){
+				/* Hex digit stream */
+				pStream->zText++;
+				while( pStream->zText < pStream->zEnd && pStream->zText[0] < 0xc0 && SyisHex(pStream->zText[0]) ){
+					pStream->zText++;
+				}
+			}else if(c  == 'b' || c == 'B' ){
+				/* Binary digit stream */
+				pStream->zText++;
+				while( pStream->zText < pStream->zEnd && (pStream->zText[0] == '0' || pStream->zText[0] == '1') ){
+					pStream->zText++;
+				}
+			}
+		}
+		/* Record token length */
+		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
+	}else if( pStream->zText[0] == '"' || pStream->zText[0] == '\'' ){
+		/* Quoted string */
+		c = pStream->zText[0];
+		pStream->zText++;
+		pStr->zString++;
+		while( pStream->zText < pStream->zEnd ){
+			if( pStream->zText[0] == c  ){
+				if( pStream->zText[-1] != '\\' ){
+					break;
+				}
+			}
+			if( pStream->zText[0] == '\n' ){
+				pStream->nLine++;
+			}
+			pStream->zText++;
+		}
+		/* Record token length and type */
+		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
+		pToken->nType = VEDIS_TK_STREAM;
+		/* Jump the trailing quote */
+		pStream->zText++;
+	}else{
+		/* The following code fragment is taken verbatim from the xPP source tree.
+		 * xPP is a modern embeddable macro processor with advanced features useful for
+		 * application seeking for a production quality, ready to use macro processor.
+		 * xPP is a widely used library developed and maintened by Symisc Systems.
+		 * You can reach the xPP home page by following this link:
+		 * http://symisc.net/
+		 */
+		/* Isolate UTF-8 or alphanumeric stream */
+		if( pStream->zText[0] < 0xc0 ){
+			pStream->zText++;
+		}
+		for(;;){
+			zIn = pStream->zText;
+			if( zIn[0] >= 0xc0 ){
+				zIn++;
+				/* UTF-8 stream */
+				while( zIn < pStream->zEnd && ((zIn[0] & 0xc0) == 0x80) ){
+					zIn++;
+				}
+			}
+			/* Delimit the stream */
+			while( zIn < pStream->zEnd && zIn[0] < 0xc0 && zIn[0] != ';' && !SyisSpace(zIn[0]) ){
+				zIn++;
+			}
+			if( zIn == pStream->zText ){
+				/* End of the stream */
+				break;
+			}
+			/* Synchronize pointers */
+			pStream->zText = zIn;
+		}
+		/* Record token length */
+		pStr->nByte = (sxu32)((const char *)pStream->zText-pStr->zString);
+		/* A simple identifier */
+		pToken->nType = VEDIS_TK_STREAM;
+	}
+	/* Tell the upper-layer to save the extracted token for later processing */
+	return SXRET_OK;
+}
+/*
+ * Tokenize a raw input. 
+ */
+static sxi32 vedisTokenize(const char *zInput,sxu32 nLen,SySet *pOut)
+{
+	SyLex sLexer;
+	sxi32 rc;
+	/* Initialize the lexer */
+	rc = SyLexInit(&sLexer, &(*pOut),vedisTokenizeInput,0);
+	if( rc != SXRET_OK ){
+		return rc;
+	}
+	/* Tokenize input */
+	rc = SyLexTokenizeInput(&sLexer, zInput, nLen, 0, 0, 0);
+	/* Release the lexer */
+	SyLexRelease(&sLexer);
+	/* Tokenization result */
+	return rc;
+}
+/*
+ * Vedis parser state is recorded in an instance of the following structure.
+ */
+typedef struct vedis_gen_state vedis_gen_state;
+struct vedis_gen_state
+{
+	SyToken *pIn;  /* Token stream */
+	SyToken *pEnd; /* End of the token stream */
+	vedis *pVedis;    /* Vedis handle  */
+};
+static int vedisInitContext(vedis_context *pCtx,vedis *pVedis,vedis_cmd *pCmd)
+{
+	pCtx->pVedis = pVedis;
+	pCtx->pCmd = pCmd;
+	SyBlobInit(&pCtx->sWorker,&pVedis->sMem);
+	SySetInit(&pCtx->sVar, &pVedis->sMem, sizeof(vedis_value *));
+	pCtx->pRet = &pVedis->sResult;
+	/* Invalidate any prior representation */
+	vedisMemObjRelease(pCtx->pRet);
+	return VEDIS_OK;
+}
+VEDIS_PRIVATE SyBlob * VedisContextResultBuffer(vedis_context *pCtx)
+{
+	return &pCtx->pRet->sBlob;
+}
+VEDIS_PRIVATE SyBlob * VedisContextWorkingBuffer(vedis_context *pCtx)
+{
+	return &pCtx->sWorker;
+}
+static void vedisReleaseContext(vedis_context *pCtx)
+{
+	sxu32 n;
+	if( SySetUsed(&pCtx->sVar) > 0 ){
+		/* Context alloacated values */
+		vedis_value **apObj = (vedis_value **)SySetBasePtr(&pCtx->sVar);
+		for( n = 0 ; n < SySetUsed(&pCtx->sVar) ; ++n ){
+			if( apObj[n] == 0 ){
+				/* Already released */
+				continue;
+			}
+			vedisMemObjRelease(apObj[n]);
+			SyMemBackendPoolFree(&pCtx->pVedis->sMem, apObj[n]);
+		}
+		SySetRelease(&pCtx->sVar);
+	}
+	SyBlobRelease(&pCtx->sWorker);
+}
+static void vedisObjContainerDestroy(SySet *aValues,vedis *pVedis)
+{
+	vedis_value **apValues = (vedis_value **)SySetBasePtr(aValues);
+	sxu32 n;
+	for( n = 0 ; n < SySetUsed(aValues) ; ++n ){
+		vedis_value *pValue = apValues[n];
+		/* Destroy the object */
+		vedisObjectValueDestroy(pVedis,pValue);
+	}
+	SySetRelease(aValues);
+}
+static int vedisExec(vedis_gen_state *pGen)
+{
+	vedis_value *pValue;
+	vedis_context sCtx;
+	vedis_cmd *pCmd;
+	vedis *pStore;
+	SySet sValue;
+	int rc;
+	/* Get the target command */
+	if( !(pGen->pIn->nType & VEDIS_TK_STREAM) ){
+		vedisGenError(pGen->pVedis,"Invalid Vedis command");
+		return SXERR_INVALID;
+	}
+	pStore = pGen->pVedis;
+	/* Extract it */
+	pCmd = vedisFetchCommand(pStore,&pGen->pIn->sData);
+	if( pCmd == 0 ){
+		vedisGenErrorFormat(pStore,"Unknown Vedis command: '%z'",&pGen->pIn->sData);
+		return SXERR_UNKNOWN;
+	}
+	pGen->pIn++;
+	/* Collect command arguments */
+	SySetInit(&sValue,&pStore->sMem,sizeof(vedis_value *));
+	while( pGen->pIn < pGen->pEnd && (pGen->pIn->nType != VEDIS_TK_SEMI /*';'*/) ){
+		pValue = vedisNewObjectValue(pStore,pGen->pIn);
+		if( pValue ){
+			SySetPut(&sValue,(const void *)&pValue);
+		}
+		/* Point to the next token */
+		pGen->pIn++;
+	}
+	/* Init the call context */
+	vedisInitContext(&sCtx,pStore,pCmd);
+	/* Invoke the command */
+	rc = pCmd->xCmd(&sCtx,(int)SySetUsed(&sValue),(vedis_value **)SySetBasePtr(&sValue));
+	if( rc == VEDIS_ABORT ){
+		vedisGenErrorFormat(pGen->pVedis,"Vedis command '%z' request an operation abort",&pCmd->sName);
+	}else{
+		rc = VEDIS_OK;
+	}
+	/* Invoke any output consumer callback */
+	if( pStore->xResultConsumer && rc == VEDIS_OK ){
+		rc = pStore->xResultConsumer(sCtx.pRet,pStore->pUserData);
+		if( rc != VEDIS_ABORT ){
+			rc = VEDIS_OK;
+		}
+	}
+	/* Cleanup */
+	vedisReleaseContext(&sCtx);
+	vedisObjContainerDestroy(&sValue,pGen->pVedis);
+	return rc;
+}
+/*
+ * Execute a single command whose arguments are already split.
+ * Unlike vedisProcessInput(), the input is not tokenized so the arguments
+ * are passed verbatim to the command (quotes, backslashes, white spaces and
+ * NUL bytes included). The type of each argument is given by the aiType[]
+ * array (one of the VEDIS_ARG_* constants). A NULL aiType[] means that
+ * all arguments are strings.
+ */
+VEDIS_PRIVATE int vedisExecArgv(vedis *pStore,const SyString *pName,int nArg,const char **azArg,const int *anArgLen,const int *aiType)
+{
+	vedis_value *pValue;
+	vedis_context sCtx;
+	vedis_cmd *pCmd;
+	SyString sArg;
+	SySet sValue;
+	int iType;
+	int rc;
+	int i;
+	/* Extract the target command */
+	pCmd = vedisFetchCommand(pStore,(SyString *)pName);
+	if( pCmd == 0 ){
+		vedisGenErrorFormat(pStore,"Unknown Vedis command: '%z'",pName);
+		return SXERR_UNKNOWN;
+	}
+	/* Collect command arguments */
+	SySetInit(&sValue,&pStore->sMem,sizeof(vedis_value *));
+	for( i = 0 ; i < nArg ; ++i ){
+		pValue = (vedis_value *)SyMemBackendPoolAlloc(&pStore->sMem,sizeof(vedis_value));
+		if( pValue == 0 ){
+			vedisObjContainerDestroy(&sValue,pStore);
+			vedisGenOutofMem(pStore);
+			return VEDIS_NOMEM;
+		}
+		iType = aiType ? aiType[i] : VEDIS_ARG_STRING;
+		if( iType == VEDIS_ARG_NULL || azArg[i] == 0 ){
+			vedisMemObjInit(pStore,pValue);
+		}else{
+			SyStringInitFromBuf(&sArg,azArg[i],anArgLen[i] < 0 ? SyStrlen(azArg[i]) : (sxu32)anArgLen[i]);
+			vedisMemObjInitFromString(pStore,pValue,&sArg);
+			if( iType == VEDIS_ARG_INT ){
+				vedisMemObjToInteger(pValue);
+			}else if( iType == VEDIS_ARG_REAL ){
+				vedisMemObjToReal(pValue);
+			}
+		}
+		SySetPut(&sValue,(const void *)&pValue);
+	}
+	/* Init the call context */
+	vedisInitContext(&sCtx,pStore,pCmd);
+	/* Invoke the command */
+	rc = pCmd->xCmd(&sCtx,(int)SySetUsed(&sValue),(vedis_value **)SySetBasePtr(&sValue));
+	if( rc == VEDIS_ABORT ){
+		vedisGenErrorFormat(pStore,"Vedis command '%z' request an operation abort",&pCmd->sName);
+	}else{
+		rc = VEDIS_OK;
+	}
+	/* Invoke any output consumer callback */
+	if( pStore->xResultConsumer && rc == VEDIS_OK ){
+		rc = pStore->xResultConsumer(sCtx.pRet,pStore->pUserData);
+		if( rc != VEDIS_ABORT ){
+			rc = VEDIS_OK;
+		}
+	}
+	/* Cleanup */
+	vedisReleaseContext(&sCtx);
+	vedisObjContainerDestroy(&sValue,pStore);
+	return rc;
+}
+
+VEDIS_PRIVATE int vedisProcessInput(vedis *pVedis,const char *zInput,sxu32 nByte)
+{
+	SySet sToken;
+	int rc;
+	/* Prepare the tokenizer */
+	SySetInit(&sToken,&pVedis->sMem,sizeof(SyToken));
+	/* Tokenize the input */
+	rc = vedisTokenize(zInput,nByte,&sToken);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	rc = VEDIS_OK;
+	if( SySetUsed(&sToken) > 0 ){
+		vedis_gen_state sGen;
+		/* Init the parser state */
+		sGen.pIn = (SyToken *)SySetBasePtr(&sToken);
+		sGen.pEnd = &sGen.pIn[SySetUsed(&sToken)];
+		sGen.pVedis = pVedis;
+		/* Process the pipelined commands */
+		for(;;){
+			while( sGen.pIn < sGen.pEnd && sGen.pIn->nType == VEDIS_TK_SEMI ){
+				/* Discard leading and trailing semi-colons */
+				sGen.pIn++;
+			}
+			if( sGen.pIn >= sGen.pEnd ){
+				/* End of the vedis input */
+				break;
+			}
+			/* Execute the command if available */
+			rc = vedisExec(&sGen);
+			if( rc != VEDIS_OK ){
+				break;
+			}
+		}
+	}
+	/* Fall through */
+fail:
+	/* Cleanup */
+	SySetRelease(&sToken);
+	return rc;
+}
+/*
+ * ----------------------------------------------------------
+ * File: pager.c
+ * MD5: b4db2677f77d8b4f49a90287106a7de1
+ * ----------------------------------------------------------
+ */
+/*
+ * Symisc Vedis: An Embeddable NoSQL (Post Modern) Database Engine.
+ * Copyright (C) 2012-2013, Symisc Systems http://vedis.org/
+ * Version 1.1.6
+ * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
+ * please contact Symisc Systems via:
+ *       legal@symisc.net
+ *       licensing@symisc.net
+ *       contact@symisc.net
+ * or visit:
+ *      http://vedis.org/licensing.html
+ */
+ /* $SymiscID: pager.c v1.1 Win7 2012-11-29 03:46 stable <chm@symisc.net> $ */
+#ifndef VEDIS_AMALGAMATION
+#include "vedisInt.h"
+#endif
+/*
+** This file implements the pager and the transaction manager for UnQLite (Mostly inspired from the SQLite3 Source tree).
+**
+** The Pager.eState variable stores the current 'state' of a pager. A
+** pager may be in any one of the seven states shown in the following
+** state diagram.
+**
+**                            OPEN <------+------+
+**                              |         |      |
+**                              V         |      |
+**               +---------> READER-------+      |
+**               |              |                |
+**               |              V                |
+**               |<-------WRITER_LOCKED--------->| 
+**               |              |                |  
+**               |              V                |
+**               |<------WRITER_CACHEMOD-------->|
+**               |              |                |
+**               |              V                |
+**               |<-------WRITER_DBMOD---------->|
+**               |              |                |
+**               |              V                |
+**               +<------WRITER_FINISHED-------->+
+** 
+**  OPEN:
+**
+**    The pager starts up in this state. Nothing is guaranteed in this
+**    state - the file may or may not be locked and the database size is
+**    unknown. The database may not be read or written.
+**
+**    * No read or write transaction is active.
+**    * Any lock, or no lock at all, may be held on the database file.
+**    * The dbSize and dbOrigSize variables may not be trusted.
+**
+**  READER:
+**
+**    In this state all the requirements for reading the database in 
+**    rollback mode are met. Unless the pager is (or recently
+**    was) in exclusive-locking mode, a user-level read transaction is 
+**    open. The database size is known in this state.
+** 
+**    * A read transaction may be active (but a write-transaction cannot).
+**    * A SHARED or greater lock is held on the database file.
+**    * The dbSize variable may be trusted (even if a user-level read 
+**      transaction is not active). The dbOrigSize variables
+**      may not be trusted at this point.
+**    * Even if a read-transaction is not open, it is guaranteed that 
+**      there is no hot-journal in the file-system.
+**
+**  WRITER_LOCKED:
+**
+**    The pager moves to this state from READER when a write-transaction
+**    is first opened on the database. In WRITER_LOCKED state, all locks 
+**    required to start a write-transaction are held, but no actual 
+**    modifications to the cache or database have taken place.
+**
+**    In rollback mode, a RESERVED or (if the transaction was opened with 
+**    EXCLUSIVE flag) EXCLUSIVE lock is obtained on the database file when
+**    moving to this state, but the journal file is not written to or opened 
+**    to in this state. If the transaction is committed or rolled back while 
+**    in WRITER_LOCKED state, all that is required is to unlock the database 
+**    file.
+**
+**    * A write transaction is active.
+**    * If the connection is open in rollback-mode, a RESERVED or greater 
+**      lock is held on the database file.
+**    * The dbSize and dbOrigSize variables are all valid.
+**    * The contents of the pager cache have not been modified.
+**    * The journal file may or may not be open.
+**    * Nothing (not even the first header) has been written to the journal.
+**
+**  WRITER_CACHEMOD:
+**
+**    A pager moves from WRITER_LOCKED state to this state when a page is
+**    first modified by the upper layer. In rollback mode the journal file
+**    is opened (if it is not already open) and a header written to the
+**    start of it. The database file on disk has not been modified.
+**
+**    * A write transaction is active.
+**    * A RESERVED or greater lock is held on the database file.
+**    * The journal file is open and the first header has been written 
+**      to it, but the header has not been synced to disk.
+**    * The contents of the page cache have been modified.
+**
+**  WRITER_DBMOD:
+**
+**    The pager transitions from WRITER_CACHEMOD into WRITER_DBMOD state
+**    when it modifies the contents of the database file.
+**
+**    * A write transaction is active.
+**    * An EXCLUSIVE or greater lock is held on the database file.
+**    * The journal file is open and the first header has been written 
+**      and synced to disk.
+**    * The contents of the page cache have been modified (and possibly
+**      written to disk).
+**
+**  WRITER_FINISHED:
+**
+**    A rollback-mode pager changes to WRITER_FINISHED state from WRITER_DBMOD
+**    state after the entire transaction has been successfully written into the
+**    database file. In this state the transaction may be committed simply
+**    by finalizing the journal file. Once in WRITER_FINISHED state, it is 
+**    not possible to modify the database further. At this point, the upper 
+**    layer must either commit or rollback the transaction.
+**
+**    * A write transaction is active.
+**    * An EXCLUSIVE or greater lock is held on the database file.
+**    * All writing and syncing of journal and database data has finished.
+**      If no error occured, all that remains is to finalize the journal to
+**      commit the transaction. If an error did occur, the caller will need
+**      to rollback the transaction. 
+**  
+**
+*/
+#define PAGER_OPEN                  0
+#define PAGER_READER                1
+#define PAGER_WRITER_LOCKED         2
+#define PAGER_WRITER_CACHEMOD       3
+#define PAGER_WRITER_DBMOD          4
+#define PAGER_WRITER_FINISHED       5
+/*
+** Journal files begin with the following magic string.  The data
+** was obtained from /dev/random.  It is used only as a sanity check.
+**
+** NOTE: These values must be different from the one used by SQLite3
+** to avoid journal file collision.
+**
+*/
+static const unsigned char aJournalMagic[] = {
+  0xc1, 0xd2, 0xfa, 0x77, 0x2b, 0x18, 0x27, 0x2a,
+};
+/*
+** The journal header size for this pager. This is usually the same 
+** size as a single disk sector. See also setSectorSize().
+*/
+#define JOURNAL_HDR_SZ(pPager) (pPager->iSectorSize)
+/*
+ * Database page handle.
+ * Each raw disk page is represented in memory by an instance
+ * of the following structure.
+ */
+typedef struct Page Page;
+struct Page {
+  /* Must correspond to vedis_page */
+  unsigned char *zData;           /* Content of this page */
+  void *pUserData;                /* Extra content */
+  pgno pgno;                      /* Page number for this page */
+  /**********************************************************************
+  ** Elements above are public.  All that follows is private to pcache.c
+  ** and should not be accessed by other modules.
+  */
+  Pager *pPager;                 /* The pager this page is part of */
+  int flags;                     /* Page flags defined below */
+  int nRef;                      /* Number of users of this page */
+  Page *pNext, *pPrev;    /* A list of all pages */
+  Page *pDirtyNext;             /* Next element in list of dirty pages */
+  Page *pDirtyPrev;             /* Previous element in list of dirty pages */
+  Page *pNextCollide,*pPrevCollide; /* Collission chain */
+  Page *pNextHot,*pPrevHot;    /* Hot dirty pages chain */
+  Page *pNextLru,*pPrevLru;    /* Cache of unreferenced clean pages */
+};
+/* Bit values for Page.flags */
+#define PAGE_DIRTY             0x002  /* Page has changed */
+#define PAGE_NEED_SYNC         0x004  /* fsync the rollback journal before
+                                       ** writing this page to the database */
+#define PAGE_DONT_WRITE        0x008  /* Dont write page content to disk */
+#define PAGE_NEED_READ         0x010  /* Content is unread */
+#define PAGE_IN_JOURNAL        0x020  /* Page written to the journal */
+#define PAGE_HOT_DIRTY         0x040  /* Hot dirty page */
+#define PAGE_DONT_MAKE_HOT     0x080  /* Dont make this page Hot. In other words,
+									   * do not link it to the hot dirty list.
+									   */
+#define PAGE_IN_LRU            0x100  /* Unreferenced page held in the cache */
+/*
+ * The pager reaches the operating system through a VFS of its own, which
+ * wraps the VFS registered with the library. It applies the sync mode of
+ * the database handle, coalesces the appends made to the journal file and
+ * counts the I/O operations.
+ */
+typedef struct PagerVfs PagerVfs;
+struct PagerVfs
+{
+	vedis_vfs base;            /* Methods seen by the pager. MUST BE FIRST */
+	const vedis_vfs *pReal;    /* Wrapped VFS */
+	SyMemBackend *pAllocator;  /* Allocator of the journal buffers */
+	const char *zJournal;      /* Name of the journal file */
+	int iSyncMode;             /* One of the VEDIS_SYNC_MODE_* constants */
+	int nJournalBuf;           /* Journal buffer size, zero to disable */
+	vedis_io_stats sStats;     /* I/O counters */
+};
+/*
+ * A file opened through a PagerVfs. The file of the wrapped VFS is
+ * allocated right after this structure.
+ */
+typedef struct PagerFile PagerFile;
+struct PagerFile
+{
+	const vedis_io_methods *pMethods; /* MUST BE FIRST */
+	PagerVfs *pVfs;            /* VFS this file belongs to */
+	vedis_file *pReal;         /* Wrapped file */
+	unsigned char *zBuf;       /* Pending journal appends, if buffered */
+	sxi64 iBufOfft;            /* File offset of zBuf[0] */
+	int nBuf;                  /* Bytes pending in zBuf */
+	int nBufMax;               /* Size of zBuf */
+};
+/*
+ * Each active database pager is represented by an instance of
+ * the following structure.
+ */
+struct Pager
+{
+  SyMemBackend *pAllocator;      /* Memory backend */
+  vedis *pDb;                  /* DB handle that own this instance */
+  vedis_kv_engine *pEngine;    /* Underlying KV storage engine */
+  char *zFilename;               /* Name of the database file */
+  char *zJournal;                /* Name of the journal file */
+  vedis_vfs *pVfs;             /* Underlying virtual file system */
+  vedis_file *pfd,*pjfd;       /* File descriptors for database and journal */
+  pgno dbSize;                   /* Number of pages in the file */
+  pgno dbOrigSize;               /* dbSize before the current change */
+  sxi64 dbByteSize;              /* Database size in bytes */
+  void *pMmap;                   /* Read-only Memory view (mmap) of the whole file if requested (VEDIS_OPEN_MMAP). */
+  sxu32 nRec;                    /* Number of pages written to the journal */
+  SyPRNGCtx sPrng;               /* PRNG Context */
+  sxu32 cksumInit;               /* Quasi-random value added to every checksum */
+  sxu32 iOpenFlags;              /* Flag passed to vedis_open() after processing */
+  sxi64 iJournalOfft;            /* Journal offset we are reading from */
+  int (*xBusyHandler)(void *);   /* Busy handler */
+  void *pBusyHandlerArg;         /* First arg to xBusyHandler() */
+  void (*xPageUnpin)(void *);    /* Page Unpin callback */
+  void (*xPageReload)(void *);   /* Page Reload callback */
+  int (*xCommit)(void *);        /* On commit user callback */
+  void *pCommitData;             /* First arg to xCommit() */
+  Bitvec *pVec;                  /* Bitmap */
+  Page *pHeader;                 /* Page one of the database (Unqlite header) */
+  Sytm tmCreate;                 /* Database creation time */
+  SyString sKv;                  /* Underlying Key/Value storage engine name */
+  int iState;                    /* Pager state */
+  int iLock;                     /* Lock state */
+  sxi32 iFlags;                  /* Control flags (see below) */
+  int is_mem;                    /* True for an in-memory database */
+  int is_rdonly;                 /* True for a read-only database */
+  int no_jrnl;                   /* TRUE to omit journaling */
+  int iPageSize;                 /* Page size in bytes (default 4K) */
+  int iSectorSize;               /* Size of a single sector on disk */
+  unsigned char *zTmpPage;       /* Temporary page */
+  Page *pFirstDirty;             /* First dirty pages */
+  Page *pDirty;                  /* Transient list of dirty pages */
+  Page *pAll;                    /* List of all pages */
+  Page *pHotDirty;               /* List of hot dirty pages */
+  Page *pFirstHot;               /* First hot dirty page */
+  sxu32 nHot;                    /* Total number of hot dirty pages */
+  Page **apHash;                 /* Page table */
+  sxu32 nSize;                   /* apHash[] size: Must be a power of two  */
+  sxu32 nPage;                   /* Total number of page loaded in memory */
+  sxu32 nCacheMax;               /* Maximum page to cache*/
+  Page *pLru,*pLruTail;          /* Cached unreferenced pages, most recently used first */
+  sxu32 nLru;                    /* Total number of cached unreferenced pages */
+  sxi64 nHit,nMiss,nEvict;       /* Page cache counters */
+  Bitvec *pWorkSet;              /* Distinct pages requested, if tracking is enabled */
+  sxi64 nWorkingSet;             /* Total number of bits set in pWorkSet */
+  int iPageSizeHint;             /* Page size for new databases, 0 for the default */
+  vedis_backup *pBackup;         /* Online backup in progress, if any */
+  PagerVfs sVfs;                 /* VFS wrapper used by this pager */
+};
+/* Control flags */
+#define PAGER_CTRL_COMMIT_ERR   0x001 /* Commit error */
+#define PAGER_CTRL_DIRTY_COMMIT 0x002 /* Dirty commit has been applied */
+/*
+ * State of an online backup. Pages are copied from the database file in
+ * steps, and the pages written to the database file behind the copy
+ * position are recorded so that a later step copies them again.
+ */
+struct vedis_backup
+{
+	vedis *pStore;         /* Source database */
+	vedis_file *pDest;     /* Destination file */
+	pgno iNext;            /* Next page to copy */
+	pgno *aRecopy;         /* Pages to copy again */
+	sxu32 nRecopy;         /* Used entries in aRecopy[] */
+	sxu32 nRecopyAlloc;    /* Allocated entries in aRecopy[] */
+	Bitvec *pRecopy;       /* Pages in aRecopy[] */
+	unsigned char *zPage;  /* Copy buffer */
+};
+/*
+ * Record that a page was written to the database file while an online
+ * backup is in progress.
+ */
+static void pager_backup_page_written(Pager *pPager,pgno iNum)
+{
+	vedis_backup *pBackup = pPager->pBackup;
+	pgno *aNew;
+	sxu32 nNew;
+	if( pBackup == 0 || iNum >= pBackup->iNext ){
+		/* Not copied yet */
+		return;
+	}
+	if( pBackup->pRecopy == 0 ){
+		pBackup->pRecopy = vedisBitvecCreate(pPager->pAllocator,pPager->dbSize > 0 ? pPager->dbSize : 1);
+		if( pBackup->pRecopy == 0 ){
+			goto restart;
+		}
+	}
+	if( vedisBitvecTest(pBackup->pRecopy,iNum) ){
+		return;
+	}
+	if( pBackup->nRecopy >= pBackup->nRecopyAlloc ){
+		nNew = pBackup->nRecopyAlloc > 0 ? pBackup->nRecopyAlloc << 1 : 64;
+		aNew = (pgno *)SyMemBackendRealloc(pPager->pAllocator,pBackup->aRecopy,nNew * sizeof(pgno));
+		if( aNew == 0 ){
+			goto restart;
+		}
+		pBackup->aRecopy = aNew;
+		pBackup->nRecopyAlloc = nNew;
+	}
+	if( vedisBitvecSet(pBackup->pRecopy,iNum) != VEDIS_OK ){
+		goto restart;
+	}
+	pBackup->aRecopy[pBackup->nRecopy++] = iNum;
+	return;
+restart:
+	/* Out of memory, copy every page again */
+	pBackup->iNext = 0;
+	pBackup->nRecopy = 0;
+}
+/*
+** Read a 32-bit integer from the given file descriptor. 
+** All values are stored on disk as big-endian.
+*/
+static int ReadInt32(vedis_file *pFd,sxu32 *pOut,sxi64 iOfft)
+{
+	unsigned char zBuf[4];
+	int rc;
+	rc = vedisOsRead(pFd,zBuf,sizeof(zBuf),iOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	SyBigEndianUnpack32(zBuf,pOut);
+	return VEDIS_OK;
+}
+/*
+** Read a 64-bit integer from the given file descriptor. 
+** All values are stored on disk as big-endian.
+*/
+static int ReadInt64(vedis_file *pFd,sxu64 *pOut,sxi64 iOfft)
+{
+	unsigned char zBuf[8];
+	int rc;
+	rc = vedisOsRead(pFd,zBuf,sizeof(zBuf),iOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	SyBigEndianUnpack64(zBuf,pOut);
+	return VEDIS_OK;
+}
+/*
+** Write a 32-bit integer into the given file descriptor.
+*/
+static int WriteInt32(vedis_file *pFd,sxu32 iNum,sxi64 iOfft)
+{
+	unsigned char zBuf[4];
+	int rc;
+	SyBigEndianPack32(zBuf,iNum);
+	rc = vedisOsWrite(pFd,zBuf,sizeof(zBuf),iOfft);
+	return rc;
+}
+/*
+** Write a 64-bit integer into the given file descriptor.
+*/
+static int WriteInt64(vedis_file *pFd,sxu64 iNum,sxi64 iOfft)
+{
+	unsigned char zBuf[8];
+	int rc;
+	SyBigEndianPack64(zBuf,iNum);
+	rc = vedisOsWrite(pFd,zBuf,sizeof(zBuf),iOfft);
+	return rc;
+}
+/*
+** The maximum allowed sector size. 64KiB. If the xSectorsize() method 
+** returns a value larger than this, then MAX_SECTOR_SIZE is used instead.
+** This could conceivably cause corruption following a power failure on
+** such a system. This is currently an undocumented limit.
+*/
+#define MAX_SECTOR_SIZE 0x10000
+/*
+** Get the size of a single sector on disk.
+** The sector size will be used used  to determine the size
+** and alignment of journal header and within created journal files.
+**
+** The default sector size is set to 512.
+*/
+static int GetSectorSize(vedis_file *pFd)
+{
+	int iSectorSize = VEDIS_DEFAULT_SECTOR_SIZE;
+	if( pFd ){
+		iSectorSize = vedisOsSectorSize(pFd);
+		if( iSectorSize < 32 ){
+			iSectorSize = 512;
+		}
+		if( iSectorSize > MAX_SECTOR_SIZE ){
+			iSectorSize = MAX_SECTOR_SIZE;
+		}
+	}
+	return iSectorSize;
+}
+/* Hash function for page number  */
+#define PAGE_HASH(PNUM) (PNUM)
+/*
+ * Fetch a page from the cache.
+ */
+static Page * pager_fetch_page(Pager *pPager,pgno page_num)
+{
+	Page *pEntry;
+	if( pPager->nPage < 1 ){
+		/* Don't bother hashing */
+		return 0;
+	}
+	/* Perform the lookup */
+	pEntry = pPager->apHash[PAGE_HASH(page_num) & (pPager->nSize - 1)];
+	for(;;){
+		if( pEntry == 0 ){
+			break;
+		}
+		if( pEntry->pgno == page_num ){
+			return pEntry;
+		}
+		/* Point to the next entry in the colission chain */
+		pEntry = pEntry->pNextCollide;
+	}
+	/* No such page */
+	return 0;
+}
+/*
+ * Allocate and initialize a new page.
+ */
+static Page * pager_alloc_page(Pager *pPager,pgno num_page)
+{
+	Page *pNew;
+	
+	pNew = (Page *)SyMemBackendPoolAlloc(pPager->pAllocator,sizeof(Page)+pPager->iPageSize);
+	if( pNew == 0 ){
+		return 0;
+	}
+	/* Zero the structure */
+	SyZero(pNew,sizeof(Page)+pPager->iPageSize);
+	/* Page data */
+	pNew->zData = (unsigned char *)&pNew[1];
+	/* Fill in the structure */
+	pNew->pPager = pPager;
+	pNew->nRef = 1;
+	pNew->pgno = num_page;
+	return pNew;
+}
+/*
+ * Increment the reference count of a given page.
+ */
+static void page_ref(Page *pPage)
+{
+	if( pPage->flags & PAGE_IN_LRU ){
+		/* Remove from the cache of unreferenced pages */
+		Pager *pPager = pPage->pPager;
+		if( pPage->pPrevLru ){
+			pPage->pPrevLru->pNextLru = pPage->pNextLru;
+		}else{
+			pPager->pLru = pPage->pNextLru;
+		}
+		if( pPage->pNextLru ){
+			pPage->pNextLru->pPrevLru = pPage->pPrevLru;
+		}else{
+			pPager->pLruTail = pPage->pPrevLru;
+		}
+		pPage->pNextLru = pPage->pPrevLru = 0;
+		pPage->flags &= ~PAGE_IN_LRU;
+		pPager->nLru--;
+	}
+	pPage->nRef++;
+}
+/*
+ * Release an in-memory page after its reference count reach zero.
+ */
+static int pager_release_page(Pager *pPager,Page *pPage)
+{
+	int rc = VEDIS_OK;
+	if( !(pPage->flags & PAGE_DIRTY)){
+		/* Invoke the unpin callback if available */
+		if( pPager->xPageUnpin && pPage->pUserData ){
+			pPager->xPageUnpin(pPage->pUserData);
+		}
+		pPage->pUserData = 0;
+		SyMemBackendPoolFree(pPager->pAllocator,pPage);
+	}else{
+		/* Dirty page, it will be released later when a dirty commit
+		 * or the final commit have been applied.
+		 */
+		rc = VEDIS_LOCKED;
+	}
+	return rc;
+}
+/* Forward declaration */
+static int pager_unlink_page(Pager *pPager,Page *pPage);
+/*
+ * Evict the least recently used pages until at most nCacheMax
+ * unreferenced pages are cached.
+ */
+static void pager_evict_pages(Pager *pPager)
+{
+	Page *pPage;
+	while( pPager->nLru > pPager->nCacheMax && pPager->pLruTail ){
+		pPage = pPager->pLruTail;
+		pPager->pLruTail = pPage->pPrevLru;
+		if( pPager->pLruTail ){
+			pPager->pLruTail->pNextLru = 0;
+		}else{
+			pPager->pLru = 0;
+		}
+		pPage->pNextLru = pPage->pPrevLru = 0;
+		pPage->flags &= ~PAGE_IN_LRU;
+		pPager->nLru--;
+		pPager->nEvict++;
+		pager_unlink_page(pPager,pPage);
+		pager_release_page(pPager,pPage);
+	}
+}
+/*
+ * A clean page is no longer referenced. Keep it in memory at the head of
+ * the cache so that a later request does not have to read it again, and
+ * evict the least recently used pages if the cache is full.
+ */
+static void pager_cache_page(Pager *pPager,Page *pPage)
+{
+	pPage->pPrevLru = 0;
+	pPage->pNextLru = pPager->pLru;
+	if( pPager->pLru ){
+		pPager->pLru->pPrevLru = pPage;
+	}else{
+		pPager->pLruTail = pPage;
+	}
+	pPager->pLru = pPage;
+	pPage->flags |= PAGE_IN_LRU;
+	pPager->nLru++;
+	pager_evict_pages(pPager);
+}
+/*
+ * Decrement the reference count of a given page.
+ */
+static void page_unref(Page *pPage)
+{
+	pPage->nRef--;
+	if( pPage->nRef < 1	){
+		Pager *pPager = pPage->pPager;
+		if( !(pPage->flags & PAGE_DIRTY)  ){
+			/* Cache or release the page */
+			pager_cache_page(pPager,pPage);
+		}else{
+			if( pPage->flags & PAGE_DONT_MAKE_HOT ){
+				/* Do not add this page to the hot dirty list */
+				return;
+			}
+			if( !(pPage->flags & PAGE_HOT_DIRTY) ){
+				/* Add to the hot dirty list */
+				pPage->pPrevHot = 0;
+				if( pPager->pFirstHot == 0 ){
+					pPager->pFirstHot = pPager->pHotDirty = pPage;
+				}else{
+					pPage->pNextHot = pPager->pHotDirty;
+					if( pPager->pHotDirty ){
+						pPager->pHotDirty->pPrevHot = pPage;
+					}
+					pPager->pHotDirty = pPage;
+				}
+				pPager->nHot++;
+				pPage->flags |= PAGE_HOT_DIRTY;
+			}
+		}
+	}
+}
+/*
+ * Link a freshly created page to the list of active page.
+ */
+static int pager_link_page(Pager *pPager,Page *pPage)
+{
+	sxu32 nBucket;
+	/* Install in the corresponding bucket */
+	nBucket = PAGE_HASH(pPage->pgno) & (pPager->nSize - 1);
+	pPage->pNextCollide = pPager->apHash[nBucket];
+	if( pPager->apHash[nBucket] ){
+		pPager->apHash[nBucket]->pPrevCollide = pPage;
+	}
+	pPager->apHash[nBucket] = pPage;
+	/* Link to the list of active pages */
+	MACRO_LD_PUSH(pPager->pAll,pPage);
+	pPager->nPage++;
+	if( (pPager->nPage >= pPager->nSize * 4)  && pPager->nPage < 100000 ){
+		/* Grow the hashtable */
+		sxu32 nNewSize = pPager->nSize << 1;
+		Page *pEntry,**apNew;
+		sxu32 n;
+		apNew = (Page **)SyMemBackendAlloc(pPager->pAllocator, nNewSize * sizeof(Page *));
+		if( apNew ){
+			sxu32 iBucket;
+			/* Zero the new table */
+			SyZero((void *)apNew, nNewSize * sizeof(Page *));
+			/* Rehash all entries */
+			n = 0;
+			pEntry = pPager->pAll;
+			for(;;){
+				/* Loop one */
+				if( n >= pPager->nPage ){
+					break;
+				}
+				pEntry->pNextCollide = pEntry->pPrevCollide = 0;
+				/* Install in the new bucket */
+				iBucket = PAGE_HASH(pEntry->pgno) & (nNewSize - 1);
+				pEntry->pNextCollide = apNew[iBucket];
+				if( apNew[iBucket] ){
+					apNew[iBucket]->pPrevCollide = pEntry;
+				}
+				apNew[iBucket] = pEntry;
+				/* Point to the next entry */
+				pEntry = pEntry->pNext;
+				n++;
+			}
+			/* Release the old table and reflect the change */
+			SyMemBackendFree(pPager->pAllocator,(void *)pPager->apHash);
+			pPager->apHash = apNew;
+			pPager->nSize  = nNewSize;
+		}
+	}
+	return VEDIS_OK;
+}
+/*
+ * Unlink a page from the list of active pages.
+ */
+static int pager_unlink_page(Pager *pPager,Page *pPage)
+{
+	if( pPage->pNextCollide ){
+		pPage->pNextCollide->pPrevCollide = pPage->pPrevCollide;
+	}
+	if( pPage->pPrevCollide ){
+		pPage->pPrevCollide->pNextCollide = pPage->pNextCollide;
+	}else{
+		sxu32 nBucket = PAGE_HASH(pPage->pgno) & (pPager->nSize - 1);
+		pPager->apHash[nBucket] = pPage->pNextCollide;
+	}
+	MACRO_LD_REMOVE(pPager->pAll,pPage);
+	pPager->nPage--;
+	return VEDIS_OK;
+}
+/*
+ * Update the content of a cached page.
+ */
+static int pager_fill_page(Pager *pPager,pgno iNum,void *pContents)
+{
+	Page *pPage;
+	/* Fetch the page from the catch */
+	pPage = pager_fetch_page(pPager,iNum);
+	if( pPage == 0 ){
+		return SXERR_NOTFOUND;
+	}
+	/* Reflect the change */
+	SyMemcpy(pContents,pPage->zData,pPager->iPageSize);
+
+	return VEDIS_OK;
+}
+/*
+ * Read the content of a page from disk.
+ */
+static int pager_get_page_contents(Pager *pPager,Page *pPage,int noContent)
+{
+	int rc = VEDIS_OK;
+	if( pPager->is_mem || noContent || pPage->pgno >= pPager->dbSize ){
+		/* Do not bother reading, zero the page contents only */
+		SyZero(pPage->zData,pPager->iPageSize);
+		return VEDIS_OK;
+	}
+	if( (pPager->iOpenFlags & VEDIS_OPEN_MMAP) && (pPager->pMmap /* Paranoid edition */) ){
+		unsigned char *zMap = (unsigned char *)pPager->pMmap;
+		pPage->zData = &zMap[pPage->pgno * pPager->iPageSize];
+	}else{
+		/* Read content */
+		rc = vedisOsRead(pPager->pfd,pPage->zData,pPager->iPageSize,pPage->pgno * pPager->iPageSize);
+	}
+	return rc;
+}
+/*
+ * Add a page to the dirty list.
+ */
+static void pager_page_to_dirty_list(Pager *pPager,Page *pPage)
+{
+	if( pPage->flags & PAGE_DIRTY ){
+		/* Already set */
+		return;
+	}
+	/* Mark the page as dirty */
+	pPage->flags |= PAGE_DIRTY|PAGE_NEED_SYNC|PAGE_IN_JOURNAL;
+	/* Link to the list */
+	pPage->pDirtyPrev = 0;
+	pPage->pDirtyNext = pPager->pDirty;
+	if( pPager->pDirty ){
+		pPager->pDirty->pDirtyPrev = pPage;
+	}
+	pPager->pDirty = pPage;
+	if( pPager->pFirstDirty == 0 ){
+		pPager->pFirstDirty = pPage;
+	}
+}
+/*
+ * Merge sort.
+ * The merge sort implementation is based on the one used by
+ * the PH7 Embeddable PHP Engine (http://ph7.symisc.net/).
+ */
+/*
+** Inputs:
+**   a:       A sorted, null-terminated linked list.  (May be null).
+**   b:       A sorted, null-terminated linked list.  (May be null).
+**   cmp:     A pointer to the comparison function.
+**
+** Return Value:
+**   A pointer to the head of a sorted list containing the elements
+**   of both a and b.
+**
+** Side effects:
+**   The "next", "prev" pointers for elements in the lists a and b are
+**   changed.
+*/
+static Page * page_merge_dirty(Page *pA, Page *pB)
+{
+	Page result, *pTail;
+    /* Prevent compiler warning */
+	result.pDirtyNext = result.pDirtyPrev = 0;
+	pTail = &result;
+	while( pA && pB ){
+		if( pA->pgno < pB->pgno ){
+			pTail->pDirtyPrev = pA;
+			pA->pDirtyNext = pTail;
+			pTail = pA;
+			pA = pA->pDirtyPrev;
+		}else{
+			pTail->pDirtyPrev = pB;
+			pB->pDirtyNext = pTail;
+			pTail = pB;
+			pB = pB->pDirtyPrev;
+		}
+	}
+	if( pA ){
+		pTail->pDirtyPrev = pA;
+		pA->pDirtyNext = pTail;
+	}else if( pB ){
+		pTail->pDirtyPrev = pB;
+		pB->pDirtyNext = pTail;
+	}else{
+		pTail->pDirtyPrev = pTail->pDirtyNext = 0;
+	}
+	return result.pDirtyPrev;
+}
+/*
+** Inputs:
+**   Map:       Input hashmap
+**   cmp:       A comparison function.
+**
+** Return Value:
+**   Sorted hashmap.
+**
+** Side effects:
+**   The "next" pointers for elements in list are changed.
+*/
+#define N_SORT_BUCKET  32
+static Page * pager_get_dirty_pages(Pager *pPager)
+{
+	Page *a[N_SORT_BUCKET], *p, *pIn;
+	sxu32 i;
+	if( pPager->pFirstDirty == 0 ){
+		/* Don't bother sorting, the list is already empty */
+		return 0;
+	}
+	SyZero(a, sizeof(a));
+	/* Point to the first inserted entry */
+	pIn = pPager->pFirstDirty;
+	while( pIn ){
+		p = pIn;
+		pIn = p->pDirtyPrev;
+		p->pDirtyPrev = 0;
+		for(i=0; i<N_SORT_BUCKET-1; i++){
+			if( a[i]==0 ){
+				a[i] = p;
+				break;
+			}else{
+				p = page_merge_dirty(a[i], p);
+				a[i] = 0;
+			}
+		}
+		if( i==N_SORT_BUCKET-1 ){
+			/* To get here, there need to be 2^(N_SORT_BUCKET) elements in he input list.
+			 * But that is impossible.
+			 */
+			a[i] = page_merge_dirty(a[i], p);
+		}
+	}
+	p = a[0];
+	for(i=1; i<N_SORT_BUCKET; i++){
+		p = page_merge_dirty(p,a[i]);
+	}
+	p->pDirtyNext = 0;
+	return p;
+}
+/*
+ * See block comment above.
+ */
+static Page * page_merge_hot(Page *pA, Page *pB)
+{
+	Page result, *pTail;
+    /* Prevent compiler warning */
+	result.pNextHot = result.pPrevHot = 0;
+	pTail = &result;
+	while( pA && pB ){
+		if( pA->pgno < pB->pgno ){
+			pTail->pPrevHot = pA;
+			pA->pNextHot = pTail;
+			pTail = pA;
+			pA = pA->pPrevHot;
+		}else{
+			pTail->pPrevHot = pB;
+			pB->pNextHot = pTail;
+			pTail = pB;
+			pB = pB->pPrevHot;
+		}
+	}
+	if( pA ){
+		pTail->pPrevHot = pA;
+		pA->pNextHot = pTail;
+	}else if( pB ){
+		pTail->pPrevHot = pB;
+		pB->pNextHot = pTail;
+	}else{
+		pTail->pPrevHot = pTail->pNextHot = 0;
+	}
+	return result.pPrevHot;
+}
+/*
+** Inputs:
+**   Map:       Input hashmap
+**   cmp:       A comparison function.
+**
+** Return Value:
+**   Sorted hashmap.
+**
+** Side effects:
+**   The "next" pointers for elements in list are changed.
+*/
+#define N_SORT_BUCKET  32
+static Page * pager_get_hot_pages(Pager *pPager)
+{
+	Page *a[N_SORT_BUCKET], *p, *pIn;
+	sxu32 i;
+	if( pPager->pFirstHot == 0 ){
+		/* Don't bother sorting, the list is already empty */
+		return 0;
+	}
+	SyZero(a, sizeof(a));
+	/* Point to the first inserted entry */
+	pIn = pPager->pFirstHot;
+	while( pIn ){
+		p = pIn;
+		pIn = p->pPrevHot;
+		p->pPrevHot = 0;
+		for(i=0; i<N_SORT_BUCKET-1; i++){
+			if( a[i]==0 ){
+				a[i] = p;
+				break;
+			}else{
+				p = page_merge_hot(a[i], p);
+				a[i] = 0;
+			}
+		}
+		if( i==N_SORT_BUCKET-1 ){
+			/* To get here, there need to be 2^(N_SORT_BUCKET) elements in he input list.
+			 * But that is impossible.
+			 */
+			a[i] = page_merge_hot(a[i], p);
+		}
+	}
+	p = a[0];
+	for(i=1; i<N_SORT_BUCKET; i++){
+		p = page_merge_hot(p,a[i]);
+	}
+	p->pNextHot = 0;
+	return p;
+}
+/*
+** The format for the journal header is as follows:
+** - 8 bytes: Magic identifying journal format.
+** - 4 bytes: Number of records in journal.
+** - 4 bytes: Random number used for page hash.
+** - 8 bytes: Initial database page count.
+** - 4 bytes: Sector size used by the process that wrote this journal.
+** - 4 bytes: Database page size.
+** 
+** Followed by (JOURNAL_HDR_SZ - 28) bytes of unused space.
+*/
+/*
+** Open the journal file and extract its header information.
+**
+** If the header is read successfully, *pNRec is set to the number of
+** page records following this header and *pDbSize is set to the size of the
+** database before the transaction began, in pages. Also, pPager->cksumInit
+** is set to the value read from the journal header. VEDIS_OK is returned
+** in this case.
+**
+** If the journal header file appears to be corrupted, VEDIS_DONE is
+** returned and *pNRec and *PDbSize are undefined.  If JOURNAL_HDR_SZ bytes
+** cannot be read from the journal file an error code is returned.
+*/
+static int pager_read_journal_header(
+  Pager *pPager,               /* Pager object */
+  sxu32 *pNRec,                /* OUT: Value read from the nRec field */
+  pgno  *pDbSize               /* OUT: Value of original database size field */
+)
+{
+	sxu32 iPageSize,iSectorSize;
+	unsigned char zMagic[8];
+	sxi64 iHdrOfft;
+	sxi64 iSize;
+	int rc;
+	/* Offset to start reading from */
+	iHdrOfft = 0;
+	/* Get the size of the journal */
+	rc = vedisOsFileSize(pPager->pjfd,&iSize);
+	if( rc != VEDIS_OK ){
+		return VEDIS_DONE;
+	}
+	/* If the journal file is too small, return VEDIS_DONE. */
+	if( 32 /* Minimum sector size */> iSize ){
+		return VEDIS_DONE;
+	}
+	/* Make sure we are dealing with a valid journal */
+	rc = vedisOsRead(pPager->pjfd,zMagic,sizeof(zMagic),iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( SyMemcmp(zMagic,aJournalMagic,sizeof(zMagic)) != 0 ){
+		return VEDIS_DONE;
+	}
+	iHdrOfft += sizeof(zMagic);
+	 /* Read the first three 32-bit fields of the journal header: The nRec
+      ** field, the checksum-initializer and the database size at the start
+      ** of the transaction. Return an error code if anything goes wrong.
+      */
+	rc = ReadInt32(pPager->pjfd,pNRec,iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	iHdrOfft += 4;
+	rc = ReadInt32(pPager->pjfd,&pPager->cksumInit,iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	iHdrOfft += 4;
+	rc = ReadInt64(pPager->pjfd,pDbSize,iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	iHdrOfft += 8;
+	/* Read the page-size and sector-size journal header fields. */
+	rc = ReadInt32(pPager->pjfd,&iSectorSize,iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	iHdrOfft += 4;
+	rc = ReadInt32(pPager->pjfd,&iPageSize,iHdrOfft);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Check that the values read from the page-size and sector-size fields
+    ** are within range. To be 'in range', both values need to be a power
+    ** of two greater than or equal to 512 or 32, and not greater than their 
+    ** respective compile time maximum limits.
+    */
+    if( iPageSize < VEDIS_MIN_PAGE_SIZE || iSectorSize<32
+     || iPageSize > VEDIS_MAX_PAGE_SIZE || iSectorSize>MAX_SECTOR_SIZE
+     || ((iPageSize-1)&iPageSize)!=0    || ((iSectorSize-1)&iSectorSize)!=0 
+    ){
+      /* If the either the page-size or sector-size in the journal-header is 
+      ** invalid, then the process that wrote the journal-header must have 
+      ** crashed before the header was synced. In this case stop reading 
+      ** the journal file here.
+      */
+      return VEDIS_DONE;
+    }
+    /* Update the assumed sector-size to match the value used by 
+    ** the process that created this journal. If this journal was
+    ** created by a process other than this one, then this routine
+    ** is being called from within pager_playback(). The local value
+    ** of Pager.sectorSize is restored at the end of that routine.
+    */
+    pPager->iSectorSize = iSectorSize;
+	pPager->iPageSize = iPageSize;
+	/* Ready to rollback */
+	pPager->iJournalOfft = JOURNAL_HDR_SZ(pPager);
+	/* All done */
+	return VEDIS_OK;
+}
+/*
+ * Write the journal header in the given memory buffer.
+ * The given buffer is big enough to hold the whole header.
+ */
+static int pager_write_journal_header(Pager *pPager,unsigned char *zBuf)
+{
+	unsigned char *zPtr = zBuf;
+	/* 8 bytes magic number */
+	SyMemcpy(aJournalMagic,zPtr,sizeof(aJournalMagic));
+	zPtr += sizeof(aJournalMagic);
+	/* 4 bytes: Number of records in journal. */
+	SyBigEndianPack32(zPtr,0);
+	zPtr += 4;
+	/* 4 bytes: Random number used to compute page checksum. */
+	SyBigEndianPack32(zPtr,pPager->cksumInit);
+	zPtr += 4;
+	/* 8 bytes: Initial database page count. */
+	SyBigEndianPack64(zPtr,pPager->dbOrigSize);
+	zPtr += 8;
+	/* 4 bytes: Sector size used by the process that wrote this journal. */
+	SyBigEndianPack32(zPtr,(sxu32)pPager->iSectorSize);
+	zPtr += 4;
+	/* 4 bytes: Database page size. */
+	SyBigEndianPack32(zPtr,(sxu32)pPager->iPageSize);
+	return VEDIS_OK;
+}
+/*
+** Parameter aData must point to a buffer of pPager->pageSize bytes
+** of data. Compute and return a checksum based ont the contents of the 
+** page of data and the current value of pPager->cksumInit.
+**
+** This is not a real checksum. It is really just the sum of the 
+** random initial value (pPager->cksumInit) and every 200th byte
+** of the page data, starting with byte offset (pPager->pageSize%200).
+** Each byte is interpreted as an 8-bit unsigned integer.
+**
+** Changing the formula used to compute this checksum results in an
+** incompatible journal file format.
+**
+** If journal corruption occurs due to a power failure, the most likely 
+** scenario is that one end or the other of the record will be changed. 
+** It is much less likely that the two ends of the journal record will be
+** correct and the middle be corrupt.  Thus, this "checksum" scheme,
+** though fast and simple, catches the mostly likely kind of corruption.
+*/
+static sxu32 pager_cksum(Pager *pPager,const unsigned char *zData)
+{
+  sxu32 cksum = pPager->cksumInit;         /* Checksum value to return */
+  int i = pPager->iPageSize-200;          /* Loop counter */
+  while( i>0 ){
+    cksum += zData[i];
+    i -= 200;
+  }
+  return cksum;
+}
+/*
+** Read a single page from the journal file opened on file descriptor
+** jfd. Playback this one page. Update the offset to read from.
+*/
+static int pager_play_back_one_page(Pager *pPager,sxi64 *pOfft,unsigned char *zTmp)
+{
+	unsigned char *zData = zTmp;
+	sxi64 iOfft; /* Offset to read from */
+	pgno iNum;   /* Pager number */
+	sxu32 ckSum; /* Sanity check */
+	int rc;
+	/* Offset to start reading from */
+	iOfft = *pOfft;
+	/* Database page number */
+	rc = ReadInt64(pPager->pjfd,&iNum,iOfft);
+	if( rc != VEDIS_OK ){ return rc; }
+	iOfft += 8;
+	/* Page data */
+	rc = vedisOsRead(pPager->pjfd,zData,pPager->iPageSize,iOfft);
+	if( rc != VEDIS_OK ){ return rc; }
+	iOfft += pPager->iPageSize;
+	/* Page cksum */
+	rc = ReadInt32(pPager->pjfd,&ckSum,iOfft);
+	if( rc != VEDIS_OK ){ return rc; }
+	iOfft += 4;
+	/* Synchronize pointers */
+	*pOfft = iOfft;
+	/* Make sure we are dealing with a valid page */
+	if( ckSum != pager_cksum(pPager,zData) ){
+		/* Ignore that page */
+		return SXERR_IGNORE;
+	}
+	if( iNum >= pPager->dbSize ){
+		/* Ignore that page */
+		return VEDIS_OK;
+	}
+	/* playback */
 	rc = vedisOsWrite(pPager->pfd,zData,pPager->iPageSize,iNum * pPager->iPageSize);
+	pager_backup_page_written(pPager,iNum);
 	if( rc == VEDIS_OK ){
 		/* Flush the cache */
 		pager_fill_page(pPager,iNum,zData);
@@ -4813,7 +6685,7 @@ static int pager_read_db_header(Pager *pPager)
 	}else{
 		/* Set a default page and sector size */
 		pPager->iSectorSize = GetSectorSize(pPager->pfd);
-		pPager->iPageSize = vedisGetPageSize();
+		pPager->iPageSize = pPager->iPageSizeHint > 0 ? pPager->iPageSizeHint : vedisGetPageSize();
 		SyStringInitFromBuf(&pPager->sKv,pPager->pEngine->pIo->pMethods->zName,SyStrlen(pPager->pEngine->pIo->pMethods->zName));
 		pPager->dbSize = 0;
 	}
@@ -4847,6 +6719,24 @@ static int pager_create_header(Pager *pPager)
 	rc = pager_write_db_header(pPager);
 	return rc;
 }
+/*
+ * Initialize the underlying KV engine again with the page size of the
+ * database, which differs from the default one it was created with.
+ */
+static int pager_reinit_kv_engine(Pager *pPager)
+{
+	vedis_kv_engine *pEngine = pPager->pEngine;
+	const vedis_kv_io *pIo = pEngine->pIo;
+	if( pIo->pMethods->xRelease ){
+		pIo->pMethods->xRelease(pEngine);
+	}
+	SyZero(pEngine,(sxu32)pIo->pMethods->szKv);
+	pEngine->pIo = pIo;
+	if( pIo->pMethods->xInit ){
+		return pIo->pMethods->xInit(pEngine,pPager->iPageSize);
+	}
+	return VEDIS_OK;
+}
 /*
 ** This function is called to obtain a shared lock on the database file.
 ** It is illegal to call vedisPagerAcquire() until after this function
@@ -4912,6 +6802,14 @@ static int pager_shared_lock(Pager *pPager)
 					}
 				}
 			}
+			if( pPager->iPageSize != vedisGetPageSize() ){
+				/* The KV engine was initialized with the default page size */
+				rc = pager_reinit_kv_engine(pPager);
+				if( rc != VEDIS_OK ){
+					pager_unlock_db(pPager,NO_LOCK);
+					return rc;
+				}
+			}
 			/* Update the pager state */
 			pPager->iState = PAGER_READER;
 			/* Invoke the xOpen methods if available */
@@ -5163,14 +7061,13 @@ static int pager_write_dirty_pages(Pager *pPager,Page *pDirty)
 				/* A rollback should be done */
 				break;
 			}
+			pager_backup_page_written(pPager,pDirty->pgno);
 		}
 		/* Remove stale flags */
 		pDirty->flags &= ~(PAGE_DIRTY|PAGE_DONT_WRITE|PAGE_NEED_SYNC|PAGE_IN_JOURNAL|PAGE_HOT_DIRTY);
 		if( pDirty->nRef < 1 ){
-			/* Unlink the page now it is unused */
-			pager_unlink_page(pPager,pDirty);
-			/* Release the page */
-			pager_release_page(pPager,pDirty);
+			/* Cache or release the page now it is unused */
+			pager_cache_page(pPager,pDirty);
 		}
 		/* Point to the next page */
 		pDirty = pNext;
@@ -5207,6 +7104,7 @@ static int pager_write_hot_dirty_pages(Pager *pPager,Page *pDirty)
 			if( rc != VEDIS_OK ){
 				break;
 			}
+			pager_backup_page_written(pPager,pDirty->pgno);
 		}
 		/* Remove stale flags */
 		pDirty->flags &= ~(PAGE_DIRTY|PAGE_DONT_WRITE|PAGE_NEED_SYNC|PAGE_IN_JOURNAL|PAGE_HOT_DIRTY);
@@ -5221,10 +7119,8 @@ static int pager_write_hot_dirty_pages(Pager *pPager,Page *pDirty)
 		}else{
 			pPager->pFirstDirty = pDirty->pDirtyPrev;
 		}
-		/* Discard */
-		pager_unlink_page(pPager,pDirty);
-		/* Release the page */
-		pager_release_page(pPager,pDirty);
+		/* Cache or discard */
+		pager_cache_page(pPager,pDirty);
 		/* Next hot page */
 		pDirty = pNext;
 	}
@@ -5397,7 +7293,7 @@ VEDIS_PRIVATE int vedisPagerCommit(Pager *pPager)
 		goto fail;
 	}
 	/* Remove stale flags */
-	pPager->iFlags &= ~PAGER_CTRL_COMMIT_ERR;
+	pPager->iFlags &= ~(PAGER_CTRL_COMMIT_ERR|PAGER_CTRL_DIRTY_COMMIT);
 	/* All done */
 	return VEDIS_OK;
 fail:
@@ -5436,6 +7332,8 @@ static int pager_reset_state(Pager *pPager,int bResetKvEngine)
 	}
 	pPager->pAll = 0;
 	pPager->nPage = 0;
+	pPager->pLru = pPager->pLruTail = 0;
+	pPager->nLru = 0;
 	pPager->pDirty = pPager->pFirstDirty = 0;
 	pPager->pHotDirty = pPager->pFirstHot = 0;
 	pPager->nHot = 0;
@@ -5631,7 +7529,14 @@ static int vedisPagerAcquire(
 		}
 		return pPage ? VEDIS_OK : VEDIS_NOTFOUND;
 	}
+	if( pPager->pWorkSet && !vedisBitvecTest(pPager->pWorkSet,pgno) ){
+		/* First request for this page since tracking was enabled */
+		if( vedisBitvecSet(pPager->pWorkSet,pgno) == VEDIS_OK ){
+			pPager->nWorkingSet++;
+		}
+	}
 	if( pPage == 0 ){
+		pPager->nMiss++;
 		/* Allocate a new page */
 		pPage = pager_alloc_page(pPager,pgno);
 		if( pPage == 0 ){
@@ -5647,6 +7552,7 @@ static int vedisPagerAcquire(
 		/* Link the page */
 		pager_link_page(pPager,pPage);
 	}else{
+		pPager->nHit++;
 		if( ppPage ){
 			page_ref(pPage);
 		}
@@ -5821,6 +7727,221 @@ VEDIS_PRIVATE vedis_kv_engine * vedisPagerGetKvEngine(vedis *pDb)
 {
 	return pDb->pPager->pEngine;
 }
+/*
+ * Write the journal appends held by a file, if any.
+ */
+static int pager_file_flush(PagerFile *pFile)
+{
+	PagerVfs *pVfs = pFile->pVfs;
+	int rc;
+	if( pFile->nBuf < 1 ){
+		return VEDIS_OK;
+	}
+	rc = pFile->pReal->pMethods->xWrite(pFile->pReal,pFile->zBuf,pFile->nBuf,pFile->iBufOfft);
+	pVfs->sStats.nWrite++;
+	if( rc == VEDIS_OK ){
+		pVfs->sStats.nByteWritten += pFile->nBuf;
+	}
+	pFile->nBuf = 0;
+	return rc;
+}
+/* int (*xClose)(vedis_file *) */
+static int pager_file_close(vedis_file *pId)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	int rc,rc2;
+	rc = pager_file_flush(pFile);
+	if( pFile->zBuf ){
+		SyMemBackendFree(pFile->pVfs->pAllocator,pFile->zBuf);
+		pFile->zBuf = 0;
+	}
+	rc2 = pFile->pReal->pMethods->xClose(pFile->pReal);
+	return rc != VEDIS_OK ? rc : rc2;
+}
+/* int (*xRead)(vedis_file *,void *,vedis_int64,vedis_int64) */
+static int pager_file_read(vedis_file *pId,void *pBuf,vedis_int64 iAmt,vedis_int64 iOfst)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	PagerVfs *pVfs = pFile->pVfs;
+	int rc;
+	rc = pager_file_flush(pFile);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	rc = pFile->pReal->pMethods->xRead(pFile->pReal,pBuf,iAmt,iOfst);
+	pVfs->sStats.nRead++;
+	if( rc == VEDIS_OK ){
+		pVfs->sStats.nByteRead += iAmt;
+	}
+	return rc;
+}
+/* int (*xWrite)(vedis_file *,const void *,vedis_int64,vedis_int64) */
+static int pager_file_write(vedis_file *pId,const void *pBuf,vedis_int64 iAmt,vedis_int64 iOfst)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	PagerVfs *pVfs = pFile->pVfs;
+	int rc;
+	if( pFile->zBuf ){
+		if( pFile->nBuf > 0 && (iOfst != pFile->iBufOfft + pFile->nBuf
+			|| iAmt > (vedis_int64)(pFile->nBufMax - pFile->nBuf)) ){
+			/* Not an append to the pending writes, or too large */
+			rc = pager_file_flush(pFile);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+		}
+		if( iAmt <= (vedis_int64)(pFile->nBufMax - pFile->nBuf) ){
+			if( pFile->nBuf < 1 ){
+				pFile->iBufOfft = iOfst;
+			}
+			SyMemcpy(pBuf,&pFile->zBuf[pFile->nBuf],(sxu32)iAmt);
+			pFile->nBuf += (int)iAmt;
+			return VEDIS_OK;
+		}
+	}
+	rc = pFile->pReal->pMethods->xWrite(pFile->pReal,pBuf,iAmt,iOfst);
+	pVfs->sStats.nWrite++;
+	if( rc == VEDIS_OK ){
+		pVfs->sStats.nByteWritten += iAmt;
+	}
+	return rc;
+}
+/* int (*xTruncate)(vedis_file *,vedis_int64) */
+static int pager_file_truncate(vedis_file *pId,vedis_int64 iSize)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	int rc;
+	rc = pager_file_flush(pFile);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	return pFile->pReal->pMethods->xTruncate(pFile->pReal,iSize);
+}
+/* int (*xSync)(vedis_file *,int) */
+static int pager_file_sync(vedis_file *pId,int iFlags)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	PagerVfs *pVfs = pFile->pVfs;
+	int rc;
+	rc = pager_file_flush(pFile);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( pVfs->iSyncMode == VEDIS_SYNC_MODE_OFF ){
+		/* The writes reach the disk when the operating system decides */
+		return VEDIS_OK;
+	}
+	if( pVfs->iSyncMode == VEDIS_SYNC_MODE_DATA ){
+		iFlags |= VEDIS_SYNC_DATAONLY;
+	}else{
+		iFlags &= ~VEDIS_SYNC_DATAONLY;
+	}
+	pVfs->sStats.nSync++;
+	return pFile->pReal->pMethods->xSync(pFile->pReal,iFlags);
+}
+/* int (*xFileSize)(vedis_file *,vedis_int64 *) */
+static int pager_file_size(vedis_file *pId,vedis_int64 *pSize)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	int rc;
+	rc = pager_file_flush(pFile);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	return pFile->pReal->pMethods->xFileSize(pFile->pReal,pSize);
+}
+/* int (*xLock)(vedis_file *,int) */
+static int pager_file_lock(vedis_file *pId,int iLock)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	return pFile->pReal->pMethods->xLock(pFile->pReal,iLock);
+}
+/* int (*xUnlock)(vedis_file *,int) */
+static int pager_file_unlock(vedis_file *pId,int iLock)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	return pFile->pReal->pMethods->xUnlock(pFile->pReal,iLock);
+}
+/* int (*xCheckReservedLock)(vedis_file *,int *) */
+static int pager_file_check_reserved_lock(vedis_file *pId,int *pResOut)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	return pFile->pReal->pMethods->xCheckReservedLock(pFile->pReal,pResOut);
+}
+/* int (*xSectorSize)(vedis_file *) */
+static int pager_file_sector_size(vedis_file *pId)
+{
+	PagerFile *pFile = (PagerFile *)pId;
+	return vedisOsSectorSize(pFile->pReal);
+}
+static const vedis_io_methods sPagerIoMethods = {
+	1,                              /* iVersion */
+	pager_file_close,               /* xClose */
+	pager_file_read,                /* xRead */
+	pager_file_write,               /* xWrite */
+	pager_file_truncate,            /* xTruncate */
+	pager_file_sync,                /* xSync */
+	pager_file_size,                /* xFileSize */
+	pager_file_lock,                /* xLock */
+	pager_file_unlock,              /* xUnlock */
+	pager_file_check_reserved_lock, /* xCheckReservedLock */
+	pager_file_sector_size          /* xSectorSize */
+};
+/* int (*xOpen)(vedis_vfs *,const char *,vedis_file *,unsigned int) */
+static int pager_vfs_open(vedis_vfs *pId,const char *zName,vedis_file *pOut,unsigned int iFlags)
+{
+	PagerVfs *pVfs = (PagerVfs *)pId;
+	PagerFile *pFile = (PagerFile *)pOut;
+	int rc;
+	pFile->pMethods = &sPagerIoMethods;
+	pFile->pVfs = pVfs;
+	pFile->pReal = (vedis_file *)&pFile[1];
+	rc = pVfs->pReal->xOpen((vedis_vfs *)pVfs->pReal,zName,pFile->pReal,iFlags);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( pVfs->nJournalBuf > 0 && pVfs->zJournal && SyStrlen(zName) == SyStrlen(pVfs->zJournal)
+		&& SyMemcmp(zName,pVfs->zJournal,SyStrlen(zName)) == 0 ){
+		/* Coalesce the appends to the journal. Failing to allocate the
+		 * buffer is not fatal, the writes are then made one at a time.
+		 */
+		pFile->zBuf = (unsigned char *)SyMemBackendAlloc(pVfs->pAllocator,(sxu32)pVfs->nJournalBuf);
+		if( pFile->zBuf ){
+			pFile->nBufMax = pVfs->nJournalBuf;
+		}
+	}
+	return VEDIS_OK;
+}
+/* int (*xDelete)(vedis_vfs *,const char *,int) */
+static int pager_vfs_delete(vedis_vfs *pId,const char *zName,int syncDir)
+{
+	PagerVfs *pVfs = (PagerVfs *)pId;
+	if( pVfs->iSyncMode == VEDIS_SYNC_MODE_OFF ){
+		syncDir = 0;
+	}else if( syncDir ){
+		pVfs->sStats.nSync++;
+	}
+	return pVfs->pReal->xDelete((vedis_vfs *)pVfs->pReal,zName,syncDir);
+}
+/*
+ * Wrap the VFS registered with the library, so that the files of the
+ * pager are opened through the pager VFS.
+ */
+static void pager_init_vfs(Pager *pPager,vedis_vfs *pReal)
+{
+	PagerVfs *pVfs = &pPager->sVfs;
+	/* Methods that do not deal with open files are used as is */
+	SyMemcpy((const void *)pReal,(void *)&pVfs->base,sizeof(vedis_vfs));
+	pVfs->base.szOsFile = (int)sizeof(PagerFile) + pReal->szOsFile;
+	pVfs->base.xOpen = pager_vfs_open;
+	pVfs->base.xDelete = pager_vfs_delete;
+	pVfs->pReal = pReal;
+	pVfs->pAllocator = pPager->pAllocator;
+	pVfs->zJournal = 0;
+	pVfs->iSyncMode = VEDIS_SYNC_MODE_DATA;
+	pVfs->nJournalBuf = 0;
+	pPager->pVfs = &pVfs->base;
+}
 /*
 * Allocate and initialize a new Pager object. The pager should
 * eventually be freed by passing it to vedisPagerClose().
@@ -5902,10 +8023,13 @@ VEDIS_PRIVATE int vedisPagerOpen(
 	pPager->is_rdonly = rd_only;
 	pPager->iOpenFlags = iFlags;
 	pPager->pVfs = pVfs;
+	if( pVfs ){
+		pager_init_vfs(pPager,pVfs);
+	}
 	SyRandomnessInit(&pPager->sPrng,0,0);
 	SyRandomness(&pPager->sPrng,(void *)&pPager->cksumInit,sizeof(sxu32));
-	/* Unlimited cache size */
-	pPager->nCacheMax = SXU32_HIGH;
+	/* Maximum number of unreferenced pages kept in memory */
+	pPager->nCacheMax = VEDIS_DEFAULT_CACHE_PAGES;
 	/* Copy filename and journal name */
 	if( !is_mem ){
 		pPager->zFilename = (char *)&pPager[1];
@@ -5932,6 +8056,7 @@ VEDIS_PRIVATE int vedisPagerOpen(
 		SyMemcpy(VEDIS_JOURNAL_FILE_SUFFIX,&pPager->zJournal[nLen],sizeof(VEDIS_JOURNAL_FILE_SUFFIX)-1);
 		/* Append the nul terminator to the journal path */
 		pPager->zJournal[nLen + ( sizeof(VEDIS_JOURNAL_FILE_SUFFIX) - 1)] = 0;
+		pPager->sVfs.zJournal = pPager->zJournal;
 	}
 	/* Finally, register the selected KV engine */
 	rc = vedisPagerRegisterKvEngine(pPager,pMethods);
@@ -5960,16 +8085,280 @@ VEDIS_PRIVATE int vedisPagerisMemStore(vedis *pStore)
 	return pStore->pPager->is_mem;
 }
 /*
- * Set a cache limit. Note that, this is a simple hint, the pager is not
- * forced to honor this limit.
+ * Return TRUE if the database was opened read-only.
+ */
+VEDIS_PRIVATE int vedisPagerisReadOnly(vedis *pStore)
+{
+	return pStore->pPager->is_rdonly;
+}
+/*
+ * Set the maximum number of unreferenced pages kept in memory, evicting
+ * the least recently used pages if there are more than that.
+ * Pages still referenced by the storage engine are not counted.
+ * A limit of zero releases pages as soon as they are unreferenced.
  */
 VEDIS_PRIVATE int vedisPagerSetCachesize(Pager *pPager,int mxPage)
 {
-	if( mxPage < 256 ){
+	if( mxPage < 0 ){
+		return VEDIS_INVALID;
+	}
+	pPager->nCacheMax = (sxu32)mxPage;
+	pager_evict_pages(pPager);
+	return VEDIS_OK;
+}
+/*
+ * Set the page size used when the database file is created.
+ */
+VEDIS_PRIVATE int vedisPagerSetPageSize(Pager *pPager,int iPageSize)
+{
+	if( iPageSize < VEDIS_MIN_PAGE_SIZE || iPageSize > VEDIS_MAX_PAGE_SIZE
+		|| (iPageSize & (iPageSize - 1)) != 0 ){
+		return VEDIS_INVALID;
+	}
+	if( pPager->is_mem || pPager->iState > PAGER_OPEN ){
+		/* Too late, the page size was already chosen */
+		return VEDIS_LOCKED;
+	}
+	pPager->iPageSizeHint = iPageSize;
+	return VEDIS_OK;
+}
+/*
+ * Fill in the page cache counters, resetting them if requested.
+ */
+VEDIS_PRIVATE int vedisPagerStats(Pager *pPager,vedis_pager_stats *pStats,int bReset)
+{
+	pStats->nHit = pPager->nHit;
+	pStats->nMiss = pPager->nMiss;
+	pStats->nEvict = pPager->nEvict;
+	pStats->nWorkingSet = pPager->nWorkingSet;
+	pStats->nDbPage = (vedis_int64)pPager->dbSize;
+	pStats->nPage = (int)pPager->nPage;
+	pStats->nCached = (int)pPager->nLru;
+	pStats->nCacheMax = (int)pPager->nCacheMax;
+	pStats->iPageSize = pPager->iPageSize > 0 ? pPager->iPageSize :
+		(pPager->iPageSizeHint > 0 ? pPager->iPageSizeHint : vedisGetPageSize());
+	if( bReset ){
+		pPager->nHit = pPager->nMiss = pPager->nEvict = 0;
+		if( pPager->pWorkSet ){
+			vedisBitvecDestroy(pPager->pWorkSet);
+			pPager->pWorkSet = vedisBitvecCreate(pPager->pAllocator,pPager->dbSize > 0 ? pPager->dbSize : 1);
+		}
+		pPager->nWorkingSet = 0;
+	}
+	return VEDIS_OK;
+}
+/*
+ * Set how the files of the database are synced, see VEDIS_SYNC_MODE_*.
+ */
+VEDIS_PRIVATE int vedisPagerSetSyncMode(Pager *pPager,int iSyncMode)
+{
+	if( iSyncMode != VEDIS_SYNC_MODE_FULL && iSyncMode != VEDIS_SYNC_MODE_DATA
+		&& iSyncMode != VEDIS_SYNC_MODE_OFF ){
+		return VEDIS_INVALID;
+	}
+	pPager->sVfs.iSyncMode = iSyncMode;
+	return VEDIS_OK;
+}
+/*
+ * Set the size of the buffer coalescing the appends to the journal, which
+ * applies from the next transaction on. Zero disables coalescing.
+ */
+VEDIS_PRIVATE int vedisPagerSetJournalBuffer(Pager *pPager,int nBytes)
+{
+	if( nBytes < 0 || nBytes > VEDIS_MAX_JOURNAL_BUFFER ){
+		return VEDIS_INVALID;
+	}
+	pPager->sVfs.nJournalBuf = nBytes;
+	return VEDIS_OK;
+}
+/*
+ * Fill in the I/O counters, resetting them if requested.
+ */
+VEDIS_PRIVATE int vedisPagerIoStats(Pager *pPager,vedis_io_stats *pStats,int bReset)
+{
+	SyMemcpy((const void *)&pPager->sVfs.sStats,(void *)pStats,sizeof(vedis_io_stats));
+	if( bReset ){
+		SyZero(&pPager->sVfs.sStats,sizeof(vedis_io_stats));
+	}
+	return VEDIS_OK;
+}
+/*
+ * Enable or disable the tracking of the distinct pages requested.
+ */
+VEDIS_PRIVATE int vedisPagerTrackWorkingSet(Pager *pPager,int bEnable)
+{
+	if( pPager->pWorkSet ){
+		vedisBitvecDestroy(pPager->pWorkSet);
+		pPager->pWorkSet = 0;
+	}
+	pPager->nWorkingSet = 0;
+	if( bEnable ){
+		pPager->pWorkSet = vedisBitvecCreate(pPager->pAllocator,pPager->dbSize > 0 ? pPager->dbSize : 1);
+		if( pPager->pWorkSet == 0 ){
+			return VEDIS_NOMEM;
+		}
+	}
+	return VEDIS_OK;
+}
+/*
+ * Start an online backup of the database file to zDest.
+ */
+VEDIS_PRIVATE int vedisPagerBackupInit(Pager *pPager,const char *zDest,vedis_backup **ppOut)
+{
+	vedis_backup *pBackup;
+	char *zPath;
+	sxu32 nLen;
+	int rc;
+	if( pPager->is_mem ){
+		vedisGenError(pPager->pDb,"Cannot backup an in-memory database");
+		return VEDIS_NOTIMPLEMENTED;
+	}
+	if( pPager->pBackup ){
+		vedisGenError(pPager->pDb,"A backup of this database is already in progress");
+		return VEDIS_BUSY;
+	}
+	/* Make sure the database file is open */
+	rc = pager_shared_lock(pPager);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	nLen = SyStrlen(zDest);
+	pBackup = (vedis_backup *)SyMemBackendAlloc(pPager->pAllocator,
+		sizeof(vedis_backup) + pPager->iPageSize + pPager->pVfs->mxPathname + nLen + sizeof(char));
+	if( pBackup == 0 ){
+		vedisGenOutofMem(pPager->pDb);
+		return VEDIS_NOMEM;
+	}
+	SyZero(pBackup,sizeof(vedis_backup));
+	pBackup->pStore = pPager->pDb;
+	pBackup->zPage = (unsigned char *)&pBackup[1];
+	/* Copy the full path of the destination, as the journal name is */
+	zPath = (char *)&pBackup->zPage[pPager->iPageSize];
+	rc = VEDIS_OK;
+	if( pPager->pVfs->xFullPathname ){
+		rc = pPager->pVfs->xFullPathname(pPager->pVfs,zDest,pPager->pVfs->mxPathname + nLen,zPath);
+	}
+	if( rc != VEDIS_OK || pPager->pVfs->xFullPathname == 0 ){
+		SyMemcpy(zDest,zPath,nLen);
+		zPath[nLen] = 0;
+	}
+	nLen = SyStrlen(zPath);
+	if( nLen == SyStrlen(pPager->zFilename) && SyMemcmp(zPath,pPager->zFilename,nLen) == 0 ){
+		vedisGenError(pPager->pDb,"Cannot backup a database to itself");
+		SyMemBackendFree(pPager->pAllocator,pBackup);
 		return VEDIS_INVALID;
 	}
-	pPager->nCacheMax = mxPage;
-	return VEDIS_OK;
+	rc = vedisOsOpen(pPager->pVfs,pPager->pAllocator,zPath,&pBackup->pDest,VEDIS_OPEN_CREATE|VEDIS_OPEN_READWRITE);
+	if( rc != VEDIS_OK ){
+		vedisGenErrorFormat(pPager->pDb,"IO error while opening the backup file: %s",zDest);
+		SyMemBackendFree(pPager->pAllocator,pBackup);
+		return rc;
+	}
+	pPager->pBackup = pBackup;
+	*ppOut = pBackup;
+	return VEDIS_OK;
+}
+/*
+ * Copy a single page of the database file to the backup.
+ */
+static int pager_backup_copy_page(Pager *pPager,vedis_backup *pBackup,pgno iNum)
+{
+	sxi64 iOfft = (sxi64)iNum * pPager->iPageSize;
+	int rc;
+	rc = vedisOsRead(pPager->pfd,pBackup->zPage,pPager->iPageSize,iOfft);
+	if( rc == VEDIS_OK ){
+		rc = vedisOsWrite(pBackup->pDest,pBackup->zPage,pPager->iPageSize,iOfft);
+	}
+	return rc;
+}
+/*
+ * Copy the pages written since the last step, then up to nPage more pages
+ * (every page if negative). Return VEDIS_OK if pages
+ * remain to be copied, VEDIS_DONE once the backup is complete, or VEDIS_BUSY
+ * if every page was copied but uncommitted changes have been written to the
+ * database file.
+ */
+VEDIS_PRIVATE int vedisPagerBackupStep(vedis_backup *pBackup,int nPage,vedis_int64 *pRemaining,vedis_int64 *pTotal)
+{
+	Pager *pPager = pBackup->pStore->pPager;
+	vedis_int64 nByte = 0;
+	pgno nTotal,iNum;
+	int n = 0;
+	int rc;
+	rc = pager_shared_lock(pPager);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	rc = vedisOsFileSize(pPager->pfd,&nByte);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	nTotal = (pgno)(nByte / pPager->iPageSize);
+	/* Copy the pages written behind the copy position first. They are not
+	 * counted against nPage, so that the backup completes even if every step
+	 * is followed by writes to pages already copied.
+	 */
+	while( pBackup->nRecopy > 0 ){
+		iNum = pBackup->aRecopy[pBackup->nRecopy - 1];
+		if( iNum < nTotal ){
+			rc = pager_backup_copy_page(pPager,pBackup,iNum);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+		}
+		pBackup->nRecopy--;
+	}
+	if( pBackup->pRecopy ){
+		vedisBitvecDestroy(pBackup->pRecopy);
+		pBackup->pRecopy = 0;
+	}
+	while( pBackup->iNext < nTotal && (nPage < 0 || n < nPage) ){
+		rc = pager_backup_copy_page(pPager,pBackup,pBackup->iNext);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		pBackup->iNext++;
+		n++;
+	}
+	if( pRemaining ){
+		*pRemaining = (vedis_int64)pBackup->nRecopy + (pBackup->iNext < nTotal ? (vedis_int64)(nTotal - pBackup->iNext) : 0);
+	}
+	if( pTotal ){
+		*pTotal = (vedis_int64)nTotal;
+	}
+	if( pBackup->nRecopy > 0 || pBackup->iNext < nTotal ){
+		return VEDIS_OK;
+	}
+	if( pPager->iFlags & PAGER_CTRL_DIRTY_COMMIT ){
+		/* The file holds pages of a transaction that is not committed yet */
+		return VEDIS_BUSY;
+	}
+	/* The file may have shrunk since the copy started */
+	rc = vedisOsTruncate(pBackup->pDest,nByte);
+	if( rc == VEDIS_OK ){
+		rc = vedisOsSync(pBackup->pDest,VEDIS_SYNC_FULL);
+	}
+	return rc == VEDIS_OK ? VEDIS_DONE : rc;
+}
+/*
+ * Release an online backup, complete or not.
+ */
+VEDIS_PRIVATE int vedisPagerBackupFinish(vedis_backup *pBackup)
+{
+	Pager *pPager = pBackup->pStore->pPager;
+	int rc;
+	rc = vedisOsCloseFree(pPager->pAllocator,pBackup->pDest);
+	if( pBackup->pRecopy ){
+		vedisBitvecDestroy(pBackup->pRecopy);
+	}
+	if( pBackup->aRecopy ){
+		SyMemBackendFree(pPager->pAllocator,pBackup->aRecopy);
+	}
+	if( pPager->pBackup == pBackup ){
+		pPager->pBackup = 0;
+	}
+	SyMemBackendFree(pPager->pAllocator,pBackup);
+	return rc;
 }
 /*
  * Set the user commit callback.
@@ -5985,6 +8374,10 @@ VEDIS_PRIVATE int vedisPagerSetCommitCallback(Pager *pPager,int (*xCommit)(void
  */
 VEDIS_PRIVATE int vedisPagerClose(Pager *pPager)
 {
+	if( pPager->pBackup ){
+		/* Abandon the backup in progress */
+		vedisPagerBackupFinish(pPager->pBackup);
+	}
 	/* Release the KV engine */
 	pager_release_kv_engine(pPager);
 	if( pPager->iOpenFlags & VEDIS_OPEN_MMAP ){
@@ -6003,6 +8396,10 @@ VEDIS_PRIVATE int vedisPagerClose(Pager *pPager)
 		vedisBitvecDestroy(pPager->pVec);
 		pPager->pVec = 0;
 	}
+	if( pPager->pWorkSet ){
+		vedisBitvecDestroy(pPager->pWorkSet);
+		pPager->pWorkSet = 0;
+	}
 	return VEDIS_OK;
 }
 /*
@@ -8420,7 +10817,7 @@ static int full_fsync(int fd, int fullSync, int dataOnly){
   */
   rc = fsync(fd);
 #else 
-  rc = fdatasync(fd);
+  rc = dataOnly ? fdatasync(fd) : fsync(fd);
 #endif /* ifdef VEDIS_NO_SYNC elif HAVE_FULLFSYNC */
   if( rc!= -1 ){
     rc = 0;
@@ -8462,7 +10859,7 @@ static int unixSync(vedis_file *id, int flags){
     ** turned off or unavailable.  If a full_fsync occurred above,
     ** then the directory sync is superfluous.
     */
-    if( (!HAVE_FULLFSYNC || !isFullsync) && full_fsync(pFile->dirfd,0,0) ){
+    if( (!HAVE_FULLFSYNC || !isFullsync) && full_fsync(pFile->dirfd,0,isDataOnly) ){
        /*
        ** We have received multiple reports of fsync() returning
        ** errors when applied to directories on certain file systems.
@@ -13694,3257 +16091,3978 @@ VEDIS_PRIVATE void SyDosTimeFormat(sxu32 nDosDate, Sytm *pOut)
 /*
  * Primary page (not overflow pages) header size on disk.
  */
-#define L_HASH_PAGE_HDR_SZ (2/* Cell offset*/+2/* Free block offset*/+8/*Slave page number*/)
-/*
- * The maximum amount of payload (in bytes) that can be stored locally for
- * a database entry.  If the entry contains more data than this, the
- * extra goes onto overflow pages.
-*/
-#define L_HASH_MX_PAYLOAD(PageSize)  (PageSize-(L_HASH_PAGE_HDR_SZ+L_HASH_CELL_SZ))
+#define L_HASH_PAGE_HDR_SZ (2/* Cell offset*/+2/* Free block offset*/+8/*Slave page number*/)
+/*
+ * The maximum amount of payload (in bytes) that can be stored locally for
+ * a database entry.  If the entry contains more data than this, the
+ * extra goes onto overflow pages.
+*/
+#define L_HASH_MX_PAYLOAD(PageSize)  (PageSize-(L_HASH_PAGE_HDR_SZ+L_HASH_CELL_SZ))
+/*
+ * Maxium free space on a single page.
+ */
+#define L_HASH_MX_FREE_SPACE(PageSize) (PageSize - (L_HASH_PAGE_HDR_SZ))
+/*
+** The maximum number of bytes of payload allowed on a single overflow page.
+*/
+#define L_HASH_OVERFLOW_SIZE(PageSize) (PageSize-8)
+/* Forward declaration */
+typedef struct lhash_kv_engine lhash_kv_engine;
+typedef struct lhpage lhpage;
+/*
+ * Each record in the database is identified either in-memory or in
+ * disk by an instance of the following structure.
+ */
+typedef struct lhcell lhcell;
+struct lhcell
+{
+	/* Disk-data (Big-Endian) */
+	sxu32 nHash;   /* Hash of the key: 4 bytes */
+	sxu32 nKey;    /* Key length: 4 bytes */
+	sxu64 nData;   /* Data length: 8 bytes */
+	sxu16 iNext;   /* Offset of the next cell: 2 bytes */
+	pgno iOvfl;    /* Overflow page number if any: 8 bytes */
+	/* In-memory data only */
+	lhpage *pPage;     /* Page this cell belongs */
+	sxu16 iStart;      /* Offset of this cell */
+	pgno iDataPage;    /* Data page number when overflow */
+	sxu16 iDataOfft;   /* Offset of the data in iDataPage */
+	SyBlob sKey;       /* Record key for fast lookup (Kept in-memory if < 256KB ) */
+	lhcell *pNext,*pPrev;         /* Linked list of the loaded memory cells */
+	lhcell *pNextCol,*pPrevCol;   /* Collison chain  */
+};
+/*
+** Each database page has a header that is an instance of this
+** structure.
+*/
+typedef struct lhphdr lhphdr;
+struct lhphdr 
+{
+  sxu16 iOfft; /* Offset of the first cell */
+  sxu16 iFree; /* Offset of the first free block*/
+  pgno iSlave; /* Slave page number */
+};
+/*
+ * Each loaded primary disk page is represented in-memory using
+ * an instance of the following structure.
+ */
+struct lhpage
+{
+	lhash_kv_engine *pHash;  /* KV Storage engine that own this page */
+	vedis_page *pRaw;      /* Raw page contents */
+	lhphdr sHdr;             /* Processed page header */
+	lhcell **apCell;         /* Cell buckets */
+	lhcell *pList,*pFirst;   /* Linked list of cells */
+	sxu32 nCell;             /* Total number of cells */
+	sxu32 nCellSize;         /* apCell[] size */
+	lhpage *pMaster;         /* Master page in case we are dealing with a slave page */
+	lhpage *pSlave;          /* List of slave pages */
+	lhpage *pNextSlave;      /* Next slave page on the list */
+	sxi32 iSlave;            /* Total number of slave pages */
+	sxu16 nFree;             /* Amount of free space available in the page */
+};
+/*
+ * A Bucket map record which is used to map logical bucket number to real
+ * bucket number is represented by an instance of the following structure.
+ */
+typedef struct lhash_bmap_rec lhash_bmap_rec;
+struct lhash_bmap_rec
+{
+	pgno iLogic;                   /* Logical bucket number */
+	pgno iReal;                    /* Real bucket number */
+	lhash_bmap_rec *pNext,*pPrev;  /* Link to other bucket map */     
+	lhash_bmap_rec *pNextCol,*pPrevCol; /* Collision links */
+};
+typedef struct lhash_bmap_page lhash_bmap_page;
+struct lhash_bmap_page
+{
+	pgno iNum;   /* Page number where this entry is stored */
+	sxu16 iPtr;  /* Offset to start reading/writing from */
+	sxu32 nRec;  /* Total number of records in this page */
+	pgno iNext;  /* Next map page */
+};
+/*
+ * An in memory linear hash implemenation is represented by in an isntance
+ * of the following structure.
+ */
+struct lhash_kv_engine
+{
+	const vedis_kv_io *pIo;     /* IO methods: Must be first */
+	/* Private fields */
+	SyMemBackend sAllocator;      /* Private memory backend */
+	ProcHash xHash;               /* Default hash function */
+	ProcCmp xCmp;                 /* Default comparison function */
+	vedis_page *pHeader;        /* Page one to identify a valid implementation */
+	lhash_bmap_rec **apMap;       /* Buckets map records */
+	sxu32 nBuckRec;               /* Total number of bucket map records */
+	sxu32 nBuckSize;              /* apMap[] size  */
+	lhash_bmap_rec *pList;        /* List of bucket map records */
+	lhash_bmap_rec *pFirst;       /* First record*/
+	lhash_bmap_page sPageMap;     /* Primary bucket map */
+	int iPageSize;                /* Page size */
+	pgno nFreeList;               /* List of free pages */
+	pgno split_bucket;            /* Current split bucket: MUST BE A POWER OF TWO */
+	pgno max_split_bucket;        /* Maximum split bucket: MUST BE A POWER OF TWO */
+	pgno nmax_split_nucket;       /* Next maximum split bucket (1 << nMsb): In-memory only */
+	sxu32 nMagic;                 /* Magic number to identify a valid linear hash disk database */
+};
+/*
+ * Given a logical bucket number, return the record associated with it.
+ */
+static lhash_bmap_rec * lhMapFindBucket(lhash_kv_engine *pEngine,pgno iLogic)
+{
+	lhash_bmap_rec *pRec;
+	if( pEngine->nBuckRec < 1 ){
+		/* Don't bother */
+		return 0;
+	}
+	pRec = pEngine->apMap[iLogic & (pEngine->nBuckSize - 1)];
+	for(;;){
+		if( pRec == 0 ){
+			break;
+		}
+		if( pRec->iLogic == iLogic ){
+			return pRec;
+		}
+		/* Point to the next entry */
+		pRec = pRec->pNextCol;
+	}
+	/* No such record */
+	return 0;
+}
+/*
+ * Install a new bucket map record.
+ */
+static int lhMapInstallBucket(lhash_kv_engine *pEngine,pgno iLogic,pgno iReal)
+{
+	lhash_bmap_rec *pRec;
+	sxu32 iBucket;
+	/* Allocate a new instance */
+	pRec = (lhash_bmap_rec *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhash_bmap_rec));
+	if( pRec == 0 ){
+		return VEDIS_NOMEM;
+	}
+	/* Zero the structure */
+	SyZero(pRec,sizeof(lhash_bmap_rec));
+	/* Fill in the structure */
+	pRec->iLogic = iLogic;
+	pRec->iReal = iReal;
+	iBucket = iLogic & (pEngine->nBuckSize - 1);
+	pRec->pNextCol = pEngine->apMap[iBucket];
+	if( pEngine->apMap[iBucket] ){
+		pEngine->apMap[iBucket]->pPrevCol = pRec;
+	}
+	pEngine->apMap[iBucket] = pRec;
+	/* Link */
+	if( pEngine->pFirst == 0 ){
+		pEngine->pFirst = pEngine->pList = pRec;
+	}else{
+		MACRO_LD_PUSH(pEngine->pList,pRec);
+	}
+	pEngine->nBuckRec++;
+	if( (pEngine->nBuckRec >= pEngine->nBuckSize * 3) && pEngine->nBuckRec < 100000 ){
+		/* Allocate a new larger table */
+		sxu32 nNewSize = pEngine->nBuckSize << 1;
+		lhash_bmap_rec *pEntry;
+		lhash_bmap_rec **apNew;
+		sxu32 n;
+		
+		apNew = (lhash_bmap_rec **)SyMemBackendAlloc(&pEngine->sAllocator, nNewSize * sizeof(lhash_bmap_rec *));
+		if( apNew ){
+			/* Zero the new table */
+			SyZero((void *)apNew, nNewSize * sizeof(lhash_bmap_rec *));
+			/* Rehash all entries */
+			n = 0;
+			pEntry = pEngine->pList;
+			for(;;){
+				/* Loop one */
+				if( n >= pEngine->nBuckRec ){
+					break;
+				}
+				pEntry->pNextCol = pEntry->pPrevCol = 0;
+				/* Install in the new bucket */
+				iBucket = pEntry->iLogic & (nNewSize - 1);
+				pEntry->pNextCol = apNew[iBucket];
+				if( apNew[iBucket] ){
+					apNew[iBucket]->pPrevCol = pEntry;
+				}
+				apNew[iBucket] = pEntry;
+				/* Point to the next entry */
+				pEntry = pEntry->pNext;
+				n++;
+			}
+			/* Release the old table and reflect the change */
+			SyMemBackendFree(&pEngine->sAllocator,(void *)pEngine->apMap);
+			pEngine->apMap = apNew;
+			pEngine->nBuckSize  = nNewSize;
+		}
+	}
+	return VEDIS_OK;
+}
+/*
+ * Process a raw bucket map record.
+ */
+static int lhMapLoadPage(lhash_kv_engine *pEngine,lhash_bmap_page *pMap,const unsigned char *zRaw)
+{
+	const unsigned char *zEnd = &zRaw[pEngine->iPageSize];
+	const unsigned char *zPtr = zRaw;
+	pgno iLogic,iReal;
+	sxu32 n;
+	int rc;
+	if( pMap->iPtr == 0 ){
+		/* Read the map header */
+		SyBigEndianUnpack64(zRaw,&pMap->iNext);
+		zRaw += 8;
+		SyBigEndianUnpack32(zRaw,&pMap->nRec);
+		zRaw += 4;
+	}else{
+		/* Mostly page one of the database */
+		zRaw += pMap->iPtr;
+	}
+	/* Start processing */
+	for( n = 0; n < pMap->nRec ; ++n ){
+		if( zRaw >= zEnd ){
+			break;
+		}
+		/* Extract the logical and real bucket number */
+		SyBigEndianUnpack64(zRaw,&iLogic);
+		zRaw += 8;
+		SyBigEndianUnpack64(zRaw,&iReal);
+		zRaw += 8;
+		/* Install the record in the map */
+		rc = lhMapInstallBucket(pEngine,iLogic,iReal);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+	}
+	pMap->iPtr = (sxu16)(zRaw-zPtr);
+	/* All done */
+	return VEDIS_OK;
+}
+/* 
+ * Allocate a new cell instance.
+ */
+static lhcell * lhNewCell(lhash_kv_engine *pEngine,lhpage *pPage)
+{
+	lhcell *pCell;
+	pCell = (lhcell *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhcell));
+	if( pCell == 0 ){
+		return 0;
+	}
+	/* Zero the structure */
+	SyZero(pCell,sizeof(lhcell));
+	/* Fill in the structure */
+	SyBlobInit(&pCell->sKey,&pEngine->sAllocator);
+	pCell->pPage = pPage;
+	return pCell;
+}
 /*
- * Maxium free space on a single page.
+ * Discard a cell from the page table.
  */
-#define L_HASH_MX_FREE_SPACE(PageSize) (PageSize - (L_HASH_PAGE_HDR_SZ))
-/*
-** The maximum number of bytes of payload allowed on a single overflow page.
-*/
-#define L_HASH_OVERFLOW_SIZE(PageSize) (PageSize-8)
-/* Forward declaration */
-typedef struct lhash_kv_engine lhash_kv_engine;
-typedef struct lhpage lhpage;
+static void lhCellDiscard(lhcell *pCell)
+{
+	lhpage *pPage = pCell->pPage->pMaster;	
+	
+	if( pCell->pPrevCol ){
+		pCell->pPrevCol->pNextCol = pCell->pNextCol;
+	}else{
+		pPage->apCell[pCell->nHash & (pPage->nCellSize - 1)] = pCell->pNextCol;
+	}
+	if( pCell->pNextCol ){
+		pCell->pNextCol->pPrevCol = pCell->pPrevCol;
+	}
+	MACRO_LD_REMOVE(pPage->pList,pCell);
+	if( pCell == pPage->pFirst ){
+		pPage->pFirst = pCell->pPrev;
+	}
+	pPage->nCell--;
+	/* Release the cell */
+	SyBlobRelease(&pCell->sKey);
+	SyMemBackendPoolFree(&pPage->pHash->sAllocator,pCell);
+}
 /*
- * Each record in the database is identified either in-memory or in
- * disk by an instance of the following structure.
+ * Install a cell in the page table.
  */
-typedef struct lhcell lhcell;
-struct lhcell
+static int lhInstallCell(lhcell *pCell)
 {
-	/* Disk-data (Big-Endian) */
-	sxu32 nHash;   /* Hash of the key: 4 bytes */
-	sxu32 nKey;    /* Key length: 4 bytes */
-	sxu64 nData;   /* Data length: 8 bytes */
-	sxu16 iNext;   /* Offset of the next cell: 2 bytes */
-	pgno iOvfl;    /* Overflow page number if any: 8 bytes */
-	/* In-memory data only */
-	lhpage *pPage;     /* Page this cell belongs */
-	sxu16 iStart;      /* Offset of this cell */
-	pgno iDataPage;    /* Data page number when overflow */
-	sxu16 iDataOfft;   /* Offset of the data in iDataPage */
-	SyBlob sKey;       /* Record key for fast lookup (Kept in-memory if < 256KB ) */
-	lhcell *pNext,*pPrev;         /* Linked list of the loaded memory cells */
-	lhcell *pNextCol,*pPrevCol;   /* Collison chain  */
-};
+	lhpage *pPage = pCell->pPage->pMaster;
+	sxu32 iBucket;
+	if( pPage->nCell < 1 ){
+		sxu32 nTableSize = 32; /* Must be a power of two */
+		lhcell **apTable;
+		/* Allocate a new cell table */
+		apTable = (lhcell **)SyMemBackendAlloc(&pPage->pHash->sAllocator, nTableSize * sizeof(lhcell *));
+		if( apTable == 0 ){
+			return VEDIS_NOMEM;
+		}
+		/* Zero the new table */
+		SyZero((void *)apTable, nTableSize * sizeof(lhcell *));
+		/* Install it */
+		pPage->apCell = apTable;
+		pPage->nCellSize = nTableSize;
+	}
+	iBucket = pCell->nHash & (pPage->nCellSize - 1);
+	pCell->pNextCol = pPage->apCell[iBucket];
+	if( pPage->apCell[iBucket] ){
+		pPage->apCell[iBucket]->pPrevCol = pCell;
+	}
+	pPage->apCell[iBucket] = pCell;
+	if( pPage->pFirst == 0 ){
+		pPage->pFirst = pPage->pList = pCell;
+	}else{
+		MACRO_LD_PUSH(pPage->pList,pCell);
+	}
+	pPage->nCell++;
+	if( (pPage->nCell >= pPage->nCellSize * 3) && pPage->nCell < 100000 ){
+		/* Allocate a new larger table */
+		sxu32 nNewSize = pPage->nCellSize << 1;
+		lhcell *pEntry;
+		lhcell **apNew;
+		sxu32 n;
+		
+		apNew = (lhcell **)SyMemBackendAlloc(&pPage->pHash->sAllocator, nNewSize * sizeof(lhcell *));
+		if( apNew ){
+			/* Zero the new table */
+			SyZero((void *)apNew, nNewSize * sizeof(lhcell *));
+			/* Rehash all entries */
+			n = 0;
+			pEntry = pPage->pList;
+			for(;;){
+				/* Loop one */
+				if( n >= pPage->nCell ){
+					break;
+				}
+				pEntry->pNextCol = pEntry->pPrevCol = 0;
+				/* Install in the new bucket */
+				iBucket = pEntry->nHash & (nNewSize - 1);
+				pEntry->pNextCol = apNew[iBucket];
+				if( apNew[iBucket]  ){
+					apNew[iBucket]->pPrevCol = pEntry;
+				}
+				apNew[iBucket] = pEntry;
+				/* Point to the next entry */
+				pEntry = pEntry->pNext;
+				n++;
+			}
+			/* Release the old table and reflect the change */
+			SyMemBackendFree(&pPage->pHash->sAllocator,(void *)pPage->apCell);
+			pPage->apCell = apNew;
+			pPage->nCellSize  = nNewSize;
+		}
+	}
+	return VEDIS_OK;
+}
 /*
-** Each database page has a header that is an instance of this
-** structure.
-*/
-typedef struct lhphdr lhphdr;
-struct lhphdr 
+ * Private data of lhKeyCmp().
+ */
+struct lhash_key_cmp
 {
-  sxu16 iOfft; /* Offset of the first cell */
-  sxu16 iFree; /* Offset of the first free block*/
-  pgno iSlave; /* Slave page number */
+	const char *zIn;  /* Start of the stream */
+	const char *zEnd; /* End of the stream */
+	ProcCmp xCmp;     /* Comparison function */
 };
 /*
- * Each loaded primary disk page is represented in-memory using
- * an instance of the following structure.
+ * Comparsion callback for large key > 256 KB
  */
-struct lhpage
+static int lhKeyCmp(const void *pData,sxu32 nLen,void *pUserData)
 {
-	lhash_kv_engine *pHash;  /* KV Storage engine that own this page */
-	vedis_page *pRaw;      /* Raw page contents */
-	lhphdr sHdr;             /* Processed page header */
-	lhcell **apCell;         /* Cell buckets */
-	lhcell *pList,*pFirst;   /* Linked list of cells */
-	sxu32 nCell;             /* Total number of cells */
-	sxu32 nCellSize;         /* apCell[] size */
-	lhpage *pMaster;         /* Master page in case we are dealing with a slave page */
-	lhpage *pSlave;          /* List of slave pages */
-	lhpage *pNextSlave;      /* Next slave page on the list */
-	sxi32 iSlave;            /* Total number of slave pages */
-	sxu16 nFree;             /* Amount of free space available in the page */
-};
+	struct lhash_key_cmp *pCmp = (struct lhash_key_cmp *)pUserData;
+	int rc;
+	if( pCmp->zIn >= pCmp->zEnd ){
+		if( nLen > 0 ){
+			return VEDIS_ABORT;
+		}
+		return VEDIS_OK;
+	}
+	/* Perform the comparison */
+	rc = pCmp->xCmp((const void *)pCmp->zIn,pData,nLen);
+	if( rc != 0 ){
+		/* Abort comparison */
+		return VEDIS_ABORT;
+	}
+	/* Advance the cursor */
+	pCmp->zIn += nLen;
+	return VEDIS_OK;
+}
+/* Forward declaration */
+static int lhConsumeCellkey(lhcell *pCell,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData,int offt_only);
 /*
- * A Bucket map record which is used to map logical bucket number to real
- * bucket number is represented by an instance of the following structure.
+ * given a key, return the cell associated with it on success. NULL otherwise.
  */
-typedef struct lhash_bmap_rec lhash_bmap_rec;
-struct lhash_bmap_rec
-{
-	pgno iLogic;                   /* Logical bucket number */
-	pgno iReal;                    /* Real bucket number */
-	lhash_bmap_rec *pNext,*pPrev;  /* Link to other bucket map */     
-	lhash_bmap_rec *pNextCol,*pPrevCol; /* Collision links */
-};
-typedef struct lhash_bmap_page lhash_bmap_page;
-struct lhash_bmap_page
+static lhcell * lhFindCell(
+	lhpage *pPage,    /* Target page */
+	const void *pKey, /* Lookup key */
+	sxu32 nByte,      /* Key length */
+	sxu32 nHash       /* Hash of the key */
+	)
 {
-	pgno iNum;   /* Page number where this entry is stored */
-	sxu16 iPtr;  /* Offset to start reading/writing from */
-	sxu32 nRec;  /* Total number of records in this page */
-	pgno iNext;  /* Next map page */
-};
+	lhcell *pEntry;
+	if( pPage->nCell < 1 ){
+		/* Don't bother hashing */
+		return 0;
+	}
+	/* Point to the corresponding bucket */
+	pEntry = pPage->apCell[nHash & (pPage->nCellSize - 1)];
+	for(;;){
+		if( pEntry == 0 ){
+			break;
+		}
+		if( pEntry->nHash == nHash && pEntry->nKey == nByte ){
+			if( SyBlobLength(&pEntry->sKey) < 1 ){
+				/* Large key (> 256 KB) are not kept in-memory */
+				struct lhash_key_cmp sCmp;
+				int rc;
+				/* Fill-in the structure */
+				sCmp.zIn = (const char *)pKey;
+				sCmp.zEnd = &sCmp.zIn[nByte];
+				sCmp.xCmp = pPage->pHash->xCmp;
+				/* Fetch the key from disk and perform the comparison */
+				rc = lhConsumeCellkey(pEntry,lhKeyCmp,&sCmp,0);
+				if( rc == VEDIS_OK ){
+					/* Cell found */
+					return pEntry;
+				}
+			}else if ( pPage->pHash->xCmp(pKey,SyBlobData(&pEntry->sKey),nByte) == 0 ){
+				/* Cell found */
+				return pEntry;
+			}
+		}
+		/* Point to the next entry */
+		pEntry = pEntry->pNextCol;
+	}
+	/* No such entry */
+	return 0;
+}
+/*
+ * Parse a raw cell fetched from disk.
+ */
+static int lhParseOneCell(lhpage *pPage,const unsigned char *zRaw,const unsigned char *zEnd,lhcell **ppOut)
+{
+	sxu16 iNext,iOfft;
+	sxu32 iHash,nKey;
+	lhcell *pCell;
+	sxu64 nData;
+	int rc;
+	/* Offset this cell is stored */
+	iOfft = (sxu16)(zRaw - (const unsigned char *)pPage->pRaw->zData);
+	/* 4 byte hash number */
+	SyBigEndianUnpack32(zRaw,&iHash);
+	zRaw += 4;	
+	/* 4 byte key length  */
+	SyBigEndianUnpack32(zRaw,&nKey);
+	zRaw += 4;	
+	/* 8 byte data length */
+	SyBigEndianUnpack64(zRaw,&nData);
+	zRaw += 8;
+	/* 2 byte offset of the next cell */
+	SyBigEndianUnpack16(zRaw,&iNext);
+	/* Perform a sanity check */
+	if( iNext > 0 && &pPage->pRaw->zData[iNext] >= zEnd ){
+		return VEDIS_CORRUPT;
+	}
+	zRaw += 2;
+	pCell = lhNewCell(pPage->pHash,pPage);
+	if( pCell == 0 ){
+		return VEDIS_NOMEM;
+	}
+	/* Fill in the structure */
+	pCell->iNext = iNext;
+	pCell->nKey  = nKey;
+	pCell->nData = nData;
+	pCell->nHash = iHash;
+	/* Overflow page if any */
+	SyBigEndianUnpack64(zRaw,&pCell->iOvfl);
+	zRaw += 8;
+	/* Cell offset */
+	pCell->iStart = iOfft;
+	/* Consume the key */
+	rc = lhConsumeCellkey(pCell,vedisDataConsumer,&pCell->sKey,pCell->nKey > 262144 /* 256 KB */? 1 : 0);
+	if( rc != VEDIS_OK ){
+		/* TICKET: 14-32-chm@symisc.net: Key too large for memory */
+		SyBlobRelease(&pCell->sKey);
+	}
+	/* Finally install the cell */
+	rc = lhInstallCell(pCell);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( ppOut ){
+		*ppOut = pCell;
+	}
+	return VEDIS_OK;
+}
 /*
- * An in memory linear hash implemenation is represented by in an isntance
- * of the following structure.
+ * Compute the total number of free space on a given page.
  */
-struct lhash_kv_engine
+static int lhPageFreeSpace(lhpage *pPage)
 {
-	const vedis_kv_io *pIo;     /* IO methods: Must be first */
-	/* Private fields */
-	SyMemBackend sAllocator;      /* Private memory backend */
-	ProcHash xHash;               /* Default hash function */
-	ProcCmp xCmp;                 /* Default comparison function */
-	vedis_page *pHeader;        /* Page one to identify a valid implementation */
-	lhash_bmap_rec **apMap;       /* Buckets map records */
-	sxu32 nBuckRec;               /* Total number of bucket map records */
-	sxu32 nBuckSize;              /* apMap[] size  */
-	lhash_bmap_rec *pList;        /* List of bucket map records */
-	lhash_bmap_rec *pFirst;       /* First record*/
-	lhash_bmap_page sPageMap;     /* Primary bucket map */
-	int iPageSize;                /* Page size */
-	pgno nFreeList;               /* List of free pages */
-	pgno split_bucket;            /* Current split bucket: MUST BE A POWER OF TWO */
-	pgno max_split_bucket;        /* Maximum split bucket: MUST BE A POWER OF TWO */
-	pgno nmax_split_nucket;       /* Next maximum split bucket (1 << nMsb): In-memory only */
-	sxu32 nMagic;                 /* Magic number to identify a valid linear hash disk database */
-};
+	const unsigned char *zEnd,*zRaw = pPage->pRaw->zData;
+	lhphdr *pHdr = &pPage->sHdr;
+	sxu16 iNext,iAmount;
+	sxu16 nFree = 0;
+	if( pHdr->iFree < 1 ){
+		/* Don't bother processing, the page is full */
+		pPage->nFree = 0;
+		return VEDIS_OK;
+	}
+	/* Point to first free block */
+	zEnd = &zRaw[pPage->pHash->iPageSize];
+	zRaw += pHdr->iFree;
+	for(;;){
+		/* Offset of the next free block */
+		SyBigEndianUnpack16(zRaw,&iNext);
+		zRaw += 2;
+		/* Available space on this block */
+		SyBigEndianUnpack16(zRaw,&iAmount);
+		nFree += iAmount;
+		if( iNext < 1 ){
+			/* No more free blocks */
+			break;
+		}
+		/* Point to the next free block*/
+		zRaw = &pPage->pRaw->zData[iNext];
+		if( zRaw >= zEnd ){
+			/* Corrupt page */
+			return VEDIS_CORRUPT;
+		}
+	}
+	/* Save the amount of free space */
+	pPage->nFree = nFree;
+	return VEDIS_OK;
+}
 /*
- * Given a logical bucket number, return the record associated with it.
+ * Given a primary page, load all its cell.
  */
-static lhash_bmap_rec * lhMapFindBucket(lhash_kv_engine *pEngine,pgno iLogic)
+static int lhLoadCells(lhpage *pPage)
 {
-	lhash_bmap_rec *pRec;
-	if( pEngine->nBuckRec < 1 ){
-		/* Don't bother */
-		return 0;
+	const unsigned char *zEnd,*zRaw = pPage->pRaw->zData;
+	lhphdr *pHdr = &pPage->sHdr;
+	lhcell *pCell = 0; /* cc warning */
+	int rc;
+	/* Calculate the amount of free space available first */
+	rc = lhPageFreeSpace(pPage);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	pRec = pEngine->apMap[iLogic & (pEngine->nBuckSize - 1)];
+	if( pHdr->iOfft < 1 ){
+		/* Don't bother processing, the page is empty */
+		return VEDIS_OK;
+	}
+	/* Point to first cell */
+	zRaw += pHdr->iOfft;
+	zEnd = &zRaw[pPage->pHash->iPageSize];
 	for(;;){
-		if( pRec == 0 ){
+		/* Parse a single cell */
+		rc = lhParseOneCell(pPage,zRaw,zEnd,&pCell);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		if( pCell->iNext < 1 ){
+			/* No more cells */
 			break;
 		}
-		if( pRec->iLogic == iLogic ){
-			return pRec;
+		/* Point to the next cell */
+		zRaw = &pPage->pRaw->zData[pCell->iNext];
+		if( zRaw >= zEnd ){
+			/* Corrupt page */
+			return VEDIS_CORRUPT;
 		}
-		/* Point to the next entry */
-		pRec = pRec->pNextCol;
 	}
-	/* No such record */
-	return 0;
+	/* All done */
+	return VEDIS_OK;
 }
 /*
- * Install a new bucket map record.
+ * Given a page, parse its raw headers.
  */
-static int lhMapInstallBucket(lhash_kv_engine *pEngine,pgno iLogic,pgno iReal)
+static int lhParsePageHeader(lhpage *pPage)
 {
-	lhash_bmap_rec *pRec;
-	sxu32 iBucket;
+	const unsigned char *zRaw = pPage->pRaw->zData;
+	lhphdr *pHdr = &pPage->sHdr;
+	/* Offset of the first cell */
+	SyBigEndianUnpack16(zRaw,&pHdr->iOfft);
+	zRaw += 2;
+	/* Offset of the first free block */
+	SyBigEndianUnpack16(zRaw,&pHdr->iFree);
+	zRaw += 2;
+	/* Slave page number */
+	SyBigEndianUnpack64(zRaw,&pHdr->iSlave);
+	/* All done */
+	return VEDIS_OK;
+}
+/*
+ * Allocate a new page instance.
+ */
+static lhpage * lhNewPage(
+	lhash_kv_engine *pEngine, /* KV store which own this instance */
+	vedis_page *pRaw,       /* Raw page contents */
+	lhpage *pMaster           /* Master page in case we are dealing with a slave page */
+	)
+{
+	lhpage *pPage;
 	/* Allocate a new instance */
-	pRec = (lhash_bmap_rec *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhash_bmap_rec));
-	if( pRec == 0 ){
-		return VEDIS_NOMEM;
+	pPage = (lhpage *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhpage));
+	if( pPage == 0 ){
+		return 0;
 	}
 	/* Zero the structure */
-	SyZero(pRec,sizeof(lhash_bmap_rec));
-	/* Fill in the structure */
-	pRec->iLogic = iLogic;
-	pRec->iReal = iReal;
-	iBucket = iLogic & (pEngine->nBuckSize - 1);
-	pRec->pNextCol = pEngine->apMap[iBucket];
-	if( pEngine->apMap[iBucket] ){
-		pEngine->apMap[iBucket]->pPrevCol = pRec;
-	}
-	pEngine->apMap[iBucket] = pRec;
-	/* Link */
-	if( pEngine->pFirst == 0 ){
-		pEngine->pFirst = pEngine->pList = pRec;
-	}else{
-		MACRO_LD_PUSH(pEngine->pList,pRec);
-	}
-	pEngine->nBuckRec++;
-	if( (pEngine->nBuckRec >= pEngine->nBuckSize * 3) && pEngine->nBuckRec < 100000 ){
-		/* Allocate a new larger table */
-		sxu32 nNewSize = pEngine->nBuckSize << 1;
-		lhash_bmap_rec *pEntry;
-		lhash_bmap_rec **apNew;
-		sxu32 n;
-		
-		apNew = (lhash_bmap_rec **)SyMemBackendAlloc(&pEngine->sAllocator, nNewSize * sizeof(lhash_bmap_rec *));
-		if( apNew ){
-			/* Zero the new table */
-			SyZero((void *)apNew, nNewSize * sizeof(lhash_bmap_rec *));
-			/* Rehash all entries */
-			n = 0;
-			pEntry = pEngine->pList;
-			for(;;){
-				/* Loop one */
-				if( n >= pEngine->nBuckRec ){
-					break;
-				}
-				pEntry->pNextCol = pEntry->pPrevCol = 0;
-				/* Install in the new bucket */
-				iBucket = pEntry->iLogic & (nNewSize - 1);
-				pEntry->pNextCol = apNew[iBucket];
-				if( apNew[iBucket] ){
-					apNew[iBucket]->pPrevCol = pEntry;
-				}
-				apNew[iBucket] = pEntry;
-				/* Point to the next entry */
-				pEntry = pEntry->pNext;
-				n++;
-			}
-			/* Release the old table and reflect the change */
-			SyMemBackendFree(&pEngine->sAllocator,(void *)pEngine->apMap);
-			pEngine->apMap = apNew;
-			pEngine->nBuckSize  = nNewSize;
-		}
+	SyZero(pPage,sizeof(lhpage));
+	/* Fill-in the structure */
+	pPage->pHash = pEngine;
+	pPage->pRaw = pRaw;
+	pPage->pMaster = pMaster ? pMaster /* Slave page */ : pPage /* Master page */ ;
+	if( pPage->pMaster != pPage ){
+		/* Slave page, attach it to its master */
+		pPage->pNextSlave = pMaster->pSlave;
+		pMaster->pSlave = pPage;
+		pMaster->iSlave++;
 	}
-	return VEDIS_OK;
+	/* Save this instance for future fast lookup */
+	pRaw->pUserData = pPage;
+	/* All done */
+	return pPage;
 }
 /*
- * Process a raw bucket map record.
+ * Load a primary and its associated slave pages from disk.
  */
-static int lhMapLoadPage(lhash_kv_engine *pEngine,lhash_bmap_page *pMap,const unsigned char *zRaw)
+static int lhLoadPage(lhash_kv_engine *pEngine,pgno pnum,lhpage *pMaster,lhpage **ppOut,int iNest)
 {
-	const unsigned char *zEnd = &zRaw[pEngine->iPageSize];
-	const unsigned char *zPtr = zRaw;
-	pgno iLogic,iReal;
-	sxu32 n;
+	vedis_page *pRaw;
+	lhpage *pPage = 0; /* cc warning */
 	int rc;
-	if( pMap->iPtr == 0 ){
-		/* Read the map header */
-		SyBigEndianUnpack64(zRaw,&pMap->iNext);
-		zRaw += 8;
-		SyBigEndianUnpack32(zRaw,&pMap->nRec);
-		zRaw += 4;
-	}else{
-		/* Mostly page one of the database */
-		zRaw += pMap->iPtr;
+	/* Aquire the page from the pager first */
+	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pnum,&pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* Start processing */
-	for( n = 0; n < pMap->nRec ; ++n ){
-		if( zRaw >= zEnd ){
-			break;
+	if( pRaw->pUserData ){
+		/* The page is already parsed and loaded in memory. Point to it */
+		pPage = (lhpage *)pRaw->pUserData;
+	}else{
+		/* Allocate a new page */
+		pPage = lhNewPage(pEngine,pRaw,pMaster);
+		if( pPage == 0 ){
+			return VEDIS_NOMEM;
+		}
+		/* Process the page */
+		rc = lhParsePageHeader(pPage);
+		if( rc == VEDIS_OK ){
+			/* Load cells */
+			rc = lhLoadCells(pPage);
 		}
-		/* Extract the logical and real bucket number */
-		SyBigEndianUnpack64(zRaw,&iLogic);
-		zRaw += 8;
-		SyBigEndianUnpack64(zRaw,&iReal);
-		zRaw += 8;
-		/* Install the record in the map */
-		rc = lhMapInstallBucket(pEngine,iLogic,iReal);
 		if( rc != VEDIS_OK ){
+			pEngine->pIo->xPageUnref(pPage->pRaw); /* pPage will be released inside this call */
 			return rc;
 		}
+		if( pPage->sHdr.iSlave > 0 && iNest < 128 ){
+			if( pMaster == 0 ){
+				pMaster = pPage;
+			}
+			/* Slave page. Not a fatal error if something goes wrong here */
+			lhLoadPage(pEngine,pPage->sHdr.iSlave,pMaster,0,iNest++);
+		}
 	}
-	pMap->iPtr = (sxu16)(zRaw-zPtr);
-	/* All done */
-	return VEDIS_OK;
-}
-/* 
- * Allocate a new cell instance.
- */
-static lhcell * lhNewCell(lhash_kv_engine *pEngine,lhpage *pPage)
-{
-	lhcell *pCell;
-	pCell = (lhcell *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhcell));
-	if( pCell == 0 ){
-		return 0;
+	if( ppOut ){
+		*ppOut = pPage;
 	}
-	/* Zero the structure */
-	SyZero(pCell,sizeof(lhcell));
-	/* Fill in the structure */
-	SyBlobInit(&pCell->sKey,&pEngine->sAllocator);
-	pCell->pPage = pPage;
-	return pCell;
+	return VEDIS_OK;
 }
 /*
- * Discard a cell from the page table.
+ * Given a cell, Consume its key by invoking the given callback for each extracted chunk.
  */
-static void lhCellDiscard(lhcell *pCell)
+static int lhConsumeCellkey(
+	lhcell *pCell, /* Target cell */
+	int (*xConsumer)(const void *,unsigned int,void *), /* Consumer callback */
+	void *pUserData, /* Last argument to xConsumer() */
+	int offt_only
+	)
 {
-	lhpage *pPage = pCell->pPage->pMaster;	
-	
-	if( pCell->pPrevCol ){
-		pCell->pPrevCol->pNextCol = pCell->pNextCol;
+	lhpage *pPage = pCell->pPage;
+	const unsigned char *zRaw = pPage->pRaw->zData;
+	const unsigned char *zPayload;
+	int rc;
+	/* Point to the payload area */
+	zPayload = &zRaw[pCell->iStart];
+	if( pCell->iOvfl == 0 ){
+		/* Best scenario, consume the key directly without any overflow page */
+		zPayload += L_HASH_CELL_SZ;
+		rc = xConsumer((const void *)zPayload,pCell->nKey,pUserData);
+		if( rc != VEDIS_OK ){
+			rc = VEDIS_ABORT;
+		}
 	}else{
-		pPage->apCell[pCell->nHash & (pPage->nCellSize - 1)] = pCell->pNextCol;
-	}
-	if( pCell->pNextCol ){
-		pCell->pNextCol->pPrevCol = pCell->pPrevCol;
-	}
-	MACRO_LD_REMOVE(pPage->pList,pCell);
-	if( pCell == pPage->pFirst ){
-		pPage->pFirst = pCell->pPrev;
+		lhash_kv_engine *pEngine = pPage->pHash;
+		sxu32 nByte,nData = pCell->nKey;
+		vedis_page *pOvfl;
+		int data_offset = 0;
+		pgno iOvfl;
+		/* Overflow page */
+		iOvfl = pCell->iOvfl;
+		/* Total usable bytes in an overflow page */
+		nByte = L_HASH_OVERFLOW_SIZE(pEngine->iPageSize);
+		for(;;){
+			if( iOvfl == 0 || nData < 1 ){
+				/* no more overflow page */
+				break;
+			}
+			/* Point to the overflow page */
+			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOvfl);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			zPayload = &pOvfl->zData[8];
+			/* Point to the raw content */
+			if( !data_offset ){
+				/* Get the data page and offset */
+				SyBigEndianUnpack64(zPayload,&pCell->iDataPage);
+				zPayload += 8;
+				SyBigEndianUnpack16(zPayload,&pCell->iDataOfft);
+				zPayload += 2;
+				if( offt_only ){
+					/* Key too large, grab the data offset and return */
+					pEngine->pIo->xPageUnref(pOvfl);
+					return VEDIS_OK;
+				}
+				data_offset = 1;
+			}
+			/* Consume the key */
+			if( nData <= nByte ){
+				rc = xConsumer((const void *)zPayload,nData,pUserData);
+				if( rc != VEDIS_OK ){
+					pEngine->pIo->xPageUnref(pOvfl);
+					return VEDIS_ABORT;
+				}
+				nData = 0;
+			}else{
+				rc = xConsumer((const void *)zPayload,nByte,pUserData);
+				if( rc != VEDIS_OK ){
+					pEngine->pIo->xPageUnref(pOvfl);
+					return VEDIS_ABORT;
+				}
+				nData -= nByte;
+			}
+			/* Next overflow page in the chain */
+			SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
+			/* Unref the page */
+			pEngine->pIo->xPageUnref(pOvfl);
+		}
+		rc = VEDIS_OK;
 	}
-	pPage->nCell--;
-	/* Release the cell */
-	SyBlobRelease(&pCell->sKey);
-	SyMemBackendPoolFree(&pPage->pHash->sAllocator,pCell);
+	return rc;
 }
 /*
- * Install a cell in the page table.
+ * Given a cell, Consume its data by invoking the given callback for each extracted chunk.
  */
-static int lhInstallCell(lhcell *pCell)
+static int lhConsumeCellData(
+	lhcell *pCell, /* Target cell */
+	int (*xConsumer)(const void *,unsigned int,void *), /* Data consumer callback */
+	void *pUserData /* Last argument to xConsumer() */
+	)
 {
-	lhpage *pPage = pCell->pPage->pMaster;
-	sxu32 iBucket;
-	if( pPage->nCell < 1 ){
-		sxu32 nTableSize = 32; /* Must be a power of two */
-		lhcell **apTable;
-		/* Allocate a new cell table */
-		apTable = (lhcell **)SyMemBackendAlloc(&pPage->pHash->sAllocator, nTableSize * sizeof(lhcell *));
-		if( apTable == 0 ){
-			return VEDIS_NOMEM;
+	lhpage *pPage = pCell->pPage;
+	const unsigned char *zRaw = pPage->pRaw->zData;
+	const unsigned char *zPayload;
+	int rc;
+	/* Point to the payload area */
+	zPayload = &zRaw[pCell->iStart];
+	if( pCell->iOvfl == 0 ){
+		/* Best scenario, consume the data directly without any overflow page */
+		zPayload += L_HASH_CELL_SZ + pCell->nKey;
+		rc = xConsumer((const void *)zPayload,(sxu32)pCell->nData,pUserData);
+		if( rc != VEDIS_OK ){
+			rc = VEDIS_ABORT;
 		}
-		/* Zero the new table */
-		SyZero((void *)apTable, nTableSize * sizeof(lhcell *));
-		/* Install it */
-		pPage->apCell = apTable;
-		pPage->nCellSize = nTableSize;
-	}
-	iBucket = pCell->nHash & (pPage->nCellSize - 1);
-	pCell->pNextCol = pPage->apCell[iBucket];
-	if( pPage->apCell[iBucket] ){
-		pPage->apCell[iBucket]->pPrevCol = pCell;
-	}
-	pPage->apCell[iBucket] = pCell;
-	if( pPage->pFirst == 0 ){
-		pPage->pFirst = pPage->pList = pCell;
 	}else{
-		MACRO_LD_PUSH(pPage->pList,pCell);
-	}
-	pPage->nCell++;
-	if( (pPage->nCell >= pPage->nCellSize * 3) && pPage->nCell < 100000 ){
-		/* Allocate a new larger table */
-		sxu32 nNewSize = pPage->nCellSize << 1;
-		lhcell *pEntry;
-		lhcell **apNew;
-		sxu32 n;
-		
-		apNew = (lhcell **)SyMemBackendAlloc(&pPage->pHash->sAllocator, nNewSize * sizeof(lhcell *));
-		if( apNew ){
-			/* Zero the new table */
-			SyZero((void *)apNew, nNewSize * sizeof(lhcell *));
-			/* Rehash all entries */
-			n = 0;
-			pEntry = pPage->pList;
-			for(;;){
-				/* Loop one */
-				if( n >= pPage->nCell ){
-					break;
+		lhash_kv_engine *pEngine = pPage->pHash;
+		sxu64 nData = pCell->nData;
+		vedis_page *pOvfl;
+		int fix_offset = 0;
+		sxu32 nByte;
+		pgno iOvfl;
+		/* Overflow page where data is stored */
+		iOvfl = pCell->iDataPage;
+		for(;;){
+			if( iOvfl == 0 || nData < 1 ){
+				/* no more overflow page */
+				break;
+			}
+			/* Point to the overflow page */
+			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOvfl);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Point to the raw content */
+			zPayload = pOvfl->zData;
+			if( !fix_offset ){
+				/* Point to the data */
+				zPayload += pCell->iDataOfft;
+				nByte = pEngine->iPageSize - pCell->iDataOfft;
+				fix_offset = 1;
+			}else{
+				zPayload += 8;
+				/* Total usable bytes in an overflow page */
+				nByte = L_HASH_OVERFLOW_SIZE(pEngine->iPageSize);
+			}
+			/* Consume the data */
+			if( nData <= (sxu64)nByte ){
+				rc = xConsumer((const void *)zPayload,(unsigned int)nData,pUserData);
+				if( rc != VEDIS_OK ){
+					pEngine->pIo->xPageUnref(pOvfl);
+					return VEDIS_ABORT;
 				}
-				pEntry->pNextCol = pEntry->pPrevCol = 0;
-				/* Install in the new bucket */
-				iBucket = pEntry->nHash & (nNewSize - 1);
-				pEntry->pNextCol = apNew[iBucket];
-				if( apNew[iBucket]  ){
-					apNew[iBucket]->pPrevCol = pEntry;
+				nData = 0;
+			}else{
+				if( nByte > 0 ){
+					rc = xConsumer((const void *)zPayload,nByte,pUserData);
+					if( rc != VEDIS_OK ){
+						pEngine->pIo->xPageUnref(pOvfl);
+						return VEDIS_ABORT;
+					}
+					nData -= nByte;
 				}
-				apNew[iBucket] = pEntry;
-				/* Point to the next entry */
-				pEntry = pEntry->pNext;
-				n++;
 			}
-			/* Release the old table and reflect the change */
-			SyMemBackendFree(&pPage->pHash->sAllocator,(void *)pPage->apCell);
-			pPage->apCell = apNew;
-			pPage->nCellSize  = nNewSize;
+			/* Next overflow page in the chain */
+			SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
+			/* Unref the page */
+			pEngine->pIo->xPageUnref(pOvfl);
 		}
+		rc = VEDIS_OK;
 	}
-	return VEDIS_OK;
+	return rc;
 }
 /*
- * Private data of lhKeyCmp().
- */
-struct lhash_key_cmp
-{
-	const char *zIn;  /* Start of the stream */
-	const char *zEnd; /* End of the stream */
-	ProcCmp xCmp;     /* Comparison function */
-};
-/*
- * Comparsion callback for large key > 256 KB
+ * Read the linear hash header (Page one of the database).
  */
-static int lhKeyCmp(const void *pData,sxu32 nLen,void *pUserData)
+static int lhash_read_header(lhash_kv_engine *pEngine,vedis_page *pHeader)
 {
-	struct lhash_key_cmp *pCmp = (struct lhash_key_cmp *)pUserData;
+	const unsigned char *zRaw = pHeader->zData;
+	lhash_bmap_page *pMap;
+	sxu32 nHash;
 	int rc;
-	if( pCmp->zIn >= pCmp->zEnd ){
-		if( nLen > 0 ){
-			return VEDIS_ABORT;
-		}
-		return VEDIS_OK;
+	pEngine->pHeader = pHeader;
+	/* 4 byte magic number */
+	SyBigEndianUnpack32(zRaw,&pEngine->nMagic);
+	zRaw += 4;
+	if( pEngine->nMagic != L_HASH_MAGIC ){
+		/* Corrupt implementation */
+		return VEDIS_CORRUPT;
 	}
-	/* Perform the comparison */
-	rc = pCmp->xCmp((const void *)pCmp->zIn,pData,nLen);
-	if( rc != 0 ){
-		/* Abort comparison */
-		return VEDIS_ABORT;
+	/* 4 byte hash value to identify a valid hash function */
+	SyBigEndianUnpack32(zRaw,&nHash);
+	zRaw += 4;
+	/* Sanity check */
+	if( pEngine->xHash(L_HASH_WORD,sizeof(L_HASH_WORD)-1) != nHash ){
+		/* Different hash function */
+		pEngine->pIo->xErr(pEngine->pIo->pHandle,"Invalid hash function");
+		return VEDIS_INVALID;
 	}
-	/* Advance the cursor */
-	pCmp->zIn += nLen;
-	return VEDIS_OK;
-}
-/* Forward declaration */
-static int lhConsumeCellkey(lhcell *pCell,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData,int offt_only);
-/*
- * given a key, return the cell associated with it on success. NULL otherwise.
- */
-static lhcell * lhFindCell(
-	lhpage *pPage,    /* Target page */
-	const void *pKey, /* Lookup key */
-	sxu32 nByte,      /* Key length */
-	sxu32 nHash       /* Hash of the key */
-	)
-{
-	lhcell *pEntry;
-	if( pPage->nCell < 1 ){
-		/* Don't bother hashing */
-		return 0;
+	/* List of free pages */
+	SyBigEndianUnpack64(zRaw,&pEngine->nFreeList);
+	zRaw += 8;
+	/* Current split bucket */
+	SyBigEndianUnpack64(zRaw,&pEngine->split_bucket);
+	zRaw += 8;
+	/* Maximum split bucket */
+	SyBigEndianUnpack64(zRaw,&pEngine->max_split_bucket);
+	zRaw += 8;
+	/* Next generation */
+	pEngine->nmax_split_nucket = pEngine->max_split_bucket << 1;
+	/* Initialiaze the bucket map */
+	pMap = &pEngine->sPageMap;
+	/* Fill in the structure */
+	pMap->iNum = pHeader->pgno;
+	/* Next page in the bucket map */
+	SyBigEndianUnpack64(zRaw,&pMap->iNext);
+	zRaw += 8;
+	/* Total number of records in the bucket map (This page only) */
+	SyBigEndianUnpack32(zRaw,&pMap->nRec);
+	zRaw += 4;
+	pMap->iPtr = (sxu16)(zRaw - pHeader->zData);
+	/* Load the map in memory */
+	rc = lhMapLoadPage(pEngine,pMap,pHeader->zData);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* Point to the corresponding bucket */
-	pEntry = pPage->apCell[nHash & (pPage->nCellSize - 1)];
+	/* Load the bucket map chain if any */
 	for(;;){
-		if( pEntry == 0 ){
+		pgno iNext = pMap->iNext;
+		vedis_page *pPage;
+		if( iNext == 0 ){
+			/* No more map pages */
 			break;
 		}
-		if( pEntry->nHash == nHash && pEntry->nKey == nByte ){
-			if( SyBlobLength(&pEntry->sKey) < 1 ){
-				/* Large key (> 256 KB) are not kept in-memory */
-				struct lhash_key_cmp sCmp;
-				int rc;
-				/* Fill-in the structure */
-				sCmp.zIn = (const char *)pKey;
-				sCmp.zEnd = &sCmp.zIn[nByte];
-				sCmp.xCmp = pPage->pHash->xCmp;
-				/* Fetch the key from disk and perform the comparison */
-				rc = lhConsumeCellkey(pEntry,lhKeyCmp,&sCmp,0);
-				if( rc == VEDIS_OK ){
-					/* Cell found */
-					return pEntry;
-				}
-			}else if ( pPage->pHash->xCmp(pKey,SyBlobData(&pEntry->sKey),nByte) == 0 ){
-				/* Cell found */
-				return pEntry;
-			}
+		/* Point to the target page */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iNext,&pPage);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		/* Fill in the structure */
+		pMap->iNum = iNext;
+		pMap->iPtr = 0;
+		/* Load the map in memory */
+		rc = lhMapLoadPage(pEngine,pMap,pPage->zData);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		/* Point to the next entry */
-		pEntry = pEntry->pNextCol;
 	}
-	/* No such entry */
-	return 0;
+	/* All done */
+	return VEDIS_OK;
 }
 /*
- * Parse a raw cell fetched from disk.
+ * Perform a record lookup.
  */
-static int lhParseOneCell(lhpage *pPage,const unsigned char *zRaw,const unsigned char *zEnd,lhcell **ppOut)
+static int lhRecordLookup(
+	lhash_kv_engine *pEngine, /* KV storage engine */
+	const void *pKey,         /* Lookup key */
+	sxu32 nByte,              /* Key length */
+	lhcell **ppCell,          /* OUT: Target cell on success */
+	lhash_bmap_rec **ppRec    /* OUT: Bucket map record of the target cell */
+	)
 {
-	sxu16 iNext,iOfft;
-	sxu32 iHash,nKey;
+	lhash_bmap_rec *pRec;
+	lhpage *pPage;
 	lhcell *pCell;
-	sxu64 nData;
+	pgno iBucket;
+	sxu32 nHash;
 	int rc;
-	/* Offset this cell is stored */
-	iOfft = (sxu16)(zRaw - (const unsigned char *)pPage->pRaw->zData);
-	/* 4 byte hash number */
-	SyBigEndianUnpack32(zRaw,&iHash);
-	zRaw += 4;	
-	/* 4 byte key length  */
-	SyBigEndianUnpack32(zRaw,&nKey);
-	zRaw += 4;	
-	/* 8 byte data length */
-	SyBigEndianUnpack64(zRaw,&nData);
-	zRaw += 8;
-	/* 2 byte offset of the next cell */
-	SyBigEndianUnpack16(zRaw,&iNext);
-	/* Perform a sanity check */
-	if( iNext > 0 && &pPage->pRaw->zData[iNext] >= zEnd ){
-		return VEDIS_CORRUPT;
+	/* Acquire the first page (hash Header) so that everything gets loaded autmatically */
+	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	zRaw += 2;
-	pCell = lhNewCell(pPage->pHash,pPage);
-	if( pCell == 0 ){
-		return VEDIS_NOMEM;
+	/* Compute the hash of the key first */
+	nHash = pEngine->xHash(pKey,nByte);
+	/* Extract the logical (i.e. not real) page number */
+	iBucket = nHash & (pEngine->nmax_split_nucket - 1);
+	if( iBucket >= (pEngine->split_bucket + pEngine->max_split_bucket) ){
+		/* Low mask */
+		iBucket = nHash & (pEngine->max_split_bucket - 1);
 	}
-	/* Fill in the structure */
-	pCell->iNext = iNext;
-	pCell->nKey  = nKey;
-	pCell->nData = nData;
-	pCell->nHash = iHash;
-	/* Overflow page if any */
-	SyBigEndianUnpack64(zRaw,&pCell->iOvfl);
-	zRaw += 8;
-	/* Cell offset */
-	pCell->iStart = iOfft;
-	/* Consume the key */
-	rc = lhConsumeCellkey(pCell,vedisDataConsumer,&pCell->sKey,pCell->nKey > 262144 /* 256 KB */? 1 : 0);
-	if( rc != VEDIS_OK ){
-		/* TICKET: 14-32-chm@symisc.net: Key too large for memory */
-		SyBlobRelease(&pCell->sKey);
+	/* Map the logical bucket number to real page number */
+	pRec = lhMapFindBucket(pEngine,iBucket);
+	if( pRec == 0 ){
+		/* No such entry */
+		return VEDIS_NOTFOUND;
 	}
-	/* Finally install the cell */
-	rc = lhInstallCell(pCell);
+	/* Load the master page and it's slave page in-memory  */
+	rc = lhLoadPage(pEngine,pRec->iReal,0,&pPage,0);
 	if( rc != VEDIS_OK ){
+		/* IO error, unlikely scenario */
 		return rc;
 	}
-	if( ppOut ){
-		*ppOut = pCell;
+	/* Lookup for the cell */
+	pCell = lhFindCell(pPage,pKey,nByte,nHash);
+	if( pCell == 0 ){
+		/* No such entry */
+		return VEDIS_NOTFOUND;
+	}
+	if( ppCell ){
+		*ppCell = pCell;
+	}
+	if( ppRec ){
+		*ppRec = pRec;
 	}
 	return VEDIS_OK;
 }
 /*
- * Compute the total number of free space on a given page.
+ * Acquire a new page either from the free list or ask the pager
+ * for a new one.
  */
-static int lhPageFreeSpace(lhpage *pPage)
+static int lhAcquirePage(lhash_kv_engine *pEngine,vedis_page **ppOut)
 {
-	const unsigned char *zEnd,*zRaw = pPage->pRaw->zData;
-	lhphdr *pHdr = &pPage->sHdr;
-	sxu16 iNext,iAmount;
-	sxu16 nFree = 0;
-	if( pHdr->iFree < 1 ){
-		/* Don't bother processing, the page is full */
-		pPage->nFree = 0;
-		return VEDIS_OK;
-	}
-	/* Point to first free block */
-	zEnd = &zRaw[pPage->pHash->iPageSize];
-	zRaw += pHdr->iFree;
-	for(;;){
-		/* Offset of the next free block */
-		SyBigEndianUnpack16(zRaw,&iNext);
-		zRaw += 2;
-		/* Available space on this block */
-		SyBigEndianUnpack16(zRaw,&iAmount);
-		nFree += iAmount;
-		if( iNext < 1 ){
-			/* No more free blocks */
-			break;
-		}
-		/* Point to the next free block*/
-		zRaw = &pPage->pRaw->zData[iNext];
-		if( zRaw >= zEnd ){
-			/* Corrupt page */
-			return VEDIS_CORRUPT;
+	vedis_page *pPage;
+	int rc;
+	if( pEngine->nFreeList != 0 ){
+		/* Acquire one from the free list */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pEngine->nFreeList,&pPage);
+		if( rc == VEDIS_OK ){
+			/* Point to the next free page */
+			SyBigEndianUnpack64(pPage->zData,&pEngine->nFreeList);
+			/* Update the database header */
+			rc = pEngine->pIo->xWrite(pEngine->pHeader);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/],pEngine->nFreeList);
+			/* Tell the pager do not journal this page */
+			pEngine->pIo->xDontJournal(pPage);
+			/* Return to the caller */
+			*ppOut = pPage;
+			/* All done */
+			return VEDIS_OK;
 		}
 	}
-	/* Save the amount of free space */
-	pPage->nFree = nFree;
+	/* Acquire a new page */
+	rc = pEngine->pIo->xNew(pEngine->pIo->pHandle,&pPage);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Point to the target page */
+	*ppOut = pPage;
 	return VEDIS_OK;
 }
 /*
- * Given a primary page, load all its cell.
+ * Write a bucket map record to disk.
  */
-static int lhLoadCells(lhpage *pPage)
+static int lhMapWriteRecord(lhash_kv_engine *pEngine,pgno iLogic,pgno iReal)
 {
-	const unsigned char *zEnd,*zRaw = pPage->pRaw->zData;
-	lhphdr *pHdr = &pPage->sHdr;
-	lhcell *pCell = 0; /* cc warning */
+	lhash_bmap_page *pMap = &pEngine->sPageMap;
+	vedis_page *pPage = 0;
 	int rc;
-	/* Calculate the amount of free space available first */
-	rc = lhPageFreeSpace(pPage);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	if( pHdr->iOfft < 1 ){
-		/* Don't bother processing, the page is empty */
-		return VEDIS_OK;
-	}
-	/* Point to first cell */
-	zRaw += pHdr->iOfft;
-	zEnd = &zRaw[pPage->pHash->iPageSize];
-	for(;;){
-		/* Parse a single cell */
-		rc = lhParseOneCell(pPage,zRaw,zEnd,&pCell);
+	if( pMap->iPtr > (pEngine->iPageSize - 16) /* 8 byte logical bucket number + 8 byte real bucket number */ ){
+		vedis_page *pOld;
+		/* Point to the old page */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pMap->iNum,&pOld);
 		if( rc != VEDIS_OK ){
 			return rc;
 		}
-		if( pCell->iNext < 1 ){
-			/* No more cells */
-			break;
+		/* Acquire a new page */
+		rc = lhAcquirePage(pEngine,&pPage);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		/* Point to the next cell */
-		zRaw = &pPage->pRaw->zData[pCell->iNext];
-		if( zRaw >= zEnd ){
-			/* Corrupt page */
-			return VEDIS_CORRUPT;
+		/* Reflect the change  */
+		pMap->iNext = 0;
+		pMap->iNum = pPage->pgno;
+		pMap->nRec = 0;
+		pMap->iPtr = 8/* Next page number */+4/* Total records in the map*/;
+		/* Link this page */
+		rc = pEngine->pIo->xWrite(pOld);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		if( pOld->pgno == pEngine->pHeader->pgno ){
+			/* First page (Hash header) */
+			SyBigEndianPack64(&pOld->zData[4/*magic*/+4/*hash*/+8/* Free page */+8/*current split bucket*/+8/*Maximum split bucket*/],pPage->pgno);
+		}else{
+			/* Link the new page */
+			SyBigEndianPack64(pOld->zData,pPage->pgno);
+			/* Unref */
+			pEngine->pIo->xPageUnref(pOld);
+		}
+		/* Assume the last bucket map page */
+		rc = pEngine->pIo->xWrite(pPage);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
+		SyBigEndianPack64(pPage->zData,0); /* Next bucket map page on the list */
 	}
-	/* All done */
-	return VEDIS_OK;
-}
-/*
- * Given a page, parse its raw headers.
- */
-static int lhParsePageHeader(lhpage *pPage)
-{
-	const unsigned char *zRaw = pPage->pRaw->zData;
-	lhphdr *pHdr = &pPage->sHdr;
-	/* Offset of the first cell */
-	SyBigEndianUnpack16(zRaw,&pHdr->iOfft);
-	zRaw += 2;
-	/* Offset of the first free block */
-	SyBigEndianUnpack16(zRaw,&pHdr->iFree);
-	zRaw += 2;
-	/* Slave page number */
-	SyBigEndianUnpack64(zRaw,&pHdr->iSlave);
-	/* All done */
-	return VEDIS_OK;
+	if( pPage == 0){
+		/* Point to the current map page */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pMap->iNum,&pPage);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+	}
+	/* Make page writable */
+	rc = pEngine->pIo->xWrite(pPage);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Write the data */
+	SyBigEndianPack64(&pPage->zData[pMap->iPtr],iLogic);
+	pMap->iPtr += 8;
+	SyBigEndianPack64(&pPage->zData[pMap->iPtr],iReal);
+	pMap->iPtr += 8;
+	/* Install the bucket map */
+	rc = lhMapInstallBucket(pEngine,iLogic,iReal);
+	if( rc == VEDIS_OK ){
+		/* Total number of records */
+		pMap->nRec++;
+		if( pPage->pgno == pEngine->pHeader->pgno ){
+			/* Page one: Always writable */
+			SyBigEndianPack32(
+				&pPage->zData[4/*magic*/+4/*hash*/+8/* Free page */+8/*current split bucket*/+8/*Maximum split bucket*/+8/*Next map page*/],
+				pMap->nRec);
+		}else{
+			/* Make page writable */
+			rc = pEngine->pIo->xWrite(pPage);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			SyBigEndianPack32(&pPage->zData[8],pMap->nRec);
+		}
+	}
+	return rc;
 }
 /*
- * Allocate a new page instance.
+ * Defragment a page.
  */
-static lhpage * lhNewPage(
-	lhash_kv_engine *pEngine, /* KV store which own this instance */
-	vedis_page *pRaw,       /* Raw page contents */
-	lhpage *pMaster           /* Master page in case we are dealing with a slave page */
-	)
+static int lhPageDefragment(lhpage *pPage)
 {
-	lhpage *pPage;
-	/* Allocate a new instance */
-	pPage = (lhpage *)SyMemBackendPoolAlloc(&pEngine->sAllocator,sizeof(lhpage));
-	if( pPage == 0 ){
-		return 0;
+	lhash_kv_engine *pEngine = pPage->pHash;
+	unsigned char *zTmp,*zPtr,*zEnd,*zPayload;
+	lhcell *pCell;
+	/* Get a temporary page from the pager. This opertaion never fail */
+	zTmp = pEngine->pIo->xTmpPage(pEngine->pIo->pHandle);
+	/* Move the target cells to the beginning */
+	pCell = pPage->pMaster->pList;
+	/* Write the slave page number */
+	SyBigEndianPack64(&zTmp[2/*Offset of the first cell */+2/*Offset of the first free block */],pPage->sHdr.iSlave);
+	zPtr = &zTmp[L_HASH_PAGE_HDR_SZ]; /* Offset to start writing from */
+	zEnd = &zTmp[pEngine->iPageSize];
+	pPage->sHdr.iOfft = 0; /* Offset of the first cell */
+	for(;;){
+		if( pCell == 0 ){
+			/* No more cells */
+			break;
+		}
+		if( pCell->pPage->pRaw->pgno == pPage->pRaw->pgno ){
+			/* Cell payload if locally stored */
+			zPayload = 0;
+			if( pCell->iOvfl == 0 ){
+				zPayload = &pCell->pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ];
+			}
+			/* Move the cell */
+			pCell->iNext = pPage->sHdr.iOfft;
+			pCell->iStart = (sxu16)(zPtr - zTmp); /* Offset where this cell start */
+			pPage->sHdr.iOfft = pCell->iStart;
+			/* Write the cell header */
+			/* 4 byte hash number */
+			SyBigEndianPack32(zPtr,pCell->nHash);
+			zPtr += 4;
+			/* 4 byte ley length */
+			SyBigEndianPack32(zPtr,pCell->nKey);
+			zPtr += 4;
+			/* 8 byte data length */
+			SyBigEndianPack64(zPtr,pCell->nData);
+			zPtr += 8;
+			/* 2 byte offset of the next cell */
+			SyBigEndianPack16(zPtr,pCell->iNext);
+			zPtr += 2;
+			/* 8 byte overflow page number */
+			SyBigEndianPack64(zPtr,pCell->iOvfl);
+			zPtr += 8;
+			if( zPayload ){
+				/* Local payload */
+				SyMemcpy((const void *)zPayload,zPtr,(sxu32)(pCell->nKey + pCell->nData));
+				zPtr += pCell->nKey + pCell->nData;
+			}
+			if( zPtr >= zEnd ){
+				/* Can't happen */
+				break;
+			}
+		}
+		/* Point to the next page */
+		pCell = pCell->pNext;
 	}
-	/* Zero the structure */
-	SyZero(pPage,sizeof(lhpage));
-	/* Fill-in the structure */
-	pPage->pHash = pEngine;
-	pPage->pRaw = pRaw;
-	pPage->pMaster = pMaster ? pMaster /* Slave page */ : pPage /* Master page */ ;
-	if( pPage->pMaster != pPage ){
-		/* Slave page, attach it to its master */
-		pPage->pNextSlave = pMaster->pSlave;
-		pMaster->pSlave = pPage;
-		pMaster->iSlave++;
+	/* Mark the free block */
+	pPage->nFree = (sxu16)(zEnd - zPtr); /* Block length */
+	if( pPage->nFree > 3 ){
+		pPage->sHdr.iFree = (sxu16)(zPtr - zTmp); /* Offset of the free block */
+		/* Mark the block */
+		SyBigEndianPack16(zPtr,0); /* Offset of the next free block */
+		SyBigEndianPack16(&zPtr[2],pPage->nFree); /* Block length */
+	}else{
+		/* Block of length less than 4 bytes are simply discarded */
+		pPage->nFree = 0;
+		pPage->sHdr.iFree = 0;
 	}
-	/* Save this instance for future fast lookup */
-	pRaw->pUserData = pPage;
+	/* Reflect the change */
+	SyBigEndianPack16(zTmp,pPage->sHdr.iOfft);     /* Offset of the first cell */
+	SyBigEndianPack16(&zTmp[2],pPage->sHdr.iFree); /* Offset of the first free block */
+	SyMemcpy((const void *)zTmp,pPage->pRaw->zData,pEngine->iPageSize);
 	/* All done */
-	return pPage;
+	return VEDIS_OK;
 }
 /*
- * Load a primary and its associated slave pages from disk.
- */
-static int lhLoadPage(lhash_kv_engine *pEngine,pgno pnum,lhpage *pMaster,lhpage **ppOut,int iNest)
+** Allocate nByte bytes of space on a page.
+**
+** Return the index into pPage->pRaw->zData[] of the first byte of
+** the new allocation. Or return 0 if there is not enough free
+** space on the page to satisfy the allocation request.
+**
+** If the page contains nBytes of free space but does not contain
+** nBytes of contiguous free space, then this routine automatically
+** calls defragementPage() to consolidate all free space before 
+** allocating the new chunk.
+*/
+static int lhAllocateSpace(lhpage *pPage,sxu64 nAmount,sxu16 *pOfft)
 {
-	vedis_page *pRaw;
-	lhpage *pPage = 0; /* cc warning */
+	const unsigned char *zEnd,*zPtr;
+	sxu16 iNext,iBlksz,nByte;
+	unsigned char *zPrev;
 	int rc;
-	/* Aquire the page from the pager first */
-	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pnum,&pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
+	if( (sxu64)pPage->nFree < nAmount ){
+		/* Don't bother looking for a free chunk */
+		return VEDIS_FULL;
 	}
-	if( pRaw->pUserData ){
-		/* The page is already parsed and loaded in memory. Point to it */
-		pPage = (lhpage *)pRaw->pUserData;
-	}else{
-		/* Allocate a new page */
-		pPage = lhNewPage(pEngine,pRaw,pMaster);
-		if( pPage == 0 ){
-			return VEDIS_NOMEM;
-		}
-		/* Process the page */
-		rc = lhParsePageHeader(pPage);
-		if( rc == VEDIS_OK ){
-			/* Load cells */
-			rc = lhLoadCells(pPage);
+	if( pPage->nCell < 10 && ((int)nAmount >= (pPage->pHash->iPageSize / 2)) ){
+		/* Big chunk need an overflow page for its data */
+		return VEDIS_FULL;
+	}
+	zPtr = &pPage->pRaw->zData[pPage->sHdr.iFree];
+	zEnd = &pPage->pRaw->zData[pPage->pHash->iPageSize];
+	nByte = (sxu16)nAmount;
+	zPrev = 0;
+	iBlksz = 0; /* cc warning */
+	/* Perform the lookup */
+	for(;;){
+		if( zPtr >= zEnd ){
+			return VEDIS_FULL;
 		}
-		if( rc != VEDIS_OK ){
-			pEngine->pIo->xPageUnref(pPage->pRaw); /* pPage will be released inside this call */
-			return rc;
+		/* Offset of the next free block */
+		SyBigEndianUnpack16(zPtr,&iNext);
+		/* Block size */
+		SyBigEndianUnpack16(&zPtr[2],&iBlksz);
+		if( iBlksz >= nByte ){
+			/* Got one */
+			break;
 		}
-		if( pPage->sHdr.iSlave > 0 && iNest < 128 ){
-			if( pMaster == 0 ){
-				pMaster = pPage;
+		zPrev = (unsigned char *)zPtr;
+		if( iNext == 0 ){
+			/* No more free blocks, defragment the page */
+			rc = lhPageDefragment(pPage);
+			if( rc == VEDIS_OK && pPage->nFree >= nByte) {
+				/* Free blocks are merged together */
+				iNext = 0;
+				zPtr = &pPage->pRaw->zData[pPage->sHdr.iFree];
+				iBlksz = pPage->nFree;
+				zPrev = 0;
+				break;
+			}else{
+				return VEDIS_FULL;
 			}
-			/* Slave page. Not a fatal error if something goes wrong here */
-			lhLoadPage(pEngine,pPage->sHdr.iSlave,pMaster,0,iNest++);
 		}
+		/* Point to the next free block */
+		zPtr = &pPage->pRaw->zData[iNext];
 	}
-	if( ppOut ){
-		*ppOut = pPage;
+	/* Acquire writer lock on this page */
+	rc = pPage->pHash->pIo->xWrite(pPage->pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Save block offset */
+	*pOfft = (sxu16)(zPtr - pPage->pRaw->zData);
+	/* Fix pointers */
+	if( iBlksz >= nByte && (iBlksz - nByte) > 3 ){
+		unsigned char *zBlock = &pPage->pRaw->zData[(*pOfft) + nByte];
+		/* Create a new block */
+		zPtr = zBlock;
+		SyBigEndianPack16(zBlock,iNext); /* Offset of the next block */
+		SyBigEndianPack16(&zBlock[2],iBlksz-nByte); /* Block size*/
+		/* Offset of the new block */
+		iNext = (sxu16)(zPtr - pPage->pRaw->zData);
+		iBlksz = nByte;
+	}
+	/* Fix offsets */
+	if( zPrev ){
+		SyBigEndianPack16(zPrev,iNext);
+	}else{
+		/* First block */
+		pPage->sHdr.iFree = iNext;
+		/* Reflect on the page header */
+		SyBigEndianPack16(&pPage->pRaw->zData[2/* Offset of the first cell1*/],iNext);
 	}
+	/* All done */
+	pPage->nFree -= iBlksz;
 	return VEDIS_OK;
 }
 /*
- * Given a cell, Consume its key by invoking the given callback for each extracted chunk.
+ * Write the cell header into the corresponding offset.
  */
-static int lhConsumeCellkey(
-	lhcell *pCell, /* Target cell */
-	int (*xConsumer)(const void *,unsigned int,void *), /* Consumer callback */
-	void *pUserData, /* Last argument to xConsumer() */
-	int offt_only
-	)
+static int lhCellWriteHeader(lhcell *pCell)
 {
 	lhpage *pPage = pCell->pPage;
-	const unsigned char *zRaw = pPage->pRaw->zData;
-	const unsigned char *zPayload;
-	int rc;
-	/* Point to the payload area */
-	zPayload = &zRaw[pCell->iStart];
-	if( pCell->iOvfl == 0 ){
-		/* Best scenario, consume the key directly without any overflow page */
-		zPayload += L_HASH_CELL_SZ;
-		rc = xConsumer((const void *)zPayload,pCell->nKey,pUserData);
-		if( rc != VEDIS_OK ){
-			rc = VEDIS_ABORT;
-		}
-	}else{
-		lhash_kv_engine *pEngine = pPage->pHash;
-		sxu32 nByte,nData = pCell->nKey;
-		vedis_page *pOvfl;
-		int data_offset = 0;
-		pgno iOvfl;
-		/* Overflow page */
-		iOvfl = pCell->iOvfl;
-		/* Total usable bytes in an overflow page */
-		nByte = L_HASH_OVERFLOW_SIZE(pEngine->iPageSize);
-		for(;;){
-			if( iOvfl == 0 || nData < 1 ){
-				/* no more overflow page */
-				break;
-			}
-			/* Point to the overflow page */
-			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOvfl);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			zPayload = &pOvfl->zData[8];
-			/* Point to the raw content */
-			if( !data_offset ){
-				/* Get the data page and offset */
-				SyBigEndianUnpack64(zPayload,&pCell->iDataPage);
-				zPayload += 8;
-				SyBigEndianUnpack16(zPayload,&pCell->iDataOfft);
-				zPayload += 2;
-				if( offt_only ){
-					/* Key too large, grab the data offset and return */
-					pEngine->pIo->xPageUnref(pOvfl);
-					return VEDIS_OK;
-				}
-				data_offset = 1;
-			}
-			/* Consume the key */
-			if( nData <= nByte ){
-				rc = xConsumer((const void *)zPayload,nData,pUserData);
-				if( rc != VEDIS_OK ){
-					pEngine->pIo->xPageUnref(pOvfl);
-					return VEDIS_ABORT;
-				}
-				nData = 0;
-			}else{
-				rc = xConsumer((const void *)zPayload,nByte,pUserData);
-				if( rc != VEDIS_OK ){
-					pEngine->pIo->xPageUnref(pOvfl);
-					return VEDIS_ABORT;
-				}
-				nData -= nByte;
-			}
-			/* Next overflow page in the chain */
-			SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
-			/* Unref the page */
-			pEngine->pIo->xPageUnref(pOvfl);
-		}
-		rc = VEDIS_OK;
-	}
-	return rc;
+	unsigned char *zRaw = pPage->pRaw->zData;
+	/* Seek to the desired location */
+	zRaw += pCell->iStart;
+	/* 4 byte hash number */
+	SyBigEndianPack32(zRaw,pCell->nHash);
+	zRaw += 4;
+	/* 4 byte key length */
+	SyBigEndianPack32(zRaw,pCell->nKey);
+	zRaw += 4;
+	/* 8 byte data length */
+	SyBigEndianPack64(zRaw,pCell->nData);
+	zRaw += 8;
+	/* 2 byte offset of the next cell */
+	pCell->iNext = pPage->sHdr.iOfft;
+	SyBigEndianPack16(zRaw,pCell->iNext);
+	zRaw += 2;
+	/* 8 byte overflow page number */
+	SyBigEndianPack64(zRaw,pCell->iOvfl);
+	/* Update the page header */
+	pPage->sHdr.iOfft = pCell->iStart;
+	/* pEngine->pIo->xWrite() has been successfully called on this page */
+	SyBigEndianPack16(pPage->pRaw->zData,pCell->iStart);
+	/* All done */
+	return VEDIS_OK;
 }
 /*
- * Given a cell, Consume its data by invoking the given callback for each extracted chunk.
+ * Write local payload.
  */
-static int lhConsumeCellData(
-	lhcell *pCell, /* Target cell */
-	int (*xConsumer)(const void *,unsigned int,void *), /* Data consumer callback */
-	void *pUserData /* Last argument to xConsumer() */
+static int lhCellWriteLocalPayload(lhcell *pCell,
+	const void *pKey,sxu32 nKeylen,
+	const void *pData,vedis_int64 nDatalen
 	)
 {
+	/* A writer lock have been acquired on this page */
 	lhpage *pPage = pCell->pPage;
-	const unsigned char *zRaw = pPage->pRaw->zData;
-	const unsigned char *zPayload;
-	int rc;
-	/* Point to the payload area */
-	zPayload = &zRaw[pCell->iStart];
-	if( pCell->iOvfl == 0 ){
-		/* Best scenario, consume the data directly without any overflow page */
-		zPayload += L_HASH_CELL_SZ + pCell->nKey;
-		rc = xConsumer((const void *)zPayload,(sxu32)pCell->nData,pUserData);
-		if( rc != VEDIS_OK ){
-			rc = VEDIS_ABORT;
-		}
-	}else{
-		lhash_kv_engine *pEngine = pPage->pHash;
-		sxu64 nData = pCell->nData;
-		vedis_page *pOvfl;
-		int fix_offset = 0;
-		sxu32 nByte;
-		pgno iOvfl;
-		/* Overflow page where data is stored */
-		iOvfl = pCell->iDataPage;
-		for(;;){
-			if( iOvfl == 0 || nData < 1 ){
-				/* no more overflow page */
-				break;
-			}
-			/* Point to the overflow page */
-			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOvfl);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Point to the raw content */
-			zPayload = pOvfl->zData;
-			if( !fix_offset ){
-				/* Point to the data */
-				zPayload += pCell->iDataOfft;
-				nByte = pEngine->iPageSize - pCell->iDataOfft;
-				fix_offset = 1;
-			}else{
-				zPayload += 8;
-				/* Total usable bytes in an overflow page */
-				nByte = L_HASH_OVERFLOW_SIZE(pEngine->iPageSize);
-			}
-			/* Consume the data */
-			if( nData <= (sxu64)nByte ){
-				rc = xConsumer((const void *)zPayload,(unsigned int)nData,pUserData);
-				if( rc != VEDIS_OK ){
-					pEngine->pIo->xPageUnref(pOvfl);
-					return VEDIS_ABORT;
-				}
-				nData = 0;
-			}else{
-				if( nByte > 0 ){
-					rc = xConsumer((const void *)zPayload,nByte,pUserData);
-					if( rc != VEDIS_OK ){
-						pEngine->pIo->xPageUnref(pOvfl);
-						return VEDIS_ABORT;
-					}
-					nData -= nByte;
-				}
-			}
-			/* Next overflow page in the chain */
-			SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
-			/* Unref the page */
-			pEngine->pIo->xPageUnref(pOvfl);
-		}
-		rc = VEDIS_OK;
+	unsigned char *zRaw = pPage->pRaw->zData;
+	/* Seek to the desired location */
+	zRaw += pCell->iStart + L_HASH_CELL_SZ;
+	/* Write the key */
+	SyMemcpy(pKey,(void *)zRaw,nKeylen);
+	zRaw += nKeylen;
+	if( nDatalen > 0 ){
+		/* Write the Data */
+		SyMemcpy(pData,(void *)zRaw,(sxu32)nDatalen);
 	}
-	return rc;
+	return VEDIS_OK;
 }
 /*
- * Read the linear hash header (Page one of the database).
+ * Allocate as much overflow page we need to store the cell payload.
  */
-static int lhash_read_header(lhash_kv_engine *pEngine,vedis_page *pHeader)
+static int lhCellWriteOvflPayload(lhcell *pCell,const void *pKey,sxu32 nKeylen,...)
 {
-	const unsigned char *zRaw = pHeader->zData;
-	lhash_bmap_page *pMap;
-	sxu32 nHash;
+	lhpage *pPage = pCell->pPage;
+	lhash_kv_engine *pEngine = pPage->pHash;
+	vedis_page *pOvfl,*pFirst,*pNew;
+	const unsigned char *zPtr,*zEnd;
+	unsigned char *zRaw,*zRawEnd;
+	sxu32 nAvail;
+	va_list ap;
 	int rc;
-	pEngine->pHeader = pHeader;
-	/* 4 byte magic number */
-	SyBigEndianUnpack32(zRaw,&pEngine->nMagic);
-	zRaw += 4;
-	if( pEngine->nMagic != L_HASH_MAGIC ){
-		/* Corrupt implementation */
-		return VEDIS_CORRUPT;
-	}
-	/* 4 byte hash value to identify a valid hash function */
-	SyBigEndianUnpack32(zRaw,&nHash);
-	zRaw += 4;
-	/* Sanity check */
-	if( pEngine->xHash(L_HASH_WORD,sizeof(L_HASH_WORD)-1) != nHash ){
-		/* Different hash function */
-		pEngine->pIo->xErr(pEngine->pIo->pHandle,"Invalid hash function");
-		return VEDIS_INVALID;
+	/* Acquire a new overflow page */
+	rc = lhAcquirePage(pEngine,&pOvfl);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* List of free pages */
-	SyBigEndianUnpack64(zRaw,&pEngine->nFreeList);
-	zRaw += 8;
-	/* Current split bucket */
-	SyBigEndianUnpack64(zRaw,&pEngine->split_bucket);
-	zRaw += 8;
-	/* Maximum split bucket */
-	SyBigEndianUnpack64(zRaw,&pEngine->max_split_bucket);
-	zRaw += 8;
-	/* Next generation */
-	pEngine->nmax_split_nucket = pEngine->max_split_bucket << 1;
-	/* Initialiaze the bucket map */
-	pMap = &pEngine->sPageMap;
-	/* Fill in the structure */
-	pMap->iNum = pHeader->pgno;
-	/* Next page in the bucket map */
-	SyBigEndianUnpack64(zRaw,&pMap->iNext);
-	zRaw += 8;
-	/* Total number of records in the bucket map (This page only) */
-	SyBigEndianUnpack32(zRaw,&pMap->nRec);
-	zRaw += 4;
-	pMap->iPtr = (sxu16)(zRaw - pHeader->zData);
-	/* Load the map in memory */
-	rc = lhMapLoadPage(pEngine,pMap,pHeader->zData);
+	/* Acquire a writer lock */
+	rc = pEngine->pIo->xWrite(pOvfl);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Load the bucket map chain if any */
+	pFirst = pOvfl;
+	/* Link */
+	pCell->iOvfl = pOvfl->pgno;
+	/* Update the cell header */
+	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4/*Hash*/ + 4/*Key*/ + 8/*Data*/ + 2 /*Next cell*/],pCell->iOvfl);
+	/* Start the write process */
+	zPtr = (const unsigned char *)pKey;
+	zEnd = &zPtr[nKeylen];
+	SyBigEndianPack64(pOvfl->zData,0); /* Next overflow page on the chain */
+	zRaw = &pOvfl->zData[8/* Next ovfl page*/ + 8 /* Data page */ + 2 /* Data offset*/];
+	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
+	pNew = pOvfl;
+	/* Write the key */
 	for(;;){
-		pgno iNext = pMap->iNext;
-		vedis_page *pPage;
-		if( iNext == 0 ){
-			/* No more map pages */
+		if( zPtr >= zEnd ){
 			break;
 		}
-		/* Point to the target page */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iNext,&pPage);
-		if( rc != VEDIS_OK ){
-			return rc;
+		if( zRaw >= zRawEnd ){
+			/* Acquire a new page */
+			rc = lhAcquirePage(pEngine,&pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			rc = pEngine->pIo->xWrite(pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Link */
+			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
+			pEngine->pIo->xPageUnref(pOvfl);
+			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
+			pOvfl = pNew;
+			zRaw = &pNew->zData[8];
+			zRawEnd = &pNew->zData[pEngine->iPageSize];
 		}
-		/* Fill in the structure */
-		pMap->iNum = iNext;
-		pMap->iPtr = 0;
-		/* Load the map in memory */
-		rc = lhMapLoadPage(pEngine,pMap,pPage->zData);
-		if( rc != VEDIS_OK ){
-			return rc;
+		nAvail = (sxu32)(zRawEnd-zRaw);
+		nKeylen = (sxu32)(zEnd-zPtr);
+		if( nKeylen > nAvail ){
+			nKeylen = nAvail;
+		}
+		SyMemcpy((const void *)zPtr,(void *)zRaw,nKeylen);
+		/* Synchronize pointers */
+		zPtr += nKeylen;
+		zRaw += nKeylen;
+	}
+	rc = VEDIS_OK;
+	va_start(ap,nKeylen);
+	pCell->iDataPage = pNew->pgno;
+	pCell->iDataOfft = (sxu16)(zRaw-pNew->zData);
+	/* Write the data page and its offset */
+	SyBigEndianPack64(&pFirst->zData[8/*Next ovfl*/],pCell->iDataPage);
+	SyBigEndianPack16(&pFirst->zData[8/*Next ovfl*/+8/*Data page*/],pCell->iDataOfft);
+	/* Write data */
+	for(;;){
+		const void *pData;
+		sxu32 nDatalen;
+		sxu64 nData;
+		pData = va_arg(ap,const void *);
+		nData = va_arg(ap,sxu64);
+		if( pData == 0 ){
+			/* No more chunks */
+			break;
+		}
+		/* Write this chunk */
+		zPtr = (const unsigned char *)pData;
+		zEnd = &zPtr[nData];
+		for(;;){
+			if( zPtr >= zEnd ){
+				break;
+			}
+			if( zRaw >= zRawEnd ){
+				/* Acquire a new page */
+				rc = lhAcquirePage(pEngine,&pNew);
+				if( rc != VEDIS_OK ){
+					va_end(ap);
+					return rc;
+				}
+				rc = pEngine->pIo->xWrite(pNew);
+				if( rc != VEDIS_OK ){
+					va_end(ap);
+					return rc;
+				}
+				/* Link */
+				SyBigEndianPack64(pOvfl->zData,pNew->pgno);
+				pEngine->pIo->xPageUnref(pOvfl);
+				SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
+				pOvfl = pNew;
+				zRaw = &pNew->zData[8];
+				zRawEnd = &pNew->zData[pEngine->iPageSize];
+			}
+			nAvail = (sxu32)(zRawEnd-zRaw);
+			nDatalen = (sxu32)(zEnd-zPtr);
+			if( nDatalen > nAvail ){
+				nDatalen = nAvail;
+			}
+			SyMemcpy((const void *)zPtr,(void *)zRaw,nDatalen);
+			/* Synchronize pointers */
+			zPtr += nDatalen;
+			zRaw += nDatalen;
 		}
 	}
-	/* All done */
+	/* Unref the overflow page */
+	pEngine->pIo->xPageUnref(pOvfl);
+	va_end(ap);
 	return VEDIS_OK;
 }
 /*
- * Perform a record lookup.
+ * Restore a page to the free list.
  */
-static int lhRecordLookup(
-	lhash_kv_engine *pEngine, /* KV storage engine */
-	const void *pKey,         /* Lookup key */
-	sxu32 nByte,              /* Key length */
-	lhcell **ppCell           /* OUT: Target cell on success */
-	)
+static int lhRestorePage(lhash_kv_engine *pEngine,vedis_page *pPage)
 {
-	lhash_bmap_rec *pRec;
-	lhpage *pPage;
-	lhcell *pCell;
-	pgno iBucket;
-	sxu32 nHash;
 	int rc;
-	/* Acquire the first page (hash Header) so that everything gets loaded autmatically */
-	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
+	rc = pEngine->pIo->xWrite(pEngine->pHeader);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Compute the hash of the key first */
-	nHash = pEngine->xHash(pKey,nByte);
-	/* Extract the logical (i.e. not real) page number */
-	iBucket = nHash & (pEngine->nmax_split_nucket - 1);
-	if( iBucket >= (pEngine->split_bucket + pEngine->max_split_bucket) ){
-		/* Low mask */
-		iBucket = nHash & (pEngine->max_split_bucket - 1);
+	rc = pEngine->pIo->xWrite(pPage);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* Map the logical bucket number to real page number */
-	pRec = lhMapFindBucket(pEngine,iBucket);
-	if( pRec == 0 ){
-		/* No such entry */
-		return VEDIS_NOTFOUND;
+	/* Link to the list of free page */
+	SyBigEndianPack64(pPage->zData,pEngine->nFreeList);
+	pEngine->nFreeList = pPage->pgno;
+	SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/],pEngine->nFreeList);
+	/* All done */
+	return VEDIS_OK;
+}
+/*
+ * Restore cell space and mark it as a free block.
+ */
+static int lhRestoreSpace(lhpage *pPage,sxu16 iOfft,sxu16 nByte)
+{
+	unsigned char *zRaw;
+	if( nByte < 4 ){
+		/* At least 4 bytes of freespace must form a valid block */
+		return VEDIS_OK;
 	}
-	/* Load the master page and it's slave page in-memory  */
-	rc = lhLoadPage(pEngine,pRec->iReal,0,&pPage,0);
+	/* pEngine->pIo->xWrite() has been successfully called on this page */
+	zRaw = &pPage->pRaw->zData[iOfft];
+	/* Mark as a free block */
+	SyBigEndianPack16(zRaw,pPage->sHdr.iFree); /* Offset of the next free block */
+	zRaw += 2;
+	SyBigEndianPack16(zRaw,nByte);
+	/* Link */
+	SyBigEndianPack16(&pPage->pRaw->zData[2/* offset of the first cell */],iOfft);
+	pPage->sHdr.iFree = iOfft;
+	pPage->nFree += nByte;
+	return VEDIS_OK;
+}
+/* Forward declaration */
+static lhcell * lhFindSibeling(lhcell *pCell);
+/*
+ * Unlink a cell.
+ */
+static int lhUnlinkCell(lhcell *pCell)
+{
+	lhash_kv_engine *pEngine = pCell->pPage->pHash;
+	lhpage *pPage = pCell->pPage;
+	sxu16 nByte = L_HASH_CELL_SZ;
+	lhcell *pPrev;
+	int rc;
+	rc = pEngine->pIo->xWrite(pPage->pRaw);
 	if( rc != VEDIS_OK ){
-		/* IO error, unlikely scenario */
 		return rc;
 	}
-	/* Lookup for the cell */
-	pCell = lhFindCell(pPage,pKey,nByte,nHash);
-	if( pCell == 0 ){
-		/* No such entry */
-		return VEDIS_NOTFOUND;
+	/* Bring the link */
+	pPrev = lhFindSibeling(pCell);
+	if( pPrev ){
+		pPrev->iNext = pCell->iNext;
+		/* Fix offsets in the page header */
+		SyBigEndianPack16(&pPage->pRaw->zData[pPrev->iStart + 4/*Hash*/+4/*Key*/+8/*Data*/],pCell->iNext);
+	}else{
+		/* First entry on this page (either master or slave) */
+		pPage->sHdr.iOfft = pCell->iNext;
+		/* Update the page header */
+		SyBigEndianPack16(pPage->pRaw->zData,pCell->iNext);
 	}
-	if( ppCell ){
-		*ppCell = pCell;
+	/* Restore cell space */
+	if( pCell->iOvfl == 0 ){
+		nByte += (sxu16)(pCell->nData + pCell->nKey);
 	}
+	lhRestoreSpace(pPage,pCell->iStart,nByte);
+	/* Discard the cell from the in-memory hashtable */
+	lhCellDiscard(pCell);
 	return VEDIS_OK;
 }
 /*
- * Acquire a new page either from the free list or ask the pager
- * for a new one.
+ * Remove a cell and its paylod (key + data).
  */
-static int lhAcquirePage(lhash_kv_engine *pEngine,vedis_page **ppOut)
+static int lhRecordRemove(lhcell *pCell)
 {
-	vedis_page *pPage;
+	lhash_kv_engine *pEngine = pCell->pPage->pHash;
 	int rc;
-	if( pEngine->nFreeList != 0 ){
-		/* Acquire one from the free list */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pEngine->nFreeList,&pPage);
-		if( rc == VEDIS_OK ){
-			/* Point to the next free page */
-			SyBigEndianUnpack64(pPage->zData,&pEngine->nFreeList);
-			/* Update the database header */
-			rc = pEngine->pIo->xWrite(pEngine->pHeader);
+	if( pCell->iOvfl > 0){
+		/* Discard overflow pages */
+		vedis_page *pOvfl;
+		pgno iNext = pCell->iOvfl;
+		for(;;){
+			/* Point to the overflow page */
+			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iNext,&pOvfl);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Next page on the chain */
+			SyBigEndianUnpack64(pOvfl->zData,&iNext);
+			/* Restore the page to the free list */
+			rc = lhRestorePage(pEngine,pOvfl);
 			if( rc != VEDIS_OK ){
 				return rc;
 			}
-			SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/],pEngine->nFreeList);
-			/* Tell the pager do not journal this page */
-			pEngine->pIo->xDontJournal(pPage);
-			/* Return to the caller */
-			*ppOut = pPage;
-			/* All done */
-			return VEDIS_OK;
+			/* Unref */
+			pEngine->pIo->xPageUnref(pOvfl);
+			if( iNext == 0 ){
+				break;
+			}
+		}
+	}
+	/* Unlink the cell */
+	rc = lhUnlinkCell(pCell);
+	return rc;
+}
+/*
+ * Find cell sibeling.
+ */
+static lhcell * lhFindSibeling(lhcell *pCell)
+{
+	lhpage *pPage = pCell->pPage->pMaster;
+	lhcell *pEntry;
+	pEntry = pPage->pFirst; 
+	while( pEntry ){
+		if( pEntry->pPage == pCell->pPage && pEntry->iNext == pCell->iStart ){
+			/* Sibeling found */
+			return pEntry;
+		}
+		/* Point to the previous entry */
+		pEntry = pEntry->pPrev; 
+	}
+	/* Last inserted cell */
+	return 0;
+}
+/*
+ * Move a cell to a new location with its new data.
+ */
+static int lhMoveLocalCell(
+	lhcell *pCell,
+	sxu16 iOfft,
+	const void *pData,
+	vedis_int64 nData
+	)
+{
+	sxu16 iKeyOfft = pCell->iStart + L_HASH_CELL_SZ;
+	lhpage *pPage = pCell->pPage;
+	lhcell *pSibeling;
+	pSibeling = lhFindSibeling(pCell);
+	if( pSibeling ){
+		/* Fix link */
+		SyBigEndianPack16(&pPage->pRaw->zData[pSibeling->iStart + 4/*Hash*/+4/*Key*/+8/*Data*/],pCell->iNext);
+		pSibeling->iNext = pCell->iNext;
+	}else{
+		/* First cell, update page header only */
+		SyBigEndianPack16(pPage->pRaw->zData,pCell->iNext);
+		pPage->sHdr.iOfft = pCell->iNext;
+	}
+	/* Set the new offset */
+	pCell->iStart = iOfft;
+	pCell->nData = (sxu64)nData;
+	/* Write the cell payload */
+	lhCellWriteLocalPayload(pCell,(const void *)&pPage->pRaw->zData[iKeyOfft],pCell->nKey,pData,nData);
+	/* Finally write the cell header */
+	lhCellWriteHeader(pCell);
+	/* All done */
+	return VEDIS_OK;
+}
+/*
+ * Overwrite an existing record.
+ */
+static int lhRecordOverwrite(
+	lhcell *pCell,
+	const void *pData,vedis_int64 nByte
+	)
+{
+	lhash_kv_engine *pEngine = pCell->pPage->pHash;
+	unsigned char *zRaw,*zRawEnd,*zPayload;
+	const unsigned char *zPtr,*zEnd;
+	vedis_page *pOvfl,*pOld,*pNew;
+	lhpage *pPage = pCell->pPage;
+	sxu32 nAvail;
+	pgno iOvfl;
+	int rc;
+	/* Acquire a writer lock on this page */
+	rc = pEngine->pIo->xWrite(pPage->pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( pCell->iOvfl == 0 ){
+		/* Local payload, try to deal with the free space issues */
+		zPayload = &pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey];
+		if( pCell->nData == (sxu64)nByte ){
+			/* Best scenario, simply a memcpy operation */
+			SyMemcpy(pData,(void *)zPayload,(sxu32)nByte);
+		}else if( (sxu64)nByte < pCell->nData ){
+			/* Shorter data, not so ugly */
+			SyMemcpy(pData,(void *)zPayload,(sxu32)nByte);
+			/* Update the cell header */
+			SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],nByte);
+			/* Restore freespace */
+			lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ + pCell->nKey + nByte),(sxu16)(pCell->nData - nByte));
+			/* New data size */
+			pCell->nData = (sxu64)nByte;
+		}else{
+			sxu16 iOfft = 0; /* cc warning */
+			/* Check if another chunk is available for this cell */
+			rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ + pCell->nKey + nByte,&iOfft);
+			if( rc != VEDIS_OK ){
+				/* Transfer the payload to an overflow page */
+				rc = lhCellWriteOvflPayload(pCell,&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ],pCell->nKey,pData,nByte,(const void *)0);
+				if( rc != VEDIS_OK ){
+					return rc;
+				}
+				/* Update the cell header */
+				SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],(sxu64)nByte);
+				/* Restore freespace */
+				lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ),(sxu16)(pCell->nKey + pCell->nData));
+				/* New data size */
+				pCell->nData = (sxu64)nByte;
+			}else{
+				sxu16 iOldOfft = pCell->iStart;
+				sxu32 iOld = (sxu32)pCell->nData;
+				/* Space is available, transfer the cell */
+				lhMoveLocalCell(pCell,iOfft,pData,nByte);
+				/* Restore cell space */
+				lhRestoreSpace(pPage,iOldOfft,(sxu16)(L_HASH_CELL_SZ + pCell->nKey + iOld));
+			}
 		}
+		return VEDIS_OK;
 	}
-	/* Acquire a new page */
-	rc = pEngine->pIo->xNew(pEngine->pIo->pHandle,&pPage);
+	/* Point to the overflow page */
+	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pCell->iDataPage,&pOvfl);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Point to the target page */
-	*ppOut = pPage;
-	return VEDIS_OK;
-}
-/*
- * Write a bucket map record to disk.
- */
-static int lhMapWriteRecord(lhash_kv_engine *pEngine,pgno iLogic,pgno iReal)
-{
-	lhash_bmap_page *pMap = &pEngine->sPageMap;
-	vedis_page *pPage = 0;
-	int rc;
-	if( pMap->iPtr > (pEngine->iPageSize - 16) /* 8 byte logical bucket number + 8 byte real bucket number */ ){
-		vedis_page *pOld;
-		/* Point to the old page */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pMap->iNum,&pOld);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		/* Acquire a new page */
-		rc = lhAcquirePage(pEngine,&pPage);
-		if( rc != VEDIS_OK ){
-			return rc;
+	/* Relase all old overflow pages first */
+	SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
+	pOld = pOvfl;
+	for(;;){
+		if( iOvfl == 0 ){
+			/* No more overflow pages on the chain */
+			break;
 		}
-		/* Reflect the change  */
-		pMap->iNext = 0;
-		pMap->iNum = pPage->pgno;
-		pMap->nRec = 0;
-		pMap->iPtr = 8/* Next page number */+4/* Total records in the map*/;
-		/* Link this page */
-		rc = pEngine->pIo->xWrite(pOld);
-		if( rc != VEDIS_OK ){
-			return rc;
+		/* Point to the target page */
+		if( VEDIS_OK != pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOld) ){
+			/* Not so fatal if something goes wrong here */
+			break;
 		}
-		if( pOld->pgno == pEngine->pHeader->pgno ){
-			/* First page (Hash header) */
-			SyBigEndianPack64(&pOld->zData[4/*magic*/+4/*hash*/+8/* Free page */+8/*current split bucket*/+8/*Maximum split bucket*/],pPage->pgno);
-		}else{
-			/* Link the new page */
-			SyBigEndianPack64(pOld->zData,pPage->pgno);
+		/* Next overflow page to be released */
+		SyBigEndianUnpack64(pOld->zData,&iOvfl);
+		if( pOld != pOvfl ){ /* xx: chm is maniac */
+			/* Restore the page to the free list */
+			lhRestorePage(pEngine,pOld);
 			/* Unref */
 			pEngine->pIo->xPageUnref(pOld);
 		}
-		/* Assume the last bucket map page */
-		rc = pEngine->pIo->xWrite(pPage);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		SyBigEndianPack64(pPage->zData,0); /* Next bucket map page on the list */
-	}
-	if( pPage == 0){
-		/* Point to the current map page */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pMap->iNum,&pPage);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
 	}
-	/* Make page writable */
-	rc = pEngine->pIo->xWrite(pPage);
+	/* Point to the data offset */
+	zRaw = &pOvfl->zData[pCell->iDataOfft];
+	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
+	/* The data to be stored */
+	zPtr = (const unsigned char *)pData;
+	zEnd = &zPtr[nByte];
+	/* Start the overwrite process */
+	/* Acquire a writer lock */
+	rc = pEngine->pIo->xWrite(pOvfl);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Write the data */
-	SyBigEndianPack64(&pPage->zData[pMap->iPtr],iLogic);
-	pMap->iPtr += 8;
-	SyBigEndianPack64(&pPage->zData[pMap->iPtr],iReal);
-	pMap->iPtr += 8;
-	/* Install the bucket map */
-	rc = lhMapInstallBucket(pEngine,iLogic,iReal);
-	if( rc == VEDIS_OK ){
-		/* Total number of records */
-		pMap->nRec++;
-		if( pPage->pgno == pEngine->pHeader->pgno ){
-			/* Page one: Always writable */
-			SyBigEndianPack32(
-				&pPage->zData[4/*magic*/+4/*hash*/+8/* Free page */+8/*current split bucket*/+8/*Maximum split bucket*/+8/*Next map page*/],
-				pMap->nRec);
-		}else{
-			/* Make page writable */
-			rc = pEngine->pIo->xWrite(pPage);
+	SyBigEndianPack64(pOvfl->zData,0);
+	for(;;){
+		sxu32 nLen;
+		if( zPtr >= zEnd ){
+			break;
+		}
+		if( zRaw >= zRawEnd ){
+			/* Acquire a new page */
+			rc = lhAcquirePage(pEngine,&pNew);
 			if( rc != VEDIS_OK ){
 				return rc;
 			}
-			SyBigEndianPack32(&pPage->zData[8],pMap->nRec);
+			rc = pEngine->pIo->xWrite(pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Link */
+			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
+			pEngine->pIo->xPageUnref(pOvfl);
+			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
+			pOvfl = pNew;
+			zRaw = &pNew->zData[8];
+			zRawEnd = &pNew->zData[pEngine->iPageSize];
+		}
+		nAvail = (sxu32)(zRawEnd-zRaw);
+		nLen = (sxu32)(zEnd-zPtr);
+		if( nLen > nAvail ){
+			nLen = nAvail;
 		}
+		SyMemcpy((const void *)zPtr,(void *)zRaw,nLen);
+		/* Synchronize pointers */
+		zPtr += nLen;
+		zRaw += nLen;
 	}
-	return rc;
+	/* Unref the last overflow page */
+	pEngine->pIo->xPageUnref(pOvfl);
+	/* Finally, update the cell header */
+	pCell->nData = (sxu64)nByte;
+	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData);
+	/* All done */
+	return VEDIS_OK;
 }
 /*
- * Defragment a page.
+ * Append data to an existing record.
  */
-static int lhPageDefragment(lhpage *pPage)
+static int lhRecordAppend(
+	lhcell *pCell,
+	const void *pData,vedis_int64 nByte
+	)
 {
-	lhash_kv_engine *pEngine = pPage->pHash;
-	unsigned char *zTmp,*zPtr,*zEnd,*zPayload;
-	lhcell *pCell;
-	/* Get a temporary page from the pager. This opertaion never fail */
-	zTmp = pEngine->pIo->xTmpPage(pEngine->pIo->pHandle);
-	/* Move the target cells to the beginning */
-	pCell = pPage->pMaster->pList;
-	/* Write the slave page number */
-	SyBigEndianPack64(&zTmp[2/*Offset of the first cell */+2/*Offset of the first free block */],pPage->sHdr.iSlave);
-	zPtr = &zTmp[L_HASH_PAGE_HDR_SZ]; /* Offset to start writing from */
-	zEnd = &zTmp[pEngine->iPageSize];
-	pPage->sHdr.iOfft = 0; /* Offset of the first cell */
-	for(;;){
-		if( pCell == 0 ){
-			/* No more cells */
-			break;
-		}
-		if( pCell->pPage->pRaw->pgno == pPage->pRaw->pgno ){
-			/* Cell payload if locally stored */
-			zPayload = 0;
-			if( pCell->iOvfl == 0 ){
-				zPayload = &pCell->pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ];
+	lhash_kv_engine *pEngine = pCell->pPage->pHash;
+	const unsigned char *zPtr,*zEnd;
+	lhpage *pPage = pCell->pPage;
+	unsigned char *zRaw,*zRawEnd;
+	vedis_page *pOvfl,*pNew;
+	sxu64 nDatalen;
+	sxu32 nAvail;
+	pgno iOvfl;
+	int rc;
+	if( pCell->nData + nByte < pCell->nData ){
+		/* Overflow */
+		pEngine->pIo->xErr(pEngine->pIo->pHandle,"Append operation will cause data overflow");
+		return VEDIS_LIMIT;
+	}
+	/* Acquire a writer lock on this page */
+	rc = pEngine->pIo->xWrite(pPage->pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( pCell->iOvfl == 0 ){
+		sxu16 iOfft = 0; /* cc warning */
+		/* Local payload, check for a bigger place */
+		rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ + pCell->nKey + pCell->nData + nByte,&iOfft);
+		if( rc != VEDIS_OK ){
+			/* Transfer the payload to an overflow page */
+			rc = lhCellWriteOvflPayload(pCell,
+				&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ],pCell->nKey,
+				(const void *)&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey],pCell->nData,
+				pData,nByte,
+				(const void *)0
+				);
+			if( rc != VEDIS_OK ){
+				return rc;
 			}
-			/* Move the cell */
-			pCell->iNext = pPage->sHdr.iOfft;
-			pCell->iStart = (sxu16)(zPtr - zTmp); /* Offset where this cell start */
-			pPage->sHdr.iOfft = pCell->iStart;
-			/* Write the cell header */
-			/* 4 byte hash number */
-			SyBigEndianPack32(zPtr,pCell->nHash);
-			zPtr += 4;
-			/* 4 byte ley length */
-			SyBigEndianPack32(zPtr,pCell->nKey);
-			zPtr += 4;
-			/* 8 byte data length */
-			SyBigEndianPack64(zPtr,pCell->nData);
-			zPtr += 8;
-			/* 2 byte offset of the next cell */
-			SyBigEndianPack16(zPtr,pCell->iNext);
-			zPtr += 2;
-			/* 8 byte overflow page number */
-			SyBigEndianPack64(zPtr,pCell->iOvfl);
-			zPtr += 8;
-			if( zPayload ){
-				/* Local payload */
-				SyMemcpy((const void *)zPayload,zPtr,(sxu32)(pCell->nKey + pCell->nData));
-				zPtr += pCell->nKey + pCell->nData;
+			/* Update the cell header */
+			SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData + nByte);
+			/* Restore freespace */
+			lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ),(sxu16)(pCell->nKey + pCell->nData));
+			/* New data size */
+			pCell->nData += nByte;
+		}else{
+			sxu16 iOldOfft = pCell->iStart;
+			sxu32 iOld = (sxu32)pCell->nData;
+			SyBlob sWorker;
+			SyBlobInit(&sWorker,&pEngine->sAllocator);
+			/* Copy the old data */
+			rc = SyBlobAppend(&sWorker,(const void *)&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey],(sxu32)pCell->nData);
+			if( rc == SXRET_OK ){
+				/* Append the new data */
+				rc = SyBlobAppend(&sWorker,pData,(sxu32)nByte);
 			}
-			if( zPtr >= zEnd ){
-				/* Can't happen */
-				break;
+			if( rc != VEDIS_OK ){
+				SyBlobRelease(&sWorker);
+				return rc;
 			}
+			/* Space is available, transfer the cell */
+			lhMoveLocalCell(pCell,iOfft,SyBlobData(&sWorker),(vedis_int64)SyBlobLength(&sWorker));
+			/* Restore cell space */
+			lhRestoreSpace(pPage,iOldOfft,(sxu16)(L_HASH_CELL_SZ + pCell->nKey + iOld));
+			/* All done */
+			SyBlobRelease(&sWorker);
 		}
-		/* Point to the next page */
-		pCell = pCell->pNext;
-	}
-	/* Mark the free block */
-	pPage->nFree = (sxu16)(zEnd - zPtr); /* Block length */
-	if( pPage->nFree > 3 ){
-		pPage->sHdr.iFree = (sxu16)(zPtr - zTmp); /* Offset of the free block */
-		/* Mark the block */
-		SyBigEndianPack16(zPtr,0); /* Offset of the next free block */
-		SyBigEndianPack16(&zPtr[2],pPage->nFree); /* Block length */
-	}else{
-		/* Block of length less than 4 bytes are simply discarded */
-		pPage->nFree = 0;
-		pPage->sHdr.iFree = 0;
-	}
-	/* Reflect the change */
-	SyBigEndianPack16(zTmp,pPage->sHdr.iOfft);     /* Offset of the first cell */
-	SyBigEndianPack16(&zTmp[2],pPage->sHdr.iFree); /* Offset of the first free block */
-	SyMemcpy((const void *)zTmp,pPage->pRaw->zData,pEngine->iPageSize);
-	/* All done */
-	return VEDIS_OK;
-}
-/*
-** Allocate nByte bytes of space on a page.
-**
-** Return the index into pPage->pRaw->zData[] of the first byte of
-** the new allocation. Or return 0 if there is not enough free
-** space on the page to satisfy the allocation request.
-**
-** If the page contains nBytes of free space but does not contain
-** nBytes of contiguous free space, then this routine automatically
-** calls defragementPage() to consolidate all free space before 
-** allocating the new chunk.
-*/
-static int lhAllocateSpace(lhpage *pPage,sxu64 nAmount,sxu16 *pOfft)
-{
-	const unsigned char *zEnd,*zPtr;
-	sxu16 iNext,iBlksz,nByte;
-	unsigned char *zPrev;
-	int rc;
-	if( (sxu64)pPage->nFree < nAmount ){
-		/* Don't bother looking for a free chunk */
-		return VEDIS_FULL;
+		return VEDIS_OK;
 	}
-	if( pPage->nCell < 10 && ((int)nAmount >= (pPage->pHash->iPageSize / 2)) ){
-		/* Big chunk need an overflow page for its data */
-		return VEDIS_FULL;
+	/* Point to the overflow page which hold the data */
+	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pCell->iDataPage,&pOvfl);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	zPtr = &pPage->pRaw->zData[pPage->sHdr.iFree];
-	zEnd = &pPage->pRaw->zData[pPage->pHash->iPageSize];
-	nByte = (sxu16)nAmount;
-	zPrev = 0;
-	iBlksz = 0; /* cc warning */
-	/* Perform the lookup */
+	/* Next overflow page in the chain */
+	SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
+	/* Point to the end of the chunk */
+	zRaw = &pOvfl->zData[pCell->iDataOfft];
+	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
+	nDatalen = pCell->nData;
+	nAvail = (sxu32)(zRawEnd - zRaw);
 	for(;;){
-		if( zPtr >= zEnd ){
-			return VEDIS_FULL;
+		if( zRaw >= zRawEnd ){
+			if( iOvfl == 0 ){
+				/* Cant happen */
+				pEngine->pIo->xErr(pEngine->pIo->pHandle,"Corrupt overflow page");
+				return VEDIS_CORRUPT;
+			}
+			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Next overflow page on the chain */
+			SyBigEndianUnpack64(pNew->zData,&iOvfl);
+			/* Unref the previous overflow page */
+			pEngine->pIo->xPageUnref(pOvfl);
+			/* Point to the new chunk */
+			zRaw = &pNew->zData[8];
+			zRawEnd = &pNew->zData[pCell->pPage->pHash->iPageSize];
+			nAvail = L_HASH_OVERFLOW_SIZE(pCell->pPage->pHash->iPageSize);
+			pOvfl = pNew;
 		}
-		/* Offset of the next free block */
-		SyBigEndianUnpack16(zPtr,&iNext);
-		/* Block size */
-		SyBigEndianUnpack16(&zPtr[2],&iBlksz);
-		if( iBlksz >= nByte ){
-			/* Got one */
+		if( (sxu64)nAvail > nDatalen ){
+			zRaw += nDatalen;
 			break;
+		}else{
+			nDatalen -= nAvail;
 		}
-		zPrev = (unsigned char *)zPtr;
-		if( iNext == 0 ){
-			/* No more free blocks, defragment the page */
-			rc = lhPageDefragment(pPage);
-			if( rc == VEDIS_OK && pPage->nFree >= nByte) {
-				/* Free blocks are merged together */
-				iNext = 0;
-				zPtr = &pPage->pRaw->zData[pPage->sHdr.iFree];
-				iBlksz = pPage->nFree;
-				zPrev = 0;
-				break;
-			}else{
-				return VEDIS_FULL;
-			}
-		}
-		/* Point to the next free block */
-		zPtr = &pPage->pRaw->zData[iNext];
+		zRaw += nAvail;
 	}
-	/* Acquire writer lock on this page */
-	rc = pPage->pHash->pIo->xWrite(pPage->pRaw);
+	/* Start the append process */
+	zPtr = (const unsigned char *)pData;
+	zEnd = &zPtr[nByte];
+	/* Acquire a writer lock */
+	rc = pEngine->pIo->xWrite(pOvfl);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Save block offset */
-	*pOfft = (sxu16)(zPtr - pPage->pRaw->zData);
-	/* Fix pointers */
-	if( iBlksz >= nByte && (iBlksz - nByte) > 3 ){
-		unsigned char *zBlock = &pPage->pRaw->zData[(*pOfft) + nByte];
-		/* Create a new block */
-		zPtr = zBlock;
-		SyBigEndianPack16(zBlock,iNext); /* Offset of the next block */
-		SyBigEndianPack16(&zBlock[2],iBlksz-nByte); /* Block size*/
-		/* Offset of the new block */
-		iNext = (sxu16)(zPtr - pPage->pRaw->zData);
-		iBlksz = nByte;
-	}
-	/* Fix offsets */
-	if( zPrev ){
-		SyBigEndianPack16(zPrev,iNext);
-	}else{
-		/* First block */
-		pPage->sHdr.iFree = iNext;
-		/* Reflect on the page header */
-		SyBigEndianPack16(&pPage->pRaw->zData[2/* Offset of the first cell1*/],iNext);
+	for(;;){
+		sxu32 nLen;
+		if( zPtr >= zEnd ){
+			break;
+		}
+		if( zRaw >= zRawEnd ){
+			/* Acquire a new page */
+			rc = lhAcquirePage(pEngine,&pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			rc = pEngine->pIo->xWrite(pNew);
+			if( rc != VEDIS_OK ){
+				return rc;
+			}
+			/* Link */
+			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
+			pEngine->pIo->xPageUnref(pOvfl);
+			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
+			pOvfl = pNew;
+			zRaw = &pNew->zData[8];
+			zRawEnd = &pNew->zData[pEngine->iPageSize];
+		}
+		nAvail = (sxu32)(zRawEnd-zRaw);
+		nLen = (sxu32)(zEnd-zPtr);
+		if( nLen > nAvail ){
+			nLen = nAvail;
+		}
+		SyMemcpy((const void *)zPtr,(void *)zRaw,nLen);
+		/* Synchronize pointers */
+		zPtr += nLen;
+		zRaw += nLen;
 	}
+	/* Unref the last overflow page */
+	pEngine->pIo->xPageUnref(pOvfl);
+	/* Finally, update the cell header */
+	pCell->nData += nByte;
+	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData);
 	/* All done */
-	pPage->nFree -= iBlksz;
 	return VEDIS_OK;
 }
 /*
- * Write the cell header into the corresponding offset.
+ * A write privilege have been acquired on this page.
+ * Mark it as an empty page (No cells).
  */
-static int lhCellWriteHeader(lhcell *pCell)
+static int lhSetEmptyPage(lhpage *pPage)
 {
-	lhpage *pPage = pCell->pPage;
 	unsigned char *zRaw = pPage->pRaw->zData;
-	/* Seek to the desired location */
-	zRaw += pCell->iStart;
-	/* 4 byte hash number */
-	SyBigEndianPack32(zRaw,pCell->nHash);
-	zRaw += 4;
-	/* 4 byte key length */
-	SyBigEndianPack32(zRaw,pCell->nKey);
-	zRaw += 4;
-	/* 8 byte data length */
-	SyBigEndianPack64(zRaw,pCell->nData);
+	lhphdr *pHeader = &pPage->sHdr;
+	sxu16 nByte;
+	int rc;
+	/* Acquire a writer lock */
+	rc = pPage->pHash->pIo->xWrite(pPage->pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Offset of the first cell */
+	SyBigEndianPack16(zRaw,0);
+	zRaw += 2;
+	/* Offset of the first free block */
+	pHeader->iFree = L_HASH_PAGE_HDR_SZ;
+	SyBigEndianPack16(zRaw,L_HASH_PAGE_HDR_SZ);
+	zRaw += 2;
+	/* Slave page number */
+	SyBigEndianPack64(zRaw,0);
 	zRaw += 8;
-	/* 2 byte offset of the next cell */
-	pCell->iNext = pPage->sHdr.iOfft;
-	SyBigEndianPack16(zRaw,pCell->iNext);
+	/* Fill the free block */
+	SyBigEndianPack16(zRaw,0); /* Offset of the next free block */
 	zRaw += 2;
-	/* 8 byte overflow page number */
-	SyBigEndianPack64(zRaw,pCell->iOvfl);
-	/* Update the page header */
-	pPage->sHdr.iOfft = pCell->iStart;
-	/* pEngine->pIo->xWrite() has been successfully called on this page */
-	SyBigEndianPack16(pPage->pRaw->zData,pCell->iStart);
-	/* All done */
-	return VEDIS_OK;
-}
-/*
- * Write local payload.
- */
-static int lhCellWriteLocalPayload(lhcell *pCell,
-	const void *pKey,sxu32 nKeylen,
-	const void *pData,vedis_int64 nDatalen
-	)
-{
-	/* A writer lock have been acquired on this page */
-	lhpage *pPage = pCell->pPage;
-	unsigned char *zRaw = pPage->pRaw->zData;
-	/* Seek to the desired location */
-	zRaw += pCell->iStart + L_HASH_CELL_SZ;
-	/* Write the key */
-	SyMemcpy(pKey,(void *)zRaw,nKeylen);
-	zRaw += nKeylen;
-	if( nDatalen > 0 ){
-		/* Write the Data */
-		SyMemcpy(pData,(void *)zRaw,(sxu32)nDatalen);
-	}
+	nByte = (sxu16)L_HASH_MX_FREE_SPACE(pPage->pHash->iPageSize);
+	SyBigEndianPack16(zRaw,nByte);
+	pPage->nFree = nByte;
+	/* Do not add this page to the hot dirty list */
+	pPage->pHash->pIo->xDontMkHot(pPage->pRaw);
 	return VEDIS_OK;
 }
+/* Forward declaration */
+static int lhSlaveStore(
+	lhpage *pPage,
+	const void *pKey,sxu32 nKeyLen,
+	const void *pData,vedis_int64 nDataLen,
+	sxu32 nHash
+	);
 /*
- * Allocate as much overflow page we need to store the cell payload.
+ * Store a cell and its payload in a given page.
  */
-static int lhCellWriteOvflPayload(lhcell *pCell,const void *pKey,sxu32 nKeylen,...)
+static int lhStoreCell(
+	lhpage *pPage, /* Target page */
+	const void *pKey,sxu32 nKeyLen, /* Payload: Key */
+	const void *pData,vedis_int64 nDataLen, /* Payload: Data */
+	sxu32 nHash, /* Hash of the key */
+	int auto_append /* Auto append a slave page if full */
+	)
 {
-	lhpage *pPage = pCell->pPage;
 	lhash_kv_engine *pEngine = pPage->pHash;
-	vedis_page *pOvfl,*pFirst,*pNew;
-	const unsigned char *zPtr,*zEnd;
-	unsigned char *zRaw,*zRawEnd;
-	sxu32 nAvail;
-	va_list ap;
+	int iNeedOvfl = 0; /* Need overflow page for this cell and its payload*/
+	lhcell *pCell;
+	sxu16 nOfft;
 	int rc;
-	/* Acquire a new overflow page */
-	rc = lhAcquirePage(pEngine,&pOvfl);
+	/* Acquire a writer lock on this page first */
+	rc = pEngine->pIo->xWrite(pPage->pRaw);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Acquire a writer lock */
-	rc = pEngine->pIo->xWrite(pOvfl);
+	/* Check for a free block  */
+	rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ+nKeyLen+nDataLen,&nOfft);
 	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	pFirst = pOvfl;
-	/* Link */
-	pCell->iOvfl = pOvfl->pgno;
-	/* Update the cell header */
-	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4/*Hash*/ + 4/*Key*/ + 8/*Data*/ + 2 /*Next cell*/],pCell->iOvfl);
-	/* Start the write process */
-	zPtr = (const unsigned char *)pKey;
-	zEnd = &zPtr[nKeylen];
-	SyBigEndianPack64(pOvfl->zData,0); /* Next overflow page on the chain */
-	zRaw = &pOvfl->zData[8/* Next ovfl page*/ + 8 /* Data page */ + 2 /* Data offset*/];
-	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
-	pNew = pOvfl;
-	/* Write the key */
-	for(;;){
-		if( zPtr >= zEnd ){
-			break;
-		}
-		if( zRaw >= zRawEnd ){
-			/* Acquire a new page */
-			rc = lhAcquirePage(pEngine,&pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			rc = pEngine->pIo->xWrite(pNew);
-			if( rc != VEDIS_OK ){
+		/* Check for a free block to hold a single cell only (without payload) */
+		rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ,&nOfft);
+		if( rc != VEDIS_OK ){
+			if( !auto_append ){
+				/* A split must be done */
+				return VEDIS_FULL;
+			}else{
+				/* Store this record in a slave page */
+				rc = lhSlaveStore(pPage,pKey,nKeyLen,pData,nDataLen,nHash);
 				return rc;
 			}
-			/* Link */
-			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
-			pEngine->pIo->xPageUnref(pOvfl);
-			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
-			pOvfl = pNew;
-			zRaw = &pNew->zData[8];
-			zRawEnd = &pNew->zData[pEngine->iPageSize];
 		}
-		nAvail = (sxu32)(zRawEnd-zRaw);
-		nKeylen = (sxu32)(zEnd-zPtr);
-		if( nKeylen > nAvail ){
-			nKeylen = nAvail;
+		iNeedOvfl = 1;
+	}
+	/* Allocate a new cell instance */
+	pCell = lhNewCell(pEngine,pPage);
+	if( pCell == 0 ){
+		pEngine->pIo->xErr(pEngine->pIo->pHandle,"KV store is running out of memory");
+		return VEDIS_NOMEM;
+	}
+	/* Fill-in the structure */
+	pCell->iStart = nOfft;
+	pCell->nKey = nKeyLen;
+	pCell->nData = (sxu64)nDataLen;
+	pCell->nHash = nHash;
+	if( nKeyLen < 262144 /* 256 KB */ ){
+		/* Keep the key in-memory for fast lookup */
+		SyBlobAppend(&pCell->sKey,pKey,nKeyLen);
+	}
+	/* Link the cell */
+	rc = lhInstallCell(pCell);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Write the payload */
+	if( iNeedOvfl ){
+		rc = lhCellWriteOvflPayload(pCell,pKey,nKeyLen,pData,nDataLen,(const void *)0);
+		if( rc != VEDIS_OK ){
+			lhCellDiscard(pCell);
+			return rc;
 		}
-		SyMemcpy((const void *)zPtr,(void *)zRaw,nKeylen);
-		/* Synchronize pointers */
-		zPtr += nKeylen;
-		zRaw += nKeylen;
+	}else{
+		lhCellWriteLocalPayload(pCell,pKey,nKeyLen,pData,nDataLen);
 	}
-	rc = VEDIS_OK;
-	va_start(ap,nKeylen);
-	pCell->iDataPage = pNew->pgno;
-	pCell->iDataOfft = (sxu16)(zRaw-pNew->zData);
-	/* Write the data page and its offset */
-	SyBigEndianPack64(&pFirst->zData[8/*Next ovfl*/],pCell->iDataPage);
-	SyBigEndianPack16(&pFirst->zData[8/*Next ovfl*/+8/*Data page*/],pCell->iDataOfft);
-	/* Write data */
-	for(;;){
-		const void *pData;
-		sxu32 nDatalen;
-		sxu64 nData;
-		pData = va_arg(ap,const void *);
-		nData = va_arg(ap,sxu64);
-		if( pData == 0 ){
-			/* No more chunks */
-			break;
+	/* Finally, Write the cell header */
+	lhCellWriteHeader(pCell);
+	/* All done */
+	return VEDIS_OK;
+}
+/*
+ * Find a slave page capable of hosting the given amount.
+ */
+static int lhFindSlavePage(lhpage *pPage,sxu64 nAmount,sxu16 *pOfft,lhpage **ppSlave)
+{
+	lhash_kv_engine *pEngine = pPage->pHash;
+	lhpage *pMaster = pPage->pMaster;
+	lhpage *pSlave = pMaster->pSlave;
+	vedis_page *pRaw;
+	lhpage *pNew;
+	sxu16 iOfft;
+	sxi32 i;
+	int rc;
+	/* Look for an already attached slave page */
+	for( i = 0 ; i < pMaster->iSlave ; ++i ){
+		/* Find a free chunk big enough */
+		sxu16 size = L_HASH_CELL_SZ + nAmount;
+		rc = lhAllocateSpace(pSlave,size,&iOfft);
+		if( rc != VEDIS_OK ){
+			/* A space for cell header only */
+			size = L_HASH_CELL_SZ;
+			rc = lhAllocateSpace(pSlave,size,&iOfft);
 		}
-		/* Write this chunk */
-		zPtr = (const unsigned char *)pData;
-		zEnd = &zPtr[nData];
-		for(;;){
-			if( zPtr >= zEnd ){
-				break;
-			}
-			if( zRaw >= zRawEnd ){
-				/* Acquire a new page */
-				rc = lhAcquirePage(pEngine,&pNew);
-				if( rc != VEDIS_OK ){
-					va_end(ap);
-					return rc;
-				}
-				rc = pEngine->pIo->xWrite(pNew);
-				if( rc != VEDIS_OK ){
-					va_end(ap);
-					return rc;
-				}
-				/* Link */
-				SyBigEndianPack64(pOvfl->zData,pNew->pgno);
-				pEngine->pIo->xPageUnref(pOvfl);
-				SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
-				pOvfl = pNew;
-				zRaw = &pNew->zData[8];
-				zRawEnd = &pNew->zData[pEngine->iPageSize];
-			}
-			nAvail = (sxu32)(zRawEnd-zRaw);
-			nDatalen = (sxu32)(zEnd-zPtr);
-			if( nDatalen > nAvail ){
-				nDatalen = nAvail;
+		if( rc == VEDIS_OK ){
+			/* All done */
+			if( pOfft ){
+				*pOfft = iOfft;
+			}else{
+				rc = lhRestoreSpace(pSlave, iOfft, size);
 			}
-			SyMemcpy((const void *)zPtr,(void *)zRaw,nDatalen);
-			/* Synchronize pointers */
-			zPtr += nDatalen;
-			zRaw += nDatalen;
+			*ppSlave = pSlave;
+			return rc;
 		}
+		/* Point to the next slave page */
+		pSlave = pSlave->pNextSlave;
+	}
+	/* Acquire a new slave page */
+	rc = lhAcquirePage(pEngine,&pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	/* Last slave page */
+	pSlave = pMaster->pSlave;
+	if( pSlave == 0 ){
+		/* First slave page */
+		pSlave = pMaster;
+	}
+	/* Initialize the page */
+	pNew = lhNewPage(pEngine,pRaw,pMaster);
+	if( pNew == 0 ){
+		return VEDIS_NOMEM;
+	}
+	/* Mark as an empty page */
+	rc = lhSetEmptyPage(pNew);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	if( pOfft ){
+		/* Look for a free block */
+		if( VEDIS_OK != lhAllocateSpace(pNew,L_HASH_CELL_SZ+nAmount,&iOfft) ){
+			/* Cell header only */
+			lhAllocateSpace(pNew,L_HASH_CELL_SZ,&iOfft); /* Never fail */
+		}	
+		*pOfft = iOfft;
+	}
+	/* Link this page to the previous slave page */
+	rc = pEngine->pIo->xWrite(pSlave->pRaw);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	/* Reflect in the page header */
+	SyBigEndianPack64(&pSlave->pRaw->zData[2/*Cell offset*/+2/*Free block offset*/],pRaw->pgno);
+	pSlave->sHdr.iSlave = pRaw->pgno;
+	/* All done */
+	*ppSlave = pNew;
+	return VEDIS_OK;
+fail:
+	pEngine->pIo->xPageUnref(pNew->pRaw); /* pNew will be released in this call */
+	return rc;
+
+}
+/*
+ * Perform a store operation in a slave page.
+ */
+static int lhSlaveStore(
+	lhpage *pPage, /* Master page */
+	const void *pKey,sxu32 nKeyLen, /* Payload: key */
+	const void *pData,vedis_int64 nDataLen, /* Payload: data */
+	sxu32 nHash /* Hash of the key */
+	)
+{
+	lhpage *pSlave;
+	int rc;
+	/* Find a slave page */
+	rc = lhFindSlavePage(pPage,nKeyLen + nDataLen,0,&pSlave);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* Unref the overflow page */
-	pEngine->pIo->xPageUnref(pOvfl);
-	va_end(ap);
-	return VEDIS_OK;
+	/* Perform the insertion in the slave page */
+	rc = lhStoreCell(pSlave,pKey,nKeyLen,pData,nDataLen,nHash,1);
+	return rc;
 }
 /*
- * Restore a page to the free list.
+ * Transfer a cell to a new page (either a master or slave).
  */
-static int lhRestorePage(lhash_kv_engine *pEngine,vedis_page *pPage)
+static int lhTransferCell(lhcell *pTarget,lhpage *pPage)
 {
+	lhcell *pCell;
+	sxu16 nOfft;
 	int rc;
-	rc = pEngine->pIo->xWrite(pEngine->pHeader);
+	/* Check for a free block to hold a single cell only */
+	rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ,&nOfft);
 	if( rc != VEDIS_OK ){
-		return rc;
+		/* Store in a slave page */
+		rc = lhFindSlavePage(pPage,L_HASH_CELL_SZ,&nOfft,&pPage);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
 	}
-	rc = pEngine->pIo->xWrite(pPage);
+	/* Allocate a new cell instance */
+	pCell = lhNewCell(pPage->pHash,pPage);
+	if( pCell == 0 ){
+		return VEDIS_NOMEM;
+	}
+	/* Fill-in the structure */
+	pCell->iStart = nOfft;
+	pCell->nData  = pTarget->nData;
+	pCell->nKey   = pTarget->nKey;
+	pCell->iOvfl  = pTarget->iOvfl;
+	pCell->iDataOfft = pTarget->iDataOfft;
+	pCell->iDataPage = pTarget->iDataPage;
+	pCell->nHash = pTarget->nHash;
+	SyBlobDup(&pTarget->sKey,&pCell->sKey);
+	/* Link the cell */
+	rc = lhInstallCell(pCell);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Link to the list of free page */
-	SyBigEndianPack64(pPage->zData,pEngine->nFreeList);
-	pEngine->nFreeList = pPage->pgno;
-	SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/],pEngine->nFreeList);
+	/* Finally, Write the cell header */
+	lhCellWriteHeader(pCell);
 	/* All done */
 	return VEDIS_OK;
 }
 /*
- * Restore cell space and mark it as a free block.
+ * Perform a page split.
  */
-static int lhRestoreSpace(lhpage *pPage,sxu16 iOfft,sxu16 nByte)
+static int lhPageSplit(
+	lhpage *pOld,      /* Page to be split */
+	lhpage *pNew,      /* New page */
+	pgno split_bucket, /* Current split bucket */
+	pgno high_mask     /* High mask (Max split bucket - 1) */
+	)
 {
-	unsigned char *zRaw;
-	if( nByte < 4 ){
-		/* At least 4 bytes of freespace must form a valid block */
-		return VEDIS_OK;
+	lhcell *pCell,*pNext;
+	SyBlob sWorker;
+	pgno iBucket;
+	int rc; 
+	SyBlobInit(&sWorker,&pOld->pHash->sAllocator);
+	/* Perform the split */
+	pCell = pOld->pList;
+	for( ;; ){
+		if( pCell == 0 ){
+			/* No more cells */
+			break;
+		}
+		/* Obtain the new logical bucket */
+		iBucket = pCell->nHash & high_mask;
+		pNext =  pCell->pNext;
+		if( iBucket != split_bucket){
+			rc = VEDIS_OK;
+			if( pCell->iOvfl ){
+				/* Transfer the cell only */
+				rc = lhTransferCell(pCell,pNew);
+			}else{
+				/* Transfer the cell and its payload */
+				SyBlobReset(&sWorker);
+				if( SyBlobLength(&pCell->sKey) < 1 ){
+					/* Consume the key */
+					rc = lhConsumeCellkey(pCell,vedisDataConsumer,&pCell->sKey,0);
+					if( rc != VEDIS_OK ){
+						goto fail;
+					}
+				}
+				/* Consume the data (Very small data < 65k) */
+				rc = lhConsumeCellData(pCell,vedisDataConsumer,&sWorker);
+				if( rc != VEDIS_OK ){
+					goto fail;
+				}
+				/* Perform the transfer */
+				rc = lhStoreCell(
+					pNew,
+					SyBlobData(&pCell->sKey),(int)SyBlobLength(&pCell->sKey),
+					SyBlobData(&sWorker),SyBlobLength(&sWorker),
+					pCell->nHash,
+					1
+					);
+			}
+			if( rc != VEDIS_OK ){
+				goto fail;
+			}
+			/* Discard the cell from the old page */
+			lhUnlinkCell(pCell);
+		}
+		/* Point to the next cell */
+		pCell = pNext;
 	}
-	/* pEngine->pIo->xWrite() has been successfully called on this page */
-	zRaw = &pPage->pRaw->zData[iOfft];
-	/* Mark as a free block */
-	SyBigEndianPack16(zRaw,pPage->sHdr.iFree); /* Offset of the next free block */
-	zRaw += 2;
-	SyBigEndianPack16(zRaw,nByte);
-	/* Link */
-	SyBigEndianPack16(&pPage->pRaw->zData[2/* offset of the first cell */],iOfft);
-	pPage->sHdr.iFree = iOfft;
-	pPage->nFree += nByte;
-	return VEDIS_OK;
+	/* All done */
+	rc = VEDIS_OK;
+fail:
+	SyBlobRelease(&sWorker);
+	return rc;
 }
-/* Forward declaration */
-static lhcell * lhFindSibeling(lhcell *pCell);
 /*
- * Unlink a cell.
+ * Perform the infamous linear hash split operation.
  */
-static int lhUnlinkCell(lhcell *pCell)
+static int lhSplit(lhpage *pTarget,int *pRetry)
 {
-	lhash_kv_engine *pEngine = pCell->pPage->pHash;
-	lhpage *pPage = pCell->pPage;
-	sxu16 nByte = L_HASH_CELL_SZ;
-	lhcell *pPrev;
+	lhash_kv_engine *pEngine = pTarget->pHash;
+	lhash_bmap_rec *pRec;
+	lhpage *pOld,*pNew;
+	vedis_page *pRaw;
 	int rc;
-	rc = pEngine->pIo->xWrite(pPage->pRaw);
+	/* Get the real page number of the bucket to split */
+	pRec = lhMapFindBucket(pEngine,pEngine->split_bucket);
+	if( pRec == 0 ){
+		/* Can't happen */
+		return VEDIS_CORRUPT;
+	}
+	/* Load the page to be split */
+	rc = lhLoadPage(pEngine,pRec->iReal,0,&pOld,0);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	/* Bring the link */
-	pPrev = lhFindSibeling(pCell);
-	if( pPrev ){
-		pPrev->iNext = pCell->iNext;
-		/* Fix offsets in the page header */
-		SyBigEndianPack16(&pPage->pRaw->zData[pPrev->iStart + 4/*Hash*/+4/*Key*/+8/*Data*/],pCell->iNext);
-	}else{
-		/* First entry on this page (either master or slave) */
-		pPage->sHdr.iOfft = pCell->iNext;
-		/* Update the page header */
-		SyBigEndianPack16(pPage->pRaw->zData,pCell->iNext);
+	/* Request a new page */
+	rc = lhAcquirePage(pEngine,&pRaw);
+	if( rc != VEDIS_OK ){
+		return rc;
 	}
-	/* Restore cell space */
-	if( pCell->iOvfl == 0 ){
-		nByte += (sxu16)(pCell->nData + pCell->nKey);
+	/* Initialize the page */
+	pNew = lhNewPage(pEngine,pRaw,0);
+	if( pNew == 0 ){
+		return VEDIS_NOMEM;
 	}
-	lhRestoreSpace(pPage,pCell->iStart,nByte);
-	/* Discard the cell from the in-memory hashtable */
-	lhCellDiscard(pCell);
-	return VEDIS_OK;
-}
-/*
- * Remove a cell and its paylod (key + data).
- */
-static int lhRecordRemove(lhcell *pCell)
-{
-	lhash_kv_engine *pEngine = pCell->pPage->pHash;
-	int rc;
-	if( pCell->iOvfl > 0){
-		/* Discard overflow pages */
-		vedis_page *pOvfl;
-		pgno iNext = pCell->iOvfl;
-		for(;;){
-			/* Point to the overflow page */
-			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iNext,&pOvfl);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Next page on the chain */
-			SyBigEndianUnpack64(pOvfl->zData,&iNext);
-			/* Restore the page to the free list */
-			rc = lhRestorePage(pEngine,pOvfl);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Unref */
-			pEngine->pIo->xPageUnref(pOvfl);
-			if( iNext == 0 ){
-				break;
-			}
+	/* Mark as an empty page */
+	rc = lhSetEmptyPage(pNew);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	/* Install and write the logical map record */
+	rc = lhMapWriteRecord(pEngine,
+		pEngine->split_bucket + pEngine->max_split_bucket,
+		pRaw->pgno
+		);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	if( pTarget->pRaw->pgno == pOld->pRaw->pgno ){
+		*pRetry = 1;
+	}
+	/* Perform the split */
+	rc = lhPageSplit(pOld,pNew,pEngine->split_bucket,pEngine->nmax_split_nucket - 1);
+	if( rc != VEDIS_OK ){
+		goto fail;
+	}
+	/* Update the database header */
+	pEngine->split_bucket++;
+	/* Acquire a writer lock on the first page */
+	rc = pEngine->pIo->xWrite(pEngine->pHeader);
+	if( rc != VEDIS_OK ){
+		return rc;
+	}
+	if( pEngine->split_bucket >= pEngine->max_split_bucket ){
+		/* Increment the generation number */
+		pEngine->split_bucket = 0;
+		pEngine->max_split_bucket = pEngine->nmax_split_nucket;
+		pEngine->nmax_split_nucket <<= 1;
+		if( !pEngine->nmax_split_nucket ){
+			/* If this happen to your installation, please tell us <chm@symisc.net> */
+			pEngine->pIo->xErr(pEngine->pIo->pHandle,"Database page (64-bit integer) limit reached");
+			return VEDIS_LIMIT;
 		}
+		/* Reflect in the page header */
+		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/],pEngine->split_bucket);
+		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/+8/*Split bucket*/],pEngine->max_split_bucket);
+	}else{
+		/* Modify only the split bucket */
+		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/],pEngine->split_bucket);
 	}
-	/* Unlink the cell */
-	rc = lhUnlinkCell(pCell);
+	/* All done */
+	return VEDIS_OK;
+fail:
+	pEngine->pIo->xPageUnref(pNew->pRaw);
 	return rc;
 }
 /*
- * Find cell sibeling.
+ * Store a record in the target page.
  */
-static lhcell * lhFindSibeling(lhcell *pCell)
+static int lhRecordInstall(
+	  lhpage *pPage, /* Target page */
+	  sxu32 nHash,   /* Hash of the key */
+	  const void *pKey,sxu32 nKeyLen,          /* Payload: Key */
+	  const void *pData,vedis_int64 nDataLen /* Payload: Data */
+	  )
 {
-	lhpage *pPage = pCell->pPage->pMaster;
-	lhcell *pEntry;
-	pEntry = pPage->pFirst; 
-	while( pEntry ){
-		if( pEntry->pPage == pCell->pPage && pEntry->iNext == pCell->iStart ){
-			/* Sibeling found */
-			return pEntry;
+	int rc;
+	rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,0);
+	if( rc == VEDIS_FULL ){
+		int do_retry = 0;
+		/* Split */
+		rc = lhSplit(pPage,&do_retry);
+		if( rc == VEDIS_OK ){
+			if( do_retry ){
+				/* Re-calculate logical bucket number */
+				return SXERR_RETRY;
+			}
+			/* Perform the store */
+			rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,1);
 		}
-		/* Point to the previous entry */
-		pEntry = pEntry->pPrev; 
-	}
-	/* Last inserted cell */
-	return 0;
-}
-/*
- * Move a cell to a new location with its new data.
- */
-static int lhMoveLocalCell(
-	lhcell *pCell,
-	sxu16 iOfft,
-	const void *pData,
-	vedis_int64 nData
-	)
-{
-	sxu16 iKeyOfft = pCell->iStart + L_HASH_CELL_SZ;
-	lhpage *pPage = pCell->pPage;
-	lhcell *pSibeling;
-	pSibeling = lhFindSibeling(pCell);
-	if( pSibeling ){
-		/* Fix link */
-		SyBigEndianPack16(&pPage->pRaw->zData[pSibeling->iStart + 4/*Hash*/+4/*Key*/+8/*Data*/],pCell->iNext);
-		pSibeling->iNext = pCell->iNext;
-	}else{
-		/* First cell, update page header only */
-		SyBigEndianPack16(pPage->pRaw->zData,pCell->iNext);
-		pPage->sHdr.iOfft = pCell->iNext;
 	}
-	/* Set the new offset */
-	pCell->iStart = iOfft;
-	pCell->nData = (sxu64)nData;
-	/* Write the cell payload */
-	lhCellWriteLocalPayload(pCell,(const void *)&pPage->pRaw->zData[iKeyOfft],pCell->nKey,pData,nData);
-	/* Finally write the cell header */
-	lhCellWriteHeader(pCell);
-	/* All done */
-	return VEDIS_OK;
+	return rc;
 }
 /*
- * Overwrite an existing record.
+ * Insert a record (Either overwrite or append operation) in our database.
  */
-static int lhRecordOverwrite(
-	lhcell *pCell,
-	const void *pData,vedis_int64 nByte
-	)
+static int lh_record_insert(
+	  vedis_kv_engine *pKv,         /* KV store */
+	  const void *pKey,sxu32 nKeyLen, /* Payload: Key */
+	  const void *pData,vedis_int64 nDataLen, /* Payload: data */
+	  int is_append /* True for an append operation */
+	  )
 {
-	lhash_kv_engine *pEngine = pCell->pPage->pHash;
-	unsigned char *zRaw,*zRawEnd,*zPayload;
-	const unsigned char *zPtr,*zEnd;
-	vedis_page *pOvfl,*pOld,*pNew;
-	lhpage *pPage = pCell->pPage;
-	sxu32 nAvail;
-	pgno iOvfl;
+	lhash_kv_engine *pEngine = (lhash_kv_engine *)pKv;
+	lhash_bmap_rec *pRec;
+	vedis_page *pRaw;
+	lhpage *pPage;
+	lhcell *pCell;
+	pgno iBucket;
+	sxu32 nHash;
+	int iCnt;
 	int rc;
-	/* Acquire a writer lock on this page */
-	rc = pEngine->pIo->xWrite(pPage->pRaw);
+
+	/* Acquire the first page (DB hash Header) so that everything gets loaded autmatically */
+	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
 	if( rc != VEDIS_OK ){
 		return rc;
 	}
-	if( pCell->iOvfl == 0 ){
-		/* Local payload, try to deal with the free space issues */
-		zPayload = &pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey];
-		if( pCell->nData == (sxu64)nByte ){
-			/* Best scenario, simply a memcpy operation */
-			SyMemcpy(pData,(void *)zPayload,(sxu32)nByte);
-		}else if( (sxu64)nByte < pCell->nData ){
-			/* Shorter data, not so ugly */
-			SyMemcpy(pData,(void *)zPayload,(sxu32)nByte);
-			/* Update the cell header */
-			SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],nByte);
-			/* Restore freespace */
-			lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ + pCell->nKey + nByte),(sxu16)(pCell->nData - nByte));
-			/* New data size */
-			pCell->nData = (sxu64)nByte;
-		}else{
-			sxu16 iOfft = 0; /* cc warning */
-			/* Check if another chunk is available for this cell */
-			rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ + pCell->nKey + nByte,&iOfft);
-			if( rc != VEDIS_OK ){
-				/* Transfer the payload to an overflow page */
-				rc = lhCellWriteOvflPayload(pCell,&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ],pCell->nKey,pData,nByte,(const void *)0);
-				if( rc != VEDIS_OK ){
-					return rc;
-				}
-				/* Update the cell header */
-				SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],(sxu64)nByte);
-				/* Restore freespace */
-				lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ),(sxu16)(pCell->nKey + pCell->nData));
-				/* New data size */
-				pCell->nData = (sxu64)nByte;
-			}else{
-				sxu16 iOldOfft = pCell->iStart;
-				sxu32 iOld = (sxu32)pCell->nData;
-				/* Space is available, transfer the cell */
-				lhMoveLocalCell(pCell,iOfft,pData,nByte);
-				/* Restore cell space */
-				lhRestoreSpace(pPage,iOldOfft,(sxu16)(L_HASH_CELL_SZ + pCell->nKey + iOld));
-			}
-		}
-		return VEDIS_OK;
-	}
-	/* Point to the overflow page */
-	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pCell->iDataPage,&pOvfl);
-	if( rc != VEDIS_OK ){
-		return rc;
+	iCnt = 0;
+	/* Compute the hash of the key first */
+	nHash = pEngine->xHash(pKey,(sxu32)nKeyLen);
+retry:
+	/* Extract the logical bucket number */
+	iBucket = nHash & (pEngine->nmax_split_nucket - 1);
+	if( iBucket >= pEngine->split_bucket + pEngine->max_split_bucket ){
+		/* Low mask */
+		iBucket = nHash & (pEngine->max_split_bucket - 1);
 	}
-	/* Relase all old overflow pages first */
-	SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
-	pOld = pOvfl;
-	for(;;){
-		if( iOvfl == 0 ){
-			/* No more overflow pages on the chain */
-			break;
+	/* Map the logical bucket number to real page number */
+	pRec = lhMapFindBucket(pEngine,iBucket);
+	if( pRec == 0 ){
+		/* Request a new page */
+		rc = lhAcquirePage(pEngine,&pRaw);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		/* Point to the target page */
-		if( VEDIS_OK != pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pOld) ){
-			/* Not so fatal if something goes wrong here */
-			break;
+		/* Initialize the page */
+		pPage = lhNewPage(pEngine,pRaw,0);
+		if( pPage == 0 ){
+			return VEDIS_NOMEM;
 		}
-		/* Next overflow page to be released */
-		SyBigEndianUnpack64(pOld->zData,&iOvfl);
-		if( pOld != pOvfl ){ /* xx: chm is maniac */
-			/* Restore the page to the free list */
-			lhRestorePage(pEngine,pOld);
-			/* Unref */
-			pEngine->pIo->xPageUnref(pOld);
+		/* Mark as an empty page */
+		rc = lhSetEmptyPage(pPage);
+		if( rc != VEDIS_OK ){
+			pEngine->pIo->xPageUnref(pRaw); /* pPage will be released during this call */
+			return rc;
 		}
-	}
-	/* Point to the data offset */
-	zRaw = &pOvfl->zData[pCell->iDataOfft];
-	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
-	/* The data to be stored */
-	zPtr = (const unsigned char *)pData;
-	zEnd = &zPtr[nByte];
-	/* Start the overwrite process */
-	/* Acquire a writer lock */
-	rc = pEngine->pIo->xWrite(pOvfl);
-	if( rc != VEDIS_OK ){
+		/* Store the cell */
+		rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,1);
+		if( rc == VEDIS_OK ){
+			/* Install and write the logical map record */
+			rc = lhMapWriteRecord(pEngine,iBucket,pRaw->pgno);
+		}
+		pEngine->pIo->xPageUnref(pRaw);
 		return rc;
-	}
-	SyBigEndianPack64(pOvfl->zData,0);
-	for(;;){
-		sxu32 nLen;
-		if( zPtr >= zEnd ){
-			break;
+	}else{
+		/* Load the page */
+		rc = lhLoadPage(pEngine,pRec->iReal,0,&pPage,0);
+		if( rc != VEDIS_OK ){
+			/* IO error, unlikely scenario */
+			return rc;
 		}
-		if( zRaw >= zRawEnd ){
-			/* Acquire a new page */
-			rc = lhAcquirePage(pEngine,&pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			rc = pEngine->pIo->xWrite(pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
+		/* Do not add this page to the hot dirty list */
+		pEngine->pIo->xDontMkHot(pPage->pRaw);
+		/* Lookup for the cell */
+		pCell = lhFindCell(pPage,pKey,(sxu32)nKeyLen,nHash);
+		if( pCell == 0 ){
+			/* Create the record */
+			rc = lhRecordInstall(pPage,nHash,pKey,nKeyLen,pData,nDataLen);
+			if( rc == SXERR_RETRY && iCnt++ < 2 ){
+				rc = VEDIS_OK;
+				goto retry;
+			}
+		}else{
+			if( is_append ){
+				/* Append operation */
+				rc = lhRecordAppend(pCell,pData,nDataLen);
+			}else{
+				/* Overwrite old value */
+				rc = lhRecordOverwrite(pCell,pData,nDataLen);
 			}
-			/* Link */
-			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
-			pEngine->pIo->xPageUnref(pOvfl);
-			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
-			pOvfl = pNew;
-			zRaw = &pNew->zData[8];
-			zRawEnd = &pNew->zData[pEngine->iPageSize];
-		}
-		nAvail = (sxu32)(zRawEnd-zRaw);
-		nLen = (sxu32)(zEnd-zPtr);
-		if( nLen > nAvail ){
-			nLen = nAvail;
 		}
-		SyMemcpy((const void *)zPtr,(void *)zRaw,nLen);
-		/* Synchronize pointers */
-		zPtr += nLen;
-		zRaw += nLen;
+		pEngine->pIo->xPageUnref(pPage->pRaw);
 	}
-	/* Unref the last overflow page */
-	pEngine->pIo->xPageUnref(pOvfl);
-	/* Finally, update the cell header */
-	pCell->nData = (sxu64)nByte;
-	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData);
+	return rc;
+}
+/*
+ * Replace method.
+ */
+static int lhash_kv_replace(
+	  vedis_kv_engine *pKv,
+	  const void *pKey,int nKeyLen,
+	  const void *pData,vedis_int64 nDataLen
+	  )
+{
+	int rc;
+	rc = lh_record_insert(pKv,pKey,(sxu32)nKeyLen,pData,nDataLen,0);
+	return rc;
+}
+/*
+ * Append method.
+ */
+static int lhash_kv_append(
+	  vedis_kv_engine *pKv,
+	  const void *pKey,int nKeyLen,
+	  const void *pData,vedis_int64 nDataLen
+	  )
+{
+	int rc;
+	rc = lh_record_insert(pKv,pKey,(sxu32)nKeyLen,pData,nDataLen,1);
+	return rc;
+}
+/*
+ * Write the hash header (Page one).
+ */
+static int lhash_write_header(lhash_kv_engine *pEngine,vedis_page *pHeader)
+{
+	unsigned char *zRaw = pHeader->zData;
+	lhash_bmap_page *pMap;
+
+	pEngine->pHeader = pHeader;
+	/* 4 byte magic number */
+	SyBigEndianPack32(zRaw,pEngine->nMagic);
+	zRaw += 4;
+	/* 4 byte hash value to identify a valid hash function */
+	SyBigEndianPack32(zRaw,pEngine->xHash(L_HASH_WORD,sizeof(L_HASH_WORD)-1));
+	zRaw += 4;
+	/* List of free pages: Empty */
+	SyBigEndianPack64(zRaw,0);
+	zRaw += 8;
+	/* Current split bucket */
+	SyBigEndianPack64(zRaw,pEngine->split_bucket);
+	zRaw += 8;
+	/* Maximum split bucket */
+	SyBigEndianPack64(zRaw,pEngine->max_split_bucket);
+	zRaw += 8;
+	/* Initialiaze the bucket map */
+	pMap = &pEngine->sPageMap;
+	/* Fill in the structure */
+	pMap->iNum = pHeader->pgno;
+	/* Next page in the bucket map */
+	SyBigEndianPack64(zRaw,0);
+	zRaw += 8;
+	/* Total number of records in the bucket map */
+	SyBigEndianPack32(zRaw,0);
+	zRaw += 4;
+	pMap->iPtr = (sxu16)(zRaw - pHeader->zData);
 	/* All done */
 	return VEDIS_OK;
-}
+ }
 /*
- * Append data to an existing record.
+ * Exported: xOpen() method.
  */
-static int lhRecordAppend(
-	lhcell *pCell,
-	const void *pData,vedis_int64 nByte
-	)
+static int lhash_kv_open(vedis_kv_engine *pEngine,pgno dbSize)
 {
-	lhash_kv_engine *pEngine = pCell->pPage->pHash;
-	const unsigned char *zPtr,*zEnd;
-	lhpage *pPage = pCell->pPage;
-	unsigned char *zRaw,*zRawEnd;
-	vedis_page *pOvfl,*pNew;
-	sxu64 nDatalen;
-	sxu32 nAvail;
-	pgno iOvfl;
+	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
+	vedis_page *pHeader;
 	int rc;
-	if( pCell->nData + nByte < pCell->nData ){
-		/* Overflow */
-		pEngine->pIo->xErr(pEngine->pIo->pHandle,"Append operation will cause data overflow");
-		return VEDIS_LIMIT;
-	}
-	/* Acquire a writer lock on this page */
-	rc = pEngine->pIo->xWrite(pPage->pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	if( pCell->iOvfl == 0 ){
-		sxu16 iOfft = 0; /* cc warning */
-		/* Local payload, check for a bigger place */
-		rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ + pCell->nKey + pCell->nData + nByte,&iOfft);
+	if( dbSize < 1 ){
+		/* A new database, create the header */
+		rc = pEngine->pIo->xNew(pEngine->pIo->pHandle,&pHeader);
 		if( rc != VEDIS_OK ){
-			/* Transfer the payload to an overflow page */
-			rc = lhCellWriteOvflPayload(pCell,
-				&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ],pCell->nKey,
-				(const void *)&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey],pCell->nData,
-				pData,nByte,
-				(const void *)0
-				);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Update the cell header */
-			SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData + nByte);
-			/* Restore freespace */
-			lhRestoreSpace(pPage,(sxu16)(pCell->iStart + L_HASH_CELL_SZ),(sxu16)(pCell->nKey + pCell->nData));
-			/* New data size */
-			pCell->nData += nByte;
-		}else{
-			sxu16 iOldOfft = pCell->iStart;
-			sxu32 iOld = (sxu32)pCell->nData;
-			SyBlob sWorker;
-			SyBlobInit(&sWorker,&pEngine->sAllocator);
-			/* Copy the old data */
-			rc = SyBlobAppend(&sWorker,(const void *)&pPage->pRaw->zData[pCell->iStart + L_HASH_CELL_SZ + pCell->nKey],(sxu32)pCell->nData);
-			if( rc == SXRET_OK ){
-				/* Append the new data */
-				rc = SyBlobAppend(&sWorker,pData,(sxu32)nByte);
-			}
-			if( rc != VEDIS_OK ){
-				SyBlobRelease(&sWorker);
-				return rc;
-			}
-			/* Space is available, transfer the cell */
-			lhMoveLocalCell(pCell,iOfft,SyBlobData(&sWorker),(vedis_int64)SyBlobLength(&sWorker));
-			/* Restore cell space */
-			lhRestoreSpace(pPage,iOldOfft,(sxu16)(L_HASH_CELL_SZ + pCell->nKey + iOld));
-			/* All done */
-			SyBlobRelease(&sWorker);
+			return rc;
 		}
-		return VEDIS_OK;
-	}
-	/* Point to the overflow page which hold the data */
-	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,pCell->iDataPage,&pOvfl);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Next overflow page in the chain */
-	SyBigEndianUnpack64(pOvfl->zData,&iOvfl);
-	/* Point to the end of the chunk */
-	zRaw = &pOvfl->zData[pCell->iDataOfft];
-	zRawEnd = &pOvfl->zData[pEngine->iPageSize];
-	nDatalen = pCell->nData;
-	nAvail = (sxu32)(zRawEnd - zRaw);
-	for(;;){
-		if( zRaw >= zRawEnd ){
-			if( iOvfl == 0 ){
-				/* Cant happen */
-				pEngine->pIo->xErr(pEngine->pIo->pHandle,"Corrupt overflow page");
-				return VEDIS_CORRUPT;
-			}
-			rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,iOvfl,&pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Next overflow page on the chain */
-			SyBigEndianUnpack64(pNew->zData,&iOvfl);
-			/* Unref the previous overflow page */
-			pEngine->pIo->xPageUnref(pOvfl);
-			/* Point to the new chunk */
-			zRaw = &pNew->zData[8];
-			zRawEnd = &pNew->zData[pCell->pPage->pHash->iPageSize];
-			nAvail = L_HASH_OVERFLOW_SIZE(pCell->pPage->pHash->iPageSize);
-			pOvfl = pNew;
+		/* Acquire a writer lock */
+		rc = pEngine->pIo->xWrite(pHeader);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		if( (sxu64)nAvail > nDatalen ){
-			zRaw += nDatalen;
-			break;
-		}else{
-			nDatalen -= nAvail;
+		/* Write the hash header */
+		rc = lhash_write_header(pHash,pHeader);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+	}else{
+		/* Acquire the page one of the database */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,&pHeader);
+		if( rc != VEDIS_OK ){
+			return rc;
+		}
+		/* Read the database header */
+		rc = lhash_read_header(pHash,pHeader);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		zRaw += nAvail;
 	}
-	/* Start the append process */
-	zPtr = (const unsigned char *)pData;
-	zEnd = &zPtr[nByte];
-	/* Acquire a writer lock */
-	rc = pEngine->pIo->xWrite(pOvfl);
-	if( rc != VEDIS_OK ){
-		return rc;
+	return VEDIS_OK;
+}
+/*
+ * Release a master or slave page. (xUnpin callback).
+ */
+static void lhash_page_release(void *pUserData)
+{
+	lhpage *pPage = (lhpage *)pUserData;
+	lhash_kv_engine *pEngine = pPage->pHash;
+	lhcell *pNext,*pCell = pPage->pList;
+	vedis_page *pRaw = pPage->pRaw;
+	sxu32 n;
+	/* Drop in-memory cells */
+	for( n = 0 ; n < pPage->nCell ; ++n ){
+		pNext = pCell->pNext;
+		SyBlobRelease(&pCell->sKey);
+		/* Release the cell instance */
+		SyMemBackendPoolFree(&pEngine->sAllocator,(void *)pCell);
+		/* Point to the next entry */
+		pCell = pNext;
+	}
+	if( pPage->apCell ){
+		/* Release the cell table */
+		SyMemBackendFree(&pEngine->sAllocator,(void *)pPage->apCell);
+	}
+	/* Finally, release the whole page */
+	SyMemBackendPoolFree(&pEngine->sAllocator,pPage);
+	pRaw->pUserData = 0;
+}
+/*
+ * Default hash function (DJB).
+ */
+static sxu32 lhash_bin_hash(const void *pSrc,sxu32 nLen)
+{
+	register unsigned char *zIn = (unsigned char *)pSrc;
+	unsigned char *zEnd;
+	sxu32 nH = 5381;
+	if( nLen > 2048 /* 2K */ ){
+		nLen = 2048;
 	}
+	zEnd = &zIn[nLen];
 	for(;;){
-		sxu32 nLen;
-		if( zPtr >= zEnd ){
-			break;
-		}
-		if( zRaw >= zRawEnd ){
-			/* Acquire a new page */
-			rc = lhAcquirePage(pEngine,&pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			rc = pEngine->pIo->xWrite(pNew);
-			if( rc != VEDIS_OK ){
-				return rc;
-			}
-			/* Link */
-			SyBigEndianPack64(pOvfl->zData,pNew->pgno);
-			pEngine->pIo->xPageUnref(pOvfl);
-			SyBigEndianPack64(pNew->zData,0); /* Next overflow page on the chain */
-			pOvfl = pNew;
-			zRaw = &pNew->zData[8];
-			zRawEnd = &pNew->zData[pEngine->iPageSize];
-		}
-		nAvail = (sxu32)(zRawEnd-zRaw);
-		nLen = (sxu32)(zEnd-zPtr);
-		if( nLen > nAvail ){
-			nLen = nAvail;
-		}
-		SyMemcpy((const void *)zPtr,(void *)zRaw,nLen);
-		/* Synchronize pointers */
-		zPtr += nLen;
-		zRaw += nLen;
-	}
-	/* Unref the last overflow page */
-	pEngine->pIo->xPageUnref(pOvfl);
-	/* Finally, update the cell header */
-	pCell->nData += nByte;
-	SyBigEndianPack64(&pPage->pRaw->zData[pCell->iStart + 4 /* Hash */ + 4 /* Key */],pCell->nData);
-	/* All done */
-	return VEDIS_OK;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+	}	
+	return nH;
 }
 /*
- * A write privilege have been acquired on this page.
- * Mark it as an empty page (No cells).
+ * Exported: xInit() method.
+ * Initialize the Key value storage engine.
  */
-static int lhSetEmptyPage(lhpage *pPage)
+static int lhash_kv_init(vedis_kv_engine *pEngine,int iPageSize)
 {
-	unsigned char *zRaw = pPage->pRaw->zData;
-	lhphdr *pHeader = &pPage->sHdr;
-	sxu16 nByte;
+	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
 	int rc;
-	/* Acquire a writer lock */
-	rc = pPage->pHash->pIo->xWrite(pPage->pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
+
+	/* This structure is always zeroed, go to the initialization directly */
+	SyMemBackendInitFromParent(&pHash->sAllocator,vedisExportMemBackend());
+#if defined(VEDIS_ENABLE_THREADS)
+	/* Already protected by the upper layers */
+	SyMemBackendDisbaleMutexing(&pHash->sAllocator);
+#endif
+	pHash->iPageSize = iPageSize;
+	/* Default hash function */
+	pHash->xHash = lhash_bin_hash;
+	/* Default comparison function */
+	pHash->xCmp = SyMemcmp;
+	/* Allocate a new record map */
+	pHash->nBuckSize = 32;
+	pHash->apMap = (lhash_bmap_rec **)SyMemBackendAlloc(&pHash->sAllocator,pHash->nBuckSize *sizeof(lhash_bmap_rec *));
+	if( pHash->apMap == 0 ){
+		rc = VEDIS_NOMEM;
+		goto err;
 	}
-	/* Offset of the first cell */
-	SyBigEndianPack16(zRaw,0);
-	zRaw += 2;
-	/* Offset of the first free block */
-	pHeader->iFree = L_HASH_PAGE_HDR_SZ;
-	SyBigEndianPack16(zRaw,L_HASH_PAGE_HDR_SZ);
-	zRaw += 2;
-	/* Slave page number */
-	SyBigEndianPack64(zRaw,0);
-	zRaw += 8;
-	/* Fill the free block */
-	SyBigEndianPack16(zRaw,0); /* Offset of the next free block */
-	zRaw += 2;
-	nByte = (sxu16)L_HASH_MX_FREE_SPACE(pPage->pHash->iPageSize);
-	SyBigEndianPack16(zRaw,nByte);
-	pPage->nFree = nByte;
-	/* Do not add this page to the hot dirty list */
-	pPage->pHash->pIo->xDontMkHot(pPage->pRaw);
+	/* Zero the table */
+	SyZero(pHash->apMap,pHash->nBuckSize * sizeof(lhash_bmap_rec *));
+	/* Linear hashing components */
+	pHash->split_bucket = 0; /* Logical not real bucket number */
+	pHash->max_split_bucket = 1;
+	pHash->nmax_split_nucket = 2;
+	pHash->nMagic = L_HASH_MAGIC;
+	/* Install the cache unpin and reload callbacks */
+	pHash->pIo->xSetUnpin(pHash->pIo->pHandle,lhash_page_release);
+	pHash->pIo->xSetReload(pHash->pIo->pHandle,lhash_page_release);
 	return VEDIS_OK;
+err:
+	SyMemBackendRelease(&pHash->sAllocator);
+	return rc;
 }
-/* Forward declaration */
-static int lhSlaveStore(
-	lhpage *pPage,
-	const void *pKey,sxu32 nKeyLen,
-	const void *pData,vedis_int64 nDataLen,
-	sxu32 nHash
-	);
 /*
- * Store a cell and its payload in a given page.
+ * Exported: xRelease() method.
+ * Release the Key value storage engine.
  */
-static int lhStoreCell(
-	lhpage *pPage, /* Target page */
-	const void *pKey,sxu32 nKeyLen, /* Payload: Key */
-	const void *pData,vedis_int64 nDataLen, /* Payload: Data */
-	sxu32 nHash, /* Hash of the key */
-	int auto_append /* Auto append a slave page if full */
-	)
+static void lhash_kv_release(vedis_kv_engine *pEngine)
 {
-	lhash_kv_engine *pEngine = pPage->pHash;
-	int iNeedOvfl = 0; /* Need overflow page for this cell and its payload*/
-	lhcell *pCell;
-	sxu16 nOfft;
-	int rc;
-	/* Acquire a writer lock on this page first */
-	rc = pEngine->pIo->xWrite(pPage->pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Check for a free block  */
-	rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ+nKeyLen+nDataLen,&nOfft);
-	if( rc != VEDIS_OK ){
-		/* Check for a free block to hold a single cell only (without payload) */
-		rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ,&nOfft);
-		if( rc != VEDIS_OK ){
-			if( !auto_append ){
-				/* A split must be done */
-				return VEDIS_FULL;
-			}else{
-				/* Store this record in a slave page */
-				rc = lhSlaveStore(pPage,pKey,nKeyLen,pData,nDataLen,nHash);
-				return rc;
+	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
+	/* Release the private memory backend */
+	SyMemBackendRelease(&pHash->sAllocator);
+}
+/*
+ *  Exported: xConfig() method.
+ *  Configure the linear hash KV store.
+ */
+static int lhash_kv_config(vedis_kv_engine *pEngine,int op,va_list ap)
+{
+	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
+	int rc = VEDIS_OK;
+	switch(op){
+	case VEDIS_KV_CONFIG_HASH_FUNC: {
+		/* Default hash function */
+		if( pHash->nBuckRec > 0 ){
+			/* Locked operation */
+			rc = VEDIS_LOCKED;
+		}else{
+			ProcHash xHash = va_arg(ap,ProcHash);
+			if( xHash ){
+				pHash->xHash = xHash;
 			}
 		}
-		iNeedOvfl = 1;
-	}
-	/* Allocate a new cell instance */
-	pCell = lhNewCell(pEngine,pPage);
-	if( pCell == 0 ){
-		pEngine->pIo->xErr(pEngine->pIo->pHandle,"KV store is running out of memory");
-		return VEDIS_NOMEM;
-	}
-	/* Fill-in the structure */
-	pCell->iStart = nOfft;
-	pCell->nKey = nKeyLen;
-	pCell->nData = (sxu64)nDataLen;
-	pCell->nHash = nHash;
-	if( nKeyLen < 262144 /* 256 KB */ ){
-		/* Keep the key in-memory for fast lookup */
-		SyBlobAppend(&pCell->sKey,pKey,nKeyLen);
-	}
-	/* Link the cell */
-	rc = lhInstallCell(pCell);
-	if( rc != VEDIS_OK ){
-		return rc;
+		break;
+									  }
+	case VEDIS_KV_CONFIG_CMP_FUNC: {
+		/* Default comparison function */
+		ProcCmp xCmp = va_arg(ap,ProcCmp);
+		if( xCmp ){
+			pHash->xCmp  = xCmp;
+		}
+		break;
+									 }
+	default:
+		/* Unknown OP */
+		rc = VEDIS_UNKNOWN;
+		break;
 	}
-	/* Write the payload */
-	if( iNeedOvfl ){
-		rc = lhCellWriteOvflPayload(pCell,pKey,nKeyLen,pData,nDataLen,(const void *)0);
+	return rc;
+}
+/*
+ * Each public cursor is identified by an instance of this structure.
+ */
+typedef struct lhash_kv_cursor lhash_kv_cursor;
+struct lhash_kv_cursor
+{
+	vedis_kv_engine *pStore; /* Must be first */
+	/* Private fields */
+	int iState;           /* Current state of the cursor */
+	int is_first;         /* True to read the database header */
+	lhcell *pCell;        /* Current cell we are processing */
+	vedis_page *pRaw;   /* Raw disk page */
+	lhash_bmap_rec *pRec; /* Logical to real bucket map */
+};
+/* 
+ * Possible state of the cursor
+ */
+#define L_HASH_CURSOR_STATE_NEXT_PAGE 1 /* Next page in the list */
+#define L_HASH_CURSOR_STATE_CELL      2 /* Processing Cell */
+#define L_HASH_CURSOR_STATE_DONE      3 /* Cursor does not point to anything */
+/*
+ * Initialize the cursor.
+ */
+static void lhInitCursor(vedis_kv_cursor *pPtr)
+{
+	 lhash_kv_engine *pEngine = (lhash_kv_engine *)pPtr->pStore;
+	 lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
+	 /* Init */
+	 pCur->iState = L_HASH_CURSOR_STATE_NEXT_PAGE;
+	 pCur->pCell = 0;
+	 pCur->pRec = pEngine->pFirst;
+	 pCur->pRaw = 0;
+	 pCur->is_first = 1;
+}
+/*
+ * Point to the next page on the database.
+ */
+static int lhCursorNextPage(lhash_kv_cursor *pPtr)
+{
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
+	lhash_bmap_rec *pRec;
+	lhpage *pPage;
+	int rc;
+	for(;;){
+		pRec = pCur->pRec;
+		if( pRec == 0 ){
+			pCur->iState = L_HASH_CURSOR_STATE_DONE;
+			return VEDIS_DONE;
+		}
+		if( pPtr->iState == L_HASH_CURSOR_STATE_CELL && pPtr->pRaw ){
+			/* Unref this page */
+			pCur->pStore->pIo->xPageUnref(pPtr->pRaw);
+			pPtr->pRaw = 0;
+		}
+		/* Advance the map cursor */
+		pCur->pRec = pRec->pPrev; /* Not a bug, reverse link */
+		/* Load the next page on the list */
+		rc = lhLoadPage((lhash_kv_engine *)pCur->pStore,pRec->iReal,0,&pPage,0);
 		if( rc != VEDIS_OK ){
-			lhCellDiscard(pCell);
 			return rc;
 		}
-	}else{
-		lhCellWriteLocalPayload(pCell,pKey,nKeyLen,pData,nDataLen);
+		if( pPage->pList ){
+			/* Reflect the change */
+			pCur->pCell = pPage->pList;
+			pCur->iState = L_HASH_CURSOR_STATE_CELL;
+			pCur->pRaw = pPage->pRaw;
+			break;
+		}
+		/* Empty page, discard this page and continue */
+		pPage->pHash->pIo->xPageUnref(pPage->pRaw);
 	}
-	/* Finally, Write the cell header */
-	lhCellWriteHeader(pCell);
-	/* All done */
 	return VEDIS_OK;
 }
 /*
- * Find a slave page capable of hosting the given amount.
+ * Point to the previous page on the database.
  */
-static int lhFindSlavePage(lhpage *pPage,sxu64 nAmount,sxu16 *pOfft,lhpage **ppSlave)
+static int lhCursorPrevPage(lhash_kv_cursor *pPtr)
 {
-	lhash_kv_engine *pEngine = pPage->pHash;
-	lhpage *pMaster = pPage->pMaster;
-	lhpage *pSlave = pMaster->pSlave;
-	vedis_page *pRaw;
-	lhpage *pNew;
-	sxu16 iOfft;
-	sxi32 i;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
+	lhash_bmap_rec *pRec;
+	lhpage *pPage;
 	int rc;
-	/* Look for an already attached slave page */
-	for( i = 0 ; i < pMaster->iSlave ; ++i ){
-		/* Find a free chunk big enough */
-		sxu16 size = L_HASH_CELL_SZ + nAmount;
-		rc = lhAllocateSpace(pSlave,size,&iOfft);
-		if( rc != VEDIS_OK ){
-			/* A space for cell header only */
-			size = L_HASH_CELL_SZ;
-			rc = lhAllocateSpace(pSlave,size,&iOfft);
+	for(;;){
+		pRec = pCur->pRec;
+		if( pRec == 0 ){
+			pCur->iState = L_HASH_CURSOR_STATE_DONE;
+			return VEDIS_DONE;
 		}
-		if( rc == VEDIS_OK ){
-			/* All done */
-			if( pOfft ){
-				*pOfft = iOfft;
-			}else{
-				rc = lhRestoreSpace(pSlave, iOfft, size);
-			}
-			*ppSlave = pSlave;
+		if( pPtr->iState == L_HASH_CURSOR_STATE_CELL && pPtr->pRaw ){
+			/* Unref this page */
+			pCur->pStore->pIo->xPageUnref(pPtr->pRaw);
+			pPtr->pRaw = 0;
+		}
+		/* Advance the map cursor */
+		pCur->pRec = pRec->pNext; /* Not a bug, reverse link */
+		/* Load the previous page on the list */
+		rc = lhLoadPage((lhash_kv_engine *)pCur->pStore,pRec->iReal,0,&pPage,0);
+		if( rc != VEDIS_OK ){
 			return rc;
 		}
-		/* Point to the next slave page */
-		pSlave = pSlave->pNextSlave;
-	}
-	/* Acquire a new slave page */
-	rc = lhAcquirePage(pEngine,&pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Last slave page */
-	pSlave = pMaster->pSlave;
-	if( pSlave == 0 ){
-		/* First slave page */
-		pSlave = pMaster;
-	}
-	/* Initialize the page */
-	pNew = lhNewPage(pEngine,pRaw,pMaster);
-	if( pNew == 0 ){
-		return VEDIS_NOMEM;
-	}
-	/* Mark as an empty page */
-	rc = lhSetEmptyPage(pNew);
-	if( rc != VEDIS_OK ){
-		goto fail;
-	}
-	if( pOfft ){
-		/* Look for a free block */
-		if( VEDIS_OK != lhAllocateSpace(pNew,L_HASH_CELL_SZ+nAmount,&iOfft) ){
-			/* Cell header only */
-			lhAllocateSpace(pNew,L_HASH_CELL_SZ,&iOfft); /* Never fail */
-		}	
-		*pOfft = iOfft;
-	}
-	/* Link this page to the previous slave page */
-	rc = pEngine->pIo->xWrite(pSlave->pRaw);
-	if( rc != VEDIS_OK ){
-		goto fail;
+		if( pPage->pFirst ){
+			/* Reflect the change */
+			pCur->pCell = pPage->pFirst;
+			pCur->iState = L_HASH_CURSOR_STATE_CELL;
+			pCur->pRaw = pPage->pRaw;
+			break;
+		}
+		/* Discard this page and continue */
+		pPage->pHash->pIo->xPageUnref(pPage->pRaw);
 	}
-	/* Reflect in the page header */
-	SyBigEndianPack64(&pSlave->pRaw->zData[2/*Cell offset*/+2/*Free block offset*/],pRaw->pgno);
-	pSlave->sHdr.iSlave = pRaw->pgno;
-	/* All done */
-	*ppSlave = pNew;
 	return VEDIS_OK;
-fail:
-	pEngine->pIo->xPageUnref(pNew->pRaw); /* pNew will be released in this call */
-	return rc;
-
 }
 /*
- * Perform a store operation in a slave page.
+ * Is a valid cursor.
  */
-static int lhSlaveStore(
-	lhpage *pPage, /* Master page */
-	const void *pKey,sxu32 nKeyLen, /* Payload: key */
-	const void *pData,vedis_int64 nDataLen, /* Payload: data */
-	sxu32 nHash /* Hash of the key */
-	)
+static int lhCursorValid(vedis_kv_cursor *pPtr)
 {
-	lhpage *pSlave;
-	int rc;
-	/* Find a slave page */
-	rc = lhFindSlavePage(pPage,nKeyLen + nDataLen,0,&pSlave);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Perform the insertion in the slave page */
-	rc = lhStoreCell(pSlave,pKey,nKeyLen,pData,nDataLen,nHash,1);
-	return rc;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
+	return (pCur->iState == L_HASH_CURSOR_STATE_CELL) && pCur->pCell;
 }
 /*
- * Transfer a cell to a new page (either a master or slave).
+ * Point to the first record.
  */
-static int lhTransferCell(lhcell *pTarget,lhpage *pPage)
+static int lhCursorFirst(vedis_kv_cursor *pCursor)
 {
-	lhcell *pCell;
-	sxu16 nOfft;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhash_kv_engine *pEngine = (lhash_kv_engine *)pCursor->pStore;
 	int rc;
-	/* Check for a free block to hold a single cell only */
-	rc = lhAllocateSpace(pPage,L_HASH_CELL_SZ,&nOfft);
-	if( rc != VEDIS_OK ){
-		/* Store in a slave page */
-		rc = lhFindSlavePage(pPage,L_HASH_CELL_SZ,&nOfft,&pPage);
+	if( pCur->is_first ){
+		/* Read the database header first */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
 		if( rc != VEDIS_OK ){
-			return rc;
-		}
-	}
-	/* Allocate a new cell instance */
-	pCell = lhNewCell(pPage->pHash,pPage);
-	if( pCell == 0 ){
-		return VEDIS_NOMEM;
-	}
-	/* Fill-in the structure */
-	pCell->iStart = nOfft;
-	pCell->nData  = pTarget->nData;
-	pCell->nKey   = pTarget->nKey;
-	pCell->iOvfl  = pTarget->iOvfl;
-	pCell->iDataOfft = pTarget->iDataOfft;
-	pCell->iDataPage = pTarget->iDataPage;
-	pCell->nHash = pTarget->nHash;
-	SyBlobDup(&pTarget->sKey,&pCell->sKey);
-	/* Link the cell */
-	rc = lhInstallCell(pCell);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Finally, Write the cell header */
-	lhCellWriteHeader(pCell);
-	/* All done */
-	return VEDIS_OK;
-}
-/*
- * Perform a page split.
- */
-static int lhPageSplit(
-	lhpage *pOld,      /* Page to be split */
-	lhpage *pNew,      /* New page */
-	pgno split_bucket, /* Current split bucket */
-	pgno high_mask     /* High mask (Max split bucket - 1) */
-	)
-{
-	lhcell *pCell,*pNext;
-	SyBlob sWorker;
-	pgno iBucket;
-	int rc; 
-	SyBlobInit(&sWorker,&pOld->pHash->sAllocator);
-	/* Perform the split */
-	pCell = pOld->pList;
-	for( ;; ){
-		if( pCell == 0 ){
-			/* No more cells */
-			break;
-		}
-		/* Obtain the new logical bucket */
-		iBucket = pCell->nHash & high_mask;
-		pNext =  pCell->pNext;
-		if( iBucket != split_bucket){
-			rc = VEDIS_OK;
-			if( pCell->iOvfl ){
-				/* Transfer the cell only */
-				rc = lhTransferCell(pCell,pNew);
-			}else{
-				/* Transfer the cell and its payload */
-				SyBlobReset(&sWorker);
-				if( SyBlobLength(&pCell->sKey) < 1 ){
-					/* Consume the key */
-					rc = lhConsumeCellkey(pCell,vedisDataConsumer,&pCell->sKey,0);
-					if( rc != VEDIS_OK ){
-						goto fail;
-					}
-				}
-				/* Consume the data (Very small data < 65k) */
-				rc = lhConsumeCellData(pCell,vedisDataConsumer,&sWorker);
-				if( rc != VEDIS_OK ){
-					goto fail;
-				}
-				/* Perform the transfer */
-				rc = lhStoreCell(
-					pNew,
-					SyBlobData(&pCell->sKey),(int)SyBlobLength(&pCell->sKey),
-					SyBlobData(&sWorker),SyBlobLength(&sWorker),
-					pCell->nHash,
-					1
-					);
-			}
-			if( rc != VEDIS_OK ){
-				goto fail;
-			}
-			/* Discard the cell from the old page */
-			lhUnlinkCell(pCell);
+			return rc;
 		}
-		/* Point to the next cell */
-		pCell = pNext;
+		pCur->is_first = 0;
 	}
-	/* All done */
-	rc = VEDIS_OK;
-fail:
-	SyBlobRelease(&sWorker);
+	/* Point to the first map record */
+	pCur->pRec = pEngine->pFirst;
+	/* Load the cells */
+	rc = lhCursorNextPage(pCur);
 	return rc;
 }
 /*
- * Perform the infamous linear hash split operation.
+ * Point to the last record.
  */
-static int lhSplit(lhpage *pTarget,int *pRetry)
+static int lhCursorLast(vedis_kv_cursor *pCursor)
 {
-	lhash_kv_engine *pEngine = pTarget->pHash;
-	lhash_bmap_rec *pRec;
-	lhpage *pOld,*pNew;
-	vedis_page *pRaw;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhash_kv_engine *pEngine = (lhash_kv_engine *)pCursor->pStore;
 	int rc;
-	/* Get the real page number of the bucket to split */
-	pRec = lhMapFindBucket(pEngine,pEngine->split_bucket);
-	if( pRec == 0 ){
-		/* Can't happen */
-		return VEDIS_CORRUPT;
-	}
-	/* Load the page to be split */
-	rc = lhLoadPage(pEngine,pRec->iReal,0,&pOld,0);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Request a new page */
-	rc = lhAcquirePage(pEngine,&pRaw);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	/* Initialize the page */
-	pNew = lhNewPage(pEngine,pRaw,0);
-	if( pNew == 0 ){
-		return VEDIS_NOMEM;
-	}
-	/* Mark as an empty page */
-	rc = lhSetEmptyPage(pNew);
-	if( rc != VEDIS_OK ){
-		goto fail;
-	}
-	/* Install and write the logical map record */
-	rc = lhMapWriteRecord(pEngine,
-		pEngine->split_bucket + pEngine->max_split_bucket,
-		pRaw->pgno
-		);
-	if( rc != VEDIS_OK ){
-		goto fail;
-	}
-	if( pTarget->pRaw->pgno == pOld->pRaw->pgno ){
-		*pRetry = 1;
-	}
-	/* Perform the split */
-	rc = lhPageSplit(pOld,pNew,pEngine->split_bucket,pEngine->nmax_split_nucket - 1);
-	if( rc != VEDIS_OK ){
-		goto fail;
-	}
-	/* Update the database header */
-	pEngine->split_bucket++;
-	/* Acquire a writer lock on the first page */
-	rc = pEngine->pIo->xWrite(pEngine->pHeader);
-	if( rc != VEDIS_OK ){
-		return rc;
-	}
-	if( pEngine->split_bucket >= pEngine->max_split_bucket ){
-		/* Increment the generation number */
-		pEngine->split_bucket = 0;
-		pEngine->max_split_bucket = pEngine->nmax_split_nucket;
-		pEngine->nmax_split_nucket <<= 1;
-		if( !pEngine->nmax_split_nucket ){
-			/* If this happen to your installation, please tell us <chm@symisc.net> */
-			pEngine->pIo->xErr(pEngine->pIo->pHandle,"Database page (64-bit integer) limit reached");
-			return VEDIS_LIMIT;
+	if( pCur->is_first ){
+		/* Read the database header first */
+		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
+		if( rc != VEDIS_OK ){
+			return rc;
 		}
-		/* Reflect in the page header */
-		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/],pEngine->split_bucket);
-		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/+8/*Split bucket*/],pEngine->max_split_bucket);
-	}else{
-		/* Modify only the split bucket */
-		SyBigEndianPack64(&pEngine->pHeader->zData[4/*Magic*/+4/*Hash*/+8/*Free list*/],pEngine->split_bucket);
+		pCur->is_first = 0;
 	}
-	/* All done */
-	return VEDIS_OK;
-fail:
-	pEngine->pIo->xPageUnref(pNew->pRaw);
+	/* Point to the last map record */
+	pCur->pRec = pEngine->pList;
+	/* Load the cells */
+	rc = lhCursorPrevPage(pCur);
 	return rc;
 }
 /*
- * Store a record in the target page.
+ * Reset the cursor.
  */
-static int lhRecordInstall(
-	  lhpage *pPage, /* Target page */
-	  sxu32 nHash,   /* Hash of the key */
-	  const void *pKey,sxu32 nKeyLen,          /* Payload: Key */
-	  const void *pData,vedis_int64 nDataLen /* Payload: Data */
-	  )
+static void lhCursorReset(vedis_kv_cursor *pCursor)
+{
+	lhCursorFirst(pCursor);
+}
+/*
+ * Point to the next record.
+ */
+static int lhCursorNext(vedis_kv_cursor *pCursor)
 {
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
 	int rc;
-	rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,0);
-	if( rc == VEDIS_FULL ){
-		int do_retry = 0;
-		/* Split */
-		rc = lhSplit(pPage,&do_retry);
-		if( rc == VEDIS_OK ){
-			if( do_retry ){
-				/* Re-calculate logical bucket number */
-				return SXERR_RETRY;
-			}
-			/* Perform the store */
-			rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,1);
-		}
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Load the cells of the next page  */
+		rc = lhCursorNextPage(pCur);
+		return rc;
 	}
-	return rc;
+	pCell = pCur->pCell;
+	pCur->pCell = pCell->pNext;
+	if( pCur->pCell == 0 ){
+		/* Load the cells of the next page  */
+		rc = lhCursorNextPage(pCur);
+		return rc;
+	}
+	return VEDIS_OK;
 }
 /*
- * Insert a record (Either overwrite or append operation) in our database.
+ * Point to the previous record.
  */
-static int lh_record_insert(
-	  vedis_kv_engine *pKv,         /* KV store */
-	  const void *pKey,sxu32 nKeyLen, /* Payload: Key */
-	  const void *pData,vedis_int64 nDataLen, /* Payload: data */
-	  int is_append /* True for an append operation */
-	  )
+static int lhCursorPrev(vedis_kv_cursor *pCursor)
 {
-	lhash_kv_engine *pEngine = (lhash_kv_engine *)pKv;
-	lhash_bmap_rec *pRec;
-	vedis_page *pRaw;
-	lhpage *pPage;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
 	lhcell *pCell;
-	pgno iBucket;
-	sxu32 nHash;
-	int iCnt;
 	int rc;
-
-	/* Acquire the first page (DB hash Header) so that everything gets loaded autmatically */
-	rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
-	if( rc != VEDIS_OK ){
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Load the cells of the previous page  */
+		rc = lhCursorPrevPage(pCur);
 		return rc;
 	}
-	iCnt = 0;
-	/* Compute the hash of the key first */
-	nHash = pEngine->xHash(pKey,(sxu32)nKeyLen);
-retry:
-	/* Extract the logical bucket number */
-	iBucket = nHash & (pEngine->nmax_split_nucket - 1);
-	if( iBucket >= pEngine->split_bucket + pEngine->max_split_bucket ){
-		/* Low mask */
-		iBucket = nHash & (pEngine->max_split_bucket - 1);
-	}
-	/* Map the logical bucket number to real page number */
-	pRec = lhMapFindBucket(pEngine,iBucket);
-	if( pRec == 0 ){
-		/* Request a new page */
-		rc = lhAcquirePage(pEngine,&pRaw);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		/* Initialize the page */
-		pPage = lhNewPage(pEngine,pRaw,0);
-		if( pPage == 0 ){
-			return VEDIS_NOMEM;
-		}
-		/* Mark as an empty page */
-		rc = lhSetEmptyPage(pPage);
-		if( rc != VEDIS_OK ){
-			pEngine->pIo->xPageUnref(pRaw); /* pPage will be released during this call */
-			return rc;
-		}
-		/* Store the cell */
-		rc = lhStoreCell(pPage,pKey,nKeyLen,pData,nDataLen,nHash,1);
-		if( rc == VEDIS_OK ){
-			/* Install and write the logical map record */
-			rc = lhMapWriteRecord(pEngine,iBucket,pRaw->pgno);
-		}
-		pEngine->pIo->xPageUnref(pRaw);
+	pCell = pCur->pCell;
+	pCur->pCell = pCell->pPrev;
+	if( pCur->pCell == 0 ){
+		/* Load the cells of the previous page  */
+		rc = lhCursorPrevPage(pCur);
 		return rc;
-	}else{
-		/* Load the page */
-		rc = lhLoadPage(pEngine,pRec->iReal,0,&pPage,0);
-		if( rc != VEDIS_OK ){
-			/* IO error, unlikely scenario */
-			return rc;
-		}
-		/* Do not add this page to the hot dirty list */
-		pEngine->pIo->xDontMkHot(pPage->pRaw);
-		/* Lookup for the cell */
-		pCell = lhFindCell(pPage,pKey,(sxu32)nKeyLen,nHash);
-		if( pCell == 0 ){
-			/* Create the record */
-			rc = lhRecordInstall(pPage,nHash,pKey,nKeyLen,pData,nDataLen);
-			if( rc == SXERR_RETRY && iCnt++ < 2 ){
-				rc = VEDIS_OK;
-				goto retry;
-			}
-		}else{
-			if( is_append ){
-				/* Append operation */
-				rc = lhRecordAppend(pCell,pData,nDataLen);
-			}else{
-				/* Overwrite old value */
-				rc = lhRecordOverwrite(pCell,pData,nDataLen);
-			}
-		}
-		pEngine->pIo->xPageUnref(pPage->pRaw);
 	}
-	return rc;
+	return VEDIS_OK;
+}
+/*
+ * Return key length.
+ */
+static int lhCursorKeyLength(vedis_kv_cursor *pCursor,int *pLen)
+{
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
+	
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Invalid state */
+		return VEDIS_INVALID;
+	}
+	/* Point to the target cell */
+	pCell = pCur->pCell;
+	/* Return key length */
+	*pLen = (int)pCell->nKey;
+	return VEDIS_OK;
 }
 /*
- * Replace method.
+ * Return data length.
  */
-static int lhash_kv_replace(
-	  vedis_kv_engine *pKv,
-	  const void *pKey,int nKeyLen,
-	  const void *pData,vedis_int64 nDataLen
-	  )
+static int lhCursorDataLength(vedis_kv_cursor *pCursor,vedis_int64 *pLen)
 {
-	int rc;
-	rc = lh_record_insert(pKv,pKey,(sxu32)nKeyLen,pData,nDataLen,0);
-	return rc;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
+	
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Invalid state */
+		return VEDIS_INVALID;
+	}
+	/* Point to the target cell */
+	pCell = pCur->pCell;
+	/* Return data length */
+	*pLen = (vedis_int64)pCell->nData;
+	return VEDIS_OK;
 }
 /*
- * Append method.
+ * Consume the key.
  */
-static int lhash_kv_append(
-	  vedis_kv_engine *pKv,
-	  const void *pKey,int nKeyLen,
-	  const void *pData,vedis_int64 nDataLen
-	  )
+static int lhCursorKey(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
 	int rc;
-	rc = lh_record_insert(pKv,pKey,(sxu32)nKeyLen,pData,nDataLen,1);
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Invalid state */
+		return VEDIS_INVALID;
+	}
+	/* Point to the target cell */
+	pCell = pCur->pCell;
+	if( SyBlobLength(&pCell->sKey) > 0 ){
+		/* Consume the key directly */
+		rc = xConsumer(SyBlobData(&pCell->sKey),SyBlobLength(&pCell->sKey),pUserData);
+	}else{
+		/* Very large key */
+		rc = lhConsumeCellkey(pCell,xConsumer,pUserData,0);
+	}
 	return rc;
 }
 /*
- * Write the hash header (Page one).
- */
-static int lhash_write_header(lhash_kv_engine *pEngine,vedis_page *pHeader)
-{
-	unsigned char *zRaw = pHeader->zData;
-	lhash_bmap_page *pMap;
-
-	pEngine->pHeader = pHeader;
-	/* 4 byte magic number */
-	SyBigEndianPack32(zRaw,pEngine->nMagic);
-	zRaw += 4;
-	/* 4 byte hash value to identify a valid hash function */
-	SyBigEndianPack32(zRaw,pEngine->xHash(L_HASH_WORD,sizeof(L_HASH_WORD)-1));
-	zRaw += 4;
-	/* List of free pages: Empty */
-	SyBigEndianPack64(zRaw,0);
-	zRaw += 8;
-	/* Current split bucket */
-	SyBigEndianPack64(zRaw,pEngine->split_bucket);
-	zRaw += 8;
-	/* Maximum split bucket */
-	SyBigEndianPack64(zRaw,pEngine->max_split_bucket);
-	zRaw += 8;
-	/* Initialiaze the bucket map */
-	pMap = &pEngine->sPageMap;
-	/* Fill in the structure */
-	pMap->iNum = pHeader->pgno;
-	/* Next page in the bucket map */
-	SyBigEndianPack64(zRaw,0);
-	zRaw += 8;
-	/* Total number of records in the bucket map */
-	SyBigEndianPack32(zRaw,0);
-	zRaw += 4;
-	pMap->iPtr = (sxu16)(zRaw - pHeader->zData);
-	/* All done */
-	return VEDIS_OK;
- }
-/*
- * Exported: xOpen() method.
+ * Consume the data.
  */
-static int lhash_kv_open(vedis_kv_engine *pEngine,pgno dbSize)
+static int lhCursorData(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
-	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
-	vedis_page *pHeader;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
 	int rc;
-	if( dbSize < 1 ){
-		/* A new database, create the header */
-		rc = pEngine->pIo->xNew(pEngine->pIo->pHandle,&pHeader);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		/* Acquire a writer lock */
-		rc = pEngine->pIo->xWrite(pHeader);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		/* Write the hash header */
-		rc = lhash_write_header(pHash,pHeader);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-	}else{
-		/* Acquire the page one of the database */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,&pHeader);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		/* Read the database header */
-		rc = lhash_read_header(pHash,pHeader);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Invalid state */
+		return VEDIS_INVALID;
 	}
-	return VEDIS_OK;
+	/* Point to the target cell */
+	pCell = pCur->pCell;
+	/* Consume the data */
+	rc = lhConsumeCellData(pCell,xConsumer,pUserData);
+	return rc;
 }
 /*
- * Release a master or slave page. (xUnpin callback).
+ * Find a partiuclar record.
  */
-static void lhash_page_release(void *pUserData)
+static int lhCursorSeek(vedis_kv_cursor *pCursor,const void *pKey,int nByte,int iPos)
 {
-	lhpage *pPage = (lhpage *)pUserData;
-	lhash_kv_engine *pEngine = pPage->pHash;
-	lhcell *pNext,*pCell = pPage->pList;
-	vedis_page *pRaw = pPage->pRaw;
-	sxu32 n;
-	/* Drop in-memory cells */
-	for( n = 0 ; n < pPage->nCell ; ++n ){
-		pNext = pCell->pNext;
-		SyBlobRelease(&pCell->sKey);
-		/* Release the cell instance */
-		SyMemBackendPoolFree(&pEngine->sAllocator,(void *)pCell);
-		/* Point to the next entry */
-		pCell = pNext;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhash_bmap_rec *pRec;
+	int rc;
+	/* Perform a lookup */
+	rc = lhRecordLookup((lhash_kv_engine *)pCur->pStore,pKey,nByte,&pCur->pCell,&pRec);
+	if( rc != VEDIS_OK ){
+		SXUNUSED(iPos);
+		pCur->pCell = 0;
+		pCur->iState = L_HASH_CURSOR_STATE_DONE;
+		return rc;
 	}
-	if( pPage->apCell ){
-		/* Release the cell table */
-		SyMemBackendFree(&pEngine->sAllocator,(void *)pPage->apCell);
+	if( pCur->iState == L_HASH_CURSOR_STATE_CELL && pCur->pRaw ){
+		/* Unref the page we were processing */
+		pCur->pStore->pIo->xPageUnref(pCur->pRaw);
+		pCur->pRaw = 0;
 	}
-	/* Finally, release the whole page */
-	SyMemBackendPoolFree(&pEngine->sAllocator,pPage);
-	pRaw->pUserData = 0;
+	/* Advance the map cursor so that the next page load resume after the target bucket */
+	pCur->pRec = pRec->pPrev; /* Not a bug, reverse link */
+	pCur->is_first = 0;
+	pCur->iState = L_HASH_CURSOR_STATE_CELL;
+	return VEDIS_OK;
 }
 /*
- * Default hash function (DJB).
+ * Remove a particular record.
  */
-static sxu32 lhash_bin_hash(const void *pSrc,sxu32 nLen)
+static int lhCursorDelete(vedis_kv_cursor *pCursor)
 {
-	register unsigned char *zIn = (unsigned char *)pSrc;
-	unsigned char *zEnd;
-	sxu32 nH = 5381;
-	if( nLen > 2048 /* 2K */ ){
-		nLen = 2048;
+	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
+	lhcell *pCell;
+	int rc;
+	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
+		/* Invalid state */
+		return VEDIS_INVALID;
 	}
-	zEnd = &zIn[nLen];
-	for(;;){
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-	}	
-	return nH;
+	/* Point to the target cell  */
+	pCell = pCur->pCell;
+	/* Point to the next entry */
+	pCur->pCell = pCell->pNext;
+	/* Perform the deletion */
+	rc = lhRecordRemove(pCell);
+	return rc;
 }
 /*
- * Exported: xInit() method.
- * Initialize the Key value storage engine.
+ * Export the linear-hash storage engine.
  */
-static int lhash_kv_init(vedis_kv_engine *pEngine,int iPageSize)
+VEDIS_PRIVATE const vedis_kv_methods * vedisExportDiskKvStorage(void)
 {
-	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
-	int rc;
-
-	/* This structure is always zeroed, go to the initialization directly */
-	SyMemBackendInitFromParent(&pHash->sAllocator,vedisExportMemBackend());
-#if defined(VEDIS_ENABLE_THREADS)
-	/* Already protected by the upper layers */
-	SyMemBackendDisbaleMutexing(&pHash->sAllocator);
-#endif
-	pHash->iPageSize = iPageSize;
-	/* Default hash function */
-	pHash->xHash = lhash_bin_hash;
-	/* Default comparison function */
-	pHash->xCmp = SyMemcmp;
-	/* Allocate a new record map */
-	pHash->nBuckSize = 32;
-	pHash->apMap = (lhash_bmap_rec **)SyMemBackendAlloc(&pHash->sAllocator,pHash->nBuckSize *sizeof(lhash_bmap_rec *));
-	if( pHash->apMap == 0 ){
-		rc = VEDIS_NOMEM;
-		goto err;
-	}
-	/* Zero the table */
-	SyZero(pHash->apMap,pHash->nBuckSize * sizeof(lhash_bmap_rec *));
-	/* Linear hashing components */
-	pHash->split_bucket = 0; /* Logical not real bucket number */
-	pHash->max_split_bucket = 1;
-	pHash->nmax_split_nucket = 2;
-	pHash->nMagic = L_HASH_MAGIC;
-	/* Install the cache unpin and reload callbacks */
-	pHash->pIo->xSetUnpin(pHash->pIo->pHandle,lhash_page_release);
-	pHash->pIo->xSetReload(pHash->pIo->pHandle,lhash_page_release);
-	return VEDIS_OK;
-err:
-	SyMemBackendRelease(&pHash->sAllocator);
-	return rc;
+	static const vedis_kv_methods sDiskStore = {
+		"hash",                     /* zName */
+		sizeof(lhash_kv_engine),    /* szKv */
+		sizeof(lhash_kv_cursor),    /* szCursor */
+		1,                          /* iVersion */
+		lhash_kv_init,              /* xInit */
+		lhash_kv_release,           /* xRelease */
+		lhash_kv_config,            /* xConfig */
+		lhash_kv_open,              /* xOpen */
+		lhash_kv_replace,           /* xReplace */
+		lhash_kv_append,            /* xAppend */
+		lhInitCursor,               /* xCursorInit */
+		lhCursorSeek,               /* xSeek */
+		lhCursorFirst,              /* xFirst */
+		lhCursorLast,               /* xLast */
+		lhCursorValid,              /* xValid */
+		lhCursorNext,               /* xNext */
+		lhCursorPrev,               /* xPrev */
+		lhCursorDelete,             /* xDelete */
+		lhCursorKeyLength,          /* xKeyLength */
+		lhCursorKey,                /* xKey */
+		lhCursorDataLength,         /* xDataLength */
+		lhCursorData,               /* xData */
+		lhCursorReset,              /* xReset */
+		0                           /* xRelease */                        
+	};
+	return &sDiskStore;
 }
 /*
- * Exported: xRelease() method.
- * Release the Key value storage engine.
+ * ----------------------------------------------------------
+ * File: json.c
+ * MD5: a4aef01e657e37d9ace4729b9205976c
+ * ----------------------------------------------------------
  */
-static void lhash_kv_release(vedis_kv_engine *pEngine)
-{
-	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
-	/* Release the private memory backend */
-	SyMemBackendRelease(&pHash->sAllocator);
-}
 /*
- *  Exported: xConfig() method.
- *  Configure the linear hash KV store.
+ * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
+ * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
+ * Version 1.2.6
+ * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
+ * please contact Symisc Systems via:
+ *       legal@symisc.net
+ *       licensing@symisc.net
+ *       contact@symisc.net
+ * or visit:
+ *      http://vedis.symisc.net/
  */
-static int lhash_kv_config(vedis_kv_engine *pEngine,int op,va_list ap)
-{
-	lhash_kv_engine *pHash = (lhash_kv_engine *)pEngine;
-	int rc = VEDIS_OK;
-	switch(op){
-	case VEDIS_KV_CONFIG_HASH_FUNC: {
-		/* Default hash function */
-		if( pHash->nBuckRec > 0 ){
-			/* Locked operation */
-			rc = VEDIS_LOCKED;
-		}else{
-			ProcHash xHash = va_arg(ap,ProcHash);
-			if( xHash ){
-				pHash->xHash = xHash;
-			}
-		}
-		break;
-									  }
-	case VEDIS_KV_CONFIG_CMP_FUNC: {
-		/* Default comparison function */
-		ProcCmp xCmp = va_arg(ap,ProcCmp);
-		if( xCmp ){
-			pHash->xCmp  = xCmp;
-		}
-		break;
-									 }
-	default:
-		/* Unknown OP */
-		rc = VEDIS_UNKNOWN;
-		break;
-	}
-	return rc;
-}
+ /* $SymiscID: json.c v1.0 FreeBSD 2012-12-16 00:28 stable <chm@symisc.net> $ */
+#ifndef VEDIS_AMALGAMATION
+#include "vedisInt.h"
+#endif
+/* This file deals with JSON serialization, decoding and stuff like that. */
 /*
- * Each public cursor is identified by an instance of this structure.
+ * Section: 
+ *  JSON encoding/decoding routines.
+ * Authors:
+ *  Symisc Systems, devel@symisc.net.
+ *  Copyright (C) Symisc Systems, http://vedis.symisc.net
+ * Status:
+ *    Devel.
  */
-typedef struct lhash_kv_cursor lhash_kv_cursor;
-struct lhash_kv_cursor
+/* Forward reference */
+static int VmJsonArrayEncode(vedis_value *pValue, void *pUserData);
+/* 
+ * JSON encoder state is stored in an instance 
+ * of the following structure.
+ */
+typedef struct json_private_data json_private_data;
+struct json_private_data
 {
-	vedis_kv_engine *pStore; /* Must be first */
-	/* Private fields */
-	int iState;           /* Current state of the cursor */
-	int is_first;         /* True to read the database header */
-	lhcell *pCell;        /* Current cell we are processing */
-	vedis_page *pRaw;   /* Raw disk page */
-	lhash_bmap_rec *pRec; /* Logical to real bucket map */
+	SyBlob *pOut;      /* Output consumer buffer */
+	int isFirst;       /* True if first encoded entry */
+	int iFlags;        /* JSON encoding flags */
+	int nRecCount;     /* Recursion count */
 };
-/* 
- * Possible state of the cursor
+/*
+ * Returns the JSON representation of a value.In other word perform a JSON encoding operation.
+ * According to wikipedia
+ * JSON's basic types are:
+ *   Number (double precision floating-point format in JavaScript, generally depends on implementation)
+ *   String (double-quoted Unicode, with backslash escaping)
+ *   Boolean (true or false)
+ *   Array (an ordered sequence of values, comma-separated and enclosed in square brackets; the values
+ *    do not need to be of the same type)
+ *   Object (an unordered collection of key:value pairs with the ':' character separating the key 
+ *     and the value, comma-separated and enclosed in curly braces; the keys must be strings and should
+ *     be distinct from each other)
+ *   null (empty)
+ * Non-significant white space may be added freely around the "structural characters"
+ * (i.e. the brackets "[{]}", colon ":" and comma ",").
  */
-#define L_HASH_CURSOR_STATE_NEXT_PAGE 1 /* Next page in the list */
-#define L_HASH_CURSOR_STATE_CELL      2 /* Processing Cell */
-#define L_HASH_CURSOR_STATE_DONE      3 /* Cursor does not point to anything */
+static sxi32 VmJsonEncode(
+	vedis_value *pIn,          /* Encode this value */
+	json_private_data *pData /* Context data */
+	){
+		SyBlob *pOut = pData->pOut;
+		int nByte;
+		if( vedis_value_is_null(pIn) ){
+			/* null */
+			SyBlobAppend(pOut, "null", sizeof("null")-1);
+		}else if( vedis_value_is_bool(pIn) ){
+			int iBool = vedis_value_to_bool(pIn);
+			sxu32 iLen;
+			/* true/false */
+			iLen = iBool ? sizeof("true") : sizeof("false");
+			SyBlobAppend(pOut, iBool ? "true" : "false", iLen-1);
+		}else if(  vedis_value_is_numeric(pIn) && !vedis_value_is_string(pIn) ){
+			const char *zNum;
+			/* Get a string representation of the number */
+			zNum = vedis_value_to_string(pIn, &nByte);
+			SyBlobAppend(pOut,zNum,nByte);
+		}else if( vedis_value_is_string(pIn) ){
+				const char *zIn, *zEnd;
+				int c;
+				/* Encode the string */
+				zIn = vedis_value_to_string(pIn, &nByte);
+				zEnd = &zIn[nByte];
+				/* Append the double quote */
+				SyBlobAppend(pOut,"\"", sizeof(char));
+				for(;;){
+					if( zIn >= zEnd ){
+						/* No more input to process */
+						break;
+					}
+					c = zIn[0];
+					/* Advance the stream cursor */
+					zIn++;
+					if( c == '"' || c == '\\' ){
+						/* Unescape the character */
+						SyBlobAppend(pOut,"\\", sizeof(char));
+					}
+					/* Append character verbatim */
+					SyBlobAppend(pOut,(const char *)&c,sizeof(char));
+				}
+				/* Append the double quote */
+				SyBlobAppend(pOut,"\"",sizeof(char));
+		}else if( vedis_value_is_array(pIn) ){
+			/* Encode the array/object */
+			pData->isFirst = 1;
+			/* Append the square bracket or curly braces */
+			SyBlobAppend(pOut,"[",sizeof(char));
+			/* Iterate over array entries */
+			vedis_array_walk(pIn, VmJsonArrayEncode, pData);
+			/* Append the closing square bracket or curly braces */
+			SyBlobAppend(pOut,"]",sizeof(char));
+		}else{
+			/* Can't happen */
+			SyBlobAppend(pOut,"null",sizeof("null")-1);
+		}
+		/* All done */
+		return VEDIS_OK;
+}
 /*
- * Initialize the cursor.
+ * The following walker callback is invoked each time we need
+ * to encode an array to JSON.
  */
-static void lhInitCursor(vedis_kv_cursor *pPtr)
+static int VmJsonArrayEncode(vedis_value *pValue, void *pUserData)
 {
-	 lhash_kv_engine *pEngine = (lhash_kv_engine *)pPtr->pStore;
-	 lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
-	 /* Init */
-	 pCur->iState = L_HASH_CURSOR_STATE_NEXT_PAGE;
-	 pCur->pCell = 0;
-	 pCur->pRec = pEngine->pFirst;
-	 pCur->pRaw = 0;
-	 pCur->is_first = 1;
+	json_private_data *pJson = (json_private_data *)pUserData;
+	if( pJson->nRecCount > 31 ){
+		/* Recursion limit reached, return immediately */
+		return VEDIS_OK;
+	}
+	if( !pJson->isFirst ){
+		/* Append the colon first */
+		SyBlobAppend(pJson->pOut,",",(int)sizeof(char));
+	}
+	/* Encode the value */
+	pJson->nRecCount++;
+	VmJsonEncode(pValue, pJson);
+	pJson->nRecCount--;
+	pJson->isFirst = 0;
+	return VEDIS_OK;
 }
+#if 0
 /*
- * Point to the next page on the database.
+ * The following walker callback is invoked each time we need to encode
+ * a object instance [i.e: Object in the VEDIS jargon] to JSON.
  */
-static int lhCursorNextPage(lhash_kv_cursor *pPtr)
+static int VmJsonObjectEncode(vedis_value *pKey,vedis_value *pValue,void *pUserData)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
-	lhash_bmap_rec *pRec;
-	lhpage *pPage;
-	int rc;
-	for(;;){
-		pRec = pCur->pRec;
-		if( pRec == 0 ){
-			pCur->iState = L_HASH_CURSOR_STATE_DONE;
-			return VEDIS_DONE;
-		}
-		if( pPtr->iState == L_HASH_CURSOR_STATE_CELL && pPtr->pRaw ){
-			/* Unref this page */
-			pCur->pStore->pIo->xPageUnref(pPtr->pRaw);
-			pPtr->pRaw = 0;
-		}
-		/* Advance the map cursor */
-		pCur->pRec = pRec->pPrev; /* Not a bug, reverse link */
-		/* Load the next page on the list */
-		rc = lhLoadPage((lhash_kv_engine *)pCur->pStore,pRec->iReal,0,&pPage,0);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		if( pPage->pList ){
-			/* Reflect the change */
-			pCur->pCell = pPage->pList;
-			pCur->iState = L_HASH_CURSOR_STATE_CELL;
-			pCur->pRaw = pPage->pRaw;
-			break;
-		}
-		/* Empty page, discard this page and continue */
-		pPage->pHash->pIo->xPageUnref(pPage->pRaw);
+	json_private_data *pJson = (json_private_data *)pUserData;
+	const char *zKey;
+	int nByte;
+	if( pJson->nRecCount > 31 ){
+		/* Recursion limit reached, return immediately */
+		return VEDIS_OK;
+	}
+	if( !pJson->isFirst ){
+		/* Append the colon first */
+		SyBlobAppend(pJson->pOut,",",sizeof(char));
+	}
+	/* Extract a string representation of the key */
+	zKey = vedis_value_to_string(pKey, &nByte);
+	/* Append the key and the double colon */
+	if( nByte > 0 ){
+		SyBlobAppend(pJson->pOut,"\"",sizeof(char));
+		SyBlobAppend(pJson->pOut,zKey,(sxu32)nByte);
+		SyBlobAppend(pJson->pOut,"\"",sizeof(char));
+	}else{
+		/* Can't happen */
+		SyBlobAppend(pJson->pOut,"null",sizeof("null")-1);
 	}
+	SyBlobAppend(pJson->pOut,":",sizeof(char));
+	/* Encode the value */
+	pJson->nRecCount++;
+	VmJsonEncode(pValue, pJson);
+	pJson->nRecCount--;
+	pJson->isFirst = 0;
 	return VEDIS_OK;
 }
+#endif
 /*
- * Point to the previous page on the database.
+ *  Returns a string containing the JSON representation of value. 
+ *  In other words, perform the serialization of the given JSON object.
  */
-static int lhCursorPrevPage(lhash_kv_cursor *pPtr)
+VEDIS_PRIVATE int vedisJsonSerialize(vedis_value *pValue,SyBlob *pOut)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
-	lhash_bmap_rec *pRec;
-	lhpage *pPage;
-	int rc;
-	for(;;){
-		pRec = pCur->pRec;
-		if( pRec == 0 ){
-			pCur->iState = L_HASH_CURSOR_STATE_DONE;
-			return VEDIS_DONE;
-		}
-		if( pPtr->iState == L_HASH_CURSOR_STATE_CELL && pPtr->pRaw ){
-			/* Unref this page */
-			pCur->pStore->pIo->xPageUnref(pPtr->pRaw);
-			pPtr->pRaw = 0;
-		}
-		/* Advance the map cursor */
-		pCur->pRec = pRec->pNext; /* Not a bug, reverse link */
-		/* Load the previous page on the list */
-		rc = lhLoadPage((lhash_kv_engine *)pCur->pStore,pRec->iReal,0,&pPage,0);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		if( pPage->pFirst ){
-			/* Reflect the change */
-			pCur->pCell = pPage->pFirst;
-			pCur->iState = L_HASH_CURSOR_STATE_CELL;
-			pCur->pRaw = pPage->pRaw;
-			break;
-		}
-		/* Discard this page and continue */
-		pPage->pHash->pIo->xPageUnref(pPage->pRaw);
-	}
+	json_private_data sJson;
+	/* Prepare the JSON data */
+	sJson.nRecCount = 0;
+	sJson.pOut = pOut;
+	sJson.isFirst = 1;
+	sJson.iFlags = 0;
+	/* Perform the encoding operation */
+	VmJsonEncode(pValue, &sJson);
+	/* All done */
 	return VEDIS_OK;
 }
 /*
- * Is a valid cursor.
+ * ----------------------------------------------------------
+ * File: hashmap.c
+ * MD5: 8b3d7bf394c07e7c5442c871607e1f96
+ * ----------------------------------------------------------
  */
-static int lhCursorValid(vedis_kv_cursor *pPtr)
+/*
+ * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
+ * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
+ * Version 1.2.6
+ * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
+ * please contact Symisc Systems via:
+ *       legal@symisc.net
+ *       licensing@symisc.net
+ *       contact@symisc.net
+ * or visit:
+ *      http://vedis.symisc.net/
+ */
+/* $SymiscID: hashmap.c v1.2 FreeBSD 2013-07-20 06:09 stable <chm@symisc.net> $ */
+#ifndef VEDIS_AMALGAMATION
+#include "vedisInt.h"
+#endif
+/*
+ * Each hashmap entry [i.e: array(4, 5, 6)] is recorded in an instance
+ * of the following structure.
+ */
+struct vedis_hashmap_node
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pPtr;
-	return (pCur->iState == L_HASH_CURSOR_STATE_CELL) && pCur->pCell;
+	vedis_hashmap *pMap;     /* Hashmap that own this instance */
+	sxi32 iType;           /* Node type */
+	union{
+		sxi64 iKey;        /* Int key */
+		SyBlob sKey;       /* Blob key */
+	}xKey;
+	sxi32 iFlags;          /* Control flags */
+	sxu32 nHash;           /* Key hash value */
+	vedis_value sValue;    /* Node value */
+	vedis_hashmap_node *pNext, *pPrev;               /* Link to other entries [i.e: linear traversal] */
+	vedis_hashmap_node *pNextCollide, *pPrevCollide; /* Collision chain */
+};
+/* 
+ * Each active hashmap is represented by an instance of the following structure.
+ */
+struct vedis_hashmap
+{
+	vedis  *pStore;                  /* Store that own this instance */
+	vedis_hashmap_node **apBucket;  /* Hash bucket */
+	vedis_hashmap_node *pFirst;     /* First inserted entry */
+	vedis_hashmap_node *pLast;      /* Last inserted entry */
+	vedis_hashmap_node *pCur;       /* Current entry */
+	sxu32 nSize;                  /* Bucket size */
+	sxu32 nEntry;                 /* Total number of inserted entries */
+	sxu32 (*xIntHash)(sxi64);     /* Hash function for int_keys */
+	sxu32 (*xBlobHash)(const void *, sxu32); /* Hash function for blob_keys */
+	sxi32 iFlags;                 /* Hashmap control flags */
+	sxi64 iNextIdx;               /* Next available automatically assigned index */
+	sxi32 iRef;                   /* Reference count */
+};
+/* Allowed node types */
+#define HASHMAP_INT_NODE   1  /* Node with an int [i.e: 64-bit integer] key */
+#define HASHMAP_BLOB_NODE  2  /* Node with a string/BLOB key */
+/*
+ * Default hash function for int [i.e; 64-bit integer] keys.
+ */
+static sxu32 IntHash(sxi64 iKey)
+{
+	return (sxu32)(iKey ^ (iKey << 8) ^ (iKey >> 8));
 }
 /*
- * Point to the first record.
+ * Default hash function for string/BLOB keys.
  */
-static int lhCursorFirst(vedis_kv_cursor *pCursor)
+static sxu32 BinHash(const void *pSrc, sxu32 nLen)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhash_kv_engine *pEngine = (lhash_kv_engine *)pCursor->pStore;
-	int rc;
-	if( pCur->is_first ){
-		/* Read the database header first */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		pCur->is_first = 0;
-	}
-	/* Point to the first map record */
-	pCur->pRec = pEngine->pFirst;
-	/* Load the cells */
-	rc = lhCursorNextPage(pCur);
-	return rc;
+	register unsigned char *zIn = (unsigned char *)pSrc;
+	unsigned char *zEnd;
+	sxu32 nH = 5381;
+	zEnd = &zIn[nLen];
+	for(;;){
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
+	}	
+	return nH;
 }
 /*
- * Point to the last record.
+ * Return the total number of entries in a given hashmap.
  */
-static int lhCursorLast(vedis_kv_cursor *pCursor)
+VEDIS_PRIVATE sxu32 vedisHashmapCount(vedis_hashmap *pMap)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhash_kv_engine *pEngine = (lhash_kv_engine *)pCursor->pStore;
-	int rc;
-	if( pCur->is_first ){
-		/* Read the database header first */
-		rc = pEngine->pIo->xGet(pEngine->pIo->pHandle,1,0);
-		if( rc != VEDIS_OK ){
-			return rc;
-		}
-		pCur->is_first = 0;
-	}
-	/* Point to the last map record */
-	pCur->pRec = pEngine->pList;
-	/* Load the cells */
-	rc = lhCursorPrevPage(pCur);
-	return rc;
+	return pMap->nEntry;
 }
 /*
- * Reset the cursor.
+ * Allocate a new hashmap node with a 64-bit integer key.
+ * If something goes wrong [i.e: out of memory], this function return NULL.
+ * Otherwise a fresh [vedis_hashmap_node] instance is returned.
  */
-static void lhCursorReset(vedis_kv_cursor *pCursor)
+static vedis_hashmap_node * HashmapNewIntNode(vedis_hashmap *pMap, sxi64 iKey, sxu32 nHash,vedis_value *pValue)
 {
-	lhCursorFirst(pCursor);
+	vedis_hashmap_node *pNode;
+	/* Allocate a new node */
+	pNode = (vedis_hashmap_node *)SyMemBackendPoolAlloc(&pMap->pStore->sMem, sizeof(vedis_hashmap_node));
+	if( pNode == 0 ){
+		return 0;
+	}
+	/* Zero the stucture */
+	SyZero(pNode, sizeof(vedis_hashmap_node));
+	/* Fill in the structure */
+	pNode->pMap  = &(*pMap);
+	pNode->iType = HASHMAP_INT_NODE;
+	pNode->nHash = nHash;
+	pNode->xKey.iKey = iKey;
+	/* Duplicate the value */
+	vedisMemObjInit(pMap->pStore,&pNode->sValue);
+	if( pValue ){
+		vedisMemObjStore(pValue,&pNode->sValue);
+	}
+	return pNode;
 }
 /*
- * Point to the next record.
+ * Allocate a new hashmap node with a BLOB key.
+ * If something goes wrong [i.e: out of memory], this function return NULL.
+ * Otherwise a fresh [vedis_hashmap_node] instance is returned.
  */
-static int lhCursorNext(vedis_kv_cursor *pCursor)
+static vedis_hashmap_node * HashmapNewBlobNode(vedis_hashmap *pMap, const void *pKey, sxu32 nKeyLen, sxu32 nHash,vedis_value *pValue)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	int rc;
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Load the cells of the next page  */
-		rc = lhCursorNextPage(pCur);
-		return rc;
+	vedis_hashmap_node *pNode;
+	/* Allocate a new node */
+	pNode = (vedis_hashmap_node *)SyMemBackendPoolAlloc(&pMap->pStore->sMem, sizeof(vedis_hashmap_node));
+	if( pNode == 0 ){
+		return 0;
 	}
-	pCell = pCur->pCell;
-	pCur->pCell = pCell->pNext;
-	if( pCur->pCell == 0 ){
-		/* Load the cells of the next page  */
-		rc = lhCursorNextPage(pCur);
-		return rc;
+	/* Zero the stucture */
+	SyZero(pNode, sizeof(vedis_hashmap_node));
+	/* Fill in the structure */
+	pNode->pMap  = &(*pMap);
+	pNode->iType = HASHMAP_BLOB_NODE;
+	pNode->nHash = nHash;
+	SyBlobInit(&pNode->xKey.sKey, &pMap->pStore->sMem);
+	SyBlobAppend(&pNode->xKey.sKey, pKey, nKeyLen);
+	/* Duplicate the value */
+	vedisMemObjInit(pMap->pStore,&pNode->sValue);
+	if( pValue ){
+		vedisMemObjStore(pValue,&pNode->sValue);
 	}
-	return VEDIS_OK;
+	return pNode;
 }
 /*
- * Point to the previous record.
+ * link a hashmap node to the given bucket index (last argument to this function).
  */
-static int lhCursorPrev(vedis_kv_cursor *pCursor)
+static void HashmapNodeLink(vedis_hashmap *pMap, vedis_hashmap_node *pNode, sxu32 nBucketIdx)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	int rc;
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Load the cells of the previous page  */
-		rc = lhCursorPrevPage(pCur);
-		return rc;
+	/* Link */
+	if( pMap->apBucket[nBucketIdx] != 0 ){
+		pNode->pNextCollide = pMap->apBucket[nBucketIdx];
+		pMap->apBucket[nBucketIdx]->pPrevCollide = pNode;
 	}
-	pCell = pCur->pCell;
-	pCur->pCell = pCell->pPrev;
-	if( pCur->pCell == 0 ){
-		/* Load the cells of the previous page  */
-		rc = lhCursorPrevPage(pCur);
-		return rc;
+	pMap->apBucket[nBucketIdx] = pNode;
+	/* Link to the map list */
+	if( pMap->pFirst == 0 ){
+		pMap->pFirst = pMap->pLast = pNode;
+		/* Point to the first inserted node */
+		pMap->pCur = pNode;
+	}else{
+		MACRO_LD_PUSH(pMap->pLast, pNode);
 	}
-	return VEDIS_OK;
+	++pMap->nEntry;
 }
+#define HASHMAP_FILL_FACTOR 3
 /*
- * Return key length.
+ * Grow the hash-table and rehash all entries.
  */
-static int lhCursorKeyLength(vedis_kv_cursor *pCursor,int *pLen)
+static sxi32 HashmapGrowBucket(vedis_hashmap *pMap)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Invalid state */
-		return VEDIS_INVALID;
+	if( pMap->nEntry >= pMap->nSize * HASHMAP_FILL_FACTOR ){
+		vedis_hashmap_node **apOld = pMap->apBucket;
+		vedis_hashmap_node *pEntry, **apNew;
+		sxu32 nNew = pMap->nSize << 1;
+		sxu32 nBucket;
+		sxu32 n;
+		if( nNew < 1 ){
+			nNew = 16;
+		}
+		/* Allocate a new bucket */
+		apNew = (vedis_hashmap_node **)SyMemBackendAlloc(&pMap->pStore->sMem, nNew * sizeof(vedis_hashmap_node *));
+		if( apNew == 0 ){
+			if( pMap->nSize < 1 ){
+				return SXERR_MEM; /* Fatal */
+			}
+			/* Not so fatal here, simply a performance hit */
+			return SXRET_OK;
+		}
+		/* Zero the table */
+		SyZero((void *)apNew, nNew * sizeof(vedis_hashmap_node *));
+		/* Reflect the change */
+		pMap->apBucket = apNew;
+		pMap->nSize = nNew;
+		if( apOld == 0 ){
+			/* First allocated table [i.e: no entry], return immediately */
+			return SXRET_OK;
+		}
+		/* Rehash old entries */
+		pEntry = pMap->pFirst;
+		n = 0;
+		for( ;; ){
+			if( n >= pMap->nEntry ){
+				break;
+			}
+			/* Clear the old collision link */
+			pEntry->pNextCollide = pEntry->pPrevCollide = 0;
+			/* Link to the new bucket */
+			nBucket = pEntry->nHash & (nNew - 1);
+			if( pMap->apBucket[nBucket] != 0 ){
+				pEntry->pNextCollide = pMap->apBucket[nBucket];
+				pMap->apBucket[nBucket]->pPrevCollide = pEntry;
+			}
+			pMap->apBucket[nBucket] = pEntry;
+			/* Point to the next entry */
+			pEntry = pEntry->pPrev; /* Reverse link */
+			n++;
+		}
+		/* Free the old table */
+		SyMemBackendFree(&pMap->pStore->sMem, (void *)apOld);
 	}
-	/* Point to the target cell */
-	pCell = pCur->pCell;
-	/* Return key length */
-	*pLen = (int)pCell->nKey;
-	return VEDIS_OK;
+	return SXRET_OK;
 }
 /*
- * Return data length.
+ * Insert a 64-bit integer key and it's associated value (if any) in the given
+ * hashmap.
  */
-static int lhCursorDataLength(vedis_kv_cursor *pCursor,vedis_int64 *pLen)
+static sxi32 HashmapInsertIntKey(vedis_hashmap *pMap,sxi64 iKey,vedis_value *pValue)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
+	vedis_hashmap_node *pNode;
+	sxu32 nHash;
+	sxi32 rc;
 	
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Invalid state */
-		return VEDIS_INVALID;
+	/* Hash the key */
+	nHash = pMap->xIntHash(iKey);
+	/* Allocate a new int node */
+	pNode = HashmapNewIntNode(&(*pMap), iKey, nHash, pValue);
+	if( pNode == 0 ){
+		return SXERR_MEM;
 	}
-	/* Point to the target cell */
-	pCell = pCur->pCell;
-	/* Return data length */
-	*pLen = (vedis_int64)pCell->nData;
-	return VEDIS_OK;
+	/* Make sure the bucket is big enough to hold the new entry */
+	rc = HashmapGrowBucket(&(*pMap));
+	if( rc != SXRET_OK ){
+		SyMemBackendPoolFree(&pMap->pStore->sMem, pNode);
+		return rc;
+	}
+	/* Perform the insertion */
+	HashmapNodeLink(&(*pMap), pNode, nHash & (pMap->nSize - 1));
+	/* All done */
+	return SXRET_OK;
 }
 /*
- * Consume the key.
+ * Insert a BLOB key and it's associated value (if any) in the given
+ * hashmap.
  */
-static int lhCursorKey(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+static sxi32 HashmapInsertBlobKey(vedis_hashmap *pMap,const void *pKey,sxu32 nKeyLen,vedis_value *pValue)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	int rc;
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Invalid state */
-		return VEDIS_INVALID;
+	vedis_hashmap_node *pNode;
+	sxu32 nHash;
+	sxi32 rc;
+	
+	/* Hash the key */
+	nHash = pMap->xBlobHash(pKey, nKeyLen);
+	/* Allocate a new blob node */
+	pNode = HashmapNewBlobNode(&(*pMap), pKey, nKeyLen, nHash,pValue);
+	if( pNode == 0 ){
+		return SXERR_MEM;
 	}
-	/* Point to the target cell */
-	pCell = pCur->pCell;
-	if( SyBlobLength(&pCell->sKey) > 0 ){
-		/* Consume the key directly */
-		rc = xConsumer(SyBlobData(&pCell->sKey),SyBlobLength(&pCell->sKey),pUserData);
-	}else{
-		/* Very large key */
-		rc = lhConsumeCellkey(pCell,xConsumer,pUserData,0);
+	/* Make sure the bucket is big enough to hold the new entry */
+	rc = HashmapGrowBucket(&(*pMap));
+	if( rc != SXRET_OK ){
+		SyMemBackendPoolFree(&pMap->pStore->sMem, pNode);
+		return rc;
 	}
-	return rc;
+	/* Perform the insertion */
+	HashmapNodeLink(&(*pMap), pNode, nHash & (pMap->nSize - 1));
+	/* All done */
+	return SXRET_OK;
 }
 /*
- * Consume the data.
+ * Check if a given 64-bit integer key exists in the given hashmap.
+ * Write a pointer to the target node on success. Otherwise
+ * SXERR_NOTFOUND is returned on failure.
  */
-static int lhCursorData(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+static sxi32 HashmapLookupIntKey(
+	vedis_hashmap *pMap,         /* Target hashmap */
+	sxi64 iKey,                /* lookup key */
+	vedis_hashmap_node **ppNode  /* OUT: target node on success */
+	)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	int rc;
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Invalid state */
-		return VEDIS_INVALID;
+	vedis_hashmap_node *pNode;
+	sxu32 nHash;
+	if( pMap->nEntry < 1 ){
+		/* Don't bother hashing, there is no entry anyway */
+		return SXERR_NOTFOUND;
 	}
-	/* Point to the target cell */
-	pCell = pCur->pCell;
-	/* Consume the data */
-	rc = lhConsumeCellData(pCell,xConsumer,pUserData);
-	return rc;
+	/* Hash the key first */
+	nHash = pMap->xIntHash(iKey);
+	/* Point to the appropriate bucket */
+	pNode = pMap->apBucket[nHash & (pMap->nSize - 1)];
+	/* Perform the lookup */
+	for(;;){
+		if( pNode == 0 ){
+			break;
+		}
+		if( pNode->iType == HASHMAP_INT_NODE
+			&& pNode->nHash == nHash
+			&& pNode->xKey.iKey == iKey ){
+				/* Node found */
+				if( ppNode ){
+					*ppNode = pNode;
+				}
+				return SXRET_OK;
+		}
+		/* Follow the collision link */
+		pNode = pNode->pNextCollide;
+	}
+	/* No such entry */
+	return SXERR_NOTFOUND;
 }
 /*
- * Find a partiuclar record.
+ * Check if a given BLOB key exists in the given hashmap.
+ * Write a pointer to the target node on success. Otherwise
+ * SXERR_NOTFOUND is returned on failure.
  */
-static int lhCursorSeek(vedis_kv_cursor *pCursor,const void *pKey,int nByte,int iPos)
+static sxi32 HashmapLookupBlobKey(
+	vedis_hashmap *pMap,          /* Target hashmap */
+	const void *pKey,           /* Lookup key */
+	sxu32 nKeyLen,              /* Key length in bytes */
+	vedis_hashmap_node **ppNode   /* OUT: target node on success */
+	)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	int rc;
-	/* Perform a lookup */
-	rc = lhRecordLookup((lhash_kv_engine *)pCur->pStore,pKey,nByte,&pCur->pCell);
-	if( rc != VEDIS_OK ){
-		SXUNUSED(iPos);
-		pCur->pCell = 0;
-		pCur->iState = L_HASH_CURSOR_STATE_DONE;
-		return rc;
+	vedis_hashmap_node *pNode;
+	sxu32 nHash;
+	if( pMap->nEntry < 1 ){
+		/* Don't bother hashing, there is no entry anyway */
+		return SXERR_NOTFOUND;
 	}
-	pCur->iState = L_HASH_CURSOR_STATE_CELL;
-	return VEDIS_OK;
+	/* Hash the key first */
+	nHash = pMap->xBlobHash(pKey, nKeyLen);
+	/* Point to the appropriate bucket */
+	pNode = pMap->apBucket[nHash & (pMap->nSize - 1)];
+	/* Perform the lookup */
+	for(;;){
+		if( pNode == 0 ){
+			break;
+		}
+		if( pNode->iType == HASHMAP_BLOB_NODE 
+			&& pNode->nHash == nHash
+			&& SyBlobLength(&pNode->xKey.sKey) == nKeyLen 
+			&& SyMemcmp(SyBlobData(&pNode->xKey.sKey), pKey, nKeyLen) == 0 ){
+				/* Node found */
+				if( ppNode ){
+					*ppNode = pNode;
+				}
+				return SXRET_OK;
+		}
+		/* Follow the collision link */
+		pNode = pNode->pNextCollide;
+	}
+	/* No such entry */
+	return SXERR_NOTFOUND;
 }
 /*
- * Remove a particular record.
+ * Check if a given key exists in the given hashmap.
+ * Write a pointer to the target node on success.
+ * Otherwise SXERR_NOTFOUND is returned on failure.
  */
-static int lhCursorDelete(vedis_kv_cursor *pCursor)
+static sxi32 HashmapLookup(
+	vedis_hashmap *pMap,          /* Target hashmap */
+	vedis_value *pKey,            /* Lookup key */
+	vedis_hashmap_node **ppNode   /* OUT: target node on success */
+	)
 {
-	lhash_kv_cursor *pCur = (lhash_kv_cursor *)pCursor;
-	lhcell *pCell;
-	int rc;
-	if( pCur->iState != L_HASH_CURSOR_STATE_CELL || pCur->pCell == 0 ){
-		/* Invalid state */
-		return VEDIS_INVALID;
+	vedis_hashmap_node *pNode = 0; /* cc -O6 warning */
+	sxi32 rc;
+	if( pKey->iFlags & (MEMOBJ_STRING|MEMOBJ_HASHMAP) ){
+		if( (pKey->iFlags & MEMOBJ_STRING) == 0 ){
+			/* Force a string cast */
+			vedisMemObjToString(&(*pKey));
+		}
+		if( SyBlobLength(&pKey->sBlob) > 0 ){
+			/* Perform a blob lookup */
+			rc = HashmapLookupBlobKey(&(*pMap), SyBlobData(&pKey->sBlob), SyBlobLength(&pKey->sBlob), &pNode);
+			goto result;
+		}
 	}
-	/* Point to the target cell  */
-	pCell = pCur->pCell;
-	/* Point to the next entry */
-	pCur->pCell = pCell->pNext;
-	/* Perform the deletion */
-	rc = lhRecordRemove(pCell);
-	return rc;
+	/* Perform an int lookup */
+	if((pKey->iFlags & MEMOBJ_INT) == 0 ){
+		/* Force an integer cast */
+		vedisMemObjToInteger(pKey);
+	}
+	/* Perform an int lookup */
+	rc = HashmapLookupIntKey(&(*pMap), pKey->x.iVal, &pNode);
+result:
+	if( rc == SXRET_OK ){
+		/* Node found */
+		if( ppNode ){
+			*ppNode = pNode;
+		}
+		return SXRET_OK;
+	}
+	/* No such entry */
+	return SXERR_NOTFOUND;
 }
 /*
- * Export the linear-hash storage engine.
+ * Check if the given BLOB key looks like a decimal number. 
+ * Retrurn TRUE on success.FALSE otherwise.
  */
-VEDIS_PRIVATE const vedis_kv_methods * vedisExportDiskKvStorage(void)
+static int HashmapIsIntKey(SyBlob *pKey)
 {
-	static const vedis_kv_methods sDiskStore = {
-		"hash",                     /* zName */
-		sizeof(lhash_kv_engine),    /* szKv */
-		sizeof(lhash_kv_cursor),    /* szCursor */
-		1,                          /* iVersion */
-		lhash_kv_init,              /* xInit */
-		lhash_kv_release,           /* xRelease */
-		lhash_kv_config,            /* xConfig */
-		lhash_kv_open,              /* xOpen */
-		lhash_kv_replace,           /* xReplace */
-		lhash_kv_append,            /* xAppend */
-		lhInitCursor,               /* xCursorInit */
-		lhCursorSeek,               /* xSeek */
-		lhCursorFirst,              /* xFirst */
-		lhCursorLast,               /* xLast */
-		lhCursorValid,              /* xValid */
-		lhCursorNext,               /* xNext */
-		lhCursorPrev,               /* xPrev */
-		lhCursorDelete,             /* xDelete */
-		lhCursorKeyLength,          /* xKeyLength */
-		lhCursorKey,                /* xKey */
-		lhCursorDataLength,         /* xDataLength */
-		lhCursorData,               /* xData */
-		lhCursorReset,              /* xReset */
-		0                           /* xRelease */                        
-	};
-	return &sDiskStore;
+	const char *zIn  = (const char *)SyBlobData(pKey);
+	const char *zEnd = &zIn[SyBlobLength(pKey)];
+	if( (int)(zEnd-zIn) > 1 && zIn[0] == '0' ){
+		/* Octal not decimal number */
+		return FALSE;
+	}
+	if( (zIn[0] == '-' || zIn[0] == '+') && &zIn[1] < zEnd ){
+		zIn++;
+	}
+	for(;;){
+		if( zIn >= zEnd ){
+			return TRUE;
+		}
+		if( (unsigned char)zIn[0] >= 0xc0 /* UTF-8 stream */  || !SyisDigit(zIn[0]) ){
+			break;
+		}
+		zIn++;
+	}
+	/* Key does not look like a decimal number */
+	return FALSE;
 }
 /*
- * ----------------------------------------------------------
- * File: json.c
- * MD5: a4aef01e657e37d9ace4729b9205976c
- * ----------------------------------------------------------
- */
-/*
- * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
- * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
- * Version 1.2.6
- * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
- * please contact Symisc Systems via:
- *       legal@symisc.net
- *       licensing@symisc.net
- *       contact@symisc.net
- * or visit:
- *      http://vedis.symisc.net/
- */
- /* $SymiscID: json.c v1.0 FreeBSD 2012-12-16 00:28 stable <chm@symisc.net> $ */
-#ifndef VEDIS_AMALGAMATION
-#include "vedisInt.h"
-#endif
-/* This file deals with JSON serialization, decoding and stuff like that. */
-/*
- * Section: 
- *  JSON encoding/decoding routines.
- * Authors:
- *  Symisc Systems, devel@symisc.net.
- *  Copyright (C) Symisc Systems, http://vedis.symisc.net
- * Status:
- *    Devel.
- */
-/* Forward reference */
-static int VmJsonArrayEncode(vedis_value *pValue, void *pUserData);
-/* 
- * JSON encoder state is stored in an instance 
- * of the following structure.
+ * Insert a given key and it's associated value (if any) in the given
+ * hashmap.
+ * If a node with the given key already exists in the database
+ * then this function overwrite the old value.
  */
-typedef struct json_private_data json_private_data;
-struct json_private_data
+static sxi32 HashmapInsert(
+	vedis_hashmap *pMap, /* Target hashmap */
+	vedis_value *pKey,   /* Lookup key  */
+	vedis_value *pVal    /* Node value */
+	)
 {
-	SyBlob *pOut;      /* Output consumer buffer */
-	int isFirst;       /* True if first encoded entry */
-	int iFlags;        /* JSON encoding flags */
-	int nRecCount;     /* Recursion count */
-};
-/*
- * Returns the JSON representation of a value.In other word perform a JSON encoding operation.
- * According to wikipedia
- * JSON's basic types are:
- *   Number (double precision floating-point format in JavaScript, generally depends on implementation)
- *   String (double-quoted Unicode, with backslash escaping)
- *   Boolean (true or false)
- *   Array (an ordered sequence of values, comma-separated and enclosed in square brackets; the values
- *    do not need to be of the same type)
- *   Object (an unordered collection of key:value pairs with the ':' character separating the key 
- *     and the value, comma-separated and enclosed in curly braces; the keys must be strings and should
- *     be distinct from each other)
- *   null (empty)
- * Non-significant white space may be added freely around the "structural characters"
- * (i.e. the brackets "[{]}", colon ":" and comma ",").
- */
-static sxi32 VmJsonEncode(
-	vedis_value *pIn,          /* Encode this value */
-	json_private_data *pData /* Context data */
-	){
-		SyBlob *pOut = pData->pOut;
-		int nByte;
-		if( vedis_value_is_null(pIn) ){
-			/* null */
-			SyBlobAppend(pOut, "null", sizeof("null")-1);
-		}else if( vedis_value_is_bool(pIn) ){
-			int iBool = vedis_value_to_bool(pIn);
-			sxu32 iLen;
-			/* true/false */
-			iLen = iBool ? sizeof("true") : sizeof("false");
-			SyBlobAppend(pOut, iBool ? "true" : "false", iLen-1);
-		}else if(  vedis_value_is_numeric(pIn) && !vedis_value_is_string(pIn) ){
-			const char *zNum;
-			/* Get a string representation of the number */
-			zNum = vedis_value_to_string(pIn, &nByte);
-			SyBlobAppend(pOut,zNum,nByte);
-		}else if( vedis_value_is_string(pIn) ){
-				const char *zIn, *zEnd;
-				int c;
-				/* Encode the string */
-				zIn = vedis_value_to_string(pIn, &nByte);
-				zEnd = &zIn[nByte];
-				/* Append the double quote */
-				SyBlobAppend(pOut,"\"", sizeof(char));
-				for(;;){
-					if( zIn >= zEnd ){
-						/* No more input to process */
-						break;
-					}
-					c = zIn[0];
-					/* Advance the stream cursor */
-					zIn++;
-					if( c == '"' || c == '\\' ){
-						/* Unescape the character */
-						SyBlobAppend(pOut,"\\", sizeof(char));
-					}
-					/* Append character verbatim */
-					SyBlobAppend(pOut,(const char *)&c,sizeof(char));
+	vedis_hashmap_node *pNode = 0;
+	sxi32 rc = SXRET_OK;
+	
+	if( pKey && (pKey->iFlags & (MEMOBJ_STRING|MEMOBJ_HASHMAP)) ){
+		if( (pKey->iFlags & MEMOBJ_STRING) == 0 ){
+			/* Force a string cast */
+			vedisMemObjToString(&(*pKey));
+		}
+		if( SyBlobLength(&pKey->sBlob) < 1 || HashmapIsIntKey(&pKey->sBlob) ){
+			if(SyBlobLength(&pKey->sBlob) < 1){
+				/* Automatic index assign */
+				pKey = 0;
+			}
+			goto IntKey;
+		}
+		if( SXRET_OK == HashmapLookupBlobKey(&(*pMap), SyBlobData(&pKey->sBlob), 
+			SyBlobLength(&pKey->sBlob), &pNode) ){
+				/* Overwrite the old value */
+				if( pVal ){
+					vedisMemObjStore(pVal,&pNode->sValue);
+				}else{
+					/* Nullify the entry */
+					vedisMemObjToNull(&pNode->sValue);
+				}
+				return SXRET_OK;
+		}
+		/* Perform a blob-key insertion */
+		rc = HashmapInsertBlobKey(&(*pMap),SyBlobData(&pKey->sBlob),SyBlobLength(&pKey->sBlob),&(*pVal));
+		return rc;
+	}
+IntKey:
+	if( pKey ){
+		if((pKey->iFlags & MEMOBJ_INT) == 0 ){
+			/* Force an integer cast */
+			vedisMemObjToInteger(pKey);
+		}
+		if( SXRET_OK == HashmapLookupIntKey(&(*pMap), pKey->x.iVal, &pNode) ){
+			/* Overwrite the old value */
+			if( pVal ){
+				vedisMemObjStore(pVal,&pNode->sValue);
+			}else{
+				/* Nullify the entry */
+				vedisMemObjToNull(&pNode->sValue);
+			}
+			return SXRET_OK;
+		}
+		/* Perform a 64-bit-int-key insertion */
+		rc = HashmapInsertIntKey(&(*pMap), pKey->x.iVal, &(*pVal));
+		if( rc == SXRET_OK ){
+			if( pKey->x.iVal >= pMap->iNextIdx ){
+				/* Increment the automatic index */ 
+				pMap->iNextIdx = pKey->x.iVal + 1;
+				/* Make sure the automatic index is not reserved */
+				while( SXRET_OK == HashmapLookupIntKey(&(*pMap), pMap->iNextIdx, 0) ){
+					pMap->iNextIdx++;
 				}
-				/* Append the double quote */
-				SyBlobAppend(pOut,"\"",sizeof(char));
-		}else if( vedis_value_is_array(pIn) ){
-			/* Encode the array/object */
-			pData->isFirst = 1;
-			/* Append the square bracket or curly braces */
-			SyBlobAppend(pOut,"[",sizeof(char));
-			/* Iterate over array entries */
-			vedis_array_walk(pIn, VmJsonArrayEncode, pData);
-			/* Append the closing square bracket or curly braces */
-			SyBlobAppend(pOut,"]",sizeof(char));
-		}else{
-			/* Can't happen */
-			SyBlobAppend(pOut,"null",sizeof("null")-1);
+			}
 		}
-		/* All done */
-		return VEDIS_OK;
+	}else{
+		/* Assign an automatic index */
+		rc = HashmapInsertIntKey(&(*pMap),pMap->iNextIdx,&(*pVal));
+		if( rc == SXRET_OK ){
+			++pMap->iNextIdx;
+		}
+	}
+	/* Insertion result */
+	return rc;
 }
 /*
- * The following walker callback is invoked each time we need
- * to encode an array to JSON.
+ * Allocate a new hashmap.
+ * Return a pointer to the freshly allocated hashmap on success.NULL otherwise.
  */
-static int VmJsonArrayEncode(vedis_value *pValue, void *pUserData)
+VEDIS_PRIVATE vedis_hashmap * vedisNewHashmap(
+	vedis *pStore,             /* Engine that trigger the hashmap creation */
+	sxu32 (*xIntHash)(sxi64), /* Hash function for int keys.NULL otherwise*/
+	sxu32 (*xBlobHash)(const void *, sxu32) /* Hash function for BLOB keys.NULL otherwise */
+	)
 {
-	json_private_data *pJson = (json_private_data *)pUserData;
-	if( pJson->nRecCount > 31 ){
-		/* Recursion limit reached, return immediately */
-		return VEDIS_OK;
+	vedis_hashmap *pMap;
+	/* Allocate a new instance */
+	pMap = (vedis_hashmap *)SyMemBackendPoolAlloc(&pStore->sMem, sizeof(vedis_hashmap));
+	if( pMap == 0 ){
+		return 0;
 	}
-	if( !pJson->isFirst ){
-		/* Append the colon first */
-		SyBlobAppend(pJson->pOut,",",(int)sizeof(char));
+	/* Zero the structure */
+	SyZero(pMap, sizeof(vedis_hashmap));
+	/* Fill in the structure */
+	pMap->pStore = &(*pStore);
+	pMap->iRef = 1;
+	/* pMap->iFlags = 0; */
+	/* Default hash functions */
+	pMap->xIntHash  = xIntHash ? xIntHash : IntHash;
+	pMap->xBlobHash = xBlobHash ? xBlobHash : BinHash;
+	return pMap;
+}
+/*
+ * Increment the reference count of a given hashmap.
+ */
+VEDIS_PRIVATE void vedisHashmapRef(vedis_hashmap *pMap)
+{
+	pMap->iRef++;
+}
+/*
+ * Release a hashmap.
+ */
+static sxi32 vedisHashmapRelease(vedis_hashmap *pMap)
+{
+	vedis_hashmap_node *pEntry, *pNext;
+	vedis *pStore = pMap->pStore;
+	sxu32 n;
+	/* Start the release process */
+	n = 0;
+	pEntry = pMap->pFirst;
+	for(;;){
+		if( n >= pMap->nEntry ){
+			break;
+		}
+		pNext = pEntry->pPrev; /* Reverse link */
+		/* Release the vedis_value */
+		vedisMemObjRelease(&pEntry->sValue);
+		/* Release the node */
+		if( pEntry->iType == HASHMAP_BLOB_NODE ){
+			SyBlobRelease(&pEntry->xKey.sKey);
+		}
+		SyMemBackendPoolFree(&pStore->sMem, pEntry);
+		/* Point to the next entry */
+		pEntry = pNext;
+		n++;
 	}
-	/* Encode the value */
-	pJson->nRecCount++;
-	VmJsonEncode(pValue, pJson);
-	pJson->nRecCount--;
-	pJson->isFirst = 0;
-	return VEDIS_OK;
+	if( pMap->nEntry > 0 ){
+		/* Release the hash bucket */
+		SyMemBackendFree(&pStore->sMem, pMap->apBucket);
+	}
+	/* Free the whole instance */
+	SyMemBackendPoolFree(&pStore->sMem, pMap);
+	return SXRET_OK;
 }
-#if 0
 /*
- * The following walker callback is invoked each time we need to encode
- * a object instance [i.e: Object in the VEDIS jargon] to JSON.
+ * Decrement the reference count of a given hashmap.
+ * If the count reaches zero which mean no more variables
+ * are pointing to this hashmap, then release the whole instance.
  */
-static int VmJsonObjectEncode(vedis_value *pKey,vedis_value *pValue,void *pUserData)
+VEDIS_PRIVATE void vedisHashmapUnref(vedis_hashmap *pMap)
 {
-	json_private_data *pJson = (json_private_data *)pUserData;
-	const char *zKey;
-	int nByte;
-	if( pJson->nRecCount > 31 ){
-		/* Recursion limit reached, return immediately */
-		return VEDIS_OK;
+	pMap->iRef--;
+	if( pMap->iRef < 1 ){
+		vedisHashmapRelease(pMap);
 	}
-	if( !pJson->isFirst ){
-		/* Append the colon first */
-		SyBlobAppend(pJson->pOut,",",sizeof(char));
+}
+VEDIS_PRIVATE vedis * vedisHashmapGetEngine(vedis_hashmap *pMap)
+{
+	return pMap->pStore;
+}
+/*
+ * Check if a given key exists in the given hashmap.
+ * Write a pointer to the target node on success.
+ * Otherwise SXERR_NOTFOUND is returned on failure.
+ */
+VEDIS_PRIVATE sxi32 vedisHashmapLookup(
+	vedis_hashmap *pMap,        /* Target hashmap */
+	vedis_value *pKey,          /* Lookup key */
+	vedis_value **ppOut /* OUT: Target node on success */
+	)
+{
+	vedis_hashmap_node *pNode;
+	sxi32 rc;
+	if( pMap->nEntry < 1 ){
+		/* TICKET 1433-25: Don't bother hashing, the hashmap is empty anyway.
+		 */
+		return SXERR_NOTFOUND;
 	}
-	/* Extract a string representation of the key */
-	zKey = vedis_value_to_string(pKey, &nByte);
-	/* Append the key and the double colon */
-	if( nByte > 0 ){
-		SyBlobAppend(pJson->pOut,"\"",sizeof(char));
-		SyBlobAppend(pJson->pOut,zKey,(sxu32)nByte);
-		SyBlobAppend(pJson->pOut,"\"",sizeof(char));
-	}else{
-		/* Can't happen */
-		SyBlobAppend(pJson->pOut,"null",sizeof("null")-1);
+	rc = HashmapLookup(&(*pMap), &(*pKey),&pNode);
+	if( rc != SXRET_OK ){
+		return rc;
+	}
+	if( ppOut ){
+		/* Point to the node value */
+		*ppOut = &pNode->sValue;
 	}
-	SyBlobAppend(pJson->pOut,":",sizeof(char));
-	/* Encode the value */
-	pJson->nRecCount++;
-	VmJsonEncode(pValue, pJson);
-	pJson->nRecCount--;
-	pJson->isFirst = 0;
 	return VEDIS_OK;
 }
-#endif
 /*
- *  Returns a string containing the JSON representation of value. 
- *  In other words, perform the serialization of the given JSON object.
+ * Insert a given key and it's associated value (if any) in the given
+ * hashmap.
+ * If a node with the given key already exists in the database
+ * then this function overwrite the old value.
  */
-VEDIS_PRIVATE int vedisJsonSerialize(vedis_value *pValue,SyBlob *pOut)
+VEDIS_PRIVATE sxi32 vedisHashmapInsert(
+	vedis_hashmap *pMap, /* Target hashmap */
+	vedis_value *pKey,   /* Lookup key */
+	vedis_value *pVal    /* Node value.NULL otherwise */
+	)
 {
-	json_private_data sJson;
-	/* Prepare the JSON data */
-	sJson.nRecCount = 0;
-	sJson.pOut = pOut;
-	sJson.isFirst = 1;
-	sJson.iFlags = 0;
-	/* Perform the encoding operation */
-	VmJsonEncode(pValue, &sJson);
+	sxi32 rc;
+	rc = HashmapInsert(&(*pMap), &(*pKey), &(*pVal));
+	return rc;
+}
+/*
+ * Iterate throw hashmap entries and invoke the given callback [i.e: xWalk()] for each 
+ * retrieved entry.
+ * If the callback wishes to abort processing [i.e: it's invocation] it must return
+ * a value different from VEDIS_OK.
+ * Refer to [vedis_array_walk()] for more information.
+ */
+VEDIS_PRIVATE sxi32 vedisHashmapWalk(
+	vedis_hashmap *pMap, /* Target hashmap */
+	int (*xWalk)(vedis_value *, void *), /* Walker callback */
+	void *pUserData /* Last argument to xWalk() */
+	)
+{
+	vedis_hashmap_node *pEntry;
+	sxi32 rc;
+	sxu32 n;
+	/* Initialize walker parameter */
+	rc = SXRET_OK;
+	n = pMap->nEntry;
+	pEntry = pMap->pFirst;
+	/* Start the iteration process */
+	for(;;){
+		if( n < 1 ){
+			break;
+		}
+		/* Invoke the user callback */
+		rc = xWalk(&pEntry->sValue,pUserData);
+		if( rc != VEDIS_OK ){
+			/* Callback request an operation abort */
+			return SXERR_ABORT;
+		}
+		/* Point to the next entry */
+		pEntry = pEntry->pPrev; /* Reverse link */
+		n--;
+	}
 	/* All done */
-	return VEDIS_OK;
+	return SXRET_OK;
+}
+/*
+ * Reset the node cursor of a given hashmap.
+ */
+VEDIS_PRIVATE void vedisHashmapResetLoopCursor(vedis_hashmap *pMap)
+{
+	/* Reset the loop cursor */
+	pMap->pCur = pMap->pFirst;
+}
+/*
+ * Return a pointer to the node currently pointed by the node cursor.
+ * If the cursor reaches the end of the list, then this function
+ * return NULL.
+ * Note that the node cursor is automatically advanced by this function.
+ */
+VEDIS_PRIVATE vedis_value * vedisHashmapGetNextEntry(vedis_hashmap *pMap)
+{
+	vedis_hashmap_node *pCur = pMap->pCur;
+	if( pCur == 0 ){
+		/* End of the list, return null */
+		return 0;
+	}
+	/* Advance the node cursor */
+	pMap->pCur = pCur->pPrev; /* Reverse link */
+	/* Entry value */
+	return &pCur->sValue;
 }
 /*
  * ----------------------------------------------------------
- * File: hashmap.c
- * MD5: 8b3d7bf394c07e7c5442c871607e1f96
+ * File: cmd.c
+ * MD5: 9f423624c51655b52e412da8cc3bb222
  * ----------------------------------------------------------
  */
 /*
@@ -16959,1410 +20077,1538 @@ VEDIS_PRIVATE int vedisJsonSerialize(vedis_value *pValue,SyBlob *pOut)
  * or visit:
  *      http://vedis.symisc.net/
  */
-/* $SymiscID: hashmap.c v1.2 FreeBSD 2013-07-20 06:09 stable <chm@symisc.net> $ */
+/* $SymiscID: cmd.c v1.2 FreeBSD 2013-07-10 04:45 stable <chm@symisc.net> $ */
 #ifndef VEDIS_AMALGAMATION
 #include "vedisInt.h"
 #endif
+/* Implementation of the vedis commands  */
 /*
- * Each hashmap entry [i.e: array(4, 5, 6)] is recorded in an instance
- * of the following structure.
- */
-struct vedis_hashmap_node
-{
-	vedis_hashmap *pMap;     /* Hashmap that own this instance */
-	sxi32 iType;           /* Node type */
-	union{
-		sxi64 iKey;        /* Int key */
-		SyBlob sKey;       /* Blob key */
-	}xKey;
-	sxi32 iFlags;          /* Control flags */
-	sxu32 nHash;           /* Key hash value */
-	vedis_value sValue;    /* Node value */
-	vedis_hashmap_node *pNext, *pPrev;               /* Link to other entries [i.e: linear traversal] */
-	vedis_hashmap_node *pNextCollide, *pPrevCollide; /* Collision chain */
-};
-/* 
- * Each active hashmap is represented by an instance of the following structure.
- */
-struct vedis_hashmap
-{
-	vedis  *pStore;                  /* Store that own this instance */
-	vedis_hashmap_node **apBucket;  /* Hash bucket */
-	vedis_hashmap_node *pFirst;     /* First inserted entry */
-	vedis_hashmap_node *pLast;      /* Last inserted entry */
-	vedis_hashmap_node *pCur;       /* Current entry */
-	sxu32 nSize;                  /* Bucket size */
-	sxu32 nEntry;                 /* Total number of inserted entries */
-	sxu32 (*xIntHash)(sxi64);     /* Hash function for int_keys */
-	sxu32 (*xBlobHash)(const void *, sxu32); /* Hash function for blob_keys */
-	sxi32 iFlags;                 /* Hashmap control flags */
-	sxi64 iNextIdx;               /* Next available automatically assigned index */
-	sxi32 iRef;                   /* Reference count */
-};
-/* Allowed node types */
-#define HASHMAP_INT_NODE   1  /* Node with an int [i.e: 64-bit integer] key */
-#define HASHMAP_BLOB_NODE  2  /* Node with a string/BLOB key */
-/*
- * Default hash function for int [i.e; 64-bit integer] keys.
- */
-static sxu32 IntHash(sxi64 iKey)
-{
-	return (sxu32)(iKey ^ (iKey << 8) ^ (iKey >> 8));
-}
-/*
- * Default hash function for string/BLOB keys.
- */
-static sxu32 BinHash(const void *pSrc, sxu32 nLen)
-{
-	register unsigned char *zIn = (unsigned char *)pSrc;
-	unsigned char *zEnd;
-	sxu32 nH = 5381;
-	zEnd = &zIn[nLen];
-	for(;;){
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-		if( zIn >= zEnd ){ break; } nH = nH * 33 + zIn[0] ; zIn++;
-	}	
-	return nH;
-}
-/*
- * Return the total number of entries in a given hashmap.
- */
-VEDIS_PRIVATE sxu32 vedisHashmapCount(vedis_hashmap *pMap)
-{
-	return pMap->nEntry;
-}
-/*
- * Allocate a new hashmap node with a 64-bit integer key.
- * If something goes wrong [i.e: out of memory], this function return NULL.
- * Otherwise a fresh [vedis_hashmap_node] instance is returned.
- */
-static vedis_hashmap_node * HashmapNewIntNode(vedis_hashmap *pMap, sxi64 iKey, sxu32 nHash,vedis_value *pValue)
-{
-	vedis_hashmap_node *pNode;
-	/* Allocate a new node */
-	pNode = (vedis_hashmap_node *)SyMemBackendPoolAlloc(&pMap->pStore->sMem, sizeof(vedis_hashmap_node));
-	if( pNode == 0 ){
-		return 0;
-	}
-	/* Zero the stucture */
-	SyZero(pNode, sizeof(vedis_hashmap_node));
-	/* Fill in the structure */
-	pNode->pMap  = &(*pMap);
-	pNode->iType = HASHMAP_INT_NODE;
-	pNode->nHash = nHash;
-	pNode->xKey.iKey = iKey;
-	/* Duplicate the value */
-	vedisMemObjInit(pMap->pStore,&pNode->sValue);
-	if( pValue ){
-		vedisMemObjStore(pValue,&pNode->sValue);
-	}
-	return pNode;
-}
-/*
- * Allocate a new hashmap node with a BLOB key.
- * If something goes wrong [i.e: out of memory], this function return NULL.
- * Otherwise a fresh [vedis_hashmap_node] instance is returned.
+ *  Command: DEL key [key ...]
+ * Description:
+ *   Removes the specified keys. A key is ignored if it does not exist.
+ * Return:
+ * Integer: The number of keys that were removed.
  */
-static vedis_hashmap_node * HashmapNewBlobNode(vedis_hashmap *pMap, const void *pKey, sxu32 nKeyLen, sxu32 nHash,vedis_value *pValue)
+static int vedis_cmd_del(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode;
-	/* Allocate a new node */
-	pNode = (vedis_hashmap_node *)SyMemBackendPoolAlloc(&pMap->pStore->sMem, sizeof(vedis_hashmap_node));
-	if( pNode == 0 ){
-		return 0;
-	}
-	/* Zero the stucture */
-	SyZero(pNode, sizeof(vedis_hashmap_node));
-	/* Fill in the structure */
-	pNode->pMap  = &(*pMap);
-	pNode->iType = HASHMAP_BLOB_NODE;
-	pNode->nHash = nHash;
-	SyBlobInit(&pNode->xKey.sKey, &pMap->pStore->sMem);
-	SyBlobAppend(&pNode->xKey.sKey, pKey, nKeyLen);
-	/* Duplicate the value */
-	vedisMemObjInit(pMap->pStore,&pNode->sValue);
-	if( pValue ){
-		vedisMemObjStore(pValue,&pNode->sValue);
+	int nDel = 0; 
+	int rc;
+	int i;
+	/* Delete the given keys */
+	for( i = 0 ; i < argc; ++i ){
+		const char *zValue;
+		int nByte;
+		/* String representation of the key */
+		zValue = vedis_value_to_string(argv[i],&nByte);
+		/* Delete the key */
+		rc = vedis_context_kv_delete(pCtx,(const void *)zValue,nByte);
+		if( rc == VEDIS_OK ){
+			nDel++;
+		}
 	}
-	return pNode;
+	/* Total number of removed keys */
+	vedis_result_int(pCtx,nDel);
+	return VEDIS_OK;
 }
 /*
- * link a hashmap node to the given bucket index (last argument to this function).
+ *  Command:  EXISTS key
+ * Description:
+ *   Check key existance.
+ * Return:
+ *   bool: TRUE if key exists. FALSE otherwise.
  */
-static void HashmapNodeLink(vedis_hashmap *pMap, vedis_hashmap_node *pNode, sxu32 nBucketIdx)
+static int vedis_cmd_exists(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	/* Link */
-	if( pMap->apBucket[nBucketIdx] != 0 ){
-		pNode->pNextCollide = pMap->apBucket[nBucketIdx];
-		pMap->apBucket[nBucketIdx]->pPrevCollide = pNode;
-	}
-	pMap->apBucket[nBucketIdx] = pNode;
-	/* Link to the map list */
-	if( pMap->pFirst == 0 ){
-		pMap->pFirst = pMap->pLast = pNode;
-		/* Point to the first inserted node */
-		pMap->pCur = pNode;
-	}else{
-		MACRO_LD_PUSH(pMap->pLast, pNode);
+	int rc = VEDIS_NOTFOUND;
+	if( argc > 0 ){
+		const char *zKey;
+		int nByte;
+		/* Target key */
+		zKey = vedis_value_to_string(argv[0],&nByte);
+		/* Fetch */
+		rc = vedis_context_kv_fetch_callback(pCtx,zKey,nByte,0,0);
 	}
-	++pMap->nEntry;
+	/* Result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
-#define HASHMAP_FILL_FACTOR 3
 /*
- * Grow the hash-table and rehash all entries.
+ *  Command:   APPEND key value
+ * Description:
+ *   If key already exists and is a string, this command appends the value
+ *   at the end of the string. If key does not exist it is created and set 
+ *   as an empty string, so APPEND will be similar to SET in this special case.
+ * Return:
+ *   Integer: the length of the string after the append operation.
  */
-static sxi32 HashmapGrowBucket(vedis_hashmap *pMap)
+static int vedis_cmd_append(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	if( pMap->nEntry >= pMap->nSize * HASHMAP_FILL_FACTOR ){
-		vedis_hashmap_node **apOld = pMap->apBucket;
-		vedis_hashmap_node *pEntry, **apNew;
-		sxu32 nNew = pMap->nSize << 1;
-		sxu32 nBucket;
-		sxu32 n;
-		if( nNew < 1 ){
-			nNew = 16;
-		}
-		/* Allocate a new bucket */
-		apNew = (vedis_hashmap_node **)SyMemBackendAlloc(&pMap->pStore->sMem, nNew * sizeof(vedis_hashmap_node *));
-		if( apNew == 0 ){
-			if( pMap->nSize < 1 ){
-				return SXERR_MEM; /* Fatal */
-			}
-			/* Not so fatal here, simply a performance hit */
-			return SXRET_OK;
-		}
-		/* Zero the table */
-		SyZero((void *)apNew, nNew * sizeof(vedis_hashmap_node *));
-		/* Reflect the change */
-		pMap->apBucket = apNew;
-		pMap->nSize = nNew;
-		if( apOld == 0 ){
-			/* First allocated table [i.e: no entry], return immediately */
-			return SXRET_OK;
-		}
-		/* Rehash old entries */
-		pEntry = pMap->pFirst;
-		n = 0;
-		for( ;; ){
-			if( n >= pMap->nEntry ){
-				break;
-			}
-			/* Clear the old collision link */
-			pEntry->pNextCollide = pEntry->pPrevCollide = 0;
-			/* Link to the new bucket */
-			nBucket = pEntry->nHash & (nNew - 1);
-			if( pMap->apBucket[nBucket] != 0 ){
-				pEntry->pNextCollide = pMap->apBucket[nBucket];
-				pMap->apBucket[nBucket]->pPrevCollide = pEntry;
-			}
-			pMap->apBucket[nBucket] = pEntry;
-			/* Point to the next entry */
-			pEntry = pEntry->pPrev; /* Reverse link */
-			n++;
+	const char *zKey,*zValue;
+	vedis_int64 nTot;
+	int nKey,nByte;
+	int rc;
+	if( argc < 2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* Return 0 */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Target key */
+	zKey  = vedis_value_to_string(argv[0],&nKey);
+	zValue = vedis_value_to_string(argv[1],&nByte);
+	if( nByte > 0 ){
+		/* Append */
+		rc = vedis_context_kv_append(pCtx,zKey,nKey,zValue,nByte);
+		if( rc != VEDIS_OK ){
+			vedis_result_int(pCtx,0);
+			return VEDIS_ABORT;
 		}
-		/* Free the old table */
-		SyMemBackendFree(&pMap->pStore->sMem, (void *)apOld);
 	}
-	return SXRET_OK;
+	/* New length */
+	nTot = nByte;
+	vedis_context_kv_fetch(pCtx,zKey,nKey,0,&nTot);
+	vedis_result_int64(pCtx,nTot);
+	return VEDIS_OK;
 }
 /*
- * Insert a 64-bit integer key and it's associated value (if any) in the given
- * hashmap.
+ *  Command:   STRLEN key
+ * Description:
+ *   Returns the length of the string value stored at key. An error is returned when key
+ *   holds a non-string value.
+ * Return:
+ *   Integer: The length of the string at key, or 0 when key does not exist.
  */
-static sxi32 HashmapInsertIntKey(vedis_hashmap *pMap,sxi64 iKey,vedis_value *pValue)
+static int vedis_cmd_strlen(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode;
-	sxu32 nHash;
-	sxi32 rc;
-	
-	/* Hash the key */
-	nHash = pMap->xIntHash(iKey);
-	/* Allocate a new int node */
-	pNode = HashmapNewIntNode(&(*pMap), iKey, nHash, pValue);
-	if( pNode == 0 ){
-		return SXERR_MEM;
-	}
-	/* Make sure the bucket is big enough to hold the new entry */
-	rc = HashmapGrowBucket(&(*pMap));
-	if( rc != SXRET_OK ){
-		SyMemBackendPoolFree(&pMap->pStore->sMem, pNode);
-		return rc;
+	vedis_int64 nByte = 0;
+	if( argc > 0 ){
+		const char *zKey;
+		int nKey;
+		/* Target key */
+		zKey  = vedis_value_to_string(argv[0],&nKey);
+		vedis_context_kv_fetch(pCtx,zKey,nKey,0,&nByte);
 	}
-	/* Perform the insertion */
-	HashmapNodeLink(&(*pMap), pNode, nHash & (pMap->nSize - 1));
-	/* All done */
-	return SXRET_OK;
+	vedis_result_int64(pCtx,nByte);
+	return VEDIS_OK;
 }
 /*
- * Insert a BLOB key and it's associated value (if any) in the given
- * hashmap.
+ * Fetch Key value from the underlying database.
  */
-static sxi32 HashmapInsertBlobKey(vedis_hashmap *pMap,const void *pKey,sxu32 nKeyLen,vedis_value *pValue)
+static int vedisFetchValue(vedis_context *pCtx,vedis_value *pArg,SyBlob *pOut)
 {
-	vedis_hashmap_node *pNode;
-	sxu32 nHash;
-	sxi32 rc;
-	
-	/* Hash the key */
-	nHash = pMap->xBlobHash(pKey, nKeyLen);
-	/* Allocate a new blob node */
-	pNode = HashmapNewBlobNode(&(*pMap), pKey, nKeyLen, nHash,pValue);
-	if( pNode == 0 ){
-		return SXERR_MEM;
+	const char *zKey;
+	int nByte;
+	int rc;
+	/* Target key */
+	zKey = vedis_value_to_string(pArg,&nByte);
+	/* Fetch the value */
+	rc = vedis_context_kv_fetch_callback(pCtx,zKey,nByte,pOut ? vedisDataConsumer : 0,pOut);
+	return rc;
+}
+/*
+ *  Command:   GET key
+ * Description:
+ *   Get the value of key. If the key does not exist the special value nil is returned.
+ * Return:
+ *   the value of key, or nil when key does not exist.
+ */
+static int vedis_cmd_get(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	int rc;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Make sure the bucket is big enough to hold the new entry */
-	rc = HashmapGrowBucket(&(*pMap));
-	if( rc != SXRET_OK ){
-		SyMemBackendPoolFree(&pMap->pStore->sMem, pNode);
-		return rc;
+	/* Fetch the record */
+	rc = vedisFetchValue(pCtx,argv[0],VedisContextResultBuffer(pCtx));
+	if( rc == VEDIS_OK ){
+		vedis_result_string(pCtx,0,0);
+	}else{
+		/* No such record */
+		vedis_result_null(pCtx);
 	}
-	/* Perform the insertion */
-	HashmapNodeLink(&(*pMap), pNode, nHash & (pMap->nSize - 1));
-	/* All done */
-	return SXRET_OK;
+	return VEDIS_OK;
 }
 /*
- * Check if a given 64-bit integer key exists in the given hashmap.
- * Write a pointer to the target node on success. Otherwise
- * SXERR_NOTFOUND is returned on failure.
+ *  Command:   COPY old_key new_key
+ * Description:
+ *   Copy key values.
+ * Return:
+ *   Boolean: TRUE on success. FALSE otherwise.
  */
-static sxi32 HashmapLookupIntKey(
-	vedis_hashmap *pMap,         /* Target hashmap */
-	sxi64 iKey,                /* lookup key */
-	vedis_hashmap_node **ppNode  /* OUT: target node on success */
-	)
+static int vedis_cmd_copy(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode;
-	sxu32 nHash;
-	if( pMap->nEntry < 1 ){
-		/* Don't bother hashing, there is no entry anyway */
-		return SXERR_NOTFOUND;
+	const char *zNew;
+	SyBlob *pWorker;
+	int nByte,rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing old_key/new_key pair");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Hash the key first */
-	nHash = pMap->xIntHash(iKey);
-	/* Point to the appropriate bucket */
-	pNode = pMap->apBucket[nHash & (pMap->nSize - 1)];
-	/* Perform the lookup */
-	for(;;){
-		if( pNode == 0 ){
-			break;
-		}
-		if( pNode->iType == HASHMAP_INT_NODE
-			&& pNode->nHash == nHash
-			&& pNode->xKey.iKey == iKey ){
-				/* Node found */
-				if( ppNode ){
-					*ppNode = pNode;
-				}
-				return SXRET_OK;
-		}
-		/* Follow the collision link */
-		pNode = pNode->pNextCollide;
+	pWorker = VedisContextWorkingBuffer(pCtx);
+	SyBlobReset(pWorker);
+	/* Fetch the record */
+	rc = vedisFetchValue(pCtx,argv[0],pWorker);
+	if( rc != VEDIS_OK ){
+		/* No such record, return FALSE */
+		vedis_result_bool(pCtx,0);
 	}
-	/* No such entry */
-	return SXERR_NOTFOUND;
+	/* Duplicate the record */
+	zNew = vedis_value_to_string(argv[1],&nByte);
+	rc = vedis_context_kv_store(pCtx,zNew,nByte,SyBlobData(pWorker),(vedis_int64)SyBlobLength(pWorker));
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Check if a given BLOB key exists in the given hashmap.
- * Write a pointer to the target node on success. Otherwise
- * SXERR_NOTFOUND is returned on failure.
+ *  Command:   MOVE old_key new_key
+ * Description:
+ *   Move key values.
+ * Return:
+ *   Boolean: TRUE on success. FALSE otherwise.
  */
-static sxi32 HashmapLookupBlobKey(
-	vedis_hashmap *pMap,          /* Target hashmap */
-	const void *pKey,           /* Lookup key */
-	sxu32 nKeyLen,              /* Key length in bytes */
-	vedis_hashmap_node **ppNode   /* OUT: target node on success */
-	)
+static int vedis_cmd_move(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode;
-	sxu32 nHash;
-	if( pMap->nEntry < 1 ){
-		/* Don't bother hashing, there is no entry anyway */
-		return SXERR_NOTFOUND;
+	const char *zNew;
+	SyBlob *pWorker;
+	int nByte,rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing old_key/new_key pair");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Hash the key first */
-	nHash = pMap->xBlobHash(pKey, nKeyLen);
-	/* Point to the appropriate bucket */
-	pNode = pMap->apBucket[nHash & (pMap->nSize - 1)];
-	/* Perform the lookup */
-	for(;;){
-		if( pNode == 0 ){
-			break;
-		}
-		if( pNode->iType == HASHMAP_BLOB_NODE 
-			&& pNode->nHash == nHash
-			&& SyBlobLength(&pNode->xKey.sKey) == nKeyLen 
-			&& SyMemcmp(SyBlobData(&pNode->xKey.sKey), pKey, nKeyLen) == 0 ){
-				/* Node found */
-				if( ppNode ){
-					*ppNode = pNode;
-				}
-				return SXRET_OK;
-		}
-		/* Follow the collision link */
-		pNode = pNode->pNextCollide;
+	pWorker = VedisContextWorkingBuffer(pCtx);
+	SyBlobReset(pWorker);
+	/* Fetch the record */
+	rc = vedisFetchValue(pCtx,argv[0],pWorker);
+	if( rc != VEDIS_OK ){
+		/* No such record, return FALSE */
+		vedis_result_bool(pCtx,0);
 	}
-	/* No such entry */
-	return SXERR_NOTFOUND;
+	/* Duplicate the record */
+	zNew = vedis_value_to_string(argv[1],&nByte);
+	rc = vedis_context_kv_store(pCtx,zNew,nByte,SyBlobData(pWorker),(vedis_int64)SyBlobLength(pWorker));
+	if( rc == VEDIS_OK ){
+		const char *zOld;
+		/* Discard the old record */
+		zOld = vedis_value_to_string(argv[0],&nByte);
+		rc = vedis_context_kv_delete(pCtx,zOld,nByte);
+	}
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Check if a given key exists in the given hashmap.
- * Write a pointer to the target node on success.
- * Otherwise SXERR_NOTFOUND is returned on failure.
+ *  Command:   MGET key [key ...]
+ * Description:
+ *   Returns the values of all specified keys. For every key that
+ *   does not hold a string value or does not exist, the special value
+ *   nil is returned. Because of this, the operation never fails.
+ * Return:
+ *   Array: Multiple values.
  */
-static sxi32 HashmapLookup(
-	vedis_hashmap *pMap,          /* Target hashmap */
-	vedis_value *pKey,            /* Lookup key */
-	vedis_hashmap_node **ppNode   /* OUT: target node on success */
-	)
+static int vedis_cmd_mget(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode = 0; /* cc -O6 warning */
-	sxi32 rc;
-	if( pKey->iFlags & (MEMOBJ_STRING|MEMOBJ_HASHMAP) ){
-		if( (pKey->iFlags & MEMOBJ_STRING) == 0 ){
-			/* Force a string cast */
-			vedisMemObjToString(&(*pKey));
-		}
-		if( SyBlobLength(&pKey->sBlob) > 0 ){
-			/* Perform a blob lookup */
-			rc = HashmapLookupBlobKey(&(*pMap), SyBlobData(&pKey->sBlob), SyBlobLength(&pKey->sBlob), &pNode);
-			goto result;
-		}
+	vedis_value *pArray,*pScalar;
+	SyBlob *pWorker;
+	int i,rc;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Perform an int lookup */
-	if((pKey->iFlags & MEMOBJ_INT) == 0 ){
-		/* Force an integer cast */
-		vedisMemObjToInteger(pKey);
+	/* Allocate a new array and a working buffer */
+	pArray = vedis_context_new_array(pCtx);
+	pScalar = vedis_context_new_scalar(pCtx);
+	if( pArray == 0 || pScalar == 0){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		/* return null */
+		vedis_result_null(pCtx);
+		/* pScalar and pArray will be automaticallay desotroyed */
+		return VEDIS_OK;
 	}
-	/* Perform an int lookup */
-	rc = HashmapLookupIntKey(&(*pMap), pKey->x.iVal, &pNode);
-result:
-	if( rc == SXRET_OK ){
-		/* Node found */
-		if( ppNode ){
-			*ppNode = pNode;
-		}
-		return SXRET_OK;
+	vedis_value_string(pScalar,0,0);
+	pWorker = vedisObjectValueBlob(pScalar);
+	for( i = 0 ; i < argc; ++i ){
+		/* Fetch the record */
+		SyBlobReset(pWorker);
+		rc = vedisFetchValue(pCtx,argv[i],pWorker);
+		/* Populate our array */
+		vedis_array_insert(pArray,rc == VEDIS_OK ? pScalar /* Will make its own copy */ : 0 /* null */);
 	}
-	/* No such entry */
-	return SXERR_NOTFOUND;
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	return VEDIS_OK;
 }
 /*
- * Check if the given BLOB key looks like a decimal number. 
- * Retrurn TRUE on success.FALSE otherwise.
+ * Store a key/value pair. When bPersist is true, the time to live of the
+ * key is discarded, as done by SET.
  */
-static int HashmapIsIntKey(SyBlob *pKey)
+static int VedisStoreValue(vedis_context *pCtx,vedis_value *pKey,vedis_value *pData,int bPersist)
 {
-	const char *zIn  = (const char *)SyBlobData(pKey);
-	const char *zEnd = &zIn[SyBlobLength(pKey)];
-	if( (int)(zEnd-zIn) > 1 && zIn[0] == '0' ){
-		/* Octal not decimal number */
-		return FALSE;
-	}
-	if( (zIn[0] == '-' || zIn[0] == '+') && &zIn[1] < zEnd ){
-		zIn++;
+	const char *zKey,*zData;
+	int nKey,nData;
+	int rc;
+	/* Extract the key and data */
+	zKey  = vedis_value_to_string(pKey,&nKey);
+	zData = vedis_value_to_string(pData,&nData);
+	/* Perform the store operation */
+	rc = vedis_context_kv_store(pCtx,zKey,nKey,zData,(vedis_int64)nData);
+	if( rc == VEDIS_OK && bPersist ){
+		vedisExpireClear(pCtx->pVedis,zKey,nKey);
 	}
-	for(;;){
-		if( zIn >= zEnd ){
-			return TRUE;
-		}
-		if( (unsigned char)zIn[0] >= 0xc0 /* UTF-8 stream */  || !SyisDigit(zIn[0]) ){
-			break;
-		}
-		zIn++;
+	return rc;
+}
+/*
+ *  Command:   SET key value
+ * Description:
+ *   Set key to hold the string value. If key already holds a value, it is overwritten,
+ *   regardless of its type. Any previous time to live associated with the key is
+ *   discarded on successful SET operation.
+ * Return:
+ *   bool: TRUE on success, FALSE otherwise.
+ */
+static int vedis_cmd_set(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	int rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* Key does not look like a decimal number */
-	return FALSE;
+	/* Perform the store operation */
+	rc = VedisStoreValue(pCtx,argv[0],argv[1],TRUE);
+	/* Store result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Insert a given key and it's associated value (if any) in the given
- * hashmap.
- * If a node with the given key already exists in the database
- * then this function overwrite the old value.
+ *  Command:  SETNX key value
+ * Description:
+ *   Set key to hold string value if key does not exist. In that case, it is equal to SET.
+ *   When key already holds a value, no operation is performed. SETNX is short for
+ *  "SET if N ot e X ists".
+ * Return:
+ *   bool: TRUE on success, FALSE otherwise.
  */
-static sxi32 HashmapInsert(
-	vedis_hashmap *pMap, /* Target hashmap */
-	vedis_value *pKey,   /* Lookup key  */
-	vedis_value *pVal    /* Node value */
-	)
+static int vedis_cmd_setnx(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode = 0;
-	sxi32 rc = SXRET_OK;
-	
-	if( pKey && (pKey->iFlags & (MEMOBJ_STRING|MEMOBJ_HASHMAP)) ){
-		if( (pKey->iFlags & MEMOBJ_STRING) == 0 ){
-			/* Force a string cast */
-			vedisMemObjToString(&(*pKey));
-		}
-		if( SyBlobLength(&pKey->sBlob) < 1 || HashmapIsIntKey(&pKey->sBlob) ){
-			if(SyBlobLength(&pKey->sBlob) < 1){
-				/* Automatic index assign */
-				pKey = 0;
-			}
-			goto IntKey;
-		}
-		if( SXRET_OK == HashmapLookupBlobKey(&(*pMap), SyBlobData(&pKey->sBlob), 
-			SyBlobLength(&pKey->sBlob), &pNode) ){
-				/* Overwrite the old value */
-				if( pVal ){
-					vedisMemObjStore(pVal,&pNode->sValue);
-				}else{
-					/* Nullify the entry */
-					vedisMemObjToNull(&pNode->sValue);
-				}
-				return SXRET_OK;
-		}
-		/* Perform a blob-key insertion */
-		rc = HashmapInsertBlobKey(&(*pMap),SyBlobData(&pKey->sBlob),SyBlobLength(&pKey->sBlob),&(*pVal));
-		return rc;
+	int rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-IntKey:
-	if( pKey ){
-		if((pKey->iFlags & MEMOBJ_INT) == 0 ){
-			/* Force an integer cast */
-			vedisMemObjToInteger(pKey);
-		}
-		if( SXRET_OK == HashmapLookupIntKey(&(*pMap), pKey->x.iVal, &pNode) ){
-			/* Overwrite the old value */
-			if( pVal ){
-				vedisMemObjStore(pVal,&pNode->sValue);
-			}else{
-				/* Nullify the entry */
-				vedisMemObjToNull(&pNode->sValue);
-			}
-			return SXRET_OK;
-		}
-		/* Perform a 64-bit-int-key insertion */
-		rc = HashmapInsertIntKey(&(*pMap), pKey->x.iVal, &(*pVal));
-		if( rc == SXRET_OK ){
-			if( pKey->x.iVal >= pMap->iNextIdx ){
-				/* Increment the automatic index */ 
-				pMap->iNextIdx = pKey->x.iVal + 1;
-				/* Make sure the automatic index is not reserved */
-				while( SXRET_OK == HashmapLookupIntKey(&(*pMap), pMap->iNextIdx, 0) ){
-					pMap->iNextIdx++;
-				}
-			}
-		}
-	}else{
-		/* Assign an automatic index */
-		rc = HashmapInsertIntKey(&(*pMap),pMap->iNextIdx,&(*pVal));
-		if( rc == SXRET_OK ){
-			++pMap->iNextIdx;
-		}
+	/* Fetch the key */
+	rc = vedisFetchValue(pCtx,argv[0],0);
+	if( rc == VEDIS_OK ){
+		/* Key exists, return FALSE */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* Insertion result */
-	return rc;
+	/* Perform the store operation */
+	rc = VedisStoreValue(pCtx,argv[0],argv[1],TRUE);
+	/* Store result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Allocate a new hashmap.
- * Return a pointer to the freshly allocated hashmap on success.NULL otherwise.
+ *  Command:   MSET key value [key value]
+ * Description:
+ *   Sets the given keys to their respective values. MSET replaces existing values
+ *   with new values, just as regular SET. See MSETNX if you don't want to overwrite
+ *   existing values.
+ *   MSET is atomic, so all given keys are set at once. It is not possible for clients
+ *   to see that some of the keys were updated while others are unchanged.
+ * Return:
+ *   bool: TRUE on success, FALSE otherwise.
  */
-VEDIS_PRIVATE vedis_hashmap * vedisNewHashmap(
-	vedis *pStore,             /* Engine that trigger the hashmap creation */
-	sxu32 (*xIntHash)(sxi64), /* Hash function for int keys.NULL otherwise*/
-	sxu32 (*xBlobHash)(const void *, sxu32) /* Hash function for BLOB keys.NULL otherwise */
-	)
+static int vedis_cmd_mset(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap *pMap;
-	/* Allocate a new instance */
-	pMap = (vedis_hashmap *)SyMemBackendPoolAlloc(&pStore->sMem, sizeof(vedis_hashmap));
-	if( pMap == 0 ){
-		return 0;
+	int i,rc = VEDIS_OK;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* Zero the structure */
-	SyZero(pMap, sizeof(vedis_hashmap));
-	/* Fill in the structure */
-	pMap->pStore = &(*pStore);
-	pMap->iRef = 1;
-	/* pMap->iFlags = 0; */
-	/* Default hash functions */
-	pMap->xIntHash  = xIntHash ? xIntHash : IntHash;
-	pMap->xBlobHash = xBlobHash ? xBlobHash : BinHash;
-	return pMap;
+	for( i = 0 ; i + 1 < argc ; i += 2 ){
+		/* Perform the store operation */
+		rc = VedisStoreValue(pCtx,argv[i],argv[i + 1],TRUE);
+		if( rc != VEDIS_OK ){
+			break;
+		}
+	}
+	/* Store result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Increment the reference count of a given hashmap.
+ *  Command:   MSETNX key value [key value]
+ * Description:
+ *   Sets the given keys to their respective values. MSETNX replaces existing values
+ *   with new values only if the key does not exits, just as regular SETNX. 
+ *   MSET is atomic, so all given keys are set at once. It is not possible for clients
+ *   to see that some of the keys were updated while others are unchanged.
+ * Return:
+ *   bool: TRUE on success, FALSE otherwise.
  */
-VEDIS_PRIVATE void vedisHashmapRef(vedis_hashmap *pMap)
+static int vedis_cmd_msetnx(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	pMap->iRef++;
+	int i,rc = VEDIS_OK;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	for( i = 0 ; i + 1 < argc ; i += 2 ){
+		/* Fetch the key first */
+		rc = vedisFetchValue(pCtx,argv[i],0);
+		if( rc == VEDIS_OK ){
+			/* Key exists, ignore */
+			continue;
+		}
+		/* Perform the store operation */
+		rc = VedisStoreValue(pCtx,argv[i],argv[i + 1],TRUE);
+		if( rc != VEDIS_OK ){
+			break;
+		}
+	}
+	/* Store result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	return VEDIS_OK;
 }
 /*
- * Release a hashmap.
+ *  Command:    GETSET key value
+ * Description:
+ *   Atomically sets key to value and returns the old value stored at key.
+ *   Returns an error when key exists but does not hold a string value.
+ * Return:
+ *   the old value stored at key, or nil when key does not exist.
  */
-static sxi32 vedisHashmapRelease(vedis_hashmap *pMap)
+static int vedis_cmd_getset(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pEntry, *pNext;
-	vedis *pStore = pMap->pStore;
-	sxu32 n;
-	/* Start the release process */
-	n = 0;
-	pEntry = pMap->pFirst;
-	for(;;){
-		if( n >= pMap->nEntry ){
-			break;
-		}
-		pNext = pEntry->pPrev; /* Reverse link */
-		/* Release the vedis_value */
-		vedisMemObjRelease(&pEntry->sValue);
-		/* Release the node */
-		if( pEntry->iType == HASHMAP_BLOB_NODE ){
-			SyBlobRelease(&pEntry->xKey.sKey);
-		}
-		SyMemBackendPoolFree(&pStore->sMem, pEntry);
-		/* Point to the next entry */
-		pEntry = pNext;
-		n++;
+	SyBlob *pWorker;
+	int rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	if( pMap->nEntry > 0 ){
-		/* Release the hash bucket */
-		SyMemBackendFree(&pStore->sMem, pMap->apBucket);
+	/* Working buffer */
+	pWorker = VedisContextWorkingBuffer(pCtx);
+	SyBlobReset(pWorker);
+	/* Fetch the key first */
+	rc = vedisFetchValue(pCtx,argv[0],pWorker);
+	if( rc != VEDIS_OK ){
+		/* Key does not exists, return null */
+		vedis_result_null(pCtx);
+	}else{
+		/* old value */
+		vedis_result_string(pCtx,(const char *)SyBlobData(pWorker),(int)SyBlobLength(pWorker));
 	}
-	/* Free the whole instance */
-	SyMemBackendPoolFree(&pStore->sMem, pMap);
-	return SXRET_OK;
+	/* Perform the store operation */
+	VedisStoreValue(pCtx,argv[0],argv[1],TRUE);
+	return VEDIS_OK;
 }
 /*
- * Decrement the reference count of a given hashmap.
- * If the count reaches zero which mean no more variables
- * are pointing to this hashmap, then release the whole instance.
+ * Increment/Decrement a vedis record. 
  */
-VEDIS_PRIVATE void vedisHashmapUnref(vedis_hashmap *pMap)
+static int vedisValueIncrementBy(vedis_context *pCtx,vedis_value *pKey,vedis_int64 nIncrement,int decr_op)
 {
-	pMap->iRef--;
-	if( pMap->iRef < 1 ){
-		vedisHashmapRelease(pMap);
+	vedis_int64 iVal = 0;
+	vedis_value *pScalar;
+	SyBlob *pWorker;
+	int rc;
+	pWorker = VedisContextWorkingBuffer(pCtx);
+	SyBlobReset(pWorker);
+	/* Fetch the value */
+	rc = vedisFetchValue(pCtx,pKey,pWorker);
+	if( rc == VEDIS_OK && SyBlobLength(pWorker) > 0 ){
+		/* Cast to an integer */
+		SyStrToInt64((const char *)SyBlobData(pWorker),SyBlobLength(pWorker),(void *)&iVal,0);
 	}
-}
-VEDIS_PRIVATE vedis * vedisHashmapGetEngine(vedis_hashmap *pMap)
-{
-	return pMap->pStore;
+	if( decr_op ){
+		/* Decrement the number */
+		iVal -= nIncrement;
+	}else{
+		/* Increment the number */
+		iVal += nIncrement;
+	}
+	/* Store the result */
+	vedis_result_int64(pCtx,iVal);
+	/* Update the database */
+	pScalar = vedis_context_new_scalar(pCtx);
+	if( pScalar ==  0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		rc = VEDIS_NOMEM;
+	}else{
+		vedis_value_int64(pScalar,iVal);
+		/* Update the database */
+		rc = VedisStoreValue(pCtx,pKey,pScalar,FALSE);
+		/* cleanup */
+		vedis_context_release_value(pCtx,pScalar);
+	}
+	return rc;
 }
 /*
- * Check if a given key exists in the given hashmap.
- * Write a pointer to the target node on success.
- * Otherwise SXERR_NOTFOUND is returned on failure.
+ *  Command:     INCR key
+ * Description:
+ *   Increments the number stored at key by one. If the key does not exist,
+ *   it is set to 0 before performing the operation. An error is returned if
+ *   the key contains a value of the wrong type or contains a string that can
+ *   not be represented as integer. This operation is limited to 64 bit signed integers.
+ * Return:
+ *   the value of key after the increment
  */
-VEDIS_PRIVATE sxi32 vedisHashmapLookup(
-	vedis_hashmap *pMap,        /* Target hashmap */
-	vedis_value *pKey,          /* Lookup key */
-	vedis_value **ppOut /* OUT: Target node on success */
-	)
+static int vedis_cmd_incr(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pNode;
-	sxi32 rc;
-	if( pMap->nEntry < 1 ){
-		/* TICKET 1433-25: Don't bother hashing, the hashmap is empty anyway.
-		 */
-		return SXERR_NOTFOUND;
-	}
-	rc = HashmapLookup(&(*pMap), &(*pKey),&pNode);
-	if( rc != SXRET_OK ){
-		return rc;
-	}
-	if( ppOut ){
-		/* Point to the node value */
-		*ppOut = &pNode->sValue;
+	int rc;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
 	}
-	return VEDIS_OK;
+	/* Increment */
+	rc = vedisValueIncrementBy(pCtx,argv[0],1,0);
+	return rc;
 }
 /*
- * Insert a given key and it's associated value (if any) in the given
- * hashmap.
- * If a node with the given key already exists in the database
- * then this function overwrite the old value.
+ *  Command:     DECR key
+ * Description:
+ *   Decrement the number stored at key by one. If the key does not exist,
+ *   it is set to 0 before performing the operation. An error is returned if
+ *   the key contains a value of the wrong type or contains a string that can
+ *   not be represented as integer. This operation is limited to 64 bit signed integers.
+ * Return:
+ *   the value of key after the decrement
  */
-VEDIS_PRIVATE sxi32 vedisHashmapInsert(
-	vedis_hashmap *pMap, /* Target hashmap */
-	vedis_value *pKey,   /* Lookup key */
-	vedis_value *pVal    /* Node value.NULL otherwise */
-	)
+static int vedis_cmd_decr(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	sxi32 rc;
-	rc = HashmapInsert(&(*pMap), &(*pKey), &(*pVal));
+	int rc;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* decrement */
+	rc = vedisValueIncrementBy(pCtx,argv[0],1,1);
 	return rc;
 }
 /*
- * Iterate throw hashmap entries and invoke the given callback [i.e: xWalk()] for each 
- * retrieved entry.
- * If the callback wishes to abort processing [i.e: it's invocation] it must return
- * a value different from VEDIS_OK.
- * Refer to [vedis_array_walk()] for more information.
+ *  Command:   INCRBY key increment 
+ * Description:
+ *   Increments the number stored at key by increment. If the key does not exist, it
+ *   is set to 0 before performing the operation. An error is returned if the key
+ *   contains a value of the wrong type or contains a string that can not be represented
+ *   as integer. This operation is limited to 64 bit signed integers.
+ * Return:
+ *   the value of key after the increment
  */
-VEDIS_PRIVATE sxi32 vedisHashmapWalk(
-	vedis_hashmap *pMap, /* Target hashmap */
-	int (*xWalk)(vedis_value *, void *), /* Walker callback */
-	void *pUserData /* Last argument to xWalk() */
-	)
+static int vedis_cmd_incrby(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_hashmap_node *pEntry;
-	sxi32 rc;
-	sxu32 n;
-	/* Initialize walker parameter */
-	rc = SXRET_OK;
-	n = pMap->nEntry;
-	pEntry = pMap->pFirst;
-	/* Start the iteration process */
-	for(;;){
-		if( n < 1 ){
-			break;
-		}
-		/* Invoke the user callback */
-		rc = xWalk(&pEntry->sValue,pUserData);
-		if( rc != VEDIS_OK ){
-			/* Callback request an operation abort */
-			return SXERR_ABORT;
-		}
-		/* Point to the next entry */
-		pEntry = pEntry->pPrev; /* Reverse link */
-		n--;
+	vedis_int64 iIncr;
+	int rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/increment");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* All done */
-	return SXRET_OK;
+	/* Number to increment by */
+	iIncr = vedis_value_to_int64(argv[1]);
+	/* Increment */
+	rc = vedisValueIncrementBy(pCtx,argv[0],iIncr,0);
+	return rc;
 }
 /*
- * Reset the node cursor of a given hashmap.
+ *  Command:   DECRBY key increment 
+ * Description:
+ *   Decrements the number stored at key by decrement. If the key does not exist, it
+ *   is set to 0 before performing the operation. An error is returned if the key
+ *   contains a value of the wrong type or contains a string that can not be represented
+ *   as integer. This operation is limited to 64 bit signed integers.
+ * Return:
+ *   the value of key after the decrement
  */
-VEDIS_PRIVATE void vedisHashmapResetLoopCursor(vedis_hashmap *pMap)
+static int vedis_cmd_decrby(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	/* Reset the loop cursor */
-	pMap->pCur = pMap->pFirst;
+	vedis_int64 iDecr;
+	int rc;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/decrement");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Number to decrement by */
+	iDecr = vedis_value_to_int64(argv[1]);
+	/* Increment */
+	rc = vedisValueIncrementBy(pCtx,argv[0],iDecr,1);
+	return rc;
 }
 /*
- * Return a pointer to the node currently pointed by the node cursor.
- * If the cursor reaches the end of the list, then this function
- * return NULL.
- * Note that the node cursor is automatically advanced by this function.
+ * Fetch a key from the given vedis Table.
  */
-VEDIS_PRIVATE vedis_value * vedisHashmapGetNextEntry(vedis_hashmap *pMap)
+static vedis_table_entry * vedisGetEntryFromTable(vedis_context *pCtx,vedis_value *pTable,vedis_value *pKey)
 {
-	vedis_hashmap_node *pCur = pMap->pCur;
-	if( pCur == 0 ){
-		/* End of the list, return null */
+	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
+	/* Fetch the table first */
+	pHash = vedisFetchTable(pVedis,pTable,0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table */
 		return 0;
 	}
-	/* Advance the node cursor */
-	pMap->pCur = pCur->pPrev; /* Reverse link */
-	/* Entry value */
-	return &pCur->sValue;
+	/* Try to fetch the field */
+	pEntry = vedisTableGetRecord(pHash,pKey);
+	return pEntry;
+}
+#define VEDIS_ENTRY_BLOB(ENTRY) (ENTRY->iType == VEDIS_TABLE_ENTRY_BLOB_NODE)
+static void vedisEntryKey(vedis_table_entry *pEntry,SyString *pOut)
+{
+	SyStringInitFromBuf(pOut,SyBlobData(&pEntry->xKey.sKey),SyBlobLength(&pEntry->xKey.sKey));
 }
 /*
- * ----------------------------------------------------------
- * File: cmd.c
- * MD5: 9f423624c51655b52e412da8cc3bb222
- * ----------------------------------------------------------
- */
-/*
- * Symisc Vedis: A Highly Efficient Embeddable Data Store Engine.
- * Copyright (C) 2013, Symisc Systems http://vedis.symisc.net/
- * Version 1.2.6
- * For information on licensing, redistribution of this file, and for a DISCLAIMER OF ALL WARRANTIES
- * please contact Symisc Systems via:
- *       legal@symisc.net
- *       licensing@symisc.net
- *       contact@symisc.net
- * or visit:
- *      http://vedis.symisc.net/
- */
-/* $SymiscID: cmd.c v1.2 FreeBSD 2013-07-10 04:45 stable <chm@symisc.net> $ */
-#ifndef VEDIS_AMALGAMATION
-#include "vedisInt.h"
-#endif
-/* Implementation of the vedis commands  */
-/*
- *  Command: DEL key [key ...]
- * Description:
- *   Removes the specified keys. A key is ignored if it does not exist.
- * Return:
- * Integer: The number of keys that were removed.
+ * Incremental iteration over a table, shared by HSCAN and SSCAN.
+ * A cursor of 0 starts the iteration. Each call returns an array whose
+ * first element is the cursor to pass to the next call (0 when the
+ * iteration is complete), followed by the requested entries. The cursor is
+ * derived from the unique ID of the next entry to visit. Entries are linked
+ * in ascending ID order, so an iteration resumes with the first entry whose
+ * ID is not lower, even if the entry it stopped at was deleted since. The
+ * positions of the last few iterations are remembered in the table, so that
+ * they resume in constant time even when interleaved; other cursors walk the
+ * table once, from its nearest end.
  */
-static int vedis_cmd_del(vedis_context *pCtx,int argc,vedis_value **argv)
+#define VEDIS_SCAN_KEYS   0x01 /* Return entry keys */
+#define VEDIS_SCAN_VALUES 0x02 /* Return entry values */
+static int vedisTableScan(vedis_context *pCtx,vedis_table *pTable,int argc,vedis_value **argv,int iWhat)
 {
-	int nDel = 0; 
-	int rc;
-	int i;
-	/* Delete the given keys */
-	for( i = 0 ; i < argc; ++i ){
-		const char *zValue;
-		int nByte;
-		/* String representation of the key */
-		zValue = vedis_value_to_string(argv[i],&nByte);
-		/* Delete the key */
-		rc = vedis_context_kv_delete(pCtx,(const void *)zValue,nByte);
-		if( rc == VEDIS_OK ){
-			nDel++;
+	vedis_value *pScalar,*pArray,*pSlot;
+	vedis_table_entry *pEntry;
+	sxi64 iCursor,nCount;
+	SyString sKey;
+	int iSlot,i;
+	/* Cursor and maximum number of entries to return */
+	iCursor = argc > 1 ? vedis_value_to_int64(argv[1]) : 0;
+	nCount = argc > 2 ? vedis_value_to_int64(argv[2]) : 10;
+	if( nCount < 1 ){
+		nCount = 1;
+	}
+	/* Allocate a new scalar and array */
+	pScalar = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	pEntry = 0;
+	iSlot = -1;
+	if( pTable ){
+		/* Scanning requires every entry */
+		vedisTableMaterialize(pTable);
+		if( iCursor < 0 || iCursor > (sxi64)pTable->nLastID ){
+			vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid scan cursor");
+			vedis_context_release_value(pCtx,pScalar);
+			/* return null */
+			vedis_result_null(pCtx);
+			return VEDIS_OK;
+		}
+		for( i = 0 ; i < VEDIS_SCAN_SLOTS && iCursor != 0 ; ++i ){
+			if( pTable->aScanCursor[i] == iCursor ){
+				iSlot = i;
+				break;
+			}
+		}
+		if( iCursor == 0 ){
+			pEntry = pTable->pFirst;
+		}else if( iSlot >= 0 ){
+			/* Resume from the remembered entry */
+			pEntry = pTable->apScan[iSlot];
+		}else if( pTable->pLast && (sxi64)pTable->pLast->nId + 1 >= iCursor ){
+			/* Look for the first entry whose ID is not lower, from the nearest end */
+			if( iCursor - (sxi64)pTable->pFirst->nId <= (sxi64)pTable->pLast->nId + 1 - iCursor ){
+				pEntry = pTable->pFirst;
+				while( (sxi64)pEntry->nId + 1 < iCursor ){
+					pEntry = pEntry->pPrev; /* Reverse link */
+				}
+			}else{
+				pEntry = pTable->pLast;
+				while( pEntry->pNext && (sxi64)pEntry->pNext->nId + 1 >= iCursor ){
+					pEntry = pEntry->pNext;
+				}
+			}
 		}
 	}
-	/* Total number of removed keys */
-	vedis_result_int(pCtx,nDel);
+	/* Reserve the first slot for the next cursor */
+	vedis_value_int64(pScalar,0);
+	vedis_array_insert(pArray,pScalar);
+	while( pEntry && nCount > 0 ){
+		if( iWhat & VEDIS_SCAN_KEYS ){
+			if( VEDIS_ENTRY_BLOB(pEntry) ){
+				vedisEntryKey(pEntry,&sKey);
+				vedis_value_reset_string_cursor(pScalar);
+				vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
+			}else{
+				vedis_value_int64(pScalar,pEntry->xKey.iKey);
+			}
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+		}
+		if( iWhat & VEDIS_SCAN_VALUES ){
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+		}
+		pEntry = pEntry->pPrev; /* Reverse link */
+		nCount--;
+	}
+	if( pEntry ){
+		/* Remember where to resume from */
+		if( iSlot < 0 ){
+			iSlot = (int)(pTable->iScanSlot++ % VEDIS_SCAN_SLOTS);
+		}
+		iCursor = (sxi64)pEntry->nId + 1;
+		pTable->apScan[iSlot] = pEntry;
+		pTable->aScanCursor[iSlot] = iCursor;
+		pSlot = vedis_array_fetch(pArray,0);
+		if( pSlot ){
+			vedis_value_int64(pSlot,iCursor);
+		}
+	}else if( iSlot >= 0 ){
+		/* Iteration complete */
+		pTable->apScan[iSlot] = 0;
+		pTable->aScanCursor[iSlot] = 0;
+	}
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:  EXISTS key
+ *  Command:    HSCAN key cursor [count [KEYS|VALUES]]
  * Description:
- *   Check key existance.
+ *   Incrementally iterate over the fields of the hash stored at key, returning
+ *   at most count (default 10) field/value pairs per call. Start with a cursor
+ *   of 0 and pass the returned cursor to the next call, until it is 0 again.
+ *   With KEYS (resp. VALUES), only the fields (resp. the values) are returned.
  * Return:
- *   bool: TRUE if key exists. FALSE otherwise.
+ *   array holding the next cursor followed by the fields and/or values, or nil
+ *   when the cursor is no longer valid.
  */
-static int vedis_cmd_exists(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hscan(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc = VEDIS_NOTFOUND;
-	if( argc > 0 ){
-		const char *zKey;
-		int nByte;
-		/* Target key */
-		zKey = vedis_value_to_string(argv[0],&nByte);
-		/* Fetch */
-		rc = vedis_context_kv_fetch_callback(pCtx,zKey,nByte,0,0);
+	vedis_table *pHash;
+	const char *zMode;
+	int iWhat = VEDIS_SCAN_KEYS|VEDIS_SCAN_VALUES;
+	int nLen;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
-	return VEDIS_OK;
+	if( argc > 3 ){
+		/* What to return */
+		zMode = vedis_value_to_string(argv[3],&nLen);
+		if( nLen == (int)sizeof("KEYS")-1 && SyStrnicmp(zMode,"KEYS",sizeof("KEYS")-1) == 0 ){
+			iWhat = VEDIS_SCAN_KEYS;
+		}else if( nLen == (int)sizeof("VALUES")-1 && SyStrnicmp(zMode,"VALUES",sizeof("VALUES")-1) == 0 ){
+			iWhat = VEDIS_SCAN_VALUES;
+		}
+	}
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	return vedisTableScan(pCtx,pHash,argc,argv,iWhat);
 }
 /*
- *  Command:   APPEND key value
+ *  Command:    HGET key field 
  * Description:
- *   If key already exists and is a string, this command appends the value
- *   at the end of the string. If key does not exist it is created and set 
- *   as an empty string, so APPEND will be similar to SET in this special case.
+ *   Returns the value associated with field in the hash stored at key.
  * Return:
- *   Integer: the length of the string after the append operation.
+ *   the value associated with field, or nil when field is not present in the hash
+ *   or key does not exist.
  */
-static int vedis_cmd_append(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hget(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	const char *zKey,*zValue;
-	vedis_int64 nTot;
-	int nKey,nByte;
-	int rc;
-	if( argc < 2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
-		/* Return 0 */
-		vedis_result_int(pCtx,0);
+	vedis_table_entry *pEntry;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Target key */
-	zKey  = vedis_value_to_string(argv[0],&nKey);
-	zValue = vedis_value_to_string(argv[1],&nByte);
-	if( nByte > 0 ){
-		/* Append */
-		rc = vedis_context_kv_append(pCtx,zKey,nKey,zValue,nByte);
-		if( rc != VEDIS_OK ){
-			vedis_result_int(pCtx,0);
-			return VEDIS_ABORT;
-		}
+	/* Go fetch */
+	pEntry = vedisGetEntryFromTable(pCtx,argv[0],argv[1]);
+	if( pEntry == 0 ){
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* New length */
-	nTot = nByte;
-	vedis_context_kv_fetch(pCtx,zKey,nKey,0,&nTot);
-	vedis_result_int64(pCtx,nTot);
+	/* Return the payload */
+	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
 	return VEDIS_OK;
 }
 /*
- *  Command:   STRLEN key
+ *  Command:     HMGET key field [field ...]  
  * Description:
- *   Returns the length of the string value stored at key. An error is returned when key
- *   holds a non-string value.
+ *   Returns the values associated with the specified fields in the hash stored at key.
+ *   For every field that does not exist in the hash, a nil value is returned.
+ *   Because a non-existing keys are treated as empty hashes, running HMGET against
+ *   a non-existing key will return a list of nil values.
  * Return:
- *   Integer: The length of the string at key, or 0 when key does not exist.
+ *   array of values associated with the given fields, in the same order as they are requested.
  */
-static int vedis_cmd_strlen(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hmget(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_int64 nByte = 0;
-	if( argc > 0 ){
-		const char *zKey;
-		int nKey;
-		/* Target key */
-		zKey  = vedis_value_to_string(argv[0],&nKey);
-		vedis_context_kv_fetch(pCtx,zKey,nKey,0,&nByte);
+	vedis_value *pScalar,*pArray;
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
+	int i;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Allocate a new scalar and array */
+	pScalar = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	vedis_result_int64(pCtx,nByte);
+	/* Perform the requested operation */
+	for( i = 1 ; i < argc ; ++i ){
+		/* Fetch the record */
+		pEntry = vedisTableGetRecord(pHash,argv[i]);
+		if( pEntry == 0 ){
+			/* Insert null */
+			vedis_value_null(pScalar);
+		}else{
+			/* Populate the scalar with the data */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+		}
+		/* Perform the insertion */
+		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+	}
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- * Fetch Key value from the underlying database.
- */
-static int vedisFetchValue(vedis_context *pCtx,vedis_value *pArg,SyBlob *pOut)
-{
-	const char *zKey;
-	int nByte;
-	int rc;
-	/* Target key */
-	zKey = vedis_value_to_string(pArg,&nByte);
-	/* Fetch the value */
-	rc = vedis_context_kv_fetch_callback(pCtx,zKey,nByte,pOut ? vedisDataConsumer : 0,pOut);
-	return rc;
-}
-/*
- *  Command:   GET key
+ *  Command:      HKEYS key  
  * Description:
- *   Get the value of key. If the key does not exist the special value nil is returned.
+ *   Returns all field names in the hash stored at key.
  * Return:
- *   the value of key, or nil when key does not exist.
+ *   array of fields in the hash, or null on failure.
  */
-static int vedis_cmd_get(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hkeys(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc;
+	vedis_value *pScalar,*pArray;
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
+	
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the record */
-	rc = vedisFetchValue(pCtx,argv[0],VedisContextResultBuffer(pCtx));
-	if( rc == VEDIS_OK ){
-		vedis_result_string(pCtx,0,0);
-	}else{
-		/* No such record */
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return null */
 		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	return VEDIS_OK;
-}
-/*
- *  Command:   COPY old_key new_key
- * Description:
- *   Copy key values.
- * Return:
- *   Boolean: TRUE on success. FALSE otherwise.
- */
-static int vedis_cmd_copy(vedis_context *pCtx,int argc,vedis_value **argv)
-{
-	const char *zNew;
-	SyBlob *pWorker;
-	int nByte,rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing old_key/new_key pair");
+	/* Allocate a new scalar and array */
+	pScalar = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	pWorker = VedisContextWorkingBuffer(pCtx);
-	SyBlobReset(pWorker);
-	/* Fetch the record */
-	rc = vedisFetchValue(pCtx,argv[0],pWorker);
-	if( rc != VEDIS_OK ){
-		/* No such record, return FALSE */
-		vedis_result_bool(pCtx,0);
+	/* Perform the requested operation */
+	vedisTableReset(pHash);
+	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
+		if( VEDIS_ENTRY_BLOB(pEntry) ){
+			SyString sKey;
+			vedisEntryKey(pEntry,&sKey);
+			/* Populate the scalar with the data */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
+			/* Perform the insertion */
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+		}
 	}
-	/* Duplicate the record */
-	zNew = vedis_value_to_string(argv[1],&nByte);
-	rc = vedis_context_kv_store(pCtx,zNew,nByte,SyBlobData(pWorker),(vedis_int64)SyBlobLength(pWorker));
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:   MOVE old_key new_key
+ *  Command:       HVALS key  
  * Description:
- *   Move key values.
+ *   Returns all values in the hash stored at key.
  * Return:
- *   Boolean: TRUE on success. FALSE otherwise.
+ *   array of values in the hash, or an empty list when key does not exist.
  */
-static int vedis_cmd_move(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hvals(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	const char *zNew;
-	SyBlob *pWorker;
-	int nByte,rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing old_key/new_key pair");
+	vedis_value *pScalar,*pArray;
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
+	
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	pWorker = VedisContextWorkingBuffer(pCtx);
-	SyBlobReset(pWorker);
-	/* Fetch the record */
-	rc = vedisFetchValue(pCtx,argv[0],pWorker);
-	if( rc != VEDIS_OK ){
-		/* No such record, return FALSE */
-		vedis_result_bool(pCtx,0);
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Duplicate the record */
-	zNew = vedis_value_to_string(argv[1],&nByte);
-	rc = vedis_context_kv_store(pCtx,zNew,nByte,SyBlobData(pWorker),(vedis_int64)SyBlobLength(pWorker));
-	if( rc == VEDIS_OK ){
-		const char *zOld;
-		/* Discard the old record */
-		zOld = vedis_value_to_string(argv[0],&nByte);
-		rc = vedis_context_kv_delete(pCtx,zOld,nByte);
+	/* Allocate a new scalar and array */
+	pScalar = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	/* Perform the requested operation */
+	vedisTableReset(pHash);
+	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
+		/* Populate the scalar with the data */
+		vedis_value_reset_string_cursor(pScalar);
+		vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));		
+		/* Perform the insertion */
+		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+	}
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:   MGET key [key ...]
+ *  Command:      HGETALL key 
  * Description:
- *   Returns the values of all specified keys. For every key that
- *   does not hold a string value or does not exist, the special value
- *   nil is returned. Because of this, the operation never fails.
+ *   Returns all fields and values of the hash stored at key. In the returned value,
+ *   every field name is followed by its value, so the length of the reply is twice
+ *   the size of the hash.
  * Return:
- *   Array: Multiple values.
+ *   array of fields and their values stored in the hash, or an empty list when key does not exist.
  */
-static int vedis_cmd_mget(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hgetall(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pArray,*pScalar;
-	SyBlob *pWorker;
-	int i,rc;
+	vedis_value *pScalar,*pArray;
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Allocate a new array and a working buffer */
-	pArray = vedis_context_new_array(pCtx);
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Allocate a new scalar and array */
 	pScalar = vedis_context_new_scalar(pCtx);
-	if( pArray == 0 || pScalar == 0){
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
 		/* return null */
 		vedis_result_null(pCtx);
-		/* pScalar and pArray will be automaticallay desotroyed */
 		return VEDIS_OK;
 	}
-	vedis_value_string(pScalar,0,0);
-	pWorker = vedisObjectValueBlob(pScalar);
-	for( i = 0 ; i < argc; ++i ){
-		/* Fetch the record */
-		SyBlobReset(pWorker);
-		rc = vedisFetchValue(pCtx,argv[i],pWorker);
-		/* Populate our array */
-		vedis_array_insert(pArray,rc == VEDIS_OK ? pScalar /* Will make its own copy */ : 0 /* null */);
+	/* Perform the requested operation */
+	vedisTableReset(pHash);
+	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
+		if( VEDIS_ENTRY_BLOB(pEntry) ){
+			SyString sKey;
+			vedisEntryKey(pEntry,&sKey);
+			/* Populate the scalar with the key */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
+			/* Insert the key */
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy of pScalar */
+			/* Populate the scalar with the data */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+			/* Perform the insertion */
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+		}
 	}
 	/* Return our array */
 	vedis_result_value(pCtx,pArray);
 	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
+	return VEDIS_OK;
+}
+/*
+ *  Command:    HEXISTS key field 
+ * Description:
+ *   Returns if field is an existing field in the hash stored at key.
+ * Return:
+ *   boolean: TRUE on success, FALSE otherwise.
+ */
+static int vedis_cmd_hexists(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	vedis_table_entry *pEntry;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Go fetch */
+	pEntry = vedisGetEntryFromTable(pCtx,argv[0],argv[1]);
+	if( pEntry == 0 ){
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Return true */
+	vedis_result_bool(pCtx,1);
 	return VEDIS_OK;
 }
-static int VedisStoreValue(vedis_context *pCtx,vedis_value *pKey,vedis_value *pData)
-{
-	const char *zKey,*zData;
-	int nKey,nData;
-	int rc;
-	/* Extract the key and data */
-	zKey  = vedis_value_to_string(pKey,&nKey);
-	zData = vedis_value_to_string(pData,&nData);
-	/* Perform the store operation */
-	rc = vedis_context_kv_store(pCtx,zKey,nKey,zData,(vedis_int64)nData);
-	return rc;
-}
 /*
- *  Command:   SET key value
+ *  Command:     HDEL key field [field ...] 
  * Description:
- *   Set key to hold the string value. If key already holds a value, it is overwritten,
- *   regardless of its type. Any previous time to live associated with the key is
- *   discarded on successful SET operation.
+ *   Removes the specified fields from the hash stored at key. Specified fields
+ *   that do not exist within this hash are ignored. If key does not exist, it is treated
+ *   as an empty hash and this command returns 0.
  * Return:
- *   bool: TRUE on success, FALSE otherwise.
+ *   integer: Total number of fields removed.
  */
-static int vedis_cmd_set(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hdel(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc;
+	vedis_table *pHash;
+	int nDel = 0;
+	int i,rc;
 	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Perform the store operation */
-	rc = VedisStoreValue(pCtx,argv[0],argv[1]);
-	/* Store result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Perform the deletion */
+	for( i = 1 ; i < argc ; ++i ){
+		rc = vedisTableDeleteRecord(pHash,argv[i]);
+		if( rc == VEDIS_OK ){
+			nDel++;
+		}
+	}
+	/* Total number of deleted records */
+	vedis_result_int(pCtx,nDel);
 	return VEDIS_OK;
 }
 /*
- *  Command:  SETNX key value
+ *  Command:     HLEN key 
  * Description:
- *   Set key to hold string value if key does not exist. In that case, it is equal to SET.
- *   When key already holds a value, no operation is performed. SETNX is short for
- *  "SET if N ot e X ists".
+ *   Returns the number of fields contained in the hash stored at key.
  * Return:
- *   bool: TRUE on success, FALSE otherwise.
+ *    number of fields in the hash, or 0 when key does not exist.
  */
-static int vedis_cmd_setnx(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hlen(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
+	vedis_table *pHash;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Fetch the key */
-	rc = vedisFetchValue(pCtx,argv[0],0);
-	if( rc == VEDIS_OK ){
-		/* Key exists, return FALSE */
-		vedis_result_bool(pCtx,0);
+	/* Fetch the table  */
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Perform the store operation */
-	rc = VedisStoreValue(pCtx,argv[0],argv[1]);
-	/* Store result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	vedis_result_int(pCtx,(int)vedisTableLength(pHash));
 	return VEDIS_OK;
 }
 /*
- *  Command:   MSET key value [key value]
+ *  Command:     HSET key field value  
  * Description:
- *   Sets the given keys to their respective values. MSET replaces existing values
- *   with new values, just as regular SET. See MSETNX if you don't want to overwrite
- *   existing values.
- *   MSET is atomic, so all given keys are set at once. It is not possible for clients
- *   to see that some of the keys were updated while others are unchanged.
+ *   Sets field in the hash stored at key to value. If key does not exist, a new key holding
+ *   a hash is created. If field already exists in the hash, it is overwritten.
  * Return:
- *   bool: TRUE on success, FALSE otherwise.
+ *   boolean: TRUE on success. FALSE on failure.
  */
-static int vedis_cmd_mset(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hset(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int i,rc = VEDIS_OK;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
+	vedis_table *pHash;
+	int rc;
+
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
 		/* return false */
 		vedis_result_bool(pCtx,0);
 		return VEDIS_OK;
 	}
-	for( i = 0 ; i + 1 < argc ; i += 2 ){
-		/* Perform the store operation */
-		rc = VedisStoreValue(pCtx,argv[i],argv[i + 1]);
-		if( rc != VEDIS_OK ){
-			break;
-		}
+	/* Fetch the table first */
+	pHash = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return FALSE */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* Store result */
+	/* Perform the insertion  */
+	rc = vedisTableInsertRecord(pHash,argv[1],argv[2]);
+	/* Insertion result */
 	vedis_result_bool(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
 }
 /*
- *  Command:   MSETNX key value [key value]
+ *  Command:      HMSET key field value [field value ...]  
  * Description:
- *   Sets the given keys to their respective values. MSETNX replaces existing values
- *   with new values only if the key does not exits, just as regular SETNX. 
- *   MSET is atomic, so all given keys are set at once. It is not possible for clients
- *   to see that some of the keys were updated while others are unchanged.
+ *   Sets the specified fields to their respective values in the hash stored at key.
+ *   This command overwrites any existing fields in the hash. If key does not exist,
+ *   a new key holding a hash is created.
  * Return:
- *   bool: TRUE on success, FALSE otherwise.
+ *   Integer: Total number of inserted fields.
  */
-static int vedis_cmd_msetnx(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hmset(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int i,rc = VEDIS_OK;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+	vedis_table *pHash;
+	int i,rc,cnt = 0;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
 		/* return false */
 		vedis_result_bool(pCtx,0);
 		return VEDIS_OK;
 	}
-	for( i = 0 ; i + 1 < argc ; i += 2 ){
-		/* Fetch the key first */
-		rc = vedisFetchValue(pCtx,argv[i],0);
+	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	rc = VEDIS_OK;
+	for( i = 1 ; i + 1 < argc ; i += 2 ){
+		rc = vedisTableInsertRecord(pHash,argv[i],argv[i+1]);
 		if( rc == VEDIS_OK ){
-			/* Key exists, ignore */
-			continue;
-		}
-		/* Perform the store operation */
-		rc = VedisStoreValue(pCtx,argv[i],argv[i + 1]);
-		if( rc != VEDIS_OK ){
-			break;
+			cnt++;
 		}
 	}
-	/* Store result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
+	/* Insertion result */
+	vedis_result_int(pCtx,cnt);
 	return VEDIS_OK;
 }
 /*
- *  Command:    GETSET key value
+ *  Command:      HSETNX key field value   
  * Description:
- *   Atomically sets key to value and returns the old value stored at key.
- *   Returns an error when key exists but does not hold a string value.
+ *   Sets field in the hash stored at key to value, only if field does not yet exist.
+ *   If key does not exist, a new key holding a hash is created. If field already exists,
+ *   this operation has no effect.
  * Return:
- *   the old value stored at key, or nil when key does not exist.
+ *   boolean: TRUE on success. FALSE on failure.
  */
-static int vedis_cmd_getset(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_hsetnx(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	SyBlob *pWorker;
+	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
+	vedis_table_entry *pEntry;
+	vedis_table *pHash;
 	int rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
-		/* return null */
-		vedis_result_null(pCtx);
+	
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Working buffer */
-	pWorker = VedisContextWorkingBuffer(pCtx);
-	SyBlobReset(pWorker);
-	/* Fetch the key first */
-	rc = vedisFetchValue(pCtx,argv[0],pWorker);
-	if( rc != VEDIS_OK ){
-		/* Key does not exists, return null */
-		vedis_result_null(pCtx);
-	}else{
-		/* old value */
-		vedis_result_string(pCtx,(const char *)SyBlobData(pWorker),(int)SyBlobLength(pWorker));
+	/* Fetch the table first */
+	pHash = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_HASH);
+	if( pHash == 0 ){
+		/* No such table, return FALSE */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
 	}
-	/* Perform the store operation */
-	VedisStoreValue(pCtx,argv[0],argv[1]);	
+	/* Fetch the record */
+	pEntry = vedisTableGetRecord(pHash,argv[1]);
+	if( pEntry ){
+		/* Record exists, return FALSE */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Safely, erform the insertion  */
+	rc = vedisTableInsertRecord(pHash,argv[1],argv[2]);
+	/* Insertion result */
+	vedis_result_bool(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
 }
 /*
- * Increment/Decrement a vedis record. 
+ *  Command:     TABLE_LIST  
+ * Description:
+ *   Return a array holding the list of loaded vedis tables (i.e. Hashes, Sets, List) in memory.
+ * Return:
+ *   array of loaded tables.
  */
-static int vedisValueIncrementBy(vedis_context *pCtx,vedis_value *pKey,int nIncrement,int decr_op)
+static int vedis_cmd_table_list(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_int64 iVal = 0;
-	vedis_value *pScalar;
-	SyBlob *pWorker;
-	int rc;
-	pWorker = VedisContextWorkingBuffer(pCtx);
-	SyBlobReset(pWorker);
-	/* Fetch the value */
-	rc = vedisFetchValue(pCtx,pKey,pWorker);
-	if( rc == VEDIS_OK && SyBlobLength(pWorker) > 0 ){
-		/* Cast to an integer */
-		SyStrToInt64((const char *)SyBlobData(pWorker),SyBlobLength(pWorker),(void *)&iVal,0);
-	}
-	if( decr_op ){
-		/* Decrement the number */
-		iVal -= nIncrement;
-	}else{
-		/* Increment the number */
-		iVal += nIncrement;
-	}
-	/* Store the result */
-	vedis_result_int64(pCtx,iVal);
-	/* Update the database */
+	vedis *pStore = (vedis *)vedis_context_user_data(pCtx);
+	vedis_value *pScalar,*pArray;
+	vedis_table *pEntry;
+	sxu32 n;
+	/* Allocate a new scalar and array */
 	pScalar = vedis_context_new_scalar(pCtx);
-	if( pScalar ==  0 ){
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
-		rc = VEDIS_NOMEM;
-	}else{
-		vedis_value_int64(pScalar,iVal);
-		/* Update the database */
-		rc = VedisStoreValue(pCtx,pKey,pScalar);
-		/* cleanup */
-		vedis_context_release_value(pCtx,pScalar);
+		/* return null */
+		vedis_result_null(pCtx);
+		SXUNUSED(argc); /* cc warning */
+		SXUNUSED(argv);
+		return VEDIS_OK;
 	}
-	return rc;
+	/* Point to the first entry */
+	pEntry = pStore->pTableList;
+	for( n = 0 ; n < pStore->nTable ; ++n ){
+		SyString *pName = vedisTableName(pEntry);
+		if( pEntry == pStore->pExpire ){
+			/* Internal deadline index */
+			pEntry = vedisTableChain(pEntry);
+			continue;
+		}
+		/* Populate the scalar with the data */
+		vedis_value_reset_string_cursor(pScalar);
+		vedis_value_string(pScalar,pName->zString,(int)pName->nByte);
+		/* Perform the insertion */
+		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+		/* Point to the next loaded table */
+		pEntry = vedisTableChain(pEntry);
+	}
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
+	return VEDIS_OK;
 }
 /*
- *  Command:     INCR key
+ *  Command:    SADD key member [member ...]  
  * Description:
- *   Increments the number stored at key by one. If the key does not exist,
- *   it is set to 0 before performing the operation. An error is returned if
- *   the key contains a value of the wrong type or contains a string that can
- *   not be represented as integer. This operation is limited to 64 bit signed integers.
+ *   Add the specified members to the set stored at key. Specified members that
+ *   are already a member of this set are ignored. If key does not exist, a new
+ *   set is created before adding the specified members. An error is returned when
+ *   the value stored at key is not a set.
  * Return:
- *   the value of key after the increment
+ *   Intger: number of item succesfully stored.
  */
-static int vedis_cmd_incr(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_sadd(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc;
-	if( argc <  1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return 0 */
+	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
+	vedis_table *pSet;
+	int nStore = 0;
+	int i,rc;
+	
+	if( argc < 2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
+		/* return zero */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Increment */
-	rc = vedisValueIncrementBy(pCtx,argv[0],1,0);
-	return rc;
+	/* Fetch the table first */
+	pSet = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Perform the insertion  */
+	for( i = 1 ; i < argc ; ++i ){
+		rc = vedisTableInsertRecord(pSet,argv[i],0/* No data */);
+		if( rc == VEDIS_OK ){
+			nStore++;
+		}
+	}
+	/* Total number of items stored  */
+	vedis_result_int(pCtx,nStore);
+	return VEDIS_OK;
 }
 /*
- *  Command:     DECR key
+ *  Command:    SCARD key 
  * Description:
- *   Decrement the number stored at key by one. If the key does not exist,
- *   it is set to 0 before performing the operation. An error is returned if
- *   the key contains a value of the wrong type or contains a string that can
- *   not be represented as integer. This operation is limited to 64 bit signed integers.
+ *   Returns the set cardinality (number of elements) of the set stored at key.
  * Return:
- *   the value of key after the decrement
+ *    number of fields in the set, or 0 when key does not exist.
  */
-static int vedis_cmd_decr(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_scard(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int rc;
+	vedis_table *pSet;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return 0 */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* decrement */
-	rc = vedisValueIncrementBy(pCtx,argv[0],1,1);
-	return rc;
+	/* Fetch the table  */
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	vedis_result_int(pCtx,(int)vedisTableLength(pSet));
+	return VEDIS_OK;
 }
 /*
- *  Command:   INCRBY key increment 
+ *  Command:    SISMEMBER key member 
  * Description:
- *   Increments the number stored at key by increment. If the key does not exist, it
- *   is set to 0 before performing the operation. An error is returned if the key
- *   contains a value of the wrong type or contains a string that can not be represented
- *   as integer. This operation is limited to 64 bit signed integers.
+ *   Returns if member is a member of the set stored at key.
  * Return:
- *   the value of key after the increment
+ *   boolean: TRUE on success, FALSE otherwise.
  */
-static int vedis_cmd_incrby(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_sismember(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int iIncr;
-	int rc;
+	vedis_table_entry *pEntry;
+	vedis_table *pSet;
 	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/increment");
-		/* return 0 */
-		vedis_result_int(pCtx,0);
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
+		/* return false */
+		vedis_result_bool(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Number to increment by */
-	iIncr = vedis_value_to_int(argv[1]);
-	/* Increment */
-	rc = vedisValueIncrementBy(pCtx,argv[0],iIncr,0);
-	return rc;
+	/* Fetch the table first */
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Go fetch */
+	pEntry = vedisTableGetRecord(pSet,argv[1]);
+	if( pEntry == 0 ){
+		/* return false */
+		vedis_result_bool(pCtx,0);
+		return VEDIS_OK;
+	}
+	/* Return true */
+	vedis_result_bool(pCtx,1);
+	return VEDIS_OK;
 }
 /*
- *  Command:   DECRBY key increment 
+ *  Command:   SPOP key 
  * Description:
- *   Decrements the number stored at key by decrement. If the key does not exist, it
- *   is set to 0 before performing the operation. An error is returned if the key
- *   contains a value of the wrong type or contains a string that can not be represented
- *   as integer. This operation is limited to 64 bit signed integers.
+ *   Removes and returns the last record from the set value stored at key.
  * Return:
- *   the value of key after the decrement
+ *   the removed element, or nil when key does not exist or is empty.
  */
-static int vedis_cmd_decrby(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_spop(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	int iDecr;
-	int rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/decrement");
-		/* return 0 */
-		vedis_result_int(pCtx,0);
+	vedis_table_entry *pEntry;
+	vedis_table *pSet;
+	if( argc < 1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Number to decrement by */
-	iDecr = vedis_value_to_int(argv[1]);
-	/* Increment */
-	rc = vedisValueIncrementBy(pCtx,argv[0],iDecr,1);
-	return rc;
+	/* Fetch the table first */
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Extract the last entry */
+	pEntry = vedisTableLastEntry(pSet);
+	if( pEntry == 0 ){
+		/* Empty table, return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	if ( VEDIS_ENTRY_BLOB(pEntry) ){
+		SyString sKey;
+		vedisEntryKey(pEntry,&sKey);
+		/* Return its key */
+		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
+	}
+	/* Discard this element */
+	if( VedisRemoveTableEntry(pSet,pEntry) != VEDIS_OK ){
+		vedis_result_null(pCtx);
+	}
+	return VEDIS_OK;
 }
 /*
- * Fetch a key from the given vedis Table.
+ *  Command:   SPEEK key 
+ * Description:
+ *   Returns the last record from the set value stored at key.
+ * Return:
+ *   the last element, or nil when key does not exist.
  */
-static vedis_table_entry * vedisGetEntryFromTable(vedis_context *pCtx,vedis_value *pTable,vedis_value *pKey)
+static int vedis_cmd_speek(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
 	vedis_table_entry *pEntry;
-	vedis_table *pHash;
+	vedis_table *pSet;
+	if( argc < 1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
 	/* Fetch the table first */
-	pHash = vedisFetchTable(pVedis,pTable,0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
 		/* No such table */
-		return 0;
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Try to fetch the field */
-	pEntry = vedisTableGetRecord(pHash,pKey);
-	return pEntry;
-}
-#define VEDIS_ENTRY_BLOB(ENTRY) (ENTRY->iType == VEDIS_TABLE_ENTRY_BLOB_NODE)
-static void vedisEntryKey(vedis_table_entry *pEntry,SyString *pOut)
-{
-	SyStringInitFromBuf(pOut,SyBlobData(&pEntry->xKey.sKey),SyBlobLength(&pEntry->xKey.sKey));
+	/* Extract the last entry */
+	pEntry = vedisTableLastEntry(pSet);
+	if( pEntry == 0 ){
+		/* Empty table, return null */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	if ( VEDIS_ENTRY_BLOB(pEntry) ){
+		SyString sKey;
+		vedisEntryKey(pEntry,&sKey);
+		/* Return its key */
+		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
+	}
+	return VEDIS_OK;
 }
 /*
- *  Command:    HGET key field 
+ *  Command:   STOP key 
  * Description:
- *   Returns the value associated with field in the hash stored at key.
+ *   Returns the first record from the set value stored at key.
  * Return:
- *   the value associated with field, or nil when field is not present in the hash
- *   or key does not exist.
+ *   the last element, or nil when key does not exist.
  */
-static int vedis_cmd_hget(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_stop(vedis_context *pCtx,int argc,vedis_value **argv)
 {
 	vedis_table_entry *pEntry;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
+	vedis_table *pSet;
+	if( argc < 1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Go fetch */
-	pEntry = vedisGetEntryFromTable(pCtx,argv[0],argv[1]);
+	/* Fetch the table first */
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
+	}
+	/* Extract the first entry */
+	pEntry = vedisTableFirstEntry(pSet);
 	if( pEntry == 0 ){
-		/* return null */
+		/* Empty table, return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Return the payload */
-	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+	if ( VEDIS_ENTRY_BLOB(pEntry) ){
+		SyString sKey;
+		vedisEntryKey(pEntry,&sKey);
+		/* Return its key */
+		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
+	}
 	return VEDIS_OK;
 }
 /*
- *  Command:     HMGET key field [field ...]  
+ *  Command:     SREM key member [member ...]  
  * Description:
- *   Returns the values associated with the specified fields in the hash stored at key.
- *   For every field that does not exist in the hash, a nil value is returned.
- *   Because a non-existing keys are treated as empty hashes, running HMGET against
- *   a non-existing key will return a list of nil values.
+ *   Remove the specified members from the set stored at key.
+ *   Specified members that are not a member of this set are ignored.
+ *   If key does not exist, it is treated as an empty set and this command returns 0.
  * Return:
- *   array of values associated with the given fields, in the same order as they are requested.
+ *   Integer: the number of members that were removed from the set, not including non existing members.
  */
-static int vedis_cmd_hmget(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_srem(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pScalar,*pArray;
-	vedis_table_entry *pEntry;
-	vedis_table *pHash;
-	int i;
+	vedis_table *pSet;
+	int nDel = 0;
+	int i,rc;
 	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
-		/* return null */
-		vedis_result_null(pCtx);
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* No such table, return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Allocate a new scalar and array */
-	pScalar = vedis_context_new_scalar(pCtx);
-	pArray = vedis_context_new_array(pCtx);
-	if( pScalar == 0 || pArray == 0 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
-		/* return null */
-		vedis_result_null(pCtx);
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Perform the requested operation */
+	/* Perform the deletion */
 	for( i = 1 ; i < argc ; ++i ){
-		/* Fetch the record */
-		pEntry = vedisTableGetRecord(pHash,argv[i]);
-		if( pEntry == 0 ){
-			/* Insert null */
-			vedis_value_null(pScalar);
-		}else{
-			/* Populate the scalar with the data */
-			vedis_value_reset_string_cursor(pScalar);
-			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+		rc = vedisTableDeleteRecord(pSet,argv[i]);
+		if( rc == VEDIS_OK ){
+			nDel++;
 		}
-		/* Perform the insertion */
-		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
 	}
-	/* Return our array */
-	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
-	/* pArray will be automatically destroyed */
+	/* Total number of deleted records */
+	vedis_result_int(pCtx,nDel);
 	return VEDIS_OK;
 }
 /*
- *  Command:      HKEYS key  
+ *  Command:    SMEMBERS key  
  * Description:
- *   Returns all field names in the hash stored at key.
+ *   Returns all the members of the set value stored at key.
  * Return:
- *   array of fields in the hash, or null on failure.
+ *   array of all elements of the set.
  */
-static int vedis_cmd_hkeys(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_smembers(vedis_context *pCtx,int argc,vedis_value **argv)
 {
 	vedis_value *pScalar,*pArray;
 	vedis_table_entry *pEntry;
-	vedis_table *pHash;
+	vedis_table *pSet;
 	
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
@@ -18371,8 +21617,8 @@ static int vedis_cmd_hkeys(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
 		/* No such table, return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
@@ -18387,16 +21633,16 @@ static int vedis_cmd_hkeys(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Perform the requested operation */
-	vedisTableReset(pHash);
-	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
+	vedisTableReset(pSet);
+	while( (pEntry = vedisTableNextEntry(pSet)) != 0 ){
 		if( VEDIS_ENTRY_BLOB(pEntry) ){
 			SyString sKey;
 			vedisEntryKey(pEntry,&sKey);
-			/* Populate the scalar with the data */
+			/* Populate the scalar with the key */
 			vedis_value_reset_string_cursor(pScalar);
 			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
-			/* Perform the insertion */
-			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+			/* Insert the key */
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy of pScalar */
 		}
 	}
 	/* Return our array */
@@ -18406,18 +21652,19 @@ static int vedis_cmd_hkeys(vedis_context *pCtx,int argc,vedis_value **argv)
 	return VEDIS_OK;
 }
 /*
- *  Command:       HVALS key  
+ *  Command:    SSCAN key cursor [count]
  * Description:
- *   Returns all values in the hash stored at key.
+ *   Incrementally iterate over the members of the set stored at key,
+ *   returning at most count (default 10) members per call. Start with a
+ *   cursor of 0 and pass the returned cursor to the next call, until it is
+ *   0 again.
  * Return:
- *   array of values in the hash, or an empty list when key does not exist.
+ *   array holding the next cursor followed by the members, or nil when the
+ *   cursor is no longer valid.
  */
-static int vedis_cmd_hvals(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_sscan(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pScalar,*pArray;
-	vedis_table_entry *pEntry;
-	vedis_table *pHash;
-	
+	vedis_table *pSet;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
@@ -18425,50 +21672,23 @@ static int vedis_cmd_hvals(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* No such table, return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Allocate a new scalar and array */
-	pScalar = vedis_context_new_scalar(pCtx);
-	pArray = vedis_context_new_array(pCtx);
-	if( pScalar == 0 || pArray == 0 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
-		/* return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Perform the requested operation */
-	vedisTableReset(pHash);
-	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
-		/* Populate the scalar with the data */
-		vedis_value_reset_string_cursor(pScalar);
-		vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));		
-		/* Perform the insertion */
-		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
-	}
-	/* Return our array */
-	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
-	/* pArray will be automatically destroyed */
-	return VEDIS_OK;
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	return vedisTableScan(pCtx,pSet,argc,argv,VEDIS_SCAN_KEYS);
 }
 /*
- *  Command:      HGETALL key 
+ *  Command:    SDIFF key [key ...] 
  * Description:
- *   Returns all fields and values of the hash stored at key. In the returned value,
- *   every field name is followed by its value, so the length of the reply is twice
- *   the size of the hash.
+ *   Returns the members of the set resulting from the difference between the first set
+ *   and all the successive sets.
  * Return:
- *   array of fields and their values stored in the hash, or an empty list when key does not exist.
+ *   array of Keys that do not exist are considered to be empty sets.
  */
-static int vedis_cmd_hgetall(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_sdiff(vedis_context *pCtx,int argc,vedis_value **argv)
 {
 	vedis_value *pScalar,*pArray;
 	vedis_table_entry *pEntry;
-	vedis_table *pHash;
+	vedis_table *pSrc;
+	int i;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return null */
@@ -18476,8 +21696,8 @@ static int vedis_cmd_hgetall(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
+	pSrc = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSrc == 0 ){
 		/* No such table, return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
@@ -18492,21 +21712,34 @@ static int vedis_cmd_hgetall(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Perform the requested operation */
-	vedisTableReset(pHash);
-	while( (pEntry = vedisTableNextEntry(pHash)) != 0 ){
+	vedisTableReset(pSrc);
+	while( (pEntry = vedisTableNextEntry(pSrc)) != 0 ){
 		if( VEDIS_ENTRY_BLOB(pEntry) ){
 			SyString sKey;
 			vedisEntryKey(pEntry,&sKey);
 			/* Populate the scalar with the key */
 			vedis_value_reset_string_cursor(pScalar);
 			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
-			/* Insert the key */
-			vedis_array_insert(pArray,pScalar); /* Will make its own copy of pScalar */
-			/* Populate the scalar with the data */
-			vedis_value_reset_string_cursor(pScalar);
-			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
-			/* Perform the insertion */
-			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+			/* Perform the diff */
+			for( i = 1 ; i < argc ; ++i ){
+				vedis_table *pTarget = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[i],0,VEDIS_TABLE_SET);
+				vedis_table_entry *pEntry;
+				if( pTarget == 0 ){
+					/* No such set */
+					continue;
+				}
+				/* Perform the lokup */
+				pEntry = vedisTableGetRecord(pTarget,pScalar);
+				if( pEntry ){
+					/* Entry found */
+					break;
+				}
+			}
+			if( i >= argc ){
+				/* Perform the insertion */
+				vedis_array_insert(pArray,pScalar);
+			}
+
 		}
 	}
 	/* Return our array */
@@ -18516,80 +21749,87 @@ static int vedis_cmd_hgetall(vedis_context *pCtx,int argc,vedis_value **argv)
 	return VEDIS_OK;
 }
 /*
- *  Command:    HEXISTS key field 
+ *  Command:    SINTER key [key ...] 
  * Description:
- *   Returns if field is an existing field in the hash stored at key.
+ *   Returns the members of the set resulting from the intersection of all the given sets.
  * Return:
- *   boolean: TRUE on success, FALSE otherwise.
+ *   array of Keys that do not exist are considered to be empty sets.
  */
-static int vedis_cmd_hexists(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_sinter(vedis_context *pCtx,int argc,vedis_value **argv)
 {
+	vedis_value *pScalar,*pArray;
 	vedis_table_entry *pEntry;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Go fetch */
-	pEntry = vedisGetEntryFromTable(pCtx,argv[0],argv[1]);
-	if( pEntry == 0 ){
-		/* return false */
-		vedis_result_bool(pCtx,0);
+	vedis_table *pSrc;
+	int i;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Return true */
-	vedis_result_bool(pCtx,1);
-	return VEDIS_OK;
-}
-/*
- *  Command:     HDEL key field [field ...] 
- * Description:
- *   Removes the specified fields from the hash stored at key. Specified fields
- *   that do not exist within this hash are ignored. If key does not exist, it is treated
- *   as an empty hash and this command returns 0.
- * Return:
- *   integer: Total number of fields removed.
- */
-static int vedis_cmd_hdel(vedis_context *pCtx,int argc,vedis_value **argv)
-{
-	vedis_table *pHash;
-	int nDel = 0;
-	int i,rc;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/field pair");
-		/* return 0 */
-		vedis_result_int(pCtx,0);
+	/* Fetch the table  */
+	pSrc = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSrc == 0 ){
+		/* No such table, return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* No such table, return zero */
-		vedis_result_int(pCtx,0);
+	/* Allocate a new scalar and array */
+	pScalar = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pScalar == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Perform the deletion */
-	for( i = 1 ; i < argc ; ++i ){
-		rc = vedisTableDeleteRecord(pHash,argv[i]);
-		if( rc == VEDIS_OK ){
-			nDel++;
+	/* Perform the requested operation */
+	vedisTableReset(pSrc);
+	while( (pEntry = vedisTableNextEntry(pSrc)) != 0 ){
+		if( VEDIS_ENTRY_BLOB(pEntry) ){
+			SyString sKey;
+			vedisEntryKey(pEntry,&sKey);
+			/* Populate the scalar with the key */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
+			/* Perform the intersection */
+			for( i = 1 ; i < argc ; ++i ){
+				vedis_table *pTarget = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[i],0,VEDIS_TABLE_SET);
+				vedis_table_entry *pEntry;
+				if( pTarget == 0 ){
+					/* No such set */
+					continue;
+				}
+				/* Perform the lokup */
+				pEntry = vedisTableGetRecord(pTarget,pScalar);
+				if( !pEntry ){
+					/* no such entry */
+					break;
+				}
+			}
+			if( i >= argc ){
+				/* Perform the insertion */
+				vedis_array_insert(pArray,pScalar);
+			}
+
 		}
 	}
-	/* Total number of deleted records */
-	vedis_result_int(pCtx,nDel);
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:     HLEN key 
+ *  Command:     SLEN key 
  * Description:
- *   Returns the number of fields contained in the hash stored at key.
+ *   Returns the number of fields contained in the set stored at key.
  * Return:
- *    number of fields in the hash, or 0 when key does not exist.
+ *    number of fields in the set, or 0 when key does not exist.
  */
-static int vedis_cmd_hlen(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_slen(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pHash;
+	vedis_table *pSet;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return 0 */
@@ -18597,219 +21837,174 @@ static int vedis_cmd_hlen(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
+	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
+	if( pSet == 0 ){
 		/* No such table, return zero */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	vedis_result_int(pCtx,(int)vedisTableLength(pHash));
+	vedis_result_int(pCtx,(int)vedisTableLength(pSet));
 	return VEDIS_OK;
 }
 /*
- *  Command:     HSET key field value  
+ *  Command:   LINDEX key index  
  * Description:
- *   Sets field in the hash stored at key to value. If key does not exist, a new key holding
- *   a hash is created. If field already exists in the hash, it is overwritten.
+ *   Returns the element at index index in the list stored at key.
+ *   The index is zero-based, so 0 means the first element, 1 the second
+ *   element and so on. Negative indices can be used to designate elements
+ *   starting at the tail of the list. Here, -1 means the last element, -2 means
+ *   the penultimate and so forth.
+ *   When the value at key is not a list, an error is returned.
  * Return:
- *   boolean: TRUE on success. FALSE on failure.
+ *   the requested element, or nil when index is out of range.
  */
-static int vedis_cmd_hset(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_lindex(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
-	vedis_table *pHash;
-	int rc;
-
-	if( argc < 3 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
+	vedis_table_entry *pEntry;
+	vedis_table *pList;
+	sxu32 nReal;
+	int iIndex;
+	
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/index pair");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the table first */
-	pHash = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* No such table, return FALSE */
-		vedis_result_bool(pCtx,0);
+	/* Fetch the table  */
+	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
+	if( pList == 0 ){
+		/* No such table, return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Perform the insertion  */
-	rc = vedisTableInsertRecord(pHash,argv[1],argv[2]);
-	/* Insertion result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
-	return VEDIS_OK;
-}
-/*
- *  Command:      HMSET key field value [field value ...]  
- * Description:
- *   Sets the specified fields to their respective values in the hash stored at key.
- *   This command overwrites any existing fields in the hash. If key does not exist,
- *   a new key holding a hash is created.
- * Return:
- *   Integer: Total number of inserted fields.
- */
-static int vedis_cmd_hmset(vedis_context *pCtx,int argc,vedis_value **argv)
-{
-	vedis_table *pHash;
-	int i,rc,cnt = 0;
-	if( argc < 3 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
-		return VEDIS_OK;
+	/* Index */
+	iIndex = vedis_value_to_int(argv[1]);
+	if( iIndex < 0 ){
+		iIndex = -iIndex;
+		nReal = vedisTableLength(pList) - iIndex;
+	}else{
+		nReal = (sxu32)iIndex;
 	}
-	pHash = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* return false */
-		vedis_result_bool(pCtx,0);
+	/* Go fetch */
+	pEntry = vedisTableGetRecordByIndex(pList,nReal); /* This will handle out of range indexes */
+	if( pEntry == 0 ){
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	rc = VEDIS_OK;
-	for( i = 1 ; i + 1 < argc ; i += 2 ){
-		rc = vedisTableInsertRecord(pHash,argv[i],argv[i+1]);
-		if( rc == VEDIS_OK ){
-			cnt++;
-		}
-	}
-	/* Insertion result */
-	vedis_result_int(pCtx,cnt);
+	/* Return data */
+	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
 	return VEDIS_OK;
 }
 /*
- *  Command:      HSETNX key field value   
+ *  Command:   LRANGE key start [stop]
  * Description:
- *   Sets field in the hash stored at key to value, only if field does not yet exist.
- *   If key does not exist, a new key holding a hash is created. If field already exists,
- *   this operation has no effect.
+ *   Returns the elements of the list stored at key between the positions
+ *   start and stop (both inclusive). Positions are zero-based and, unlike
+ *   LINDEX, do not depend on the keys assigned to the elements, so they stay
+ *   valid after elements have been popped. Negative positions designate
+ *   elements starting at the tail of the list (-1 is the last element).
+ *   Out of range positions are clamped to the bounds of the list. When stop
+ *   is omitted, the range extends to the last element.
  * Return:
- *   boolean: TRUE on success. FALSE on failure.
+ *   array of elements in the specified range, or an empty array when key
+ *   does not exist.
  */
-static int vedis_cmd_hsetnx(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_lrange(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
 	vedis_table_entry *pEntry;
-	vedis_table *pHash;
-	int rc;
-	
-	if( argc < 3 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key field/value pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Fetch the table first */
-	pHash = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_HASH);
-	if( pHash == 0 ){
-		/* No such table, return FALSE */
-		vedis_result_bool(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Fetch the record */
-	pEntry = vedisTableGetRecord(pHash,argv[1]);
-	if( pEntry ){
-		/* Record exists, return FALSE */
-		vedis_result_bool(pCtx,0);
+	vedis_value *pScalar,*pArray;
+	vedis_table *pList;
+	vedis_int64 iStart,iStop,nLen,i;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/start pair");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Safely, erform the insertion  */
-	rc = vedisTableInsertRecord(pHash,argv[1],argv[2]);
-	/* Insertion result */
-	vedis_result_bool(pCtx,rc == VEDIS_OK);
-	return VEDIS_OK;
-}
-/*
- *  Command:     TABLE_LIST  
- * Description:
- *   Return a array holding the list of loaded vedis tables (i.e. Hashes, Sets, List) in memory.
- * Return:
- *   array of loaded tables.
- */
-static int vedis_cmd_table_list(vedis_context *pCtx,int argc,vedis_value **argv)
-{
-	vedis *pStore = (vedis *)vedis_context_user_data(pCtx);
-	vedis_value *pScalar,*pArray;
-	vedis_table *pEntry;
-	sxu32 n;
 	/* Allocate a new scalar and array */
 	pScalar = vedis_context_new_scalar(pCtx);
 	pArray = vedis_context_new_array(pCtx);
 	if( pScalar == 0 || pArray == 0 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
-		/* return null */
-		vedis_result_null(pCtx);
-		SXUNUSED(argc); /* cc warning */
-		SXUNUSED(argv);
-		return VEDIS_OK;
-	}
-	/* Point to the first entry */
-	pEntry = pStore->pTableList;
-	for( n = 0 ; n < pStore->nTable ; ++n ){
-		SyString *pName = vedisTableName(pEntry);
-		/* Populate the scalar with the data */
-		vedis_value_reset_string_cursor(pScalar);
-		vedis_value_string(pScalar,pName->zString,(int)pName->nByte);
-		/* Perform the insertion */
-		vedis_array_insert(pArray,pScalar); /* Will make its own copy */
-		/* Point to the next loaded table */
-		pEntry = vedisTableChain(pEntry);
-	}
-	/* Return our array */
-	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
-	/* pArray will be automatically destroyed */
-	return VEDIS_OK;
-}
-/*
- *  Command:    SADD key member [member ...]  
- * Description:
- *   Add the specified members to the set stored at key. Specified members that
- *   are already a member of this set are ignored. If key does not exist, a new
- *   set is created before adding the specified members. An error is returned when
- *   the value stored at key is not a set.
- * Return:
- *   Intger: number of item succesfully stored.
- */
-static int vedis_cmd_sadd(vedis_context *pCtx,int argc,vedis_value **argv)
-{
-	vedis *pVedis = (vedis *)vedis_context_user_data(pCtx);
-	vedis_table *pSet;
-	int nStore = 0;
-	int i,rc;
-	
-	if( argc < 2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
-		/* return zero */
-		vedis_result_int(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Fetch the table first */
-	pSet = vedisFetchTable(pVedis,argv[0],1,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table, return zero */
-		vedis_result_int(pCtx,0);
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Perform the insertion  */
-	for( i = 1 ; i < argc ; ++i ){
-		rc = vedisTableInsertRecord(pSet,argv[i],0/* No data */);
-		if( rc == VEDIS_OK ){
-			nStore++;
+	/* Fetch the table  */
+	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
+	nLen = pList ? (vedis_int64)vedisTableLength(pList) : 0;
+	/* Normalize the range */
+	iStart = vedis_value_to_int64(argv[1]);
+	iStop = argc > 2 ? vedis_value_to_int64(argv[2]) : -1;
+	if( iStart < 0 ){
+		iStart += nLen;
+		if( iStart < 0 ){
+			iStart = 0;
+		}
+	}
+	if( iStop < 0 ){
+		iStop += nLen;
+	}
+	if( iStop >= nLen ){
+		iStop = nLen - 1;
+	}
+	if( iStart <= iStop ){
+		/* Seek to the first element of the range from the nearest end, or
+		 * from where the last range ended, so that reading a list a chunk
+		 * at a time does not walk it again for each chunk.
+		 */
+		if( pList->pRange && iStart >= pList->iRange && iStart - pList->iRange <= nLen - 1 - iStart ){
+			pEntry = pList->pRange;
+			for( i = pList->iRange ; i < iStart ; ++i ){
+				pEntry = pEntry->pPrev; /* Reverse link */
+			}
+		}else if( pList->pRange && iStart < pList->iRange && pList->iRange - iStart <= iStart ){
+			pEntry = pList->pRange;
+			for( i = pList->iRange ; i > iStart ; --i ){
+				pEntry = pEntry->pNext;
+			}
+		}else if( iStart < nLen / 2 ){
+			pEntry = vedisTableFirstEntry(pList);
+			for( i = 0 ; i < iStart ; ++i ){
+				pEntry = pEntry->pPrev; /* Reverse link */
+			}
+		}else{
+			pEntry = vedisTableLastEntry(pList);
+			for( i = nLen - 1 ; i > iStart ; --i ){
+				pEntry = pEntry->pNext;
+			}
+		}
+		/* Collect the elements */
+		for( i = iStart ; i <= iStop && pEntry ; ++i ){
+			/* Populate the scalar with the data */
+			vedis_value_reset_string_cursor(pScalar);
+			vedis_value_string(pScalar,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+			/* Perform the insertion */
+			vedis_array_insert(pArray,pScalar); /* Will make its own copy */
+			pEntry = pEntry->pPrev; /* Reverse link */
 		}
+		/* Remember where the next chunk starts */
+		pList->pRange = pEntry;
+		pList->iRange = i;
 	}
-	/* Total number of items stored  */
-	vedis_result_int(pCtx,nStore);
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pScalar);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:    SCARD key 
+ *  Command:    LLEN key  
  * Description:
- *   Returns the set cardinality (number of elements) of the set stored at key.
+ *   Returns the number of fields contained in the list stored at key.
  * Return:
- *    number of fields in the set, or 0 when key does not exist.
+ *    number of fields in the list, or 0 when key does not exist.
  */
-static int vedis_cmd_scard(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_llen(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pSet;
+	vedis_table *pList;
 	if( argc <  1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return 0 */
@@ -18817,581 +22012,858 @@ static int vedis_cmd_scard(vedis_context *pCtx,int argc,vedis_value **argv)
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
+	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
+	if( pList == 0 ){
 		/* No such table, return zero */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	vedis_result_int(pCtx,(int)vedisTableLength(pSet));
+	vedis_result_int(pCtx,(int)vedisTableLength(pList));
 	return VEDIS_OK;
 }
 /*
- *  Command:    SISMEMBER key member 
+ *  Command:    LPOP key  
  * Description:
- *   Returns if member is a member of the set stored at key.
+ *   Removes and returns the first element of the list stored at key.
  * Return:
- *   boolean: TRUE on success, FALSE otherwise.
+ *    the value of the first element, or nil when key does not exist.
  */
-static int vedis_cmd_sismember(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_lpop(vedis_context *pCtx,int argc,vedis_value **argv)
 {
 	vedis_table_entry *pEntry;
-	vedis_table *pSet;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
-		/* return false */
-		vedis_result_bool(pCtx,0);
+	vedis_table *pList;
+	if( argc <  1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+		/* return null */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the table first */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table */
+	/* Fetch the table  */
+	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
+	if( pList == 0 ){
+		/* No such table, return zero */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Go fetch */
-	pEntry = vedisTableGetRecord(pSet,argv[1]);
+	/* Point to the first element */
+	pEntry = vedisTableFirstEntry(pList);
 	if( pEntry == 0 ){
-		/* return false */
-		vedis_result_bool(pCtx,0);
+		/* No such entry */
+		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Return true */
-	vedis_result_bool(pCtx,1);
+	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+	/* Discard item */
+	if( VedisRemoveTableEntry(pList,pEntry) != VEDIS_OK ){
+		vedis_result_null(pCtx);
+	}
 	return VEDIS_OK;
 }
 /*
- *  Command:   SPOP key 
+ *  Command:   LPUSH key value [value ...]  
  * Description:
- *   Removes and returns the last record from the set value stored at key.
+ *   Insert all the specified values at the head of the list stored at key. If key does
+ *   not exist, it is created as empty list before performing the push operations.
+ *   It is possible to push multiple elements using a single command call just specifying
+ *   multiple arguments at the end of the command. Elements are inserted one after the other
+ *   to the head of the list, from the leftmost element to the rightmost element.
+ *   So for instance the command LPUSH mylist a b c will result into a list containing
+ *  c as first element, b as second element and a as third element.
  * Return:
- *   the removed element, or nil when key does not exist or is empty.
+ *    the length of the list after the push operations.
  */
-static int vedis_cmd_spop(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_lpush(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table_entry *pEntry;
-	vedis_table *pSet;
-	if( argc < 1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return null */
-		vedis_result_null(pCtx);
+	vedis_table *pList;
+	int i;
+	if( argc <  2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Fetch the table first */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table */
-		vedis_result_null(pCtx);
+	/* Fetch the table  */
+	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_LIST);
+	if( pList == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Extract the last entry */
-	pEntry = vedisTableLastEntry(pSet);
-	if( pEntry == 0 ){
-		/* Empty table, return null */
-		vedis_result_null(pCtx);
+	/* Perform the insertion */
+	for( i = 1 ; i < argc; ++i ){
+		vedisTableInsertRecord(pList,0/*Assign an automatic key*/,argv[i]);
+	}
+	/* Total number of inserted elements */
+	vedis_result_int(pCtx,(int)vedisTableLength(pList));
+	return VEDIS_OK;
+}
+/*
+ * Parse the hexadecimal part of a C99 hexadecimal floating point number,
+ * such as "1.8p+1" for "0x1.8p+1". Scaling by a power of two is exact, so
+ * scores are transferred without rounding.
+ */
+static int vedisZsetParseHexScore(const char *zIn,const char *zEnd,int bNeg,double *pScore)
+{
+	sxu64 iMantissa = 0;
+	int bFrac = FALSE,bExpNeg = FALSE;
+	int nDigit = 0,nExp = 0,iExp = 0;
+	double rScore,rPow;
+	int c;
+	while( zIn < zEnd && zIn[0] != 'p' && zIn[0] != 'P' ){
+		c = zIn[0];
+		zIn++;
+		if( c == '.' && !bFrac ){
+			bFrac = TRUE;
+			continue;
+		}
+		if( c >= '0' && c <= '9' ){
+			c -= '0';
+		}else if( c >= 'a' && c <= 'f' ){
+			c = c - 'a' + 10;
+		}else if( c >= 'A' && c <= 'F' ){
+			c = c - 'A' + 10;
+		}else{
+			return VEDIS_INVALID;
+		}
+		nDigit++;
+		if( iMantissa >> 56 ){
+			/* Digits beyond the precision of a double */
+			if( !bFrac ){
+				nExp += 4;
+			}
+			continue;
+		}
+		iMantissa = (iMantissa << 4) | (sxu64)c;
+		if( bFrac ){
+			nExp -= 4;
+		}
+	}
+	if( nDigit < 1 ){
+		return VEDIS_INVALID;
+	}
+	if( zIn < zEnd ){
+		/* Binary exponent */
+		zIn++;
+		if( zIn < zEnd && (zIn[0] == '+' || zIn[0] == '-') ){
+			bExpNeg = zIn[0] == '-';
+			zIn++;
+		}
+		if( zIn >= zEnd ){
+			return VEDIS_INVALID;
+		}
+		while( zIn < zEnd ){
+			if( zIn[0] < '0' || zIn[0] > '9' ){
+				return VEDIS_INVALID;
+			}
+			if( iExp < 100000 ){
+				iExp = iExp * 10 + (zIn[0] - '0');
+			}
+			zIn++;
+		}
+		nExp += bExpNeg ? -iExp : iExp;
+	}
+	rScore = (double)iMantissa;
+	rPow = 2.0;
+	if( nExp < 0 ){
+		rPow = 0.5;
+		nExp = -nExp;
+	}
+	while( nExp > 0 && rScore != 0.0 ){
+		if( nExp & 1 ){
+			rScore *= rPow;
+		}
+		rPow *= rPow;
+		nExp >>= 1;
+	}
+	*pScore = bNeg ? -rScore : rScore;
+	return VEDIS_OK;
+}
+/*
+ * Extract a score from a command argument. Scores are numbers, "-inf",
+ * "+inf" or hexadecimal floating point numbers such as "0x1.8p+1". When
+ * pExclusive is not NULL, a leading '(' excludes the bound from a range.
+ */
+static int vedisZsetParseScore(vedis_value *pArg,double *pScore,int *pExclusive)
+{
+	const char *zIn,*zEnd,*zTail;
+	int bNeg = FALSE;
+	double rInf;
+	int nByte;
+	if( pExclusive ){
+		*pExclusive = FALSE;
+	}
+	if( !vedis_value_is_string(pArg) ){
+		/* Integer or real */
+		*pScore = vedis_value_to_double(pArg);
+		return *pScore == *pScore ? VEDIS_OK : VEDIS_INVALID;
+	}
+	zIn = vedis_value_to_string(pArg,&nByte);
+	zEnd = &zIn[nByte];
+	if( pExclusive && zIn < zEnd && zIn[0] == '(' ){
+		*pExclusive = TRUE;
+		zIn++;
+	}
+	if( zIn < zEnd && (zIn[0] == '+' || zIn[0] == '-') ){
+		bNeg = zIn[0] == '-';
+		zIn++;
+	}
+	if( zEnd - zIn == 3 && SyStrnicmp(zIn,"inf",3) == 0 ){
+		rInf = 1e308;
+		rInf *= 10; /* Overflow to infinity */
+		*pScore = bNeg ? -rInf : rInf;
 		return VEDIS_OK;
 	}
-	if ( VEDIS_ENTRY_BLOB(pEntry) ){
-		SyString sKey;
-		vedisEntryKey(pEntry,&sKey);
-		/* Return its key */
-		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
+	if( zEnd - zIn > 2 && zIn[0] == '0' && (zIn[1] == 'x' || zIn[1] == 'X') ){
+		return vedisZsetParseHexScore(&zIn[2],zEnd,bNeg,pScore);
+	}
+	if( zIn >= zEnd || SyStrIsNumeric(zIn,(sxu32)(zEnd - zIn),0,&zTail) != SXRET_OK || zTail < zEnd ){
+		return VEDIS_INVALID;
+	}
+	SyStrToReal(zIn,(sxu32)(zEnd - zIn),(void *)pScore,0);
+	if( bNeg ){
+		*pScore = -*pScore;
 	}
-	/* Discard this element */
-	VedisRemoveTableEntry(pSet,pEntry);
 	return VEDIS_OK;
 }
 /*
- *  Command:   SPEEK key 
+ * Tell whether a command option matches the given keyword.
+ */
+static int vedisZsetIsOption(vedis_value *pArg,const char *zOption,sxu32 nLen)
+{
+	const char *zArg;
+	int nByte;
+	zArg = vedis_value_to_string(pArg,&nByte);
+	return (sxu32)nByte == nLen && SyStrnicmp(zArg,zOption,nLen) == 0;
+}
+/*
+ * Append a member, followed by its score if requested, to an array.
+ */
+static void vedisZsetAppendNode(vedis_value *pArray,vedis_value *pMember,vedis_value *pScore,vedis_zset_node *pNode,int bScores)
+{
+	SyBlob *pKey = &pNode->pEntry->xKey.sKey;
+	vedis_value_reset_string_cursor(pMember);
+	vedis_value_string(pMember,(const char *)SyBlobData(pKey),(int)SyBlobLength(pKey));
+	vedis_array_insert(pArray,pMember); /* Will make its own copy */
+	if( bScores ){
+		vedis_value_double(pScore,pNode->rScore);
+		vedis_array_insert(pArray,pScore);
+	}
+}
+/*
+ *  Command:    ZADD key score member [score member ...]
  * Description:
- *   Returns the last record from the set value stored at key.
+ *   Add the specified members with the specified scores to the sorted set
+ *   stored at key. If a member is already a member of the sorted set, its
+ *   score is updated and the member is moved to the right position. Scores
+ *   are numbers, -inf or +inf.
  * Return:
- *   the last element, or nil when key does not exist.
+ *   the number of members added to the sorted set, not including the
+ *   members whose score was updated.
  */
-static int vedis_cmd_speek(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zadd(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table_entry *pEntry;
-	vedis_table *pSet;
-	if( argc < 1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Fetch the table first */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table */
-		vedis_result_null(pCtx);
+	vedis_table *pZset;
+	double rScore;
+	int nNew = 0;
+	int bNew,i;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/score/member");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Extract the last entry */
-	pEntry = vedisTableLastEntry(pSet);
-	if( pEntry == 0 ){
-		/* Empty table, return null */
-		vedis_result_null(pCtx);
+	/* Fetch the table  */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_ZSET);
+	if( pZset == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	if ( VEDIS_ENTRY_BLOB(pEntry) ){
-		SyString sKey;
-		vedisEntryKey(pEntry,&sKey);
-		/* Return its key */
-		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
+	for( i = 1 ; i + 1 < argc ; i += 2 ){
+		if( vedisZsetParseScore(argv[i],&rScore,0) != VEDIS_OK ){
+			vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid score");
+			continue;
+		}
+		if( vedisZsetAdd(pZset,argv[i + 1],rScore,FALSE,&rScore,&bNew) == VEDIS_OK && bNew ){
+			nNew++;
+		}
 	}
+	/* Total number of new members */
+	vedis_result_int(pCtx,nNew);
 	return VEDIS_OK;
 }
 /*
- *  Command:   STOP key 
+ *  Command:    ZINCRBY key increment member
  * Description:
- *   Returns the first record from the set value stored at key.
+ *   Increment the score of member in the sorted set stored at key by
+ *   increment. If member does not exist, it is added with increment as
+ *   its score.
  * Return:
- *   the last element, or nil when key does not exist.
+ *   the new score of member, or nil on failure.
  */
-static int vedis_cmd_stop(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zincrby(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table_entry *pEntry;
-	vedis_table *pSet;
-	if( argc < 1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+	vedis_table *pZset;
+	double rScore;
+	int bNew;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/increment/member");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the table first */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table */
+	if( vedisZsetParseScore(argv[1],&rScore,0) != VEDIS_OK ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid increment");
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Extract the first entry */
-	pEntry = vedisTableFirstEntry(pSet);
-	if( pEntry == 0 ){
-		/* Empty table, return null */
+	/* Fetch the table  */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_ZSET);
+	if( pZset == 0 || vedisZsetAdd(pZset,argv[2],rScore,TRUE,&rScore,&bNew) != VEDIS_OK ){
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	if ( VEDIS_ENTRY_BLOB(pEntry) ){
-		SyString sKey;
-		vedisEntryKey(pEntry,&sKey);
-		/* Return its key */
-		vedis_result_string(pCtx,sKey.zString,(int)sKey.nByte);
-	}
+	vedis_result_double(pCtx,rScore);
 	return VEDIS_OK;
 }
 /*
- *  Command:     SREM key member [member ...]  
+ *  Command:    ZREM key member [member ...]
  * Description:
- *   Remove the specified members from the set stored at key.
- *   Specified members that are not a member of this set are ignored.
- *   If key does not exist, it is treated as an empty set and this command returns 0.
+ *   Remove the specified members from the sorted set stored at key.
  * Return:
- *   Integer: the number of members that were removed from the set, not including non existing members.
+ *   the number of members removed from the sorted set.
  */
-static int vedis_cmd_srem(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zrem(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pSet;
+	vedis_table *pZset;
 	int nDel = 0;
-	int i,rc;
-	if( argc <  2 ){
+	int i;
+	if( argc < 2 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
 		/* return 0 */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	if( pZset == 0 ){
 		/* No such table, return zero */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Perform the deletion */
 	for( i = 1 ; i < argc ; ++i ){
-		rc = vedisTableDeleteRecord(pSet,argv[i]);
-		if( rc == VEDIS_OK ){
+		if( vedisZsetRemove(pZset,argv[i]) == VEDIS_OK ){
 			nDel++;
 		}
 	}
-	/* Total number of deleted records */
+	/* Total number of removed members */
 	vedis_result_int(pCtx,nDel);
 	return VEDIS_OK;
 }
 /*
- *  Command:    SMEMBERS key  
+ *  Command:    ZSCORE key member
  * Description:
- *   Returns all the members of the set value stored at key.
+ *   Returns the score of member in the sorted set stored at key.
  * Return:
- *   array of all elements of the set.
+ *   the score of member, or nil when key or member does not exist.
  */
-static int vedis_cmd_smembers(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zscore(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pScalar,*pArray;
 	vedis_table_entry *pEntry;
-	vedis_table *pSet;
-	
-	if( argc <  1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+	vedis_table *pZset;
+	if( argc < 2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table, return null */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	pEntry = pZset ? vedisZsetLookup(pZset,argv[1]) : 0;
+	if( pEntry == 0 ){
+		/* No such member */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Allocate a new scalar and array */
-	pScalar = vedis_context_new_scalar(pCtx);
-	pArray = vedis_context_new_array(pCtx);
-	if( pScalar == 0 || pArray == 0 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
+	vedis_result_double(pCtx,vedisZsetEntryScore(pEntry));
+	return VEDIS_OK;
+}
+/*
+ * Implementation of ZRANK and ZREVRANK.
+ */
+static int vedisZsetRankCmd(vedis_context *pCtx,int argc,vedis_value **argv,int bReverse)
+{
+	vedis_table_entry *pEntry;
+	vedis_table *pZset;
+	sxu32 nRank;
+	if( argc < 2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/member pair");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Perform the requested operation */
-	vedisTableReset(pSet);
-	while( (pEntry = vedisTableNextEntry(pSet)) != 0 ){
-		if( VEDIS_ENTRY_BLOB(pEntry) ){
-			SyString sKey;
-			vedisEntryKey(pEntry,&sKey);
-			/* Populate the scalar with the key */
-			vedis_value_reset_string_cursor(pScalar);
-			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
-			/* Insert the key */
-			vedis_array_insert(pArray,pScalar); /* Will make its own copy of pScalar */
-		}
+	/* Fetch the table  */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	pEntry = pZset ? vedisZsetLookup(pZset,argv[1]) : 0;
+	nRank = pEntry ? vedisZsetRank(pZset,pEntry) : 0;
+	if( nRank < 1 ){
+		/* No such member */
+		vedis_result_null(pCtx);
+		return VEDIS_OK;
 	}
-	/* Return our array */
-	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
-	/* pArray will be automatically destroyed */
+	vedis_result_int64(pCtx,bReverse ? (vedis_int64)(vedisTableLength(pZset) - nRank) : (vedis_int64)(nRank - 1));
 	return VEDIS_OK;
 }
 /*
- *  Command:    SDIFF key [key ...] 
+ *  Command:    ZRANK key member
  * Description:
- *   Returns the members of the set resulting from the difference between the first set
- *   and all the successive sets.
+ *   Returns the rank of member in the sorted set stored at key, with the
+ *   scores ordered from low to high. The rank is zero-based, so the member
+ *   with the lowest score has rank 0.
  * Return:
- *   array of Keys that do not exist are considered to be empty sets.
+ *   the rank of member, or nil when key or member does not exist.
  */
-static int vedis_cmd_sdiff(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zrank(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pScalar,*pArray;
-	vedis_table_entry *pEntry;
-	vedis_table *pSrc;
-	int i;
-	if( argc <  1 ){
+	return vedisZsetRankCmd(pCtx,argc,argv,FALSE);
+}
+/*
+ *  Command:    ZREVRANK key member
+ * Description:
+ *   Returns the rank of member in the sorted set stored at key, with the
+ *   scores ordered from high to low, so the member with the highest score
+ *   has rank 0.
+ * Return:
+ *   the rank of member, or nil when key or member does not exist.
+ */
+static int vedis_cmd_zrevrank(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisZsetRankCmd(pCtx,argc,argv,TRUE);
+}
+/*
+ *  Command:    ZCARD key
+ * Description:
+ *   Returns the number of members of the sorted set stored at key.
+ * Return:
+ *   number of members, or 0 when key does not exist.
+ */
+static int vedis_cmd_zcard(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	vedis_table *pZset;
+	if( argc < 1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return null */
-		vedis_result_null(pCtx);
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
 	/* Fetch the table  */
-	pSrc = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSrc == 0 ){
-		/* No such table, return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Allocate a new scalar and array */
-	pScalar = vedis_context_new_scalar(pCtx);
-	pArray = vedis_context_new_array(pCtx);
-	if( pScalar == 0 || pArray == 0 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
-		/* return null */
-		vedis_result_null(pCtx);
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	if( pZset == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Perform the requested operation */
-	vedisTableReset(pSrc);
-	while( (pEntry = vedisTableNextEntry(pSrc)) != 0 ){
-		if( VEDIS_ENTRY_BLOB(pEntry) ){
-			SyString sKey;
-			vedisEntryKey(pEntry,&sKey);
-			/* Populate the scalar with the key */
-			vedis_value_reset_string_cursor(pScalar);
-			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
-			/* Perform the diff */
-			for( i = 1 ; i < argc ; ++i ){
-				vedis_table *pTarget = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[i],0,VEDIS_TABLE_SET);
-				vedis_table_entry *pEntry;
-				if( pTarget == 0 ){
-					/* No such set */
-					continue;
-				}
-				/* Perform the lokup */
-				pEntry = vedisTableGetRecord(pTarget,pScalar);
-				if( pEntry ){
-					/* Entry found */
-					break;
-				}
-			}
-			if( i >= argc ){
-				/* Perform the insertion */
-				vedis_array_insert(pArray,pScalar);
-			}
-
-		}
-	}
-	/* Return our array */
-	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
-	/* pArray will be automatically destroyed */
+	vedis_result_int(pCtx,(int)vedisTableLength(pZset));
 	return VEDIS_OK;
 }
 /*
- *  Command:    SINTER key [key ...] 
+ * Locate the members of a sorted set whose score is in the given range.
+ * Return the number of members found and store the one-based rank of the
+ * first and last one in *pFirst and *pLast.
+ */
+static sxu32 vedisZsetRangeBounds(vedis_table *pZset,const vedis_zset_range *pRange,sxu32 *pFirst,sxu32 *pLast)
+{
+	if( vedisZsetFirstInRange(pZset,pRange,pFirst) == 0 ||
+		vedisZsetLastInRange(pZset,pRange,pLast) == 0 || *pLast < *pFirst ){
+			return 0;
+	}
+	return *pLast - *pFirst + 1;
+}
+/*
+ *  Command:    ZCOUNT key min max
  * Description:
- *   Returns the members of the set resulting from the intersection of all the given sets.
+ *   Returns the number of members in the sorted set stored at key with a
+ *   score between min and max. Bounds are inclusive, unless prefixed by
+ *   '(', and may be -inf or +inf.
  * Return:
- *   array of Keys that do not exist are considered to be empty sets.
+ *   number of members in the specified score range.
  */
-static int vedis_cmd_sinter(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zcount(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_value *pScalar,*pArray;
-	vedis_table_entry *pEntry;
-	vedis_table *pSrc;
-	int i;
-	if( argc <  1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return null */
-		vedis_result_null(pCtx);
+	vedis_zset_range sRange;
+	vedis_table *pZset;
+	sxu32 nFirst,nLast;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/min/max");
+		/* return 0 */
+		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
+	if( vedisZsetParseScore(argv[1],&sRange.rMin,&sRange.bMinEx) != VEDIS_OK ||
+		vedisZsetParseScore(argv[2],&sRange.rMax,&sRange.bMaxEx) != VEDIS_OK ){
+			vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid score range");
+			vedis_result_int(pCtx,0);
+			return VEDIS_OK;
+	}
 	/* Fetch the table  */
-	pSrc = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSrc == 0 ){
-		/* No such table, return null */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	if( pZset == 0 ){
+		/* No such table, return zero */
+		vedis_result_int(pCtx,0);
+		return VEDIS_OK;
+	}
+	vedis_result_int64(pCtx,(vedis_int64)vedisZsetRangeBounds(pZset,&sRange,&nFirst,&nLast));
+	return VEDIS_OK;
+}
+/*
+ * Implementation of ZRANGE and ZREVRANGE.
+ */
+static int vedisZsetRangeCmd(vedis_context *pCtx,int argc,vedis_value **argv,int bReverse)
+{
+	vedis_value *pMember,*pScore,*pArray;
+	vedis_int64 iStart,iStop,nLen,i;
+	vedis_zset_node *pNode;
+	vedis_table *pZset;
+	int bScores;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/start/stop");
+		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Allocate a new scalar and array */
-	pScalar = vedis_context_new_scalar(pCtx);
+	bScores = argc > 3 && vedisZsetIsOption(argv[3],"WITHSCORES",sizeof("WITHSCORES") - 1);
+	/* Allocate the scalars and the array */
+	pMember = vedis_context_new_scalar(pCtx);
+	pScore = vedis_context_new_scalar(pCtx);
 	pArray = vedis_context_new_array(pCtx);
-	if( pScalar == 0 || pArray == 0 ){
+	if( pMember == 0 || pScore == 0 || pArray == 0 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Perform the requested operation */
-	vedisTableReset(pSrc);
-	while( (pEntry = vedisTableNextEntry(pSrc)) != 0 ){
-		if( VEDIS_ENTRY_BLOB(pEntry) ){
-			SyString sKey;
-			vedisEntryKey(pEntry,&sKey);
-			/* Populate the scalar with the key */
-			vedis_value_reset_string_cursor(pScalar);
-			vedis_value_string(pScalar,sKey.zString,(int)sKey.nByte);
-			/* Perform the intersection */
-			for( i = 1 ; i < argc ; ++i ){
-				vedis_table *pTarget = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[i],0,VEDIS_TABLE_SET);
-				vedis_table_entry *pEntry;
-				if( pTarget == 0 ){
-					/* No such set */
-					continue;
-				}
-				/* Perform the lokup */
-				pEntry = vedisTableGetRecord(pTarget,pScalar);
-				if( !pEntry ){
-					/* no such entry */
-					break;
-				}
-			}
-			if( i >= argc ){
-				/* Perform the insertion */
-				vedis_array_insert(pArray,pScalar);
-			}
-
+	/* Fetch the table  */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	nLen = pZset ? (vedis_int64)vedisTableLength(pZset) : 0;
+	/* Normalize the range */
+	iStart = vedis_value_to_int64(argv[1]);
+	iStop = vedis_value_to_int64(argv[2]);
+	if( iStart < 0 ){
+		iStart += nLen;
+		if( iStart < 0 ){
+			iStart = 0;
+		}
+	}
+	if( iStop < 0 ){
+		iStop += nLen;
+	}
+	if( iStop >= nLen ){
+		iStop = nLen - 1;
+	}
+	if( iStart <= iStop ){
+		/* Seek to the first member of the range, then walk the bottom level */
+		pNode = vedisZsetNodeByRank(pZset,(sxu32)(bReverse ? nLen - iStart : iStart + 1));
+		for( i = iStart ; i <= iStop && pNode ; ++i ){
+			vedisZsetAppendNode(pArray,pMember,pScore,pNode,bScores);
+			pNode = bReverse ? pNode->pBackward : pNode->aLevel[0].pForward;
 		}
 	}
 	/* Return our array */
 	vedis_result_value(pCtx,pArray);
-	vedis_context_release_value(pCtx,pScalar);
+	vedis_context_release_value(pCtx,pMember);
+	vedis_context_release_value(pCtx,pScore);
 	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:     SLEN key 
+ *  Command:    ZRANGE key start stop [WITHSCORES]
  * Description:
- *   Returns the number of fields contained in the set stored at key.
+ *   Returns the members of the sorted set stored at key between the ranks
+ *   start and stop (both inclusive), ordered from the lowest to the highest
+ *   score. Members with the same score are ordered by member. Negative
+ *   ranks designate members starting from the highest score (-1 is the
+ *   member with the highest score). With WITHSCORES, each member is
+ *   followed by its score.
  * Return:
- *    number of fields in the set, or 0 when key does not exist.
+ *   array of members in the specified range.
  */
-static int vedis_cmd_slen(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zrange(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pSet;
-	if( argc <  1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return 0 */
-		vedis_result_int(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Fetch the table  */
-	pSet = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_SET);
-	if( pSet == 0 ){
-		/* No such table, return zero */
-		vedis_result_int(pCtx,0);
-		return VEDIS_OK;
-	}
-	vedis_result_int(pCtx,(int)vedisTableLength(pSet));
-	return VEDIS_OK;
+	return vedisZsetRangeCmd(pCtx,argc,argv,FALSE);
 }
 /*
- *  Command:   LINDEX key index  
+ *  Command:    ZREVRANGE key start stop [WITHSCORES]
  * Description:
- *   Returns the element at index index in the list stored at key.
- *   The index is zero-based, so 0 means the first element, 1 the second
- *   element and so on. Negative indices can be used to designate elements
- *   starting at the tail of the list. Here, -1 means the last element, -2 means
- *   the penultimate and so forth.
- *   When the value at key is not a list, an error is returned.
+ *   Same as ZRANGE, with the members ordered from the highest to the
+ *   lowest score, so that ZREVRANGE key 0 9 returns the top ten members.
  * Return:
- *   the requested element, or nil when index is out of range.
+ *   array of members in the specified range.
  */
-static int vedis_cmd_lindex(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zrevrange(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table_entry *pEntry;
-	vedis_table *pList;
-	sxu32 nReal;
-	int iIndex;
-	
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/index pair");
+	return vedisZsetRangeCmd(pCtx,argc,argv,TRUE);
+}
+/*
+ * Implementation of ZRANGEBYSCORE and ZREVRANGEBYSCORE.
+ */
+static int vedisZsetRangeByScoreCmd(vedis_context *pCtx,int argc,vedis_value **argv,int bReverse)
+{
+	vedis_value *pMember,*pScore,*pArray;
+	vedis_int64 iOffset = 0,nCount = -1;
+	vedis_zset_range sRange;
+	vedis_zset_node *pNode;
+	vedis_table *pZset;
+	sxu32 nFirst,nLast,nMatch,i;
+	int bScores = FALSE;
+	int n;
+	if( argc < 3 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/min/max");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Fetch the table  */
-	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
-	if( pList == 0 ){
-		/* No such table, return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
+	/* The reverse form takes the maximum first */
+	if( vedisZsetParseScore(argv[bReverse ? 2 : 1],&sRange.rMin,&sRange.bMinEx) != VEDIS_OK ||
+		vedisZsetParseScore(argv[bReverse ? 1 : 2],&sRange.rMax,&sRange.bMaxEx) != VEDIS_OK ){
+			vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid score range");
+			vedis_result_null(pCtx);
+			return VEDIS_OK;
 	}
-	/* Index */
-	iIndex = vedis_value_to_int(argv[1]);
-	if( iIndex < 0 ){
-		iIndex = -iIndex;
-		nReal = vedisTableLength(pList) - iIndex;
-	}else{
-		nReal = (sxu32)iIndex;
+	/* Options */
+	for( n = 3 ; n < argc ; ++n ){
+		if( vedisZsetIsOption(argv[n],"WITHSCORES",sizeof("WITHSCORES") - 1) ){
+			bScores = TRUE;
+		}else if( n + 2 < argc && vedisZsetIsOption(argv[n],"LIMIT",sizeof("LIMIT") - 1) ){
+			iOffset = vedis_value_to_int64(argv[n + 1]);
+			nCount = vedis_value_to_int64(argv[n + 2]);
+			n += 2;
+		}
 	}
-	/* Go fetch */
-	pEntry = vedisTableGetRecordByIndex(pList,nReal); /* This will handle out of range indexes */
-	if( pEntry == 0 ){
+	/* Allocate the scalars and the array */
+	pMember = vedis_context_new_scalar(pCtx);
+	pScore = vedis_context_new_scalar(pCtx);
+	pArray = vedis_context_new_array(pCtx);
+	if( pMember == 0 || pScore == 0 || pArray == 0 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Out of memory");
 		/* return null */
 		vedis_result_null(pCtx);
 		return VEDIS_OK;
 	}
-	/* Return data */
-	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
+	/* Fetch the table  */
+	pZset = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_ZSET);
+	nMatch = pZset ? vedisZsetRangeBounds(pZset,&sRange,&nFirst,&nLast) : 0;
+	if( iOffset >= 0 && iOffset < (vedis_int64)nMatch ){
+		nMatch -= (sxu32)iOffset;
+		if( nCount >= 0 && nCount < (vedis_int64)nMatch ){
+			nMatch = (sxu32)nCount;
+		}
+		/* Seek to the first member past the offset */
+		pNode = vedisZsetNodeByRank(pZset,bReverse ? nLast - (sxu32)iOffset : nFirst + (sxu32)iOffset);
+		for( i = 0 ; i < nMatch && pNode ; ++i ){
+			vedisZsetAppendNode(pArray,pMember,pScore,pNode,bScores);
+			pNode = bReverse ? pNode->pBackward : pNode->aLevel[0].pForward;
+		}
+	}
+	/* Return our array */
+	vedis_result_value(pCtx,pArray);
+	vedis_context_release_value(pCtx,pMember);
+	vedis_context_release_value(pCtx,pScore);
+	/* pArray will be automatically destroyed */
 	return VEDIS_OK;
 }
 /*
- *  Command:    LLEN key  
+ *  Command:    ZRANGEBYSCORE key min max [WITHSCORES] [LIMIT offset count]
  * Description:
- *   Returns the number of fields contained in the list stored at key.
+ *   Returns the members of the sorted set stored at key with a score
+ *   between min and max, ordered from the lowest to the highest score.
+ *   Bounds are inclusive, unless prefixed by '(', and may be -inf or +inf.
+ *   LIMIT skips the first offset members and returns at most count members
+ *   (a negative count returns every remaining member). The members before
+ *   the offset are skipped by rank, without being visited.
  * Return:
- *    number of fields in the list, or 0 when key does not exist.
+ *   array of members in the specified score range.
  */
-static int vedis_cmd_llen(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_zrangebyscore(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pList;
-	if( argc <  1 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
+	return vedisZsetRangeByScoreCmd(pCtx,argc,argv,FALSE);
+}
+/*
+ *  Command:    ZREVRANGEBYSCORE key max min [WITHSCORES] [LIMIT offset count]
+ * Description:
+ *   Same as ZRANGEBYSCORE, with the bounds in reverse order and the members
+ *   ordered from the highest to the lowest score.
+ * Return:
+ *   array of members in the specified score range.
+ */
+static int vedis_cmd_zrevrangebyscore(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisZsetRangeByScoreCmd(pCtx,argc,argv,TRUE);
+}
+/*
+ * Set the deadline of a key from a timeout or a timestamp, expressed in
+ * units of rScale milliseconds.
+ */
+static int vedisExpireCmd(vedis_context *pCtx,int argc,vedis_value **argv,double rScale,int bAbsolute)
+{
+	vedis *pStore = (vedis *)vedis_context_user_data(pCtx);
+	const char *zKey;
+	double rTime;
+	int nKey;
+	int rc;
+	if( argc < 2 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/timeout pair");
 		/* return 0 */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Fetch the table  */
-	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
-	if( pList == 0 ){
-		/* No such table, return zero */
+	rc = vedisZsetParseScore(argv[1],&rTime,0);
+	rTime *= rScale;
+	if( rc != VEDIS_OK || rTime - rTime != 0 || rTime > 9.0e15 || rTime < -9.0e15 ){
+		/* NaN, infinite or out of range */
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Invalid timeout");
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	vedis_result_int(pCtx,(int)vedisTableLength(pList));
+	if( !bAbsolute ){
+		rTime += (double)vedisExpireNow();
+	}
+	zKey = vedis_value_to_string(argv[0],&nKey);
+	rc = vedisExpireSet(pStore,zKey,nKey,(vedis_int64)rTime);
+	vedis_result_int(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
 }
 /*
- *  Command:    LPOP key  
+ *  Command:   EXPIRE key seconds
  * Description:
- *   Removes and returns the first element of the list stored at key.
+ *   Set a timeout on key, after which the key is deleted. The timeout may
+ *   be fractional, and a timeout that is not positive deletes the key right
+ *   away. Only key/value pairs expire. The timeout is discarded when the key
+ *   is deleted or overwritten by SET, but not when the value is changed by
+ *   commands such as INCR or APPEND.
  * Return:
- *    the value of the first element, or nil when key does not exist.
+ *   Integer: 1 if the timeout was set, 0 if key does not exist.
  */
-static int vedis_cmd_lpop(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_expire(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table_entry *pEntry;
-	vedis_table *pList;
-	if( argc <  1 ){
+	return vedisExpireCmd(pCtx,argc,argv,1000.0,FALSE);
+}
+/*
+ *  Command:   PEXPIRE key milliseconds
+ * Description:
+ *   Like EXPIRE, with a timeout in milliseconds.
+ * Return:
+ *   Integer: 1 if the timeout was set, 0 if key does not exist.
+ */
+static int vedis_cmd_pexpire(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisExpireCmd(pCtx,argc,argv,1.0,FALSE);
+}
+/*
+ *  Command:   EXPIREAT key timestamp
+ * Description:
+ *   Like EXPIRE, with the deadline given as a UNIX timestamp in seconds.
+ * Return:
+ *   Integer: 1 if the timeout was set, 0 if key does not exist.
+ */
+static int vedis_cmd_expireat(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisExpireCmd(pCtx,argc,argv,1000.0,TRUE);
+}
+/*
+ *  Command:   PEXPIREAT key timestamp
+ * Description:
+ *   Like EXPIRE, with the deadline given as a UNIX timestamp in milliseconds.
+ * Return:
+ *   Integer: 1 if the timeout was set, 0 if key does not exist.
+ */
+static int vedis_cmd_pexpireat(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisExpireCmd(pCtx,argc,argv,1.0,TRUE);
+}
+/*
+ * Report the time to live of a key, in units of nScale milliseconds.
+ */
+static int vedisTtlCmd(vedis_context *pCtx,int argc,vedis_value **argv,vedis_int64 nScale)
+{
+	vedis *pStore = (vedis *)vedis_context_user_data(pCtx);
+	vedis_int64 iDeadline;
+	const char *zKey;
+	int nKey;
+	int rc;
+	if( argc < 1 ){
 		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
-		/* return null */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
-	}
-	/* Fetch the table  */
-	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],0,VEDIS_TABLE_LIST);
-	if( pList == 0 ){
-		/* No such table, return zero */
-		vedis_result_null(pCtx);
+		/* return -2 */
+		vedis_result_int(pCtx,-2);
 		return VEDIS_OK;
 	}
-	/* Point to the first element */
-	pEntry = vedisTableFirstEntry(pList);
-	if( pEntry == 0 ){
-		/* No such entry */
-		vedis_result_null(pCtx);
-		return VEDIS_OK;
+	zKey = vedis_value_to_string(argv[0],&nKey);
+	rc = vedisExpireDeadline(pStore,zKey,nKey,&iDeadline);
+	if( rc != VEDIS_OK ){
+		/* No such key */
+		vedis_result_int(pCtx,-2);
+	}else if( iDeadline < 0 ){
+		/* The key does not expire */
+		vedis_result_int(pCtx,-1);
+	}else{
+		iDeadline -= vedisExpireNow();
+		if( iDeadline < 0 ){
+			iDeadline = 0;
+		}
+		/* Round to the nearest unit */
+		vedis_result_int64(pCtx,(iDeadline + nScale / 2) / nScale);
 	}
-	vedis_result_string(pCtx,(const char *)SyBlobData(&pEntry->sData),(int)SyBlobLength(&pEntry->sData));
-	/* Discard item */
-	VedisRemoveTableEntry(pList,pEntry);
 	return VEDIS_OK;
 }
 /*
- *  Command:   LPUSH key value [value ...]  
+ *  Command:   TTL key
  * Description:
- *   Insert all the specified values at the head of the list stored at key. If key does
- *   not exist, it is created as empty list before performing the push operations.
- *   It is possible to push multiple elements using a single command call just specifying
- *   multiple arguments at the end of the command. Elements are inserted one after the other
- *   to the head of the list, from the leftmost element to the rightmost element.
- *   So for instance the command LPUSH mylist a b c will result into a list containing
- *  c as first element, b as second element and a as third element.
+ *   Return the remaining time to live of a key that has a timeout.
  * Return:
- *    the length of the list after the push operations.
+ *   Integer: TTL in seconds, -1 if the key does not expire, or -2 if
+ *   the key does not exist.
  */
-static int vedis_cmd_lpush(vedis_context *pCtx,int argc,vedis_value **argv)
+static int vedis_cmd_ttl(vedis_context *pCtx,int argc,vedis_value **argv)
 {
-	vedis_table *pList;
-	int i;
-	if( argc <  2 ){
-		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key/value pair");
+	return vedisTtlCmd(pCtx,argc,argv,1000);
+}
+/*
+ *  Command:   PTTL key
+ * Description:
+ *   Like TTL, in milliseconds.
+ * Return:
+ *   Integer: TTL in milliseconds, -1 if the key does not expire, or -2 if
+ *   the key does not exist.
+ */
+static int vedis_cmd_pttl(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	return vedisTtlCmd(pCtx,argc,argv,1);
+}
+/*
+ *  Command:   PERSIST key
+ * Description:
+ *   Remove the timeout of a key.
+ * Return:
+ *   Integer: 1 if the timeout was removed, 0 if the key does not exist or
+ *   does not have a timeout.
+ */
+static int vedis_cmd_persist(vedis_context *pCtx,int argc,vedis_value **argv)
+{
+	vedis *pStore = (vedis *)vedis_context_user_data(pCtx);
+	const char *zKey;
+	int nKey;
+	int rc;
+	if( argc < 1 ){
+		vedis_context_throw_error(pCtx,VEDIS_CTX_ERR,"Missing key");
 		/* return 0 */
 		vedis_result_int(pCtx,0);
 		return VEDIS_OK;
 	}
-	/* Fetch the table  */
-	pList = vedisFetchTable((vedis *)vedis_context_user_data(pCtx),argv[0],1,VEDIS_TABLE_LIST);
-	if( pList == 0 ){
-		/* No such table, return zero */
-		vedis_result_int(pCtx,0);
-		return VEDIS_OK;
-	}
-	/* Perform the insertion */
-	for( i = 1 ; i < argc; ++i ){
-		vedisTableInsertRecord(pList,0/*Assign an automatic key*/,argv[i]);
+	zKey = vedis_value_to_string(argv[0],&nKey);
+	rc = vedisExpireCheck(pStore,zKey,nKey);
+	if( rc == VEDIS_OK ){
+		rc = vedisExpireClear(pStore,zKey,nKey);
 	}
-	/* Total number of inserted elements */
-	vedis_result_int(pCtx,(int)vedisTableLength(pList));
+	vedis_result_int(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
 }
 /*
@@ -20397,6 +23869,11 @@ static int vedis_cmd_commit(vedis_context *pCtx, int nArg, vedis_value **apArg)
 	SXUNUSED(nArg); /*cc warning */
 	SXUNUSED(apArg);
 	rc = vedisPagerCommit(pStore->pPager);
+	if( rc != VEDIS_OK ){
+		vedisOnRollback(pStore);
+	}
+	/* Either way the transaction is over */
+	pStore->iFlags &= ~VEDIS_FL_IN_TRANSACTION;
 	/* Result */
 	vedis_result_bool(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
@@ -20414,6 +23891,8 @@ static int vedis_cmd_rollback(vedis_context *pCtx, int nArg, vedis_value **apArg
 	SXUNUSED(nArg); /*cc warning */
 	SXUNUSED(apArg);
 	rc = vedisPagerRollback(pStore->pPager,TRUE);
+	vedisOnRollback(pStore);
+	pStore->iFlags &= ~VEDIS_FL_IN_TRANSACTION;
 	/* Result */
 	vedis_result_bool(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
@@ -20431,6 +23910,9 @@ static int vedis_cmd_begin(vedis_context *pCtx, int nArg, vedis_value **apArg)
 	SXUNUSED(nArg); /*cc warning */
 	SXUNUSED(apArg);
 	rc = vedisPagerBegin(pStore->pPager);
+	if( rc == VEDIS_OK ){
+		pStore->iFlags |= VEDIS_FL_IN_TRANSACTION;
+	}
 	/* Result */
 	vedis_result_bool(pCtx,rc == VEDIS_OK);
 	return VEDIS_OK;
@@ -20460,6 +23942,13 @@ static const struct vedis_built_command {
 	{ "DECR",      vedis_cmd_decr   },
 	{ "INCRBY",    vedis_cmd_incrby },
 	{ "DECRBY",    vedis_cmd_decrby },
+	{ "EXPIRE",    vedis_cmd_expire },
+	{ "PEXPIRE",   vedis_cmd_pexpire },
+	{ "EXPIREAT",  vedis_cmd_expireat },
+	{ "PEXPIREAT", vedis_cmd_pexpireat },
+	{ "TTL",       vedis_cmd_ttl    },
+	{ "PTTL",      vedis_cmd_pttl   },
+	{ "PERSIST",   vedis_cmd_persist },
 	{ "HGET",      vedis_cmd_hget   },
 	{ "HEXISTS",   vedis_cmd_hexists},
 	{ "HDEL",      vedis_cmd_hdel   },
@@ -20468,6 +23957,7 @@ static const struct vedis_built_command {
 	{ "HKEYS",     vedis_cmd_hkeys  },
 	{ "HVALS",     vedis_cmd_hvals  },
 	{ "HGETALL",   vedis_cmd_hgetall },
+	{ "HSCAN",     vedis_cmd_hscan },
 	{ "HSET",      vedis_cmd_hset   },
 	{ "HMSET",     vedis_cmd_hmset  },
 	{ "HSETNX",    vedis_cmd_hsetnx },
@@ -20479,13 +23969,27 @@ static const struct vedis_built_command {
 	{ "STOP",      vedis_cmd_stop   },
 	{ "SREM",      vedis_cmd_srem   },
 	{ "SMEMBERS",  vedis_cmd_smembers },
+	{ "SSCAN",     vedis_cmd_sscan },
 	{ "SDIFF",     vedis_cmd_sdiff  },
 	{ "SINTER",    vedis_cmd_sinter },
 	{ "SLEN",      vedis_cmd_slen   },
 	{ "LINDEX",    vedis_cmd_lindex },
+	{ "LRANGE",    vedis_cmd_lrange },
 	{ "LLEN",      vedis_cmd_llen   },
 	{ "LPOP",      vedis_cmd_lpop   },
 	{ "LPUSH",     vedis_cmd_lpush  },
+	{ "ZADD",      vedis_cmd_zadd   },
+	{ "ZINCRBY",   vedis_cmd_zincrby },
+	{ "ZREM",      vedis_cmd_zrem   },
+	{ "ZSCORE",    vedis_cmd_zscore },
+	{ "ZRANK",     vedis_cmd_zrank  },
+	{ "ZREVRANK",  vedis_cmd_zrevrank },
+	{ "ZCARD",     vedis_cmd_zcard  },
+	{ "ZCOUNT",    vedis_cmd_zcount },
+	{ "ZRANGE",    vedis_cmd_zrange },
+	{ "ZREVRANGE", vedis_cmd_zrevrange },
+	{ "ZRANGEBYSCORE", vedis_cmd_zrangebyscore },
+	{ "ZREVRANGEBYSCORE", vedis_cmd_zrevrangebyscore },
 	{ "RAND",      vedis_cmd_rand   },
 	{ "GETRANDMAX", vedis_cmd_getrandmax },
 	{ "RANDSTR",    vedis_cmd_rand_str },
@@ -21414,6 +24918,101 @@ static int vedisConfigure(vedis *pStore,int nOp,va_list ap)
 		rc = vedisPagerSetCachesize(pStore->pPager,max_page);
 		break;
 										}
+	case VEDIS_CONFIG_PAGE_SIZE: {
+		int iPageSize = va_arg(ap,int);
+		/* Page size of a database that has not been created yet */
+		rc = vedisPagerSetPageSize(pStore->pPager,iPageSize);
+		break;
+								 }
+	case VEDIS_CONFIG_PAGER_STATS: {
+		vedis_pager_stats *pStats = va_arg(ap,vedis_pager_stats *);
+		int bReset = va_arg(ap,int);
+		if( pStats == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		rc = vedisPagerStats(pStore->pPager,pStats,bReset);
+		break;
+								   }
+	case VEDIS_CONFIG_SYNC_MODE: {
+		int iSyncMode = va_arg(ap,int);
+		rc = vedisPagerSetSyncMode(pStore->pPager,iSyncMode);
+		break;
+								 }
+	case VEDIS_CONFIG_JOURNAL_BUFFER: {
+		int nBytes = va_arg(ap,int);
+		rc = vedisPagerSetJournalBuffer(pStore->pPager,nBytes);
+		break;
+									  }
+	case VEDIS_CONFIG_IO_STATS: {
+		vedis_io_stats *pStats = va_arg(ap,vedis_io_stats *);
+		int bReset = va_arg(ap,int);
+		if( pStats == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		rc = vedisPagerIoStats(pStore->pPager,pStats,bReset);
+		break;
+								}
+	case VEDIS_CONFIG_IN_TRANSACTION: {
+		int *pOpen = va_arg(ap,int *);
+		if( pOpen == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		/* Whether a transaction begun explicitly has yet to end */
+		*pOpen = (pStore->iFlags & VEDIS_FL_IN_TRANSACTION) ? 1 : 0;
+		break;
+									}
+	case VEDIS_CONFIG_TRACK_WORKING_SET: {
+		int bEnable = va_arg(ap,int);
+		rc = vedisPagerTrackWorkingSet(pStore->pPager,bEnable);
+		break;
+										 }
+	case VEDIS_CONFIG_TABLE_STATS: {
+		int *pTables = va_arg(ap,int *);
+		int *pDirty = va_arg(ap,int *);
+		int *pLast = va_arg(ap,int *);
+		vedis_int64 *pTotal = va_arg(ap,vedis_int64 *);
+		if( pTables == 0 || pDirty == 0 || pLast == 0 || pTotal == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		rc = vedisTableStats(pStore,pTables,pDirty,pLast,pTotal);
+		break;
+								   }
+	case VEDIS_CONFIG_LAZY_TABLES: {
+		int nMax = va_arg(ap,int);
+		/* Maximum resident entries of tables loaded from now on */
+		if( nMax < 0 ){
+			rc = VEDIS_INVALID;
+			break;
+		}
+		pStore->nLazyMax = (sxu32)nMax;
+		break;
+								   }
+	case VEDIS_CONFIG_LAZY_STATS: {
+		int *pPartial = va_arg(ap,int *);
+		vedis_int64 *pResident = va_arg(ap,vedis_int64 *);
+		vedis_int64 *pLoaded = va_arg(ap,vedis_int64 *);
+		vedis_int64 *pEvicted = va_arg(ap,vedis_int64 *);
+		if( pPartial == 0 || pResident == 0 || pLoaded == 0 || pEvicted == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		rc = vedisLazyTableStats(pStore,pPartial,pResident,pLoaded,pEvicted);
+		break;
+								  }
+	case VEDIS_CONFIG_EXPIRE_STATS: {
+		vedis_int64 *pVolatile = va_arg(ap,vedis_int64 *);
+		vedis_int64 *pExpired = va_arg(ap,vedis_int64 *);
+		if( pVolatile == 0 || pExpired == 0 ){
+			rc = VEDIS_CORRUPT;
+			break;
+		}
+		rc = vedisExpireStats(pStore,pVolatile,pExpired);
+		break;
+								  }
 	case VEDIS_CONFIG_ERR_LOG: {
 		/* Database error log if any */
 		const char **pzPtr = va_arg(ap, const char **);
@@ -21663,6 +25262,14 @@ static int vedisRemoveCommand(vedis *pVedis,const char *zCmd)
  * Please refer to the official documentation for function purpose and expected parameters.
  */
 int vedis_open(vedis **ppStore,const char *zStorage)
+{
+	return vedis_open_v2(ppStore,zStorage,0);
+}
+/*
+ * [CAPIREF: vedis_open_v2()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_open_v2(vedis **ppStore,const char *zStorage,unsigned int iFlags)
 {
 	vedis *pHandle;
 	int rc;
@@ -21685,7 +25292,7 @@ int vedis_open(vedis **ppStore,const char *zStorage)
 	/* Zero the structure */
 	SyZero(pHandle,sizeof(vedis));
 	/* Init the database */
-	rc = vedisInitDatabase(pHandle,&sVedisMPGlobal.sAllocator,zStorage,0);
+	rc = vedisInitDatabase(pHandle,&sVedisMPGlobal.sAllocator,zStorage,iFlags);
 	if( rc != VEDIS_OK ){
 		goto Release;
 	}
@@ -21696,7 +25303,7 @@ int vedis_open(vedis **ppStore,const char *zStorage)
 	/* Install the commit callback */
 	vedisPagerSetCommitCallback(pHandle->pPager,vedisOnCommit,pHandle);
 #if defined(VEDIS_ENABLE_THREADS)
-	if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE ){
+	if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && (iFlags & VEDIS_OPEN_NOMUTEX) == 0 ){
 		 /* Associate a recursive mutex with this instance */
 		 pHandle->pMutex = SyMutexNew(sVedisMPGlobal.pMutexMethods, SXMUTEX_TYPE_RECURSIVE);
 		 if( pHandle->pMutex == 0 ){
@@ -21823,14 +25430,93 @@ int vedis_exec(vedis *pStore,const char *zCmd,int nLen)
 	return rc;
 }
 /*
- * [CAPIREF: vedis_exec_fmt()]
+ * [CAPIREF: vedis_exec_fmt()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_exec_fmt(vedis *pStore,const char *zFmt,...)
+{
+	SyBlob sWorker;
+	va_list ap;
+	int rc;
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 SyBlobInit(&sWorker,&pStore->sMem);
+	 va_start(ap,zFmt);
+	 SyBlobFormatAp(&sWorker,zFmt,ap);
+	 va_end(ap);
+	 /* Execute */
+	 rc = vedisProcessInput(pStore,(const char *)SyBlobData(&sWorker),SyBlobLength(&sWorker));
+	 /* Cleanup */
+	 SyBlobRelease(&sWorker);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 /* Execution result */
+	return rc;
+}
+/*
+ * [CAPIREF: vedis_exec_argv()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_exec_argv(vedis *pStore,const char *zName,int nNameLen,int nArg,
+	const char **azArg,const int *anArgLen,const int *aiType)
+{
+	SyString sName;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+	if( zName == 0 || nArg < 0 || (nArg > 0 && (azArg == 0 || anArgLen == 0)) ){
+		return VEDIS_INVALID;
+	}
+	SyStringInitFromBuf(&sName,zName,nNameLen < 0 ? SyStrlen(zName) : (sxu32)nNameLen);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 /* Execute without going through the tokenizer */
+	 rc = vedisExecArgv(pStore,&sName,nArg,azArg,anArgLen,aiType);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 /* Execution result */
+	return rc;
+}
+/*
+ * [CAPIREF: vedis_exec_argv_batch()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_exec_fmt(vedis *pStore,const char *zFmt,...)
+int vedis_exec_argv_batch(vedis *pStore,int nCmd,const char **azName,const int *anNameLen,
+	const int *anArg,const char **azArg,const int *anArgLen,const int *aiType,
+	int (*xConsumer)(vedis_value *,void *),void *pUserData,int *pnDone)
 {
-	SyBlob sWorker;
-	va_list ap;
-	int rc;
+	ProcCmdConsumer xOldConsumer;
+	void *pOldUserData;
+	SyString sName;
+	int iOfft = 0;
+	int rc = VEDIS_OK;
+	int i;
+	if( pnDone ){
+		*pnDone = 0;
+	}
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+	if( nCmd < 0 || (nCmd > 0 && (azName == 0 || anNameLen == 0 || anArg == 0)) ){
+		return VEDIS_INVALID;
+	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -21839,14 +25525,26 @@ int vedis_exec_fmt(vedis *pStore,const char *zFmt,...)
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 SyBlobInit(&sWorker,&pStore->sMem);
-	 va_start(ap,zFmt);
-	 SyBlobFormatAp(&sWorker,zFmt,ap);
-	 va_end(ap);
-	 /* Execute */
-	 rc = vedisProcessInput(pStore,(const char *)SyBlobData(&sWorker),SyBlobLength(&sWorker));
-	 /* Cleanup */
-	 SyBlobRelease(&sWorker);
+	 /* Install the per-batch result consumer */
+	 xOldConsumer = pStore->xResultConsumer;
+	 pOldUserData = pStore->pUserData;
+	 pStore->xResultConsumer = xConsumer;
+	 pStore->pUserData = pUserData;
+	 /* Execute each command in turn, stopping at the first failure */
+	 for( i = 0 ; i < nCmd ; ++i ){
+		 SyStringInitFromBuf(&sName,azName[i],anNameLen[i] < 0 ? SyStrlen(azName[i]) : (sxu32)anNameLen[i]);
+		 rc = vedisExecArgv(pStore,&sName,anArg[i],&azArg[iOfft],&anArgLen[iOfft],aiType ? &aiType[iOfft] : 0);
+		 if( rc != VEDIS_OK ){
+			 break;
+		 }
+		 iOfft += anArg[i];
+		 if( pnDone ){
+			 (*pnDone)++;
+		 }
+	 }
+	 /* Restore the previous consumer */
+	 pStore->xResultConsumer = xOldConsumer;
+	 pStore->pUserData = pOldUserData;
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22307,282 +26005,885 @@ int vedis_value_to_bool(vedis_value *pValue)
 	return (int)pValue->x.iVal;
 }
 /*
- * [CAPIREF: vedis_value_to_int64()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * [CAPIREF: vedis_value_to_int64()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+vedis_int64 vedis_value_to_int64(vedis_value *pValue)
+{
+	int rc;
+	rc = vedisMemObjToInteger(pValue);
+	if( rc != VEDIS_OK ){
+		return 0;
+	}
+	return pValue->x.iVal;
+}
+/*
+ * [CAPIREF: vedis_value_to_double()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+double vedis_value_to_double(vedis_value *pValue)
+{
+	int rc;
+	rc = vedisMemObjToReal(pValue);
+	if( rc != VEDIS_OK ){
+		return (double)0;
+	}
+	return (double)pValue->x.rVal;
+}
+/*
+ * [CAPIREF: vedis_value_to_string()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+const char * vedis_value_to_string(vedis_value *pValue, int *pLen)
+{
+	vedisMemObjToString(pValue);
+	if( SyBlobLength(&pValue->sBlob) > 0 ){
+		SyBlobNullAppend(&pValue->sBlob);
+		if( pLen ){
+			*pLen = (int)SyBlobLength(&pValue->sBlob);
+		}
+		return (const char *)SyBlobData(&pValue->sBlob);
+	}else{
+		/* Return the empty string */
+		if( pLen ){
+			*pLen = 0;
+		}
+		return "";
+	}
+}
+/*
+ * [CAPIREF: vedis_value_int()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_int(vedis_value *pVal, int iValue)
+{
+	/* Invalidate any prior representation */
+	vedisMemObjRelease(pVal);
+	pVal->x.iVal = (vedis_int64)iValue;
+	MemObjSetType(pVal, MEMOBJ_INT);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_int64()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_int64(vedis_value *pVal, vedis_int64 iValue)
+{
+	/* Invalidate any prior representation */
+	vedisMemObjRelease(pVal);
+	pVal->x.iVal = iValue;
+	MemObjSetType(pVal, MEMOBJ_INT);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_bool()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_bool(vedis_value *pVal, int iBool)
+{
+	/* Invalidate any prior representation */
+	vedisMemObjRelease(pVal);
+	pVal->x.iVal = iBool ? 1 : 0;
+	MemObjSetType(pVal, MEMOBJ_BOOL);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_null()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_null(vedis_value *pVal)
+{
+	/* Invalidate any prior representation and set the NULL flag */
+	vedisMemObjRelease(pVal);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_double()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_double(vedis_value *pVal, double Value)
+{
+	/* Invalidate any prior representation */
+	vedisMemObjRelease(pVal);
+	pVal->x.rVal = (vedis_real)Value;
+	MemObjSetType(pVal, MEMOBJ_REAL);
+	/* Try to get an integer representation also */
+	vedisMemObjTryInteger(pVal);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_string()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_string(vedis_value *pVal, const char *zString, int nLen)
+{
+	if((pVal->iFlags & MEMOBJ_STRING) == 0 ){
+		/* Invalidate any prior representation */
+		vedisMemObjRelease(pVal);
+		MemObjSetType(pVal, MEMOBJ_STRING);
+	}
+	if( zString ){
+		if( nLen < 0 ){
+			/* Compute length automatically */
+			nLen = (int)SyStrlen(zString);
+		}
+		SyBlobAppend(&pVal->sBlob, (const void *)zString, (sxu32)nLen);
+	}
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_string_format()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_string_format(vedis_value *pVal, const char *zFormat, ...)
+{
+	va_list ap;
+	int rc;
+	if((pVal->iFlags & MEMOBJ_STRING) == 0 ){
+		/* Invalidate any prior representation */
+		vedisMemObjRelease(pVal);
+		MemObjSetType(pVal, MEMOBJ_STRING);
+	}
+	va_start(ap, zFormat);
+	rc = SyBlobFormatAp(&pVal->sBlob, zFormat, ap);
+	va_end(ap);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_reset_string_cursor()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_reset_string_cursor(vedis_value *pVal)
+{
+	/* Reset the string cursor */
+	SyBlobReset(&pVal->sBlob);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_release()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_release(vedis_value *pVal)
+{
+	vedisMemObjRelease(pVal);
+	return VEDIS_OK;
+}
+/*
+ * [CAPIREF: vedis_value_is_int()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_int(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_INT) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_float()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_float(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_REAL) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_bool()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_bool(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_BOOL) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_string()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_string(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_STRING) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_null()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_null(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_NULL) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_numeric()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_numeric(vedis_value *pVal)
+{
+	int rc;
+	rc = vedisMemObjIsNumeric(pVal);
+	return rc;
+}
+/*
+ * [CAPIREF: vedis_value_is_scalar()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_scalar(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_SCALAR) ? TRUE : FALSE;
+}
+/*
+ * [CAPIREF: vedis_value_is_json_array()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_value_is_array(vedis_value *pVal)
+{
+	return (pVal->iFlags & MEMOBJ_HASHMAP) ? TRUE : FALSE;
+}
+/*
+ * Refer to [vedis_kv_store()].
  */
-vedis_int64 vedis_value_to_int64(vedis_value *pValue)
+static int vedisKvStore(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
 {
+	vedis_kv_engine *pEngine;
 	int rc;
-	rc = vedisMemObjToInteger(pValue);
-	if( rc != VEDIS_OK ){
-		return 0;
-	}
-	return pValue->x.iVal;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 if( pEngine->pIo->pMethods->xReplace == 0 ){
+		 /* Storage engine does not implement such method */
+		 vedisGenError(pStore,"xReplace() method not implemented in the underlying storage engine");
+		 rc = VEDIS_NOTIMPLEMENTED;
+	 }else{
+		 if( nKeyLen < 0 ){
+			 /* Assume a null terminated string and compute its length */
+			 nKeyLen = SyStrlen((const char *)pKey);
+		 }
+		 if( !nKeyLen ){
+			 vedisGenError(pStore,"Empty key");
+			 rc = VEDIS_EMPTY;
+		 }else{
+			 /* Perform the requested operation */
+			 rc = pEngine->pIo->pMethods->xReplace(pEngine,pKey,nKeyLen,pData,nDataLen);
+		 }
+	 }
+	 return rc;
 }
 /*
- * [CAPIREF: vedis_value_to_double()]
+ * [CAPIREF: vedis_kv_store()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-double vedis_value_to_double(vedis_value *pValue)
+int vedis_kv_store(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
 {
 	int rc;
-	rc = vedisMemObjToReal(pValue);
-	if( rc != VEDIS_OK ){
-		return (double)0;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
 	}
-	return (double)pValue->x.rVal;
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisKvStore(pStore,pKey,nKeyLen,pData,nDataLen);
+	 if( rc == VEDIS_OK ){
+		 /* The key no longer expires */
+		 vedisExpireClear(pStore,pKey,nKeyLen);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_to_string()]
+ * [CAPIREF: vedis_kv_store_fmt()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-const char * vedis_value_to_string(vedis_value *pValue, int *pLen)
+int vedis_kv_store_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *zFormat,...)
 {
-	vedisMemObjToString(pValue);
-	if( SyBlobLength(&pValue->sBlob) > 0 ){
-		SyBlobNullAppend(&pValue->sBlob);
-		if( pLen ){
-			*pLen = (int)SyBlobLength(&pValue->sBlob);
-		}
-		return (const char *)SyBlobData(&pValue->sBlob);
-	}else{
-		/* Return the empty string */
-		if( pLen ){
-			*pLen = 0;
-		}
-		return "";
+	SyBlob sWorker; /* Working buffer */
+	va_list ap;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
 	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 SyBlobInit(&sWorker,&pStore->sMem);
+	 /* Format the data */
+	 va_start(ap,zFormat);
+	 SyBlobFormatAp(&sWorker,zFormat,ap);
+	 va_end(ap);
+	 /* Perform the requested operation */
+	 rc = vedisKvStore(pStore,pKey,nKeyLen,SyBlobData(&sWorker),SyBlobLength(&sWorker));
+	 if( rc == VEDIS_OK ){
+		 /* The key no longer expires */
+		 vedisExpireClear(pStore,pKey,nKeyLen);
+	 }
+	 /* Clean up */
+	 SyBlobRelease(&sWorker);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_int()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Refer to [vedis_kv_append()].
  */
-int vedis_value_int(vedis_value *pVal, int iValue)
+static int vedisKvAppend(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
 {
-	/* Invalidate any prior representation */
-	vedisMemObjRelease(pVal);
-	pVal->x.iVal = (vedis_int64)iValue;
-	MemObjSetType(pVal, MEMOBJ_INT);
-	return VEDIS_OK;
+	vedis_kv_engine *pEngine;
+	int rc;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 if( pEngine->pIo->pMethods->xAppend == 0 ){
+		 /* Storage engine does not implement such method */
+		 vedisGenError(pStore,"xAppend() method not implemented in the underlying storage engine");
+		 rc = VEDIS_NOTIMPLEMENTED;
+	 }else{
+		 if( nKeyLen < 0 ){
+			 /* Assume a null terminated string and compute its length */
+			 nKeyLen = SyStrlen((const char *)pKey);
+		 }
+		 if( !nKeyLen ){
+			 vedisGenError(pStore,"Empty key");
+			 rc = VEDIS_EMPTY;
+		 }else{
+			 /* Perform the requested operation */
+			 rc = pEngine->pIo->pMethods->xAppend(pEngine,pKey,nKeyLen,pData,nDataLen);
+		 }
+	 }
+	 return rc;
 }
 /*
- * [CAPIREF: vedis_value_int64()]
+ * [CAPIREF: vedis_kv_append()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_int64(vedis_value *pVal, vedis_int64 iValue)
+int vedis_kv_append(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
 {
-	/* Invalidate any prior representation */
-	vedisMemObjRelease(pVal);
-	pVal->x.iVal = iValue;
-	MemObjSetType(pVal, MEMOBJ_INT);
-	return VEDIS_OK;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 /* Append to an empty value if the key is due */
+	 vedisExpireCheck(pStore,pKey,nKeyLen);
+	 rc = vedisKvAppend(pStore,pKey,nKeyLen,pData,nDataLen);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_bool()]
+ * [CAPIREF: vedis_kv_append_fmt()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_bool(vedis_value *pVal, int iBool)
+int vedis_kv_append_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *zFormat,...)
 {
-	/* Invalidate any prior representation */
-	vedisMemObjRelease(pVal);
-	pVal->x.iVal = iBool ? 1 : 0;
-	MemObjSetType(pVal, MEMOBJ_BOOL);
-	return VEDIS_OK;
+	SyBlob sWorker; /* Working buffer */
+	va_list ap;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 SyBlobInit(&sWorker,&pStore->sMem);
+	 /* Format the data */
+	 va_start(ap,zFormat);
+	 SyBlobFormatAp(&sWorker,zFormat,ap);
+	 va_end(ap);
+	 /* Perform the requested operation */
+	 vedisExpireCheck(pStore,pKey,nKeyLen);
+	 rc = vedisKvAppend(pStore,pKey,nKeyLen,SyBlobData(&sWorker),SyBlobLength(&sWorker));
+	 /* Clean up */
+	 SyBlobRelease(&sWorker);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_null()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Refer to [vedis_kv_fetch()].
  */
-int vedis_value_null(vedis_value *pVal)
+static int vedisKvFetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 *pBufLen)
 {
-	/* Invalidate any prior representation and set the NULL flag */
-	vedisMemObjRelease(pVal);
-	return VEDIS_OK;
+	vedis_kv_methods *pMethods;
+	vedis_kv_engine *pEngine;
+	vedis_kv_cursor *pCur;
+	int rc;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 pMethods = pEngine->pIo->pMethods;
+	 pCur = pStore->pCursor;
+	 if( nKeyLen < 0 ){
+		 /* Assume a null terminated string and compute its length */
+		 nKeyLen = SyStrlen((const char *)pKey);
+	 }
+	 if( !nKeyLen ){
+		  vedisGenError(pStore,"Empty key");
+		  rc = VEDIS_EMPTY;
+	 }else{
+		  /* Seek to the record position */
+		  rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
+	 }
+	 if( rc == VEDIS_OK ){
+		 if( pBuf == 0 ){
+			 /* Data length only */
+			 rc = pMethods->xDataLength(pCur,pBufLen);
+		 }else{
+			 SyBlob sBlob;
+			 /* Initialize the data consumer */
+			 SyBlobInitFromBuf(&sBlob,pBuf,(sxu32)*pBufLen);
+			 /* Consume the data */
+			 rc = pMethods->xData(pCur,vedisDataConsumer,&sBlob);
+			 /* Data length */
+			 *pBufLen = (vedis_int64)SyBlobLength(&sBlob);
+			 /* Cleanup */
+			 SyBlobRelease(&sBlob);
+		 }
+	 }
+	 return rc;
 }
 /*
- * [CAPIREF: vedis_value_double()]
+ * [CAPIREF: vedis_kv_fetch()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_double(vedis_value *pVal, double Value)
+int vedis_kv_fetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 *pBufLen)
 {
-	/* Invalidate any prior representation */
-	vedisMemObjRelease(pVal);
-	pVal->x.rVal = (vedis_real)Value;
-	MemObjSetType(pVal, MEMOBJ_REAL);
-	/* Try to get an integer representation also */
-	vedisMemObjTryInteger(pVal);
-	return VEDIS_OK;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	 if( rc == VEDIS_OK ){
+		 rc = vedisKvFetch(pStore,pKey,nKeyLen,pBuf,pBufLen);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_string()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Refer to [vedis_kv_fetch_callback()].
  */
-int vedis_value_string(vedis_value *pVal, const char *zString, int nLen)
+VEDIS_PRIVATE int vedisKvFetchCallback(vedis *pStore,const void *pKey,int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
-	if((pVal->iFlags & MEMOBJ_STRING) == 0 ){
-		/* Invalidate any prior representation */
-		vedisMemObjRelease(pVal);
-		MemObjSetType(pVal, MEMOBJ_STRING);
-	}
-	if( zString ){
-		if( nLen < 0 ){
-			/* Compute length automatically */
-			nLen = (int)SyStrlen(zString);
-		}
-		SyBlobAppend(&pVal->sBlob, (const void *)zString, (sxu32)nLen);
-	}
-	return VEDIS_OK;
+	vedis_kv_methods *pMethods;
+	vedis_kv_engine *pEngine;
+	vedis_kv_cursor *pCur;
+	int rc;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 pMethods = pEngine->pIo->pMethods;
+	 pCur = pStore->pCursor;
+	 if( nKeyLen < 0 ){
+		 /* Assume a null terminated string and compute its length */
+		 nKeyLen = SyStrlen((const char *)pKey);
+	 }
+	 if( !nKeyLen ){
+		 vedisGenError(pStore,"Empty key");
+		 rc = VEDIS_EMPTY;
+	 }else{
+		 /* Seek to the record position */
+		 rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
+	 }
+	 if( rc == VEDIS_OK && xConsumer ){
+		 /* Consume the data directly */
+		 rc = pMethods->xData(pCur,xConsumer,pUserData);	 
+	 }
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_string_format()]
+ * [CAPIREF: vedis_kv_fetch_callback()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_string_format(vedis_value *pVal, const char *zFormat, ...)
+int vedis_kv_fetch_callback(vedis *pStore,const void *pKey,int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
-	va_list ap;
 	int rc;
-	if((pVal->iFlags & MEMOBJ_STRING) == 0 ){
-		/* Invalidate any prior representation */
-		vedisMemObjRelease(pVal);
-		MemObjSetType(pVal, MEMOBJ_STRING);
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
 	}
-	va_start(ap, zFormat);
-	rc = SyBlobFormatAp(&pVal->sBlob, zFormat, ap);
-	va_end(ap);
-	return VEDIS_OK;
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	 if( rc == VEDIS_OK ){
+		 rc = vedisKvFetchCallback(pStore,pKey,nKeyLen,xConsumer,pUserData);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_reset_string_cursor()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Refer to [vedis_kv_fetch_sized_callback()].
  */
-int vedis_value_reset_string_cursor(vedis_value *pVal)
+VEDIS_PRIVATE int vedisKvFetchSizedCallback(vedis *pStore,const void *pKey,int nKeyLen,
+	int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
-	/* Reset the string cursor */
-	SyBlobReset(&pVal->sBlob);
-	return VEDIS_OK;
+	vedis_kv_methods *pMethods;
+	vedis_kv_engine *pEngine;
+	vedis_kv_cursor *pCur;
+	vedis_int64 nData;
+	int rc;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 pMethods = pEngine->pIo->pMethods;
+	 pCur = pStore->pCursor;
+	 if( nKeyLen < 0 ){
+		 /* Assume a null terminated string and compute its length */
+		 nKeyLen = SyStrlen((const char *)pKey);
+	 }
+	 if( !nKeyLen ){
+		 vedisGenError(pStore,"Empty key");
+		 rc = VEDIS_EMPTY;
+	 }else{
+		 /* Seek to the record position */
+		 rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
+	 }
+	 if( rc == VEDIS_OK && xSize ){
+		 /* Report the data length before any data is consumed */
+		 rc = pMethods->xDataLength(pCur,&nData);
+		 if( rc == VEDIS_OK ){
+			 rc = xSize(nData,pUserData);
+			 if( rc != VEDIS_OK ){
+				 /* Data consumer request an operation abort */
+				 rc = VEDIS_ABORT;
+			 }
+		 }
+	 }
+	 if( rc == VEDIS_OK && xConsumer ){
+		 /* Consume the data directly */
+		 rc = pMethods->xData(pCur,xConsumer,pUserData);
+	 }
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_release()]
+ * [CAPIREF: vedis_kv_fetch_sized_callback()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_release(vedis_value *pVal)
+int vedis_kv_fetch_sized_callback(vedis *pStore,const void *pKey,int nKeyLen,
+	int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
-	vedisMemObjRelease(pVal);
-	return VEDIS_OK;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	 if( rc == VEDIS_OK ){
+		 rc = vedisKvFetchSizedCallback(pStore,pKey,nKeyLen,xSize,xConsumer,pUserData);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_int()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Refer to [vedis_kv_delete()].
  */
-int vedis_value_is_int(vedis_value *pVal)
+VEDIS_PRIVATE int vedisKvDelete(vedis *pStore,const void *pKey,int nKeyLen)
 {
-	return (pVal->iFlags & MEMOBJ_INT) ? TRUE : FALSE;
+	vedis_kv_methods *pMethods;
+	vedis_kv_engine *pEngine;
+	vedis_kv_cursor *pCur;
+	int rc;
+	/* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 pMethods = pEngine->pIo->pMethods;
+	 pCur = pStore->pCursor;
+	 if( pMethods->xDelete == 0 ){
+		 /* Storage engine does not implement such method */
+		 vedisGenError(pStore,"xDelete() method not implemented in the underlying storage engine");
+		 rc = VEDIS_NOTIMPLEMENTED;
+	 }else{
+		 if( nKeyLen < 0 ){
+			 /* Assume a null terminated string and compute its length */
+			 nKeyLen = SyStrlen((const char *)pKey);
+		 }
+		 if( !nKeyLen ){
+			 vedisGenError(pStore,"Empty key");
+			 rc = VEDIS_EMPTY;
+		 }else{
+			 /* Seek to the record position */
+			 rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
+		 }
+		 if( rc == VEDIS_OK ){
+			 /* Exact match found, delete the entry */
+			 rc = pMethods->xDelete(pCur);
+		 }
+	 }
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_float()]
+ * [CAPIREF: vedis_kv_config()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_float(vedis_value *pVal)
+int vedis_kv_config(vedis *pStore,int iOp,...)
 {
-	return (pVal->iFlags & MEMOBJ_REAL) ? TRUE : FALSE;
+	vedis_kv_engine *pEngine;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 /* Point to the underlying storage engine */
+	 pEngine = vedisPagerGetKvEngine(pStore);
+	 if( pEngine->pIo->pMethods->xConfig == 0 ){
+		 /* Storage engine does not implements such method */
+		 vedisGenError(pStore,"xConfig() method not implemented in the underlying storage engine");
+		 rc = VEDIS_NOTIMPLEMENTED;
+	 }else{
+		 va_list ap;
+		 /* Configure the storage engine */
+		 va_start(ap,iOp);
+		 rc = pEngine->pIo->pMethods->xConfig(pEngine,iOp,ap);
+		 va_end(ap);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_bool()]
+ * [CAPIREF: vedis_kv_delete()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_bool(vedis_value *pVal)
+int vedis_kv_delete(vedis *pStore,const void *pKey,int nKeyLen)
 {
-	return (pVal->iFlags & MEMOBJ_BOOL) ? TRUE : FALSE;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireCheck(pStore,pKey,nKeyLen);
+	 if( rc == VEDIS_OK ){
+		 vedisExpireClear(pStore,pKey,nKeyLen);
+		 rc = vedisKvDelete(pStore,pKey,nKeyLen);
+	 }
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_string()]
+ * [CAPIREF: vedis_kv_expire()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_string(vedis_value *pVal)
+int vedis_kv_expire(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 iDeadline)
 {
-	return (pVal->iFlags & MEMOBJ_STRING) ? TRUE : FALSE;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireSet(pStore,pKey,nKeyLen,iDeadline);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_null()]
+ * [CAPIREF: vedis_kv_deadline()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_null(vedis_value *pVal)
+int vedis_kv_deadline(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 *pDeadline)
 {
-	return (pVal->iFlags & MEMOBJ_NULL) ? TRUE : FALSE;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireDeadline(pStore,pKey,nKeyLen,pDeadline);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_numeric()]
+ * [CAPIREF: vedis_kv_expire_step()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_numeric(vedis_value *pVal)
+int vedis_kv_expire_step(vedis *pStore,int nMax,int *pExpired)
 {
 	int rc;
-	rc = vedisMemObjIsNumeric(pVal);
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisExpireStep(pStore,nMax,pExpired);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
 	return rc;
 }
 /*
- * [CAPIREF: vedis_value_is_scalar()]
- * Please refer to the official documentation for function purpose and expected parameters.
+ * Return the database handle that own a given cursor.
  */
-int vedis_value_is_scalar(vedis_value *pVal)
+static vedis * vedisCursorHandle(vedis_kv_cursor *pCursor)
 {
-	return (pVal->iFlags & MEMOBJ_SCALAR) ? TRUE : FALSE;
+	Pager *pPager = (Pager *)pCursor->pStore->pIo->pHandle;
+	return pPager->pDb;
 }
 /*
- * [CAPIREF: vedis_value_is_json_array()]
+ * [CAPIREF: vedis_kv_cursor_init()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_value_is_array(vedis_value *pVal)
+int vedis_kv_cursor_init(vedis *pStore,vedis_kv_cursor **ppOut)
 {
-	return (pVal->iFlags & MEMOBJ_HASHMAP) ? TRUE : FALSE;
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) || ppOut == 0 /* Noop */){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 /* Allocate a new cursor */
+	 rc = vedisInitCursor(pStore,ppOut);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 return rc;
 }
 /*
- * Refer to [vedis_kv_store()].
+ * [CAPIREF: vedis_kv_cursor_release()]
+ * Please refer to the official documentation for function purpose and expected parameters.
  */
-static int vedisKvStore(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
+int vedis_kv_cursor_release(vedis *pStore,vedis_kv_cursor *pCur)
 {
-	vedis_kv_engine *pEngine;
 	int rc;
-	/* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 if( pEngine->pIo->pMethods->xReplace == 0 ){
-		 /* Storage engine does not implement such method */
-		 vedisGenError(pStore,"xReplace() method not implemented in the underlying storage engine");
-		 rc = VEDIS_NOTIMPLEMENTED;
-	 }else{
-		 if( nKeyLen < 0 ){
-			 /* Assume a null terminated string and compute its length */
-			 nKeyLen = SyStrlen((const char *)pKey);
-		 }
-		 if( !nKeyLen ){
-			 vedisGenError(pStore,"Empty key");
-			 rc = VEDIS_EMPTY;
-		 }else{
-			 /* Perform the requested operation */
-			 rc = pEngine->pIo->pMethods->xReplace(pEngine,pKey,nKeyLen,pData,nDataLen);
-		 }
+	if( VEDIS_DB_MISUSE(pStore) || pCur == 0 /* Noop */){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
+#endif
+	 /* Release the cursor */
+	 rc = vedisReleaseCursor(pStore,pCur);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
 	 return rc;
 }
 /*
- * [CAPIREF: vedis_kv_store()]
+ * [CAPIREF: vedis_kv_cursor_first_entry()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_store(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
+int vedis_kv_cursor_first_entry(vedis_kv_cursor *pCursor)
 {
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 rc = vedisKvStore(pStore,pKey,nKeyLen,pData,nDataLen);
+	/* Point to the first record */
+	rc = pCursor->pStore->pIo->pMethods->xFirst(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22590,34 +26891,30 @@ int vedis_kv_store(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,
 	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_store_fmt()]
+ * [CAPIREF: vedis_kv_cursor_last_entry()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_store_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *zFormat,...)
+int vedis_kv_cursor_last_entry(vedis_kv_cursor *pCursor)
 {
-	SyBlob sWorker; /* Working buffer */
-	va_list ap;
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 SyBlobInit(&sWorker,&pStore->sMem);
-	 /* Format the data */
-	 va_start(ap,zFormat);
-	 SyBlobFormatAp(&sWorker,zFormat,ap);
-	 va_end(ap);
-	 /* Perform the requested operation */
-	 rc = vedisKvStore(pStore,pKey,nKeyLen,SyBlobData(&sWorker),SyBlobLength(&sWorker));
-	 /* Clean up */
-	 SyBlobRelease(&sWorker);
+	/* Point to the last record */
+	rc = pCursor->pStore->pIo->pMethods->xLast(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22625,52 +26922,60 @@ int vedis_kv_store_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *zF
 	return rc;
 }
 /*
- * Refer to [vedis_kv_append()].
+ * [CAPIREF: vedis_kv_cursor_valid_entry()]
+ * Please refer to the official documentation for function purpose and expected parameters.
  */
-static int vedisKvAppend(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
+int vedis_kv_cursor_valid_entry(vedis_kv_cursor *pCursor)
 {
-	vedis_kv_engine *pEngine;
 	int rc;
-	/* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 if( pEngine->pIo->pMethods->xAppend == 0 ){
-		 /* Storage engine does not implement such method */
-		 vedisGenError(pStore,"xAppend() method not implemented in the underlying storage engine");
-		 rc = VEDIS_NOTIMPLEMENTED;
-	 }else{
-		 if( nKeyLen < 0 ){
-			 /* Assume a null terminated string and compute its length */
-			 nKeyLen = SyStrlen((const char *)pKey);
-		 }
-		 if( !nKeyLen ){
-			 vedisGenError(pStore,"Empty key");
-			 rc = VEDIS_EMPTY;
-		 }else{
-			 /* Perform the requested operation */
-			 rc = pEngine->pIo->pMethods->xAppend(pEngine,pKey,nKeyLen,pData,nDataLen);
-		 }
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
+		return 0;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
-	 return rc;
+#endif
+	rc = pCursor->pStore->pIo->pMethods->xValid(pCursor);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_append()]
+ * [CAPIREF: vedis_kv_cursor_next_entry()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_append(vedis *pStore,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
+int vedis_kv_cursor_next_entry(vedis_kv_cursor *pCursor)
 {
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 rc = vedisKvAppend(pStore,pKey,nKeyLen,pData,nDataLen);
+	/* Point to the next entry */
+	rc = pCursor->pStore->pIo->pMethods->xNext(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22678,34 +26983,30 @@ int vedis_kv_append(vedis *pStore,const void *pKey,int nKeyLen,const void *pData
 	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_append_fmt()]
+ * [CAPIREF: vedis_kv_cursor_prev_entry()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_append_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *zFormat,...)
+int vedis_kv_cursor_prev_entry(vedis_kv_cursor *pCursor)
 {
-	SyBlob sWorker; /* Working buffer */
-	va_list ap;
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 SyBlobInit(&sWorker,&pStore->sMem);
-	 /* Format the data */
-	 va_start(ap,zFormat);
-	 SyBlobFormatAp(&sWorker,zFormat,ap);
-	 va_end(ap);
-	 /* Perform the requested operation */
-	 rc = vedisKvAppend(pStore,pKey,nKeyLen,SyBlobData(&sWorker),SyBlobLength(&sWorker));
-	 /* Clean up */
-	 SyBlobRelease(&sWorker);
+	/* Point to the previous entry */
+	rc = pCursor->pStore->pIo->pMethods->xPrev(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22713,66 +27014,120 @@ int vedis_kv_append_fmt(vedis *pStore,const void *pKey,int nKeyLen,const char *z
 	return rc;
 }
 /*
- * Refer to [vedis_kv_fetch()].
+ * [CAPIREF: vedis_kv_cursor_key()]
+ * Please refer to the official documentation for function purpose and expected parameters.
  */
-static int vedisKvFetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 *pBufLen)
+int vedis_kv_cursor_key(vedis_kv_cursor *pCursor,void *pBuf,int *pnByte)
 {
-	vedis_kv_methods *pMethods;
-	vedis_kv_engine *pEngine;
-	vedis_kv_cursor *pCur;
 	int rc;
-	/* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 pMethods = pEngine->pIo->pMethods;
-	 pCur = pStore->pCursor;
-	 if( nKeyLen < 0 ){
-		 /* Assume a null terminated string and compute its length */
-		 nKeyLen = SyStrlen((const char *)pKey);
-	 }
-	 if( !nKeyLen ){
-		  vedisGenError(pStore,"Empty key");
-		  rc = VEDIS_EMPTY;
-	 }else{
-		  /* Seek to the record position */
-		  rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 || pnByte == 0 ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
-	 if( rc == VEDIS_OK ){
-		 if( pBuf == 0 ){
-			 /* Data length only */
-			 rc = pMethods->xDataLength(pCur,pBufLen);
-		 }else{
-			 SyBlob sBlob;
-			 /* Initialize the data consumer */
-			 SyBlobInitFromBuf(&sBlob,pBuf,(sxu32)*pBufLen);
-			 /* Consume the data */
-			 rc = pMethods->xData(pCur,vedisDataConsumer,&sBlob);
-			 /* Data length */
-			 *pBufLen = (vedis_int64)SyBlobLength(&sBlob);
-			 /* Cleanup */
-			 SyBlobRelease(&sBlob);
-		 }
+#endif
+	if( pBuf == 0 ){
+		/* Extract the key length only */
+		rc = pCursor->pStore->pIo->pMethods->xKeyLength(pCursor,pnByte);
+	}else if( (*pnByte) < 0 ){
+		rc = VEDIS_CORRUPT;
+	}else{
+		SyBlob sBlob;
+		/* Initialize the blob */
+		SyBlobInitFromBuf(&sBlob,pBuf,(sxu32)(*pnByte));
+		/* Extract the key */
+		rc = pCursor->pStore->pIo->pMethods->xKey(pCursor,vedisDataConsumer,&sBlob);
+		/* Key length */
+		*pnByte = (int)SyBlobLength(&sBlob);
+		/* Cleanup */
+		SyBlobRelease(&sBlob);
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
+}
+/*
+ * [CAPIREF: vedis_kv_cursor_key_callback()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_kv_cursor_key_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+{
+	int rc;
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 || xConsumer == 0 ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
-	 return rc;
+#endif
+	/* Consume the key directly */
+	rc = pCursor->pStore->pIo->pMethods->xKey(pCursor,xConsumer,pUserData);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_fetch()]
+ * [CAPIREF: vedis_kv_cursor_data()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_fetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 *pBufLen)
+int vedis_kv_cursor_data(vedis_kv_cursor *pCursor,void *pBuf,vedis_int64 *pnByte)
 {
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 || pnByte == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 rc = vedisKvFetch(pStore,pKey,nKeyLen,pBuf,pBufLen);
+	if( pBuf == 0 ){
+		/* Extract the data length only */
+		rc = pCursor->pStore->pIo->pMethods->xDataLength(pCursor,pnByte);
+	}else if( (*pnByte) < 0 ){
+		rc = VEDIS_CORRUPT;
+	}else{
+		SyBlob sBlob;
+		/* Initialize the blob */
+		SyBlobInitFromBuf(&sBlob,pBuf,(sxu32)(*pnByte));
+		/* Extract the data */
+		rc = pCursor->pStore->pIo->pMethods->xData(pCursor,vedisDataConsumer,&sBlob);
+		/* Data length */
+		*pnByte = SyBlobLength(&sBlob);
+		/* Cleanup */
+		SyBlobRelease(&sBlob);
+	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22780,54 +27135,81 @@ int vedis_kv_fetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_i
 	return rc;
 }
 /*
- * Refer to [vedis_kv_fetch_callback()].
+ * [CAPIREF: vedis_kv_cursor_hidden()]
+ * Please refer to the official documentation for function purpose and expected parameters.
  */
-VEDIS_PRIVATE int vedisKvFetchCallback(vedis *pStore,const void *pKey,int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+int vedis_kv_cursor_hidden(vedis_kv_cursor *pCursor,int *pHidden)
 {
 	vedis_kv_methods *pMethods;
-	vedis_kv_engine *pEngine;
-	vedis_kv_cursor *pCur;
+	const unsigned char *zKey;
+	SyBlob sKey,sData;
+	vedis *pStore;
 	int rc;
-	/* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 pMethods = pEngine->pIo->pMethods;
-	 pCur = pStore->pCursor;
-	 if( nKeyLen < 0 ){
-		 /* Assume a null terminated string and compute its length */
-		 nKeyLen = SyStrlen((const char *)pKey);
-	 }
-	 if( !nKeyLen ){
-		 vedisGenError(pStore,"Empty key");
-		 rc = VEDIS_EMPTY;
-	 }else{
-		 /* Seek to the record position */
-		 rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
-	 }
-	 if( rc == VEDIS_OK && xConsumer ){
-		 /* Consume the data directly */
-		 rc = pMethods->xData(pCur,xConsumer,pUserData);	 
+	/* Check for a valid cursor */
+	if( pCursor == 0 || pHidden == 0 ){
+		return VEDIS_CORRUPT;
+	}
+	pStore = vedisCursorHandle(pCursor);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
+#endif
+	pMethods = pCursor->pStore->pIo->pMethods;
+	SyBlobInit(&sKey,&pStore->sMem);
+	SyBlobInit(&sData,&pStore->sMem);
+	*pHidden = FALSE;
+	rc = pMethods->xKey(pCursor,vedisDataConsumer,&sKey);
+	if( rc == VEDIS_OK ){
+		zKey = (const unsigned char *)SyBlobData(&sKey);
+		if( SyBlobLength(&sKey) > 3 && zKey[0] == 'v' && (zKey[1] == 't' || zKey[1] == 'x') ){
+			/* Only read the value of the records that may belong to a table */
+			rc = pMethods->xData(pCursor,vedisDataConsumer,&sData);
+			if( rc == VEDIS_OK ){
+				*pHidden = vedisIsTableRecord(pStore,zKey,SyBlobLength(&sKey),
+					(const unsigned char *)SyBlobData(&sData),SyBlobLength(&sData));
+			}
+		}
+		if( rc == VEDIS_OK && !*pHidden ){
+			*pHidden = vedisExpireIsDue(pStore,SyBlobData(&sKey),(int)SyBlobLength(&sKey));
+		}
+	}
+	SyBlobRelease(&sKey);
+	SyBlobRelease(&sData);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
 	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_fetch_callback()]
+ * [CAPIREF: vedis_kv_cursor_data_callback()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_fetch_callback(vedis *pStore,const void *pKey,int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+int vedis_kv_cursor_data_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 || xConsumer == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 rc = vedisKvFetchCallback(pStore,pKey,nKeyLen,xConsumer,pUserData);
+	/* Consume the data directly */
+	rc = pCursor->pStore->pIo->pMethods->xData(pCursor,xConsumer,pUserData);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22835,73 +27217,72 @@ int vedis_kv_fetch_callback(vedis *pStore,const void *pKey,int nKeyLen,int (*xCo
 	return rc;
 }
 /*
- * Refer to [vedis_kv_delete()].
+ * [CAPIREF: vedis_kv_cursor_seek()]
+ * Please refer to the official documentation for function purpose and expected parameters.
  */
-VEDIS_PRIVATE int vedisKvDelete(vedis *pStore,const void *pKey,int nKeyLen)
+int vedis_kv_cursor_seek(vedis_kv_cursor *pCursor,const void *pKey,int nKeyLen,int iPos)
 {
-	vedis_kv_methods *pMethods;
-	vedis_kv_engine *pEngine;
-	vedis_kv_cursor *pCur;
 	int rc;
-	/* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 pMethods = pEngine->pIo->pMethods;
-	 pCur = pStore->pCursor;
-	 if( pMethods->xDelete == 0 ){
-		 /* Storage engine does not implement such method */
-		 vedisGenError(pStore,"xDelete() method not implemented in the underlying storage engine");
-		 rc = VEDIS_NOTIMPLEMENTED;
-	 }else{
-		 if( nKeyLen < 0 ){
-			 /* Assume a null terminated string and compute its length */
-			 nKeyLen = SyStrlen((const char *)pKey);
-		 }
-		 if( !nKeyLen ){
-			 vedisGenError(pStore,"Empty key");
-			 rc = VEDIS_EMPTY;
-		 }else{
-			 /* Seek to the record position */
-			 rc = pMethods->xSeek(pCur,pKey,nKeyLen,VEDIS_CURSOR_MATCH_EXACT);
-		 }
-		 if( rc == VEDIS_OK ){
-			 /* Exact match found, delete the entry */
-			 rc = pMethods->xDelete(pCur);
-		 }
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 || pKey == 0 ){
+		return VEDIS_CORRUPT;
+	}
+	if( nKeyLen < 0 ){
+		/* Assume a null terminated string and compute its length */
+		nKeyLen = SyStrlen((const char *)pKey);
+	}
+	if( !nKeyLen ){
+		return VEDIS_EMPTY;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
+#endif
+	/* Only exact matches are supported by the hash based storage engines */
+	rc = pCursor->pStore->pIo->pMethods->xSeek(pCursor,pKey,nKeyLen,iPos);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
 	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_config()]
+ * [CAPIREF: vedis_kv_cursor_delete_entry()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_config(vedis *pStore,int iOp,...)
+int vedis_kv_cursor_delete_entry(vedis_kv_cursor *pCursor)
 {
-	vedis_kv_engine *pEngine;
 	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
+	if( pCursor->pStore->pIo->pMethods->xDelete == 0 ){
+		/* Storage engine does not implement such method */
+		return VEDIS_NOTIMPLEMENTED;
+	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 /* Point to the underlying storage engine */
-	 pEngine = vedisPagerGetKvEngine(pStore);
-	 if( pEngine->pIo->pMethods->xConfig == 0 ){
-		 /* Storage engine does not implements such method */
-		 vedisGenError(pStore,"xConfig() method not implemented in the underlying storage engine");
-		 rc = VEDIS_NOTIMPLEMENTED;
-	 }else{
-		 va_list ap;
-		 /* Configure the storage engine */
-		 va_start(ap,iOp);
-		 rc = pEngine->pIo->pMethods->xConfig(pEngine,iOp,ap);
-		 va_end(ap);
-	 }
+	/* Remove the current entry */
+	rc = pCursor->pStore->pIo->pMethods->xDelete(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -22909,29 +27290,34 @@ int vedis_kv_config(vedis *pStore,int iOp,...)
 	return rc;
 }
 /*
- * [CAPIREF: vedis_kv_delete()]
+ * [CAPIREF: vedis_kv_cursor_reset()]
  * Please refer to the official documentation for function purpose and expected parameters.
  */
-int vedis_kv_delete(vedis *pStore,const void *pKey,int nKeyLen)
+int vedis_kv_cursor_reset(vedis_kv_cursor *pCursor)
 {
-	int rc;
-	if( VEDIS_DB_MISUSE(pStore) ){
+#if defined(VEDIS_ENABLE_THREADS)
+	vedis *pStore;
+#endif
+	/* Check for a valid cursor */
+	if( pCursor == 0 ){
 		return VEDIS_CORRUPT;
 	}
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Acquire DB mutex */
+	 pStore = vedisCursorHandle(pCursor);
 	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE && 
 		 VEDIS_THRD_DB_RELEASE(pStore) ){
 			 return VEDIS_ABORT; /* Another thread have released this instance */
 	 }
 #endif
-	 rc = vedisKvDelete(pStore,pKey,nKeyLen);
+	/* Reset */
+	pCursor->pStore->pIo->pMethods->xReset(pCursor);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
 #endif
-	return rc;
+	return VEDIS_OK;
 }
 /*
  * [CAPIREF: vedis_context_kv_store()]
@@ -22950,6 +27336,7 @@ int vedis_context_kv_store(vedis_context *pCtx,const void *pKey,int nKeyLen,cons
 int vedis_context_kv_append(vedis_context *pCtx,const void *pKey,int nKeyLen,const void *pData,vedis_int64 nDataLen)
 {
 	int rc;
+	vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
 	rc = vedisKvAppend(pCtx->pVedis,pKey,nKeyLen,pData,nDataLen);
 	return rc;
 }
@@ -22988,6 +27375,7 @@ int vedis_context_kv_append_fmt(vedis_context *pCtx,const void *pKey,int nKeyLen
 	SyBlobFormatAp(&sWorker,zFormat,ap);
 	va_end(ap);
 	/* Perform the requested operation */
+	vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
 	rc = vedisKvAppend(pCtx->pVedis,pKey,nKeyLen,SyBlobData(&sWorker),SyBlobLength(&sWorker));
 	/* Clean up */
 	SyBlobRelease(&sWorker);
@@ -23000,7 +27388,10 @@ int vedis_context_kv_append_fmt(vedis_context *pCtx,const void *pKey,int nKeyLen
 int vedis_context_kv_fetch(vedis_context *pCtx,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 /* in|out */*pBufLen)
 {
 	int rc;
-	rc = vedisKvFetch(pCtx->pVedis,pKey,nKeyLen,pBuf,pBufLen);
+	rc = vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		rc = vedisKvFetch(pCtx->pVedis,pKey,nKeyLen,pBuf,pBufLen);
+	}
 	return rc;
 }
 /*
@@ -23011,7 +27402,24 @@ int vedis_context_kv_fetch_callback(vedis_context *pCtx,const void *pKey,
 	                    int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
 {
 	int rc;
-	rc = vedisKvFetchCallback(pCtx->pVedis,pKey,nKeyLen,xConsumer,pUserData);
+	rc = vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		rc = vedisKvFetchCallback(pCtx->pVedis,pKey,nKeyLen,xConsumer,pUserData);
+	}
+	return rc;
+}
+/*
+ * [CAPIREF: vedis_context_kv_fetch_sized_callback()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_context_kv_fetch_sized_callback(vedis_context *pCtx,const void *pKey,int nKeyLen,
+	int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData)
+{
+	int rc;
+	rc = vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		rc = vedisKvFetchSizedCallback(pCtx->pVedis,pKey,nKeyLen,xSize,xConsumer,pUserData);
+	}
 	return rc;
 }
 /*
@@ -23021,7 +27429,11 @@ int vedis_context_kv_fetch_callback(vedis_context *pCtx,const void *pKey,
 int vedis_context_kv_delete(vedis_context *pCtx,const void *pKey,int nKeyLen)
 {
 	int rc;
-	rc = vedisKvDelete(pCtx->pVedis,pKey,nKeyLen);
+	rc = vedisExpireCheck(pCtx->pVedis,pKey,nKeyLen);
+	if( rc == VEDIS_OK ){
+		vedisExpireClear(pCtx->pVedis,pKey,nKeyLen);
+		rc = vedisKvDelete(pCtx->pVedis,pKey,nKeyLen);
+	}
 	return rc;
 }
 /*
@@ -23044,6 +27456,9 @@ int vedis_begin(vedis *pStore)
 #endif
 	 /* Begin the write transaction */
 	 rc = vedisPagerBegin(pStore->pPager);
+	 if( rc == VEDIS_OK ){
+		 pStore->iFlags |= VEDIS_FL_IN_TRANSACTION;
+	 }
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -23070,6 +27485,11 @@ int vedis_commit(vedis *pStore)
 #endif
 	 /* Commit the transaction */
 	 rc = vedisPagerCommit(pStore->pPager);
+	 if( rc != VEDIS_OK ){
+		 vedisOnRollback(pStore);
+	 }
+	 /* Either way the transaction is over */
+	 pStore->iFlags &= ~VEDIS_FL_IN_TRANSACTION;
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -23096,6 +27516,118 @@ int vedis_rollback(vedis *pStore)
 #endif
 	 /* Rollback the transaction */
 	 rc = vedisPagerRollback(pStore->pPager,TRUE);
+	 vedisOnRollback(pStore);
+	 pStore->iFlags &= ~VEDIS_FL_IN_TRANSACTION;
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 return rc;
+}
+/*
+ * [CAPIREF: vedis_dump()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_dump(vedis *pStore,int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *),void *pUserData)
+{
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE &&
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisDump(pStore,xRecord,pUserData);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 return rc;
+}
+/*
+ * [CAPIREF: vedis_backup_init()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_backup_init(vedis *pStore,const char *zDest,vedis_backup **ppOut)
+{
+	int rc;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE &&
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisPagerBackupInit(pStore->pPager,zDest,ppOut);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 return rc;
+}
+/*
+ * [CAPIREF: vedis_backup_step()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_backup_step(vedis_backup *pBackup,int nPage,vedis_int64 *pRemaining,vedis_int64 *pTotal)
+{
+	int rc;
+	vedis *pStore;
+	if( pBackup == 0 ){
+		return VEDIS_CORRUPT;
+	}
+	pStore = pBackup->pStore;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE &&
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisPagerBackupStep(pBackup,nPage,pRemaining,pTotal);
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Leave DB mutex */
+	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+#endif
+	 return rc;
+}
+/*
+ * [CAPIREF: vedis_backup_finish()]
+ * Please refer to the official documentation for function purpose and expected parameters.
+ */
+int vedis_backup_finish(vedis_backup *pBackup)
+{
+	int rc;
+	vedis *pStore;
+	if( pBackup == 0 ){
+		return VEDIS_CORRUPT;
+	}
+	pStore = pBackup->pStore;
+	if( VEDIS_DB_MISUSE(pStore) ){
+		return VEDIS_CORRUPT;
+	}
+#if defined(VEDIS_ENABLE_THREADS)
+	 /* Acquire DB mutex */
+	 SyMutexEnter(sVedisMPGlobal.pMutexMethods, pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
+	 if( sVedisMPGlobal.nThreadingLevel > VEDIS_THREAD_LEVEL_SINGLE &&
+		 VEDIS_THRD_DB_RELEASE(pStore) ){
+			 return VEDIS_ABORT; /* Another thread have released this instance */
+	 }
+#endif
+	 rc = vedisPagerBackupFinish(pBackup);
 #if defined(VEDIS_ENABLE_THREADS)
 	 /* Leave DB mutex */
 	 SyMutexLeave(sVedisMPGlobal.pMutexMethods,pStore->pMutex); /* NO-OP if sVedisMPGlobal.nThreadingLevel != VEDIS_THREAD_LEVEL_MULTI */
@@ -368,6 +368,68 @@ typedef sxi64 vedis_int64;
 #define VEDIS_CONFIG_DUP_EXEC_VALUE      7  /* ONE ARGUMENT: vedis_value **ppOut */
 #define VEDIS_CONFIG_RELEASE_DUP_VALUE   8  /* ONE ARGUMENT: vedis_value *pIn */
 #define VEDIS_CONFIG_OUTPUT_CONSUMER     9  /* TWO ARGUMENTS: int (*xConsumer)(vedis_value *pOut,void *pUserdata), void *pUserdata */
+#define VEDIS_CONFIG_PAGE_SIZE           10 /* ONE ARGUMENT: int iPageSize */
+#define VEDIS_CONFIG_PAGER_STATS         11 /* TWO ARGUMENTS: vedis_pager_stats *pStats, int bReset */
+#define VEDIS_CONFIG_TRACK_WORKING_SET   12 /* ONE ARGUMENT: int bEnable */
+#define VEDIS_CONFIG_TABLE_STATS         13 /* FOUR ARGUMENTS: int *pTables, int *pDirty, int *pLastCommit, vedis_int64 *pTotal */
+#define VEDIS_CONFIG_LAZY_TABLES         14 /* ONE ARGUMENT: int nMaxResident */
+#define VEDIS_CONFIG_LAZY_STATS          15 /* FOUR ARGUMENTS: int *pPartial, vedis_int64 *pResident, vedis_int64 *pLoaded, vedis_int64 *pEvicted */
+#define VEDIS_CONFIG_EXPIRE_STATS        16 /* TWO ARGUMENTS: vedis_int64 *pVolatile, vedis_int64 *pExpired */
+#define VEDIS_CONFIG_SYNC_MODE           17 /* ONE ARGUMENT: int iSyncMode */
+#define VEDIS_CONFIG_JOURNAL_BUFFER      18 /* ONE ARGUMENT: int nBytes */
+#define VEDIS_CONFIG_IO_STATS            19 /* TWO ARGUMENTS: vedis_io_stats *pStats, int bReset */
+#define VEDIS_CONFIG_IN_TRANSACTION      20 /* ONE ARGUMENT: int *pOpen */
+/*
+ * Sync modes set with the VEDIS_CONFIG_SYNC_MODE configuration verb.
+ */
+#define VEDIS_SYNC_MODE_FULL 1 /* fsync() the files */
+#define VEDIS_SYNC_MODE_DATA 2 /* fdatasync() the files, the default */
+#define VEDIS_SYNC_MODE_OFF  3 /* Leave it to the operating system */
+/*
+ * Page cache counters, filled in by [vedis_config()] with a configuration
+ * verb set to VEDIS_CONFIG_PAGER_STATS.
+ */
+typedef struct vedis_pager_stats vedis_pager_stats;
+struct vedis_pager_stats
+{
+	vedis_int64 nHit;        /* Page requests served from memory */
+	vedis_int64 nMiss;       /* Page requests that had to load the page */
+	vedis_int64 nEvict;      /* Unreferenced pages evicted from the cache */
+	vedis_int64 nWorkingSet; /* Distinct pages requested while tracking is enabled */
+	vedis_int64 nDbPage;     /* Size of the database in pages */
+	int nPage;               /* Pages held in memory */
+	int nCached;             /* Unreferenced pages held in the cache */
+	int nCacheMax;           /* Maximum number of unreferenced pages to cache */
+	int iPageSize;           /* Page size in bytes */
+};
+/*
+ * I/O counters of a database handle, filled in by [vedis_config()] with a
+ * configuration verb set to VEDIS_CONFIG_IO_STATS. Writes coalesced into a
+ * single write are counted once.
+ */
+typedef struct vedis_io_stats vedis_io_stats;
+struct vedis_io_stats
+{
+	vedis_int64 nRead;        /* Read calls */
+	vedis_int64 nWrite;       /* Write calls */
+	vedis_int64 nSync;        /* File and directory syncs */
+	vedis_int64 nByteRead;    /* Bytes read */
+	vedis_int64 nByteWritten; /* Bytes written */
+};
+/*
+ * Types of the records reported to the callback of [vedis_dump()].
+ */
+#define VEDIS_DUMP_KV     1 /* A key/value pair */
+#define VEDIS_DUMP_HASH   2 /* Start of a hash, the key is its name */
+#define VEDIS_DUMP_SET    3 /* Start of a set, the key is its name */
+#define VEDIS_DUMP_LIST   4 /* Start of a list, the key is its name */
+#define VEDIS_DUMP_ENTRY  5 /* Member of the last table: field and value, set member, list value or sorted set member and score */
+#define VEDIS_DUMP_ZSET   6 /* Start of a sorted set, the key is its name */
+#define VEDIS_DUMP_EXPIRE 7 /* Deadline of a key in milliseconds since the epoch, packed as a big-endian double */
+/*
+ * Online backup handle, see [vedis_backup_init()].
+ */
+typedef struct vedis_backup vedis_backup;
 /*
  * Storage engine configuration commands.
  *
@@ -648,6 +710,26 @@ struct vedis_kv_cursor
 #define VEDIS_CURSOR_MATCH_EXACT  1
 #define VEDIS_CURSOR_MATCH_LE     2
 #define VEDIS_CURSOR_MATCH_GE     3
+/*
+ * These bit values are intended for use in the 3rd parameter to the [vedis_open_v2()] interface
+ * and in the 4th parameter to the xOpen method of the [vedis_vfs] object.
+ */
+#define VEDIS_OPEN_READONLY         0x00000001  /* Read only mode. Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_READWRITE        0x00000002  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_CREATE           0x00000004  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_EXCLUSIVE        0x00000008  /* VFS only */
+#define VEDIS_OPEN_TEMP_DB          0x00000010  /* VFS only */
+#define VEDIS_OPEN_NOMUTEX          0x00000020  /* Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_OMIT_JOURNALING  0x00000040  /* Omit journaling for this database. Ok for [vedis_open_v2] */
+#define VEDIS_OPEN_IN_MEMORY        0x00000080  /* An in memory database. Ok for [vedis_open_v2]*/
+#define VEDIS_OPEN_MMAP             0x00000100  /* Obtain a memory view of the whole file. Ok for [vedis_open_v2] */
+/*
+ * Argument types understood by vedis_exec_argv().
+ */
+#define VEDIS_ARG_NULL    0 /* NIL, the argument data is ignored */
+#define VEDIS_ARG_STRING  1 /* Raw (binary-safe) string */
+#define VEDIS_ARG_INT     2 /* Decimal representation of a 64-bit integer */
+#define VEDIS_ARG_REAL    3 /* Decimal representation of a real number */
 /*
  * Key/Value Storage Engine.
  *
@@ -735,6 +817,7 @@ struct vedis_kv_methods
  */
 /* Vedis Datastore Handle */
 VEDIS_APIEXPORT int vedis_open(vedis **ppStore,const char *zStorage);
+VEDIS_APIEXPORT int vedis_open_v2(vedis **ppStore,const char *zStorage,unsigned int iFlags);
 VEDIS_APIEXPORT int vedis_config(vedis *pStore,int iOp,...);
 VEDIS_APIEXPORT int vedis_close(vedis *pStore);
 
@@ -742,6 +825,11 @@ VEDIS_APIEXPORT int vedis_close(vedis *pStore);
 VEDIS_APIEXPORT int vedis_exec(vedis *pStore,const char *zCmd,int nLen);
 VEDIS_APIEXPORT int vedis_exec_fmt(vedis *pStore,const char *zFmt,...);
 VEDIS_APIEXPORT int vedis_exec_result(vedis *pStore,vedis_value **ppOut);
+VEDIS_APIEXPORT int vedis_exec_argv(vedis *pStore,const char *zName,int nNameLen,int nArg,
+	const char **azArg,const int *anArgLen,const int *aiType);
+VEDIS_APIEXPORT int vedis_exec_argv_batch(vedis *pStore,int nCmd,const char **azName,const int *anNameLen,
+	const int *anArg,const char **azArg,const int *anArgLen,const int *aiType,
+	int (*xConsumer)(vedis_value *,void *),void *pUserData,int *pnDone);
 
 /* Foreign Command Registar */
 VEDIS_APIEXPORT int vedis_register_command(vedis *pStore,const char *zName,int (*xCmd)(vedis_context *,int,vedis_value **),void *pUserdata);
@@ -755,14 +843,42 @@ VEDIS_APIEXPORT int vedis_kv_append_fmt(vedis *pStore,const void *pKey,int nKeyL
 VEDIS_APIEXPORT int vedis_kv_fetch(vedis *pStore,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 /* in|out */*pBufLen);
 VEDIS_APIEXPORT int vedis_kv_fetch_callback(vedis *pStore,const void *pKey,
 	                    int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_fetch_sized_callback(vedis *pStore,const void *pKey,int nKeyLen,
+	                    int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
 VEDIS_APIEXPORT int vedis_kv_config(vedis *pStore,int iOp,...);
 VEDIS_APIEXPORT int vedis_kv_delete(vedis *pStore,const void *pKey,int nKeyLen);
+VEDIS_APIEXPORT int vedis_kv_expire(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 iDeadline);
+VEDIS_APIEXPORT int vedis_kv_deadline(vedis *pStore,const void *pKey,int nKeyLen,vedis_int64 *pDeadline);
+VEDIS_APIEXPORT int vedis_kv_expire_step(vedis *pStore,int nMax,int *pExpired);
+
+/* Key/Value Store Cursors */
+VEDIS_APIEXPORT int vedis_kv_cursor_init(vedis *pStore,vedis_kv_cursor **ppOut);
+VEDIS_APIEXPORT int vedis_kv_cursor_release(vedis *pStore,vedis_kv_cursor *pCur);
+VEDIS_APIEXPORT int vedis_kv_cursor_seek(vedis_kv_cursor *pCursor,const void *pKey,int nKeyLen,int iPos);
+VEDIS_APIEXPORT int vedis_kv_cursor_first_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_last_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_valid_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_next_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_prev_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_key(vedis_kv_cursor *pCursor,void *pBuf,int *pnByte);
+VEDIS_APIEXPORT int vedis_kv_cursor_key_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_cursor_data(vedis_kv_cursor *pCursor,void *pBuf,vedis_int64 *pnData);
+VEDIS_APIEXPORT int vedis_kv_cursor_data_callback(vedis_kv_cursor *pCursor,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_kv_cursor_hidden(vedis_kv_cursor *pCursor,int *pHidden);
+VEDIS_APIEXPORT int vedis_kv_cursor_delete_entry(vedis_kv_cursor *pCursor);
+VEDIS_APIEXPORT int vedis_kv_cursor_reset(vedis_kv_cursor *pCursor);
 
 /* Manual Transaction Manager */
 VEDIS_APIEXPORT int vedis_begin(vedis *pStore);
 VEDIS_APIEXPORT int vedis_commit(vedis *pStore);
 VEDIS_APIEXPORT int vedis_rollback(vedis *pStore);
 
+/* Dump and Online Backup Interfaces */
+VEDIS_APIEXPORT int vedis_dump(vedis *pStore,int (*xRecord)(int,const void *,int,const void *,vedis_int64,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_backup_init(vedis *pStore,const char *zDest,vedis_backup **ppOut);
+VEDIS_APIEXPORT int vedis_backup_step(vedis_backup *pBackup,int nPage,vedis_int64 *pRemaining,vedis_int64 *pTotal);
+VEDIS_APIEXPORT int vedis_backup_finish(vedis_backup *pBackup);
+
 /* Utility interfaces */
 VEDIS_APIEXPORT int vedis_util_random_string(vedis *pStore,char *zBuf,unsigned int buf_size);
 VEDIS_APIEXPORT unsigned int vedis_util_random_num(vedis *pStore);
@@ -775,6 +891,8 @@ VEDIS_APIEXPORT int vedis_context_kv_append_fmt(vedis_context *pCtx,const void *
 VEDIS_APIEXPORT int vedis_context_kv_fetch(vedis_context *pCtx,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 /* in|out */*pBufLen);
 VEDIS_APIEXPORT int vedis_context_kv_fetch_callback(vedis_context *pCtx,const void *pKey,
 	                    int nKeyLen,int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
+VEDIS_APIEXPORT int vedis_context_kv_fetch_sized_callback(vedis_context *pCtx,const void *pKey,int nKeyLen,
+	                    int (*xSize)(vedis_int64,void *),int (*xConsumer)(const void *,unsigned int,void *),void *pUserData);
 VEDIS_APIEXPORT int vedis_context_kv_delete(vedis_context *pCtx,const void *pKey,int nKeyLen);
 
 /* Command Execution Context Interfaces */
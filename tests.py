@@ -1,16 +1,32 @@
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
 import base64
 import csv
+import io
+import json
 import os
+import random
 import re
+import shutil
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
 import sys
+import threading
+import time
 import unittest
 
 try:
+    from vedis import AsyncVedis
+    from vedis import LatencyHistogram
+    from vedis import ShardedVedis
     from vedis import Vedis
+    from vedis import bulk_load
+    from vedis import bulk_load_main
+    from vedis import rebalance_main
 except ImportError:
     sys.stderr.write('Unable to import `vedis`. Make sure it is properly '
                      'installed.\n')
@@ -86,6 +102,1010 @@ class TestKeyValueAPI(BaseVedisTestCase):
         self.assertEqual(self.db['k1'], b'1')
         self.assertEqual(self.db['k2'], b'1234567890')
 
+    def test_fetch_into(self):
+        self.db['k1'] = 'v1'
+        self.db['k2'] = ''
+        buf = bytearray(4)
+        self.assertEqual(self.db.fetch_into('k1', buf), 2)
+        self.assertEqual(buf, bytearray(b'v1\x00\x00'))
+
+        # Writing into a slice of a larger buffer.
+        view = memoryview(buf)
+        self.assertEqual(self.db.fetch_into('k1', view[2:]), 2)
+        self.assertEqual(buf, bytearray(b'v1v1'))
+
+        self.assertEqual(self.db.fetch_into('k2', buf), 0)
+        self.assertRaises(KeyError, self.db.fetch_into, 'k3', buf)
+        self.assertRaises(ValueError, self.db.fetch_into, 'k1', bytearray(1))
+        self.assertRaises(BufferError, self.db.fetch_into, 'k1', b'readonly')
+
+    def test_fetch_view(self):
+        self.db['k1'] = 'v1'
+        view = self.db.fetch_view('k1')
+        self.assertEqual(view.tobytes(), b'v1')
+        self.assertTrue(view.readonly)
+        self.assertRaises(KeyError, self.db.fetch_view, 'k2')
+
+        # Views of a cached value share its buffer.
+        db = Vedis(':mem:', read_cache_size=10)
+        self.addCleanup(db.close)
+        db['k1'] = 'v1' * 1000
+        view = db.fetch_view('k1')
+        self.assertTrue(isinstance(view.obj, bytes))
+        self.assertTrue(db.fetch_view('k1').obj is view.obj)
+        self.assertEqual(view[:4].tobytes(), b'v1v1')
+
+
+class TestBatchAPI(BaseVedisTestCase):
+    def test_store_fetch_many(self):
+        self.assertEqual(self.db.store_many({'k1': 'v1', 'k2': 'v2'}), 2)
+        self.assertEqual(self.db.store_many(
+            ('k%s' % i, 'v%s' % i) for i in range(3, 2500)), 2497)
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertEqual(self.db['k2499'], b'v2499')
+
+        keys = ['k%s' % i for i in range(2500)]
+        res = self.db.fetch_many(keys)
+        self.assertEqual(len(res), 2499)
+        self.assertEqual(res['k1'], b'v1')
+        self.assertEqual(res['k1234'], b'v1234')
+        self.assertFalse('k0' in res)
+
+        res = self.db.fetch_many(['k0', 'k1', 'k2'], missing='none')
+        self.assertEqual(res, {'k0': None, 'k1': b'v1', 'k2': b'v2'})
+        self.assertRaises(KeyError, self.db.fetch_many, ['k1', 'k0'],
+                          missing='raise')
+        self.assertRaises(ValueError, self.db.fetch_many, ['k1'],
+                          missing='x')
+        self.assertEqual(self.db.fetch_many([]), {})
+
+    def test_exists_delete_many(self):
+        self.db.store_many([('k1', 'v1'), ('k2', ''), ('k3', 'v3')])
+        self.assertEqual(self.db.exists_many(['k1', 'k2', 'k0', 'k3']),
+                         [True, True, False, True])
+
+        self.assertEqual(self.db.delete_many(['k1', 'k0', 'k2']), 2)
+        self.assertEqual(self.db.exists_many(['k1', 'k2', 'k3']),
+                         [False, False, True])
+        self.assertRaises(KeyError, self.db.delete_many, ['k3', 'k0'],
+                          missing='raise')
+        self.assertFalse('k3' in self.db)
+
+    def test_update(self):
+        self.db.update({'k1': 'v1', 'k2': 2})
+        self.assertEqual(self.db.fetch_many(['k1', 'k2']),
+                         {'k1': b'v1', 'k2': b'2'})
+
+
+class TestBatchTransactions(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db')
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def test_store_many_transaction(self):
+        def data():
+            for i in range(1500):
+                yield ('k%s' % i, 'v%s' % i)
+            yield 'invalid'
+
+        self.assertRaises(ValueError, self.db.store_many, data(),
+                          transaction=True)
+        self.assertFalse('k0' in self.db)
+
+        self.assertRaises(ValueError, self.db.store_many, data())
+        self.assertTrue('k0' in self.db)
+
+    def test_delete_many_transaction(self):
+        self.db.store_many({'k1': 'v1', 'k2': 'v2'}, transaction=True)
+        self.assertRaises(KeyError, self.db.delete_many, ['k1', 'k0'],
+                          missing='raise', transaction=True)
+        self.assertEqual(self.db.exists_many(['k1', 'k2']), [True, True])
+        self.assertEqual(self.db.delete_many(['k1', 'k2'],
+                                             transaction=True), 2)
+        self.assertEqual(self.db.exists_many(['k1', 'k2']), [False, False])
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db')
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            for filename in ('test.db', 'test.tsv'):
+                if os.path.exists(filename):
+                    os.unlink(filename)
+
+    def test_formats(self):
+        fh = StringIO('k1,v1\nk2,"v,2"\n')
+        stats = bulk_load(self.db, fh, 'csv', batch=1)
+        self.assertEqual((stats['records'], stats['batches']), (2, 2))
+        self.assertEqual(self.db['k2'], b'v,2')
+
+        fh = StringIO('{"key": "k3", "value": "v3"}\n\n["k4", {"a": 1}]\n')
+        self.assertEqual(bulk_load(self.db, fh, 'jsonl')['records'], 2)
+        self.assertEqual(self.db['k3'], b'v3')
+        self.assertEqual(json.loads(self.db['k4'].decode('utf-8')), {'a': 1})
+
+        with open('test.tsv', 'w') as fh:
+            fh.write('h\tf1\tv1\nh\tf2\tv\t2\n')
+        bulk_load(self.db, 'test.tsv', 'tsv', type='hash')
+        self.assertEqual(self.db.hgetall('h'), {b'f1': b'v1', b'f2': b'v\t2'})
+
+        self.assertRaises(ValueError, bulk_load, self.db, StringIO('k1\n'),
+                          'tsv')
+        self.assertRaises(ValueError, bulk_load, self.db, [], 'xml')
+        self.assertRaises(ValueError, bulk_load, self.db, [], type='zset')
+
+    def test_structures(self):
+        bulk_load(self.db, [('s', 'a'), ('s', 'b'), ('s', 'a')], type='set')
+        bulk_load(self.db, [('l', 'a'), ('m', 'x'), ('l', 'b')], type='list',
+                  batch=2)
+        self.assertEqual(self.db.smembers('s'), set([b'a', b'b']))
+        self.assertEqual(list(self.db.List('l')), [b'a', b'b'])
+        self.assertEqual(list(self.db.List('m')), [b'x'])
+
+    def test_resume(self):
+        def records():
+            for i in range(25):
+                yield ('k%d' % i, 'v%d' % i)
+            yield ('bad',)
+
+        committed = []
+        progress = lambda stats: committed.append(stats['records'])
+        self.assertRaises(ValueError, bulk_load, self.db, records(),
+                          batch=10, progress=progress)
+        self.assertEqual(committed, [10, 20])
+        self.assertTrue('k19' in self.db)
+        self.assertFalse('k20' in self.db)
+
+        stats = bulk_load(self.db, list(records())[:25], batch=10, skip=20)
+        self.assertEqual((stats['records'], stats['skipped']), (5, 20))
+        self.assertEqual(self.db['k24'], b'v24')
+
+    def test_filename(self):
+        self.db.close()
+        stats = bulk_load('test.db', [('k1', 'v1')], journal=False)
+        self.assertEqual(stats['records'], 1)
+        self.db.open()
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertRaises(ValueError, bulk_load, self.db, [], journal=False)
+
+    def test_cli(self):
+        self.db.close()
+        with open('test.tsv', 'w') as fh:
+            fh.write('k1\tv1\nk2\tv2\n')
+        self.assertEqual(bulk_load_main(['-q', 'test.db', 'test.tsv']), 0)
+        self.db.open()
+        self.assertEqual(self.db.fetch_many(['k1', 'k2']),
+                         {'k1': b'v1', 'k2': b'v2'})
+
+
+class TestDumpRestore(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db')
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            for filename in ('test.db', 'test-backup.db'):
+                if os.path.exists(filename):
+                    os.unlink(filename)
+
+    def populate(self, db):
+        db.store_many([('k1', 'v1'), (b'k\x002', b'v\x002')])
+        db.hmset('h', {'f1': 'v1', 'f\x002': 'v\x002'})
+        db.smadd('s', ['a', 'b', 'c'])
+        db.lmpush('l', ['x', 'y', 'z'])
+
+    def assertRestored(self, db):
+        self.assertEqual(db.fetch_many(['k1', b'k\x002']),
+                         {'k1': b'v1', b'k\x002': b'v\x002'})
+        self.assertEqual(db.hgetall('h'), {b'f1': b'v1', b'f\x002': b'v\x002'})
+        self.assertEqual(db.smembers('s'), set([b'a', b'b', b'c']))
+        self.assertEqual(list(db.List('l')), [b'x', b'y', b'z'])
+
+    def test_dump_restore(self):
+        self.populate(self.db)
+        self.db.commit()
+        # Uncommitted changes and tables loaded in memory are dumped too.
+        self.db.lpush('l2', 'i1')
+        fh = io.BytesIO()
+        self.assertEqual(self.db.dump(fh), {'keys': 2, 'tables': 4,
+                                            'entries': 9, 'expires': 0})
+
+        for filename in (':mem:', 'test-backup.db'):
+            db = Vedis(filename)
+            stats = db.restore(io.BytesIO(fh.getvalue()), batch=3)
+            self.assertEqual(stats['entries'], 9)
+            self.assertRestored(db)
+            self.assertEqual(list(db.List('l2')), [b'i1'])
+            db.close()
+
+        mem_db = Vedis(':mem:')
+        self.populate(mem_db)
+        fh = io.BytesIO()
+        mem_db.dump(fh)
+        mem_db.close()
+        self.db.close()
+        os.unlink('test.db')
+        self.db.open()
+        self.db.restore(io.BytesIO(fh.getvalue()))
+        self.assertRestored(self.db)
+
+    def test_dump_from_disk(self):
+        self.populate(self.db)
+        self.db.close()
+        # Tables that are not loaded are read from disk.
+        db = Vedis('test.db', lazy_tables=1)
+        fh = io.BytesIO()
+        self.assertEqual(db.dump(fh)['entries'], 8)
+        db.close()
+
+        db = Vedis(':mem:')
+        db.restore(io.BytesIO(fh.getvalue()))
+        self.assertRestored(db)
+        db.close()
+
+    def test_reserved_prefixes(self):
+        # User keys that look like the records of tables are not skipped.
+        self.db.close()
+        self.db = Vedis('test.db', lazy_tables=10)
+        self.populate(self.db)
+        data = {}
+        for key in ('vxa', 'vxuser:1', 'vx11:q', 'vx11:qf1', 'vt1q', 'vtq10',
+                    'vt2user', 'vtl3'):
+            for value in ('ab', 'abcd', 'abcdefghij'):
+                data['%s-%s' % (key, len(value))] = value.encode()
+            data[key] = b'abcd'
+        self.db.store_many(data)
+        self.db.commit()
+
+        fh = io.BytesIO()
+        self.assertEqual(self.db.dump(fh)['keys'], len(data) + 2)
+        db = Vedis(':mem:')
+        db.restore(io.BytesIO(fh.getvalue()))
+        self.assertEqual(db.fetch_many(list(data)), data)
+        self.assertRestored(db)
+        db.close()
+
+    def test_invalid_dump(self):
+        self.populate(self.db)
+        fh = io.BytesIO()
+        self.db.dump(fh)
+        data = fh.getvalue()
+
+        db = Vedis(':mem:')
+        self.assertRaises(ValueError, db.restore, io.BytesIO(b'k1\tv1\n'))
+        self.assertRaises(ValueError, db.restore, io.BytesIO(data[:-6]))
+        self.assertRaises(ValueError, db.restore, io.BytesIO(data[:-2]))
+        db.close()
+
+        class Broken(object):
+            def write(self, data):
+                raise IOError('disk full')
+        self.assertRaises(IOError, self.db.dump, Broken())
+
+    def test_backup(self):
+        self.populate(self.db)
+        self.db.store_many(('k%d' % i, 'v%d' % i) for i in range(5000))
+        self.db.commit()
+
+        def progress(copied, total):
+            # Writes to pages that were already copied are copied again.
+            if copied < total:
+                self.db['k%d' % (copied * 3)] = 'updated %d' % copied
+                self.db.commit()
+            steps.append((copied, total))
+
+        steps = []
+        stats = self.db.backup('test-backup.db', pages=4, progress=progress)
+        self.assertTrue(stats['steps'] > 1)
+        self.assertEqual(steps[-1], (stats['pages'], stats['pages']))
+        expected = dict(self.db.scan())
+
+        db = Vedis('test-backup.db')
+        self.assertEqual(dict(db.scan()), expected)
+        self.assertRestored(db)
+        db.close()
+
+        self.assertRaises(Exception, self.db.backup, 'test.db')
+        mem_db = Vedis(':mem:')
+        self.assertRaises(ValueError, mem_db.backup, 'test-backup.db')
+        mem_db.close()
+
+    def test_backup_uncommitted(self):
+        self.db.set_cache_size(16)
+        self.db.begin()
+        self.db.store_many(('k%d' % i, 'v' * 200) for i in range(5000))
+        # Pages of the transaction have been written to the database file.
+        self.assertRaises(IOError, self.db.backup, 'test-backup.db',
+                          timeout=0.05)
+        self.db.commit()
+        self.db.backup('test-backup.db')
+        db = Vedis('test-backup.db')
+        self.assertEqual(db['k4999'], b'v' * 200)
+        db.close()
+
+
+def count_shard_keys(db):
+    # Defined at module level, so that worker processes can run it.
+    return len(list(db.scan(prefix='k', keys_only=True)))
+
+
+class TestShardedVedis(unittest.TestCase):
+    directory = 'test-shards'
+
+    def setUp(self):
+        self.db = ShardedVedis(self.directory, shards=4)
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            shutil.rmtree(self.directory)
+
+    def populate(self, n=200):
+        self.db.store_many(('k%d' % i, 'v%d' % i) for i in range(n))
+        for i in range(10):
+            self.db.hmset('h%d' % i, {'f1': 'v1', 'f2': i})
+            self.db.smadd('s%d' % i, ['a', 'b'])
+            self.db.lmpush('l%d' % i, ['x', 'y', 'z'])
+            self.db.zadd('z%d' % i, {'m1': i + 1, 'm2': -i - 1})
+        self.db.store('volatile', 'v', ttl=100)
+        self.db.commit()
+
+    def assertPopulated(self, n=200):
+        self.assertEqual(self.db.mget(['k%d' % i for i in range(n)]),
+                         [b'v%d' % i for i in range(n)])
+        for i in range(10):
+            self.assertEqual(self.db.hgetall('h%d' % i),
+                             {b'f1': b'v1', b'f2': b'%d' % i})
+            self.assertEqual(self.db.smembers('s%d' % i), set([b'a', b'b']))
+            self.assertEqual(self.db.lrange('l%d' % i), [b'x', b'y', b'z'])
+            self.assertEqual(self.db.zrange('z%d' % i, withscores=True),
+                             [(b'm2', -i - 1), (b'm1', i + 1)])
+        self.assertTrue(95 < self.db.ttl('volatile') <= 100)
+
+    def assertOwned(self):
+        # Every key is stored by the shard it is mapped to, and only there.
+        for index, shard in enumerate(self.db.shards):
+            for key in shard.scan(prefix='k', keys_only=True):
+                self.assertEqual(self.db.shard_index(key), index)
+            for i in range(10):
+                self.assertEqual(shard.hlen('h%d' % i) > 0,
+                                 self.db.shard_index('h%d' % i) == index)
+
+    def test_routing(self):
+        self.populate()
+        self.assertPopulated()
+        self.assertOwned()
+        self.assertEqual(self.db.map_shards(count_shard_keys),
+                         [len(list(shard.scan(prefix='k', keys_only=True)))
+                          for shard in self.db.shards])
+        self.assertTrue(all(self.db.map_shards(count_shard_keys)))
+
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertEqual(self.db[['k2', 'missing', 'k1']],
+                         [b'v2', None, b'v1'])
+        self.assertEqual(self.db.exists_many(['k3', 'missing']),
+                         [True, False])
+        self.assertEqual(list(self.db.fetch_many(['k9', 'k1', 'k5'])),
+                         ['k9', 'k1', 'k5'])
+        # k1, k10 to k19 and k100 to k199.
+        self.assertEqual(len(list(self.db.scan(prefix='k1', keys_only=True))),
+                         111)
+        self.assertEqual(self.db.delete_many(['k1', 'k2', 'missing']), 2)
+        self.assertFalse('k1' in self.db)
+        self.assertEqual(self.db.incr('counter'), 1)
+        self.assertEqual(self.db.shard_for('counter')['counter'], b'1')
+
+        h = self.db.Hash('h1')
+        h['f3'] = 'v3'
+        self.assertEqual(self.db.shard_for('h1').hget('h1', 'f3'), b'v3')
+
+    def test_transactions(self):
+        self.db['k1'] = 'v1'
+        self.db.commit()
+        try:
+            with self.db.transaction():
+                self.db['k1'] = 'v1-x'
+                self.db.mset(dict(('k%d' % i, 'x') for i in range(2, 20)))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertEqual(self.db.exists_many(['k2', 'k3']), [False, False])
+
+        with self.db.shard_for('k1').transaction():
+            self.db['k1'] = 'v1-y'
+        self.assertEqual(self.db['k1'], b'v1-y')
+
+    def test_manifest(self):
+        self.populate()
+        self.db.close()
+        self.assertRaises(ValueError, ShardedVedis, self.directory, shards=5)
+        self.assertRaises(ValueError, ShardedVedis, 'test-missing-shards')
+        self.db = ShardedVedis(self.directory)
+        self.assertEqual(len(self.db.shards), 4)
+        self.assertPopulated()
+
+    def test_rebalance(self):
+        self.populate()
+        stats = self.db.rebalance(5)
+        self.assertEqual(stats['shards'], 5)
+        # Only the keys mapped to the new shard are moved.
+        self.assertTrue(0 < stats['moved'] < 100)
+        self.assertPopulated()
+        self.assertOwned()
+
+        self.db.rebalance(2)
+        self.assertPopulated()
+        self.assertOwned()
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['shard-0000.vdb', 'shard-0001.vdb', 'shards.json'])
+
+        self.db.close()
+        self.db = ShardedVedis(self.directory)
+        self.assertEqual(len(self.db.shards), 2)
+        self.assertPopulated()
+
+    def test_interrupted_rebalance(self):
+        self.populate()
+
+        def interrupt(db, manifest):
+            raise RuntimeError('interrupted')
+
+        finish = ShardedVedis._finish_rebalance
+        ShardedVedis._finish_rebalance = interrupt
+        try:
+            self.assertRaises(RuntimeError, self.db.rebalance, 3)
+        finally:
+            ShardedVedis._finish_rebalance = finish
+        self.db.close()
+
+        # The records that were copied are deleted from their former shard
+        # when the database is opened again.
+        self.db = ShardedVedis(self.directory)
+        self.assertEqual(len(self.db.shards), 3)
+        self.assertPopulated()
+        self.assertOwned()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, 'shard-0003.vdb')))
+
+    def test_interrupted_copy(self):
+        self.populate()
+        self.db.store_many(('vx%d' % i, 'abcd') for i in range(30))
+        moved = [key for key in ('k%d' % i for i in range(200))
+                 if self.db.shard_index(key) == 2]
+
+        def interrupt(done, total):
+            if done == 3:
+                raise RuntimeError('interrupted')
+
+        self.assertRaises(RuntimeError, self.db.rebalance, 2, interrupt)
+        self.assertEqual(len(self.db.shards), 4)
+        # A key removed before the rebalance is resumed stays removed.
+        del self.db[moved[0]]
+        self.db.commit()
+        self.db.close()
+
+        # The copies are deleted when the database is opened again.
+        self.db = ShardedVedis(self.directory)
+        self.assertOwned()
+        self.db.rebalance(2)
+        self.assertFalse(moved[0] in self.db)
+        self.db[moved[0]] = 'v%s' % moved[0][1:]
+        self.assertPopulated()
+        self.assertOwned()
+        self.assertEqual(self.db.mget(['vx%d' % i for i in range(30)]),
+                         [b'abcd'] * 30)
+
+    def test_process_pool(self):
+        self.db.close()
+        self.db = ShardedVedis(self.directory, processes=2)
+        self.db['k0'] = 'v0'
+        stats = bulk_load(self.db, [('k%d' % i, 'v%d' % i)
+                                    for i in range(1, 1000)], batch=100)
+        self.assertEqual(stats['records'], 999)
+        self.assertEqual(sum(self.db.map_shards(count_shard_keys)), 1000)
+        self.assertEqual(self.db['k999'], b'v999')
+
+        self.db.rebalance(3)
+        self.assertEqual(sum(self.db.map_shards(count_shard_keys)), 1000)
+        self.assertEqual(self.db['k500'], b'v500')
+
+    def test_rebalance_main(self):
+        self.populate()
+        self.db.close()
+        self.assertEqual(rebalance_main([self.directory, '6', '-q']), 0)
+        self.db = ShardedVedis(self.directory)
+        self.assertEqual(len(self.db.shards), 6)
+        self.assertPopulated()
+
+
+class TestOpenFlags(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test.db'):
+            os.unlink('test.db')
+
+    def create(self, **kwargs):
+        db = Vedis('test.db', **kwargs)
+        db.store_many(('k%s' % i, 'v%s' % i) for i in range(100))
+        db.hset('h', 'k1', 'v1')
+        db.commit()
+        db.close()
+
+    def test_readonly(self):
+        self.create()
+        for mmap in (False, True):
+            db = Vedis('test.db', readonly=True, mmap=mmap)
+            try:
+                self.assertTrue(db.readonly)
+                self.assertEqual(db['k99'], b'v99')
+                self.assertEqual(db.hget('h', 'k1'), b'v1')
+                self.assertRaises(IOError, db.store, 'k0', 'x')
+                self.assertFalse(db.hset('h', 'k2', 'v2'))
+                self.assertEqual(db.hdel('h', 'k1'), 0)
+                self.assertEqual(db.hgetall('h'), {b'k1': b'v1'})
+            finally:
+                db.close()
+
+        db = Vedis('test.db')
+        self.assertFalse(db.readonly)
+        self.assertEqual(db['k0'], b'v0')
+        self.assertEqual(db.hgetall('h'), {b'k1': b'v1'})
+        db.close()
+
+    def test_no_journal(self):
+        self.create(journal=False)
+        db = Vedis('test.db', journal=False, nomutex=True)
+        db['k0'] = 'x'
+        db.commit()
+        db.close()
+        db = Vedis('test.db', readonly=True)
+        self.assertEqual(db['k0'], b'x')
+        db.close()
+
+    def test_invalid_flags(self):
+        self.assertRaises(ValueError, Vedis, 'test.db', mmap=True)
+        self.assertRaises(ValueError, Vedis, ':mem:', readonly=True)
+        self.assertFalse(os.path.exists('test.db'))
+
+
+class TestPageCache(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test.db'):
+            os.unlink('test.db')
+
+    def create(self, **kwargs):
+        db = Vedis('test.db', **kwargs)
+        db.store_many(('k%s' % i, 'x' * 1024) for i in range(500))
+        db.commit()
+        return db
+
+    def test_cache_size(self):
+        db = self.create(cache_pages=8)
+        try:
+            stats = db.pager_stats()
+            self.assertEqual(stats['cache_pages'], 8)
+            self.assertTrue(stats['cached_pages'] <= 8)
+            self.assertTrue(stats['evictions'] > 0)
+            self.assertTrue(stats['database_pages'] > 8)
+
+            db.set_cache_size(0)
+            self.assertEqual(db.pager_stats()['cached_pages'], 0)
+            self.assertRaises(ValueError, db.set_cache_size, -1)
+
+            db.set_cache_size(10000)
+            db.pager_stats(reset=True)
+            for i in range(500):
+                self.assertEqual(db['k%s' % i], b'x' * 1024)
+            cold = db.pager_stats()
+            for i in range(500):
+                db['k%s' % i]
+            warm = db.pager_stats(reset=True)
+            self.assertEqual(warm['misses'], cold['misses'])
+            self.assertTrue(warm['hits'] > cold['hits'])
+            self.assertEqual(db.pager_stats()['hits'], 0)
+        finally:
+            db.close()
+
+    def test_page_size(self):
+        self.create(page_size=8192).close()
+        db = Vedis('test.db', page_size=1024)
+        try:
+            # The page size of an existing database cannot be changed.
+            self.assertEqual(db['k499'], b'x' * 1024)
+            self.assertEqual(db.pager_stats()['page_size'], 8192)
+        finally:
+            db.close()
+        self.assertRaises(ValueError, Vedis, 'test.db', page_size=1000)
+        self.assertRaises(ValueError, Vedis, ':mem:', page_size=4096)
+
+    def test_advise_cache_size(self):
+        db = self.create()
+        try:
+            self.assertRaises(RuntimeError, db.advise_cache_size)
+            db.track_working_set()
+            for i in range(50):
+                db['k%s' % i]
+            advice = db.advise_cache_size(headroom=0.5)
+            working_set = db.pager_stats()['working_set']
+            self.assertTrue(working_set > 0)
+            self.assertEqual(advice['working_set'], working_set)
+            self.assertTrue(advice['cache_pages'] >= working_set)
+            self.assertEqual(advice['cache_bytes'],
+                             advice['cache_pages'] * 4096)
+
+            db.track_working_set(False)
+            self.assertEqual(db.pager_stats()['working_set'], 0)
+        finally:
+            db.close()
+
+
+class TestSyncModes(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test.db'):
+            os.unlink('test.db')
+
+    def update(self, db, value):
+        # Change every other key of a populated database and commit.
+        db.io_stats(reset=True)
+        for i in range(0, 500, 2):
+            db['k%s' % i] = value
+        db.commit()
+        return db.io_stats()
+
+    def open(self, **kwargs):
+        db = Vedis('test.db', **kwargs)
+        self.addCleanup(db.close)
+        db.store_many(('k%s' % i, 'x' * 256) for i in range(500))
+        db.commit()
+        return db
+
+    def test_io_stats(self):
+        db = self.open()
+        self.assertEqual(db['k1'], b'x' * 256)
+        stats = self.update(db, 'y' * 256)
+        self.assertTrue(stats['writes'] > 0)
+        self.assertTrue(stats['syncs'] > 0)
+        self.assertTrue(stats['bytes_written'] >= 250 * 256)
+        self.assertEqual(db.io_stats(reset=True), stats)
+        self.assertEqual(db.io_stats(), {
+            'reads': 0, 'writes': 0, 'syncs': 0, 'bytes_read': 0,
+            'bytes_written': 0})
+
+    def test_sync_mode(self):
+        db = self.open(sync_mode='off')
+        self.assertEqual(self.update(db, 'y')['syncs'], 0)
+        db.set_sync_mode('full')
+        full = self.update(db, 'z')
+        db.set_sync_mode('data')
+        self.assertEqual(self.update(db, 'y')['syncs'], full['syncs'])
+        self.assertTrue(full['syncs'] > 0)
+        self.assertRaises(ValueError, db.set_sync_mode, 'normal')
+
+        self.assertRaises(ValueError, Vedis, 'test.db', sync_mode='none')
+        self.assertRaises(ValueError, Vedis, ':mem:', sync_mode='off')
+        self.assertRaises(ValueError, Vedis, ':mem:', journal_buffer=4096)
+
+    def test_journal_buffer(self):
+        db = self.open()
+        unbuffered = self.update(db, 'y' * 256)
+        db.set_journal_buffer(1 << 16)
+        buffered = self.update(db, 'z' * 256)
+        self.assertTrue(buffered['writes'] < unbuffered['writes'] / 2)
+        self.assertEqual(buffered['bytes_written'],
+                         unbuffered['bytes_written'])
+        self.assertRaises(ValueError, db.set_journal_buffer, -1)
+
+        # Rolling back with a buffered journal restores the old values.
+        db.begin()
+        for i in range(500):
+            db['k%s' % i] = 'w'
+        db.rollback()
+        self.assertEqual(db['k0'], b'z' * 256)
+        self.assertEqual(db['k1'], b'x' * 256)
+        db.close()
+
+        db = Vedis('test.db', journal_buffer=0)
+        self.assertEqual(db['k498'], b'z' * 256)
+        db.close()
+
+
+class TestDirtyTables(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db')
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def test_commit_dirty_tables(self):
+        for i in range(10):
+            self.db.hset('h%s' % i, 'k', 'v%s' % i)
+        self.db.sadd('s', 'm1')
+        self.assertEqual(self.db.table_stats()['dirty_tables'], 11)
+        self.db.commit()
+        self.assertEqual(self.db.table_stats(), {
+            'tables': 11, 'dirty_tables': 0, 'last_commit': 11,
+            'serialized': 11})
+
+        # Overwriting a value does not change the table header.
+        self.db.hset('h0', 'k', 'x')
+        self.db.hset('h1', 'k2', 'v')
+        self.db.srem('s', 'm1')
+        self.assertEqual(self.db.table_stats()['dirty_tables'], 2)
+        self.db.commit()
+        stats = self.db.table_stats()
+        self.assertEqual(stats['last_commit'], 2)
+        self.assertEqual(stats['serialized'], 13)
+
+        self.db.close()
+        self.db.open()
+        self.assertEqual(self.db.hgetall('h0'), {b'k': b'x'})
+        self.assertEqual(self.db.hgetall('h1'), {b'k': b'v1', b'k2': b'v'})
+        self.assertEqual(self.db.hgetall('h9'), {b'k': b'v9'})
+        self.assertEqual(self.db.smembers('s'), set())
+
+    def test_rollback(self):
+        self.db.hset('h1', 'k', 'v')
+        self.db.hset('h2', 'k', 'v')
+        self.db.commit()
+        self.db.begin()
+        self.db.hset('h1', 'k2', 'v2')
+        self.db.rollback()
+        # Every table is written again by the next commit.
+        self.assertEqual(self.db.table_stats()['dirty_tables'], 2)
+
+
+class TestLazyTables(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db', lazy_tables=10)
+        for i in range(100):
+            self.db.hset('h', 'k%02d' % i, 'v%02d' % i)
+        for i in range(50):
+            self.db.sadd('s', 'm%02d' % i)
+        self.db.commit()
+        self.db.close()
+        self.db = Vedis('test.db', lazy_tables=10)
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def test_lazy_tables(self):
+        for i in range(0, 100, 5):
+            self.assertEqual(self.db.hget('h', 'k%02d' % i), b'v%02d' % i)
+        self.assertTrue(self.db.hget('h', 'kx') is None)
+        self.assertEqual(self.db.hlen('h'), 100)
+        self.assertTrue(self.db.sismember('s', 'm42'))
+        self.assertFalse(self.db.sismember('s', 'mx'))
+        self.assertEqual(self.db.scard('s'), 50)
+
+        stats = self.db.lazy_table_stats()
+        self.assertEqual(stats['partial_tables'], 2)
+        self.assertTrue(stats['resident_entries'] <= 20)
+        self.assertEqual(stats['loads'], 21)
+        self.assertEqual(stats['evictions'], 10)
+
+        self.db.hset('h', 'k00', 'x')
+        self.db.hset('h', 'knew', 'new')
+        self.db.hdel('h', 'k01')
+        self.db.srem('s', 'm00')
+        self.assertEqual(self.db.hlen('h'), 100)
+        self.assertEqual(self.db.scard('s'), 49)
+        self.db.commit()
+        self.db.close()
+
+        self.db.open()
+        self.assertEqual(self.db.hget('h', 'k00'), b'x')
+        self.assertEqual(self.db.hget('h', 'knew'), b'new')
+        self.assertTrue(self.db.hget('h', 'k01') is None)
+        self.assertEqual(self.db.hlen('h'), 100)
+
+        # Iterating loads every entry.
+        expected = dict((b'k%02d' % i, b'v%02d' % i) for i in range(2, 100))
+        expected.update({b'k00': b'x', b'knew': b'new'})
+        self.assertEqual(self.db.hgetall('h'), expected)
+        self.assertEqual(self.db.smembers('s'),
+                         set(b'm%02d' % i for i in range(1, 50)))
+        self.assertEqual(self.db.lazy_table_stats()['partial_tables'], 0)
+
+    def test_lazy_tables_disabled(self):
+        self.db.close()
+        self.db = Vedis('test.db')
+        self.assertEqual(self.db.hget('h', 'k50'), b'v50')
+        self.assertEqual(self.db.lazy_table_stats()['partial_tables'], 0)
+        self.assertRaises(ValueError, self.db.set_lazy_tables, -1)
+
+        # Changes made while loading eagerly are still indexed.
+        self.db.hset('h', 'knew', 'new')
+        self.db.hdel('h', 'k50')
+        self.db.close()
+        self.db = Vedis('test.db', lazy_tables=10)
+        self.assertEqual(self.db.hget('h', 'knew'), b'new')
+        self.assertTrue(self.db.hget('h', 'k50') is None)
+        self.assertEqual(self.db.lazy_table_stats()['partial_tables'], 1)
+
+    def test_index_existing_tables(self):
+        self.db.close()
+
+        # Tables written without an index are loaded in full and indexed.
+        self.db = Vedis('test.db')
+        for i in range(20):
+            self.db.hset('h3', 'k%02d' % i, 'v%02d' % i)
+        self.db.close()
+        self.db = Vedis('test.db', lazy_tables=10)
+        self.assertEqual(self.db.hget('h3', 'k05'), b'v05')
+        self.assertEqual(self.db.lazy_table_stats()['partial_tables'], 0)
+        self.db.close()
+
+        self.db.open()
+        self.assertEqual(self.db.hget('h3', 'k05'), b'v05')
+        self.assertEqual(self.db.hlen('h3'), 20)
+        self.assertEqual(self.db.lazy_table_stats()['partial_tables'], 1)
+
+
+class TestReadCache(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db', read_cache_size=3)
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def assertCache(self, **expected):
+        stats = self.db.read_cache_stats()
+        self.assertEqual(dict((k, stats[k]) for k in expected), expected)
+
+    def test_fetch(self):
+        self.db['k1'] = 'v1'
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertCache(hits=1, misses=1, entries=1, bytes=2)
+        self.assertRaises(KeyError, self.db.fetch, 'missing')
+
+        # Every kind of write is seen by the next read.
+        writes = [
+            (lambda: self.db.store('k1', 'v2'), b'v2'),
+            (lambda: self.db.append('k1', 'x'), b'v2x'),
+            (lambda: self.db.set('k1', 'v3'), b'v3'),
+            (lambda: self.db.mset({'k1': 'v4', 'k2': 'v'}), b'v4'),
+            (lambda: self.db.get_set('k1', '1'), b'1'),
+            (lambda: self.db.incr('k1'), b'2'),
+            (lambda: self.db.incr_by('k1', 10), b'12'),
+            (lambda: self.db.execute('SET k1 v5'), b'v5'),
+            (lambda: self.db.store_many([('k1', 'v6')]), b'v6'),
+            (lambda: self.db.pipeline().set('k1', 'v7').execute(), b'v7'),
+        ]
+        for write, value in writes:
+            self.db.fetch('k1')
+            write()
+            self.assertEqual(self.db.fetch('k1'), value)
+
+        for delete in (lambda: self.db.delete('k1'),
+                       lambda: self.db.delete_many(['k1']),
+                       lambda: self.db.call('DEL', 'k1')):
+            self.db['k1'] = 'v'
+            self.db.fetch('k1')
+            delete()
+            self.assertRaises(KeyError, self.db.fetch, 'k1')
+
+    def test_hget(self):
+        self.db.hset('h', 'f1', 'v1')
+        self.assertEqual(self.db.hget('h', 'f1'), b'v1')
+        self.assertEqual(self.db.Hash('h')['f1'], b'v1')
+        self.assertTrue(self.db.hget('h', 'missing') is None)
+        self.assertCache(hits=1, misses=2, entries=1)
+
+        self.db.hset('h', 'f1', 'v2')
+        self.assertEqual(self.db.hget('h', 'f1'), b'v2')
+        self.db.hmset('h', {'f1': 'v3'})
+        self.assertEqual(self.db.hget('h', 'f1'), b'v3')
+        self.db.hdel('h', 'f1')
+        self.assertTrue(self.db.hget('h', 'f1') is None)
+
+        # A hash field and a key of the same name are cached separately.
+        self.db.hset('k', 'k', 'hv')
+        self.db['k'] = 'kv'
+        self.assertEqual(self.db.hget('k', 'k'), b'hv')
+        self.assertEqual(self.db['k'], b'kv')
+
+    def test_eviction(self):
+        for i in range(5):
+            self.db['k%s' % i] = 'v%s' % i
+            self.db.fetch('k%s' % i)
+        self.db.fetch('k2')
+        self.db.fetch('k0')
+        self.assertCache(entries=3, evictions=3, bytes=6)
+
+        self.db.close()
+        self.db = Vedis('test.db', read_cache_size=10, read_cache_bytes=8)
+        # Values larger than the cache are not cached.
+        self.db['big'] = 'x' * 9
+        self.db.fetch('big')
+        self.assertCache(entries=0)
+        for i in range(6):
+            self.db.fetch('k%s' % (i % 5))
+        self.assertCache(entries=4, bytes=8, evictions=2)
+
+    def test_rollback(self):
+        self.db['k1'] = 'v1'
+        self.db.commit()
+        self.db.begin()
+        self.db['k1'] = 'v2'
+        self.assertEqual(self.db['k1'], b'v2')
+        self.db.rollback()
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertCache(entries=1)
+
+    def test_custom_command(self):
+        @self.db.register('XSET')
+        def xset(context, key, value):
+            context[key] = value
+            return True
+
+        self.db['k1'] = 'v1'
+        self.db.fetch('k1')
+        self.db.execute('XSET k1 v2')
+        self.assertEqual(self.db['k1'], b'v2')
+        self.db.call('XSET', 'k1', 'v3')
+        self.assertEqual(self.db['k1'], b'v3')
+
+    def test_stats(self):
+        self.assertTrue(Vedis(':mem:').read_cache_stats() is None)
+        self.db['k1'] = 'v1'
+        self.db.fetch('k1')
+        self.db.fetch('k1')
+        self.assertEqual(self.db.read_cache_stats(True)['hits'], 1)
+        self.assertCache(hits=0, misses=0, entries=1)
+        self.db.clear_read_cache()
+        self.assertCache(entries=0, bytes=0)
+        self.assertRaises(ValueError, Vedis, ':mem:', read_cache_size=0)
+
+
+class TestLargeValues(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis('test.db')
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def test_large_values(self):
+        # Values spanning several overflow pages are read in multiple chunks.
+        value = os.urandom(256 * 1024)
+        self.db['large'] = value
+        self.db.commit()
+        self.assertEqual(self.db['large'], value)
+
+        buf = bytearray(len(value) + 10)
+        self.assertEqual(self.db.fetch_into('large', buf), len(value))
+        self.assertEqual(bytes(buf[:len(value)]), value)
+        self.assertEqual(self.db.fetch_view('large')[-100:], value[-100:])
+
 
 class TestBasicCommands(BaseVedisTestCase):
     def test_get_set(self):
@@ -170,6 +1190,20 @@ class TestBasicCommands(BaseVedisTestCase):
         res = self.db.decr_by('c', 90)
         self.assertEqual(res, 20)
 
+    def test_64bit_counters(self):
+        self.db['k'] = '5000000000'
+        self.assertEqual(self.db.incr('k'), 5000000001)
+        self.assertEqual(self.db.decr('k'), 5000000000)
+        self.assertEqual(self.db.incr_by('k', 2 ** 33), 5000000000 + 2 ** 33)
+        self.assertEqual(self.db.decr_by('k', 2 ** 33), 5000000000)
+        self.assertEqual(self.db.incr_by('n', -2 ** 40), -2 ** 40)
+        self.assertEqual(self.db.strlen('k'), 10)
+
+        p = self.db.pipeline()
+        p.incr_by('k', 2 ** 32).decr('k')
+        self.assertEqual(p.execute(), [5000000000 + 2 ** 32,
+                                       4999999999 + 2 ** 32])
+
     def test_quoted_values(self):
         self.db['k"1"'] = 'value "with quotes"'
         res = self.db['k"1"']
@@ -184,6 +1218,342 @@ class TestBasicCommands(BaseVedisTestCase):
         self.assertFalse(self.db.exists('2'))
 
 
+class TestCall(BaseVedisTestCase):
+    def test_call(self):
+        self.assertTrue(self.db.call('SET', 'k1', 'v1'))
+        self.assertEqual(self.db.call('GET', 'k1'), b'v1')
+        self.assertEqual(self.db.call('INCRBY', 'c', 5), 5)
+        self.assertEqual(self.db.call('MGET', 'k1', 'c', 'missing'),
+                         [b'v1', b'5', None])
+        self.assertRaises(Exception, self.db.call, 'MISSING_COMMAND')
+
+    def test_binary_safe(self):
+        values = [
+            b'"quoted"',
+            b'back\\slash \\"',
+            b'  spaces  ',
+            b'nul\x00byte',
+            b'',
+            b'\xff\xfe',
+        ]
+        for i, value in enumerate(values):
+            key = b'k "%d" \\' % i
+            self.db.call('SET', key, value)
+            self.assertEqual(self.db.call('GET', key), value)
+            self.assertEqual(self.db.fetch(key), value)
+
+            self.db.hset('h', key, value)
+            self.assertEqual(self.db.hget('h', key), value)
+            self.db.lpush('l', value)
+            self.db.sadd('s', value)
+
+        self.assertEqual(len(self.db.hkeys('h')), len(values))
+        self.assertEqual([self.db.lindex('l', i) for i in range(6)], values)
+        # Sets ignore empty members.
+        self.assertEqual(self.db.smembers('s'), set(values) - set([b'']))
+
+    def test_binary_keys(self):
+        keys = [b'nul\x00key', b'nul\x00other', b'nul']
+        for i, key in enumerate(keys):
+            self.db.store(key, 'v%d' % i)
+        self.assertEqual([self.db.fetch(key) for key in keys],
+                         [b'v0', b'v1', b'v2'])
+        self.assertEqual(self.db.fetch_many(keys),
+                         {keys[0]: b'v0', keys[1]: b'v1', keys[2]: b'v2'})
+        self.db.delete(keys[0])
+        self.assertFalse(self.db.exists(keys[0]))
+        self.assertTrue(self.db.exists(keys[1]))
+
+    def test_int64(self):
+        self.assertEqual(self.db.call('INCRBY', 'c', 2 ** 40), 2 ** 40)
+        self.assertEqual(self.db.call('DECRBY', 'c', 2 ** 41), -(2 ** 40))
+
+    def test_command_args_not_unescaped(self):
+        @self.db.register('ECHO_ARGS')
+        def echo_args(context, *params):
+            return list(params)
+
+        value = b'a \\"quoted\\" value'
+        self.assertEqual(self.db.call('ECHO_ARGS', value), [value])
+        self.assertEqual(self.db.execute('ECHO_ARGS "x\\"y"'), [b'x"y'])
+
+
+    def test_migrate_quotes(self):
+        # Releases up to 0.7.2 stored the collections through execute(),
+        # which escapes the quotes in the arguments.
+        db = Vedis('test.db')
+        self.addCleanup(os.unlink, 'test.db')
+        db.execute('HSET h %s %s', ('f"1', 'x"y'))
+        db.execute('HSET h f2 v2')
+        db.execute('SADD s %s %s', ('a"b', 'c'))
+        db.execute('LPUSH l %s %s %s', ('i0', 'i"1', 'i2'))
+        db.execute('HSET %s k v', ('q"h',))
+        db.close()
+
+        db = Vedis('test.db')
+        self.addCleanup(db.close)
+        self.assertEqual(db.hget('h', 'f\\"1'), b'x\\"y')
+        self.assertEqual(db.migrate_quotes(), 4)
+        self.assertEqual(db.hgetall('h'), {b'f"1': b'x"y', b'f2': b'v2'})
+        self.assertEqual(db.smembers('s'), set((b'a"b', b'c')))
+        self.assertEqual(db.lrange('l'), [b'i0', b'i"1', b'i2'])
+        self.assertEqual(db.hget('q"h', 'k'), b'v')
+        self.assertEqual(db.hlen('q\\"h'), 0)
+
+        # The migration is committed, and migrated values are left alone.
+        db.close()
+        db.open()
+        self.assertEqual(db.migrate_quotes(), 0)
+        self.assertEqual(db.hget('h', 'f"1'), b'x"y')
+        self.assertEqual(db.lrange('l'), [b'i0', b'i"1', b'i2'])
+
+        db = Vedis(':memory:')
+        self.assertEqual(db.migrate_quotes(), 0)
+        db.close()
+
+
+class TestDecode(unittest.TestCase):
+    def setUp(self):
+        self.db = Vedis(decode='utf-8')
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_decode(self):
+        self.db['k1'] = u'caf\xe9'
+        self.db.hmset('h', {'a': u'\u2603', 'b': 'bee'})
+        self.db.smadd('s', ['x', 'y'])
+        self.db.lpush('l', 'item')
+
+        self.assertEqual(self.db['k1'], u'caf\xe9')
+        self.assertEqual(self.db.fetch_many(['k1', 'missing']),
+                         {'k1': u'caf\xe9'})
+        self.assertEqual(self.db.hget('h', 'a'), u'\u2603')
+        self.assertEqual(sorted(self.db.hvals('h')), ['bee', u'\u2603'])
+        self.assertEqual(self.db.smembers('s'), set(['x', 'y']))
+        self.assertEqual(self.db.execute('GET k1'), u'caf\xe9')
+        self.assertEqual(self.db.pipeline().get('k1').lpop('l').execute(),
+                         [u'caf\xe9', 'item'])
+        # Numbers and missing values are not strings.
+        self.assertEqual(self.db.incr('c'), 1)
+        self.assertTrue(self.db.hget('h', 'missing') is None)
+
+    def test_fetch_view_and_scan(self):
+        self.db['k1'] = u'caf\xe9'
+        self.db['k2'] = 'v2'
+        # Views are built from the raw bytes.
+        self.assertEqual(self.db.fetch_view('k1').tobytes(), b'caf\xc3\xa9')
+
+        expected = [('k1', u'caf\xe9'), ('k2', 'v2')]
+        self.assertEqual(list(self.db.scan()), expected)
+        self.assertEqual(list(self.db.scan(keys_only=True)), ['k1', 'k2'])
+        with self.db.cursor() as cursor:
+            self.assertEqual(cursor.key(), 'k1')
+            self.assertEqual(list(cursor), expected)
+            cursor.seek('k1')
+            self.assertEqual(list(cursor.fetch_until('k2')), expected)
+
+    def test_decode_read_cache(self):
+        db = Vedis(decode='utf-8', read_cache_size=10)
+        try:
+            db['k1'] = u'caf\xe9'
+            db.hset('h', 'a', 'b')
+            for i in range(2):
+                self.assertEqual(db['k1'], u'caf\xe9')
+                self.assertEqual(db.hget('h', 'a'), 'b')
+            self.assertEqual(db.read_cache_stats()['hits'], 2)
+        finally:
+            db.close()
+
+    def test_codec(self):
+        db = Vedis(decode=lambda value: value[::-1])
+        try:
+            db['k1'] = 'abc'
+            self.assertEqual(db['k1'], b'cba')
+            self.assertEqual(db.call('GET', 'k1'), b'cba')
+        finally:
+            db.close()
+        self.assertRaises(LookupError, Vedis, decode='missing-codec')
+
+
+class TestPipeline(BaseVedisTestCase):
+    def test_pipeline(self):
+        p = self.db.pipeline()
+        p.set('k1', 'v1').incr('c').incr_by('c', 10)
+        p.hset('h', 'a', '1').hmset('h', {'b': '2'}).hgetall('h')
+        p.smadd('s', ['x', 'y']).smembers('s').sismember('s', 'z')
+        p.lmpush('l', ['l1', 'l2']).lindex('l', 1)
+        p.get('k1').get('missing').call('MGET', 'k1', 'missing')
+        self.assertEqual(len(p), 14)
+
+        self.assertEqual(p.execute(), [
+            True, 1, 11,
+            True, 1, {b'a': b'1', b'b': b'2'},
+            2, set([b'x', b'y']), False,
+            2, b'l2',
+            b'v1', None, [b'v1', None]])
+        self.assertEqual(len(p), 0)
+        self.assertEqual(p.execute(), [])
+
+    def test_context_manager(self):
+        with self.db.pipeline() as p:
+            p.set('k1', 'v1').set('k2', 'v2')
+        self.assertEqual(self.db['k2'], b'v2')
+
+        def fail():
+            with self.db.pipeline() as p:
+                p.set('k3', 'v3')
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertFalse('k3' in self.db)
+
+    def test_error(self):
+        p = self.db.pipeline()
+        p.set('k1', 'v1').call('MISSING_COMMAND').set('k2', 'v2')
+        try:
+            p.execute()
+        except Exception as exc:
+            self.assertEqual(exc.command_index, 1)
+        else:
+            raise AssertionError('Exception not raised.')
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertFalse('k2' in self.db)
+
+
+class TestInstrumentation(BaseVedisTestCase):
+    def test_disabled(self):
+        self.assertFalse(self.db.instrument)
+        self.assertTrue(self.db.stats() is None)
+        self.db['k1'] = 'v1'
+        self.db.instrument = True
+        stats = self.db.stats()
+        self.assertEqual(stats['kv'], {})
+        self.assertEqual(stats['bytes_written'], 0)
+
+    def test_stats(self):
+        self.db.instrument = True
+
+        @self.db.register('NOOP')
+        def noop(context, *args):
+            return len(args)
+
+        self.db['k1'] = 'v1'
+        self.db.append('k1', 'xx')
+        self.assertEqual(self.db['k1'], b'v1xx')
+        self.assertRaises(KeyError, self.db.fetch, 'missing')
+        self.db.fetch_many(['k1', 'missing'])
+        self.db.hset('h', 'a', '1')
+        self.db.hset('h', 'b', '2')
+        self.db.execute('SET %s %s', ('k2', 'v2'))
+        self.assertEqual(self.db.execute('NOOP a b'), 2)
+        self.assertRaises(Exception, self.db.call, 'MISSING_COMMAND')
+
+        stats = self.db.stats()
+        self.assertEqual(stats['bytes_written'], 4)
+        self.assertEqual(stats['bytes_read'], 8)
+        self.assertEqual(stats['kv']['store']['count'], 1)
+        self.assertEqual(stats['kv']['fetch']['count'], 2)
+        self.assertEqual(stats['kv']['fetch']['errors'], 0)
+        self.assertEqual(stats['kv']['fetch_many']['count'], 1)
+        self.assertEqual(stats['commands']['HSET']['count'], 2)
+        self.assertEqual(stats['commands']['SET']['count'], 1)
+        self.assertEqual(stats['commands']['NOOP']['count'], 1)
+        self.assertEqual(stats['commands']['MISSING_COMMAND']['errors'], 1)
+        self.assertEqual(stats['callbacks']['NOOP']['count'], 1)
+        self.assertEqual(stats['execute_formatting']['count'], 1)
+
+        hset = stats['commands']['HSET']
+        self.assertTrue(0 < hset['min'] <= hset['p50'] <= hset['max'])
+        self.assertEqual(hset['buckets'][-1][1], 2)
+        json.dumps(stats)
+
+        self.db.stats(reset=True)
+        self.assertEqual(self.db.stats()['commands'], {})
+        self.db.instrument = False
+        self.assertTrue(self.db.stats() is None)
+
+    def test_trace_hook(self):
+        events = []
+        self.db.set_trace_hook(lambda *args: events.append(args))
+        self.db['k1'] = 'v1'
+        self.db.lpush('l', 'i1')
+        with self.db.pipeline() as p:
+            p.set('k2', 'v2')
+        self.db.set_trace_hook(None)
+        self.db['k3'] = 'v3'
+
+        self.assertEqual([event[:2] for event in events], [
+            ('kv', 'store'),
+            ('command', 'LPUSH'),
+            ('command', 'PIPELINE')])
+        self.assertTrue(all(event[2] >= 0 for event in events))
+        self.assertTrue(self.db.stats() is None)
+        self.assertRaises(TypeError, self.db.set_trace_hook, 'not callable')
+
+    @unittest.skipIf(not hasattr(sys, 'unraisablehook'),
+                     'sys.unraisablehook is not available')
+    def test_trace_hook_errors(self):
+        @self.db.register('DOUBLE')
+        def double(context, value):
+            return value * 2
+
+        def hook(kind, name, duration):
+            raise ValueError(name)
+
+        reported = []
+        original = sys.unraisablehook
+        sys.unraisablehook = reported.append
+        try:
+            self.db.set_trace_hook(hook)
+            self.db['k1'] = 'v1'
+            self.assertEqual(self.db.execute('DOUBLE %s', ('ab',)), b'abab')
+            self.assertEqual(self.db['k1'], b'v1')
+        finally:
+            sys.unraisablehook = original
+            self.db.set_trace_hook(None)
+
+        # Failures are reported, but the operations complete normally. The
+        # command is traced both as a callback and as a command.
+        self.assertEqual([str(r.exc_value) for r in reported], [
+            'store', 'DOUBLE', 'DOUBLE', 'fetch'])
+        self.assertTrue(all(r.object is hook for r in reported))
+
+    def test_transactions(self):
+        db = Vedis('test.db', instrument=True)
+        try:
+            db.begin()
+            db['k1'] = 'v1'
+            db.commit()
+            with db.transaction():
+                db['k2'] = 'v2'
+            db.rollback()
+            stats = db.stats()
+        finally:
+            db.close()
+            os.unlink('test.db')
+        self.assertEqual(stats['transactions']['begin']['count'], 2)
+        self.assertEqual(stats['transactions']['commit']['count'], 2)
+        self.assertEqual(stats['transactions']['rollback']['count'], 1)
+
+    def test_histogram(self):
+        hist = LatencyHistogram()
+        self.assertEqual(hist.percentile(50), 0)
+        for value in range(1, 10001):
+            hist.record(value)
+        self.assertEqual(hist.count, 10000)
+        self.assertEqual((hist.min, hist.max), (1, 10000))
+        # Values are accurate to within one eighth.
+        for pct in (50, 90, 99):
+            expected = 100 * pct
+            self.assertTrue(expected <= hist.percentile(pct) <
+                            expected * 1.125 + 1)
+        self.assertEqual(hist.percentile(100), 10000)
+        self.assertEqual(hist.buckets()[-1][1], 10000)
+        hist.reset()
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(hist.buckets(), [])
+
+
 class TestStringCommands(BaseVedisTestCase):
     def test_strlen(self):
         self.db['k1'] = 'foo'
@@ -363,6 +1733,292 @@ class TestListCommands(BaseVedisTestCase):
         self.assertEqual(self.db.lindex('list', 3), None)
 
 
+class TestZSetCommands(BaseVedisTestCase):
+    def test_zset_methods(self):
+        self.assertEqual(self.db.zadd('z', {'a': 3, 'b': 1.5, 'c': -2}), 3)
+        self.assertEqual(self.db.zadd('z', {'a': 1, 'd': 10}), 1)
+        self.assertEqual(self.db.zcard('z'), 4)
+        self.assertEqual(self.db.zrange('z'), [b'c', b'a', b'b', b'd'])
+        self.assertEqual(self.db.zrange('z', 1, 2, withscores=True),
+                         [(b'a', 1.0), (b'b', 1.5)])
+        self.assertEqual(self.db.zrevrange('z', 0, 1), [b'd', b'b'])
+        self.assertEqual(self.db.zrange('z', -2), [b'b', b'd'])
+        self.assertEqual(self.db.zrange('z', 5), [])
+
+        self.assertEqual(self.db.zscore('z', 'b'), 1.5)
+        self.assertTrue(isinstance(self.db.zscore('z', 'a'), float))
+        self.assertEqual(self.db.zscore('z', 'missing'), None)
+        self.assertEqual(self.db.zrank('z', 'c'), 0)
+        self.assertEqual(self.db.zrank('z', 'd'), 3)
+        self.assertEqual(self.db.zrevrank('z', 'd'), 0)
+        self.assertEqual(self.db.zrank('z', 'missing'), None)
+        self.assertEqual(self.db.zincrby('z', 'c', 5), 3.0)
+        self.assertEqual(self.db.zincrby('z', 'e'), 1.0)
+        self.assertEqual(self.db.zrange('z'), [b'a', b'e', b'b', b'c', b'd'])
+
+        self.assertEqual(self.db.zrem('z', 'e'), 1)
+        self.assertEqual(self.db.zmrem('z', ['a', 'missing']), 1)
+        self.assertEqual(self.db.zrange('z'), [b'b', b'c', b'd'])
+        self.assertEqual(self.db.zcard('missing'), 0)
+        self.assertEqual(self.db.zrange('missing'), [])
+
+    def test_score_ranges(self):
+        self.db.zadd('z', dict(('m%d' % i, i) for i in range(10)))
+        self.db.zadd('z', {'ninf': float('-inf'), 'pinf': float('inf')})
+        self.assertEqual(self.db.zcount('z'), 12)
+        self.assertEqual(self.db.zcount('z', 2, 4), 3)
+        self.assertEqual(self.db.zcount('z', '(2', '(4'), 1)
+        self.assertEqual(self.db.zcount('z', 5, 2), 0)
+        self.assertEqual(self.db.zrangebyscore('z', 7), [b'm7', b'm8', b'm9',
+                                                          b'pinf'])
+        self.assertEqual(self.db.zrangebyscore('z', high='(1'),
+                         [b'ninf', b'm0'])
+        self.assertEqual(
+            self.db.zrangebyscore('z', 2.5, 6, withscores=True),
+            [(b'm3', 3.0), (b'm4', 4.0), (b'm5', 5.0), (b'm6', 6.0)])
+        self.assertEqual(self.db.zrangebyscore('z', 0, 9, offset=2, count=3),
+                         [b'm2', b'm3', b'm4'])
+        self.assertEqual(self.db.zrangebyscore('z', 0, 9, offset=8),
+                         [b'm8', b'm9'])
+        self.assertEqual(self.db.zrangebyscore('z', 0, 9, offset=20), [])
+        self.assertEqual(self.db.zrevrangebyscore('z', 9, 0, count=3),
+                         [b'm9', b'm8', b'm7'])
+        self.assertEqual(self.db.zrevrangebyscore('z', '(5', 0, offset=1,
+                                                  count=2),
+                         [b'm3', b'm2'])
+        self.assertEqual(self.db.zrevrangebyscore('z', withscores=True)[0],
+                         (b'pinf', float('inf')))
+
+    def test_ties_and_precision(self):
+        # Members with the same score are ordered by member.
+        self.db.zadd('z', {'b': 1, 'a': 1, 'c': 1, 'aa': 1})
+        self.assertEqual(self.db.zrange('z'), [b'a', b'aa', b'b', b'c'])
+        scores = [1 / 3.0, 1e-300, 5e-324, 1700000000.123456, -0.1,
+                  2 ** 60 + 1]
+        self.db.zadd('p', dict(('m%d' % i, score)
+                               for i, score in enumerate(scores)))
+        for i, score in enumerate(scores):
+            self.assertEqual(self.db.zscore('p', 'm%d' % i), float(score))
+        self.assertRaises(ValueError, self.db.zadd, 'p', {'x': float('nan')})
+        # Invalid scores are skipped.
+        self.assertEqual(self.db.call('ZADD', 'p', 'abc', 'x'), 0)
+        self.assertEqual(self.db.call('ZADD', 'p', '1e3', 'x'), 1)
+        self.assertEqual(self.db.zscore('p', 'x'), 1000.0)
+
+    def test_against_sorted(self):
+        rng = random.Random(1)
+        model = {}
+        for i in range(2000):
+            member = 'm%d' % rng.randint(0, 300)
+            if rng.random() < 0.2:
+                self.db.zrem('z', member)
+                model.pop(member, None)
+            else:
+                score = rng.randint(-50, 50) / 4.0
+                self.db.zadd('z', {member: score})
+                model[member] = score
+
+        ordered = sorted(model.items(), key=lambda item: (item[1], item[0]))
+        expected = [(member.encode(), score) for member, score in ordered]
+        self.assertEqual(self.db.zrange('z', withscores=True), expected)
+        self.assertEqual(self.db.zrevrange('z', 0, 9, withscores=True),
+                         expected[::-1][:10])
+        for rank, (member, score) in enumerate(expected):
+            self.assertEqual(self.db.zrank('z', member), rank)
+        for low, high in ((-5, 5), (0, 0), (-100, 100), (3.25, 3.5)):
+            in_range = [item for item in expected if low <= item[1] <= high]
+            self.assertEqual(self.db.zcount('z', low, high), len(in_range))
+            self.assertEqual(self.db.zrangebyscore('z', low, high, offset=3,
+                                                   count=5),
+                             [member for member, _ in in_range[3:8]])
+
+
+class TestKeyExpiry(BaseVedisTestCase):
+    def expire_soon(self, *keys):
+        # Expire the keys in a few milliseconds and wait for them to be due.
+        for key in keys:
+            self.assertTrue(self.db.expire(key, 0.01))
+        time.sleep(0.02)
+
+    def test_expire_ttl_persist(self):
+        self.set_k1_k2()
+        self.assertTrue(self.db.expire('k1', 100))
+        self.assertTrue(95 < self.db.ttl('k1') <= 100)
+        self.assertEqual(self.db.ttl('k2'), None)
+        self.assertEqual(self.db.ttl('k3'), None)
+        self.assertFalse(self.db.expire('k3', 100))
+
+        self.assertTrue(self.db.expireat('k2', time.time() + 200))
+        self.assertTrue(195 < self.db.ttl('k2') <= 200)
+        self.assertTrue(self.db.persist('k2'))
+        self.assertFalse(self.db.persist('k2'))
+        self.assertEqual(self.db.ttl('k2'), None)
+
+        # A deadline that has passed deletes the key right away.
+        self.assertTrue(self.db.expireat('k2', time.time() - 1))
+        self.assertFalse(self.db.exists('k2'))
+        self.assertEqual(self.db.expire_stats(), {'volatile': 1,
+                                                  'expired': 0})
+
+        # A failed lookup is an error rather than a key without expiry.
+        db = Vedis(':memory:')
+        db.close()
+        self.assertRaises(OSError, db.ttl, 'k1')
+
+    def test_commands(self):
+        self.set_k1_k2()
+        self.assertEqual(self.db.execute('EXPIRE k1 100'), 1)
+        self.assertEqual(self.db.execute('PEXPIRE k2 100000'), 1)
+        self.assertEqual(self.db.execute('EXPIRE k3 100'), 0)
+        self.assertEqual(self.db.execute('TTL k1'), 100)
+        self.assertTrue(99000 < self.db.execute('PTTL k2') <= 100000)
+        self.assertEqual(self.db.execute('TTL k3'), -2)
+        self.assertEqual(self.db.execute('PERSIST k1'), 1)
+        self.assertEqual(self.db.execute('TTL k1'), -1)
+        deadline = int(time.time() + 50)
+        self.assertEqual(self.db.execute('EXPIREAT k1 %d' % deadline), 1)
+        self.assertTrue(45 < self.db.execute('TTL k1') <= 50)
+        self.assertEqual(self.db.execute('EXPIRE k1 nan'), 0)
+        self.assertTrue(45 < self.db.ttl('k1') <= 50)
+
+    def test_writes(self):
+        self.db.store('k1', 'v1', ttl=100)
+        self.assertTrue(self.db.ttl('k1') > 95)
+
+        # Storing a value removes the deadline, while counters and appends
+        # keep it.
+        self.db.store('k1', 'v1-x')
+        self.assertEqual(self.db.ttl('k1'), None)
+        self.db.set('k1', '1')
+        self.db.expire('k1', 100)
+        self.db.incr('k1')
+        self.db.append('k1', '0')
+        self.assertEqual(self.db.get('k1'), b'20')
+        self.assertTrue(self.db.ttl('k1') > 95)
+        self.db.mset({'k1': 'v1'})
+        self.assertEqual(self.db.ttl('k1'), None)
+
+        # A deleted key does not inherit its former deadline.
+        self.db.expire('k1', 100)
+        del self.db['k1']
+        self.db['k1'] = 'v1'
+        self.assertEqual(self.db.ttl('k1'), None)
+
+    def test_lazy_expiry(self):
+        self.set_k1_k2()
+        self.db['k3'] = 'v3'
+        self.expire_soon('k1', 'k2', 'k3')
+        self.assertFalse(self.db.exists('k1'))
+        self.assertRaises(KeyError, self.db.fetch, 'k2')
+        self.assertEqual(self.db.get_set('k3', 'v3-x'), None)
+        self.assertEqual(self.db['k3'], b'v3-x')
+        self.assertEqual(self.db.ttl('k3'), None)
+        self.assertEqual(self.db.expire_stats(), {'volatile': 0,
+                                                  'expired': 3})
+
+    def test_expire_step(self):
+        for i in range(10):
+            self.db.store('k%d' % i, 'v%d' % i, ttl=0.01 if i % 2 else 100)
+        time.sleep(0.02)
+        self.assertEqual(self.db.expire_step(3), 3)
+        self.assertEqual(self.db.expire_step(), 2)
+        self.assertEqual(self.db.expire_step(), 0)
+        self.assertEqual(sorted(self.db.scan(keys_only=True)),
+                         [b'k0', b'k2', b'k4', b'k6', b'k8'])
+        self.assertEqual(self.db.expire_stats(), {'volatile': 5,
+                                                  'expired': 5})
+        self.assertRaises(ValueError, self.db.expire_step, 0)
+
+    def test_scan(self):
+        self.set_k1_k2()
+        self.db['k3'] = 'v3'
+        self.db.expire('k3', 100)
+        self.expire_soon('k1')
+        self.assertEqual(sorted(self.db.scan(keys_only=True)), [b'k2', b'k3'])
+
+    def test_rollback(self):
+        filename = 'test-expire.db'
+        self.addCleanup(os.unlink, filename)
+        db = Vedis(filename)
+        self.addCleanup(db.close)
+        db['k1'] = 'v1'
+        db.store('k2', 'v2', ttl=100)
+        db.commit()
+
+        # Deadlines set or removed by a rolled back transaction are undone.
+        db.begin()
+        db.expire('k1', 0.05)
+        db.persist('k2')
+        db.store('k3', 'v3', ttl=0.05)
+        db.rollback()
+        self.assertEqual(db.ttl('k1'), None)
+        self.assertTrue(95 < db.ttl('k2') <= 100)
+        time.sleep(0.06)
+        self.assertEqual(db['k1'], b'v1')
+        self.assertEqual(db.expire_step(), 0)
+        self.assertEqual(sorted(db.scan()), [(b'k1', b'v1'), (b'k2', b'v2')])
+
+    def test_pipeline(self):
+        self.set_k1_k2()
+        results = (self.db.pipeline()
+                   .expire('k1', 100)
+                   .expire('k3', 100)
+                   .ttl('k1')
+                   .ttl('k2')
+                   .persist('k1')
+                   .execute())
+        self.assertEqual(results[:2], [True, False])
+        self.assertTrue(95 < results[2] <= 100)
+        self.assertEqual(results[3:], [None, True])
+
+    def test_read_cache(self):
+        db = Vedis(':mem:', read_cache_size=10)
+        self.addCleanup(db.close)
+        db.store('k1', 'v1', ttl=0.01)
+        db['k2'] = 'v2'
+        self.assertEqual(db['k1'], b'v1')
+        self.assertEqual(db['k2'], b'v2')
+        time.sleep(0.02)
+        self.assertRaises(KeyError, db.fetch, 'k1')
+        db.execute('PEXPIRE k2 10')
+        time.sleep(0.02)
+        self.assertRaises(KeyError, db.fetch, 'k2')
+
+    def test_file_database(self):
+        filename = 'test-expire.db'
+        self.addCleanup(os.unlink, filename)
+        db = Vedis(filename)
+        db.store('k1', 'v1', ttl=100)
+        db.store('k2', 'v2', ttl=0.01)
+        db.commit()
+        db.close()
+        time.sleep(0.02)
+
+        db = Vedis(filename)
+        self.assertTrue(95 < db.ttl('k1') <= 100)
+        self.assertFalse(db.exists('k2'))
+        self.assertEqual(db.expire_step(), 0)
+        self.assertEqual(db.expire_stats(), {'volatile': 1, 'expired': 1})
+        db.close()
+
+    def test_dump_restore(self):
+        self.set_k1_k2()
+        self.db.expire('k1', 100)
+        self.db.expire('k2', 200)
+        self.db.persist('k2')
+        buf = io.BytesIO()
+        self.assertEqual(self.db.dump(buf), {'keys': 2, 'tables': 0,
+                                             'entries': 0, 'expires': 1})
+
+        db = Vedis(':mem:')
+        self.addCleanup(db.close)
+        buf.seek(0)
+        self.assertEqual(db.restore(buf)['expires'], 1)
+        self.assertEqual(db['k1'], b'v1')
+        self.assertTrue(95 < db.ttl('k1') <= 100)
+        self.assertEqual(db.ttl('k2'), None)
+
+
 class TestMiscCommands(BaseVedisTestCase):
     def test_rand(self):
         res = self.db.rand(1, 10)
@@ -385,6 +2041,132 @@ class TestMiscCommands(BaseVedisTestCase):
         self.assertEqual(sorted(tables), [b'hash', b'set'])
 
 
+class TestCursor(BaseVedisTestCase):
+    def setUp(self):
+        super(TestCursor, self).setUp()
+        for i in range(10):
+            self.db['k%02d' % i] = 'v%02d' % i
+        self.db['other'] = 'o'
+
+    def test_cursor(self):
+        with self.db.cursor() as cursor:
+            self.assertTrue(cursor.is_valid())
+            self.assertEqual(cursor.key(), b'k00')
+            self.assertEqual(cursor.value(), b'v00')
+            items = list(cursor)
+            self.assertEqual(len(items), 11)
+            self.assertEqual(items[0], (b'k00', b'v00'))
+            self.assertFalse(cursor.is_valid())
+
+            cursor.seek('k05')
+            self.assertEqual(list(cursor.fetch_until('k07')), [
+                (b'k05', b'v05'),
+                (b'k06', b'v06'),
+                (b'k07', b'v07')])
+            self.assertRaises(KeyError, cursor.seek, 'kx')
+
+            cursor.seek('k09')
+            cursor.delete()
+            self.assertEqual(cursor.key(), b'other')
+            self.assertFalse('k09' in self.db)
+
+    def test_close_database(self):
+        cursor = self.db.cursor()
+        self.db.close()
+        self.assertRaises(ValueError, cursor.first)
+
+    def test_scan(self):
+        keys = list(self.db.scan(keys_only=True, chunk_size=3))
+        self.assertEqual(keys, [b'k%02d' % i for i in range(10)] + [b'other'])
+
+        self.assertEqual(list(self.db.scan(prefix='o')), [(b'other', b'o')])
+        self.assertEqual(list(self.db.scan(start='k07', stop='k08')), [
+            (b'k07', b'v07'),
+            (b'k08', b'v08')])
+        self.assertEqual(
+            list(self.db.scan(prefix='k', start='k08', keys_only=True)),
+            [b'k08', b'k09'])
+        self.assertRaises(KeyError, list, self.db.scan(start='kx'))
+
+    def test_scan_modify(self):
+        # Records may be deleted while a scan is in progress.
+        accum = []
+        for key in self.db.scan(prefix='k', keys_only=True, chunk_size=2):
+            accum.append(key)
+            self.db.delete(key)
+        self.assertEqual(len(accum), 10)
+        self.assertEqual(list(self.db.scan()), [(b'other', b'o')])
+
+
+class TestFileCursor(TestCursor):
+    def setUp(self):
+        self.db = Vedis('test.db')
+        for i in range(10):
+            self.db['k%02d' % i] = 'v%02d' % i
+        self.db['other'] = 'o'
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        finally:
+            if os.path.exists('test.db'):
+                os.unlink('test.db')
+
+    def test_cursor(self):
+        # Records are stored in hash order, so compare unordered.
+        self.db.commit()
+        with self.db.cursor() as cursor:
+            items = dict(cursor)
+        self.assertEqual(len(items), 11)
+        self.assertEqual(items[b'k03'], b'v03')
+
+    def test_scan(self):
+        for i in range(1000):
+            self.db['x%04d' % i] = 'x' * 100
+        self.db.commit()
+        keys = list(self.db.scan(prefix='x', keys_only=True, chunk_size=64))
+        self.assertEqual(sorted(keys), [b'x%04d' % i for i in range(1000)])
+
+        # Scanning from a given key visits the remainder of the store.
+        remainder = list(self.db.scan(prefix='x', start=keys[500],
+                                      keys_only=True))
+        self.assertEqual(remainder, keys[500:])
+
+    def test_internal_records(self):
+        # The records of tables and of deadlines are not returned.
+        self.db.hmset('h', {'f1': 'v1', 'f2': 'v2'})
+        self.db.smadd('s', ['a', 'b'])
+        self.db.zadd('z', {'m1': 1, 'm2': 2})
+        self.db.lmpush('l', ['x', 'y'])
+        self.db.store('volatile', 'v', ttl=100)
+        self.db.store('due', 'v', ttl=0.01)
+        self.db['vxa'] = 'abcd'
+        self.db.commit()
+        time.sleep(0.02)
+        expected = sorted([b'k%02d' % i for i in range(10)] +
+                          [b'other', b'volatile', b'vxa'])
+
+        self.assertEqual(sorted(self.db.scan(keys_only=True, chunk_size=3)),
+                         expected)
+        with self.db.cursor() as cursor:
+            self.assertEqual(sorted(key for key, _ in cursor), expected)
+            cursor.last()
+            keys = []
+            while cursor.is_valid():
+                keys.append(cursor.key())
+                cursor.previous_entry()
+            self.assertEqual(sorted(keys), expected)
+
+    def test_scan_modify(self):
+        self.db.commit()
+        accum = []
+        for key in self.db.scan(prefix='k', keys_only=True, chunk_size=2):
+            accum.append(key)
+            self.db.delete(key)
+        self.assertEqual(sorted(accum), [b'k%02d' % i for i in range(10)])
+        self.assertEqual(list(self.db.scan()), [(b'other', b'o')])
+
+
 class TestTransaction(BaseVedisTestCase):
     def setUp(self):
         self.db = Vedis('test.db')
@@ -420,6 +2202,308 @@ class TestTransaction(BaseVedisTestCase):
         self.db.rollback()
         self.assertFalse(self.db.exists('k1'))
 
+    def test_pipeline_transaction(self):
+        p = self.db.pipeline(transaction=True)
+        p.set('k1', 'v1').call('MISSING_COMMAND')
+        self.assertRaises(Exception, p.execute)
+        self.assertFalse(self.db.exists('k1'))
+
+        p.set('k1', 'v1').hset('h', 'k', 'v')
+        self.assertEqual(p.execute(), [True, True])
+        self.db.rollback()
+        self.assertEqual(self.db['k1'], b'v1')
+        self.assertEqual(self.db.hget('h', 'k'), b'v')
+
+
+class TestDurability(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test.db'):
+            os.unlink('test.db')
+
+    def open(self, durability, **kwargs):
+        db = Vedis('test.db', durability=durability, **kwargs)
+        self.addCleanup(db.close)
+        return db
+
+    def test_full(self):
+        db = self.open('full')
+        self.assertEqual(db.durability, 'full')
+        db['k1'] = 'v1'
+        db.hset('h', 'f', 'v')
+        db.execute('SET k2 v2')
+        db.store_many({'k3': 'v3', 'k4': 'v4'})
+        db.pipeline().set('k5', 'v5').lpush('l', 'i').execute()
+        db.delete('k4')
+        self.assertEqual(db.get('k1'), b'v1')
+        stats = db.durability_stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual((stats['writes'], stats['commits']), (8, 6))
+
+        # Every write has already been committed.
+        db.rollback()
+        self.assertEqual(db.mget(['k1', 'k2', 'k3', 'k4', 'k5']),
+                         [b'v1', b'v2', b'v3', None, b'v5'])
+        self.assertEqual(db.hget('h', 'f'), b'v')
+
+    def test_batched_every(self):
+        db = self.open('batched', commit_every=3)
+        db['k1'] = 'v1'
+        db['k2'] = 'v2'
+        self.assertEqual(db.durability_stats()['pending'], 2)
+        db.rollback()
+        self.assertFalse(db.exists('k1'))
+
+        for i in range(4):
+            db['k%d' % i] = 'v%d' % i
+        self.assertEqual(db['k3'], b'v3')
+        stats = db.durability_stats()
+        self.assertEqual((stats['pending'], stats['commits']), (1, 1))
+        db.rollback()
+        self.assertEqual(db.mget(['k0', 'k2', 'k3']), [b'v0', b'v2', None])
+
+        db['k3'] = 'v3'
+        self.assertTrue(db.flush())
+        db.rollback()
+        self.assertEqual(db['k3'], b'v3')
+        self.assertEqual(db.durability_stats()['commits'], 2)
+
+    def test_batched_interval(self):
+        db = self.open('batched', commit_interval=0.05)
+        db['k1'] = 'v1'
+        db.sadd('s', 'm')
+        self.assertEqual(db.durability_stats()['pending'], 2)
+
+        # The pending writes are committed even though no more are made.
+        deadline = time.time() + 5
+        while db.durability_stats()['pending'] and time.time() < deadline:
+            time.sleep(0.01)
+        db.rollback()
+        self.assertEqual(db['k1'], b'v1')
+        self.assertEqual(db.smembers('s'), set((b'm',)))
+
+    def test_transaction(self):
+        db = self.open('full')
+        db['k1'] = 'v1'
+        db.begin()
+        db['k1'] = 'v1-x'
+        db['k2'] = 'v2'
+        self.assertEqual(db.durability_stats()['pending'], 2)
+        db.rollback()
+        self.assertEqual(db.mget(['k1', 'k2']), [b'v1', None])
+
+        with db.transaction():
+            db['k2'] = 'v2'
+        db.rollback()
+        self.assertEqual(db['k2'], b'v2')
+        self.assertEqual(db.durability_stats()['pending'], 0)
+
+    def test_transaction_command(self):
+        db = self.open('full')
+        db['k1'] = 'v1'
+        db.execute('BEGIN')
+        db['k1'] = 'v1-x'
+        db.execute('SET k2 v2')
+        db.execute('ROLLBACK')
+        self.assertEqual(db.mget(['k1', 'k2']), [b'v1', None])
+
+        db.call('BEGIN')
+        db['k2'] = 'v2'
+        db.call('COMMIT')
+        db['k3'] = 'v3'
+        db.rollback()
+        self.assertEqual(db.mget(['k2', 'k3']), [b'v2', b'v3'])
+
+    def test_transaction_command_interval(self):
+        db = self.open('batched', commit_interval=0.02)
+        db['k1'] = 'v1'
+        db.flush()
+        db.execute('BEGIN')
+        db['k1'] = 'v1-x'
+        db.execute('SET k2 v2')
+
+        # The flusher leaves the transaction alone, however long it runs.
+        time.sleep(0.2)
+        self.assertTrue(db.durability_stats()['pending'] > 0)
+        db.execute('ROLLBACK')
+        self.assertEqual(db.mget(['k1', 'k2']), [b'v1', None])
+
+    def test_flush_in_transaction(self):
+        db = self.open('batched', commit_every=100)
+        db['k1'] = 'v1'
+        self.assertTrue(db.flush())
+
+        # Writes of an open transaction are left to the transaction.
+        db.begin()
+        db['k2'] = 'v2'
+        self.assertFalse(db.flush())
+        db.rollback()
+        db.execute('BEGIN')
+        db['k3'] = 'v3'
+        self.assertFalse(db.flush())
+        db.execute('ROLLBACK')
+        self.assertEqual(db.mget(['k1', 'k2', 'k3']), [b'v1', None, None])
+
+        db['k4'] = 'v4'
+        self.assertTrue(db.flush())
+        db.rollback()
+        self.assertEqual(db['k4'], b'v4')
+
+    def test_close(self):
+        db = self.open('batched', commit_every=100)
+        db['k1'] = 'v1'
+        db.close()
+        self.assertEqual(db.durability_stats()['pending'], 0)
+        db.open()
+        self.assertEqual(db['k1'], b'v1')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Vedis, ':mem:', durability='full')
+        self.assertRaises(ValueError, Vedis, 'test.db', durability='some')
+        self.assertRaises(ValueError, Vedis, 'test.db', commit_every=10)
+        self.assertRaises(ValueError, Vedis, 'test.db', durability='batched',
+                          commit_every=-1)
+        self.assertRaises(ValueError, Vedis, 'test.db', durability='batched',
+                          commit_every=0, commit_interval=0)
+
+        db = Vedis('test.db')
+        self.assertEqual(db.durability, 'none')
+        self.assertEqual(db.durability_stats(), None)
+        db.close()
+
+
+class TestThreads(BaseVedisTestCase):
+    def test_shared_handle(self):
+        @self.db.register('ECHO')
+        def echo(context, *values):
+            return list(values)
+
+        errors = []
+
+        def work(tid):
+            try:
+                for i in range(200):
+                    key = 't%s-%s' % (tid, i)
+                    self.db[key] = key
+                    assert self.db[key] == key.encode('utf-8')
+                    assert self.db.incr('counter') > 0
+                    assert echo(key) == [key.encode('utf-8')]
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.incr('counter'), 801)
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncVedis(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test.db'):
+            os.unlink('test.db')
+
+    def run_async(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_async_api(self):
+        async def main():
+            async with AsyncVedis() as db:
+                await db.store('k1', 'v1')
+                self.assertEqual(await db.fetch('k1'), b'v1')
+                with self.assertRaises(KeyError):
+                    await db.fetch('missing')
+                self.assertEqual(await db.incr_by('c', 3), 3)
+                self.assertEqual(await db.call('GET', 'c'), b'3')
+
+                h = db.Hash('h')
+                await h.update(k1='v1', k2='v2')
+                self.assertEqual(await h.to_dict(),
+                                 {b'k1': b'v1', b'k2': b'v2'})
+                self.assertEqual(await h.length(), 2)
+                self.assertTrue(await h.contains('k1'))
+
+                s = db.Set('s')
+                await s.add('a', 'b', 'a')
+                self.assertEqual(await s.to_set(), set([b'a', b'b']))
+
+                l = db.List('l')
+                await l.extend(['i0', 'i1', 'i2'])
+                self.assertEqual(await l.to_list(), [b'i0', b'i1', b'i2'])
+                self.assertEqual(await l.index(1), b'i1')
+            with self.assertRaises(ValueError):
+                await db.fetch('k1')
+
+        self.run_async(main())
+
+    def test_group_commit(self):
+        async def writer(db, i):
+            await db.store('k%d' % i, 'v%d' % i)
+
+        async def main():
+            db = AsyncVedis('test.db', max_pending=50, max_batch=20)
+            await asyncio.gather(*[writer(db, i) for i in range(500)])
+            self.assertEqual(db.pending, 0)
+            # Writes submitted concurrently are executed in batches.
+            self.assertTrue(db.batches < 500)
+            await db.close()
+
+        self.run_async(main())
+        db = Vedis('test.db')
+        self.assertEqual(db.fetch_many(['k0', 'k499']),
+                         {'k0': b'v0', 'k499': b'v499'})
+        db.close()
+
+    def test_successive_loops(self):
+        db = AsyncVedis(max_pending=2)
+
+        async def main(n):
+            await asyncio.gather(*[db.store('k%d' % i, 'v%d' % n)
+                                   for i in range(10)])
+            return await db.fetch('k9')
+
+        # The in-flight limit is enforced separately on each loop.
+        self.assertEqual(self.run_async(main(1)), b'v1')
+        self.assertEqual(self.run_async(main(2)), b'v2')
+        self.assertEqual(db.pending, 0)
+        self.run_async(db.close())
+
+    def test_loop_closed_in_flight(self):
+        db = AsyncVedis()
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+            return 'done'
+
+        # Close the loop with the request still running on the worker, as
+        # asyncio.run() does when the main coroutine returns early.
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(db._submit(block, (), {}, False))
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(started.wait(5))
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, loop.run_until_complete,
+                          task)
+        loop.close()
+        release.set()
+
+        # The worker survives the closed loop and keeps serving requests.
+        async def main():
+            await db.store('k1', 'v1')
+            return await db.fetch('k1')
+        self.assertEqual(self.run_async(asyncio.wait_for(main(), 5)), b'v1')
+        self.assertEqual(db.pending, 0)
+        self.run_async(db.close())
+
 
 class TestHashObject(BaseVedisTestCase):
     def test_hash_object(self):
@@ -447,6 +2531,72 @@ class TestHashObject(BaseVedisTestCase):
         data = h.mget('k3', 'kx', 'k2')
         self.assertEqual(list(data), [b'v3', None, b'v2'])
 
+    def test_incremental_iteration(self):
+        h = self.db.Hash('my_hash', batch_size=7)
+        data = dict(('k%02d' % i, 'v%02d' % i) for i in range(50))
+        h.update(**data)
+        expected = sorted((k.encode(), v.encode()) for k, v in data.items())
+        self.assertEqual(sorted(h.iteritems()), expected)
+        self.assertEqual(sorted(h.iterkeys()), [k for k, _ in expected])
+        self.assertEqual(sorted(h.itervalues()), [v for _, v in expected])
+        self.assertEqual(sorted(h), [k for k, _ in expected])
+
+        # Interleaved iterators over the same hash.
+        it1, it2 = h.iterkeys(), h.iterkeys()
+        accum = []
+        for k1, k2 in zip(it1, it2):
+            self.assertEqual(k1, k2)
+            accum.append(k1)
+        self.assertEqual(len(accum), 50)
+
+        # Items may be deleted while iterating.
+        accum = []
+        for key in h:
+            accum.append(key)
+            del h[key]
+        self.assertEqual(len(accum), 50)
+        self.assertEqual(len(h), 0)
+
+    def test_hscan(self):
+        self.db.hmset('h', {'k1': 'v1', 'k2': 'v2', 'k3': 'v3'})
+        cursor, items = self.db.hscan('h', count=2)
+        self.assertTrue(cursor > 0)
+        self.assertEqual(len(items), 2)
+        cursor, rest = self.db.hscan('h', cursor, count=2)
+        self.assertEqual(cursor, 0)
+        self.assertEqual(sorted(items + rest), [
+            (b'k1', b'v1'), (b'k2', b'v2'), (b'k3', b'v3')])
+        self.assertEqual(self.db.hscan('missing'), (0, []))
+        self.assertRaises(RuntimeError, self.db.hscan, 'h', 1000)
+
+    def test_hscan_resume(self):
+        self.db.hmset('h', dict(('k%02d' % i, 'v') for i in range(50)))
+        _, items = self.db.hscan('h', count=50)
+        keys = [key for key, _ in items]
+
+        # Interleaved iterations each return every item.
+        cursors = dict((i, 0) for i in range(6))
+        seen = dict((i, []) for i in range(6))
+        while cursors:
+            for i in list(cursors):
+                cursor, items = self.db.hscan('h', cursors[i], count=3)
+                seen[i].extend(key for key, _ in items)
+                if cursor:
+                    cursors[i] = cursor
+                else:
+                    del cursors[i]
+        for i in range(6):
+            self.assertEqual(seen[i], keys)
+
+        # An iteration whose next item was deleted resumes with the item
+        # that follows it, even once its position is no longer remembered.
+        cursor, _ = self.db.hscan('h', count=10)
+        for i in range(4):
+            self.db.hscan('h', count=1)
+        self.db.hdel('h', keys[10])
+        cursor, items = self.db.hscan('h', cursor, count=2)
+        self.assertEqual([key for key, _ in items], keys[11:13])
+
 
 class TestSetObject(BaseVedisTestCase):
     def test_set_object(self):
@@ -477,6 +2627,17 @@ class TestSetObject(BaseVedisTestCase):
         self.assertEqual(s & s2, set([b'v1']))
         self.assertEqual(s2 & s, set([b'v1']))
 
+    def test_incremental_iteration(self):
+        s = self.db.Set('my_set', batch_size=3)
+        s.add(*['v%02d' % i for i in range(20)])
+        members = [('v%02d' % i).encode() for i in range(20)]
+        self.assertEqual(sorted(s), members)
+
+        cursor, first = self.db.sscan('my_set', count=15)
+        cursor, rest = self.db.sscan('my_set', cursor, count=15)
+        self.assertEqual(cursor, 0)
+        self.assertEqual(sorted(first + rest), members)
+
 
 class TestListObject(BaseVedisTestCase):
     def test_list_object(self):
@@ -487,16 +2648,124 @@ class TestListObject(BaseVedisTestCase):
         self.assertEqual(items, [b'v1', b'v2', b'v3', b'v4'])
         self.assertEqual(len(l), 4)
         self.assertEqual(l.pop(), b'v1')
-        self.assertEqual(l[0], None)  # This is kind of odd, perhaps a bug?
-        self.assertEqual(l[1], b'v2')
-        self.assertEqual(l[2], b'v3')
-        self.assertEqual(l[3], b'v4')
-        self.assertEqual(l[4], None)
-
-        self.assertEqual(list(l[0:2]), [None, b'v2'])
-        self.assertEqual(list(l[1:8]), [b'v2', b'v3', b'v4'])
-        self.assertEqual(list(l[3:4]), [b'v4'])
-        self.assertEqual(list(l[:]), [None, b'v2', b'v3', b'v4'])
+        # Indexes are positions, so they shift after an element is popped.
+        self.assertEqual(l[0], b'v2')
+        self.assertEqual(l[1], b'v3')
+        self.assertEqual(l[2], b'v4')
+        self.assertEqual(l[3], None)
+        self.assertEqual(l[-1], b'v4')
+
+        self.assertEqual(list(l[0:2]), [b'v2', b'v3'])
+        self.assertEqual(list(l[1:8]), [b'v3', b'v4'])
+        self.assertEqual(list(l[2:3]), [b'v4'])
+        self.assertEqual(list(l[:]), [b'v2', b'v3', b'v4'])
+        self.assertEqual(list(l[-2:]), [b'v3', b'v4'])
+        self.assertEqual(list(l.get_range(1)), [b'v3', b'v4'])
+
+    def test_chunked_iteration(self):
+        l = self.db.List('my_list', batch_size=7)
+        l.extend(['v%d' % i for i in range(100)])
+        for i in range(10):
+            l.pop()
+        expected = [b'v%d' % i for i in range(10, 100)]
+        self.assertEqual(list(l), expected)
+        self.assertEqual(list(l[5:50]), expected[5:50])
+        self.assertEqual(list(l[::3]), expected[::3])
+        self.assertEqual(list(l[4:95:5]), expected[4:95:5])
+        self.assertEqual(self.db.lrange('my_list', 0, 2), expected[:3])
+        self.assertEqual(self.db.lrange('my_list', -2), expected[-2:])
+        self.assertEqual(self.db.lrange('my_list', 200), [])
+        self.assertEqual(self.db.lrange('missing'), [])
+        self.assertRaises(ValueError, lambda: l[::-1])
+
+    def test_range_positions(self):
+        # Ranges resume from where the previous one ended, and see the
+        # elements removed or added since.
+        model = [b'v%d' % i for i in range(300)]
+        self.db.lmpush('l', model)
+        for start, stop in [(0, 9), (10, 19), (150, 160), (140, 145),
+                            (290, 299), (5, 8), (200, 210)]:
+            self.assertEqual(self.db.lrange('l', start, stop),
+                             model[start:stop + 1])
+        self.db.lrange('l', 100, 109)
+        self.db.lpop('l')
+        model.pop(0)
+        self.assertEqual(self.db.lrange('l', 110, 119), model[110:120])
+        self.db.lpush('l', 'x')
+        model.append(b'x')
+        self.assertEqual(self.db.lrange('l', 120, -1), model[120:])
+
+
+class TestZSetObject(BaseVedisTestCase):
+    def test_zset_object(self):
+        z = self.db.ZSet('scores')
+        self.assertEqual(z.add({'huey': 10, 'mickey': 3}, zaizee=7), 3)
+        z['beanie'] = 12
+        self.assertEqual(len(z), 4)
+        self.assertEqual(list(z), [b'mickey', b'zaizee', b'huey', b'beanie'])
+        self.assertEqual(z.top(2), [b'beanie', b'huey'])
+        self.assertEqual(z.top(1, withscores=True), [(b'beanie', 12.0)])
+        self.assertEqual(z.top(0), [])
+        self.assertEqual(z['huey'], 10.0)
+        self.assertEqual(z.score('missing'), None)
+        self.assertIn('huey', z)
+        self.assertNotIn('missing', z)
+        self.assertEqual(z.rank('huey'), 2)
+        self.assertEqual(z.rank('huey', reverse=True), 1)
+        self.assertEqual(z.incr('mickey', 10), 13.0)
+        self.assertEqual(z.range(0, 1), [b'zaizee', b'huey'])
+        self.assertEqual(z.range(0, 0, reverse=True), [b'mickey'])
+        self.assertEqual(z.range_by_score(7, 12), [b'zaizee', b'huey',
+                                                   b'beanie'])
+        self.assertEqual(z.range_by_score(7, 12, reverse=True, count=1),
+                         [b'beanie'])
+        self.assertEqual(z.count('(7', 12), 2)
+
+        del z['huey']
+        self.assertEqual(z.remove('zaizee', 'missing'), 1)
+        self.assertEqual(list(z.items()), [(b'beanie', 12.0),
+                                           (b'mickey', 13.0)])
+
+    def test_chunked_iteration(self):
+        z = self.db.ZSet('z', batch_size=7)
+        z.add(dict(('m%03d' % i, -i) for i in range(100)))
+        expected = [('m%03d' % i).encode() for i in range(99, -1, -1)]
+        self.assertEqual(list(z), expected)
+        self.assertEqual([member for member, _ in z.items()], expected)
+
+    def test_persistence(self):
+        filename = 'test-zset.db'
+        db = Vedis(filename)
+        try:
+            z = db.ZSet('z')
+            z.add(dict(('m%d' % i, i % 10) for i in range(50)))
+            db.commit()
+            z.remove('m0', 'm1')
+            z.incr('m2', 100)
+            db.commit()
+            db.close()
+
+            db.open()
+            z = db.ZSet('z')
+            self.assertEqual(len(z), 48)
+            self.assertEqual(z.top(1, withscores=True), [(b'm2', 102.0)])
+            self.assertEqual(z.range(0, 2), [b'm10', b'm20', b'm30'])
+            self.assertEqual(z.count(9, 9), 5)
+            # Sorted sets do not clash with the other types.
+            db.hset('z', 'f', 'v')
+            self.assertEqual(len(z), 48)
+
+            fh = io.BytesIO()
+            self.assertEqual(db.dump(fh)['entries'], 49)
+            mem_db = Vedis(':mem:')
+            mem_db.restore(io.BytesIO(fh.getvalue()))
+            self.assertEqual(mem_db.zrange('z', withscores=True),
+                             z.range(withscores=True))
+            mem_db.close()
+        finally:
+            db.close()
+            if os.path.exists(filename):
+                os.unlink(filename)
 
 
 class TestCustomCommands(BaseVedisTestCase):
@@ -566,6 +2835,22 @@ class TestCustomCommands(BaseVedisTestCase):
 
         self.db.delete_command('MAGIC_SET')
 
+    def test_context_fetch(self):
+        @self.db.register('MAGIC_GET')
+        def magic_get(context, *params):
+            accum = []
+            for param in params:
+                try:
+                    accum.append(context.fetch(param))
+                except KeyError:
+                    accum.append('missing')
+            return accum
+
+        self.db['k1'] = 'v1'
+        self.db['k2'] = ''
+        res = self.db.execute('MAGIC_GET %s %s %s', ('k1', 'k2', 'k3'))
+        self.assertEqual(res, [b'v1', b'', b'missing'])
+
     def test_return_types(self):
         @self.db.register('TEST_RET')
         def test_ret(context, *params):
@@ -592,6 +2877,51 @@ class TestCustomCommands(BaseVedisTestCase):
 
         self.db.delete_command('TEST_RET')
 
+    def test_per_database_commands(self):
+        other = Vedis(':mem:')
+        self.addCleanup(other.close)
+
+        @self.db.register('WHICH')
+        def which1(context):
+            return 'db'
+
+        @other.register('WHICH')
+        def which2(context):
+            return 'other'
+
+        self.assertEqual(self.db.execute('WHICH'), b'db')
+        self.assertEqual(other.execute('WHICH'), b'other')
+        other.delete_command('WHICH')
+        self.assertEqual(self.db.call('WHICH'), b'db')
+
+    def test_lazy_args(self):
+        saved = []
+
+        @self.db.register('FIRST', lazy=True)
+        def first(context, args):
+            saved.append(args)
+            if len(args) == 0:
+                return None
+            return [args[0], args[-1], args[1:3], list(args)]
+
+        self.assertEqual(self.db.call('FIRST', 'a', 'b', 'c', 'd'), [
+            b'a', b'd', [b'b', b'c'], [b'a', b'b', b'c', b'd']])
+        self.assertTrue(self.db.call('FIRST') is None)
+        self.assertRaises(RuntimeError, len, saved[0])
+        self.assertRaises(RuntimeError, lambda: saved[0][0])
+
+    def test_nested_command(self):
+        @self.db.register('COUNTDOWN', lazy=True)
+        def countdown(context, args):
+            n = int(args[0])
+            if n == 0:
+                return []
+            inner = self.db.call('COUNTDOWN', n - 1)
+            # The arguments of the outer call are still available.
+            return [int(args[0])] + inner
+
+        self.assertEqual(self.db.call('COUNTDOWN', 3), [3, 2, 1])
+
 
 if __name__ == '__main__':
     unittest.main(argv=sys.argv)
@@ -11,12 +11,57 @@
 #
 # Thanks to buaabyl for pyUnQLite, whose source-code helped me get started on
 # this library.
+from cpython.buffer cimport PyBUF_WRITABLE
+from cpython.buffer cimport PyBuffer_Release
+from cpython.buffer cimport PyObject_GetBuffer
+from cpython.bytes cimport PyBytes_AS_STRING
 from cpython.bytes cimport PyBytes_Check
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.exc cimport PyErr_SetObject
+from cpython.exc cimport PyErr_WriteUnraisable
+from cpython.pythread cimport PyThread_acquire_lock
+from cpython.pythread cimport PyThread_allocate_lock
+from cpython.pythread cimport PyThread_free_lock
+from cpython.pythread cimport PyThread_get_thread_ident
+from cpython.pythread cimport PyThread_release_lock
+from cpython.pythread cimport PyThread_type_lock
+from cpython.pythread cimport WAIT_LOCK
+from cpython.ref cimport Py_INCREF
+from cpython.ref cimport Py_XDECREF
+from cpython.ref cimport PyObject
 from cpython.unicode cimport PyUnicode_AsUTF8String
+from cpython.unicode cimport PyUnicode_Decode
 from cpython.unicode cimport PyUnicode_Check
-from libc.stdlib cimport free, malloc
-
+from libc.stdlib cimport free, malloc, realloc
+from libc.string cimport memcpy
+from libc.string cimport memset
+
+import argparse
+import codecs
+import csv
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import struct
 import sys
+import tempfile
+from bisect import bisect_right
+from collections import OrderedDict
+import threading
+import time
+import weakref
+from zlib import crc32
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
 try:
     from os import fsencode
 except ImportError:
@@ -27,11 +72,16 @@ except ImportError:
     else:
         _fsencoding = _getfsencoding()
     fsencode = lambda s: s.encode(_fsencoding)
+try:
+    from time import perf_counter_ns as _clock_ns
+except ImportError:
+    _clock_ns = lambda: int(time.time() * 1e9)
 
 
-cdef extern from "src/vedis.h":
+cdef extern from "src/vedis.h" nogil:
     ctypedef struct vedis
     ctypedef struct vedis_kv_cursor
+    ctypedef struct vedis_backup
 
     ctypedef struct vedis_context
     ctypedef struct vedis_value
@@ -41,8 +91,28 @@ cdef extern from "src/vedis.h":
     ctypedef unsigned long long int sxu64
     ctypedef sxi64 vedis_int64
 
+    ctypedef struct vedis_pager_stats:
+        vedis_int64 nHit
+        vedis_int64 nMiss
+        vedis_int64 nEvict
+        vedis_int64 nWorkingSet
+        vedis_int64 nDbPage
+        int nPage
+        int nCached
+        int nCacheMax
+        int iPageSize
+
+    ctypedef struct vedis_io_stats:
+        vedis_int64 nRead
+        vedis_int64 nWrite
+        vedis_int64 nSync
+        vedis_int64 nByteRead
+        vedis_int64 nByteWritten
+
     # Database.
     cdef int vedis_open(vedis **ppStore, const char *zStorage)
+    cdef int vedis_open_v2(vedis **ppStore, const char *zStorage,
+                           unsigned int iFlags)
     cdef int vedis_config(vedis *pStore, int iOp, ...)
     cdef int vedis_close(vedis *pStore)
 
@@ -50,6 +120,8 @@ cdef extern from "src/vedis.h":
     cdef int vedis_exec(vedis *pStore, const char *zCmd, int nLen)
     cdef int vedis_exec_fmt(vedis *pStore, const char *zFmt, ...)
     cdef int vedis_exec_result(vedis *pStore, vedis_value **ppOut)
+    cdef int vedis_exec_argv(vedis *pStore, const char *zName, int nNameLen, int nArg, const char **azArg, const int *anArgLen, const int *aiType)
+    cdef int vedis_exec_argv_batch(vedis *pStore, int nCmd, const char **azName, const int *anNameLen, const int *anArg, const char **azArg, const int *anArgLen, const int *aiType, int (*xConsumer)(vedis_value *, void *), void *pUserData, int *pnDone)
 
     # Foreign Command Registar
     cdef int vedis_register_command(vedis *pStore, const char *zName, int (*xCmd)(vedis_context *,int,vedis_value **), void *pUserdata)
@@ -59,14 +131,40 @@ cdef extern from "src/vedis.h":
     cdef int vedis_kv_store(vedis *pDb, const void *pKey, int nKeyLen, const void *pData, vedis_int64 nDataLen)
     cdef int vedis_kv_append(vedis *pDb, const void *pKey, int nKeyLen, const void *pData, vedis_int64 nDataLen)
     cdef int vedis_kv_fetch(vedis *pDb, const void *pKey, int nKeyLen, void *pBuf, vedis_int64 *pSize)
+    cdef int vedis_kv_fetch_callback(vedis *pDb, const void *pKey, int nKeyLen, int (*xConsumer)(const void *, unsigned int, void *), void *pUserData)
+    cdef int vedis_kv_fetch_sized_callback(vedis *pDb, const void *pKey, int nKeyLen, int (*xSize)(vedis_int64, void *), int (*xConsumer)(const void *, unsigned int, void *), void *pUserData)
     cdef int vedis_kv_delete(vedis *pDb, const void *pKey, int nKeyLen)
+    cdef int vedis_kv_expire(vedis *pDb, const void *pKey, int nKeyLen, vedis_int64 iDeadline)
+    cdef int vedis_kv_deadline(vedis *pDb, const void *pKey, int nKeyLen, vedis_int64 *pDeadline)
+    cdef int vedis_kv_expire_step(vedis *pDb, int nMax, int *pExpired)
     cdef int vedis_kv_config(vedis *pDb, int iOp, ...)
 
+    # Key/Value store cursors.
+    cdef int vedis_kv_cursor_init(vedis *pDb, vedis_kv_cursor **ppOut)
+    cdef int vedis_kv_cursor_release(vedis *pDb, vedis_kv_cursor *pCur)
+    cdef int vedis_kv_cursor_seek(vedis_kv_cursor *pCursor, const void *pKey, int nKeyLen, int iPos)
+    cdef int vedis_kv_cursor_first_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_last_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_valid_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_next_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_prev_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_key(vedis_kv_cursor *pCursor, void *pBuf, int *pnByte)
+    cdef int vedis_kv_cursor_data(vedis_kv_cursor *pCursor, void *pBuf, vedis_int64 *pnData)
+    cdef int vedis_kv_cursor_delete_entry(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_reset(vedis_kv_cursor *pCursor)
+    cdef int vedis_kv_cursor_hidden(vedis_kv_cursor *pCursor, int *pHidden)
+
     # Transactions.
     cdef int vedis_begin(vedis *pDb)
     cdef int vedis_commit(vedis *pDb)
     cdef int vedis_rollback(vedis *pDb)
 
+    # Dump and online backup.
+    cdef int vedis_dump(vedis *pStore, int (*xRecord)(int, const void *, int, const void *, vedis_int64, void *), void *pUserData)
+    cdef int vedis_backup_init(vedis *pStore, const char *zDest, vedis_backup **ppOut)
+    cdef int vedis_backup_step(vedis_backup *pBackup, int nPage, vedis_int64 *pRemaining, vedis_int64 *pTotal)
+    cdef int vedis_backup_finish(vedis_backup *pBackup)
+
     # Misc utils.
     cdef int vedis_util_random_string(vedis *pDb, char *zBuf, unsigned int buf_size)
     cdef unsigned int vedis_util_random_num(vedis *pDb)
@@ -77,6 +175,7 @@ cdef extern from "src/vedis.h":
     cdef int vedis_context_kv_store_fmt(vedis_context *pCtx,const void *pKey,int nKeyLen,const char *zFormat,...)
     cdef int vedis_context_kv_append_fmt(vedis_context *pCtx,const void *pKey,int nKeyLen,const char *zFormat,...)
     cdef int vedis_context_kv_fetch(vedis_context *pCtx,const void *pKey,int nKeyLen,void *pBuf,vedis_int64 *pBufLen)
+    cdef int vedis_context_kv_fetch_sized_callback(vedis_context *pCtx, const void *pKey, int nKeyLen, int (*xSize)(vedis_int64, void *), int (*xConsumer)(const void *, unsigned int, void *), void *pUserData)
     cdef int vedis_context_kv_delete(vedis_context *pCtx,const void *pKey,int nKeyLen)
 
     # Command Execution Context Interfaces
@@ -209,14 +308,53 @@ cdef extern from "src/vedis.h":
     cdef int VEDIS_CONFIG_DUP_EXEC_VALUE = 7
     cdef int VEDIS_CONFIG_RELEASE_DUP_VALUE = 8
     cdef int VEDIS_CONFIG_OUTPUT_CONSUMER = 9
+    cdef int VEDIS_CONFIG_PAGE_SIZE = 10
+    cdef int VEDIS_CONFIG_PAGER_STATS = 11
+    cdef int VEDIS_CONFIG_TRACK_WORKING_SET = 12
+    cdef int VEDIS_CONFIG_TABLE_STATS = 13
+    cdef int VEDIS_CONFIG_LAZY_TABLES = 14
+    cdef int VEDIS_CONFIG_LAZY_STATS = 15
+    cdef int VEDIS_CONFIG_EXPIRE_STATS = 16
+    cdef int VEDIS_CONFIG_SYNC_MODE = 17
+    cdef int VEDIS_CONFIG_JOURNAL_BUFFER = 18
+    cdef int VEDIS_CONFIG_IO_STATS = 19
+    cdef int VEDIS_CONFIG_IN_TRANSACTION = 20
+
+    # Sync modes.
+    cdef int VEDIS_SYNC_MODE_FULL = 1
+    cdef int VEDIS_SYNC_MODE_DATA = 2
+    cdef int VEDIS_SYNC_MODE_OFF = 3
 
     # Cursor seek flags.
     cdef int VEDIS_CURSOR_MATCH_EXACT = 1
     cdef int VEDIS_CURSOR_MATCH_LE = 2
     cdef int VEDIS_CURSOR_MATCH_GE = 3
 
+    # Argument types for vedis_exec_argv().
+    cdef int VEDIS_ARG_NULL = 0
+    cdef int VEDIS_ARG_STRING = 1
+    cdef int VEDIS_ARG_INT = 2
+    cdef int VEDIS_ARG_REAL = 3
+
+    # Open flags.
+    cdef unsigned int VEDIS_OPEN_READONLY = 0x00000001
+    cdef unsigned int VEDIS_OPEN_READWRITE = 0x00000002
+    cdef unsigned int VEDIS_OPEN_CREATE = 0x00000004
+    cdef unsigned int VEDIS_OPEN_NOMUTEX = 0x00000020
+    cdef unsigned int VEDIS_OPEN_OMIT_JOURNALING = 0x00000040
+    cdef unsigned int VEDIS_OPEN_MMAP = 0x00000100
+
+    # Record types reported by vedis_dump().
+    cdef int VEDIS_DUMP_KV = 1
+    cdef int VEDIS_DUMP_HASH = 2
+    cdef int VEDIS_DUMP_SET = 3
+    cdef int VEDIS_DUMP_LIST = 4
+    cdef int VEDIS_DUMP_ENTRY = 5
+    cdef int VEDIS_DUMP_ZSET = 6
+    cdef int VEDIS_DUMP_EXPIRE = 7
 
-ctypedef int (*vedis_command)(vedis_context *, int, vedis_value **) noexcept
+
+ctypedef int (*vedis_command)(vedis_context *, int, vedis_value **) noexcept nogil
 
 
 cdef bint IS_PY3K = sys.version_info[0] == 3
@@ -236,6 +374,874 @@ cdef inline bytes encode(obj):
     return result
 
 
+# State shared by the callbacks used to read a value in a single lookup. The
+# size callback is invoked once with the length of the value, either to
+# allocate a bytes object of that size or to check the size of a caller's
+# buffer, after which the data consumer copies the value into place.
+ctypedef struct fetch_state:
+    char *buf
+    vedis_int64 size
+    vedis_int64 offset
+    vedis_int64 nbytes
+    PyObject *obj
+    bint allocate
+    bint error
+
+
+cdef int _fetch_allocate(fetch_state *state) noexcept with gil:
+    try:
+        obj = PyBytes_FromStringAndSize(NULL, state.nbytes)
+    except MemoryError:
+        state.error = True
+        return VEDIS_ABORT
+    Py_INCREF(obj)
+    state.obj = <PyObject *>obj
+    state.buf = PyBytes_AS_STRING(obj)
+    state.size = state.nbytes
+    return VEDIS_OK
+
+
+cdef int _fetch_size_callback(vedis_int64 nbytes, void *user_data) noexcept nogil:
+    cdef fetch_state *state = <fetch_state *>user_data
+    state.nbytes = nbytes
+    if state.allocate:
+        return _fetch_allocate(state)
+    elif nbytes > state.size:
+        return VEDIS_ABORT
+    return VEDIS_OK
+
+
+cdef int _fetch_consumer(const void *data, unsigned int nbytes,
+                         void *user_data) noexcept nogil:
+    cdef fetch_state *state = <fetch_state *>user_data
+    if state.offset + nbytes > state.size:
+        return VEDIS_ABORT
+    memcpy(state.buf + state.offset, data, nbytes)
+    state.offset += nbytes
+    return VEDIS_OK
+
+
+cdef inline void _init_fetch_state(fetch_state *state) noexcept:
+    state.buf = NULL
+    state.size = 0
+    state.offset = 0
+    state.nbytes = -1
+    state.obj = NULL
+    state.allocate = True
+    state.error = False
+
+
+# Values read by a batch fetch are appended to a single arena, so that the
+# whole batch can be read without holding the GIL.
+ctypedef struct fetch_arena:
+    char *buf
+    size_t size
+    size_t used
+
+
+cdef int _arena_consumer(const void *data, unsigned int nbytes,
+                         void *user_data) noexcept nogil:
+    cdef fetch_arena *arena = <fetch_arena *>user_data
+    cdef size_t size
+    cdef char *buf
+    if arena.used + nbytes > arena.size:
+        size = arena.size * 2
+        if size < arena.used + nbytes:
+            size = arena.used + nbytes
+        buf = <char *>realloc(arena.buf, size)
+        if buf == NULL:
+            return VEDIS_ABORT
+        arena.buf = buf
+        arena.size = size
+    memcpy(arena.buf + arena.used, data, nbytes)
+    arena.used += nbytes
+    return VEDIS_OK
+
+
+# Number of items processed by the batch APIs for each release of the GIL.
+cdef int BATCH_SIZE = 1000
+
+def _chunked(iterable):
+    accum = []
+    for item in iterable:
+        accum.append(item)
+        if len(accum) == BATCH_SIZE:
+            yield accum
+            accum = []
+    if accum:
+        yield accum
+
+
+# Latency histograms use log-linear buckets, as popularized by HdrHistogram:
+# every power of two (in nanoseconds) is split into HIST_SUB_BUCKETS buckets,
+# so a recorded value is accurate to within 1 / HIST_SUB_BUCKETS.
+cdef enum:
+    HIST_SUB_BUCKETS = 8
+    HIST_BUCKETS = 62 * HIST_SUB_BUCKETS
+
+cdef inline int _hist_index(unsigned long long value) noexcept nogil:
+    cdef int exponent = 0
+    if value < HIST_SUB_BUCKETS:
+        return <int>value
+    while (value >> exponent) >= 2 * HIST_SUB_BUCKETS:
+        exponent += 1
+    return (exponent + 1) * HIST_SUB_BUCKETS + <int>(
+        (value >> exponent) - HIST_SUB_BUCKETS)
+
+cdef inline unsigned long long _hist_upper(int index) noexcept nogil:
+    # Largest value that is recorded in the given bucket.
+    cdef int exponent = index // HIST_SUB_BUCKETS - 1
+    if exponent < 0:
+        return <unsigned long long>index
+    return (((<unsigned long long>(index % HIST_SUB_BUCKETS +
+                                   HIST_SUB_BUCKETS + 1)) << exponent) - 1)
+
+
+cdef class LatencyHistogram(object):
+    """
+    Histogram of latencies recorded in nanoseconds.
+    """
+    cdef unsigned long long counts[HIST_BUCKETS]
+    cdef readonly unsigned long long count
+    cdef readonly unsigned long long total
+    cdef readonly unsigned long long min
+    cdef readonly unsigned long long max
+
+    def __cinit__(self):
+        self.reset()
+
+    cpdef reset(self):
+        cdef int i
+        for i in range(HIST_BUCKETS):
+            self.counts[i] = 0
+        self.count = self.total = self.min = self.max = 0
+
+    cpdef record(self, unsigned long long value):
+        """Record a latency, given in nanoseconds."""
+        self.counts[_hist_index(value)] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    cpdef unsigned long long percentile(self, double pct):
+        """
+        Return the latency, in nanoseconds, below which the given percentage
+        of the recorded latencies fall.
+        """
+        cdef unsigned long long rank, seen = 0
+        cdef int i
+        if self.count == 0:
+            return 0
+        rank = <unsigned long long>(pct / 100. * self.count + 0.5)
+        if rank < 1:
+            rank = 1
+        for i in range(HIST_BUCKETS):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(_hist_upper(i), self.max)
+        return self.max
+
+    def buckets(self):
+        """
+        Return a list of `(upper bound, cumulative count)` tuples for the
+        buckets that have recorded latencies, with bounds in nanoseconds.
+        """
+        cdef unsigned long long seen = 0
+        cdef list accum = []
+        cdef int i
+        for i in range(HIST_BUCKETS):
+            if self.counts[i]:
+                seen += self.counts[i]
+                accum.append((_hist_upper(i), seen))
+        return accum
+
+    def snapshot(self):
+        """
+        Return a dictionary describing the histogram. Latencies are given in
+        seconds, and the buckets are cumulative, as expected by Prometheus
+        and OpenMetrics histograms.
+        """
+        return {
+            'count': self.count,
+            'sum': self.total / 1e9,
+            'min': self.min / 1e9,
+            'max': self.max / 1e9,
+            'mean': (self.total / self.count / 1e9) if self.count else 0.,
+            'p50': self.percentile(50) / 1e9,
+            'p90': self.percentile(90) / 1e9,
+            'p99': self.percentile(99) / 1e9,
+            'p999': self.percentile(99.9) / 1e9,
+            'buckets': [[upper / 1e9, seen] for upper, seen in self.buckets()],
+        }
+
+
+cdef class _Operation(object):
+    cdef LatencyHistogram latency
+    cdef unsigned long long errors
+
+    def __cinit__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+
+    def snapshot(self):
+        data = self.latency.snapshot()
+        data['errors'] = self.errors
+        return data
+
+
+# Kinds of operation reported to the trace hook, and the sections of the
+# statistics they are recorded in.
+cdef enum:
+    TRACE_COMMAND = 0
+    TRACE_KV = 1
+    TRACE_TRANSACTION = 2
+    TRACE_CALLBACK = 3
+
+cdef tuple TRACE_KINDS = ('command', 'kv', 'transaction', 'callback')
+cdef tuple STATS_SECTIONS = ('commands', 'kv', 'transactions', 'callbacks')
+
+
+cdef inline _decode_name(name):
+    return name.decode('utf-8') if isinstance(name, bytes) else name
+
+
+cdef bytes _command_name(bytes command):
+    # The name of the command at the start of a command string.
+    cdef list parts = command.split(None, 1)
+    return parts[0].upper() if parts else b''
+
+
+cdef class Stats(object):
+    """
+    Counters and latency histograms collected by an instrumented
+    :py:class:`Vedis` database.
+    """
+    cdef list sections
+    cdef LatencyHistogram formatting
+    cdef readonly unsigned long long bytes_read
+    cdef readonly unsigned long long bytes_written
+    cdef double started
+
+    def __cinit__(self):
+        self.reset()
+
+    cpdef reset(self):
+        self.sections = [{}, {}, {}, {}]
+        self.formatting = LatencyHistogram()
+        self.bytes_read = self.bytes_written = 0
+        self.started = time.time()
+
+    cdef record(self, int kind, name, unsigned long long elapsed,
+                bint error):
+        cdef dict section = self.sections[kind]
+        cdef _Operation op = section.get(name)
+        if op is None:
+            op = section[name] = _Operation()
+        op.latency.record(elapsed)
+        if error:
+            op.errors += 1
+
+    def snapshot(self):
+        """
+        Return the statistics as a dictionary of plain values, which can be
+        serialized as JSON.
+        """
+        cdef int kind
+        data = {
+            'since': self.started,
+            'elapsed': time.time() - self.started,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'execute_formatting': self.formatting.snapshot(),
+        }
+        for kind in range(4):
+            data[STATS_SECTIONS[kind]] = dict(
+                (_decode_name(name), op.snapshot())
+                for name, op in self.sections[kind].items())
+        return data
+
+
+# Commands that do not change string values or hash fields, and so leave the
+# read cache untouched.
+cdef frozenset CACHE_NEUTRAL_COMMANDS = frozenset((
+    b'EXISTS', b'STRLEN', b'GET', b'MGET', b'HGET', b'HEXISTS', b'HLEN',
+    b'HMGET', b'HKEYS', b'HVALS', b'HGETALL', b'HSCAN', b'SADD', b'SCARD',
+    b'SISMEMBER', b'SPOP', b'SPEEK', b'STOP', b'SREM', b'SMEMBERS', b'SSCAN',
+    b'SDIFF', b'SINTER', b'SLEN', b'LINDEX', b'LRANGE', b'LLEN', b'LPOP',
+    b'LPUSH', b'ZADD', b'ZINCRBY', b'ZREM', b'ZSCORE', b'ZRANK', b'ZREVRANK',
+    b'ZCARD', b'ZCOUNT', b'ZRANGE', b'ZREVRANGE', b'ZRANGEBYSCORE',
+    b'ZREVRANGEBYSCORE', b'TTL', b'PTTL', b'RAND', b'GETRANDMAX', b'RANDSTR',
+    b'SOUNDEX', b'SIZE_FMT',
+    b'GETCSV', b'STRIP_TAG', b'STR_SPLIT', b'TIME', b'DATE', b'OS', b'ECHO',
+    b'PRINT', b'CMD_LIST', b'TABLE_LIST', b'VEDIS', b'BEGIN'))
+
+# Commands that change the string value stored at their first argument.
+cdef frozenset CACHE_KEY_COMMANDS = frozenset((
+    b'SET', b'SETNX', b'GETSET', b'APPEND', b'INCR', b'DECR', b'INCRBY',
+    b'DECRBY', b'EXPIRE', b'PEXPIRE', b'EXPIREAT', b'PEXPIREAT', b'PERSIST'))
+
+# Commands that do not write to the database.
+cdef frozenset READ_COMMANDS = CACHE_NEUTRAL_COMMANDS - frozenset((
+    b'SADD', b'SPOP', b'SREM', b'LPOP', b'LPUSH', b'ZADD', b'ZINCRBY',
+    b'ZREM'))
+
+
+cdef inline _cache_key(arg):
+    # The key of a command argument, encoded as by _encode_args().
+    if isinstance(arg, float):
+        return encode(repr(arg))
+    elif isinstance(arg, int):
+        return b'%d' % arg
+    return encode(arg)
+
+
+cdef inline vedis_int64 _deadline(seconds) except? -1:
+    # The deadline of a key expiring in the given number of seconds, in
+    # milliseconds since the epoch.
+    return <vedis_int64>((time.time() + seconds) * 1000)
+
+
+cdef class ReadCache(object):
+    """
+    Least recently used cache of the string values and hash fields read by
+    a :py:class:`Vedis` database, bounded by a number of entries and,
+    optionally, by the total size of the cached values.
+    """
+    cdef object entries
+    # Deadlines of the cached values of keys that expire, in milliseconds.
+    cdef dict deadlines
+    cdef readonly Py_ssize_t max_entries
+    cdef readonly Py_ssize_t max_bytes
+    cdef readonly Py_ssize_t nbytes
+    cdef readonly unsigned long long hits
+    cdef readonly unsigned long long misses
+    cdef readonly unsigned long long evictions
+    cdef readonly unsigned long long invalidations
+    # Incremented whenever an entry is invalidated, so that a value read
+    # from the database is not cached if it may have changed meanwhile.
+    cdef readonly unsigned long long generation
+
+    def __cinit__(self, Py_ssize_t max_entries, Py_ssize_t max_bytes=0):
+        if max_entries < 1:
+            raise ValueError('Read cache size must be positive.')
+        if max_bytes < 0:
+            raise ValueError('Read cache bytes must not be negative.')
+        self.entries = OrderedDict()
+        self.deadlines = {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.generation = 0
+        self.reset_stats()
+
+    cpdef reset_stats(self):
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    cdef get(self, key):
+        value = self.entries.pop(key, None)
+        if value is not None and self.deadlines:
+            deadline = self.deadlines.get(key)
+            if deadline is not None and deadline <= time.time() * 1000:
+                # The key has expired.
+                del self.deadlines[key]
+                self.nbytes -= len(value)
+                value = None
+        if value is None:
+            self.misses += 1
+            return None
+        # Re-insert the entry as the most recently used.
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    cdef put(self, key, bytes value, unsigned long long generation,
+             long long deadline=-1):
+        cdef Py_ssize_t nbytes = len(value)
+        if generation != self.generation:
+            return
+        if self.max_bytes and nbytes > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(old)
+        self.entries[key] = value
+        self.nbytes += nbytes
+        if deadline >= 0:
+            self.deadlines[key] = deadline
+        elif self.deadlines:
+            self.deadlines.pop(key, None)
+        while (len(self.entries) > self.max_entries or
+               (self.max_bytes and self.nbytes > self.max_bytes)):
+            old_key, old = self.entries.popitem(last=False)
+            self.nbytes -= len(old)
+            self.evictions += 1
+            if self.deadlines:
+                self.deadlines.pop(old_key, None)
+
+    cdef discard(self, key):
+        old = self.entries.pop(key, None)
+        self.generation += 1
+        if old is not None:
+            self.nbytes -= len(old)
+            self.invalidations += 1
+            if self.deadlines:
+                self.deadlines.pop(key, None)
+
+    cpdef clear(self):
+        """Remove every entry."""
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+        self.deadlines.clear()
+        self.nbytes = 0
+        self.generation += 1
+
+    cdef invalidate_command(self, bytes name, args):
+        # Discard the entries that a command may have changed. Commands
+        # that are not known, including user-defined commands, clear the
+        # whole cache.
+        cdef Py_ssize_t i, n = len(args)
+        name = name.upper()
+        if name in CACHE_NEUTRAL_COMMANDS:
+            return
+        elif name in CACHE_KEY_COMMANDS:
+            if n:
+                self.discard(_cache_key(args[0]))
+        elif name == b'DEL' or name == b'REMOVE':
+            for i in range(n):
+                self.discard(_cache_key(args[i]))
+        elif name == b'MSET' or name == b'MSETNX':
+            for i in range(0, n, 2):
+                self.discard(_cache_key(args[i]))
+        elif name == b'COPY' or name == b'MOVE':
+            for i in range(min(n, 2)):
+                self.discard(_cache_key(args[i]))
+        elif name == b'HSET' or name == b'HSETNX':
+            if n > 1:
+                self.discard((_cache_key(args[0]), _cache_key(args[1])))
+        elif name == b'HDEL':
+            for i in range(1, n):
+                self.discard((_cache_key(args[0]), _cache_key(args[i])))
+        elif name == b'HMSET':
+            for i in range(1, n, 2):
+                self.discard((_cache_key(args[0]), _cache_key(args[i])))
+        else:
+            self.clear()
+
+    def snapshot(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': float(self.hits) / requests if requests else 0.,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self.entries),
+            'bytes': self.nbytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes}
+
+
+DURABILITY_MODES = ('full', 'batched', 'none')
+
+
+cdef class _Durability(object):
+    # Counts the writes made since the last commit and decides when they
+    # are to be committed. Writes made inside an explicit transaction, however
+    # it was begun, are left to the transaction.
+    cdef readonly str mode
+    cdef readonly Py_ssize_t max_ops
+    cdef readonly double interval
+    cdef readonly Py_ssize_t pending
+    cdef readonly unsigned long long commits
+    cdef readonly unsigned long long writes
+    # Monotonic time by which the pending writes are to be committed.
+    cdef double deadline
+    cdef object stop
+
+    def __cinit__(self, str mode, Py_ssize_t max_ops=0, double interval=0):
+        if max_ops < 0:
+            raise ValueError('commit_every must not be negative.')
+        if interval < 0:
+            raise ValueError('commit_interval must not be negative.')
+        if mode == 'full':
+            max_ops, interval = 1, 0
+        elif mode == 'batched' and not max_ops and not interval:
+            raise ValueError('Batched durability requires commit_every or '
+                             'commit_interval.')
+        self.mode = mode
+        self.max_ops = max_ops
+        self.interval = interval
+        self.pending = 0
+        self.commits = self.writes = 0
+        self.deadline = 0
+        self.stop = None
+
+    cdef inline bint wrote(self, Py_ssize_t n, bint in_transaction):
+        # Record `n` writes, returning whether they are due to be committed.
+        if n <= 0:
+            return False
+        if not self.pending and self.interval:
+            self.deadline = time.monotonic() + self.interval
+        self.pending += n
+        self.writes += n
+        return self.due(in_transaction)
+
+    cdef bint due(self, bint in_transaction):
+        if in_transaction or not self.pending:
+            return False
+        elif self.max_ops and self.pending >= self.max_ops:
+            return True
+        return self.interval != 0 and time.monotonic() >= self.deadline
+
+    cdef committed(self, Py_ssize_t n):
+        # Writes counted while the commit was running remain pending.
+        if n:
+            self.commits += 1
+        self.pending = max(self.pending - n, 0)
+        if self.pending and self.interval:
+            self.deadline = time.monotonic() + self.interval
+
+    cdef discarded(self):
+        self.pending = 0
+
+    def snapshot(self):
+        return {
+            'mode': self.mode,
+            'commit_every': self.max_ops,
+            'commit_interval': self.interval,
+            'pending': self.pending,
+            'writes': self.writes,
+            'commits': self.commits}
+
+
+def _flush_periodically(ref, stop, double interval):
+    # Commit the pending writes of an idle database once they are due, so
+    # that the interval bounds the writes at risk even when no more writes
+    # are made. The thread only holds a weak reference to the database.
+    while not stop.wait(interval / 2):
+        db = ref()
+        if db is None:
+            return
+        try:
+            db._flush_due()
+        except Exception:
+            # The writes remain pending, so the next write that finds them
+            # due commits them and raises the error.
+            pass
+        db = None
+
+
+cdef class _Decoder(object):
+    # Decodes the strings read from a database, either with the named codec
+    # or by calling a function with the bytes.
+    cdef bytes encoding
+    cdef object fn
+
+    def __cinit__(self, decode):
+        if callable(decode):
+            self.encoding = None
+            self.fn = decode
+        else:
+            # Raises a LookupError for unknown codecs.
+            self.encoding = encode(codecs.lookup(decode).name)
+            self.fn = None
+
+    cdef decode_buffer(self, const char *buf, Py_ssize_t nbytes):
+        if self.fn is None:
+            return PyUnicode_Decode(buf, nbytes, self.encoding, NULL)
+        return self.fn(PyBytes_FromStringAndSize(buf, nbytes))
+
+    cdef decode(self, bytes value):
+        if self.fn is None:
+            return PyUnicode_Decode(value, len(value), self.encoding, NULL)
+        return self.fn(value)
+
+
+cdef unsigned int _open_flags(bint is_memory, bint readonly, bint mmap,
+                              bint journal, bint nomutex) except? 0:
+    cdef unsigned int flags
+    if readonly:
+        if is_memory:
+            raise ValueError('In-memory databases cannot be opened '
+                             'read-only.')
+        flags = VEDIS_OPEN_READONLY
+        if mmap:
+            flags |= VEDIS_OPEN_MMAP
+    elif mmap:
+        # The engine only maps databases that are opened read-only.
+        raise ValueError('mmap requires readonly=True.')
+    else:
+        flags = VEDIS_OPEN_CREATE | VEDIS_OPEN_READWRITE
+    if not journal:
+        flags |= VEDIS_OPEN_OMIT_JOURNALING
+    if nomutex:
+        flags |= VEDIS_OPEN_NOMUTEX
+    return flags
+
+
+# How the files of a database are synced when changes are committed.
+cdef dict SYNC_MODES = {
+    'full': VEDIS_SYNC_MODE_FULL,
+    'data': VEDIS_SYNC_MODE_DATA,
+    'off': VEDIS_SYNC_MODE_OFF}
+
+
+# Dumps start with a magic string and a version byte, followed by records. A
+# record is a tag followed by length-prefixed strings, lengths being encoded
+# as unsigned LEB128 varints:
+#
+#   K <key> <value>     key/value pair
+#   H|S|L|O <name>      start of a hash, set, list or sorted set
+#   e <key> <value>     entry of the last table, keys are empty for lists
+#                       and values are empty for sets. The values of sorted
+#                       sets are scores, packed as big-endian doubles
+#   T <key> <deadline>  deadline of a key in milliseconds since the epoch,
+#                       packed as a big-endian double, following every
+#                       key/value pair
+#   Z <count>           end of the dump and number of records before it
+DUMP_MAGIC = b'VEDISDMP\x01'
+cdef Py_ssize_t DUMP_BUFFER_SIZE = 65536
+cdef dict DUMP_TABLE_TAGS = {b'H': 'hash', b'S': 'set', b'L': 'list',
+                             b'O': 'zset'}
+
+
+ctypedef struct dump_state:
+    char *buf
+    Py_ssize_t size
+    Py_ssize_t capacity
+    vedis_int64 counts[8]
+    void *writer
+    bint error
+
+
+cdef class _DumpWriter(object):
+    # Holds the destination of a dump and the first error raised by it, so
+    # records can be buffered without holding the GIL.
+    cdef object write
+    cdef object exc_info
+
+    def __cinit__(self, write):
+        self.write = write
+        self.exc_info = None
+
+
+cdef inline int _put_varint(char *buf, unsigned long long value) noexcept nogil:
+    cdef int n = 0
+    while value >= 0x80:
+        buf[n] = <char>((value & 0x7f) | 0x80)
+        value >>= 7
+        n += 1
+    buf[n] = <char>value
+    return n + 1
+
+
+cdef int _dump_flush(dump_state *state) noexcept with gil:
+    cdef _DumpWriter writer = <_DumpWriter>state.writer
+    try:
+        if state.size:
+            writer.write(PyBytes_FromStringAndSize(state.buf, state.size))
+    except:
+        writer.exc_info = sys.exc_info()
+        state.error = True
+        return -1
+    state.size = 0
+    return 0
+
+
+cdef int _dump_write_direct(dump_state *state, const void *data,
+                            Py_ssize_t nbytes) noexcept with gil:
+    cdef _DumpWriter writer = <_DumpWriter>state.writer
+    try:
+        writer.write(PyBytes_FromStringAndSize(<const char *>data, nbytes))
+    except:
+        writer.exc_info = sys.exc_info()
+        state.error = True
+        return -1
+    return 0
+
+
+cdef int _dump_append(dump_state *state, const void *data,
+                      Py_ssize_t nbytes) noexcept nogil:
+    if nbytes > state.capacity - state.size:
+        if _dump_flush(state) < 0:
+            return -1
+        if nbytes > state.capacity:
+            # Large values are written without being copied.
+            return _dump_write_direct(state, data, nbytes)
+    memcpy(state.buf + state.size, data, nbytes)
+    state.size += nbytes
+    return 0
+
+
+cdef int _dump_string(dump_state *state, const void *data,
+                      vedis_int64 nbytes) noexcept nogil:
+    cdef char header[10]
+    if _dump_append(state, header, _put_varint(header, nbytes)) < 0:
+        return -1
+    if nbytes > 0:
+        return _dump_append(state, data, nbytes)
+    return 0
+
+
+cdef int _dump_record(int record_type, const void *key, int nkey,
+                      const void *data, vedis_int64 ndata,
+                      void *user_data) noexcept nogil:
+    cdef dump_state *state = <dump_state *>user_data
+    cdef char tag
+    if record_type == VEDIS_DUMP_KV:
+        tag = b'K'
+    elif record_type == VEDIS_DUMP_HASH:
+        tag = b'H'
+    elif record_type == VEDIS_DUMP_SET:
+        tag = b'S'
+    elif record_type == VEDIS_DUMP_LIST:
+        tag = b'L'
+    elif record_type == VEDIS_DUMP_ZSET:
+        tag = b'O'
+    elif record_type == VEDIS_DUMP_EXPIRE:
+        tag = b'T'
+    else:
+        tag = b'e'
+    if (_dump_append(state, &tag, 1) < 0 or
+            _dump_string(state, key, nkey) < 0):
+        return VEDIS_ABORT
+    if (record_type == VEDIS_DUMP_KV or record_type == VEDIS_DUMP_ENTRY or
+            record_type == VEDIS_DUMP_EXPIRE) and \
+            _dump_string(state, data, ndata) < 0:
+        return VEDIS_ABORT
+    state.counts[record_type] += 1
+    return VEDIS_OK
+
+
+cdef class _DumpReader(object):
+    # Reads the records of a dump from a file-like object, in blocks.
+    cdef object read
+    cdef bytes data
+    cdef Py_ssize_t pos
+
+    def __cinit__(self, read):
+        self.read = read
+        self.data = b''
+        self.pos = 0
+
+    cdef int fill(self, Py_ssize_t nbytes) except -1:
+        cdef Py_ssize_t available = len(self.data) - self.pos
+        cdef list parts
+        if available >= nbytes:
+            return 0
+        parts = [self.data[self.pos:]]
+        while available < nbytes:
+            block = self.read(max(DUMP_BUFFER_SIZE, nbytes - available))
+            if not block:
+                raise ValueError('Truncated dump.')
+            parts.append(block)
+            available += len(block)
+        self.data = b''.join(parts)
+        self.pos = 0
+        return 0
+
+    cdef bint at_eof(self) except -1:
+        if self.pos < len(self.data):
+            return False
+        self.data = self.read(DUMP_BUFFER_SIZE)
+        self.pos = 0
+        return not self.data
+
+    cdef bytes read_bytes(self, Py_ssize_t nbytes):
+        self.fill(nbytes)
+        self.pos += nbytes
+        return self.data[self.pos - nbytes:self.pos]
+
+    cdef unsigned long long read_varint(self) except? 0:
+        cdef unsigned long long value = 0
+        cdef unsigned char c
+        cdef int shift = 0
+        while True:
+            self.fill(1)
+            c = <unsigned char>(<const char *>self.data)[self.pos]
+            self.pos += 1
+            value |= <unsigned long long>(c & 0x7f) << shift
+            if c < 0x80:
+                return value
+            shift += 7
+            if shift > 63:
+                raise ValueError('Invalid length in dump.')
+
+    cdef bytes read_string(self):
+        return self.read_bytes(<Py_ssize_t>self.read_varint())
+
+
+cdef class _DumpRecords(object):
+    # Iterates over the records of a dump as (type, record) tuples, where the
+    # type is one of the types accepted by _flush_records(). Raises a
+    # ValueError if the dump is truncated or corrupt.
+    cdef _DumpReader reader
+    cdef object table_type
+    cdef bytes name
+    cdef bint complete
+    cdef readonly long long keys, tables, entries, expires
+
+    def __cinit__(self, fileobj):
+        self.reader = _DumpReader(fileobj.read)
+        if self.reader.read_bytes(len(DUMP_MAGIC)) != DUMP_MAGIC:
+            raise ValueError('Not a vedis dump.')
+        self.table_type = None
+        self.name = None
+        self.complete = False
+        self.keys = self.tables = self.entries = self.expires = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cdef _DumpReader reader = self.reader
+        while not self.complete:
+            if reader.at_eof():
+                raise ValueError('Truncated dump.')
+            tag = reader.read_bytes(1)
+            if tag == b'e':
+                if self.table_type is None:
+                    raise ValueError('Table entry outside of a table.')
+                key = reader.read_string()
+                value = reader.read_string()
+                self.entries += 1
+                if self.table_type == 'hash':
+                    return ('hash', (self.name, key, value))
+                elif self.table_type == 'set':
+                    return ('set', (self.name, key))
+                elif self.table_type == 'zset':
+                    if len(value) != 8:
+                        raise ValueError('Corrupt dump.')
+                    return ('zset', (self.name, key, _unpack_score(value)))
+                return ('list', (self.name, value))
+            elif tag == b'K':
+                self.keys += 1
+                return ('kv', (reader.read_string(), reader.read_string()))
+            elif tag == b'T':
+                key = reader.read_string()
+                value = reader.read_string()
+                if len(value) != 8:
+                    raise ValueError('Corrupt dump.')
+                self.expires += 1
+                return ('expire', (key, <vedis_int64>_unpack_score(value)))
+            elif tag in DUMP_TABLE_TAGS:
+                self.table_type = DUMP_TABLE_TAGS[tag]
+                self.name = reader.read_string()
+                self.tables += 1
+            elif tag == b'Z':
+                if <long long>reader.read_varint() != (
+                        self.keys + self.tables + self.entries +
+                        self.expires):
+                    raise ValueError('Corrupt dump.')
+                self.complete = True
+            else:
+                raise ValueError('Corrupt dump.')
+        raise StopIteration
+
+
 cdef class Vedis(object):
     """
     Vedis database wrapper.
@@ -245,45 +1251,171 @@ cdef class Vedis(object):
     cdef readonly bint is_open
     cdef readonly filename
     cdef readonly bytes encoded_filename
+    cdef readonly bint readonly
+    cdef readonly unsigned int open_flags
     cdef bint open_database
+    cdef object cache_pages
+    cdef object page_size
+    cdef object lazy_tables
+    cdef object sync_mode
+    cdef object journal_buffer
+    cdef ReadCache _cache
+    cdef _Durability _durability
+    cdef _Decoder _decoder
+    cdef bint _binary_args
+    cdef dict _commands
+    cdef object _cursors
+    cdef PyThread_type_lock _exec_lock
+    cdef unsigned long _exec_owner
+    cdef int _exec_depth
+    cdef Stats _stats
+    cdef object _trace_hook
+    cdef object __weakref__
 
     def __cinit__(self):
         self.database = <vedis *>0
         self.is_memory = False
         self.is_open = False
+        self._cursors = weakref.WeakSet()
+        self._commands = {}
+        self._stats = None
+        self._cache = None
+        self._durability = None
+        self._decoder = None
+        self._binary_args = False
+        self._trace_hook = None
+        self._exec_lock = PyThread_allocate_lock()
+        self._exec_owner = 0
+        self._exec_depth = 0
+        if not self._exec_lock:
+            raise MemoryError()
 
     def __dealloc__(self):
         if self.is_open:
-            vedis_close(self.database)
-
-    def __init__(self, filename=':mem:', open_database=True):
+            with nogil:
+                vedis_close(self.database)
+        if self._exec_lock:
+            PyThread_free_lock(self._exec_lock)
+
+    def __init__(self, filename=':mem:', open_database=True,
+                 readonly=False, mmap=False, journal=True, nomutex=False,
+                 instrument=False, cache_pages=None, page_size=None,
+                 lazy_tables=None, read_cache_size=None,
+                 read_cache_bytes=None, decode=None, durability='none',
+                 commit_every=None, commit_interval=None, sync_mode=None,
+                 journal_buffer=None):
         self.filename = filename
         self.encoded_filename = encode(filename)
         self.is_memory = filename == ':mem:'
+        self.readonly = readonly
+        self.open_flags = _open_flags(self.is_memory, readonly, mmap,
+                                      journal, nomutex)
+        if page_size is not None and self.is_memory:
+            raise ValueError('In-memory databases do not use pages.')
+        if ((sync_mode is not None or journal_buffer is not None) and
+                self.is_memory):
+            raise ValueError('In-memory databases do not use files.')
+        elif sync_mode is not None and sync_mode not in SYNC_MODES:
+            raise ValueError('sync_mode must be one of "full", "data" or '
+                             '"off".')
+        self.cache_pages = cache_pages
+        self.page_size = page_size
+        self.lazy_tables = lazy_tables
+        self.sync_mode = sync_mode
+        self.journal_buffer = journal_buffer
+        if read_cache_size is not None:
+            self._cache = ReadCache(read_cache_size, read_cache_bytes or 0)
+        elif read_cache_bytes is not None:
+            raise ValueError('read_cache_bytes requires read_cache_size.')
+        if decode is not None:
+            self._decoder = _Decoder(decode)
+        if durability not in DURABILITY_MODES:
+            raise ValueError('durability must be one of "full", "batched" '
+                             'or "none".')
+        elif durability != 'none' and self.is_memory:
+            raise ValueError('In-memory databases are not durable.')
+        if durability == 'batched':
+            if commit_every is None and commit_interval is None:
+                commit_every, commit_interval = 1000, 1.0
+            self._durability = _Durability(durability, commit_every or 0,
+                                           commit_interval or 0)
+        elif commit_every is not None or commit_interval is not None:
+            raise ValueError('commit_every and commit_interval require '
+                             'batched durability.')
+        elif durability == 'full':
+            self._durability = _Durability(durability)
         self.open_database = open_database
+        self.instrument = instrument
         if self.open_database:
             self.open()
 
     cpdef open(self):
         """Open database connection."""
         cdef int ret
+        cdef const char *filename
 
         if self.is_open: return False
 
-        self.check_call(vedis_open(
-            &self.database,
-            self.encoded_filename))
+        filename = self.encoded_filename
+        with nogil:
+            ret = vedis_open_v2(&self.database, filename, self.open_flags)
+        self.check_call(ret)
 
         self.is_open = True
+        try:
+            if self.page_size is not None:
+                self._set_page_size(self.page_size)
+            if self.cache_pages is not None:
+                self.set_cache_size(self.cache_pages)
+            if self.lazy_tables is not None:
+                self.set_lazy_tables(self.lazy_tables)
+            if self.sync_mode is not None:
+                self.set_sync_mode(self.sync_mode)
+            if self.journal_buffer is not None:
+                self.set_journal_buffer(self.journal_buffer)
+        except:
+            self.close()
+            raise
+        if (self._durability is not None and self._durability.interval and
+                not self.open_flags & VEDIS_OPEN_NOMUTEX):
+            self._durability.stop = threading.Event()
+            flusher = threading.Thread(
+                target=_flush_periodically,
+                args=(weakref.ref(self), self._durability.stop,
+                      self._durability.interval),
+                name='vedis-flusher')
+            flusher.daemon = True
+            flusher.start()
         return True
 
     cpdef close(self):
         """Close database connection."""
+        cdef int ret
+
         if not self.is_open: return False
 
-        self.check_call(vedis_close(self.database))
+        # Cursors are allocated by the database, so release them first.
+        for cursor in list(self._cursors):
+            cursor.close()
+
+        if self._durability is not None and self._durability.stop is not None:
+            self._durability.stop.set()
+            self._durability.stop = None
+
+        with nogil:
+            ret = vedis_close(self.database)
+        if self._durability is not None:
+            # Closing the database commits the pending writes.
+            self._durability.committed(self._durability.pending)
+        self.check_call(ret)
         self.is_open = False
         self.database = <vedis *>0
+        # Commands are registered with the handle that was just closed.
+        self._commands.clear()
+        if self._cache is not None:
+            # The database may be changed by another handle before it is
+            # opened again.
+            self._cache.clear()
         return True
 
     def __enter__(self):
@@ -296,78 +1428,565 @@ cdef class Vedis(object):
         self.close()
 
     cpdef disable_autocommit(self):
+        cdef int ret
         if not self.is_memory:
             # Disable autocommit for file-based databases.
-            ret = vedis_config(
-                self.database,
-                VEDIS_CONFIG_DISABLE_AUTO_COMMIT)
+            with nogil:
+                ret = vedis_config(
+                    self.database,
+                    VEDIS_CONFIG_DISABLE_AUTO_COMMIT)
             if ret != VEDIS_OK:
                 raise NotImplementedError('Error disabling autocommit for '
                                           'in-memory database.')
 
-    cpdef store(self, key, value):
-        """Store key/value."""
+    cdef _set_page_size(self, int page_size):
+        cdef int ret
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_PAGE_SIZE,
+                               page_size)
+        if ret == VEDIS_INVALID:
+            raise ValueError('Page size must be a power of two between 512 '
+                             'and 65536.')
+        elif ret == VEDIS_LOCKED:
+            # The file already exists, so its own page size is used.
+            return False
+        self.check_call(ret)
+        return True
+
+    def set_cache_size(self, int pages):
+        """
+        Set the maximum number of unused pages kept in memory. Pages beyond
+        the limit are evicted, least recently used first. A limit of zero
+        releases pages as soon as they are no longer used.
+        """
+        cdef int ret
+        if pages < 0:
+            raise ValueError('Cache size must not be negative.')
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_MAX_PAGE_CACHE,
+                               pages)
+        self.check_call(ret)
+        self.cache_pages = pages
+
+    def pager_stats(self, bint reset=False):
+        """
+        Return the page cache counters of a file database: hits, misses and
+        evictions, along with the number of pages resident in memory and
+        the size of the working set, if it is being tracked.
+        """
+        cdef vedis_pager_stats st
+        cdef int ret
+        cdef int breset = reset
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_PAGER_STATS,
+                               &st, breset)
+        self.check_call(ret)
+        requests = st.nHit + st.nMiss
+        return {
+            'hits': st.nHit,
+            'misses': st.nMiss,
+            'evictions': st.nEvict,
+            'hit_ratio': float(st.nHit) / requests if requests else 0.,
+            'resident_pages': st.nPage,
+            'cached_pages': st.nCached,
+            'cache_pages': st.nCacheMax,
+            'page_size': st.iPageSize,
+            'database_pages': st.nDbPage,
+            'working_set': st.nWorkingSet}
+
+    def track_working_set(self, bint enabled=True):
+        """
+        Start (or stop) recording the distinct pages read or written, which
+        is used by :py:meth:`advise_cache_size`. Starting again clears the
+        pages recorded so far.
+        """
+        cdef int ret
+        cdef int enable = enabled
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_TRACK_WORKING_SET,
+                               enable)
+        self.check_call(ret)
+
+    def advise_cache_size(self, headroom=0.25):
+        """
+        Suggest a cache size from the working set observed since
+        :py:meth:`track_working_set` was called, allowing `headroom` for
+        growth. The suggestion never exceeds the size of the database.
+        """
+        stats = self.pager_stats()
+        working_set = stats['working_set']
+        if not working_set:
+            raise RuntimeError('No pages recorded. Call track_working_set() '
+                               'and run a representative workload first.')
+        pages = int(math.ceil(working_set * (1. + headroom)))
+        if stats['database_pages']:
+            pages = min(pages, stats['database_pages'])
+        return {
+            'cache_pages': pages,
+            'cache_bytes': pages * stats['page_size'],
+            'current_cache_pages': stats['cache_pages'],
+            'working_set': working_set,
+            'hit_ratio': stats['hit_ratio']}
+
+    def set_sync_mode(self, mode):
+        """
+        Set how the database and journal files are synced when changes are
+        committed: with fsync() (`'full'`), with fdatasync() (`'data'`, the
+        default) or not at all (`'off'`).
+        """
+        cdef int imode
+        cdef int ret
+        if mode not in SYNC_MODES:
+            raise ValueError('sync_mode must be one of "full", "data" or '
+                             '"off".')
+        imode = SYNC_MODES[mode]
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_SYNC_MODE, imode)
+        self.check_call(ret)
+        self.sync_mode = mode
+
+    def set_journal_buffer(self, int nbytes):
+        """
+        Coalesce the writes made to the journal into writes of up to
+        `nbytes`, from the next transaction on. Zero writes the journal
+        one record at a time.
+        """
+        cdef int ret
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_JOURNAL_BUFFER,
+                               nbytes)
+        if ret == VEDIS_INVALID:
+            raise ValueError('Journal buffer must be between 0 and 16MB.')
+        self.check_call(ret)
+        self.journal_buffer = nbytes
+
+    def io_stats(self, bint reset=False):
+        """
+        Return the number of read, write and sync calls made on the files
+        of the database, and the number of bytes read and written.
+        """
+        cdef vedis_io_stats st
+        cdef int ret
+        cdef int breset = reset
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_IO_STATS, &st,
+                               breset)
+        self.check_call(ret)
+        return {
+            'reads': st.nRead,
+            'writes': st.nWrite,
+            'syncs': st.nSync,
+            'bytes_read': st.nByteRead,
+            'bytes_written': st.nByteWritten}
+
+    def set_lazy_tables(self, int max_resident):
+        """
+        Load hashes and sets from disk one entry at a time, as they are
+        accessed, keeping at most `max_resident` entries of each in memory.
+        Only affects tables loaded afterwards. Zero loads tables in full.
+        """
+        cdef int ret
+        if max_resident < 0:
+            raise ValueError('Resident entries must not be negative.')
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_LAZY_TABLES,
+                               max_resident)
+        self.check_call(ret)
+        self.lazy_tables = max_resident
+
+    def table_stats(self):
+        """
+        Return the number of hashes, sets and lists loaded in memory, how
+        many of them have changed since the last commit, and how many were
+        written by the last commit and since the database was opened.
+        """
+        cdef int tables, dirty, last
+        cdef vedis_int64 total
+        cdef int ret
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_TABLE_STATS,
+                               &tables, &dirty, &last, &total)
+        self.check_call(ret)
+        return {
+            'tables': tables,
+            'dirty_tables': dirty,
+            'last_commit': last,
+            'serialized': total}
+
+    def lazy_table_stats(self):
+        """
+        Return the number of tables being loaded on demand, their entries
+        resident in memory, and how many entries were loaded from disk and
+        evicted since the database was opened.
+        """
+        cdef int partial
+        cdef vedis_int64 resident, loads, evictions
+        cdef int ret
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_LAZY_STATS,
+                               &partial, &resident, &loads, &evictions)
+        self.check_call(ret)
+        return {
+            'partial_tables': partial,
+            'resident_entries': resident,
+            'loads': loads,
+            'evictions': evictions}
+
+    def dump(self, fileobj):
+        """
+        Write every key/value pair and every hash, set, list and sorted set to a
+        file-like object opened in binary mode, along with the deadlines of
+        the keys that expire. The database is locked while the dump runs,
+        so the dump is consistent. Returns the number of keys, tables,
+        table entries and deadlines written.
+        """
+        cdef _DumpWriter writer = _DumpWriter(fileobj.write)
+        cdef dump_state state
+        cdef char header[11]
+        cdef int ret
+
+        if not self.is_open:
+            raise ValueError('The database is not open.')
+        memset(&state, 0, sizeof(state))
+        state.buf = <char *>malloc(DUMP_BUFFER_SIZE)
+        if not state.buf:
+            raise MemoryError()
+        state.capacity = DUMP_BUFFER_SIZE
+        state.writer = <void *>writer
+        try:
+            writer.write(DUMP_MAGIC)
+            with nogil:
+                ret = vedis_dump(self.database, _dump_record, &state)
+            if state.error:
+                exc_type, exc, tb = writer.exc_info
+                raise exc.with_traceback(tb)
+            self.check_call(ret)
+            header[0] = b'Z'
+            _dump_append(&state, header, 1 + _put_varint(
+                header + 1,
+                state.counts[VEDIS_DUMP_KV] + state.counts[VEDIS_DUMP_HASH] +
+                state.counts[VEDIS_DUMP_SET] + state.counts[VEDIS_DUMP_LIST] +
+                state.counts[VEDIS_DUMP_ZSET] +
+                state.counts[VEDIS_DUMP_ENTRY] +
+                state.counts[VEDIS_DUMP_EXPIRE]))
+            if state.error or _dump_flush(&state) < 0:
+                exc_type, exc, tb = writer.exc_info
+                raise exc.with_traceback(tb)
+        finally:
+            free(state.buf)
+        return {
+            'keys': state.counts[VEDIS_DUMP_KV],
+            'tables': (state.counts[VEDIS_DUMP_HASH] +
+                       state.counts[VEDIS_DUMP_SET] +
+                       state.counts[VEDIS_DUMP_LIST] +
+                       state.counts[VEDIS_DUMP_ZSET]),
+            'entries': state.counts[VEDIS_DUMP_ENTRY],
+            'expires': state.counts[VEDIS_DUMP_EXPIRE]}
+
+    def restore(self, fileobj, int batch=10000):
+        """
+        Load a dump written by :py:meth:`~Vedis.dump`, committing every
+        `batch` records. Hashes, sets, lists and sorted sets are merged with
+        the ones already stored, and list items are appended. Raises a `ValueError`
+        if the dump is truncated or corrupt, after rolling back the batch
+        being restored.
+        """
+        cdef _DumpRecords records
+        cdef list pending = []
+        cdef Py_ssize_t n = 0
+        cdef double start = time.time()
+        pending_type = None
+
+        if batch < 1:
+            raise ValueError('Batch size must be positive.')
+        records = _DumpRecords(fileobj)
+        self.begin()
+        try:
+            for record_type, record in records:
+                if record_type != pending_type:
+                    if pending:
+                        _flush_records(self, pending_type, pending)
+                        pending = []
+                    pending_type = record_type
+                pending.append(record)
+                n += 1
+                if n == batch:
+                    _flush_records(self, pending_type, pending)
+                    pending = []
+                    n = 0
+                    self.commit()
+                    self.begin()
+            if pending:
+                _flush_records(self, pending_type, pending)
+            self.commit()
+        except:
+            self.rollback()
+            raise
+        return {
+            'keys': records.keys,
+            'tables': records.tables,
+            'entries': records.entries,
+            'expires': records.expires,
+            'elapsed': time.time() - start}
+
+    def backup(self, filename, int pages=1024, sleep=0, progress=None,
+               timeout=None):
+        """
+        Copy the database file to `filename`, `pages` pages at a time.
+        The database is only locked while a step runs, and pages written
+        through this connection after they were copied are copied again.
+        `progress`, if given, is called with the number of pages copied
+        and the total after each step. Uncommitted changes that have
+        already been written to the database file delay the end of the
+        backup, by at most `timeout` seconds if given.
+        """
+        cdef vedis_backup *handle
+        cdef bytes bfilename = encode(filename)
+        cdef const char *zfilename = bfilename
+        cdef vedis_int64 remaining = 0, total = 0
+        cdef int npages = pages
+        cdef int steps = 0
+        cdef int ret
+        cdef double start = time.time()
+
+        if self.is_memory:
+            raise ValueError('In-memory databases cannot be backed up, use '
+                             'dump() instead.')
+        if pages < 1:
+            raise ValueError('Pages per step must be positive.')
+        with nogil:
+            ret = vedis_backup_init(self.database, zfilename, &handle)
+        self.check_call(ret)
+        try:
+            while True:
+                with nogil:
+                    ret = vedis_backup_step(handle, npages, &remaining,
+                                            &total)
+                steps += 1
+                if ret == VEDIS_DONE:
+                    break
+                elif ret == VEDIS_BUSY:
+                    # Wait for the transaction to be committed.
+                    if timeout is not None and \
+                            time.time() - start > timeout:
+                        raise IOError('Timed out waiting for the database '
+                                      'to be committed.')
+                    time.sleep(sleep or 0.01)
+                    continue
+                self.check_call(ret)
+                if progress is not None:
+                    progress(total - remaining, total)
+                if sleep:
+                    time.sleep(sleep)
+        finally:
+            if self.is_open:
+                with nogil:
+                    vedis_backup_finish(handle)
+        if progress is not None:
+            progress(total, total)
+        return {
+            'pages': total,
+            'steps': steps,
+            'elapsed': time.time() - start}
+
+    def read_cache_stats(self, bint reset=False):
+        """
+        Return the counters of the read cache, or `None` if the database
+        was opened without one.
+        """
+        if self._cache is None:
+            return None
+        data = self._cache.snapshot()
+        if reset:
+            self._cache.reset_stats()
+        return data
+
+    def clear_read_cache(self):
+        """Remove every value held by the read cache."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    cpdef store(self, key, value, ttl=None):
+        """
+        Store key/value. If `ttl` is given, the key expires after `ttl`
+        seconds.
+        """
         cdef bytes encoded_key = encode(key), encoded_value = encode(value)
-        self.check_call(vedis_kv_store(
-            self.database,
-            <const char *>encoded_key,
-            -1,
-            <const char *>encoded_value,
-            len(encoded_value)))
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef const char *v = encoded_value
+        cdef vedis_int64 nv = len(encoded_value)
+        cdef vedis_int64 deadline = 0
+        cdef bint expires = ttl is not None
+        cdef unsigned long long start = self._trace_start()
+        cdef int ret
+        if expires:
+            deadline = _deadline(ttl)
+        with nogil:
+            ret = vedis_kv_store(self.database, k, nk, v, nv)
+            if ret == VEDIS_OK and expires:
+                ret = vedis_kv_expire(self.database, k, nk, deadline)
+        if self._cache is not None:
+            self._cache.discard(encoded_key)
+        if start:
+            if self._stats is not None and ret == VEDIS_OK:
+                self._stats.bytes_written += nv
+            self._trace_end(TRACE_KV, 'store', start, ret != VEDIS_OK)
+        self.check_call(ret)
+        self._wrote(1)
 
     cpdef fetch(self, key):
         """Retrieve value at given key. Raises `KeyError` if key not found."""
-        cdef bytes encoded_key = encode(key)
-        cdef char *buf = <char *>0
-        cdef vedis_int64 buf_size = 0
+        cdef bytes value = self._fetch_bytes(encode(key))
+        if self._decoder is not None:
+            return self._decoder.decode(value)
+        return value
 
-        self.check_call(vedis_kv_fetch(
-            self.database,
-            <char *>encoded_key,
-            -1,
-            <void *>0,
-            &buf_size))
+    cdef bytes _fetch_bytes(self, bytes encoded_key):
+        # Raw value at the given key, read through the read cache.
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef fetch_state state
+        cdef unsigned long long generation = 0
+        cdef unsigned long long start
+        cdef vedis_int64 deadline = -1
+        cdef bint cached = self._cache is not None
+        cdef int ret
 
-        try:
-            buf = <char *>malloc(buf_size)
-            self.check_call(vedis_kv_fetch(
+        if self._cache is not None:
+            value = self._cache.get(encoded_key)
+            if value is not None:
+                return value
+            generation = self._cache.generation
+
+        # The value is copied directly into a bytes object of the right size,
+        # using a single lookup.
+        start = self._trace_start()
+        _init_fetch_state(&state)
+        with nogil:
+            ret = vedis_kv_fetch_sized_callback(
                 self.database,
-                <char *>encoded_key,
-                -1,
-                <void *>buf,
-                &buf_size))
-            value = buf[:buf_size]
-            return value
+                k,
+                nk,
+                _fetch_size_callback,
+                _fetch_consumer,
+                <void *>&state)
+            if cached and ret == VEDIS_OK:
+                # Values of keys that expire are cached until their deadline.
+                vedis_kv_deadline(self.database, k, nk, &deadline)
+        if start:
+            self._trace_fetch(start, ret, state.offset)
+        try:
+            if state.error:
+                raise MemoryError()
+            self.check_call(ret)
+            if cached:
+                self._cache.put(encoded_key, <bytes>state.obj, generation,
+                                deadline)
+            return <bytes>state.obj
         finally:
-            free(buf)
+            Py_XDECREF(state.obj)
+
+    cpdef fetch_into(self, key, buf):
+        """
+        Read the value at the given key into a writable buffer, such as a
+        `bytearray`, `memoryview` or `mmap`. Returns the number of bytes
+        read. Raises `KeyError` if key not found and `ValueError` if the
+        buffer is too small to hold the value.
+        """
+        cdef bytes encoded_key = encode(key)
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef Py_buffer view
+        cdef fetch_state state
+        cdef unsigned long long start = self._trace_start()
+        cdef int ret
+
+        PyObject_GetBuffer(buf, &view, PyBUF_WRITABLE)
+        try:
+            _init_fetch_state(&state)
+            state.allocate = False
+            state.buf = <char *>view.buf
+            state.size = view.len
+            with nogil:
+                ret = vedis_kv_fetch_sized_callback(
+                    self.database,
+                    k,
+                    nk,
+                    _fetch_size_callback,
+                    _fetch_consumer,
+                    <void *>&state)
+        finally:
+            PyBuffer_Release(&view)
+
+        if start:
+            self._trace_fetch(start, ret, state.offset)
+        if state.nbytes > state.size:
+            raise ValueError('Buffer too small: %s bytes are required.' %
+                             state.nbytes)
+        self.check_call(ret)
+        return state.offset
+
+    def fetch_view(self, key):
+        """
+        Retrieve value at given key as a read-only `memoryview`, which can be
+        sliced without copying. The value is not decoded. Raises `KeyError`
+        if key not found.
+        """
+        # The view wraps the bytes object the value was read into by the
+        # fetch callbacks, or the one held by the read cache.
+        return memoryview(self._fetch_bytes(encode(key)))
 
     cpdef delete(self, key):
         """Delete the value stored at the given key."""
         cdef bytes bkey = encode(key)
-        self.check_call(vedis_kv_delete(self.database, <char *>bkey, -1))
+        cdef const char *k = bkey
+        cdef int nk = len(bkey)
+        cdef unsigned long long start = self._trace_start()
+        cdef int ret
+        with nogil:
+            ret = vedis_kv_delete(self.database, k, nk)
+        if self._cache is not None:
+            self._cache.discard(bkey)
+        if start:
+            self._trace_end(TRACE_KV, 'delete', start,
+                            ret != VEDIS_OK and ret != VEDIS_NOTFOUND)
+        self.check_call(ret)
+        self._wrote(1)
 
     cpdef append(self, key, value):
         """Append to the value stored in the given key."""
         cdef bytes encoded_key = encode(key), encoded_value = encode(value)
-        self.check_call(vedis_kv_append(
-            self.database,
-            <const char *>encoded_key,
-            -1,
-            <const char *>encoded_value,
-            len(encoded_value)))
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef const char *v = encoded_value
+        cdef vedis_int64 nv = len(encoded_value)
+        cdef unsigned long long start = self._trace_start()
+        cdef int ret
+        with nogil:
+            ret = vedis_kv_append(self.database, k, nk, v, nv)
+        if self._cache is not None:
+            self._cache.discard(encoded_key)
+        if start:
+            if self._stats is not None and ret == VEDIS_OK:
+                self._stats.bytes_written += nv
+            self._trace_end(TRACE_KV, 'append', start, ret != VEDIS_OK)
+        self.check_call(ret)
+        self._wrote(1)
 
     cpdef exists(self, key):
         cdef bytes encoded_key = encode(key)
-        cdef char *buf = <char *>0
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
         cdef vedis_int64 buf_size = 0
+        cdef unsigned long long start = self._trace_start()
         cdef int ret
 
-        ret = vedis_kv_fetch(
-            self.database,
-            <char *>encoded_key,
-            -1,
-            <void *>0,
-            &buf_size)
+        with nogil:
+            ret = vedis_kv_fetch(self.database, k, nk, <void *>0, &buf_size)
+        if start:
+            self._trace_end(TRACE_KV, 'exists', start,
+                            ret != VEDIS_OK and ret != VEDIS_NOTFOUND)
         if ret == VEDIS_NOTFOUND:
             return False
         elif ret == VEDIS_OK:
@@ -375,9 +1994,383 @@ cdef class Vedis(object):
 
         raise self._build_exception_for_error(ret)
 
+    cpdef bint expire(self, key, seconds):
+        """
+        Expire the given key after `seconds`, which may be a float. Returns
+        `False` if the key does not exist. Only key/value pairs expire.
+        """
+        return self._expire_at(key, _deadline(seconds))
+
+    cpdef bint expireat(self, key, timestamp):
+        """
+        Expire the given key at `timestamp`, in seconds since the epoch.
+        Returns `False` if the key does not exist.
+        """
+        return self._expire_at(key, <vedis_int64>(timestamp * 1000))
+
+    cdef bint _expire_at(self, key, vedis_int64 deadline) except -1:
+        cdef bytes encoded_key = encode(key)
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef int ret
+        with nogil:
+            ret = vedis_kv_expire(self.database, k, nk, deadline)
+        if self._cache is not None:
+            self._cache.discard(encoded_key)
+        if ret == VEDIS_NOTFOUND:
+            return False
+        self.check_call(ret)
+        self._wrote(1)
+        return True
+
+    cpdef bint persist(self, key):
+        """
+        Remove the deadline of the given key. Returns `False` if the key
+        does not exist or does not expire.
+        """
+        return self._call(b'PERSIST', (key,))
+
+    cpdef ttl(self, key):
+        """
+        Return the number of seconds before the given key expires, as a
+        float, or `None` if the key does not exist or does not expire.
+        """
+        cdef bytes encoded_key = encode(key)
+        cdef const char *k = encoded_key
+        cdef int nk = len(encoded_key)
+        cdef vedis_int64 deadline = -1
+        cdef int ret
+        with nogil:
+            ret = vedis_kv_deadline(self.database, k, nk, &deadline)
+        if ret == VEDIS_NOTFOUND:
+            return None
+        self.check_call(ret)
+        if deadline < 0:
+            return None
+        return max(deadline / 1000.0 - time.time(), 0.)
+
+    def expire_step(self, int max_keys=100):
+        """
+        Delete at most `max_keys` keys whose deadline has passed, starting
+        with the earliest deadline, and return the number of keys deleted.
+        Keys that are due are otherwise only deleted when they are next
+        read, so a long-running process should call this periodically.
+        """
+        cdef int expired = 0
+        cdef int ret
+        if max_keys < 1:
+            raise ValueError('max_keys must be positive.')
+        with nogil:
+            ret = vedis_kv_expire_step(self.database, max_keys, &expired)
+        self.check_call(ret)
+        self._wrote(expired)
+        return expired
+
+    def expire_stats(self):
+        """
+        Return the number of keys that have a deadline and the number of
+        keys expired since the database was opened.
+        """
+        cdef vedis_int64 nvolatile, expired
+        cdef int ret
+        with nogil:
+            ret = vedis_config(self.database, VEDIS_CONFIG_EXPIRE_STATS,
+                               &nvolatile, &expired)
+        self.check_call(ret)
+        return {'volatile': nvolatile, 'expired': expired}
+
     cpdef update(self, dict values):
-        for key in values:
-            self.store(key, values[key])
+        self.store_many(values)
+
+    def store_many(self, data, bint transaction=False):
+        """
+        Store multiple key/value pairs, given either as a mapping or as an
+        iterable of 2-tuples. If `transaction` is set, the pairs are stored
+        in a single transaction which is rolled back if an error occurs.
+        Returns the number of pairs stored.
+        """
+        cdef unsigned long long start = self._trace_start()
+        cdef bint error = True
+        if hasattr(data, 'items'):
+            data = data.items()
+        try:
+            if transaction:
+                with self.transaction():
+                    count = self._store_many(data)
+            else:
+                count = self._store_many(data)
+            error = False
+            return count
+        finally:
+            if start:
+                self._trace_end(TRACE_KV, 'store_many', start, error)
+
+    def fetch_many(self, keys, missing='skip'):
+        """
+        Retrieve the values of multiple keys, returning a dictionary of key
+        to value. The `missing` policy determines what happens to keys that
+        do not exist: 'skip' omits them, 'none' maps them to `None` and
+        'raise' raises a `KeyError`.
+        """
+        cdef dict accum = {}
+        cdef unsigned long long start
+        cdef bint error = True
+        if missing not in ('skip', 'none', 'raise'):
+            raise ValueError('missing must be one of "skip", "none" or '
+                             '"raise".')
+        start = self._trace_start()
+        try:
+            for chunk in _chunked(keys):
+                self._fetch_chunk(chunk, accum, missing)
+            error = False
+        finally:
+            if start:
+                self._trace_end(TRACE_KV, 'fetch_many', start, error)
+        return accum
+
+    def delete_many(self, keys, missing='skip', bint transaction=False):
+        """
+        Delete multiple keys, returning the number of keys deleted. The
+        `missing` policy determines what happens to keys that do not exist:
+        'skip' ignores them and 'raise' raises a `KeyError`. If
+        `transaction` is set, the keys are deleted in a single transaction
+        which is rolled back if an error occurs.
+        """
+        cdef unsigned long long start
+        cdef bint error = True
+        if missing not in ('skip', 'raise'):
+            raise ValueError('missing must be one of "skip" or "raise".')
+        start = self._trace_start()
+        try:
+            if transaction:
+                with self.transaction():
+                    count = self._delete_many(keys, missing == 'raise')
+            else:
+                count = self._delete_many(keys, missing == 'raise')
+            error = False
+            return count
+        finally:
+            if start:
+                self._trace_end(TRACE_KV, 'delete_many', start, error)
+
+    def exists_many(self, keys):
+        """
+        Return a list of booleans indicating whether each of the given keys
+        exists.
+        """
+        cdef list accum = []
+        cdef unsigned long long start = self._trace_start()
+        cdef bint error = True
+        try:
+            for chunk in _chunked(keys):
+                self._exists_chunk(chunk, accum)
+            error = False
+        finally:
+            if start:
+                self._trace_end(TRACE_KV, 'exists_many', start, error)
+        return accum
+
+    cdef int _store_many(self, data) except -1:
+        cdef int count = 0
+        for chunk in _chunked(data):
+            count += self._store_chunk(chunk)
+        return count
+
+    cdef int _delete_many(self, keys, bint strict) except -1:
+        cdef int count = 0
+        for chunk in _chunked(keys):
+            count += self._delete_chunk(chunk, strict)
+        return count
+
+    cdef _encode_keys(self, list chunk, list encoded, const char **zkeys,
+                      int *nkeys):
+        cdef Py_ssize_t i
+        cdef bytes bkey
+        for i in range(len(chunk)):
+            bkey = encode(chunk[i])
+            encoded.append(bkey)
+            zkeys[i] = bkey
+            nkeys[i] = len(bkey)
+
+    cdef int _store_chunk(self, list chunk) except -1:
+        cdef Py_ssize_t i, n = len(chunk)
+        cdef list encoded = []
+        cdef bytes bkey, bvalue
+        cdef const char **zkeys
+        cdef int *nkeys
+        cdef const char **zvalues
+        cdef vedis_int64 *nvalues
+        cdef int ret = VEDIS_OK
+
+        zkeys = <const char **>malloc(n * sizeof(char *))
+        nkeys = <int *>malloc(n * sizeof(int))
+        zvalues = <const char **>malloc(n * sizeof(char *))
+        nvalues = <vedis_int64 *>malloc(n * sizeof(vedis_int64))
+        try:
+            if not zkeys or not nkeys or not zvalues or not nvalues:
+                raise MemoryError()
+            for i in range(n):
+                key, value = chunk[i]
+                bkey, bvalue = encode(key), encode(value)
+                encoded.append(bkey)
+                encoded.append(bvalue)
+                zkeys[i] = bkey
+                nkeys[i] = len(bkey)
+                zvalues[i] = bvalue
+                nvalues[i] = len(bvalue)
+
+            with nogil:
+                for i in range(n):
+                    ret = vedis_kv_store(self.database, zkeys[i], nkeys[i],
+                                         zvalues[i], nvalues[i])
+                    if ret != VEDIS_OK:
+                        break
+            if self._cache is not None:
+                for i in range(0, len(encoded), 2):
+                    self._cache.discard(encoded[i])
+            self.check_call(ret)
+            if self._stats is not None:
+                for i in range(n):
+                    self._stats.bytes_written += nvalues[i]
+            self._wrote(n)
+        finally:
+            free(zkeys)
+            free(nkeys)
+            free(zvalues)
+            free(nvalues)
+        return n
+
+    cdef _fetch_chunk(self, list chunk, dict accum, missing):
+        cdef Py_ssize_t i, n = len(chunk)
+        cdef list encoded = []
+        cdef const char **zkeys
+        cdef int *nkeys
+        cdef vedis_int64 *offsets
+        cdef vedis_int64 *lengths
+        cdef fetch_arena arena
+        cdef int ret = VEDIS_OK
+
+        zkeys = <const char **>malloc(n * sizeof(char *))
+        nkeys = <int *>malloc(n * sizeof(int))
+        offsets = <vedis_int64 *>malloc(n * sizeof(vedis_int64))
+        lengths = <vedis_int64 *>malloc(n * sizeof(vedis_int64))
+        arena.size = 4096
+        arena.used = 0
+        arena.buf = <char *>malloc(arena.size)
+        try:
+            if (not zkeys or not nkeys or not offsets or not lengths or
+                    not arena.buf):
+                raise MemoryError()
+            self._encode_keys(chunk, encoded, zkeys, nkeys)
+
+            # The lengths of missing keys are stored as -1.
+            with nogil:
+                for i in range(n):
+                    offsets[i] = arena.used
+                    ret = vedis_kv_fetch_callback(self.database, zkeys[i],
+                                                  nkeys[i], _arena_consumer,
+                                                  <void *>&arena)
+                    if ret == VEDIS_OK:
+                        lengths[i] = arena.used - offsets[i]
+                    elif ret == VEDIS_NOTFOUND:
+                        lengths[i] = -1
+                    else:
+                        break
+
+            if ret != VEDIS_OK and ret != VEDIS_NOTFOUND:
+                self.check_call(ret)
+            if self._stats is not None:
+                self._stats.bytes_read += arena.used
+
+            for i in range(n):
+                if lengths[i] >= 0 and self._decoder is not None:
+                    accum[chunk[i]] = self._decoder.decode_buffer(
+                        arena.buf + offsets[i],
+                        lengths[i])
+                elif lengths[i] >= 0:
+                    accum[chunk[i]] = PyBytes_FromStringAndSize(
+                        arena.buf + offsets[i],
+                        lengths[i])
+                elif missing == 'none':
+                    accum[chunk[i]] = None
+                elif missing == 'raise':
+                    raise KeyError(chunk[i])
+        finally:
+            free(zkeys)
+            free(nkeys)
+            free(offsets)
+            free(lengths)
+            free(arena.buf)
+
+    cdef int _delete_chunk(self, list chunk, bint strict) except -1:
+        cdef Py_ssize_t i, n = len(chunk)
+        cdef list encoded = []
+        cdef const char **zkeys
+        cdef int *nkeys
+        cdef int count = 0
+        cdef int ret = VEDIS_OK
+
+        zkeys = <const char **>malloc(n * sizeof(char *))
+        nkeys = <int *>malloc(n * sizeof(int))
+        try:
+            if not zkeys or not nkeys:
+                raise MemoryError()
+            self._encode_keys(chunk, encoded, zkeys, nkeys)
+
+            with nogil:
+                for i in range(n):
+                    ret = vedis_kv_delete(self.database, zkeys[i], nkeys[i])
+                    if ret == VEDIS_OK:
+                        count += 1
+                    elif ret != VEDIS_NOTFOUND or strict:
+                        break
+            if self._cache is not None:
+                for bkey in encoded:
+                    self._cache.discard(bkey)
+            self._wrote(count)
+
+            if ret == VEDIS_NOTFOUND and strict:
+                raise KeyError(chunk[i])
+            elif ret != VEDIS_OK and ret != VEDIS_NOTFOUND:
+                self.check_call(ret)
+        finally:
+            free(zkeys)
+            free(nkeys)
+        return count
+
+    cdef _exists_chunk(self, list chunk, list accum):
+        cdef Py_ssize_t i, n = len(chunk)
+        cdef list encoded = []
+        cdef const char **zkeys
+        cdef int *nkeys
+        cdef char *found
+        cdef vedis_int64 nbytes
+        cdef int ret = VEDIS_OK
+
+        zkeys = <const char **>malloc(n * sizeof(char *))
+        nkeys = <int *>malloc(n * sizeof(int))
+        found = <char *>malloc(n * sizeof(char))
+        try:
+            if not zkeys or not nkeys or not found:
+                raise MemoryError()
+            self._encode_keys(chunk, encoded, zkeys, nkeys)
+
+            with nogil:
+                for i in range(n):
+                    ret = vedis_kv_fetch(self.database, zkeys[i], nkeys[i],
+                                         <void *>0, &nbytes)
+                    found[i] = ret == VEDIS_OK
+                    if ret != VEDIS_OK and ret != VEDIS_NOTFOUND:
+                        break
+
+            if ret != VEDIS_OK and ret != VEDIS_NOTFOUND:
+                self.check_call(ret)
+            for i in range(n):
+                accum.append(bool(found[i]))
+        finally:
+            free(zkeys)
+            free(nkeys)
+            free(found)
 
     def __setitem__(self, key, value):
         self.store(key, value)
@@ -395,26 +2388,439 @@ cdef class Vedis(object):
     def __contains__(self, key):
         return self.exists(key)
 
-    cpdef execute(self, cmd, tuple params=None, bint result=True):
-        cdef:
-            bytes bcmd = encode(cmd)
-            list escaped_params
+    def cursor(self):
+        """Create a cursor for iterating over the key/value store."""
+        cdef Cursor cursor = Cursor(self)
+        self._cursors.add(cursor)
+        return cursor
+
+    def scan(self, prefix=None, start=None, stop=None, bint keys_only=False,
+             int chunk_size=256):
+        """
+        Lazily iterate over the records in the key/value store, yielding
+        `(key, value)` tuples (or just keys if `keys_only` is set).
+
+        Records are read from the storage engine `chunk_size` at a time and
+        are returned in storage order, which is *not* sorted. Iteration
+        begins at the `start` key, if given, and ends after the `stop` key
+        has been returned. If `prefix` is given, only keys beginning with
+        the prefix are returned.
+        """
+        cdef Cursor cursor
+        cdef bytes bprefix = encode(prefix)
+        cdef bytes bstop = encode(stop)
+        cdef bytes resume
+        cdef list chunk
+
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
+
+        cursor = self.cursor()
+        try:
+            if start is not None:
+                cursor.seek(start)
+            else:
+                cursor.first()
+
+            while True:
+                chunk = cursor.read_chunk(chunk_size, bprefix, bstop,
+                                          keys_only)
+                if cursor.consumed or not cursor.is_valid():
+                    resume = None
+                else:
+                    resume = cursor._raw_key()
+
+                for item in chunk:
+                    yield item
+
+                if resume is None:
+                    break
+
+                # The store may have been modified while the chunk was being
+                # consumed, so re-position the cursor before reading more.
+                try:
+                    cursor.seek(resume)
+                except KeyError:
+                    raise RuntimeError('Key %r was removed during iteration.'
+                                       % resume)
+        finally:
+            cursor.close()
+
+    cpdef execute(self, cmd, tuple params=None, bint result=True):
+        cdef:
+            bytes bcmd = encode(cmd)
+            list escaped_params
+            const char *zcmd
+            unsigned long long start = self._trace_start()
+            int ret
 
         if params is not None:
             escaped_params = [self._escape(p) for p in params]
             bcmd = <bytes>(bcmd % tuple(escaped_params))
+            if start:
+                # Time spent formatting is recorded separately from the
+                # time spent executing the command.
+                now = _clock_ns()
+                if self._stats is not None:
+                    self._stats.formatting.record(now - start)
+                start = now
+
+        zcmd = bcmd
+        # The result of the last command is stored on the handle, so hold
+        # the exec lock until it has been converted.
+        self._acquire_exec_lock()
+        binary_args = self._binary_args
+        self._binary_args = False
+        try:
+            with nogil:
+                ret = vedis_exec(self.database, zcmd, -1)
+            if self._cache is not None:
+                # The arguments are not parsed, so only commands that do
+                # not write leave the cache untouched.
+                if _command_name(bcmd) not in CACHE_NEUTRAL_COMMANDS:
+                    self._cache.clear()
+            if start:
+                self._trace_end(TRACE_COMMAND, _command_name(bcmd), start,
+                                ret != VEDIS_OK)
+            self.check_call(ret)
+            value = self.get_result() if result else None
+            if (self._durability is not None and
+                    _command_name(bcmd) not in READ_COMMANDS):
+                self._wrote(1)
+            return value
+        finally:
+            self._binary_args = binary_args
+            self._release_exec_lock()
+
+    def call(self, name, *args):
+        """
+        Execute the command `name` with the given arguments. Unlike
+        :py:meth:`Vedis.execute`, the arguments are handed to the command
+        as-is rather than being formatted into a command string, so they
+        may contain quotes, backslashes, white-space or NUL bytes.
+        """
+        return self._call(encode(name), args)
+
+    def migrate_quotes(self):
+        """
+        Remove the backslashes that releases up to 0.7.2 stored before the
+        quotes in hashes, sets and lists, returning the number of members
+        rewritten. Only works for file-based databases.
+        """
+        cdef Cursor cursor
+        cdef list tables = []
+        cdef Py_ssize_t count = 0
+        cdef int ret
+        if self.is_memory:
+            return 0
+
+        # Tables are only known to the engine once loaded, so look for the
+        # headers of all the tables stored in the database.
+        cursor = Cursor(self)
+        try:
+            with nogil:
+                ret = vedis_kv_cursor_first_entry(cursor.cursor)
+            if ret != VEDIS_OK and ret != VEDIS_DONE:
+                raise self._build_exception_for_error(ret)
+            while cursor.is_valid():
+                if cursor._hidden():
+                    key = cursor._raw_key()
+                    if key[2:3] in (b'1', b'2', b'3') and key[:2] == b'vt':
+                        value = cursor._raw_value()
+                        if len(value) == 10 and value[:2] == b'\xca\x10':
+                            tables.append((key[2:3], key[3:]))
+                cursor._step(True)
+        finally:
+            cursor.close()
+
+        with self.transaction():
+            for kind, name in tables:
+                count += self._migrate_table(kind, name)
+        return count
+
+    cdef Py_ssize_t _migrate_table(self, bytes kind, bytes name) except -1:
+        cdef bytes target = _unescape(name)
+        cdef Py_ssize_t count = 0
+        cdef list items, migrated
+        if kind == b'1':
+            items = self._call(b'HGETALL', (name,), False)
+            for i in range(0, len(items), 2):
+                key, value = items[i], items[i + 1]
+                if (target == name and b'\\"' not in key and
+                        b'\\"' not in value):
+                    continue
+                self._call(b'HDEL', (name, key))
+                self._call(b'HSET', (target, _unescape(key), _unescape(value)))
+                count += 1
+        elif kind == b'2':
+            for member in self._call(b'SMEMBERS', (name,), False):
+                if target == name and b'\\"' not in member:
+                    continue
+                self._call(b'SREM', (name, member))
+                self._call(b'SADD', (target, _unescape(member)))
+                count += 1
+        else:
+            # The order of the items is kept by popping them all and pushing
+            # them back.
+            items = self._call(b'LRANGE', (name, 0, -1), False)
+            migrated = [_unescape(item) for item in items]
+            if target == name and migrated == items:
+                return 0
+            for old, new in zip(items, migrated):
+                self._call(b'LPOP', (name,))
+                count += old != new
+            self._call(b'LPUSH', [target] + migrated)
+        return count
+
+    cdef _call(self, bytes name, args, bint decode=True):
+        cdef:
+            Py_ssize_t n = len(args)
+            list encoded = []
+            const char *zname = name
+            int nname = len(name)
+            const char **zargs = NULL
+            int *nargs = NULL
+            int *types = NULL
+            vedis_value *value = <vedis_value *>0
+            unsigned long long start = self._trace_start()
+            int ret
+
+        if n > 0:
+            zargs = <const char **>malloc(n * sizeof(char *))
+            nargs = <int *>malloc(n * sizeof(int))
+            types = <int *>malloc(n * sizeof(int))
+            if not zargs or not nargs or not types:
+                free(zargs)
+                free(nargs)
+                free(types)
+                raise MemoryError()
+
+        try:
+            _encode_args(args, encoded, zargs, nargs, types)
+            self._acquire_exec_lock()
+            binary_args = self._binary_args
+            self._binary_args = True
+            try:
+                with nogil:
+                    ret = vedis_exec_argv(self.database, zname, nname,
+                                          <int>n, zargs, nargs, types)
+                    if ret == VEDIS_OK:
+                        vedis_exec_result(self.database, &value)
+                if self._cache is not None:
+                    self._cache.invalidate_command(name, args)
+                if start:
+                    self._trace_end(TRACE_COMMAND, name, start,
+                                    ret != VEDIS_OK)
+                self.check_call(ret)
+                # The arguments were not escaped, so neither is the result.
+                result = vedis_value_to_python(
+                    value, False, self._decoder if decode else None)
+                if (self._durability is not None and
+                        name.upper() not in READ_COMMANDS):
+                    self._wrote(1)
+                return result
+            finally:
+                self._binary_args = binary_args
+                self._release_exec_lock()
+        finally:
+            free(zargs)
+            free(nargs)
+            free(types)
 
-        self.check_call(vedis_exec(
-            self.database,
-            <const char *>bcmd,
-            -1))
-        if result:
-            return self.get_result()
+    cdef list _call_many(self, list commands):
+        # Execute a list of `(name, args, ...)` tuples in a single call into
+        # the engine, returning the result of each command.
+        cdef:
+            Py_ssize_t i, ncmd = len(commands), ntotal = 0, offset = 0
+            list encoded = []
+            list results = []
+            bytes name
+            const char **znames = NULL
+            int *nnames = NULL
+            int *counts = NULL
+            const char **zargs = NULL
+            int *nargs = NULL
+            int *types = NULL
+            int ndone = 0
+            unsigned long long start = self._trace_start()
+            int ret
+
+        if ncmd == 0:
+            return results
+
+        for i in range(ncmd):
+            ntotal += len(commands[i][1])
+
+        znames = <const char **>malloc(ncmd * sizeof(char *))
+        nnames = <int *>malloc(ncmd * sizeof(int))
+        counts = <int *>malloc(ncmd * sizeof(int))
+        zargs = <const char **>malloc((ntotal or 1) * sizeof(char *))
+        nargs = <int *>malloc((ntotal or 1) * sizeof(int))
+        types = <int *>malloc((ntotal or 1) * sizeof(int))
+        try:
+            if (not znames or not nnames or not counts or not zargs or
+                    not nargs or not types):
+                raise MemoryError()
+
+            for i in range(ncmd):
+                name, args = commands[i][0], commands[i][1]
+                znames[i] = name
+                nnames[i] = len(name)
+                counts[i] = len(args)
+                _encode_args(args, encoded, zargs + offset, nargs + offset,
+                             types + offset)
+                offset += counts[i]
+
+            state = (results, self._decoder)
+            self._acquire_exec_lock()
+            binary_args = self._binary_args
+            self._binary_args = True
+            try:
+                with nogil:
+                    ret = vedis_exec_argv_batch(
+                        self.database, <int>ncmd, znames, nnames, counts,
+                        zargs, nargs, types, _results_consumer,
+                        <void *>state, &ndone)
+                if self._cache is not None:
+                    for i in range(ncmd):
+                        self._cache.invalidate_command(commands[i][0],
+                                                       commands[i][1])
+                if start:
+                    self._trace_end(TRACE_COMMAND, 'PIPELINE', start,
+                                    ret != VEDIS_OK)
+                if self._durability is not None:
+                    self._wrote(sum(1 for i in range(ndone)
+                                    if commands[i][0].upper()
+                                    not in READ_COMMANDS))
+                if ret != VEDIS_OK:
+                    exc = self._build_exception_for_error(ret)
+                    exc.command_index = ndone
+                    raise exc
+            finally:
+                self._binary_args = binary_args
+                self._release_exec_lock()
+        finally:
+            free(znames)
+            free(nnames)
+            free(counts)
+            free(zargs)
+            free(nargs)
+            free(types)
+        return results
+
+    def pipeline(self, bint transaction=False):
+        """
+        Create a :py:class:`Pipeline` for queueing commands that are then
+        executed together.
+        """
+        return Pipeline(self, transaction)
+
+    @property
+    def instrument(self):
+        """
+        Whether per-operation counters and latency histograms are being
+        collected. Statistics are discarded when instrumentation is disabled.
+        """
+        return self._stats is not None
+
+    @instrument.setter
+    def instrument(self, enabled):
+        if not enabled:
+            self._stats = None
+        elif self._stats is None:
+            self._stats = Stats()
+
+    def stats(self, bint reset=False):
+        """
+        Return a snapshot of the statistics collected since instrumentation
+        was enabled, or `None` if instrumentation is disabled. If `reset`
+        is set, the statistics are cleared after being read.
+        """
+        if self._stats is None:
+            return None
+        data = self._stats.snapshot()
+        if self.is_open and not self.is_memory:
+            data['pager'] = self.pager_stats(reset)
+            data['tables'] = self.table_stats()
+        if self._cache is not None:
+            data['read_cache'] = self.read_cache_stats(reset)
+        if reset:
+            self._stats.reset()
+        return data
+
+    def reset_stats(self):
+        """Clear the statistics collected by an instrumented database."""
+        if self._stats is not None:
+            self._stats.reset()
+
+    def set_trace_hook(self, fn):
+        """
+        Register a callable that is invoked after every operation with the
+        kind of operation, its name and its duration in seconds. Pass
+        `None` to remove the hook. Exceptions raised by the hook are
+        reported through `sys.unraisablehook` and do not affect the
+        operation.
+        """
+        if fn is not None and not callable(fn):
+            raise TypeError('Trace hook must be callable.')
+        self._trace_hook = fn
+
+    cdef inline unsigned long long _trace_start(self):
+        # Returns zero when neither statistics nor a trace hook are enabled,
+        # so that the cost of uninstrumented calls is a pair of checks.
+        if self._stats is None and self._trace_hook is None:
+            return 0
+        return _clock_ns()
+
+    cdef _trace_end(self, int kind, name, unsigned long long start,
+                    bint error):
+        cdef unsigned long long elapsed = _clock_ns() - start
+        if self._stats is not None:
+            self._stats.record(kind, name, elapsed, error)
+        if self._trace_hook is not None:
+            hook = self._trace_hook
+            try:
+                hook(TRACE_KINDS[kind], _decode_name(name), elapsed / 1e9)
+            except Exception as exc:
+                # The operation has already run, and this may be called from
+                # a C callback, so the error is reported rather than raised.
+                PyErr_SetObject(type(exc), exc)
+                PyErr_WriteUnraisable(hook)
+
+    cdef _trace_fetch(self, unsigned long long start, int ret,
+                      vedis_int64 nbytes):
+        if self._stats is not None and ret == VEDIS_OK:
+            self._stats.bytes_read += nbytes
+        self._trace_end(TRACE_KV, 'fetch', start,
+                        ret != VEDIS_OK and ret != VEDIS_NOTFOUND)
 
     cpdef get_result(self):
         cdef vedis_value* value = <vedis_value *>0
-        vedis_exec_result(self.database, &value)
-        return vedis_value_to_python(value)
+        self._acquire_exec_lock()
+        try:
+            with nogil:
+                vedis_exec_result(self.database, &value)
+            return vedis_value_to_python(value, True, self._decoder)
+        finally:
+            self._release_exec_lock()
+
+    cdef int _acquire_exec_lock(self) except -1:
+        # Re-entrant, so that user-defined commands may call execute().
+        cdef unsigned long ident = PyThread_get_thread_ident()
+        if self._exec_depth > 0 and self._exec_owner == ident:
+            self._exec_depth += 1
+            return 0
+        with nogil:
+            PyThread_acquire_lock(self._exec_lock, WAIT_LOCK)
+        self._exec_owner = ident
+        self._exec_depth = 1
+        return 0
+
+    cdef _release_exec_lock(self):
+        self._exec_depth -= 1
+        if self._exec_depth == 0:
+            self._exec_owner = 0
+            PyThread_release_lock(self._exec_lock)
 
     cdef check_call(self, int result):
         """
@@ -455,11 +2861,12 @@ cdef class Vedis(object):
         cdef int size
         cdef char *zBuf
 
-        ret = vedis_config(
-            self.database,
-            VEDIS_CONFIG_ERR_LOG,
-            &zBuf,
-            &size)
+        with nogil:
+            ret = vedis_config(
+                self.database,
+                VEDIS_CONFIG_ERR_LOG,
+                &zBuf,
+                &size)
         if ret != VEDIS_OK or size == 0:
             return None
 
@@ -467,32 +2874,140 @@ cdef class Vedis(object):
 
     cpdef begin(self):
         """Begin a new transaction. Only works for file-based databases."""
+        cdef unsigned long long start
+        cdef int ret
         if self.is_memory:
             return False
 
-        self.check_call(vedis_begin(self.database))
+        start = self._trace_start()
+        if self._durability is not None:
+            # Writes made inside the transaction are not committed until
+            # the transaction is. The exec lock keeps the flusher thread
+            # from committing between its check and the transaction start.
+            self._acquire_exec_lock()
+            try:
+                with nogil:
+                    ret = vedis_begin(self.database)
+            finally:
+                self._release_exec_lock()
+        else:
+            with nogil:
+                ret = vedis_begin(self.database)
+        if start:
+            self._trace_end(TRACE_TRANSACTION, 'begin', start, ret != VEDIS_OK)
+        self.check_call(ret)
         return True
 
     cpdef commit(self):
         """Commit current transaction. Only works for file-based databases."""
+        cdef unsigned long long start
+        cdef Py_ssize_t pending = 0
+        cdef int ret
         if self.is_memory:
             return False
 
-        self.check_call(vedis_commit(self.database))
+        start = self._trace_start()
+        if self._durability is not None:
+            pending = self._durability.pending
+        with nogil:
+            ret = vedis_commit(self.database)
+        if ret != VEDIS_OK and self._cache is not None:
+            # A failed commit rolls the transaction back.
+            self._cache.clear()
+        if self._durability is not None:
+            if ret == VEDIS_OK:
+                self._durability.committed(pending)
+            else:
+                self._durability.discarded()
+        if start:
+            self._trace_end(TRACE_TRANSACTION, 'commit', start, ret != VEDIS_OK)
+        self.check_call(ret)
         return True
 
     cpdef rollback(self):
         """Rollback current transaction. Only works for file-based databases."""
+        cdef unsigned long long start
+        cdef int ret
         if self.is_memory:
             return False
 
-        self.check_call(vedis_rollback(self.database))
+        start = self._trace_start()
+        with nogil:
+            ret = vedis_rollback(self.database)
+        if self._cache is not None:
+            self._cache.clear()
+        if self._durability is not None:
+            self._durability.discarded()
+        if start:
+            self._trace_end(TRACE_TRANSACTION, 'rollback', start, ret != VEDIS_OK)
+        self.check_call(ret)
         return True
 
     def transaction(self):
         """Create context manager for wrapping a transaction."""
         return Transaction(self)
 
+    cpdef flush(self):
+        """
+        Commit the writes that have not yet been committed. Returns `False`
+        without committing while a transaction is open, as its writes are
+        left for it to commit or roll back. Only works for file-based
+        databases.
+        """
+        self._acquire_exec_lock()
+        try:
+            if self.is_memory or self._in_transaction():
+                return False
+            return self.commit()
+        finally:
+            self._release_exec_lock()
+
+    @property
+    def durability(self):
+        """
+        When writes are committed: after every write (`'full'`), in
+        batches (`'batched'`) or only when asked to (`'none'`).
+        """
+        if self._durability is None:
+            return 'none'
+        return self._durability.mode
+
+    def durability_stats(self):
+        """
+        Return the number of writes that are pending and the numbers of
+        writes and commits made by the durability mode, or `None` if the
+        database was opened without one.
+        """
+        if self._durability is None:
+            return None
+        return self._durability.snapshot()
+
+    cdef int _wrote(self, Py_ssize_t n) except -1:
+        # Called after `n` writes were made, committing them once they are
+        # due according to the durability mode.
+        if (self._durability is not None and
+                self._durability.wrote(n, self._in_transaction())):
+            self.commit()
+        return 0
+
+    cdef bint _in_transaction(self):
+        # Whether a transaction was begun, by begin() or by a BEGIN command
+        # run through execute(), call() or a pipeline, and has not ended.
+        cdef int is_open = 0
+        vedis_config(self.database, VEDIS_CONFIG_IN_TRANSACTION, &is_open)
+        return is_open
+
+    def _flush_due(self):
+        # Called by the flusher thread to commit writes that have been
+        # pending for longer than the commit interval.
+        self._acquire_exec_lock()
+        try:
+            if (self.is_open and self._durability is not None and
+                    self._durability.due(self._in_transaction())):
+                self.commit()
+        finally:
+            self._release_exec_lock()
+
     def commit_on_success(self, fn):
         def wrapper(*args, **kwargs):
             with self.transaction():
@@ -504,57 +3019,61 @@ cdef class Vedis(object):
         cdef char *buf
         buf = <char *>malloc(nbytes * sizeof(char))
         try:
-            vedis_util_random_string(self.database, buf, nbytes)
+            with nogil:
+                vedis_util_random_string(self.database, buf, nbytes)
             return bytes(buf[:nbytes])
         finally:
             free(buf)
 
-    cpdef int random_int(self):
+    cpdef unsigned int random_int(self):
         """Generate a random integer."""
-        return vedis_util_random_num(self.database)
+        cdef unsigned int ret
+        with nogil:
+            ret = vedis_util_random_num(self.database)
+        return ret
 
     # Misc.
     cpdef bint copy(self, src, dest):
-        return self.execute(b'COPY %s %s', (src, dest))
+        return self._call(b'COPY', (src, dest))
 
     cpdef bint move(self, src, dest):
-        return self.execute(b'MOVE %s %s', (src, dest))
+        return self._call(b'MOVE', (src, dest))
 
     cpdef int rand(self, int minimum, int maximum):
-        return self.execute(b'RAND %d %d' % (minimum, maximum))
+        return self._call(b'RAND', (minimum, maximum))
 
     cpdef randstr(self, int nbytes):
-        return self.execute(b'RANDSTR %d' % nbytes)
+        return self._call(b'RANDSTR', (nbytes,))
 
     cpdef time(self):
-        return self.execute(b'TIME')
+        return self._call(b'TIME', ())
 
     cpdef date(self):
-        return self.execute(b'DATE')
+        return self._call(b'DATE', ())
 
     cpdef operating_system(self):
-        return self.execute(b'OS')
+        return self._call(b'OS', ())
 
     cpdef strip_tags(self, html):
-        return self.execute(b'STRIP_TAG %s', (html,))
+        return self._call(b'STRIP_TAG', (html,))
 
     cpdef list str_split(self, s, int nchars=1):
-        return self.execute(b'STR_SPLIT %%s %d' % nchars, (s,))
+        return self._call(b'STR_SPLIT', (s, nchars))
 
     cpdef size_format(self, int nbytes):
-        return self.execute(b'SIZE_FMT %d' % nbytes)
+        return self._call(b'SIZE_FMT', (nbytes,))
 
     cpdef soundex(self, s):
-        return self.execute(b'SOUNDEX %s', (s,))
+        return self._call(b'SOUNDEX', (s,))
 
     cpdef base64(self, data):
-        return self.execute(b'BASE64 %s', (data,))
+        return self._call(b'BASE64', (data,))
 
     cpdef base64_decode(self, data):
-        return self.execute(b'BASE64_DEC %s', (data,))
+        return self._call(b'BASE64_DEC', (data,))
 
     cpdef list table_list(self):
-        return self.execute(b'TABLE_LIST')
+        return self._call(b'TABLE_LIST', ())
 
     # Strings.
     cpdef get(self, key):
@@ -564,176 +3083,267 @@ cdef class Vedis(object):
         return self.store(key, value)
 
     cpdef list mget(self, list keys):
-        return self.execute(b'MGET %s' % self._flatten_list(keys))
+        return self._call(b'MGET', keys)
 
     cpdef bint mset(self, dict kw):
-        return self.execute(b'MSET %s' % self._flatten(kw))
+        return self._call(b'MSET', self._flatten(kw))
 
     cpdef bint setnx(self, key, value):
-        return self.execute(b'SETNX %s %s', (key, value))
+        return self._call(b'SETNX', (key, value))
 
     cpdef bint msetnx(self, dict kw):
-        return self.execute(b'MSETNX %s' % self._flatten(kw))
+        return self._call(b'MSETNX', self._flatten(kw))
 
     cpdef get_set(self, key, value):
-        return self.execute(b'GETSET %s %s', (key, value))
+        return self._call(b'GETSET', (key, value))
 
-    cpdef int strlen(self, key):
-        return self.execute(b'STRLEN %s', (key,))
+    cpdef long long strlen(self, key):
+        return self._call(b'STRLEN', (key,))
 
     # Counters.
-    cpdef int incr(self, key):
-        return self.execute(b'INCR %s', (key,))
+    cpdef long long incr(self, key):
+        return self._call(b'INCR', (key,))
 
-    cpdef int decr(self, key):
-        return self.execute(b'DECR %s', (key,))
+    cpdef long long decr(self, key):
+        return self._call(b'DECR', (key,))
 
-    cpdef int incr_by(self, key, int amount):
-        return self.execute(b'INCRBY %%s %d' % amount, (key,))
+    cpdef long long incr_by(self, key, long long amount):
+        return self._call(b'INCRBY', (key, amount))
 
-    cpdef int decr_by(self, key, int amount):
-        return self.execute(b'DECRBY %%s %d' % amount, (key,))
+    cpdef long long decr_by(self, key, long long amount):
+        return self._call(b'DECRBY', (key, amount))
 
     # Hash methods.
     cpdef bint hset(self, hash_key, key, value):
-        return self.execute(b'HSET %s %s %s', (hash_key, key, value))
+        return self._call(b'HSET', (hash_key, key, value))
 
     cpdef bint hsetnx(self, hash_key, key, value):
-        return self.execute(b'HSETNX %s %s %s', (hash_key, key, value))
+        return self._call(b'HSETNX', (hash_key, key, value))
 
     cpdef hget(self, hash_key, key):
-        return self.execute(b'HGET %s %s', (hash_key, key))
+        cdef unsigned long long generation
+        if self._cache is None:
+            return self._call(b'HGET', (hash_key, key))
+        cache_key = (_cache_key(hash_key), _cache_key(key))
+        value = self._cache.get(cache_key)
+        if value is None:
+            generation = self._cache.generation
+            value = self._call(b'HGET', (hash_key, key), False)
+            if not isinstance(value, bytes):
+                return value
+            self._cache.put(cache_key, value, generation)
+        if self._decoder is not None:
+            return self._decoder.decode(value)
+        return value
 
-    cpdef int hdel(self, hash_key, key):
-        return self.execute(b'HDEL %s %s', (hash_key, key))
+    cpdef long long hdel(self, hash_key, key):
+        return self._call(b'HDEL', (hash_key, key))
 
-    cpdef int hmdel(self, hash_key, list keys):
-        return self.execute(
-            b'HDEL %%s %s' % self._flatten_list(keys),
-            (hash_key,))
+    cpdef long long hmdel(self, hash_key, list keys):
+        return self._call(b'HDEL', [hash_key] + keys)
 
     cpdef list hkeys(self, hash_key):
-        return self.execute(b'HKEYS %s', (hash_key,))
+        return self._call(b'HKEYS', (hash_key,))
 
     cpdef list hvals(self, hash_key):
-        return self.execute(b'HVALS %s', (hash_key,))
+        return self._call(b'HVALS', (hash_key,))
 
     cpdef dict hgetall(self, hash_key):
-        cdef list results
-        results = self.execute(b'HGETALL %s', (hash_key,))
-        if results:
-            return dict(zip(results[::2], results[1::2]))
-        else:
-            return {}
+        return _pairs_to_dict(self._call(b'HGETALL', (hash_key,)))
 
     cpdef list hitems(self, hash_key):
+        return _pairs_to_list(self._call(b'HGETALL', (hash_key,)))
+
+    cpdef tuple hscan(self, hash_key, long long cursor=0, int count=10):
+        """
+        Read up to `count` items from the hash, starting at `cursor`.
+        Returns a 2-tuple of the cursor for the next call, which is 0 once
+        all items have been read, and a list of `(key, value)` tuples.
+        """
         cdef list results
-        results = self.execute(b'HGETALL %s', (hash_key,))
-        if results:
-            return list(zip(results[::2], results[1::2]))
-        else:
-            return []
+        results = self._call(b'HSCAN', (hash_key, cursor, count))
+        if results is None:
+            raise RuntimeError('Invalid scan cursor: %s.' % cursor)
+        return (results[0], _pairs_to_list(results[1:]))
 
-    cpdef int hlen(self, hash_key):
-        return self.execute(b'HLEN %s', (hash_key,))
+    cpdef long long hlen(self, hash_key):
+        return self._call(b'HLEN', (hash_key,))
 
     cpdef bint hexists(self, hash_key, key):
-        return self.execute(b'HEXISTS %s %s', (hash_key, key))
+        return self._call(b'HEXISTS', (hash_key, key))
 
-    cpdef int hmset(self, hash_key, dict data):
-        return self.execute(
-            b'HMSET %%s %s' % self._flatten(data),
-            (hash_key,))
+    cpdef long long hmset(self, hash_key, dict data):
+        return self._call(b'HMSET', [hash_key] + self._flatten(data))
 
     cpdef list hmget(self, hash_key, list keys):
-        return self.execute(
-            b'HMGET %%s %s' % self._flatten_list(keys),
-            (hash_key,))
+        return self._call(b'HMGET', [hash_key] + keys)
 
     # Set methods.
-    cpdef int sadd(self, key, value):
-        return self.execute(b'SADD %s %s', (key, value))
+    cpdef long long sadd(self, key, value):
+        return self._call(b'SADD', (key, value))
 
-    cpdef int smadd(self, key, list values):
-        return self.execute(
-            b'SADD %%s %s' % self._flatten_list(values),
-            (key,))
+    cpdef long long smadd(self, key, list values):
+        return self._call(b'SADD', [key] + values)
 
-    cpdef int scard(self, key):
-        return self.execute(b'SCARD %s', (key,))
+    cpdef long long scard(self, key):
+        return self._call(b'SCARD', (key,))
 
     cpdef bint sismember(self, key, value):
-        return self.execute(b'SISMEMBER %s %s', (key, value))
+        return self._call(b'SISMEMBER', (key, value))
 
     cpdef spop(self, key):
-        return self.execute(b'SPOP %s', (key,))
+        return self._call(b'SPOP', (key,))
 
     cpdef speek(self, key):
-        return self.execute(b'SPEEK %s', (key,))
+        return self._call(b'SPEEK', (key,))
 
     cpdef stop(self, key):
-        return self.execute(b'STOP %s', (key,))
+        return self._call(b'STOP', (key,))
 
     cpdef bint srem(self, key, value):
-        return self.execute(b'SREM %s %s', (key, value))
+        return self._call(b'SREM', (key, value))
 
-    cpdef int smrem(self, key, list values):
-        return self.execute(
-            b'SREM %%s %s' % self._flatten_list(values),
-            (key,))
+    cpdef long long smrem(self, key, list values):
+        return self._call(b'SREM', [key] + values)
 
     cpdef set smembers(self, key):
         cdef list results
-        results = self.execute(b'SMEMBERS %s', (key,))
+        results = self._call(b'SMEMBERS', (key,))
         return set(results)
 
     cpdef set sdiff(self, k1, k2):
         cdef list results
-        results = self.execute(b'SDIFF %s %s', (k1, k2))
+        results = self._call(b'SDIFF', (k1, k2))
         return set(results)
 
     cpdef set sinter(self, k1, k2):
         cdef list results
-        results = self.execute(b'SINTER %s %s', (k1, k2))
+        results = self._call(b'SINTER', (k1, k2))
         return set(results)
 
-    cpdef int slen(self, key):
-        return self.execute(b'SLEN %s', (key,))
+    cpdef long long slen(self, key):
+        return self._call(b'SLEN', (key,))
+
+    cpdef tuple sscan(self, key, long long cursor=0, int count=10):
+        """
+        Read up to `count` members from the set, starting at `cursor`.
+        Returns a 2-tuple of the cursor for the next call, which is 0 once
+        all members have been read, and a list of members.
+        """
+        cdef list results
+        results = self._call(b'SSCAN', (key, cursor, count))
+        if results is None:
+            raise RuntimeError('Invalid scan cursor: %s.' % cursor)
+        return (results[0], results[1:])
+
+    def _iter_table(self, bytes command, key, int batch_size, mode=None):
+        # Generator over the entries of a hash or set, reading `batch_size`
+        # entries at a time with HSCAN or SSCAN.
+        cdef long long cursor = 0
+        cdef list results
+        while True:
+            if mode is None:
+                results = self._call(command, (key, cursor, batch_size))
+            else:
+                results = self._call(command, (key, cursor, batch_size, mode))
+            if results is None:
+                raise RuntimeError('Invalid scan cursor: %s.' % cursor)
+            cursor = results[0]
+            for item in results[1:]:
+                yield item
+            if cursor == 0:
+                break
 
     # List methods.
     cpdef lindex(self, key, int index):
-        return self.execute(b'LINDEX %%s %d' % index, (key,))
+        return self._call(b'LINDEX', (key, index))
+
+    cpdef long long llen(self, key):
+        return self._call(b'LLEN', (key,))
 
-    cpdef int llen(self, key):
-        return self.execute(b'LLEN %s', (key,))
+    cpdef list lrange(self, key, int start=0, int stop=-1):
+        return self._call(b'LRANGE', (key, start, stop))
 
     cpdef lpop(self, key):
-        return self.execute(b'LPOP %s', (key,))
+        return self._call(b'LPOP', (key,))
 
-    cpdef int lpush(self, key, value):
-        return self.execute(b'LPUSH %s %s', (key, value))
+    cpdef long long lpush(self, key, value):
+        return self._call(b'LPUSH', (key, value))
 
-    cpdef int lmpush(self, key, list values):
-        return self.execute(
-            b'LPUSH %%s %s' % self._flatten_list(values),
-            (key,))
+    cpdef long long lmpush(self, key, list values):
+        return self._call(b'LPUSH', [key] + values)
 
-    cpdef int lpushx(self, key, value):
-        return self.execute(b'LPUSHX %s %s', (key, value))
+    cpdef long long lpushx(self, key, value):
+        return self._call(b'LPUSHX', (key, value))
 
-    cpdef int lmpushx(self, key, list values):
-        return self.execute(
-            b'LPUSHX %%s %s' % self._flatten_list(values),
-            (key,))
+    cpdef long long lmpushx(self, key, list values):
+        return self._call(b'LPUSHX', [key] + values)
 
-    # Internal helpers.
-    cdef _flatten_list(self, list args):
-        return b' '.join(self._escape(key) for key in args)
+    # Sorted set methods.
+    cpdef long long zadd(self, key, dict members):
+        return self._call(b'ZADD', _zadd_args(key, members))
+
+    cpdef zincrby(self, key, member, increment=1):
+        return _to_score(self._call(
+            b'ZINCRBY', (key, _score_arg(increment), member)))
+
+    cpdef long long zrem(self, key, member):
+        return self._call(b'ZREM', (key, member))
+
+    cpdef long long zmrem(self, key, list members):
+        return self._call(b'ZREM', [key] + members)
+
+    cpdef zscore(self, key, member):
+        return _to_score(self._call(b'ZSCORE', (key, member)))
+
+    cpdef zrank(self, key, member):
+        return self._call(b'ZRANK', (key, member))
+
+    cpdef zrevrank(self, key, member):
+        return self._call(b'ZREVRANK', (key, member))
+
+    cpdef long long zcard(self, key):
+        return self._call(b'ZCARD', (key,))
 
-    cdef _flatten(self, dict kwargs):
-        return b' '.join(
-            b'%s %s' % (self._escape(key), self._escape(kwargs[key]))
-            for key in kwargs)
+    cpdef long long zcount(self, key, low='-inf', high='+inf'):
+        return self._call(b'ZCOUNT', (key, _score_arg(low), _score_arg(high)))
+
+    cpdef list zrange(self, key, long long start=0, long long stop=-1,
+                      bint withscores=False):
+        cdef list results
+        results = self._call(b'ZRANGE', _zrange_args(key, start, stop,
+                                                     withscores))
+        return _score_pairs(results) if withscores else results
+
+    cpdef list zrevrange(self, key, long long start=0, long long stop=-1,
+                         bint withscores=False):
+        cdef list results
+        results = self._call(b'ZREVRANGE', _zrange_args(key, start, stop,
+                                                        withscores))
+        return _score_pairs(results) if withscores else results
+
+    cpdef list zrangebyscore(self, key, low='-inf', high='+inf',
+                             bint withscores=False, offset=None, count=None):
+        cdef list results
+        results = self._call(b'ZRANGEBYSCORE', _zrangebyscore_args(
+            key, low, high, withscores, offset, count))
+        return _score_pairs(results) if withscores else results
+
+    cpdef list zrevrangebyscore(self, key, high='+inf', low='-inf',
+                                bint withscores=False, offset=None,
+                                count=None):
+        cdef list results
+        results = self._call(b'ZREVRANGEBYSCORE', _zrangebyscore_args(
+            key, high, low, withscores, offset, count))
+        return _score_pairs(results) if withscores else results
+
+    # Internal helpers.
+    cdef list _flatten(self, dict kwargs):
+        cdef list accum = []
+        for key in kwargs:
+            accum.append(key)
+            accum.append(kwargs[key])
+        return accum
 
     cdef bytes _escape(self, s):
         cdef bytes bkey = encode(s)
@@ -744,45 +3354,53 @@ cdef class Vedis(object):
     def lib_version(self):
         return vedis_lib_version()
 
-    cpdef Hash(self, key):
-        return Hash(self, key)
+    cpdef Hash(self, key, int batch_size=BATCH_SIZE):
+        return Hash(self, key, batch_size)
+
+    cpdef Set(self, key, int batch_size=BATCH_SIZE):
+        return Set(self, key, batch_size)
 
-    cpdef Set(self, key):
-        return Set(self, key)
+    cpdef List(self, key, int batch_size=BATCH_SIZE):
+        return List(self, key, batch_size)
 
-    cpdef List(self, key):
-        return List(self, key)
+    cpdef ZSet(self, key, int batch_size=BATCH_SIZE):
+        return ZSet(self, key, batch_size)
 
-    def register(self, command_name):
+    def register(self, command_name, bint lazy=False):
+        """
+        Decorator that registers a function as a user-defined command of
+        this database. If `lazy` is set, the function receives the context
+        and a :py:class:`CommandArgs`, which converts the arguments as they
+        are accessed, instead of the converted arguments.
+        """
         cdef bytes cmd = encode(command_name)
         def decorator(fn):
-            cdef vedis_command command_callback
-
-            py_command_registry[cmd] = fn
-            command_callback = py_command_wrapper
-            self.check_call(vedis_register_command(
-                self.database,
-                <const char *>cmd,
-                command_callback,
-                <void *>cmd))
+            cdef _Command command = _Command(cmd, fn, self, lazy)
+            cdef vedis_command command_callback = py_command_wrapper
+            cdef const char *zname = cmd
+            cdef void *user_data = <void *>command
+            cdef int ret
+
+            with nogil:
+                ret = vedis_register_command(
+                    self.database,
+                    zname,
+                    command_callback,
+                    user_data)
+            self.check_call(ret)
+            # The engine only holds a borrowed pointer to the command.
+            self._commands[cmd] = command
 
             def wrapper(*args):
-                direct_params, params = [], []
-                command_string = [encode(command_name)]
+                cdef list params = []
                 for arg in args:
                     if isinstance(arg, (list, tuple)):
-                        direct_params.append(self._flatten_list(arg))
-                        command_string.append(b'%s')
+                        params.extend(arg)
                     elif isinstance(arg, dict):
-                        direct_params.append(self._flatten(arg))
-                        command_string.append(b'%s')
+                        params.extend(self._flatten(arg))
                     else:
                         params.append(arg)
-                        command_string.append(b'%%s')
-
-                return self.execute(
-                    b' '.join(command_string) % direct_params,
-                    tuple(params))
+                return self._call(cmd, params)
 
             wrapper.wrapped = fn
             return wrapper
@@ -790,32 +3408,135 @@ cdef class Vedis(object):
 
     def delete_command(self, command_name):
         cdef bytes cmd_name = encode(command_name)
-        self.check_call(vedis_delete_command(
-            self.database,
-            <const char *>cmd_name))
-
-
-cdef dict py_command_registry = {}
-
-
-cdef int py_command_wrapper(vedis_context *context, int nargs, vedis_value **values) noexcept:
+        cdef const char *zname = cmd_name
+        cdef int ret
+        with nogil:
+            ret = vedis_delete_command(self.database, zname)
+        self.check_call(ret)
+        self._commands.pop(cmd_name, None)
+
+
+cdef class _Command(object):
+    # A user-defined command. A pointer to the instance is the user data of
+    # the command, so no lookup is needed to dispatch a call, and the
+    # context and argument wrappers are reused from one call to the next.
+    cdef bytes name
+    cdef object fn
+    cdef object db_ref
+    cdef bint lazy
+    cdef int depth
+    cdef VedisContext context
+    cdef CommandArgs args
+
+    def __cinit__(self, bytes name, fn, Vedis db, bint lazy):
+        self.name = name
+        self.fn = fn
+        # A weak reference to the database is kept so that the time spent
+        # in the callback can be reported to it.
+        self.db_ref = weakref.ref(db)
+        self.lazy = lazy
+        self.depth = 0
+        self.context = VedisContext()
+        self.args = CommandArgs()
+
+
+cdef int py_command_wrapper(vedis_context *context, int nargs, vedis_value **values) noexcept with gil:
+    cdef _Command command = <_Command>vedis_context_user_data(context)
+    cdef VedisContext context_wrapper = command.context
+    cdef CommandArgs args = command.args
+    cdef Vedis db = command.db_ref()
+    cdef unsigned long long start = 0
+    cdef bint error = False
+    # Arguments are escaped when the command comes from a command string.
+    cdef bint unescape = db is None or not db._binary_args
     cdef int i
-    cdef list converted = []
-    cdef VedisContext context_wrapper = VedisContext()
-    cdef bytes command_name = <bytes>vedis_context_user_data(context)
 
+    if command.depth > 0:
+        # The command is being called by itself, so the wrappers in use by
+        # the outer call must be left alone.
+        context_wrapper = VedisContext()
+        args = CommandArgs()
     context_wrapper.set_context(context)
+    if db is not None:
+        start = db._trace_start()
 
-    for i in range(nargs):
-        converted.append(vedis_value_to_python(values[i]))
-
+    command.depth += 1
     try:
-        ret = py_command_registry[command_name](context_wrapper, *converted)
+        if command.lazy:
+            args.set_values(nargs, values, unescape)
+            ret = command.fn(context_wrapper, args)
+        else:
+            ret = command.fn(context_wrapper, *[
+                vedis_value_to_python(values[i], unescape)
+                for i in range(nargs)])
     except:
+        error = True
+    finally:
+        command.depth -= 1
+        if command.lazy:
+            args.release()
+    if start:
+        db._trace_end(TRACE_CALLBACK, command.name, start, error)
+    if error:
         return VEDIS_ABORT
-    else:
-        push_result(context, ret)
-        return VEDIS_OK
+    push_result(context, ret)
+    return VEDIS_OK
+
+
+cdef class CommandArgs(object):
+    """
+    The arguments of a user-defined command registered with `lazy=True`.
+    Arguments are converted to Python values as they are accessed, and can
+    only be accessed while the command runs.
+    """
+    cdef vedis_value **values
+    cdef int nargs
+    cdef bint unescape
+    cdef bint active
+
+    def __cinit__(self):
+        self.values = NULL
+        self.nargs = 0
+        self.active = False
+
+    cdef set_values(self, int nargs, vedis_value **values, bint unescape):
+        self.nargs = nargs
+        self.values = values
+        self.unescape = unescape
+        self.active = True
+
+    cdef release(self):
+        self.nargs = 0
+        self.values = NULL
+        self.active = False
+
+    cdef int check_values(self) except -1:
+        if not self.active:
+            raise RuntimeError('Command arguments are only available while '
+                               'the command runs.')
+        return 0
+
+    def __len__(self):
+        self.check_values()
+        return self.nargs
+
+    def __getitem__(self, index):
+        cdef Py_ssize_t i
+        self.check_values()
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.nargs))]
+        i = index
+        if i < 0:
+            i += self.nargs
+        if i < 0 or i >= self.nargs:
+            raise IndexError('Argument index out of range.')
+        return vedis_value_to_python(self.values[i], self.unescape)
+
+    def __iter__(self):
+        cdef int i
+        self.check_values()
+        for i in range(self.nargs):
+            yield self[i]
 
 
 cdef class VedisContext(object):
@@ -840,35 +3561,34 @@ cdef class VedisContext(object):
         vedis_context_kv_store(
             self.context,
             <const char *>encoded_key,
-            -1,
+            len(encoded_key),
             <const char *>encoded_value,
             len(encoded_value))
 
     cpdef fetch(self, key):
         """Retrieve value at given key. Raises `KeyError` if key not found."""
         cdef bytes encoded_key = encode(key)
-        cdef char *buf = <char *>0
-        cdef vedis_int64 buf_size = 0
+        cdef fetch_state state
+        cdef int ret
 
-        vedis_context_kv_fetch(
+        _init_fetch_state(&state)
+        ret = vedis_context_kv_fetch_sized_callback(
             self.context,
-            <char *>encoded_key,
-            -1,
-            <void *>0,
-            &buf_size)
-
+            <const char *>encoded_key,
+            len(encoded_key),
+            _fetch_size_callback,
+            _fetch_consumer,
+            <void *>&state)
         try:
-            buf = <char *>malloc(buf_size)
-            vedis_context_kv_fetch(
-                self.context,
-                <char *>encoded_key,
-                -1,
-                <void *>buf,
-                &buf_size)
-            value = buf[:buf_size]
-            return value
+            if state.error:
+                raise MemoryError()
+            elif ret == VEDIS_NOTFOUND:
+                raise KeyError(key)
+            elif ret != VEDIS_OK:
+                raise Exception('Error fetching %r.' % key)
+            return <bytes>state.obj
         finally:
-            free(buf)
+            Py_XDECREF(state.obj)
 
     cpdef delete(self, key):
         """Delete the value stored at the given key."""
@@ -876,7 +3596,7 @@ cdef class VedisContext(object):
         vedis_context_kv_delete(
             self.context,
             <char *>ekey,
-            -1)
+            len(ekey))
 
     cpdef append(self, key, value):
         """Append to the value stored in the given key."""
@@ -884,7 +3604,7 @@ cdef class VedisContext(object):
         vedis_context_kv_append(
             self.context,
             <const char *>ekey,
-            -1,
+            len(ekey),
             <const char *>evalue,
             len(evalue))
 
@@ -897,7 +3617,7 @@ cdef class VedisContext(object):
         ret = vedis_context_kv_fetch(
             self.context,
             <char *>ekey,
-            -1,
+            len(ekey),
             <void *>0,
             &buf_size)
         if ret == VEDIS_NOTFOUND:
@@ -920,15 +3640,70 @@ cdef class VedisContext(object):
         return self.exists(key)
 
 
-cdef vedis_value_to_python(vedis_value *ptr):
+cdef int _encode_args(args, list encoded, const char **zargs, int *nargs,
+                      int *types) except -1:
+    # Fill in the argument vector for vedis_exec_argv(), keeping a reference
+    # to each encoded argument in the `encoded` list.
+    cdef Py_ssize_t i
+    cdef bytes barg
+    for i in range(len(args)):
+        arg = args[i]
+        if arg is None:
+            zargs[i] = NULL
+            nargs[i] = 0
+            types[i] = VEDIS_ARG_NULL
+            continue
+        elif isinstance(arg, float):
+            barg = encode(repr(arg))
+            types[i] = VEDIS_ARG_REAL
+        elif isinstance(arg, int):
+            barg = b'%d' % arg
+            types[i] = VEDIS_ARG_INT
+        else:
+            barg = encode(arg)
+            types[i] = VEDIS_ARG_STRING
+        encoded.append(barg)
+        zargs[i] = PyBytes_AS_STRING(barg)
+        nargs[i] = len(barg)
+    return 0
+
+
+cdef int _results_consumer(vedis_value *value, void *user_data) noexcept with gil:
+    # The user data is a tuple of the list of results and the decoder.
+    cdef tuple state = <tuple>user_data
+    cdef list results = <list>state[0]
+    try:
+        results.append(vedis_value_to_python(value, False, state[1]))
+    except:
+        return VEDIS_ABORT
+    return VEDIS_OK
+
+
+cdef inline bytes _unescape(bytes value):
+    # Quotes inside a command string are escaped by `Vedis.execute`.
+    if value.find(b'\\"') >= 0:
+        return value.replace(b'\\"', b'"')
+    return value
+
+
+cdef vedis_value_to_python(vedis_value *ptr, bint unescape=True,
+                           _Decoder decoder=None):
     cdef int nbytes
+    cdef const char *zvalue
+    cdef bytes value
     cdef list accum
     cdef vedis_value *item = <vedis_value *>0
 
     if vedis_value_is_string(ptr):
-        value = vedis_value_to_string(ptr, NULL)
-        if value.find(b'\\"') >= 0:
-            value = value.replace(b'\\"', b'"')
+        zvalue = vedis_value_to_string(ptr, &nbytes)
+        if decoder is not None and not unescape:
+            # Decode straight from the engine's buffer.
+            return decoder.decode_buffer(zvalue, nbytes)
+        value = PyBytes_FromStringAndSize(zvalue, nbytes)
+        if unescape:
+            value = _unescape(value)
+        if decoder is not None:
+            return decoder.decode(value)
         return value
     elif vedis_value_is_array(ptr):
         accum = []
@@ -936,10 +3711,10 @@ cdef vedis_value_to_python(vedis_value *ptr):
             item = vedis_array_next_elem(ptr)
             if not item:
                 break
-            accum.append(vedis_value_to_python(item))
+            accum.append(vedis_value_to_python(item, unescape, decoder))
         return accum
     elif vedis_value_is_int(ptr):
-        return vedis_value_to_int(ptr)
+        return vedis_value_to_int64(ptr)
     elif vedis_value_is_float(ptr):
         return vedis_value_to_double(ptr)
     elif vedis_value_is_bool(ptr):
@@ -962,9 +3737,9 @@ cdef vedis_value* create_vedis_scalar(vedis_context *context, python_value):
     ptr = vedis_context_new_scalar(context)
     if isinstance(python_value, unicode):
         encoded_value = encode(python_value)
-        vedis_value_string(ptr, encoded_value, -1)
+        vedis_value_string(ptr, encoded_value, len(encoded_value))
     elif isinstance(python_value, bytes):
-        vedis_value_string(ptr, python_value, -1)
+        vedis_value_string(ptr, python_value, len(python_value))
     elif isinstance(python_value, int):
         vedis_value_int(ptr, python_value)
     elif isinstance(python_value, bool):
@@ -993,9 +3768,9 @@ cdef push_result(vedis_context *context, python_value):
     cdef bytes encoded_value
     if isinstance(python_value, unicode):
         encoded_value = python_value.encode('utf-8')
-        vedis_result_string(context, encoded_value, -1)
+        vedis_result_string(context, encoded_value, len(encoded_value))
     elif isinstance(python_value, bytes):
-        vedis_result_string(context, python_value, -1)
+        vedis_result_string(context, python_value, len(python_value))
     elif isinstance(python_value, (list, tuple)):
         vedis_result_value(context, create_vedis_array(context, python_value))
     elif isinstance(python_value, int):
@@ -1030,154 +3805,2136 @@ cdef class Transaction(object):
                 raise
 
 
-cdef class Hash(object):
-    cdef Vedis vedis
-    cdef key
+def _pairs_to_dict(results):
+    if not results:
+        return {}
+    it = iter(results)
+    return dict(zip(it, it))
 
-    def __init__(self, Vedis vedis, key):
-        self.vedis = vedis
-        self.key = key
 
-    def get(self, key):
-        return self.vedis.hget(self.key, key)
+def _pairs_to_list(results):
+    if not results:
+        return []
+    it = iter(results)
+    return list(zip(it, it))
 
-    def mget(self, *keys):
-        return self.vedis.hmget(self.key, list(keys))
 
-    def set(self, key, value):
-        return self.vedis.hset(self.key, key, value)
+def _to_ttl(value):
+    # PTTL returns -2 for missing keys and -1 for keys that do not expire.
+    if value is None or value < 0:
+        return None
+    return value / 1000.
 
-    def delete(self, key):
-        self.vedis.hdel(self.key, key)
 
-    def mdelete(self, list keys):
-        return self.vedis.hmdel(self.key, keys)
+# Sorted sets. The engine returns integral scores as integers, so scores are
+# converted to floats. Floats are sent to the engine in hexadecimal, which
+# it parses without rounding. Strings are sent as is, for exclusive bounds
+# such as '(1.5'.
 
-    def keys(self):
-        return self.vedis.hkeys(self.key)
+def _to_score(value):
+    if value is None:
+        return None
+    return float(value)
 
-    def values(self):
-        return self.vedis.hvals(self.key)
 
-    def items(self):
-        return self.vedis.hitems(self.key)
+def _score_pairs(results):
+    if not results:
+        return []
+    it = iter(results)
+    return [(member, float(score)) for member, score in zip(it, it)]
 
-    def update(self, **kwargs):
-        return self.vedis.hmset(self.key, kwargs)
 
-    def to_dict(self):
-        return self.vedis.hgetall(self.key)
+def _unpack_score(bytes data):
+    return struct.unpack('>d', data)[0]
 
-    def __len__(self):
-        return self.vedis.hlen(self.key)
 
-    def __contains__(self, key):
-        return self.vedis.hexists(self.key, key)
+cdef _score_arg(score):
+    if isinstance(score, float):
+        if score != score:
+            raise ValueError('Score must not be NaN.')
+        return score.hex()
+    elif isinstance(score, int) and not -(1 << 53) <= score <= (1 << 53):
+        return float(score).hex()
+    return score
 
-    def __setitem__(self, key, value):
-        self.vedis.hset(self.key, key, value)
 
-    def __getitem__(self, key):
-        return self.vedis.hget(self.key, key)
+cdef list _zadd_args(key, dict members):
+    cdef list args = [key]
+    for member, score in members.items():
+        args.append(_score_arg(score))
+        args.append(member)
+    return args
 
-    def __delitem__(self, key):
-        self.vedis.hdel(self.key, key)
 
-    def __iter__(self):
-        return iter(self.vedis.hkeys(self.key))
+cdef list _zrange_args(key, long long start, long long stop, bint withscores):
+    if withscores:
+        return [key, start, stop, b'WITHSCORES']
+    return [key, start, stop]
 
-    def __repr__(self):
-        return '<Hash: %s>' % self.key
 
+cdef list _zrangebyscore_args(key, first, last, bint withscores, offset,
+                              count):
+    cdef list args = [key, _score_arg(first), _score_arg(last)]
+    if withscores:
+        args.append(b'WITHSCORES')
+    if offset is not None or count is not None:
+        args.extend((b'LIMIT', offset or 0, -1 if count is None else count))
+    return args
 
-cdef class Set(object):
+
+cdef class Pipeline(object):
+    """
+    Queue commands and execute them in a single call into the database.
+
+    Each queueing method returns the pipeline, so calls may be chained.
+    :py:meth:`Pipeline.execute` runs the queued commands and returns a list
+    containing the result of each one.
+    """
     cdef readonly Vedis vedis
-    cdef readonly key
+    cdef readonly bint transaction
+    cdef list commands
 
-    def __init__(self, Vedis vedis, key):
+    def __init__(self, Vedis vedis, bint transaction=False):
         self.vedis = vedis
-        self.key = key
-
-    def add(self, *values):
-        return self.vedis.smadd(self.key, list(values))
+        self.transaction = transaction
+        self.commands = []
 
     def __len__(self):
-        return self.vedis.scard(self.key)
+        return len(self.commands)
 
-    def __contains__(self, value):
-        return self.vedis.sismember(self.key, value)
+    def __enter__(self):
+        return self
 
-    def pop(self):
-        return self.vedis.spop(self.key)
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self.reset()
+        else:
+            self.execute()
 
-    def peek(self):
-        return self.vedis.speek(self.key)
+    cpdef reset(self):
+        """Discard any queued commands."""
+        self.commands = []
 
-    def top(self):
-        return self.vedis.stop(self.key)
+    cpdef list execute(self):
+        """
+        Execute the queued commands, returning a list of their results.
+        Execution stops at the first command that fails. The exception
+        raised has a `command_index` attribute giving the position of the
+        failed command, and when the pipeline is transactional all of the
+        changes are rolled back.
+        """
+        cdef list commands = self.commands
+        cdef list results
+        self.commands = []
+        if self.transaction:
+            with self.vedis.transaction():
+                results = self.vedis._call_many(commands)
+        else:
+            results = self.vedis._call_many(commands)
 
-    def remove(self, *values):
-        return self.vedis.smrem(self.key, list(values))
+        for i, (_, _, converter) in enumerate(commands):
+            if converter is not None:
+                results[i] = converter(results[i])
+        return results
 
-    def __delitem__(self, key):
-        self.remove(key)
+    cdef Pipeline _queue(self, bytes name, args, converter=None):
+        self.commands.append((name, args, converter))
+        return self
 
-    def __iter__(self):
-        return iter(self.vedis.smembers(self.key))
+    def call(self, name, *args):
+        """Queue the command `name` with the given arguments."""
+        return self._queue(encode(name), args)
 
-    def to_set(self):
-        return self.vedis.smembers(self.key)
+    # Key/value.
+    def get(self, key):
+        return self._queue(b'GET', (key,))
 
-    def __sub__(self, rhs):
-        return self.vedis.sdiff(self.key, rhs.key)
+    def set(self, key, value):
+        return self._queue(b'SET', (key, value), bool)
 
-    def __and__(self, rhs):
-        return self.vedis.sinter(self.key, rhs.key)
+    def delete(self, key):
+        return self._queue(b'DEL', (key,))
 
+    def append(self, key, value):
+        return self._queue(b'APPEND', (key, value), bool)
 
-__sentinel__ = object()
+    def exists(self, key):
+        return self._queue(b'EXISTS', (key,), bool)
 
+    # Misc.
+    def copy(self, src, dest):
+        return self._queue(b'COPY', (src, dest), bool)
 
-cdef class List(object):
-    cdef Vedis vedis
-    cdef key
+    def move(self, src, dest):
+        return self._queue(b'MOVE', (src, dest), bool)
 
-    def __init__(self, Vedis vedis, key):
-        self.vedis = vedis
-        self.key = key
+    # Strings.
+    def mget(self, list keys):
+        return self._queue(b'MGET', keys)
 
-    def __getitem__(self, index):
-        if isinstance(index, slice):
-            start = index.start if index.start is not None else __sentinel__
-            stop = index.stop if index.stop is not None else __sentinel__
-            return self.get_range(start, stop)
-        return self.vedis.lindex(self.key, index)
+    def mset(self, dict kw):
+        return self._queue(b'MSET', self.vedis._flatten(kw), bool)
 
-    def __len__(self):
-        return self.vedis.llen(self.key)
+    def setnx(self, key, value):
+        return self._queue(b'SETNX', (key, value), bool)
 
-    def pop(self):
-        return self.vedis.lpop(self.key)
+    def msetnx(self, dict kw):
+        return self._queue(b'MSETNX', self.vedis._flatten(kw), bool)
 
-    def append(self, value):
-        return self.vedis.lpush(self.key, value)
+    def get_set(self, key, value):
+        return self._queue(b'GETSET', (key, value))
 
-    def extend(self, values):
-        return self.vedis.lmpush(self.key, values)
+    def strlen(self, key):
+        return self._queue(b'STRLEN', (key,))
 
-    def __iter__(self):
-        def gen():
-            l = len(self)
-            for i in range(l):
-                yield self[i]
-        return iter(gen())
+    # Key expiry.
+    def expire(self, key, seconds):
+        return self._queue(b'PEXPIRE', (key, int(seconds * 1000)), bool)
 
-    def get_range(self, start=None, end=None):
-        cdef:
-            int n = len(self)
-            int s = 0 if start is __sentinel__ else start
-            int e = n + 1 if end is __sentinel__ else end
-        s = max(0, min(s or 0, n))
-        e = min(e or 0, n + 1)
-        for i in range(s, e):
-            yield self[i]
+    def expireat(self, key, timestamp):
+        return self._queue(b'PEXPIREAT', (key, int(timestamp * 1000)), bool)
+
+    def persist(self, key):
+        return self._queue(b'PERSIST', (key,), bool)
+
+    def ttl(self, key):
+        return self._queue(b'PTTL', (key,), _to_ttl)
+
+    # Counters.
+    def incr(self, key):
+        return self._queue(b'INCR', (key,))
+
+    def decr(self, key):
+        return self._queue(b'DECR', (key,))
+
+    def incr_by(self, key, long long amount):
+        return self._queue(b'INCRBY', (key, amount))
+
+    def decr_by(self, key, long long amount):
+        return self._queue(b'DECRBY', (key, amount))
+
+    # Hash methods.
+    def hset(self, hash_key, key, value):
+        return self._queue(b'HSET', (hash_key, key, value), bool)
+
+    def hsetnx(self, hash_key, key, value):
+        return self._queue(b'HSETNX', (hash_key, key, value), bool)
+
+    def hget(self, hash_key, key):
+        return self._queue(b'HGET', (hash_key, key))
+
+    def hdel(self, hash_key, key):
+        return self._queue(b'HDEL', (hash_key, key))
+
+    def hmdel(self, hash_key, list keys):
+        return self._queue(b'HDEL', [hash_key] + keys)
+
+    def hkeys(self, hash_key):
+        return self._queue(b'HKEYS', (hash_key,))
+
+    def hvals(self, hash_key):
+        return self._queue(b'HVALS', (hash_key,))
+
+    def hgetall(self, hash_key):
+        return self._queue(b'HGETALL', (hash_key,), _pairs_to_dict)
+
+    def hitems(self, hash_key):
+        return self._queue(b'HGETALL', (hash_key,), _pairs_to_list)
+
+    def hlen(self, hash_key):
+        return self._queue(b'HLEN', (hash_key,))
+
+    def hexists(self, hash_key, key):
+        return self._queue(b'HEXISTS', (hash_key, key), bool)
+
+    def hmset(self, hash_key, dict data):
+        return self._queue(b'HMSET', [hash_key] + self.vedis._flatten(data))
+
+    def hmget(self, hash_key, list keys):
+        return self._queue(b'HMGET', [hash_key] + keys)
+
+    # Set methods.
+    def sadd(self, key, value):
+        return self._queue(b'SADD', (key, value))
+
+    def smadd(self, key, list values):
+        return self._queue(b'SADD', [key] + values)
+
+    def scard(self, key):
+        return self._queue(b'SCARD', (key,))
+
+    def sismember(self, key, value):
+        return self._queue(b'SISMEMBER', (key, value), bool)
+
+    def spop(self, key):
+        return self._queue(b'SPOP', (key,))
+
+    def speek(self, key):
+        return self._queue(b'SPEEK', (key,))
+
+    def stop(self, key):
+        return self._queue(b'STOP', (key,))
+
+    def srem(self, key, value):
+        return self._queue(b'SREM', (key, value), bool)
+
+    def smrem(self, key, list values):
+        return self._queue(b'SREM', [key] + values)
+
+    def smembers(self, key):
+        return self._queue(b'SMEMBERS', (key,), set)
+
+    def sdiff(self, k1, k2):
+        return self._queue(b'SDIFF', (k1, k2), set)
+
+    def sinter(self, k1, k2):
+        return self._queue(b'SINTER', (k1, k2), set)
+
+    def slen(self, key):
+        return self._queue(b'SLEN', (key,))
+
+    # List methods.
+    def lindex(self, key, int index):
+        return self._queue(b'LINDEX', (key, index))
+
+    def llen(self, key):
+        return self._queue(b'LLEN', (key,))
+
+    def lrange(self, key, int start=0, int stop=-1):
+        return self._queue(b'LRANGE', (key, start, stop))
+
+    def lpop(self, key):
+        return self._queue(b'LPOP', (key,))
+
+    def lpush(self, key, value):
+        return self._queue(b'LPUSH', (key, value))
+
+    def lmpush(self, key, list values):
+        return self._queue(b'LPUSH', [key] + values)
+
+    def lpushx(self, key, value):
+        return self._queue(b'LPUSHX', (key, value))
+
+    def lmpushx(self, key, list values):
+        return self._queue(b'LPUSHX', [key] + values)
+
+    # Sorted set methods.
+    def zadd(self, key, dict members):
+        return self._queue(b'ZADD', _zadd_args(key, members))
+
+    def zincrby(self, key, member, increment=1):
+        return self._queue(b'ZINCRBY', (key, _score_arg(increment), member),
+                           _to_score)
+
+    def zrem(self, key, member):
+        return self._queue(b'ZREM', (key, member))
+
+    def zmrem(self, key, list members):
+        return self._queue(b'ZREM', [key] + members)
+
+    def zscore(self, key, member):
+        return self._queue(b'ZSCORE', (key, member), _to_score)
+
+    def zrank(self, key, member):
+        return self._queue(b'ZRANK', (key, member))
+
+    def zrevrank(self, key, member):
+        return self._queue(b'ZREVRANK', (key, member))
+
+    def zcard(self, key):
+        return self._queue(b'ZCARD', (key,))
+
+    def zcount(self, key, low='-inf', high='+inf'):
+        return self._queue(b'ZCOUNT',
+                           (key, _score_arg(low), _score_arg(high)))
+
+    def zrange(self, key, long long start=0, long long stop=-1,
+               bint withscores=False):
+        return self._queue(b'ZRANGE',
+                           _zrange_args(key, start, stop, withscores),
+                           _score_pairs if withscores else None)
+
+    def zrevrange(self, key, long long start=0, long long stop=-1,
+                  bint withscores=False):
+        return self._queue(b'ZREVRANGE',
+                           _zrange_args(key, start, stop, withscores),
+                           _score_pairs if withscores else None)
+
+    def zrangebyscore(self, key, low='-inf', high='+inf',
+                      bint withscores=False, offset=None, count=None):
+        return self._queue(b'ZRANGEBYSCORE', _zrangebyscore_args(
+            key, low, high, withscores, offset, count),
+            _score_pairs if withscores else None)
+
+    def zrevrangebyscore(self, key, high='+inf', low='-inf',
+                         bint withscores=False, offset=None, count=None):
+        return self._queue(b'ZREVRANGEBYSCORE', _zrangebyscore_args(
+            key, high, low, withscores, offset, count),
+            _score_pairs if withscores else None)
+
+
+cdef class Cursor(object):
+    """
+    Cursor for iterating over the records in the key/value store.
+
+    The underlying storage engines are hash-based, so records are visited
+    in storage order rather than in key order, and only exact matches are
+    supported by :py:meth:`Cursor.seek`. Moving the cursor skips the
+    records of hashes, sets, lists and sorted sets, and keys that are due.
+    """
+    cdef Vedis vedis
+    cdef vedis_kv_cursor *cursor
+    cdef readonly bint consumed
+    cdef object __weakref__
+
+    def __cinit__(self, Vedis vedis):
+        cdef int ret
+        self.vedis = vedis
+        self.cursor = <vedis_kv_cursor *>0
+        self.consumed = False
+        with nogil:
+            ret = vedis_kv_cursor_init(vedis.database, &self.cursor)
+        self.vedis.check_call(ret)
+
+    def __dealloc__(self):
+        if self.cursor and self.vedis.is_open:
+            with nogil:
+                vedis_kv_cursor_release(self.vedis.database, self.cursor)
+
+    cpdef close(self):
+        """Release the cursor."""
+        if not self.cursor:
+            return False
+
+        if self.vedis.is_open:
+            with nogil:
+                vedis_kv_cursor_release(self.vedis.database, self.cursor)
+        self.cursor = <vedis_kv_cursor *>0
+        return True
+
+    def __enter__(self):
+        self.reset()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    cdef check_cursor(self):
+        if not self.cursor:
+            raise ValueError('Cursor has been closed.')
+
+    cpdef reset(self):
+        """Reset the cursor, positioning it on the first record."""
+        self.check_cursor()
+        self.consumed = False
+        with nogil:
+            vedis_kv_cursor_reset(self.cursor)
+        self._skip_hidden(True)
+
+    cpdef seek(self, key, int flags=VEDIS_CURSOR_MATCH_EXACT):
+        """
+        Position the cursor on the record at the given key. Raises
+        `KeyError` if the key does not exist.
+        """
+        cdef bytes bkey = encode(key)
+        cdef const char *k = bkey
+        cdef int nkey = len(bkey)
+        cdef int ret
+        self.check_cursor()
+        self.consumed = False
+        with nogil:
+            ret = vedis_kv_cursor_seek(self.cursor, k, nkey, flags)
+        self.vedis.check_call(ret)
+
+    cpdef first(self):
+        """Position the cursor on the first record."""
+        cdef int ret
+        self.check_cursor()
+        self.consumed = False
+        with nogil:
+            ret = vedis_kv_cursor_first_entry(self.cursor)
+        if ret != VEDIS_OK and ret != VEDIS_DONE:
+            raise self.vedis._build_exception_for_error(ret)
+        self._skip_hidden(True)
+
+    cpdef last(self):
+        """Position the cursor on the last record."""
+        cdef int ret
+        self.check_cursor()
+        self.consumed = False
+        with nogil:
+            ret = vedis_kv_cursor_last_entry(self.cursor)
+        if ret != VEDIS_OK and ret != VEDIS_DONE:
+            raise self.vedis._build_exception_for_error(ret)
+        self._skip_hidden(False)
+
+    cdef _step(self, bint forward):
+        cdef int ret
+        with nogil:
+            if forward:
+                ret = vedis_kv_cursor_next_entry(self.cursor)
+            else:
+                ret = vedis_kv_cursor_prev_entry(self.cursor)
+        if ret != VEDIS_OK and ret != VEDIS_DONE and ret != VEDIS_EOF:
+            raise self.vedis._build_exception_for_error(ret)
+
+    cdef _skip_hidden(self, bint forward):
+        while self.is_valid() and self._hidden():
+            self._step(forward)
+
+    cpdef next_entry(self):
+        """Move the cursor to the next record."""
+        self.check_cursor()
+        self._step(True)
+        self._skip_hidden(True)
+
+    cpdef previous_entry(self):
+        """Move the cursor to the previous record."""
+        self.check_cursor()
+        self._step(False)
+        self._skip_hidden(False)
+
+    cpdef bint is_valid(self):
+        """Return whether the cursor points to a record."""
+        cdef bint ret
+        self.check_cursor()
+        with nogil:
+            ret = vedis_kv_cursor_valid_entry(self.cursor)
+        return ret
+
+    cdef _decode(self, bytes value):
+        if self.vedis._decoder is None:
+            return value
+        return self.vedis._decoder.decode(value)
+
+    cpdef key(self):
+        """Retrieve the key of the current record."""
+        return self._decode(self._raw_key())
+
+    cpdef value(self):
+        """Retrieve the value of the current record."""
+        return self._decode(self._raw_value())
+
+    cdef bytes _raw_key(self):
+        cdef int nbytes = 0
+        cdef int ret
+        cdef bytes buf
+        cdef void *zbuf
+        self.check_cursor()
+        with nogil:
+            ret = vedis_kv_cursor_key(self.cursor, <void *>0, &nbytes)
+        self.vedis.check_call(ret)
+        buf = PyBytes_FromStringAndSize(NULL, nbytes)
+        zbuf = <void *>PyBytes_AS_STRING(buf)
+        with nogil:
+            ret = vedis_kv_cursor_key(self.cursor, zbuf, &nbytes)
+        self.vedis.check_call(ret)
+        return buf
+
+    cdef bint _hidden(self) except -1:
+        # Records of hashes, sets and other tables, and keys that are due.
+        cdef int hidden = 0
+        cdef int ret
+        with nogil:
+            ret = vedis_kv_cursor_hidden(self.cursor, &hidden)
+        self.vedis.check_call(ret)
+        return hidden
+
+    cdef bytes _raw_value(self):
+        cdef vedis_int64 nbytes = 0
+        cdef int ret
+        cdef bytes buf
+        cdef void *zbuf
+        self.check_cursor()
+        with nogil:
+            ret = vedis_kv_cursor_data(self.cursor, <void *>0, &nbytes)
+        self.vedis.check_call(ret)
+        buf = PyBytes_FromStringAndSize(NULL, nbytes)
+        zbuf = <void *>PyBytes_AS_STRING(buf)
+        with nogil:
+            ret = vedis_kv_cursor_data(self.cursor, zbuf, &nbytes)
+        self.vedis.check_call(ret)
+        return buf
+
+    cpdef delete(self):
+        """Delete the current record and move to the next one."""
+        cdef int ret
+        self.check_cursor()
+        if self.vedis._cache is not None:
+            self.vedis._cache.discard(self._raw_key())
+        with nogil:
+            ret = vedis_kv_cursor_delete_entry(self.cursor)
+        self.vedis.check_call(ret)
+        self.vedis._wrote(1)
+        if not self.is_valid():
+            self.next_entry()
+        else:
+            self._skip_hidden(True)
+
+    cpdef list read_chunk(self, int n, bytes prefix=None, bytes stop=None,
+                          bint keys_only=False):
+        """
+        Read up to `n` records, starting with the current one. Records
+        whose key does not begin with `prefix` are skipped. Reading ends
+        after the `stop` key is read, at which point `consumed` is set.
+        """
+        cdef list accum = []
+        cdef bytes key
+        self.check_cursor()
+        # The record positioned by seek() is not checked yet.
+        self._skip_hidden(True)
+        while n > 0 and not self.consumed:
+            if not self.is_valid():
+                self.consumed = True
+                break
+            key = self._raw_key()
+            if prefix is None or key.startswith(prefix):
+                if keys_only:
+                    accum.append(self._decode(key))
+                else:
+                    accum.append((self._decode(key), self.value()))
+            if stop is not None and key == stop:
+                self.consumed = True
+            else:
+                self.next_entry()
+            n -= 1
+        return accum
+
+    def fetch_until(self, stop_key, bint include_stop_key=True):
+        """
+        Yield `(key, value)` tuples from the current position until the
+        `stop_key` is reached.
+        """
+        cdef bytes bstop = encode(stop_key)
+        cdef bytes key
+        self.check_cursor()
+        while self.is_valid():
+            key = self._raw_key()
+            if key == bstop:
+                if include_stop_key:
+                    yield (self._decode(key), self.value())
+                break
+            yield (self._decode(key), self.value())
+            self.next_entry()
+
+    def __iter__(self):
+        self.check_cursor()
+        self.consumed = False
+        self._skip_hidden(True)
+        return self
+
+    def __next__(self):
+        self.check_cursor()
+        if self.consumed or not self.is_valid():
+            self.consumed = True
+            raise StopIteration
+        key = self.key()
+        value = self.value()
+        self.next_entry()
+        return (key, value)
+
+
+cdef class Hash(object):
+    """
+    Wrapper for the hash stored at `key`. Iteration reads the hash
+    `batch_size` items at a time.
+    """
+    cdef Vedis vedis
+    cdef key
+    cdef public int batch_size
+
+    def __init__(self, Vedis vedis, key, int batch_size=BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        self.vedis = vedis
+        self.key = key
+        self.batch_size = batch_size
+
+    def get(self, key):
+        return self.vedis.hget(self.key, key)
+
+    def mget(self, *keys):
+        return self.vedis.hmget(self.key, list(keys))
+
+    def set(self, key, value):
+        return self.vedis.hset(self.key, key, value)
+
+    def delete(self, key):
+        self.vedis.hdel(self.key, key)
+
+    def mdelete(self, list keys):
+        return self.vedis.hmdel(self.key, keys)
+
+    def keys(self):
+        return self.vedis.hkeys(self.key)
+
+    def values(self):
+        return self.vedis.hvals(self.key)
+
+    def items(self):
+        return self.vedis.hitems(self.key)
+
+    def iterkeys(self):
+        return self.vedis._iter_table(b'HSCAN', self.key, self.batch_size,
+                                      b'KEYS')
+
+    def itervalues(self):
+        return self.vedis._iter_table(b'HSCAN', self.key, self.batch_size,
+                                      b'VALUES')
+
+    def iteritems(self):
+        items = self.vedis._iter_table(b'HSCAN', self.key, self.batch_size)
+        return zip(items, items)
+
+    def update(self, **kwargs):
+        return self.vedis.hmset(self.key, kwargs)
+
+    def to_dict(self):
+        return self.vedis.hgetall(self.key)
+
+    def __len__(self):
+        return self.vedis.hlen(self.key)
+
+    def __contains__(self, key):
+        return self.vedis.hexists(self.key, key)
+
+    def __setitem__(self, key, value):
+        self.vedis.hset(self.key, key, value)
+
+    def __getitem__(self, key):
+        return self.vedis.hget(self.key, key)
+
+    def __delitem__(self, key):
+        self.vedis.hdel(self.key, key)
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __repr__(self):
+        return '<Hash: %s>' % self.key
+
+
+cdef class Set(object):
+    """
+    Wrapper for the set stored at `key`. Iteration reads the set
+    `batch_size` members at a time.
+    """
+    cdef readonly Vedis vedis
+    cdef readonly key
+    cdef public int batch_size
+
+    def __init__(self, Vedis vedis, key, int batch_size=BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        self.vedis = vedis
+        self.key = key
+        self.batch_size = batch_size
+
+    def add(self, *values):
+        return self.vedis.smadd(self.key, list(values))
+
+    def __len__(self):
+        return self.vedis.scard(self.key)
+
+    def __contains__(self, value):
+        return self.vedis.sismember(self.key, value)
+
+    def pop(self):
+        return self.vedis.spop(self.key)
+
+    def peek(self):
+        return self.vedis.speek(self.key)
+
+    def top(self):
+        return self.vedis.stop(self.key)
+
+    def remove(self, *values):
+        return self.vedis.smrem(self.key, list(values))
+
+    def __delitem__(self, key):
+        self.remove(key)
+
+    def __iter__(self):
+        return self.vedis._iter_table(b'SSCAN', self.key, self.batch_size)
+
+    def to_set(self):
+        return self.vedis.smembers(self.key)
+
+    def __sub__(self, rhs):
+        return self.vedis.sdiff(self.key, rhs.key)
+
+    def __and__(self, rhs):
+        return self.vedis.sinter(self.key, rhs.key)
+
+
+cdef class List(object):
+    """
+    Wrapper for the list stored at `key`. Iteration and slicing read the
+    list `batch_size` elements at a time.
+    """
+    cdef Vedis vedis
+    cdef key
+    cdef public int batch_size
+
+    def __init__(self, Vedis vedis, key, int batch_size=BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        self.vedis = vedis
+        self.key = key
+        self.batch_size = batch_size
+
+    def __getitem__(self, index):
+        cdef list items
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step < 1:
+                raise ValueError('Slice step must be positive.')
+            return self._iter_range(start, stop, step)
+        items = self.vedis.lrange(self.key, index, index)
+        return items[0] if items else None
+
+    def __len__(self):
+        return self.vedis.llen(self.key)
+
+    def pop(self):
+        return self.vedis.lpop(self.key)
+
+    def append(self, value):
+        return self.vedis.lpush(self.key, value)
+
+    def extend(self, values):
+        return self.vedis.lmpush(self.key, values)
+
+    def __iter__(self):
+        return self._iter_range(0, -1, 1)
+
+    def get_range(self, start=None, end=None):
+        return self[start:end]
+
+    def _iter_range(self, Py_ssize_t start, Py_ssize_t stop, Py_ssize_t step):
+        # Read the elements from `start` up to, but excluding, `stop` in
+        # batches. A negative `stop` reads until the end of the list.
+        cdef list chunk
+        cdef Py_ssize_t last
+        while stop < 0 or start < stop:
+            last = start + self.batch_size - 1
+            if stop >= 0:
+                last = min(last, stop - 1)
+            chunk = self.vedis.lrange(self.key, start, last)
+            if step == 1:
+                for item in chunk:
+                    yield item
+            else:
+                for item in chunk[::step]:
+                    yield item
+            if len(chunk) < last - start + 1:
+                break
+            # Advance to the next multiple of `step` past this chunk.
+            start += ((len(chunk) + step - 1) // step) * step
+
+
+cdef class ZSet(object):
+    """
+    Wrapper for the sorted set stored at `key`. Iteration reads the members
+    from the lowest to the highest score, `batch_size` members at a time.
+    """
+    cdef readonly Vedis vedis
+    cdef readonly key
+    cdef public int batch_size
+
+    def __init__(self, Vedis vedis, key, int batch_size=BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        self.vedis = vedis
+        self.key = key
+        self.batch_size = batch_size
+
+    def add(self, dict members=None, **kwargs):
+        if members is None:
+            members = kwargs
+        elif kwargs:
+            members = dict(members, **kwargs)
+        return self.vedis.zadd(self.key, members)
+
+    def remove(self, *members):
+        return self.vedis.zmrem(self.key, list(members))
+
+    def incr(self, member, increment=1):
+        return self.vedis.zincrby(self.key, member, increment)
+
+    def score(self, member):
+        return self.vedis.zscore(self.key, member)
+
+    def rank(self, member, bint reverse=False):
+        if reverse:
+            return self.vedis.zrevrank(self.key, member)
+        return self.vedis.zrank(self.key, member)
+
+    def range(self, long long start=0, long long stop=-1,
+              bint withscores=False, bint reverse=False):
+        if reverse:
+            return self.vedis.zrevrange(self.key, start, stop, withscores)
+        return self.vedis.zrange(self.key, start, stop, withscores)
+
+    def range_by_score(self, low='-inf', high='+inf', bint withscores=False,
+                       offset=None, count=None, bint reverse=False):
+        if reverse:
+            return self.vedis.zrevrangebyscore(self.key, high, low,
+                                               withscores, offset, count)
+        return self.vedis.zrangebyscore(self.key, low, high, withscores,
+                                        offset, count)
+
+    def count(self, low='-inf', high='+inf'):
+        return self.vedis.zcount(self.key, low, high)
+
+    def top(self, int n=10, bint withscores=False):
+        if n < 1:
+            return []
+        return self.vedis.zrevrange(self.key, 0, n - 1, withscores)
+
+    def items(self):
+        return self._iter_range(True)
+
+    def __len__(self):
+        return self.vedis.zcard(self.key)
+
+    def __contains__(self, member):
+        return self.vedis.zscore(self.key, member) is not None
+
+    def __getitem__(self, member):
+        return self.vedis.zscore(self.key, member)
+
+    def __setitem__(self, member, score):
+        self.vedis.zadd(self.key, {member: score})
+
+    def __delitem__(self, member):
+        self.vedis.zrem(self.key, member)
+
+    def __iter__(self):
+        return self._iter_range(False)
+
+    def __repr__(self):
+        return '<ZSet: %s>' % self.key
+
+    def _iter_range(self, bint withscores):
+        # Read the members by rank, in batches.
+        cdef long long start = 0
+        cdef list chunk
+        while True:
+            chunk = self.vedis.zrange(self.key, start,
+                                      start + self.batch_size - 1, withscores)
+            for item in chunk:
+                yield item
+            if len(chunk) < self.batch_size:
+                break
+            start += self.batch_size
+
+
+# asyncio front-end. All access to the database happens on a dedicated worker
+# thread, so that pager I/O and fsync do not block the event loop. Requests
+# that are queued while the worker is busy are executed as one batch, and the
+# writes in a batch are committed together.
+
+
+def _async_method(name, bint write, target_name=None):
+    target_name = target_name or name
+    async def method(self, *args, **kwargs):
+        return await self._adb._submit(getattr(self._target, target_name),
+                                       args, kwargs, write)
+    method.__name__ = name
+    method.__doc__ = 'Awaitable version of ``%s()``.' % target_name
+    return method
+
+
+def _add_async_methods(klass, reads, writes, aliases=()):
+    for name in reads:
+        setattr(klass, name, _async_method(name, False))
+    for name in writes:
+        setattr(klass, name, _async_method(name, True))
+    for name, target_name, write in aliases:
+        setattr(klass, name, _async_method(name, write, target_name))
+
+
+def _deliver(list entries, adb, semaphore):
+    # Runs on the event loop, resolving the futures of a completed batch.
+    adb._count_pending(-len(entries))
+    for future, success, value in entries:
+        semaphore.release()
+        if future.cancelled():
+            continue
+        elif success:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+
+def _abandon(list entries, adb):
+    # Runs on the worker thread when the loop of the callers has been closed
+    # while their batch was in flight. The futures can no longer be resolved
+    # through the loop, so they are failed directly.
+    exc = RuntimeError('Event loop was closed before the request completed.')
+    adb._count_pending(-len(entries))
+    for future, success, value in entries:
+        try:
+            if not future.done():
+                future.set_exception(exc)
+        except RuntimeError:
+            # Scheduling the done callbacks on the closed loop fails.
+            pass
+
+
+class AsyncVedis(object):
+    """
+    Awaitable wrapper around a :py:class:`Vedis` database, which runs the
+    database on a dedicated worker thread.
+    """
+    def __init__(self, filename=':mem:', max_pending=1024, max_batch=256,
+                 group_commit=True, **kwargs):
+        if asyncio is None:
+            raise RuntimeError('asyncio is not available.')
+        if max_pending < 1 or max_batch < 1:
+            raise ValueError('max_pending and max_batch must be positive.')
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.group_commit = group_commit
+        self.batches = 0
+        self._adb = self
+        self._target = self._db = Vedis(filename, **kwargs)
+        self._queue = Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='vedis-worker')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Number of requests submitted but not yet completed."""
+        return self._pending
+
+    @property
+    def filename(self):
+        return self._db.filename
+
+    def _count_pending(self, int n):
+        # Requests are counted by the loops that submit them and discounted
+        # by the loops, or by the worker when a loop was closed, so the
+        # count is updated from several threads.
+        with self._pending_lock:
+            self._pending += n
+
+    async def _submit(self, fn, args, kwargs, bint write):
+        if self._closed:
+            raise ValueError('Database has been closed.')
+        loop = asyncio.get_running_loop()
+        # Semaphores are bound to the loop they are first used on, so each
+        # loop gets its own.
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_pending)
+            self._semaphores[loop] = semaphore
+        # Wait here when too many requests are in flight.
+        await semaphore.acquire()
+        self._count_pending(1)
+        future = loop.create_future()
+        self._queue.put((fn, args, kwargs, write, future, loop, semaphore))
+        return await future
+
+    def _run(self):
+        cdef bint stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                stop = True
+            if batch:
+                self._run_batch(batch)
+        self._db.close()
+
+    def _run_batch(self, list batch):
+        cdef list results = []
+        cdef bint has_writes = False
+        cdef dict by_loop = {}
+        for fn, args, kwargs, write, future, loop, semaphore in batch:
+            has_writes = has_writes or write
+            try:
+                results.append((True, fn(*args, **kwargs)))
+            except BaseException as exc:
+                results.append((False, exc))
+
+        if has_writes and self.group_commit and not self._db.is_memory:
+            try:
+                self._db.commit()
+            except Exception as exc:
+                self._db.rollback()
+                results = [(False, exc) if item[3] else result
+                           for item, result in zip(batch, results)]
+        self.batches += 1
+
+        for item, (success, value) in zip(batch, results):
+            key = (item[5], item[6])
+            by_loop.setdefault(key, []).append((item[4], success, value))
+        for (loop, semaphore), entries in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, entries, self, semaphore)
+            except RuntimeError:
+                _abandon(entries, self)
+
+    async def close(self):
+        """Wait for pending requests to complete and close the database."""
+        if self._closed:
+            return False
+        self._closed = True
+        self._queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._thread.join)
+        return True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def Hash(self, key):
+        return AsyncHash(self, self._db.Hash(key))
+
+    def Set(self, key):
+        return AsyncSet(self, self._db.Set(key))
+
+    def List(self, key):
+        return AsyncList(self, self._db.List(key))
+
+    def ZSet(self, key):
+        return AsyncZSet(self, self._db.ZSet(key))
+
+
+_add_async_methods(
+    AsyncVedis,
+    reads=(
+        'fetch', 'exists', 'fetch_many', 'exists_many', 'get', 'mget',
+        'strlen', 'hget', 'hkeys', 'hvals', 'hgetall', 'hitems', 'hlen',
+        'hexists', 'hmget', 'hscan', 'scard', 'sismember', 'speek', 'stop',
+        'smembers', 'sdiff', 'sinter', 'slen', 'sscan', 'lindex', 'llen',
+        'lrange', 'zscore', 'zrank', 'zrevrank', 'zcard', 'zcount', 'zrange',
+        'zrevrange', 'zrangebyscore', 'zrevrangebyscore', 'time', 'date',
+        'operating_system', 'strip_tags', 'str_split',
+        'size_format', 'soundex', 'base64', 'base64_decode', 'table_list',
+        'random_string', 'random_int', 'rand', 'randstr', 'commit',
+        'rollback', 'flush', 'stats', 'reset_stats', 'ttl', 'expire_stats',
+        'durability_stats', 'io_stats'),
+    writes=(
+        'store', 'append', 'delete', 'update', 'store_many', 'delete_many',
+        'set', 'mset', 'setnx', 'msetnx', 'get_set', 'incr', 'decr',
+        'incr_by', 'decr_by', 'copy', 'move', 'hset', 'hsetnx', 'hdel',
+        'hmdel', 'hmset', 'sadd', 'smadd', 'spop', 'srem', 'smrem', 'lpop',
+        'lpush', 'lmpush', 'lpushx', 'lmpushx', 'zadd', 'zincrby', 'zrem',
+        'zmrem', 'expire', 'expireat', 'persist', 'expire_step', 'call',
+        'execute'))
+
+
+class _AsyncContainer(object):
+    def __init__(self, adb, target):
+        self._adb = adb
+        self._target = target
+
+    @property
+    def key(self):
+        return self._target.key
+
+
+class AsyncHash(_AsyncContainer):
+    pass
+
+
+_add_async_methods(
+    AsyncHash,
+    reads=('get', 'mget', 'keys', 'values', 'items', 'to_dict'),
+    writes=('set', 'delete', 'mdelete', 'update'),
+    aliases=(('length', '__len__', False),
+             ('contains', '__contains__', False)))
+
+
+class AsyncSet(_AsyncContainer):
+    pass
+
+
+_add_async_methods(
+    AsyncSet,
+    reads=('peek', 'top', 'to_set'),
+    writes=('add', 'pop', 'remove'),
+    aliases=(('length', '__len__', False),
+             ('contains', '__contains__', False)))
+
+
+class AsyncList(_AsyncContainer):
+    async def get_range(self, start=None, end=None):
+        """Return the items between `start` and `end` as a list."""
+        return await self._adb._submit(
+            lambda: list(self._target[start:end]), (), {}, False)
+
+    async def to_list(self):
+        """Return the items in the list."""
+        return await self._adb._submit(
+            lambda: list(self._target), (), {}, False)
+
+
+_add_async_methods(
+    AsyncList,
+    reads=(),
+    writes=('append', 'extend', 'pop'),
+    aliases=(('length', '__len__', False),
+             ('index', '__getitem__', False)))
+
+
+class AsyncZSet(_AsyncContainer):
+    pass
+
+
+_add_async_methods(
+    AsyncZSet,
+    reads=('score', 'rank', 'range', 'range_by_score', 'count', 'top'),
+    writes=('add', 'remove', 'incr'),
+    aliases=(('length', '__len__', False),
+             ('contains', '__contains__', False)))
+
+
+# Bulk loading. Records are streamed from the source and written in batches,
+# each of which is committed in its own transaction, so that an interrupted
+# load leaves every batch up to the last commit in place. Input is parsed a
+# block of lines at a time, to keep the per-record overhead low.
+
+LOAD_FIELDS = {
+    'kv': ('key', 'value'),
+    'hash': ('key', 'field', 'value'),
+    'set': ('key', 'member'),
+    'list': ('key', 'value'),
+}
+
+# Approximate number of bytes of input parsed at a time.
+cdef int LOAD_BLOCK_SIZE = 1 << 20
+
+
+def _load_field(value):
+    # Values of JSON records that are not strings are stored as JSON.
+    if isinstance(value, (bytes, str)):
+        return value
+    return json.dumps(value)
+
+
+def _read_blocks(fh, format, tuple fields, delimiter):
+    cdef int nfields = len(fields)
+    cdef list lines
+    if format == 'csv':
+        reader = csv.reader(fh, delimiter=delimiter or ',')
+        while True:
+            rows = list(itertools.islice(reader, BATCH_SIZE))
+            if not rows:
+                break
+            yield [row for row in rows if row]
+        return
+
+    delimiter = delimiter or '\t'
+    while True:
+        lines = fh.readlines(LOAD_BLOCK_SIZE)
+        if not lines:
+            break
+        lines = [line.rstrip('\r\n') for line in lines]
+        if format == 'tsv':
+            # The last field may contain the delimiter.
+            yield [line.split(delimiter, nfields - 1) for line in lines
+                   if line]
+        else:
+            yield [_json_record(line, fields) for line in lines
+                   if line.strip()]
+
+
+def _json_record(line, tuple fields):
+    obj = json.loads(line)
+    if isinstance(obj, dict):
+        try:
+            obj = [obj[name] for name in fields]
+        except KeyError as exc:
+            raise ValueError('Record is missing the %s field: %r' %
+                             (exc, line))
+    return [_load_field(value) for value in obj]
+
+
+def _iter_blocks(iterable):
+    iterator = iter(iterable)
+    while True:
+        block = list(itertools.islice(iterator, BATCH_SIZE))
+        if not block:
+            break
+        yield block
+
+
+cdef _flush_records(Vedis db, type, list batch):
+    cdef dict groups
+    cdef Py_ssize_t i
+    if type == 'kv':
+        for i in range(0, len(batch), BATCH_SIZE):
+            db._store_chunk(batch[i:i + BATCH_SIZE])
+        return
+    elif type == 'expire':
+        # Deadlines that have passed delete their key.
+        for key, deadline in batch:
+            db._expire_at(key, deadline)
+        return
+    # Writes to the same structure are grouped into a single command.
+    # Dictionaries preserve insertion order, so list items are appended in
+    # the order they were read.
+    groups = {}
+    if type == 'hash':
+        for key, field, value in batch:
+            if key in groups:
+                (<dict>groups[key])[field] = value
+            else:
+                groups[key] = {field: value}
+        for key, values in groups.items():
+            db.hmset(key, values)
+    elif type == 'zset':
+        for key, member, score in batch:
+            if key in groups:
+                (<dict>groups[key])[member] = score
+            else:
+                groups[key] = {member: score}
+        for key, values in groups.items():
+            db.zadd(key, values)
+    else:
+        for key, value in batch:
+            if key in groups:
+                (<list>groups[key]).append(value)
+            else:
+                groups[key] = [value]
+        for key, values in groups.items():
+            if type == 'set':
+                db.smadd(key, values)
+            else:
+                db.lmpush(key, values)
+
+
+cdef _commit_records(Vedis db, type, list batch):
+    db.begin()
+    try:
+        _flush_records(db, type, batch)
+        db.commit()
+    except:
+        db.rollback()
+        raise
+
+
+def bulk_load(db, source, format=None, type='kv', int batch=10000,
+              delimiter=None, encoding='utf-8', skip=0, journal=None,
+              progress=None):
+    """
+    Load records from `source` into the database `db`, committing every
+    `batch` records. `source` is a filename or file object holding records
+    in the given `format` ('csv', 'tsv' or 'jsonl'), or an iterable of
+    records when no format is given. `type` selects what the records
+    contain: 'kv' (key, value), 'hash' (key, field, value), 'set' (key,
+    member) or 'list' (key, value). `skip` records are skipped first, which
+    resumes an interrupted load. If `db` is a filename, the database is
+    opened for the load, without a journal if `journal` is False. If `db`
+    is a :py:class:`ShardedVedis`, each batch is split between the shards,
+    and written by its process pool if it has one. `progress` is called
+    with the statistics after each commit. Returns a dictionary of
+    statistics.
+    """
+    cdef tuple fields
+    cdef list block, chunk, records = []
+    cdef Py_ssize_t count = 0, nbatches = 0, skipped = 0, i, n
+    cdef int nfields
+    cdef bint close = False
+    cdef Vedis database = None
+    loader = None
+
+    if type not in LOAD_FIELDS:
+        raise ValueError('type must be one of "kv", "hash", "set" or '
+                         '"list".')
+    if format not in (None, 'csv', 'tsv', 'jsonl'):
+        raise ValueError('format must be one of "csv", "tsv" or "jsonl".')
+    if batch < 1:
+        raise ValueError('batch must be positive.')
+    fields = LOAD_FIELDS[type]
+    nfields = len(fields)
+
+    if isinstance(db, (Vedis, ShardedVedis)):
+        if journal is not None:
+            raise ValueError('journal can only be set when the database is '
+                             'given as a filename.')
+        if isinstance(db, Vedis):
+            database = db
+        else:
+            loader = _ShardLoader(db, type)
+    else:
+        database = Vedis(db, journal=journal is None or journal)
+        close = True
+
+    def flush(list records):
+        if loader is None:
+            _commit_records(database, type, records)
+        else:
+            loader.load(records)
+
+    def stats():
+        elapsed = time.time() - start
+        return {
+            'records': count,
+            'skipped': skipped,
+            'batches': nbatches,
+            'elapsed': elapsed,
+            'records_per_sec': count / elapsed if elapsed > 0 else 0.}
+
+    fh = None
+    start = time.time()
+    try:
+        if format is None:
+            blocks = _iter_blocks(source)
+        else:
+            if isinstance(source, (bytes, str)):
+                source = fh = io.open(source, encoding=encoding, newline='')
+            blocks = _read_blocks(source, format, fields, delimiter)
+
+        for block in blocks:
+            if skipped < skip:
+                n = min(len(block), skip - skipped)
+                skipped += n
+                block = block[n:]
+            i = 0
+            while i < len(block):
+                n = min(len(block) - i, batch - len(records))
+                chunk = block[i:i + n]
+                for record in chunk:
+                    if len(record) != nfields:
+                        raise ValueError(
+                            'Expected %d fields (%s), got %d: %r' % (
+                                nfields, ', '.join(fields), len(record),
+                                record))
+                records.extend(chunk)
+                i += n
+                if len(records) == batch:
+                    flush(records)
+                    count += len(records)
+                    nbatches += 1
+                    records = []
+                    if progress is not None:
+                        progress(stats())
+        if records:
+            flush(records)
+            count += len(records)
+            nbatches += 1
+            if progress is not None:
+                progress(stats())
+    finally:
+        if fh is not None:
+            fh.close()
+        if loader is not None:
+            loader.close()
+        if close:
+            database.close()
+    return stats()
+
+
+def bulk_load_main(argv=None):
+    """Command-line interface to :py:func:`bulk_load`."""
+    parser = argparse.ArgumentParser(
+        prog='vedis-load',
+        description='Load records from CSV, TSV or JSONL files into a vedis '
+                    'database.')
+    parser.add_argument('database',
+                        help='Path to the database file, or to the directory '
+                             'of a sharded database.')
+    parser.add_argument('files', nargs='+',
+                        help='Files to load, or "-" for standard input.')
+    parser.add_argument('-f', '--format', choices=('csv', 'tsv', 'jsonl'),
+                        default='tsv', help='Input format (default: tsv).')
+    parser.add_argument('-t', '--type', choices=sorted(LOAD_FIELDS),
+                        default='kv', help='Type of the records (default: kv).')
+    parser.add_argument('-b', '--batch', type=int, default=10000,
+                        help='Records per transaction (default: 10000).')
+    parser.add_argument('-d', '--delimiter', help='Field delimiter.')
+    parser.add_argument('-e', '--encoding', default='utf-8',
+                        help='Encoding of the input files (default: utf-8).')
+    parser.add_argument('-s', '--skip', type=int, default=0,
+                        help='Number of records to skip, to resume a load.')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Write without a rollback journal. Faster, but a '
+                             'crash may corrupt the database.')
+    parser.add_argument('-p', '--processes', type=int,
+                        help='Number of worker processes writing to the '
+                             'shards of a sharded database.')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not report progress.')
+    args = parser.parse_args(argv)
+
+    def report(stats):
+        sys.stderr.write('\r%d records, %.0f records/sec' % (
+            total + stats['records'], stats['records_per_sec']))
+        sys.stderr.flush()
+
+    if os.path.isdir(args.database):
+        db = ShardedVedis(args.database, processes=args.processes,
+                          journal=not args.no_journal)
+    elif args.processes is not None:
+        parser.error('--processes requires a sharded database.')
+    else:
+        db = Vedis(args.database, journal=not args.no_journal)
+    total = 0
+    elapsed = 0.
+    skip = args.skip
+    try:
+        for filename in args.files:
+            if filename == '-':
+                source = io.TextIOWrapper(sys.stdin.buffer,
+                                          encoding=args.encoding, newline='')
+            else:
+                source = filename
+            stats = bulk_load(db, source, args.format, args.type, args.batch,
+                              args.delimiter, args.encoding, skip,
+                              progress=None if args.quiet else report)
+            skip -= stats['skipped']
+            total += stats['records']
+            elapsed += stats['elapsed']
+    finally:
+        db.close()
+    if not args.quiet:
+        sys.stderr.write('\rLoaded %d records in %.2fs (%.0f records/sec)\n'
+                         % (total, elapsed, total / elapsed if elapsed else 0))
+    return 0
+
+
+# Sharding. Keys, and the names of hashes, sets, lists and sorted sets, are
+# mapped to the files of a directory by consistent hashing: each shard owns
+# `vnodes` points of a ring of 32-bit hashes, and a key belongs to the shard
+# owning the first point that follows the hash of the key. Changing the
+# number of shards only moves the keys whose point changes owner. The number
+# of shards is kept in a manifest, which also records a rebalance in
+# progress: one interrupted while copying is undone, and one interrupted
+# after the keys were copied to their new shard is finished.
+
+SHARD_MANIFEST = 'shards.json'
+cdef int SHARD_VNODES = 128
+
+
+cdef class _HashRing(object):
+    cdef list points
+    cdef list owners
+    cdef readonly int shards
+
+    def __cinit__(self, int shards, int vnodes):
+        cdef list ring = sorted(
+            (crc32(b'%d-%d' % (shard, i)), shard)
+            for shard in range(shards) for i in range(vnodes))
+        self.points = [point for point, _ in ring]
+        self.owners = [owner for _, owner in ring]
+        self.shards = shards
+
+    cpdef int lookup(self, key) except -1:
+        cdef Py_ssize_t i = bisect_right(self.points, crc32(_cache_key(key)))
+        if i == len(self.points):
+            i = 0
+        return self.owners[i]
+
+
+def _shard_filename(directory, int index):
+    return os.path.join(directory, 'shard-%04d.vdb' % index)
+
+
+def _remove_shard(directory, int index):
+    filename = _shard_filename(directory, index)
+    for path in (filename, filename + '_vedis_journal'):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _read_manifest(directory):
+    filename = os.path.join(directory, SHARD_MANIFEST)
+    if not os.path.exists(filename):
+        return None
+    with io.open(filename) as fh:
+        return json.load(fh)
+
+
+def _write_manifest(directory, dict manifest):
+    # The manifest is replaced atomically, by renaming a new copy over it.
+    filename = os.path.join(directory, SHARD_MANIFEST)
+    with io.open(filename + '.tmp', 'w') as fh:
+        fh.write(json.dumps(manifest))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(filename + '.tmp', filename)
+
+
+def _sharded_method(name):
+    def method(self, key, *args, **kwargs):
+        shard = self.shards[self._ring.lookup(key)]
+        return getattr(shard, name)(key, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = 'Call ``%s()`` on the shard of the given key.' % name
+    return method
+
+
+def _add_sharded_methods(klass, names):
+    for name in names:
+        setattr(klass, name, _sharded_method(name))
+
+
+def _run_on_shard(filename, dict kwargs, fn, tuple args):
+    # Runs in a worker process, which opens the shard itself.
+    db = Vedis(filename, **kwargs)
+    try:
+        with db.transaction():
+            return fn(db, *args)
+    finally:
+        db.close()
+
+
+def _load_records(Vedis db, type, list records):
+    _flush_records(db, type, records)
+
+
+cdef _clear_table(Vedis db, type, name):
+    if type == 'hash':
+        if db.hlen(name):
+            db.hmdel(name, db.hkeys(name))
+    elif type == 'set':
+        if db.scard(name):
+            db.smrem(name, list(db.smembers(name)))
+    elif type == 'zset':
+        members = db.zrange(name)
+        if members:
+            db.zmrem(name, members)
+    else:
+        while db.llen(name):
+            db.lpop(name)
+
+
+cdef _flush_runs(list shards, dict runs):
+    cdef Vedis db
+    for index, target_runs in runs.items():
+        db = shards[index]
+        with db.transaction():
+            for type, records in target_runs:
+                _flush_records(db, type, records)
+
+
+cdef long long _move_records(list shards, int index, _HashRing ring,
+                             int batch=10000) except -1:
+    # Copy the records of a shard that belong to another shard under the
+    # new ring, a batch at a time. Records are grouped into runs of the same
+    # type, so deadlines are applied after the keys they belong to.
+    cdef dict runs = {}
+    cdef Py_ssize_t pending = 0
+    cdef long long moved = 0
+    cdef int owner
+    with tempfile.TemporaryFile() as fh:
+        (<Vedis>shards[index]).dump(fh)
+        fh.seek(0)
+        for record_type, record in _DumpRecords(fh):
+            owner = ring.lookup(record[0])
+            if owner == index:
+                continue
+            target_runs = runs.setdefault(owner, [])
+            if target_runs and target_runs[-1][0] == record_type:
+                target_runs[-1][1].append(record)
+            else:
+                target_runs.append((record_type, [record]))
+            pending += 1
+            moved += 1
+            if pending == batch:
+                _flush_runs(shards, runs)
+                runs = {}
+                pending = 0
+        _flush_runs(shards, runs)
+    return moved
+
+
+def _drop_moved(Vedis db, int index, int shards, int vnodes):
+    # Delete the records of a shard that belong to another shard. Deleting
+    # a key also removes its deadline.
+    cdef _HashRing ring = _HashRing(shards, vnodes)
+    cdef list keys = []
+    cdef set tables = set()
+    cdef long long count = 0
+    with tempfile.TemporaryFile() as fh:
+        db.dump(fh)
+        fh.seek(0)
+        for record_type, record in _DumpRecords(fh):
+            if record_type == 'expire' or ring.lookup(record[0]) == index:
+                continue
+            elif record_type == 'kv':
+                keys.append(record[0])
+                if len(keys) == BATCH_SIZE:
+                    count += db.delete_many(keys)
+                    keys = []
+            else:
+                tables.add((record_type, record[0]))
+    count += db.delete_many(keys)
+    for record_type, name in tables:
+        _clear_table(db, record_type, name)
+    return count + len(tables)
+
+
+class _ShardedTransaction(object):
+    # Transaction spanning every shard. Each shard commits atomically, and a
+    # failed commit rolls back the shards that were not committed yet.
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        cdef list shards = self.db.shards
+        cdef Py_ssize_t i
+        if exc_type:
+            self.db.rollback()
+            return
+        for i in range(len(shards)):
+            try:
+                shards[i].commit()
+            except:
+                for shard in shards[i:]:
+                    shard.rollback()
+                raise
+
+
+class _ShardLoader(object):
+    # Writes the batches of a bulk load to their shards. With a process
+    # pool, each batch is written by a worker, and the batches of a shard
+    # are written one at a time while the shards are closed.
+    def __init__(self, db, type):
+        self.db = db
+        self.type = type
+        self.pending = {}
+        self.pool = None
+        if db.processes is not None:
+            db._close_shards()
+            self.pool = db._get_pool()
+
+    def load(self, list records):
+        for index, group in self.db._partition(records).items():
+            shard = self.db.shards[index]
+            if self.pool is None:
+                _commit_records(shard, self.type, group)
+                continue
+            if index in self.pending:
+                self.pending.pop(index).get()
+            self.pending[index] = self.pool.apply_async(
+                _run_on_shard,
+                (shard.filename, self.db._kwargs, _load_records,
+                 (self.type, group)))
+
+    def close(self):
+        if self.pool is None:
+            return
+        try:
+            for result in self.pending.values():
+                result.wait()
+            for result in self.pending.values():
+                result.get()
+        finally:
+            self.pending = {}
+            self.db._open_shards()
+
+
+class ShardedVedis(object):
+    """
+    Database split across `shards` files of a directory. Keys, and the
+    names of hashes, sets, lists and sorted sets, are mapped to a shard by
+    consistent hashing. Bulk operations run in a pool of `processes` worker
+    processes when given. Other keyword arguments are passed to the
+    :py:class:`Vedis` instance of each shard.
+    """
+    def __init__(self, directory, shards=None, processes=None, **kwargs):
+        if processes is not None and processes < 1:
+            raise ValueError('processes must be positive.')
+        self.directory = directory
+        self.processes = processes
+        self._kwargs = kwargs
+        self._pool = None
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            if shards is None:
+                raise ValueError('The number of shards is required to '
+                                 'create a sharded database.')
+            elif shards < 1:
+                raise ValueError('shards must be positive.')
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            manifest = {'shards': shards, 'vnodes': SHARD_VNODES}
+            _write_manifest(directory, manifest)
+        elif shards is not None and shards != manifest['shards']:
+            raise ValueError('%s holds %d shards, use rebalance() to change '
+                             'the number of shards.' %
+                             (directory, manifest['shards']))
+        self._vnodes = manifest['vnodes']
+        self._ring = _HashRing(manifest['shards'], self._vnodes)
+        self.shards = [Vedis(_shard_filename(directory, i), **kwargs)
+                       for i in range(manifest['shards'])]
+        if 'copying' in manifest:
+            self._abort_copy(manifest)
+        elif 'rebalancing' in manifest:
+            self._finish_rebalance(manifest)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close every shard and the process pool."""
+        for shard in self.shards:
+            shard.close()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def shard_index(self, key):
+        """Return the index of the shard holding the given key."""
+        return self._ring.lookup(key)
+
+    def shard_for(self, key):
+        """Return the :py:class:`Vedis` shard holding the given key."""
+        return self.shards[self._ring.lookup(key)]
+
+    def _positions(self, list keys):
+        # Map the index of each shard to the positions of its keys.
+        cdef dict groups = {}
+        cdef Py_ssize_t i
+        lookup = self._ring.lookup
+        for i in range(len(keys)):
+            index = lookup(keys[i])
+            if index in groups:
+                (<list>groups[index]).append(i)
+            else:
+                groups[index] = [i]
+        return groups
+
+    def _partition(self, records):
+        # Map the index of each shard to the records whose first item is
+        # one of its keys.
+        cdef dict groups = {}
+        lookup = self._ring.lookup
+        for record in records:
+            index = lookup(record[0])
+            if index in groups:
+                (<list>groups[index]).append(record)
+            else:
+                groups[index] = [record]
+        return groups
+
+    def __getitem__(self, key):
+        if isinstance(key, list):
+            return self.mget(key)
+        return self.shards[self._ring.lookup(key)][key]
+
+    def __setitem__(self, key, value):
+        self.shards[self._ring.lookup(key)].store(key, value)
+
+    def __delitem__(self, key):
+        self.shards[self._ring.lookup(key)].delete(key)
+
+    def __contains__(self, key):
+        return self.shards[self._ring.lookup(key)].exists(key)
+
+    def mget(self, list keys):
+        cdef list results = [None] * len(keys)
+        for index, positions in self._positions(keys).items():
+            values = self.shards[index].mget([keys[i] for i in positions])
+            for i, value in zip(positions, values):
+                results[i] = value
+        return results
+
+    def exists_many(self, keys):
+        keys = list(keys)
+        cdef list results = [False] * len(keys)
+        for index, positions in self._positions(keys).items():
+            values = self.shards[index].exists_many(
+                [keys[i] for i in positions])
+            for i, value in zip(positions, values):
+                results[i] = value
+        return results
+
+    def fetch_many(self, keys, missing='skip'):
+        keys = list(keys)
+        cdef dict accum = {}
+        for index, positions in self._positions(keys).items():
+            accum.update(self.shards[index].fetch_many(
+                [keys[i] for i in positions], missing))
+        return dict((key, accum[key]) for key in keys if key in accum)
+
+    def mset(self, dict kw):
+        for index, items in self._partition(kw.items()).items():
+            self.shards[index].mset(dict(items))
+        return True
+
+    def store_many(self, data, bint transaction=False):
+        """
+        Store multiple key/value pairs, one batch per shard. If
+        `transaction` is set, the pairs of each shard are stored in a
+        transaction of their own.
+        """
+        cdef long long count = 0
+        if hasattr(data, 'items'):
+            data = data.items()
+        for index, pairs in self._partition(data).items():
+            count += self.shards[index].store_many(pairs, transaction)
+        return count
+
+    def update(self, dict values):
+        self.store_many(values)
+
+    def delete_many(self, keys, missing='skip', bint transaction=False):
+        cdef long long count = 0
+        keys = list(keys)
+        for index, positions in self._positions(keys).items():
+            count += self.shards[index].delete_many(
+                [keys[i] for i in positions], missing, transaction)
+        return count
+
+    def scan(self, prefix=None, start=None, stop=None, bint keys_only=False,
+             int chunk_size=256):
+        """
+        Iterate over the records of each shard in turn, as
+        :py:meth:`Vedis.scan` does. `start` and `stop` apply to each shard.
+        """
+        for shard in self.shards:
+            for item in shard.scan(prefix, start, stop, keys_only,
+                                   chunk_size):
+                yield item
+
+    def begin(self):
+        for shard in self.shards:
+            shard.begin()
+
+    def commit(self):
+        for shard in self.shards:
+            shard.commit()
+
+    def rollback(self):
+        for shard in self.shards:
+            shard.rollback()
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def transaction(self):
+        """
+        Create a context manager wrapping a transaction on every shard.
+        Each shard commits atomically, but not all of them together. Use
+        the transaction of a single shard, from :py:meth:`shard_for`, to
+        update related keys atomically.
+        """
+        return _ShardedTransaction(self)
+
+    def expire_step(self, int max_keys=100):
+        cdef int expired = 0
+        if max_keys < 1:
+            raise ValueError('max_keys must be positive.')
+        for shard in self.shards:
+            if expired == max_keys:
+                break
+            expired += shard.expire_step(max_keys - expired)
+        return expired
+
+    def expire_stats(self):
+        cdef dict accum = {'volatile': 0, 'expired': 0}
+        for shard in self.shards:
+            for key, value in shard.expire_stats().items():
+                accum[key] += value
+        return accum
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self._pool
+
+    def _close_shards(self):
+        # The shards are closed while workers write to them, since vedis
+        # locks the file of an open database. Closing commits the changes
+        # made so far.
+        for shard in self.shards:
+            shard.close()
+
+    def _open_shards(self):
+        for shard in self.shards:
+            shard.open()
+
+    def _run_shards(self, fn, list shards, list args):
+        cdef list handles, results = []
+        if self.processes is None:
+            for shard, shard_args in zip(shards, args):
+                with shard.transaction():
+                    results.append(fn(shard, *shard_args))
+            return results
+        self._close_shards()
+        try:
+            pool = self._get_pool()
+            handles = [
+                pool.apply_async(_run_on_shard, (shard.filename, self._kwargs,
+                                                 fn, shard_args))
+                for shard, shard_args in zip(shards, args)]
+            # Wait for every worker before reopening the shards.
+            for handle in handles:
+                handle.wait()
+            return [handle.get() for handle in handles]
+        finally:
+            self._open_shards()
+
+    def map_shards(self, fn, *args):
+        """
+        Call `fn(shard, *args)` on each shard in a transaction and return
+        the results, in the order of the shards. With a process pool, `fn`
+        is called by the workers, which open the shards themselves, so it
+        must be a module-level function, and its arguments and result must
+        be picklable.
+        """
+        return self._run_shards(fn, self.shards, [args] * len(self.shards))
+
+    def bulk_load(self, source, **kwargs):
+        """
+        Load records into the shards they belong to. Accepts the arguments
+        of :py:func:`bulk_load`, except `journal`.
+        """
+        return bulk_load(self, source, **kwargs)
+
+    def rebalance(self, int shards, progress=None):
+        """
+        Change the number of shards, copying the keys and tables whose shard
+        changes, then deleting them from the shard they were moved from.
+        `progress`, if given, is called with the number of shards copied
+        and the total after each shard. Returns the number of records
+        moved.
+        """
+        cdef int current = len(self.shards)
+        cdef long long moved = 0
+        cdef double start = time.time()
+        cdef _HashRing ring
+        if shards < 1:
+            raise ValueError('shards must be positive.')
+        elif shards == current:
+            return {'shards': shards, 'moved': 0, 'elapsed': 0.}
+        self.commit()
+        manifest = _read_manifest(self.directory)
+        if 'copying' in manifest:
+            self._abort_copy(manifest)
+        ring = _HashRing(shards, self._vnodes)
+        manifest['copying'] = shards
+        _write_manifest(self.directory, manifest)
+        try:
+            for index in range(current, shards):
+                # Files left by an interrupted rebalance are not part of the
+                # database.
+                _remove_shard(self.directory, index)
+                self.shards.append(Vedis(
+                    _shard_filename(self.directory, index), **self._kwargs))
+            for index in range(current):
+                moved += _move_records(self.shards, index, ring)
+                if progress is not None:
+                    progress(index + 1, current)
+        except:
+            for shard in self.shards[current:]:
+                shard.close()
+            del self.shards[current:]
+            raise
+        manifest = {'shards': shards, 'vnodes': self._vnodes,
+                    'rebalancing': current}
+        _write_manifest(self.directory, manifest)
+        self._ring = ring
+        self._finish_rebalance(manifest)
+        return {
+            'shards': shards,
+            'moved': moved,
+            'elapsed': time.time() - start}
+
+    def _abort_copy(self, dict manifest):
+        # A rebalance interrupted while copying leaves copies of records in
+        # shards that do not own them under the current ring. They are
+        # deleted rather than overwritten by the next rebalance, so that
+        # records removed in the meantime do not come back.
+        cdef int shards = manifest['shards']
+        self._run_shards(
+            _drop_moved, self.shards,
+            [(i, shards, self._vnodes) for i in range(shards)])
+        for index in range(shards, manifest['copying']):
+            _remove_shard(self.directory, index)
+        del manifest['copying']
+        _write_manifest(self.directory, manifest)
+
+    def _finish_rebalance(self, dict manifest):
+        # Once the manifest uses the new ring, the copies left in the shards
+        # the records were moved from are deleted, and the shards beyond
+        # the new number of shards are removed. This is safe to run again
+        # if it is interrupted.
+        cdef int shards = manifest['shards']
+        cdef int previous = manifest['rebalancing']
+        self._run_shards(
+            _drop_moved, self.shards[:shards],
+            [(i, shards, self._vnodes) for i in range(shards)])
+        for shard in self.shards[shards:]:
+            shard.close()
+        del self.shards[shards:]
+        for index in range(shards, previous):
+            _remove_shard(self.directory, index)
+        del manifest['rebalancing']
+        _write_manifest(self.directory, manifest)
+
+
+_add_sharded_methods(ShardedVedis, (
+    'store', 'fetch', 'fetch_into', 'fetch_view', 'delete', 'append',
+    'exists', 'expire', 'expireat', 'persist', 'ttl', 'get', 'set', 'setnx',
+    'get_set', 'strlen', 'incr', 'decr', 'incr_by', 'decr_by', 'hset',
+    'hsetnx', 'hget', 'hdel', 'hmdel', 'hkeys', 'hvals', 'hgetall', 'hitems',
+    'hscan', 'hlen', 'hexists', 'hmset', 'hmget', 'sadd', 'smadd', 'scard',
+    'sismember', 'spop', 'speek', 'stop', 'srem', 'smrem', 'smembers',
+    'slen', 'sscan', 'lindex', 'llen', 'lrange', 'lpop', 'lpush', 'lmpush',
+    'lpushx', 'lmpushx', 'zadd', 'zincrby', 'zrem', 'zmrem', 'zscore',
+    'zrank', 'zrevrank', 'zcard', 'zcount', 'zrange', 'zrevrange',
+    'zrangebyscore', 'zrevrangebyscore', 'Hash', 'Set', 'List', 'ZSet'))
+
+
+def rebalance_main(argv=None):
+    """Command-line interface to :py:meth:`ShardedVedis.rebalance`."""
+    parser = argparse.ArgumentParser(
+        prog='vedis-rebalance',
+        description='Change the number of shards of a sharded vedis '
+                    'database.')
+    parser.add_argument('directory', help='Directory holding the shards.')
+    parser.add_argument('shards', type=int, help='New number of shards.')
+    parser.add_argument('-p', '--processes', type=int,
+                        help='Number of worker processes used to delete the '
+                             'records moved from each shard.')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not report progress.')
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        sys.stderr.write('\rCopied %d of %d shards' % (done, total))
+        sys.stderr.flush()
+
+    if _read_manifest(args.directory) is None:
+        parser.error('%s is not a sharded database.' % args.directory)
+    db = ShardedVedis(args.directory, processes=args.processes)
+    try:
+        stats = db.rebalance(args.shards,
+                             progress=None if args.quiet else report)
+    finally:
+        db.close()
+    if not args.quiet:
+        sys.stderr.write('\rMoved %d records to %d shards in %.2fs\n' % (
+            stats['moved'], stats['shards'], stats['elapsed']))
+    return 0